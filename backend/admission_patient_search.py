@@ -3,7 +3,8 @@ Helper function to search patients from CRM Admission Sheet1
 """
 import os
 from typing import List, Dict, Any
-import gspread
+import sheets_scheduler
+from header_resolver import compile_headers
 from oauth2client.service_account import ServiceAccountCredentials
 
 # Get environment variables
@@ -24,7 +25,7 @@ def search_admission_patients(query: str) -> List[Dict[str, Any]]:
         # Authenticate with Google Sheets
         scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
         creds = ServiceAccountCredentials.from_json_keyfile_name(ADMISSION_CREDENTIALS_FILE, scope)
-        client = gspread.authorize(creds)
+        client = sheets_scheduler.authorize(creds)
         
         # Open the sheet
         spreadsheet = client.open_by_key(ADMISSION_SHEET_ID)
@@ -37,7 +38,7 @@ def search_admission_patients(query: str) -> List[Dict[str, Any]]:
             return []
         
         headers = all_values[0]
-        header_map = {h.strip().lower(): i for i, h in enumerate(headers)}
+        header_map = compile_headers(headers, "crm_admission/Sheet1").last_by_lower
         
         # Get column indices
         member_id_col = header_map.get('member id key', header_map.get('member id', -1))
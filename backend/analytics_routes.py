@@ -0,0 +1,203 @@
+"""
+Analytics API Routes
+Lead, admission and revenue aggregates and trends served from the incremental views in analytics_views.py
+"""
+
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+import analytics_views
+import dashboard_service
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+DEFAULT_RANGE_DAYS = 30
+
+
+def load_view(name: str) -> analytics_views.DailyView:
+    """A fresh view; its worksheet is read only when the view has to be rebuilt."""
+    spreadsheet_id, worksheet = analytics_views.source(name)
+    if not spreadsheet_id:
+        raise HTTPException(status_code=500, detail=f"Sheet for the {name} view is not configured")
+
+    def load_values():
+        client = dashboard_service.get_google_sheet_client()
+        return client.open_by_key(spreadsheet_id).worksheet(worksheet).get_all_values()
+
+    return analytics_views.get_view(name, load_values)
+
+
+def date_range(start: Optional[str], end: Optional[str]) -> Tuple[date, date]:
+    """Parse start/end (YYYY-MM-DD or DD-MM-YYYY); defaults to the last 30 days."""
+    end_day = analytics_views.parse_day(end) if end else date.today()
+    start_day = analytics_views.parse_day(start) if start else (end_day and end_day - timedelta(days=DEFAULT_RANGE_DAYS - 1))
+    if start_day is None or end_day is None:
+        raise HTTPException(status_code=400, detail="start and end must be dates (YYYY-MM-DD or DD-MM-YYYY)")
+    if end_day < start_day:
+        raise HTTPException(status_code=400, detail="end is before start")
+    if (end_day - start_day).days >= analytics_views.MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {analytics_views.MAX_RANGE_DAYS} days")
+    return start_day, end_day
+
+
+def range_info(start: date, end: date) -> Dict[str, Any]:
+    return {"start": start.isoformat(), "end": end.isoformat(), "days": (end - start).days + 1}
+
+
+def lead_counts(dimension: str, start: date, end: date, bucket: str) -> Dict[str, Any]:
+    view = load_view(analytics_views.LEADS)
+    series = analytics_views.LEAD_DIMENSIONS[dimension]
+    totals = view.totals(series, start, end)
+    groups = [{"value": value, "count": int(count)} for value, count in sorted(totals.items(), key=lambda item: -item[1])]
+    if bucket == "day":
+        daily = view.daily(series, start, end)
+        for group in groups:
+            group["daily"] = [int(v) for v in daily[group["value"]]]
+    elif bucket == "month":
+        monthly = view.monthly(series, start, end)
+        for group in groups:
+            group["monthly"] = {month: int(v) for month, v in monthly[group["value"]].items()}
+    return {"dimension": dimension, "bucket": bucket, **range_info(start, end),
+            "total": sum(g["count"] for g in groups), "groups": groups}
+
+
+def revenue(start: date, end: date) -> Dict[str, Any]:
+    monthly = load_view(analytics_views.INVOICES).monthly("revenue", start, end)
+    centers = [
+        {"care_center": center, "total": round(sum(by_month.values()), 2),
+         "monthly": {month: round(v, 2) for month, v in by_month.items()}}
+        for center, by_month in monthly.items()
+    ]
+    centers = sorted((c for c in centers if c["total"]), key=lambda c: -c["total"])
+    return {**range_info(start, end), "months": analytics_views.month_range(start, end),
+            "total": round(sum(c["total"] for c in centers), 2), "centers": centers}
+
+
+# Trend metric -> (view, series)
+TREND_METRICS = {
+    "enquiries": (analytics_views.LEADS, "enquiries"),
+    "converted": (analytics_views.LEADS, "converted"),
+    "admissions": (analytics_views.ADMISSIONS, "admissions"),
+    "discharges": (analytics_views.ADMISSIONS, "discharges"),
+    "revenue": (analytics_views.INVOICES, "revenue"),
+}
+
+
+def trend(metric: str, months: int) -> Dict[str, Any]:
+    name, series = TREND_METRICS[metric]
+    start, end = analytics_views.last_months(months)
+    labels = analytics_views.month_range(start, end)
+    totals = dict.fromkeys(labels, 0.0)
+    for by_month in load_view(name).monthly(series, start, end).values():
+        for month, value in by_month.items():
+            totals[month] += value
+    return {"metric": metric, **range_info(start, end), "months": labels,
+            "values": [round(totals[m], 2) for m in labels]}
+
+
+@router.get("/counts")
+async def get_lead_counts(
+    dimension: str = Query("status", description="status, source, care_center or location"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    bucket: str = Query("total", description="total, day or month"),
+) -> Dict[str, Any]:
+    """
+    Enquiries in a date range grouped by lead status, source, care center or location
+
+    Returns:
+        {"dimension": str, "start": str, "end": str, "total": int,
+         "groups": [{"value": str, "count": int, "daily"/"monthly": ...}]}
+    """
+    if dimension not in analytics_views.LEAD_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dimension must be one of {', '.join(analytics_views.LEAD_DIMENSIONS)}")
+    if bucket not in ("total", "day", "month"):
+        raise HTTPException(status_code=400, detail="bucket must be total, day or month")
+    start_day, end_day = date_range(start, end)
+    try:
+        return await run_in_threadpool(lead_counts, dimension, start_day, end_day, bucket)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in analytics counts endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/funnel")
+async def get_funnel(start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Enquiry -> converted -> admitted counts for a date range, with conversion rates
+    """
+    start_day, end_day = date_range(start, end)
+    try:
+        leads, admissions = await run_in_threadpool(
+            lambda: (load_view(analytics_views.LEADS), load_view(analytics_views.ADMISSIONS))
+        )
+        return {**range_info(start_day, end_day), **analytics_views.funnel(leads, admissions, start_day, end_day)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in analytics funnel endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/length-of-stay")
+async def get_length_of_stay(start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Average length of stay (check-in to check-out) of patients discharged in a date range
+    """
+    start_day, end_day = date_range(start, end)
+    try:
+        admissions = await run_in_threadpool(load_view, analytics_views.ADMISSIONS)
+        return {**range_info(start_day, end_day), **analytics_views.length_of_stay(admissions, start_day, end_day)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in analytics length of stay endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/revenue")
+async def get_revenue(start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Invoiced revenue per care center per month (defaults to the last 12 months)
+    """
+    if start is None and end is None:
+        start_day, end_day = analytics_views.last_months(12)
+    else:
+        start_day, end_day = date_range(start, end)
+    try:
+        return await run_in_threadpool(revenue, start_day, end_day)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in analytics revenue endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/trends")
+async def get_trend(
+    metric: str = Query("enquiries", description="enquiries, converted, admissions, discharges or revenue"),
+    months: int = Query(12, ge=1, le=24),
+) -> Dict[str, Any]:
+    """
+    Monthly totals of one metric for the last `months` months (the current month so far included)
+    """
+    if metric not in TREND_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(TREND_METRICS)}")
+    try:
+        return await run_in_threadpool(trend, metric, months)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in analytics trends endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/status")
+async def get_status() -> Dict[str, Any]:
+    """Views built in this worker: dated rows, groups per series and daily buckets"""
+    return analytics_views.status()
@@ -0,0 +1,457 @@
+"""
+Analytics Views Module
+Daily aggregates of leads, admissions and invoices (counts by status, source, care center and location, stays, revenue) kept current row by row, so date-range queries cost O(days) instead of a sheet scan
+"""
+
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import change_feed
+import instrumentation
+from followup_index import parse_due_date
+
+# Rebuild a view from its sheet at most this often; API writes and change-feed appends
+# keep it current in between (see record_row / invalidate)
+ANALYTICS_VIEW_TTL_SECONDS = int(os.getenv("ANALYTICS_VIEW_TTL_SECONDS", "900"))
+# Longest range one query may ask for (three years of daily buckets)
+MAX_RANGE_DAYS = int(os.getenv("ANALYTICS_MAX_RANGE_DAYS", "1100"))
+
+LEADS = "leads"
+ADMISSIONS = "admissions"
+INVOICES = "invoices"
+
+# Lead dimensions: query name -> series
+LEAD_DIMENSIONS = {
+    "status": "leads_by_status",
+    "source": "leads_by_source",
+    "care_center": "leads_by_center",
+    "location": "leads_by_location",
+}
+
+CONVERTED_STATUSES = {"converted", "admitted"}
+VOID_INVOICE_STATUSES = {"cancelled", "canceled", "void"}
+BLANK = "(blank)"
+
+# (series, group, day, amount)
+Fact = Tuple[str, str, date, float]
+Extractor = Callable[[List[str]], List[Fact]]
+
+
+def parse_day(value: Any) -> Optional[date]:
+    """Date part of a sheet cell ("07-11-2025", "2025-11-07 10:30:00", "07-11-2025 10:30"...)."""
+    text = str(value or "").strip()
+    if not text:
+        return None
+    return parse_due_date(text) or parse_due_date(text.split(" ")[0])
+
+
+def parse_amount(value: Any) -> Optional[float]:
+    text = re.sub(r"[^\d.\-]", "", str(value or ""))
+    try:
+        return float(text) if text else None
+    except ValueError:
+        return None
+
+
+def _norm(header: Any) -> str:
+    return re.sub(r"[\s\-_/]", "", str(header).strip().lower())
+
+
+def _find(headers: List[str], *candidates: str) -> Optional[int]:
+    """Position of the first candidate header present (compared without case, spaces, - and _)."""
+    normalized = [_norm(h) for h in headers]
+    for candidate in candidates:
+        if candidate in normalized:
+            return normalized.index(candidate)
+    return None
+
+
+def _cell(row: List[str], col: Optional[int]) -> str:
+    return row[col].strip() if col is not None and col < len(row) else ""
+
+
+# --- View definitions: header row -> function turning one row into facts ---
+
+def lead_facts(headers: List[str]) -> Extractor:
+    """Enquiries per day, by lead status, source, care center and location, and conversions."""
+    date_col = _find(headers, "date", "enquirydate", "timestamp")
+    status_col = _find(headers, "leadstatus", "status")
+    columns = {
+        "leads_by_status": status_col,
+        "leads_by_source": _find(headers, "source", "leadsource"),
+        # The lead sheet records the preferred center as Hospital Location
+        "leads_by_center": _find(headers, "carecenter", "center", "hospitallocation"),
+        "leads_by_location": _find(headers, "patientlocation", "location", "area", "city"),
+    }
+
+    def extract(row: List[str]) -> List[Fact]:
+        day = parse_day(_cell(row, date_col))
+        if day is None:
+            return []
+        facts = [("enquiries", "", day, 1.0)]
+        facts += [(series, _cell(row, col) or BLANK, day, 1.0) for series, col in columns.items() if col is not None]
+        if _cell(row, status_col).lower() in CONVERTED_STATUSES:
+            facts.append(("converted", "", day, 1.0))
+        return facts
+
+    return extract
+
+
+def admission_facts(headers: List[str]) -> Extractor:
+    """Check-ins and check-outs per day by care center; stays (and their days) on the check-out day."""
+    in_col = _find(headers, "checkindate", "admissiondate", "dateofadmission")
+    out_col = _find(headers, "checkoutdate", "dischargedate")
+    center_col = _find(headers, "carecenter", "center")
+
+    def extract(row: List[str]) -> List[Fact]:
+        center = _cell(row, center_col) or BLANK
+        check_in, check_out = parse_day(_cell(row, in_col)), parse_day(_cell(row, out_col))
+        facts: List[Fact] = []
+        if check_in:
+            facts.append(("admissions", center, check_in, 1.0))
+        if check_out:
+            facts.append(("discharges", center, check_out, 1.0))
+            if check_in and check_out >= check_in:
+                facts.append(("stays", center, check_out, 1.0))
+                facts.append(("stay_days", center, check_out, float((check_out - check_in).days)))
+        return facts
+
+    return extract
+
+
+def invoice_facts(headers: List[str]) -> Extractor:
+    """Revenue per day by care center: each service line's Amount (Total Amount when a row has none)."""
+    date_col = _find(headers, "date", "invoicedate")
+    center_col = _find(headers, "carecenter", "center")
+    amount_col = _find(headers, "amount")
+    total_col = _find(headers, "totalamount")
+    status_col = _find(headers, "status")
+
+    def extract(row: List[str]) -> List[Fact]:
+        day = parse_day(_cell(row, date_col))
+        if day is None or _cell(row, status_col).lower() in VOID_INVOICE_STATUSES:
+            return []
+        amount = parse_amount(_cell(row, amount_col))
+        if amount is None:
+            amount = parse_amount(_cell(row, total_col))
+        return [("revenue", _cell(row, center_col) or BLANK, day, amount)] if amount else []
+
+    return extract
+
+
+class DailyView:
+    def __init__(self, name: str, bind: Callable[[List[str]], Extractor]):
+        """
+        Per-day sums of the facts a worksheet's rows produce, grouped by series and value.
+
+        Args:
+            name: View name (leads, admissions, invoices)
+            bind: Builds the row -> facts function for a header row
+        """
+        self.name = name
+        self.headers: Tuple[str, ...] = ()
+        self.built_at: Optional[datetime] = None
+        self._bind = bind
+        self._extract: Extractor = bind([])
+        # series -> group key -> day -> amount
+        self._series: Dict[str, Dict[str, Dict[date, float]]] = {}
+        self._labels: Dict[str, str] = {}  # Group key (casefolded) -> first spelling seen
+        self._row_facts: Dict[int, Tuple[Fact, ...]] = {}
+        self._interned: Dict[Fact, Fact] = {}  # Rows share equal fact tuples
+        self._lock = threading.RLock()
+
+    # --- Maintenance ---
+
+    def rebuild(self, values: List[List[Any]]) -> None:
+        """
+        Rebuild the view from a full `get_all_values()` result (header row first).
+
+        Args:
+            values: Sheet values including the header row
+        """
+        headers = _header_key(values[0] if values else [])
+        extract = self._bind(list(headers))
+        series: Dict[str, Dict[str, Dict[date, float]]] = {}
+        labels: Dict[str, str] = {}
+        interned: Dict[Fact, Fact] = {}
+        row_facts: Dict[int, Tuple[Fact, ...]] = {}
+        for offset, row in enumerate(values[1:]):
+            facts = _facts(extract, row, labels, interned)
+            if facts:
+                row_facts[offset + 2] = facts
+                _apply(series, facts, 1)
+
+        with self._lock:
+            self.headers = headers
+            self._extract = extract
+            self._series = series
+            self._labels = labels
+            self._interned = interned
+            self._row_facts = row_facts
+            self.built_at = datetime.now()
+        print(f"[Analytics] Built '{self.name}' view: {len(row_facts)} dated rows, "
+              f"{sum(len(groups) for groups in series.values())} groups")
+
+    def upsert_row(self, row_number: int, headers: List[str], row: List[Any]) -> None:
+        """
+        Replace one row's contribution after it was written (update or append).
+
+        Args:
+            row_number: 1-based sheet row number
+            headers: Header row the values were written against
+            row: Row values as written
+        """
+        with self._lock:
+            if self.built_at is None:
+                return
+            if _header_key(headers) != self.headers:
+                # Header layout changed under us - let the next read rebuild
+                self.built_at = None
+                return
+            _apply(self._series, self._row_facts.pop(row_number, ()), -1)
+            facts = _facts(self._extract, row, self._labels, self._interned)
+            if facts:
+                self._row_facts[row_number] = facts
+                _apply(self._series, facts, 1)
+
+    def invalidate(self) -> None:
+        """Force a rebuild on next access (e.g. after rows were deleted and shifted)."""
+        with self._lock:
+            self.built_at = None
+
+    def is_stale(self) -> bool:
+        if self.built_at is None:
+            return True
+        return (datetime.now() - self.built_at).total_seconds() > change_feed.cache_ttl(ANALYTICS_VIEW_TTL_SECONDS)
+
+    # --- Queries: each reads one bucket per day in the range ---
+
+    def groups(self, series: str) -> List[str]:
+        with self._lock:
+            return [self._labels.get(key, key) for key in self._series.get(series, {})]
+
+    def daily(self, series: str, start: date, end: date) -> Dict[str, List[float]]:
+        """Group -> one value per day from start to end (inclusive)."""
+        days = day_range(start, end)
+        with self._lock:
+            return {
+                self._labels.get(key, key): [by_day.get(d, 0.0) for d in days]
+                for key, by_day in self._series.get(series, {}).items()
+            }
+
+    def totals(self, series: str, start: date, end: date) -> Dict[str, float]:
+        """Group -> sum over start..end; groups with nothing in the range are left out."""
+        totals = {group: sum(values) for group, values in self.daily(series, start, end).items()}
+        return {group: value for group, value in totals.items() if value}
+
+    def monthly(self, series: str, start: date, end: date) -> Dict[str, Dict[str, float]]:
+        """Group -> {"YYYY-MM": sum} for every month touched by start..end."""
+        days = day_range(start, end)
+        months = [d.strftime("%Y-%m") for d in days]
+        result: Dict[str, Dict[str, float]] = {}
+        for group, values in self.daily(series, start, end).items():
+            buckets = dict.fromkeys(month_range(start, end), 0.0)
+            for month, value in zip(months, values):
+                buckets[month] += value
+            result[group] = buckets
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "view": self.name,
+                "rows": len(self._row_facts),
+                "series": {name: len(groups) for name, groups in self._series.items()},
+                "buckets": sum(len(by_day) for groups in self._series.values() for by_day in groups.values()),
+                "built_at": self.built_at.isoformat() if self.built_at else None,
+            }
+
+
+def _header_key(headers: Iterable[Any]) -> Tuple[str, ...]:
+    headers = [str(h).strip() for h in headers]
+    while headers and not headers[-1]:
+        headers.pop()  # Writers that drop blank trailing headers still match
+    return tuple(headers)
+
+
+def _facts(extract: Extractor, row: List[Any], labels: Dict[str, str],
+           interned: Dict[Fact, Fact]) -> Tuple[Fact, ...]:
+    facts = []
+    for series, group, day, amount in extract([str(v) for v in row]):
+        # Groups compare without case; the first spelling seen is the one reported
+        key = " ".join(group.split()).casefold()
+        labels.setdefault(key, group)
+        fact = (series, key, day, amount)
+        facts.append(interned.setdefault(fact, fact))
+    return tuple(facts)
+
+
+def _apply(series: Dict[str, Dict[str, Dict[date, float]]], facts: Iterable[Fact], sign: int) -> None:
+    for name, key, day, amount in facts:
+        by_day = series.setdefault(name, {}).setdefault(key, {})
+        value = by_day.get(day, 0.0) + sign * amount
+        if abs(value) < 1e-9:
+            by_day.pop(day, None)
+        else:
+            by_day[day] = value
+
+
+def day_range(start: date, end: date) -> List[date]:
+    if end < start:
+        raise ValueError("end is before start")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"date range is longer than {MAX_RANGE_DAYS} days")
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def month_range(start: date, end: date) -> List[str]:
+    months, year, month = [], start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def last_months(months: int, today: Optional[date] = None) -> Tuple[date, date]:
+    """First day of the month `months - 1` months back, and today."""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return date(index // 12, index % 12 + 1, 1), today
+
+
+# --- Cross-view aggregates ---
+
+def funnel(leads: DailyView, admissions: DailyView, start: date, end: date) -> Dict[str, Any]:
+    """Enquiries -> converted leads -> admissions over one date range."""
+    enquiries = sum(leads.totals("enquiries", start, end).values())
+    converted = sum(leads.totals("converted", start, end).values())
+    admitted = sum(admissions.totals("admissions", start, end).values())
+    return {
+        "stages": [
+            {"stage": "enquiries", "count": int(enquiries)},
+            {"stage": "converted", "count": int(converted)},
+            {"stage": "admitted", "count": int(admitted)},
+        ],
+        "conversion_rate": round(converted / enquiries, 4) if enquiries else None,
+        "admission_rate": round(admitted / enquiries, 4) if enquiries else None,
+    }
+
+
+def length_of_stay(admissions: DailyView, start: date, end: date) -> Dict[str, Any]:
+    """Average length of stay of the patients discharged in the range, overall and per care center."""
+    stays = admissions.totals("stays", start, end)
+    stay_days = admissions.totals("stay_days", start, end)
+    by_center = [
+        {"care_center": center, "stays": int(count), "average_days": round(stay_days.get(center, 0.0) / count, 2)}
+        for center, count in sorted(stays.items(), key=lambda item: -item[1])
+    ]
+    total_stays, total_days = sum(stays.values()), sum(stay_days.values())
+    return {
+        "stays": int(total_stays),
+        "average_days": round(total_days / total_stays, 2) if total_stays else None,
+        "by_center": by_center,
+    }
+
+
+# --- Registry ---
+
+_sources: Dict[str, Tuple[Optional[str], str, Callable[[List[str]], Extractor]]] = {
+    LEADS: (os.getenv("GOOGLE_SHEET_ID"), "Sheet1", lead_facts),
+    ADMISSIONS: (os.getenv("PATIENT_ADMISSION_SHEET_ID"), "Sheet1", admission_facts),
+    INVOICES: (os.getenv("PATIENT_ADMISSION_SHEET_ID"), "Invoice Table", invoice_facts),
+}
+_views: Dict[str, DailyView] = {}
+_registry_lock = threading.Lock()
+
+
+def source(name: str) -> Tuple[Optional[str], str]:
+    """(spreadsheet key, worksheet title) a view is built from."""
+    spreadsheet_id, worksheet, _ = _sources[name]
+    return spreadsheet_id, worksheet
+
+
+def get_view_instance(name: str) -> DailyView:
+    """Get (or create an empty) view."""
+    with _registry_lock:
+        view = _views.get(name)
+        if view is None:
+            view = _views[name] = DailyView(name, _sources[name][2])
+        return view
+
+
+def get_view(name: str, loader: Callable[[], List[List[Any]]]) -> DailyView:
+    """
+    Get a fresh view, calling `loader` only when a rebuild is needed.
+
+    Args:
+        name: View name
+        loader: Returns the source worksheet's `get_all_values()`
+    """
+    view = get_view_instance(name)
+    stale = view.is_stale()
+    instrumentation.record_cache("analytics_view", not stale)
+    if stale:
+        view.rebuild(loader())
+    return view
+
+
+def _matching(spreadsheet_id: Optional[str], worksheet: Optional[str]) -> List[DailyView]:
+    names = [
+        name for name, (sid, title, _) in _sources.items()
+        if (spreadsheet_id is None or sid == spreadsheet_id) and (worksheet is None or title == worksheet)
+    ]
+    with _registry_lock:
+        return [_views[name] for name in names if name in _views]
+
+
+def record_row(spreadsheet_id: str, worksheet: str, row_number: int, headers: List[str], row: List[Any]) -> None:
+    """Keep the views built from a worksheet current after a row write."""
+    for view in _matching(spreadsheet_id, worksheet):
+        view.upsert_row(row_number, headers, row)
+
+
+def invalidate(spreadsheet_id: Optional[str] = None, worksheet: Optional[str] = None) -> None:
+    """Drop the views built from a worksheet (or all) so the next query rebuilds them."""
+    for view in _matching(spreadsheet_id, worksheet):
+        view.invalidate()
+
+
+def appended_row_number(response: Any) -> Optional[int]:
+    """Sheet row an `append_row` response says it wrote, or None."""
+    match = re.search(r"![A-Z]+(\d+)", str((response or {}).get("updates", {}).get("updatedRange", "")))
+    return int(match.group(1)) if match else None
+
+
+def apply_change(event: Dict[str, Any]) -> None:
+    """Keep this worker's views current from change-feed events on their worksheets."""
+    if event["type"] == "appended":
+        for offset, row in enumerate(event["rows"]):
+            record_row(event["spreadsheet_id"], event["worksheet"], event["first_row"] + offset, event["headers"], row)
+    else:
+        invalidate(event["spreadsheet_id"], event["worksheet"])
+
+
+for _spreadsheet_id, _worksheet, _ in _sources.values():
+    change_feed.watch_worksheet(_spreadsheet_id, _worksheet)
+change_feed.subscribe(apply_change, every_worker=True)
+
+
+def status() -> Dict[str, Any]:
+    with _registry_lock:
+        views = list(_views.values())
+    return {"views": [v.stats() for v in views], "max_range_days": MAX_RANGE_DAYS}
+
+
+def _prometheus_lines() -> List[str]:
+    with _registry_lock:
+        views = list(_views.values())
+    return instrumentation.gauge_lines(
+        "crm_analytics_view_buckets", "Daily buckets held by this worker's analytics views",
+        [({"view": v.name}, v.stats()["buckets"]) for v in views],
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
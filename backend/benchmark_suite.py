@@ -0,0 +1,368 @@
+"""
+Offline benchmark suite for the CRM backend.
+Seeds an in-memory fake of Google Sheets (fake_sheets.py) with synthetic data (create_test_data.py),
+drives the real app through TestClient and reports latency percentiles, Sheets calls per operation and peak RSS.
+
+Usage:
+    python benchmark_suite.py [--leads 10000] [--admissions 10000] [--homecare 500] [--invoices 5000]
+                              [--iterations 20] [--latency-ms 0] [--ops submit,search_data,...]
+                              [--json results.json] [--baseline results.json --tolerance 0.25]
+
+Exits with status 1 when --baseline is given and an operation regressed (p95 latency or Sheets calls
+per op above baseline * (1 + tolerance)), so it can gate changes locally.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+if resource is None and psutil is None:
+    # Last resort (e.g. Windows without psutil): peak Python allocations, not process RSS
+    tracemalloc.start()
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LEADS_SHEET_ID = "bench-crm-leads"
+ADMISSION_SHEET_ID = "bench-crm-admission"
+HOMECARE_SHEET_ID = "bench-crm-homecare"
+
+DASHBOARD_PATHS = [
+    "/api/dashboard/previous-day-enquiries",
+    "/api/dashboard/leads-converted-yesterday",
+    "/api/dashboard/patients-admitted",
+    "/api/dashboard/patients-discharged",
+    "/api/dashboard/follow-ups-today",
+    "/api/dashboard/complaints-received-yesterday",
+    "/api/dashboard/admissions-by-center?care_center=Chennai",
+]
+ALL_OPS = ["submit", "search_data", "patients_search", "dashboard", "billing", "confirm_upload", "change_feed"]
+HEAVY_OPS = {"billing", "confirm_upload"}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--leads", type=int, default=10000)
+    parser.add_argument("--admissions", type=int, default=10000)
+    parser.add_argument("--homecare", type=int, default=500)
+    parser.add_argument("--invoices", type=int, default=5000)
+    parser.add_argument("--upload-rows", type=int, default=1000, help="Rows in the confirm_upload CSV")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--heavy-iterations", type=int, default=2, help="Iterations for billing / confirm_upload")
+    parser.add_argument("--ops", default=",".join(ALL_OPS))
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated Sheets round trip")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--per-mb-ms", type=float, default=0, help="Simulated transfer time per MB")
+    parser.add_argument("--reads-per-minute", type=int, default=0, help="Fake server read quota per spreadsheet (0 = off)")
+    parser.add_argument("--writes-per-minute", type=int, default=0, help="Fake server write quota per spreadsheet (0 = off)")
+    parser.add_argument("--scheduler-rpm", type=int, default=100000, help="Client-side scheduler bucket size")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json result")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's own log output")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace, workdir: str) -> None:
+    """Point the app at fake sheet IDs and throwaway state files; must run before importing main."""
+    credentials = os.path.join(workdir, "fake_credentials.json")
+    with open(credentials, "w", encoding="utf-8") as f:
+        json.dump({"type": "service_account", "client_email": "benchmark@fake"}, f)
+    os.environ.update({
+        "CREDENTIALS_FILE": credentials,
+        "GOOGLE_SHEET_ID": LEADS_SHEET_ID,
+        "PATIENT_ADMISSION_SHEET_ID": ADMISSION_SHEET_ID,
+        "HOMECARE_SHEET_ID": HOMECARE_SHEET_ID,
+        "OUTBOX_DB_PATH": os.path.join(workdir, "outbox.db"),
+        "SHARED_CACHE_PATH": os.path.join(workdir, "shared_cache.db"),
+        "JOB_DB_PATH": os.path.join(workdir, "job_runner.db"),
+        "LIVE_DB_PATH": os.path.join(workdir, "live_updates.db"),
+        "DROPDOWN_DB_PATH": os.path.join(workdir, "dropdown_engine.db"),
+        "CATALOG_DB_PATH": os.path.join(workdir, "catalog_store.db"),
+        "EXPORT_DB_PATH": os.path.join(workdir, "exports.db"),
+        "MEMBER_ID_DB_PATH": os.path.join(workdir, "member_ids.db"),
+        "MEMBER_ID_NODE": "1",
+        "EXPORT_DIR": os.path.join(workdir, "exports"),
+        "SHEETS_USER_REQUESTS_PER_MINUTE": str(args.scheduler_rpm),
+        "SHEETS_SPREADSHEET_REQUESTS_PER_MINUTE": str(args.scheduler_rpm),
+        "SCHEMA_HEADER_CHECK_SECONDS": "0",
+        "TRACE_SAMPLE_RATE": "0",
+        "LOG_SAMPLE_RATE": "0",
+    })
+
+
+def peak_rss_mb() -> float:
+    if resource is not None:
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        # Windows reports the peak working set; elsewhere only the current RSS is available
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024)
+    return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Quiet:
+    """Silence the app's print logging while an operation runs."""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+
+    def __enter__(self):
+        if self.enabled:
+            self._stdout = sys.stdout
+            sys.stdout = open(os.devnull, "w")
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            sys.stdout.close()
+            sys.stdout = self._stdout
+
+
+def seed_backend(backend, data: Dict[str, List[List[str]]]) -> None:
+    backend.add_spreadsheet(LEADS_SHEET_ID, "CRM Leads")
+    backend.add_sheet(LEADS_SHEET_ID, "Sheet1", data["leads"])
+    # Enquiries mirrors the most recent fifth of the leads
+    backend.add_sheet(LEADS_SHEET_ID, "Enquiries", data["leads"][:1] + data["leads"][-max(1, len(data["leads"]) // 5):])
+    backend.add_sheet(LEADS_SHEET_ID, "Login Details", [["User_Name", "Password"], ["benchmark", "benchmark"]])
+    backend.add_spreadsheet(ADMISSION_SHEET_ID, "CRM Admission")
+    backend.add_sheet(ADMISSION_SHEET_ID, "Sheet1", data["admissions"])
+    backend.add_sheet(ADMISSION_SHEET_ID, "Invoice Table", data["invoices"])
+    backend.add_spreadsheet(HOMECARE_SHEET_ID, "CRM HomeCare")
+    backend.add_sheet(HOMECARE_SHEET_ID, "CRM_HomeCare", data["homecare"])
+
+
+def build_operations(args, client, data, workdir, backend) -> Dict[str, Callable[[int], Any]]:
+    """Operation name -> callable(iteration) returning the HTTP status (or a summary dict)."""
+    import change_feed
+    import homecare_service
+    import main
+    import sheets_scheduler
+    import write_outbox
+    from create_test_data import LEAD_HEADERS, generate_leads
+
+    rng = random.Random(args.seed)
+    names = [row[LEAD_HEADERS.index("Patient Name")] for row in data["leads"][1:]] or ["Patient"]
+
+    def submit(i):
+        first, last = rng.choice(names).split(" ", 1)
+        response = client.post("/submit", json={"data": {
+            "patient_name": f"{first} Bench{i}",
+            "attender_name": last,
+            "mobile_number": str(7000000000 + i),
+            "pain_point": "Stroke",
+            "service": "Home Care",
+            "lead_status": "New",
+        }})
+        write_outbox.flush(timeout=60)  # Count the journaled Sheets writes against this op
+        return response.status_code
+
+    def search_data(i):
+        query = rng.choice(names).split(" ")[0]
+        return client.get("/search_data", params={"query": query, "limit": 50}).status_code
+
+    def patients_search(i):
+        return client.get("/api/patients/search", params={"q": rng.choice(names)[:4]}).status_code
+
+    def dashboard(i):
+        statuses = [client.get(path).status_code for path in DASHBOARD_PATHS]
+        return max(statuses)
+
+    def billing(i):
+        with sheets_scheduler.lane("batch"):
+            summary = homecare_service.process_daily_billing()
+        return 500 if summary.get("status") == "failed" else 200
+
+    upload_path = os.path.join(workdir, "bench_upload.csv")
+    upload_rows = generate_leads(args.upload_rows, seed=args.seed + 100)
+    with open(upload_path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(upload_rows)
+
+    def confirm_upload(i):
+        return client.post("/confirm_upload", json={"file_path": upload_path}).status_code
+
+    def feed(i):
+        # An idle poll, a lead typed straight into the sheet, the poll that picks it up, then reads
+        # of the caches it keeps current (patient records, follow-up index) without refetching Sheet1
+        change_feed.poll_once()
+        row = generate_leads(1, seed=args.seed + 200 + i)[1]
+        sheet = backend.spreadsheets[LEADS_SHEET_ID].sheet("Sheet1")
+        backend.edit_sheet(LEADS_SHEET_ID, "Sheet1", sheet.last_row() + 1, [row])
+        events = change_feed.poll_once()
+        records = main.load_patient_records()
+        status = client.get("/followups/due", params={"window": "upcoming", "limit": 5}).status_code
+        appended = [e["type"] for e in events if e["worksheet"] == "Sheet1"] == ["appended"]
+        found = records[-1].get("Patient Name") == row[LEAD_HEADERS.index("Patient Name")]
+        return status if appended and found else 500
+
+    return {
+        "submit": submit,
+        "search_data": search_data,
+        "patients_search": patients_search,
+        "dashboard": dashboard,
+        "billing": billing,
+        "confirm_upload": confirm_upload,
+        "change_feed": feed,
+    }
+
+
+def run_operation(name, fn, iterations, backend, quiet) -> Dict[str, Any]:
+    latencies, calls, errors = [], [], 0
+    call_types: Counter = Counter()
+    rss_before = peak_rss_mb()
+    for i in range(iterations):
+        before = backend.snapshot()
+        started = time.perf_counter()
+        with Quiet(quiet):
+            try:
+                status = fn(i)
+            except Exception as e:
+                print(f"[Benchmark] {name} iteration {i} raised {e}")
+                status = 599
+        latencies.append(time.perf_counter() - started)
+        delta = backend.snapshot() - before
+        calls.append(sum(delta.values()))
+        call_types.update(delta)
+        if status >= 400:
+            errors += 1
+    return {
+        "iterations": iterations,
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "sheets_calls_per_op": round(statistics.mean(calls), 2),
+        "sheets_calls_by_type": {k: round(v / iterations, 2) for k, v in sorted(call_types.items())},
+        "errors": errors,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in results["operations"].items():
+        previous = baseline.get("operations", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p95_ms", "sheets_calls_per_op"):
+            limit = previous[metric] * (1 + tolerance)
+            if current[metric] > limit and current[metric] - previous[metric] > (1 if metric == "p95_ms" else 0):
+                regressions.append(f"{name}.{metric}: {current[metric]} > {previous[metric]} (+{tolerance:.0%})")
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    cfg = results["config"]
+    print(f"\nDataset: {cfg['leads']} leads, {cfg['admissions']} admissions, {cfg['homecare']} home care clients, "
+          f"{cfg['invoices']} invoices (seeded in {results['seed_seconds']}s, RSS {results['rss_after_seed_mb']} MB)")
+    print(f"{'operation':<16}{'n':>4}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'calls/op':>10}{'errors':>8}{'peak RSS':>10}")
+    for name, r in results["operations"].items():
+        print(f"{name:<16}{r['iterations']:>4}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['sheets_calls_per_op']:>10}{r['errors']:>8}{r['peak_rss_mb']:>9}M")
+    for name, r in results["operations"].items():
+        by_type = ", ".join(f"{k}={v}" for k, v in r["sheets_calls_by_type"].items())
+        print(f"  {name}: {by_type}")
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    ops = [op.strip() for op in args.ops.split(",") if op.strip()]
+    unknown = [op for op in ops if op not in ALL_OPS]
+    if unknown:
+        print(f"Unknown operations: {unknown}; choose from {ALL_OPS}")
+        return 2
+
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    workdir = tempfile.mkdtemp(prefix="crm-bench-")
+    configure_environment(args, workdir)
+
+    import fake_sheets
+    from create_test_data import generate_dataset
+
+    backend = fake_sheets.FakeSheetsBackend(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, per_mb_ms=args.per_mb_ms,
+        reads_per_minute=args.reads_per_minute, writes_per_minute=args.writes_per_minute,
+    )
+    started = time.perf_counter()
+    data = generate_dataset(args.leads, args.admissions, args.homecare, args.invoices, seed=args.seed)
+    seed_backend(backend, data)
+    seed_seconds = round(time.perf_counter() - started, 2)
+    fake_sheets.install(backend)
+
+    with Quiet(not args.verbose):
+        import main
+        import schema_registry
+        from fastapi.testclient import TestClient
+
+        # Load the on-disk schemas directly: startup would start schedulers and persist registry files
+        schema_registry.REGISTRY_FILE = os.path.join(workdir, "schema_registry.json")
+        for form_type, path in (("enquiry", "field_schema.json"), ("admission", "admission_schema.json")):
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    main.fields_cache[form_type] = json.load(f)
+    client = TestClient(main.app, raise_server_exceptions=False)
+    operations = build_operations(args, client, data, workdir, backend)
+    del data
+
+    results = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+        "seed_seconds": seed_seconds,
+        "rss_after_seed_mb": round(peak_rss_mb(), 1),
+        "operations": {},
+    }
+    for name in ops:
+        iterations = args.heavy_iterations if name in HEAVY_OPS else args.iterations
+        print(f"[Benchmark] {name} x{iterations}...", flush=True)
+        results["operations"][name] = run_operation(name, operations[name], iterations, backend, not args.verbose)
+    results["throttled_by_fake_server"] = backend.throttled
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
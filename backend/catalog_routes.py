@@ -3,10 +3,11 @@ Catalog API Routes
 Handles HTTP requests for service catalog management
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import catalog_service
+import http_cache
 
 router = APIRouter(prefix="/api/catalog", tags=["catalog"])
 
@@ -21,6 +22,37 @@ class CatalogItemUpdate(BaseModel):
     price: float
 
 
+class CatalogImportItem(BaseModel):
+    id: Optional[int] = None
+    name: str
+    price: float
+
+
+class CatalogImport(BaseModel):
+    items: List[CatalogImportItem]
+
+
+@router.get("")
+async def get_all_catalog_items(request: Request):
+    """Get services, packages and products in one response"""
+    version = http_cache.dataset_version(spreadsheets=[catalog_service.CRM_ADMISSION_SHEET_ID], topics=["catalog"])
+    cached = http_cache.not_modified(request, version)
+    if cached is not None:
+        return cached
+    return http_cache.json_response(request, catalog_service.get_all_catalog_items(), version)
+
+
+@router.get("/search")
+async def search_catalog_items(q: str = Query(..., min_length=1), category: Optional[str] = None,
+                               limit: int = Query(10, ge=1, le=50)):
+    """Typeahead over item names (prefix matches first) for the invoice service picker"""
+    if category is not None and category not in ["services", "packages", "products"]:
+        raise HTTPException(status_code=400, detail="Invalid category. Must be 'services', 'packages', or 'products'")
+    
+    items = catalog_service.search_catalog_items(q, category, limit)
+    return {"query": q, "items": items}
+
+
 @router.get("/{category}")
 async def get_catalog_items(category: str):
     """Get all items from a category (services, packages, or products)"""
@@ -61,3 +93,15 @@ async def delete_catalog_item(category: str, item_id: int):
     
     result = catalog_service.delete_catalog_item(category, item_id)
     return result
+
+
+@router.post("/{category}/import")
+async def import_catalog_items(category: str, payload: CatalogImport):
+    """Bulk import/upsert a price list: existing items (by ID, else by name) are updated, the rest added"""
+    if category not in ["services", "packages", "products"]:
+        raise HTTPException(status_code=400, detail="Invalid category. Must be 'services', 'packages', or 'products'")
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="No items to import")
+    
+    items = [{"id": item.id, "name": item.name, "price": item.price} for item in payload.items]
+    return catalog_service.import_catalog_items(category, items)
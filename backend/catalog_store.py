@@ -0,0 +1,522 @@
+"""
+Catalog Store Module
+Keeps the Services, Packages and Products worksheets in memory with an ID -> row index, a persistent cross-worker ID sequence, batched price-list upserts and a typeahead search over item names
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import gspread
+
+import change_feed
+import instrumentation
+import live_updates
+from client_repository import normalize_name
+
+# Configuration
+CATALOG_DB_PATH = os.getenv("CATALOG_DB_PATH", "catalog_store.db")
+# Reload the worksheets at most this often. Writes made through the store keep it current
+# in between; direct sheet edits reach every worker through the "catalog" live-update topic
+CATALOG_TTL_SECONDS = int(os.getenv("CATALOG_TTL_SECONDS", "300"))
+
+CATALOG_HEADERS = ["ID", "Name", "Price"]
+
+# last_id only moves forward, so an ID is never handed out twice, even after the item
+# with the highest ID is deleted or while another worker's append is not loaded yet
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS id_sequences (
+    category TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_UPDATED_ROW = re.compile(r"![A-Z]+(\d+)")
+
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(CATALOG_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_db() -> None:
+    """Create the ID sequence table (idempotent)."""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _initialized = True
+
+
+def reserve_ids(category: str, count: int, floor: int = 0) -> List[int]:
+    """
+    Reserve `count` consecutive IDs for a category, across workers.
+
+    Args:
+        category: Catalog category (services, packages, products)
+        count: Number of IDs to hand out
+        floor: Highest ID known to exist (e.g. in the sheet); IDs start above it
+
+    Returns:
+        The reserved IDs in ascending order
+    """
+    init_db()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT last_id FROM id_sequences WHERE category = ?", (category,)).fetchone()
+        last_id = max(row[0] if row else 0, floor)
+        conn.execute(
+            "INSERT INTO id_sequences (category, last_id) VALUES (?, ?) "
+            "ON CONFLICT(category) DO UPDATE SET last_id = excluded.last_id",
+            (category, last_id + count),
+        )
+        conn.execute("COMMIT")
+        return list(range(last_id + 1, last_id + count + 1))
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _parse_id(value: Any) -> int:
+    value = str(value or "").strip()
+    return int(value) if value.isdigit() else 0
+
+
+def _parse_price(value: Any) -> float:
+    try:
+        return float(str(value).replace(",", "")) if str(value or "").strip() else 0
+    except ValueError:
+        return 0
+
+
+class _Category:
+    """Rows of one catalog worksheet; rows[i] is sheet row i + 2."""
+
+    def __init__(self, name: str, title: str):
+        self.name = name
+        self.title = title
+        self.worksheet: Optional[gspread.Worksheet] = None
+        self.columns: Dict[str, int] = {}
+        self.rows: List[List[str]] = []
+        self.positions: Dict[int, int] = {}
+
+    def load(self, worksheet: gspread.Worksheet, values: List[List[Any]]) -> None:
+        headers = [str(h).strip().lower() for h in values[0]] if values else [h.lower() for h in CATALOG_HEADERS]
+        self.worksheet = worksheet
+        self.columns = {}
+        for idx, header in enumerate(headers):
+            if header:
+                self.columns.setdefault(header, idx)
+        self.rows = [[str(v) for v in row] for row in values[1:]]
+        self.reindex()
+
+    def reindex(self) -> None:
+        positions: Dict[int, int] = {}
+        for pos, row in enumerate(self.rows):
+            item_id = _parse_id(self.cell(row, "id"))
+            if item_id and item_id not in positions:
+                positions[item_id] = pos
+        self.positions = positions
+
+    def col(self, header: str) -> int:
+        # Sheets without the header fall back to the default A:C layout
+        return self.columns.get(header, [h.lower() for h in CATALOG_HEADERS].index(header))
+
+    def cell(self, row: List[str], header: str) -> str:
+        col = self.col(header)
+        return row[col] if col < len(row) else ""
+
+    def item(self, row: List[str]) -> Dict[str, Any]:
+        return {
+            "id": _parse_id(self.cell(row, "id")),
+            "name": self.cell(row, "name"),
+            "price": _parse_price(self.cell(row, "price")),
+        }
+
+    def max_id(self) -> int:
+        return max(self.positions, default=0)
+
+    def row_values(self, item_id: int, name: str, price: Any) -> Tuple[int, List[Any]]:
+        """(first column, values) covering the ID, Name and Price cells of a row."""
+        cols = {self.col("id"): item_id, self.col("name"): name, self.col("price"): price}
+        first, last = min(cols), max(cols)
+        return first, [cols.get(col, "") for col in range(first, last + 1)]
+
+
+class CatalogStore:
+    def __init__(self, open_spreadsheet: Callable[[], gspread.Spreadsheet], categories: Dict[str, str], topic: str):
+        """
+        In-memory view of the catalog worksheets of one spreadsheet.
+
+        Args:
+            open_spreadsheet: Opens the spreadsheet holding the catalog tabs (called on load only)
+            categories: Category -> worksheet title, e.g. {"services": "Services"}
+            topic: live_updates topic the catalog's changes are published on
+        """
+        self.topic = topic
+        self.built_at: Optional[float] = None
+        self._open = open_spreadsheet
+        self._categories = {name: _Category(name, title) for name, title in categories.items()}
+        self._search_index: List[Tuple[str, Tuple[str, ...], str, int]] = []
+        self._seen_seq = 0
+        self._lock = threading.RLock()
+        self._stats = {"loads": 0, "hits": 0, "writes": 0, "rows_written": 0, "relocated": 0, "searches": 0}
+
+    # --- Loading ---
+
+    def _is_stale(self) -> bool:
+        if self.built_at is None:
+            return True
+        if time.monotonic() - self.built_at > change_feed.cache_ttl(CATALOG_TTL_SECONDS):
+            return True
+        return live_updates.topic_seq(self.topic) != self._seen_seq
+
+    def _ensure_fresh(self) -> None:
+        with self._lock:
+            stale = self._is_stale()
+            instrumentation.record_cache("catalog", not stale)
+            if stale:
+                self.reload()
+            else:
+                self._stats["hits"] += 1
+
+    def reload(self) -> None:
+        """Read every catalog worksheet in one batch get (creating missing tabs) and rebuild the indexes."""
+        with self._lock:
+            seq = live_updates.topic_seq(self.topic)  # Read first: a change during the load triggers another one
+            spreadsheet = self._open()
+            worksheets = {ws.title: ws for ws in spreadsheet.worksheets()}
+            for category in self._categories.values():
+                if category.title not in worksheets:
+                    worksheet = spreadsheet.add_worksheet(title=category.title, rows=1000, cols=10)
+                    worksheet.update('A1:C1', [CATALOG_HEADERS])
+                    worksheets[category.title] = worksheet
+            titles = [category.title for category in self._categories.values()]
+            response = spreadsheet.values_batch_get([f"'{title}'" for title in titles])
+            for category, value_range in zip(self._categories.values(), response.get("valueRanges", [])):
+                category.load(worksheets[category.title], value_range.get("values", []))
+            self._rebuild_search_index()
+            self.built_at = time.monotonic()
+            self._seen_seq = seq
+            self._stats["loads"] += 1
+            counts = ", ".join(f"{len(c.positions)} {c.name}" for c in self._categories.values())
+            print(f"[Catalog Store] Loaded {counts}")
+
+    def invalidate(self) -> None:
+        """Force a reload on next access."""
+        with self._lock:
+            self.built_at = None
+
+    def _category(self, name: str) -> _Category:
+        category = self._categories.get(name)
+        if category is None:
+            raise KeyError(name)
+        return category
+
+    def _rebuild_search_index(self) -> None:
+        index = []
+        for category in self._categories.values():
+            for row in category.rows:
+                item = category.item(row)
+                key = normalize_name(item["name"])
+                if key and item["id"]:
+                    index.append((key, tuple(key.split(" ")), category.name, item["id"]))
+        self._search_index = index
+
+    # --- Reads ---
+
+    def items(self, category: str) -> List[Dict[str, Any]]:
+        """Every item of a category in sheet order (blank rows skipped)."""
+        self._ensure_fresh()
+        with self._lock:
+            data = self._category(category)
+            return [data.item(row) for row in data.rows if any(row)]
+
+    def get(self, category: str, item_id: int) -> Optional[Dict[str, Any]]:
+        """Item by ID."""
+        self._ensure_fresh()
+        with self._lock:
+            data = self._category(category)
+            pos = data.positions.get(item_id)
+            return data.item(data.rows[pos]) if pos is not None else None
+
+    def search(self, query: str, categories: Optional[Iterable[str]] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Typeahead over item names: names starting with the query first, then names with a
+        word starting with it, then names containing it; shorter names first within each.
+
+        Args:
+            query: Text typed so far (case- and whitespace-insensitive)
+            categories: Limit to these categories (default all)
+            limit: Maximum number of results
+
+        Returns:
+            Items with their category, best matches first
+        """
+        self._ensure_fresh()
+        wanted = normalize_name(query)
+        with self._lock:
+            self._stats["searches"] += 1
+            allowed = set(categories) if categories else set(self._categories)
+            ranked = []
+            for key, words, category, item_id in self._search_index:
+                if category not in allowed:
+                    continue
+                if key.startswith(wanted):
+                    rank = 0
+                elif any(word.startswith(wanted) for word in words):
+                    rank = 1
+                elif wanted in key:
+                    rank = 2
+                else:
+                    continue
+                ranked.append((rank, len(key), key, category, item_id))
+            ranked.sort()
+            results = []
+            for _, _, _, category, item_id in ranked[:limit]:
+                data = self._categories[category]
+                results.append({**data.item(data.rows[data.positions[item_id]]), "category": category})
+            return results
+
+    # --- Writes ---
+
+    def _locate(self, data: _Category, item_id: int) -> int:
+        pos = data.positions.get(item_id)
+        if pos is None:
+            raise KeyError(item_id)
+        # Re-read the ID cell: rows may have moved in the sheet before the change feed reported it
+        current = data.worksheet.cell(pos + 2, data.col("id") + 1).value
+        if _parse_id(current) == item_id:
+            return pos
+        self._stats["relocated"] += 1
+        self.reload()
+        pos = data.positions.get(item_id)
+        if pos is None:
+            raise KeyError(item_id)
+        return pos
+
+    def create(self, category: str, name: str, price: Any) -> Dict[str, Any]:
+        """Append an item with the next ID from the persistent sequence."""
+        self._ensure_fresh()
+        with self._lock:
+            data = self._category(category)
+            item_id = reserve_ids(category, 1, floor=data.max_id())[0]
+            first, values = data.row_values(item_id, name, price)
+            response = data.worksheet.append_row(values, table_range=gspread.utils.rowcol_to_a1(1, first + 1))
+            self._stats["writes"] += 1
+            self._stats["rows_written"] += 1
+            match = _UPDATED_ROW.search(str((response or {}).get("updates", {}).get("updatedRange", "")))
+            row_number = int(match.group(1)) if match else None
+            if row_number is not None and 2 <= row_number <= len(data.rows) + 2:
+                row = [""] * first + [str(v) for v in values]
+                if row_number == len(data.rows) + 2:
+                    data.rows.append(row)
+                else:
+                    data.rows[row_number - 2] = row  # Sheets filled a blank row inside the table
+                data.reindex()
+                self._rebuild_search_index()
+            else:
+                self.invalidate()
+            return {"id": item_id, "name": name, "price": _parse_price(price)}
+
+    def update(self, category: str, item_id: int, name: str, price: Any) -> Dict[str, Any]:
+        """
+        Rewrite the name and price of one item in place.
+
+        Raises:
+            KeyError: When the item does not exist
+        """
+        self._ensure_fresh()
+        with self._lock:
+            data = self._category(category)
+            pos = self._locate(data, item_id)
+            first, values = data.row_values(item_id, name, price)
+            start = gspread.utils.rowcol_to_a1(pos + 2, first + 1)
+            end = gspread.utils.rowcol_to_a1(pos + 2, first + len(values))
+            data.worksheet.update(f"{start}:{end}", [values])
+            self._stats["writes"] += 1
+            self._stats["rows_written"] += 1
+            row = data.rows[pos]
+            if len(row) < first + len(values):
+                row.extend([""] * (first + len(values) - len(row)))
+            row[first:first + len(values)] = [str(v) for v in values]
+            self._rebuild_search_index()
+            return {"id": item_id, "name": name, "price": _parse_price(price)}
+
+    def delete(self, category: str, item_id: int) -> None:
+        """
+        Delete the row of one item.
+
+        Raises:
+            KeyError: When the item does not exist
+        """
+        self._ensure_fresh()
+        with self._lock:
+            data = self._category(category)
+            pos = self._locate(data, item_id)
+            data.worksheet.delete_rows(pos + 2)
+            self._stats["writes"] += 1
+            del data.rows[pos]
+            data.reindex()
+            self._rebuild_search_index()
+
+    def upsert(self, category: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Load a price list in one batched write: items matching an existing ID (or, without
+        an ID, an existing name) are updated when their name or price differs, the rest are
+        added below the last row with IDs reserved from the sequence in one go.
+
+        Args:
+            category: Catalog category
+            items: [{"id" (optional), "name", "price"}, ...]
+
+        Returns:
+            {"created", "updated", "unchanged", "items"} with the stored items in input order
+        """
+        with self._lock:
+            self.reload()  # Place new rows on the sheet's current state
+            data = self._category(category)
+            by_name = {}
+            for pos, row in enumerate(data.rows):
+                by_name.setdefault(normalize_name(data.cell(row, "name")), pos)
+
+            updates: Dict[int, Tuple[str, Any]] = {}
+            new_items: List[Tuple[int, str, Any]] = []
+            results: List[Tuple[str, Any]] = []
+            unchanged = 0
+            for index, item in enumerate(items):
+                name = str(item.get("name", "")).strip()
+                price = item.get("price", 0)
+                pos = data.positions.get(_parse_id(item.get("id"))) if item.get("id") else None
+                if pos is None:
+                    pos = by_name.get(normalize_name(name))
+                if pos is None:
+                    new_items.append((index, name, price))
+                    results.append(("new", index))
+                    continue
+                current = data.item(data.rows[pos])
+                if current["name"] == name and current["price"] == _parse_price(price):
+                    unchanged += 1
+                else:
+                    updates[pos] = (name, price)
+                results.append(("row", pos))
+
+            ids = reserve_ids(category, len(new_items), floor=data.max_id()) if new_items else []
+            new_rows = {}
+            next_row = len(data.rows) + 2
+            while next_row > 2 and not any(data.rows[next_row - 3]):
+                next_row -= 1  # Fill trailing blank rows first, as an append would
+            batch = []
+            for pos, (name, price) in updates.items():
+                first, values = data.row_values(_parse_id(data.cell(data.rows[pos], "id")), name, price)
+                batch.append((pos + 2, first, values))
+            for item_id, (index, name, price) in zip(ids, new_items):
+                first, values = data.row_values(item_id, name, price)
+                batch.append((next_row, first, values))
+                new_rows[index] = next_row - 2
+                next_row += 1
+
+            if batch:
+                if next_row - 1 > data.worksheet.row_count:
+                    data.worksheet.add_rows(next_row - 1 - data.worksheet.row_count)
+                data.worksheet.batch_update([
+                    {
+                        "range": f"{gspread.utils.rowcol_to_a1(row_number, first + 1)}:"
+                                 f"{gspread.utils.rowcol_to_a1(row_number, first + len(values))}",
+                        "values": [values],
+                    }
+                    for row_number, first, values in batch
+                ], value_input_option="USER_ENTERED")
+                self._stats["writes"] += 1
+                self._stats["rows_written"] += len(batch)
+                for row_number, first, values in batch:
+                    while len(data.rows) < row_number - 1:
+                        data.rows.append([])
+                    row = data.rows[row_number - 2]
+                    if len(row) < first + len(values):
+                        row.extend([""] * (first + len(values) - len(row)))
+                    row[first:first + len(values)] = [str(v) for v in values]
+                data.reindex()
+                self._rebuild_search_index()
+
+            stored = []
+            for kind, ref in results:
+                pos = new_rows[ref] if kind == "new" else ref
+                stored.append(data.item(data.rows[pos]))
+            print(f"[Catalog Store] Imported {len(items)} {category}: {len(new_items)} new, {len(updates)} updated")
+            return {"created": len(new_items), "updated": len(updates), "unchanged": unchanged, "items": stored}
+
+    def publish(self, event_type: str, key: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """
+        Publish a catalog change to the live-update topic.
+
+        The store already holds the change, so its own event does not force a reload
+        here; any other event published on the topic in between still does.
+        """
+        seq = live_updates.publish(self.topic, event_type, key, data)
+        with self._lock:
+            if seq and self.built_at is not None and live_updates.topic_seq(self.topic, below=seq) == self._seen_seq:
+                self._seen_seq = seq
+        return seq
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": self.built_at is not None,
+                "age_seconds": round(time.monotonic() - self.built_at, 1) if self.built_at is not None else None,
+                "items": {c.name: len(c.positions) for c in self._categories.values()},
+                "topic_seq": self._seen_seq,
+                **self._stats,
+            }
+
+
+# Global store registry keyed by topic
+_stores: Dict[str, CatalogStore] = {}
+_registry_lock = threading.Lock()
+
+
+def register(open_spreadsheet: Callable[[], gspread.Spreadsheet], categories: Dict[str, str], topic: str) -> CatalogStore:
+    """Create (or return the existing) store for the catalog worksheets published on `topic`."""
+    with _registry_lock:
+        store = _stores.get(topic)
+        if store is None:
+            store = CatalogStore(open_spreadsheet, categories, topic)
+            _stores[topic] = store
+        return store
+
+
+def status() -> Dict[str, Any]:
+    """Per-store item counts, load/hit counters and write counters for this worker."""
+    with _registry_lock:
+        stores = list(_stores.items())
+    return {topic: store.stats() for topic, store in stores}
+
+
+def _prometheus_lines() -> List[str]:
+    stats = status()
+    return instrumentation.gauge_lines(
+        "crm_catalog_items", "Catalog items held in memory by this worker",
+        [({"category": category}, count) for s in stats.values() for category, count in s["items"].items()],
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
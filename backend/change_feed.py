@@ -0,0 +1,507 @@
+"""
+Change Feed Module
+Detects edits made directly in Google Sheets with cheap polls (Drive modifiedTime, then row count and last-row hash per worksheet) and emits targeted invalidation events, carrying the new rows when a sheet only grew
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+from gspread.urls import SPREADSHEET_URL, SPREADSHEET_VALUES_BATCH_URL
+
+import instrumentation
+import job_runner
+import shared_cache
+import sheets_scheduler
+
+# Configuration
+POLL_SECONDS = int(os.getenv("CHANGE_FEED_POLL_SECONDS", "30"))  # 0 disables the feed
+BACKSTOP_TTL_SECONDS = int(os.getenv("CHANGE_FEED_BACKSTOP_TTL_SECONDS", "1800"))  # Cache TTL while the feed is healthy
+MAX_TAIL_ROWS = int(os.getenv("CHANGE_FEED_MAX_TAIL_ROWS", "500"))  # Bigger growth is reported as "updated"
+EVENT_LIMIT = 200  # Recent events kept for other workers (and GET /changes)
+STATE_TTL_SECONDS = 7 * 86400
+APP_WRITE_SLACK_SECONDS = 2.0  # Clock difference tolerated between this host and Drive's modifiedTime
+
+LEASE = "change_feed"  # job_runner lease: one worker polls, the others replay its events
+SHARED_NAMESPACE = "change_feed"  # Entries: "state" (fingerprints), "events" and "app_write|..." times
+SIGNAL_NAMESPACE = "change_feed_signal"  # Bumped after each batch of events
+
+# (spreadsheet_id, worksheet title) -> {"namespaces": [...], "full_hash": bool}
+_watched: Dict[Tuple[str, str], Dict[str, Any]] = {}
+# (listener, every_worker)
+_listeners: List[Tuple[Callable[[Dict[str, Any]], None], bool]] = []
+_lock = threading.RLock()
+_last_seq = 0
+_is_poller = False
+_stats = {"polls": 0, "unmodified": 0, "events": 0, "errors": 0, "reads": 0, "replayed": 0}
+
+# Global scheduler instance for the poll
+scheduler = None
+
+
+def watch_worksheet(spreadsheet_id: Optional[str], worksheet: str, namespaces: Optional[List[str]] = None,
+                    full_hash: bool = False) -> None:
+    """
+    Watch a worksheet for edits made outside the app.
+
+    Args:
+        spreadsheet_id: Spreadsheet key (ignored when not configured)
+        worksheet: Worksheet title
+        namespaces: shared_cache namespaces invalidated on any change to the worksheet
+        full_hash: Hash the whole worksheet instead of row count + first column + last row;
+                   exact for small lookup tabs (logins, dropdown options)
+    """
+    if not spreadsheet_id:
+        return
+    with _lock:
+        entry = _watched.setdefault((spreadsheet_id, worksheet), {"namespaces": [], "full_hash": False})
+        for namespace in namespaces or []:
+            if namespace not in entry["namespaces"]:
+                entry["namespaces"].append(namespace)
+        entry["full_hash"] = entry["full_hash"] or full_hash
+
+
+def subscribe(listener: Callable[[Dict[str, Any]], None], every_worker: bool = False) -> None:
+    """
+    Register a change listener.
+
+    Args:
+        listener: Called with an event dict: "type" is "appended" (with "headers", "first_row"
+                  and the new "rows") or "updated" (anything else: edits, deletes, header changes)
+        every_worker: Also run in workers that did not poll (for per-process state such as the
+                      follow-up index); otherwise only the polling worker calls it, which suits
+                      listeners that update shared_cache entries
+    """
+    with _lock:
+        if all(existing is not listener for existing, _ in _listeners):
+            _listeners.append((listener, every_worker))
+
+
+def note_app_write(spreadsheet_id: str, worksheets: Optional[List[str]], append: bool) -> None:
+    """
+    Record a write made by this app (any worker) so the poll can tell its revisions from
+    edits made directly in Sheets. Registered as a sheets_scheduler write listener.
+
+    Args:
+        spreadsheet_id: Spreadsheet key
+        worksheets: Worksheet titles written, or None when the write may touch any tab
+        append: True for values appends (rows added after the last row)
+    """
+    if not any(sid == spreadsheet_id for sid, _ in list(_watched)):
+        return
+    kind = "append" if append else "update"
+    now = time.time()
+    for ws in worksheets or ["*"]:
+        # One entry per tab and kind, so concurrent workers never overwrite each other's writes
+        shared_cache.set(SHARED_NAMESPACE, f"app_write|{spreadsheet_id}|{ws}|{kind}", now, STATE_TTL_SECONDS)
+
+
+def _app_writes(spreadsheet_id: str, worksheets: List[str], since: float) -> Tuple[Optional[float], set]:
+    """Latest app write to the spreadsheet since `since`, and the tabs the app updated in place."""
+    latest = None
+    updated = set()
+    for ws in worksheets + ["*"]:
+        for kind in ("append", "update"):
+            at = shared_cache.get(SHARED_NAMESPACE, f"app_write|{spreadsheet_id}|{ws}|{kind}")
+            if at is None or at < since:
+                continue
+            latest = max(latest or at, at)
+            if kind == "update":
+                updated.add(ws)
+    if "*" in updated:
+        updated.update(worksheets)
+    return latest, updated
+
+
+def _epoch(modified_time: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(modified_time.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def _emit(event: Dict[str, Any], local: bool) -> None:
+    for listener, every_worker in list(_listeners):
+        if not local and not every_worker:
+            continue
+        try:
+            listener(event)
+        except Exception as e:
+            print(f"[Change Feed] Listener error for {event.get('worksheet')}: {e}")
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _quote(worksheet: str) -> str:
+    return "'" + worksheet.replace("'", "''") + "'"
+
+
+def _batch_get(client, spreadsheet_id: str, ranges: List[str]) -> List[List[List[str]]]:
+    """One values:batchGet call; returns the values of each range in order."""
+    if not ranges:
+        return []
+    _stats["reads"] += 1
+    response = client.request("get", SPREADSHEET_VALUES_BATCH_URL % spreadsheet_id, params={"ranges": ranges})
+    return [vr.get("values", []) for vr in response.json().get("valueRanges", [])]
+
+
+def _titles(client, spreadsheet_id: str) -> List[str]:
+    """Worksheet titles of a spreadsheet (one metadata call)."""
+    _stats["reads"] += 1
+    response = client.request("get", SPREADSHEET_URL % spreadsheet_id, params={"fields": "sheets.properties.title"})
+    return [s["properties"]["title"] for s in response.json().get("sheets", [])]
+
+
+def _load_state() -> Dict[str, Any]:
+    state = shared_cache.get(SHARED_NAMESPACE, "state") or {}
+    state.setdefault("modified", {})
+    state.setdefault("sheets", {})
+    state.setdefault("titles", {})
+    state.setdefault("checked", {})
+    state.setdefault("seq", 0)
+    return state
+
+
+def _event(event_type: str, spreadsheet_id: str, worksheet: str, row_count: int, **extra: Any) -> Dict[str, Any]:
+    return {
+        "type": event_type,
+        "spreadsheet_id": spreadsheet_id,
+        "worksheet": worksheet,
+        "row_count": row_count,
+        "at": datetime.now().isoformat(),
+        **extra,
+    }
+
+
+def _poll_spreadsheet(client, spreadsheet_id: str, worksheets: List[Tuple[str, Dict[str, Any]]],
+                      state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Compare the watched worksheets of one spreadsheet against their last fingerprints.
+    Costs one Drive call when nothing changed, otherwise two ranged batch reads.
+    """
+    keys = {ws: f"{spreadsheet_id}|{ws}" for ws, _ in worksheets}
+    checked_at = time.time()  # App writes recorded before this are part of the modifiedTime read next
+    try:
+        modified = client.get_file_drive_metadata(spreadsheet_id).get("modifiedTime") or None
+    except Exception as e:
+        print(f"[Change Feed] Drive modifiedTime unavailable for {spreadsheet_id}: {e}")
+        modified = None
+    known = state["modified"].get(spreadsheet_id)
+    present = state["titles"].get(spreadsheet_id) or []
+    if modified and modified == known and all(keys[ws] in state["sheets"] for ws, _ in worksheets if ws in present):
+        _stats["unmodified"] += 1
+        state["checked"][spreadsheet_id] = checked_at
+        return []
+
+    # A missing tab would fail the whole batch read: check titles until every watched tab exists
+    titles = state["titles"].get(spreadsheet_id)
+    if titles is None or any(ws not in titles for ws, _ in worksheets):
+        titles = state["titles"][spreadsheet_id] = _titles(client, spreadsheet_id)
+    worksheets = [(ws, opts) for ws, opts in worksheets if ws in titles]
+
+    # Pass 1: header row and first column (row count, inserts/deletes) or the whole small tab
+    ranges = []
+    for ws, opts in worksheets:
+        ranges += [_quote(ws)] if opts["full_hash"] else [f"{_quote(ws)}!1:1", f"{_quote(ws)}!A:A"]
+    values = iter(_batch_get(client, spreadsheet_id, ranges))
+
+    events: List[Dict[str, Any]] = []
+    pending = []  # (ws, headers, old fingerprint, new fingerprint, tail_from) awaiting pass 2
+    for ws, opts in worksheets:
+        old = state["sheets"].get(keys[ws])
+        if opts["full_hash"]:
+            rows = next(values)
+            fingerprint = {"rows": len(rows), "hash": _digest(rows)}
+            if old is not None and old != fingerprint:
+                events.append(_event("updated", spreadsheet_id, ws, len(rows)))
+            state["sheets"][keys[ws]] = fingerprint
+            continue
+
+        header_rows, column = next(values), next(values)
+        headers = header_rows[0] if header_rows else []
+        first_cells = [r[0] if r else "" for r in column]
+        fingerprint = {
+            "rows": len(first_cells),
+            "header": _digest(headers),
+            "keys": _digest(first_cells),
+            "last": None,
+        }
+        tail_from = None
+        if (old is not None and fingerprint["header"] == old["header"]
+                and old["rows"] < fingerprint["rows"] <= old["rows"] + MAX_TAIL_ROWS
+                and _digest(first_cells[:old["rows"]]) == old["keys"]):
+            tail_from = max(old["rows"], 1)  # Re-read the old last row to prove it is unchanged
+        pending.append((ws, headers, old, fingerprint, tail_from))
+
+    # Pass 2: appended tail (with the old last row) or just the last row
+    ranges = []
+    for ws, _, _, fingerprint, tail_from in pending:
+        if fingerprint["rows"]:
+            start = tail_from or fingerprint["rows"]
+            ranges.append(f"{_quote(ws)}!{start}:{fingerprint['rows']}")
+    results = iter(_batch_get(client, spreadsheet_id, ranges))
+
+    # Drive only says the spreadsheet changed, not which tab or by whom. When every write since the
+    # last poll came from this app, the fingerprints are trusted for the tabs it only appended to;
+    # a tab it updated in place is reported as updated. Any other revision is an edit made in Sheets
+    # that may sit above a tab's last row, so every large tab is treated as changed, including one
+    # that also grew. (An edit in Sheets followed by an app write in the same window is attributed
+    # to the app and waits for the backstop TTL.)
+    revised = bool(modified and known and modified != known)
+    foreign, app_updated = False, set()
+    if revised:
+        modified_at = _epoch(modified)
+        since = state["checked"].get(spreadsheet_id) or 0
+        last_app_write, app_updated = _app_writes(spreadsheet_id, [ws for ws, _ in worksheets], since)
+        foreign = (last_app_write is None or modified_at is None
+                   or modified_at > last_app_write + APP_WRITE_SLACK_SECONDS)
+    suspect = set(keys) if foreign else app_updated
+    reason = "revision" if foreign else "app_write"
+
+    for ws, headers, old, fingerprint, tail_from in pending:
+        rows = next(results) if fingerprint["rows"] else []
+        if fingerprint["rows"]:
+            # The API trims trailing empty rows; pad so positions line up with row numbers
+            expected = fingerprint["rows"] - (tail_from or fingerprint["rows"]) + 1
+            rows = rows + [[] for _ in range(expected - len(rows))]
+            fingerprint["last"] = _digest(rows[-1])
+        state["sheets"][keys[ws]] = fingerprint
+        if old is None:
+            continue  # First sighting only records the baseline
+
+        if ws in suspect:
+            events.append(_event("updated", spreadsheet_id, ws, fingerprint["rows"], reason=reason))
+        elif tail_from is not None and _digest(rows[0]) == old["last"]:
+            events.append(_event(
+                "appended", spreadsheet_id, ws, fingerprint["rows"],
+                headers=headers, first_row=old["rows"] + 1, rows=rows[1:],
+            ))
+        elif fingerprint != old:
+            events.append(_event("updated", spreadsheet_id, ws, fingerprint["rows"]))
+
+    if modified:
+        state["modified"][spreadsheet_id] = modified
+        state["checked"][spreadsheet_id] = checked_at
+    state["revisions"] = bool(modified)
+    return events
+
+
+def poll_once(client=None) -> List[Dict[str, Any]]:
+    """
+    Poll every watched worksheet once and publish the resulting events.
+
+    Args:
+        client: gspread client (default: the service account in the batch lane)
+
+    Returns:
+        The events emitted by this poll
+    """
+    if client is None:
+        from leads_sheet import authorize
+        client = authorize(lane="batch")
+
+    with _lock:
+        by_spreadsheet: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for (spreadsheet_id, ws), opts in _watched.items():
+            by_spreadsheet.setdefault(spreadsheet_id, []).append((ws, dict(opts)))
+
+    _replay()  # Catch up on events from a previous poller before publishing new ones
+    _stats["polls"] += 1
+    state = _load_state()
+    events: List[Dict[str, Any]] = []
+    failed = False
+    for spreadsheet_id, worksheets in by_spreadsheet.items():
+        try:
+            events += _poll_spreadsheet(client, spreadsheet_id, worksheets, state)
+        except Exception as e:
+            failed = True
+            _stats["errors"] += 1
+            print(f"[Change Feed] Poll failed for {spreadsheet_id}: {e}")
+    if not failed:
+        state["last_ok_at"] = time.time()
+    _publish(events, state)
+    return events
+
+
+def _publish(events: List[Dict[str, Any]], state: Dict[str, Any]) -> None:
+    global _last_seq
+
+    for event in events:
+        state["seq"] += 1
+        event["seq"] = state["seq"]
+    if events:
+        log = shared_cache.get(SHARED_NAMESPACE, "events") or []
+        shared_cache.set(SHARED_NAMESPACE, "events", (log + events)[-EVENT_LIMIT:], STATE_TTL_SECONDS)
+    shared_cache.set(SHARED_NAMESPACE, "state", state, STATE_TTL_SECONDS)
+    if not events:
+        return
+
+    _stats["events"] += len(events)
+    for event in events:
+        extra = f" (+{len(event['rows'])} rows)" if event["type"] == "appended" else ""
+        print(f"[Change Feed] {event['worksheet']}: {event['type']}{extra}")
+        opts = _watched.get((event["spreadsheet_id"], event["worksheet"]), {})
+        for namespace in opts.get("namespaces", []):
+            shared_cache.invalidate(namespace)
+        _emit(event, local=True)
+    _last_seq = events[-1]["seq"]
+    shared_cache.invalidate(SIGNAL_NAMESPACE)
+
+
+def _replay(generation: int = 0) -> None:
+    """Run every-worker listeners for events another worker polled."""
+    global _last_seq
+
+    log = shared_cache.get(SHARED_NAMESPACE, "events") or []
+    fresh = [e for e in log if e["seq"] > _last_seq]
+    if not fresh:
+        return
+    if fresh[0]["seq"] > _last_seq + 1:
+        # Missed events fell out of the log: treat every watched worksheet as changed
+        with _lock:
+            watched = list(_watched)
+        fresh = [_event("updated", sid, ws, 0, seq=fresh[0]["seq"] - 1) for sid, ws in watched] + fresh
+    for event in fresh:
+        _emit(event, local=False)
+    _stats["replayed"] += len(fresh)
+    _last_seq = fresh[-1]["seq"]
+
+
+def events_since(seq: int = 0, limit: int = 100) -> Dict[str, Any]:
+    """
+    Recent change events after `seq` (tail rows omitted).
+
+    Returns:
+        {"seq": latest sequence number, "events": [...]}
+    """
+    log = shared_cache.get(SHARED_NAMESPACE, "events") or []
+    state = shared_cache.get(SHARED_NAMESPACE, "state") or {}
+    events = [
+        {k: (len(v) if k == "rows" else v) for k, v in e.items() if k != "headers"}
+        for e in log if e["seq"] > seq
+    ][:limit]
+    return {"seq": state.get("seq", 0), "events": events}
+
+
+def is_healthy() -> bool:
+    """True while some worker polled successfully recently with Drive revisions available."""
+    state = shared_cache.get(SHARED_NAMESPACE, "state")
+    if not state or not state.get("revisions") or POLL_SECONDS <= 0:
+        return False
+    return time.time() - state.get("last_ok_at", 0) <= POLL_SECONDS * 3
+
+
+def revision(spreadsheet_id: Optional[str]) -> Optional[str]:
+    """
+    Drive modifiedTime of a watched spreadsheet as of the last poll, used as a dataset
+    version (HTTP ETags). None when the spreadsheet is not watched or the feed is unhealthy.
+    """
+    if not spreadsheet_id or not is_healthy():
+        return None
+    state = shared_cache.get(SHARED_NAMESPACE, "state") or {}
+    return (state.get("modified") or {}).get(spreadsheet_id)
+
+
+def cache_ttl(default_seconds: float) -> float:
+    """
+    TTL for caches of watched worksheets: the change feed invalidates them on edits,
+    so while it is healthy the TTL is only a backstop.
+    """
+    return max(default_seconds, BACKSTOP_TTL_SECONDS) if is_healthy() else default_seconds
+
+
+def _tick() -> None:
+    global _is_poller
+    from leads_sheet import CREDENTIALS_FILE
+
+    if not os.path.exists(CREDENTIALS_FILE):
+        return
+    _is_poller = job_runner.acquire_lease(LEASE, max(POLL_SECONDS * 3, 60))
+    if _is_poller:
+        poll_once()
+
+
+def start() -> None:
+    """Start polling (in the worker holding the lease) and replaying events (in every worker)."""
+    global scheduler, _last_seq
+
+    if POLL_SECONDS <= 0 or scheduler is not None or not _watched:
+        return
+    try:
+        _last_seq = _load_state()["seq"]
+        shared_cache.watch(SIGNAL_NAMESPACE, _replay)
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(
+            _tick,
+            trigger=IntervalTrigger(seconds=POLL_SECONDS),
+            id='change_feed_poll',
+            name='Change Feed Poll',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        scheduler.start()
+        print(f"[Change Feed] Started (every {POLL_SECONDS}s, {len(_watched)} worksheets)")
+    except Exception as e:
+        print(f"[Change Feed] Failed to start: {e}")
+        scheduler = None
+
+
+def stop() -> None:
+    global scheduler, _is_poller
+
+    if scheduler is None:
+        return
+    try:
+        scheduler.shutdown(wait=False)
+    finally:
+        scheduler = None
+    job_runner.release_lease(LEASE)
+    _is_poller = False
+
+
+def status() -> Dict[str, Any]:
+    """Watched worksheets with their fingerprints, poll health and this worker's counters."""
+    state = shared_cache.get(SHARED_NAMESPACE, "state") or {}
+    with _lock:
+        watched = [
+            {
+                "spreadsheet_id": sid,
+                "worksheet": ws,
+                "namespaces": opts["namespaces"],
+                "full_hash": opts["full_hash"],
+                "rows": (state.get("sheets", {}).get(f"{sid}|{ws}") or {}).get("rows"),
+            }
+            for (sid, ws), opts in _watched.items()
+        ]
+    last_ok = state.get("last_ok_at")
+    return {
+        "running": scheduler is not None,
+        "poll_seconds": POLL_SECONDS,
+        "is_poller": _is_poller,
+        "healthy": is_healthy(),
+        "drive_revisions": bool(state.get("revisions")),
+        "last_poll_ok": datetime.fromtimestamp(last_ok).isoformat() if last_ok else None,
+        "seq": state.get("seq", 0),
+        "watched": watched,
+        "stats": dict(_stats),
+    }
+
+
+def _prometheus_lines() -> List[str]:
+    return (
+        instrumentation.gauge_lines("crm_change_feed_events", "Change events emitted by this worker's polls", [({}, _stats["events"])])
+        + instrumentation.gauge_lines("crm_change_feed_healthy", "1 while the change feed polls successfully", [({}, 1 if is_healthy() else 0)])
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
+sheets_scheduler.on_write(note_app_write)
@@ -0,0 +1,209 @@
+"""
+Chat Query API Routes
+Rule-based CRM assistant answering follow-up and patient count questions
+"""
+
+import os
+from datetime import datetime
+from typing import AsyncIterator, Dict, Any, List, Optional
+
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+import followup_index
+from header_resolver import compile_headers
+from leads_sheet import CREDENTIALS_FILE, authorize, ensure_google_sheet
+from sse_stream import format_sse, format_sse_comment, sse_response
+
+router = APIRouter(tags=["chat"])
+
+
+class ChatQueryRequest(BaseModel):
+    query: str
+    filter: Optional[str] = "today"
+    stream: bool = False
+
+
+def load_chat_query_records(filter_type: str) -> Dict[str, Any]:
+    """
+    Read Sheet1 and keep the records matching the chat filter (today/this_week/overdue/all).
+    Returns {"headers": [...], "records": [...]} or {"answer": "..."} when no data is available.
+    """
+    # Get data from Google Sheets for context
+    if not os.path.exists(CREDENTIALS_FILE):
+        return {"answer": "I'm having trouble accessing the database. Please check the credentials configuration."}
+    
+    client = authorize()
+    spreadsheet = ensure_google_sheet(client)
+    sheet = spreadsheet.sheet1
+
+    if filter_type == "overdue":
+        # Overdue follow-up/reminder dates come straight from the follow-up index, which the
+        # change feed keeps current: the sheet is only read when the index needs a rebuild
+        followups = followup_index.get_followup_index(sheet.title, sheet.get_all_values)
+        if not followups.stats()["rows"]:
+            return {"answer": "No patient data found in the system yet."}
+        overdue_rows = followups.row_numbers(followups.overdue(include_reminders=True))
+        return {"headers": followups.headers, "records": [followups.row_dict(n) for n in overdue_rows]}
+
+    values = sheet.get_all_values()
+    
+    if not values or len(values) < 2:
+        return {"answer": "No patient data found in the system yet."}
+    
+    headers = values[0]
+    rows = values[1:]
+    
+    # Convert to list of dicts
+    records = []
+    for row in rows:
+        record = {headers[i]: (row[i] if i < len(row) else "") for i in range(len(headers))}
+        records.append(record)
+    
+    today = datetime.now().date()
+    
+    # Filter records based on filter_type
+    def parse_date(date_str):
+        if not date_str:
+            return None
+        for fmt in ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y"]:
+            try:
+                return datetime.strptime(date_str.strip(), fmt).date()
+            except:
+                continue
+        return None
+    
+    # Find date column
+    date_col = None
+    for h in headers:
+        if "date" in h.lower() and "reminder" not in h.lower() and "follow" not in h.lower():
+            date_col = h
+            break
+    if not date_col and headers:
+        date_col = headers[0]  # fallback to first column
+    
+    filtered_records = []
+    for rec in records:
+        rec_date = parse_date(rec.get(date_col, ""))
+        if filter_type == "today":
+            if rec_date == today:
+                filtered_records.append(rec)
+        elif filter_type == "this_week":
+            if rec_date and (today - rec_date).days <= 7 and rec_date <= today:
+                filtered_records.append(rec)
+        else:  # "all" or empty
+            filtered_records.append(rec)
+
+    return {"headers": headers, "records": filtered_records}
+
+
+def answer_chat_query(query_lower: str, filter_type: str, headers: List[str], filtered_records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the rule-based chat answer for already filtered records."""
+    # Process common queries
+    if "follow" in query_lower or "today" in query_lower:
+        count = len(filtered_records)
+        if count == 0:
+            return {"answer": f"No follow-ups scheduled for {filter_type.replace('_', ' ')}."}
+        
+        # Get patient names if available
+        name_col = None
+        for h in headers:
+            if "patient" in h.lower() and "name" in h.lower():
+                name_col = h
+                break
+        
+        if name_col and count <= 5:
+            names = [rec.get(name_col, "Unknown") for rec in filtered_records[:5]]
+            return {"answer": f"You have {count} follow-up(s) for {filter_type.replace('_', ' ')}:\n" + "\n".join(f"• {n}" for n in names)}
+        else:
+            return {"answer": f"You have {count} follow-up(s) scheduled for {filter_type.replace('_', ' ')}."}
+    
+    elif "count" in query_lower or "how many" in query_lower:
+        return {"answer": f"There are {len(filtered_records)} records for {filter_type.replace('_', ' ')}."}
+    
+    elif "patient" in query_lower:
+        count = len(filtered_records)
+        return {"answer": f"Found {count} patient record(s) matching your criteria."}
+    
+    elif "status" in query_lower:
+        # Try to find status column
+        status_col = None
+        for h in headers:
+            if "status" in h.lower():
+                status_col = h
+                break
+        
+        if status_col:
+            statuses = {}
+            for rec in filtered_records:
+                s = rec.get(status_col, "Unknown") or "Unknown"
+                statuses[s] = statuses.get(s, 0) + 1
+            
+            status_summary = "\n".join(f"• {k}: {v}" for k, v in statuses.items())
+            return {"answer": f"Status breakdown:\n{status_summary}"}
+        else:
+            return {"answer": "No status information available."}
+    
+    elif "help" in query_lower:
+        return {"answer": "I can help you with:\n• Follow-ups today/this week\n• Patient counts\n• Status summaries\n• Overdue reminders\n\nTry asking: 'Follow ups today?' or 'How many patients this week?'"}
+    
+    else:
+        # Generic response
+        count = len(filtered_records)
+        return {"answer": f"I found {count} records for {filter_type.replace('_', ' ')}. Try asking about follow-ups, patient counts, or status summaries."}
+
+
+async def chat_query_events(request: ChatQueryRequest) -> AsyncIterator[str]:
+    """SSE event stream for /chat_query: `member_ids`, then `summary` with the answer, then `done`."""
+    yield format_sse_comment("connected")
+
+    query_lower = request.query.lower().strip()
+    filter_type = request.filter or "today"
+    try:
+        loaded = await run_in_threadpool(load_chat_query_records, filter_type)
+        if "answer" in loaded:
+            yield format_sse("member_ids", {"member_ids": [], "count": 0})
+            yield format_sse("summary", {"answer": loaded["answer"]})
+            yield format_sse("done", {"count": 0})
+            return
+
+        headers, records = loaded["headers"], loaded["records"]
+        id_idx = compile_headers(headers, "chat_query").find("member", "id")
+        id_col = headers[id_idx] if id_idx is not None else None
+        member_ids = [str(rec.get(id_col, "")).strip() for rec in records if id_col and str(rec.get(id_col, "")).strip()]
+        yield format_sse("member_ids", {"member_ids": member_ids, "count": len(records)})
+
+        result = answer_chat_query(query_lower, filter_type, headers, records)
+        yield format_sse("summary", result)
+        yield format_sse("done", {"count": len(records)})
+    except Exception as e:
+        print(f"Chat query stream error: {e}")
+        yield format_sse("error", {"answer": "I encountered an error processing your request. Please try again."})
+
+
+@router.post("/chat_query")
+async def chat_query(request: ChatQueryRequest, http_request: Request):
+    """
+    AI Chat endpoint for the CRM assistant.
+    Processes natural language queries about patient data, follow-ups, etc.
+    Set "stream": true to receive Server-Sent Events (see chat_query_events).
+    """
+    if request.stream:
+        return sse_response(http_request, chat_query_events(request))
+
+    try:
+        query_lower = request.query.lower().strip()
+        filter_type = request.filter or "today"
+        
+        loaded = load_chat_query_records(filter_type)
+        if "answer" in loaded:
+            return loaded
+
+        return answer_chat_query(query_lower, filter_type, loaded["headers"], loaded["records"])
+        
+    except Exception as e:
+        print(f"Chat query error: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"answer": "I encountered an error processing your request. Please try again."}
@@ -0,0 +1,216 @@
+"""
+Exercise the analytics views (analytics_views.py, /api/analytics/*) against the in-memory
+fake Sheets backend (fake_sheets.py). Checks every endpoint against a brute-force scan of
+synthetic lead, admission and invoice sheets, times a 12-month trend next to the sheet scan
+it replaces, and that lead submits, admission saves, invoices and change-feed events move
+the aggregates without another sheet read.
+
+Usage: python check_analytics_views.py [--leads 50000] [--admissions 5000] [--invoices 8000]
+"""
+
+import argparse
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--leads", type=int, default=50000)
+parser.add_argument("--admissions", type=int, default=5000)
+parser.add_argument("--invoices", type=int, default=8000)
+args = parser.parse_args()
+
+fake_sheets.check_environment("crm-analytics-")
+
+
+TODAY = date.today()
+STATUSES = ["New", "Contacted", "Interested", "Converted", "Closed-Lost", "converted "]
+SOURCES = ["Walk-in", "Referral", "Website", "Call", ""]
+CENTERS = ["Center A", "Center B", "Center C"]
+AREAS = ["Adyar", "T Nagar", "Velachery", "Anna Nagar", "Tambaram"]
+LEAD_HEADERS = ["Date", "Member ID key", "Patient Name", "Patient Location", "Source", "Hospital Location",
+                "Lead Status", "Follow_1 Date"]
+ADMISSION_HEADERS = ["Timestamp", "Member ID Key", "Patient Name", "Care Center", "Check In Date", "Check Out Date"]
+INVOICE_HEADERS = ["Date", "Invoice Date", "Invoice Ref", "Member ID Key", "Patient Name", "Care Center", "Status",
+                   "Total Amount", "Service Name", "Amount"]
+
+
+def day_text(day: date, rng: random.Random) -> str:
+    return day.strftime(rng.choice(["%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y"]))
+
+
+def generate(seed: int = 3):
+    rng = random.Random(seed)
+    back = lambda: TODAY - timedelta(days=rng.randint(0, 420))  # noqa: E731
+    leads = [LEAD_HEADERS] + [
+        [day_text(back(), rng) if i % 50 else "", f"MID-2025-01-01-{100000 + i}", f"Patient {i}", rng.choice(AREAS),
+         rng.choice(SOURCES), rng.choice(CENTERS), rng.choice(STATUSES), ""]
+        for i in range(args.leads)
+    ]
+    admissions = [ADMISSION_HEADERS]
+    for i in range(args.admissions):
+        check_in = back()
+        check_out = check_in + timedelta(days=rng.randint(1, 40))
+        admissions.append(["", f"MID-2025-01-01-{100000 + i}", f"Patient {i}", rng.choice(CENTERS),
+                           day_text(check_in, rng), day_text(check_out, rng) if check_out <= TODAY else ""])
+    invoices = [INVOICE_HEADERS]
+    for i in range(args.invoices):
+        day = back()
+        amount = rng.randint(500, 20000)
+        invoices.append([day.isoformat(), day.strftime("%d-%m-%Y 10:00"), f"INV-{i}", "", f"Patient {i}",
+                         rng.choice(CENTERS), "Cancelled" if i % 40 == 0 else "Invoiced", str(amount * 2),
+                         "Nursing", str(amount) if i % 10 else ""])
+    return leads, admissions, invoices
+
+
+def scan(values, date_header, group_header=None, start=None, end=None, where=None):
+    """Brute force: rows whose date falls in start..end, counted per group."""
+    import analytics_views
+    headers = values[0]
+    date_col = headers.index(date_header)
+    group_col = headers.index(group_header) if group_header else None
+    counts = Counter()
+    for row in values[1:]:
+        day = analytics_views.parse_day(row[date_col])
+        if day is None or not start <= day <= end or (where and not where(dict(zip(headers, row)))):
+            continue
+        group = (row[group_col].strip() or "(blank)") if group_col is not None else ""
+        counts[" ".join(group.split()).casefold()] += 1
+    return counts
+
+
+def casefolded(groups, key="value", field="count"):
+    return {g[key].casefold(): g[field] for g in groups}
+
+
+if __name__ == "__main__":
+    leads, admissions, invoices = generate()
+    backend = fake_sheets.FakeSheetsBackend()
+    lead_sheet = backend.add_sheet("check-leads", "Sheet1", leads)
+    admission_sheet = backend.add_sheet("check-admission", "Sheet1", admissions)
+    invoice_sheet = backend.add_sheet("check-admission", "Invoice Table", invoices)
+    fake_sheets.install(backend)
+    import analytics_views  # noqa: E402
+    import main  # noqa: E402
+    from fastapi.testclient import TestClient  # noqa: E402
+
+    http = TestClient(main.app)
+    start, end = TODAY - timedelta(days=89), TODAY - timedelta(days=10)
+    params = {"start": start.isoformat(), "end": end.strftime("%d-%m-%Y")}
+
+    print(f"1) every endpoint matches a scan of the sheets ({args.leads} leads, {args.admissions} admissions, "
+          f"{args.invoices} invoice lines)")
+    for dimension, header in (("status", "Lead Status"), ("source", "Source"), ("care_center", "Hospital Location"),
+                              ("location", "Patient Location")):
+        response = http.get("/api/analytics/counts", params={**params, "dimension": dimension})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert casefolded(body["groups"]) == dict(scan(leads, "Date", header, start, end)), dimension
+        assert body["total"] == sum(scan(leads, "Date", None, start, end).values())
+    statuses = casefolded(http.get("/api/analytics/counts", params=params).json()["groups"])
+    assert "converted" in statuses and len(statuses) == 5, "'Converted' and 'converted ' are one group"
+
+    daily = http.get("/api/analytics/counts", params={**params, "dimension": "source", "bucket": "day"}).json()
+    walk_in = next(g for g in daily["groups"] if g["value"] == "Walk-in")
+    assert len(walk_in["daily"]) == daily["days"] == 80 and sum(walk_in["daily"]) == walk_in["count"]
+
+    converted = lambda r: r["Lead Status"].strip().lower() == "converted"  # noqa: E731
+    funnel = http.get("/api/analytics/funnel", params=params).json()
+    expected = [sum(scan(leads, "Date", None, start, end).values()),
+                sum(scan(leads, "Date", None, start, end, converted).values()),
+                sum(scan(admissions, "Check In Date", None, start, end).values())]
+    assert [s["count"] for s in funnel["stages"]] == expected, (funnel, expected)
+
+    stay = http.get("/api/analytics/length-of-stay", params=params).json()
+    parse = analytics_views.parse_day
+    stays = defaultdict(list)
+    for row in admissions[1:]:
+        check_in, check_out = parse(row[4]), parse(row[5])
+        if check_out and start <= check_out <= end:
+            stays[row[3]].append((check_out - check_in).days)
+    assert stay["stays"] == sum(len(v) for v in stays.values())
+    for center in stay["by_center"]:
+        days = stays[center["care_center"]]
+        assert abs(center["average_days"] - sum(days) / len(days)) < 0.01, center
+
+    revenue = http.get("/api/analytics/revenue").json()
+    expected_revenue = defaultdict(float)
+    rev_start, rev_end = analytics_views.last_months(12)
+    for row in invoices[1:]:
+        day = date.fromisoformat(row[0])
+        if rev_start <= day <= rev_end and row[6] != "Cancelled":
+            expected_revenue[(row[5], day.strftime("%Y-%m"))] += float(row[9] or row[7])
+    assert len(revenue["months"]) == 12
+    for center in revenue["centers"]:
+        for month, value in center["monthly"].items():
+            assert abs(value - expected_revenue[(center["care_center"], month)]) < 0.01, (center["care_center"], month)
+    print(f"   OK: {funnel['stages']}, average stay {stay['average_days']} days, "
+          f"12-month revenue {revenue['total']:,.0f}")
+
+    print("2) a 12-month trend reads daily buckets, not rows")
+    before = backend.snapshot()
+    started = time.perf_counter()
+    for metric in ("enquiries", "converted", "admissions", "discharges", "revenue"):
+        trend = http.get("/api/analytics/trends", params={"metric": metric, "months": 12}).json()
+        assert len(trend["values"]) == 12, trend
+    warm_ms = (time.perf_counter() - started) * 1000 / 5
+    assert not dict(backend.snapshot() - before), "warm views must not read the sheets"
+    started = time.perf_counter()
+    trend_start, _ = analytics_views.last_months(12)
+    scanned = Counter()
+    for row in lead_sheet.read(f"A1:H{args.leads + 1}")[1:]:
+        day = parse(row[0])
+        if day and day >= trend_start:
+            scanned[day.strftime("%Y-%m")] += 1
+    scan_ms = (time.perf_counter() - started) * 1000
+    trend = http.get("/api/analytics/trends", params={"metric": "enquiries"}).json()
+    assert trend["values"] == [scanned[m] for m in trend["months"]], (trend, scanned)
+    print(f"   OK: {warm_ms:.1f} ms per trend from the views, {scan_ms:.0f} ms to scan the lead rows")
+
+    print("3) writes move the aggregates without a sheet read")
+    today = {"start": TODAY.isoformat(), "end": TODAY.isoformat()}
+
+    def count(dimension, value):
+        groups = http.get("/api/analytics/counts", params={**today, "dimension": dimension}).json()["groups"]
+        return casefolded(groups).get(value.casefold(), 0)
+
+    def stages():
+        return [s["count"] for s in http.get("/api/analytics/funnel", params=today).json()["stages"]]
+
+    base_converted, base_new, base_funnel = count("status", "Converted"), count("status", "New"), stages()
+    member_id = "MID-2025-01-01-9990001"
+    main.upsert_to_sheet("Sheet1", {"Date": TODAY.isoformat(), "Member ID key": member_id, "Patient Name": "Fresh Lead",
+                                    "Lead Status": "New", "Source": "Website"}, strict_mode=True)
+    assert count("status", "New") == base_new + 1
+    main.upsert_to_sheet("Sheet1", {"Member ID key": member_id, "Lead Status": "Converted"}, strict_mode=True)
+    assert count("status", "New") == base_new and count("status", "Converted") == base_converted + 1
+    main.save_patient_admission_to_sheet({"Member ID Key": member_id, "Patient Name": "Fresh Lead",
+                                          "Care Center": "Center B", "Check In Date": TODAY.strftime("%d-%m-%Y")})
+    assert stages() == [base_funnel[0] + 1, base_funnel[1] + 1, base_funnel[2] + 1], (stages(), base_funnel)
+
+    import invoice_service  # noqa: E402
+    month = {"start": TODAY.replace(day=1).isoformat(), "end": TODAY.isoformat()}
+    revenue_of = lambda: casefolded(http.get("/api/analytics/revenue", params=month).json()["centers"],  # noqa: E731
+                                    "care_center", "total").get("center b", 0)
+    base_revenue = revenue_of()
+    invoice_service.create_invoice({"patient_id": member_id, "patient_name": "Fresh Lead", "care_center": "Center B",
+                                    "total_amount": 3000, "services": [
+                                        {"service_name": "Nursing", "amount": 1000},
+                                        {"service_name": "Physio", "amount": 2000}]})
+    assert abs(revenue_of() - base_revenue - 3000) < 0.01, (revenue_of(), base_revenue)
+
+    before = backend.snapshot()
+    analytics_views.apply_change({"type": "appended", "spreadsheet_id": "check-leads", "worksheet": "Sheet1",
+                                  "headers": LEAD_HEADERS, "first_row": lead_sheet.last_row() + 1,
+                                  "rows": [[TODAY.isoformat(), "MID-X", "Typed In", "Adyar", "Call", "Center A",
+                                            "New", ""]]})
+    assert count("status", "New") == base_new + 1
+    reads = dict(backend.snapshot() - before)
+    assert not reads, reads
+    analytics_views.apply_change({"type": "updated", "spreadsheet_id": "check-leads", "worksheet": "Sheet1"})
+    assert count("status", "New") == base_new, "a rebuild reads the sheet again (the typed-in row is not in it)"
+    print("   OK: submit, status change, admission, invoice and change-feed append applied in place")
+
+    print("\nStatus:", analytics_views.status())
@@ -0,0 +1,110 @@
+"""
+Exercise the catalog store against the in-memory fake Sheets backend (fake_sheets.py).
+Checks the Sheets calls per load and per write, the persistent ID sequence, row tracking
+across deletes, the batched price-list import and the typeahead ranking.
+
+Usage: python check_catalog_store.py [--items 300]
+"""
+
+import argparse
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--items", type=int, default=300)
+args = parser.parse_args()
+
+fake_sheets.check_environment("crm-catalog-store-", PATIENT_ADMISSION_SHEET_ID="check-catalog")
+
+import catalog_service  # noqa: E402
+import live_updates  # noqa: E402
+
+BOOK = "check-catalog"
+
+backend = fake_sheets.FakeSheetsBackend()
+backend.add_spreadsheet(BOOK, "CRM Admission")
+backend.add_sheet(BOOK, "Services", [["ID", "Name", "Price"]] + [
+    [str(i), f"Service {i}", str(100 + i)] for i in range(1, args.items + 1)
+])
+backend.add_sheet(BOOK, "Packages", [["ID", "Name", "Price"], ["1", "Physiotherapy Package", "5000"]])
+fake_sheets.install(backend)
+catalog = catalog_service.catalog
+
+
+def calls(action):
+    before = backend.snapshot()
+    result = action()
+    return result, dict(backend.snapshot() - before)
+
+
+def sheet(title):
+    return backend.spreadsheets[BOOK].sheet(title)
+
+
+if __name__ == "__main__":
+    print("1) one load reads all three tabs in a single batch get (creating the missing one)")
+    everything, first = calls(catalog_service.get_all_catalog_items)
+    assert len(everything["services"]) == args.items and everything["products"] == [], everything["products"]
+    assert sheet("Products").read("A1:C1") == [["ID", "Name", "Price"]]
+    assert first.get("values.batchGet") == 1 and "values.get" not in first, first
+    _, later = calls(lambda: catalog_service.get_catalog_items("packages"))
+    assert later == {}, later
+    print(f"   OK: load {first}, later reads {later or 'no calls'}")
+
+    print("2) create takes the next ID from the sequence: one append, no scan")
+    created, create_calls = calls(lambda: catalog_service.create_catalog_item("services", {"name": "Dressing", "price": 250}))
+    assert created["id"] == args.items + 1 and create_calls == {"values.append": 1}, (created, create_calls)
+    assert catalog.get("services", created["id"])["name"] == "Dressing"
+    print(f"   OK: id {created['id']}, {create_calls}")
+
+    print("3) update and delete find the row from the index (one ID-cell check + one write)")
+    _, update_calls = calls(lambda: catalog_service.update_catalog_item("services", 42, {"name": "Service 42", "price": 999}))
+    assert sheet("Services").read("A43:C43") == [["42", "Service 42", "999"]], sheet("Services").read("A43:C43")
+    assert sum(update_calls.values()) == 2, update_calls
+    catalog_service.delete_catalog_item("services", created["id"])
+    catalog_service.delete_catalog_item("services", 10)
+    assert catalog.get("services", 42)["price"] == 999 and catalog.get("services", 10) is None
+    catalog_service.update_catalog_item("services", 42, {"name": "Service 42", "price": 1000})
+    assert sheet("Services").read("A42:C42") == [["42", "Service 42", "1000"]], "row index shifted after the delete"
+    print(f"   OK: update {update_calls}")
+
+    print("4) deleted IDs are not handed out again")
+    again = catalog_service.create_catalog_item("services", {"name": "Catheter Care", "price": 400})
+    assert again["id"] == args.items + 2, again
+    print(f"   OK: next id {again['id']}")
+
+    print("5) a price list is upserted in one batched write")
+    price_list = [{"id": 5, "name": "Service 5", "price": 105},  # Unchanged
+                  {"name": "service 6", "price": 700},  # Matched by name
+                  {"name": "Home Nursing Visit", "price": 1200},
+                  {"name": "Night Nursing Visit", "price": 1500}]
+    result, import_calls = calls(lambda: catalog_service.import_catalog_items("services", price_list))
+    assert (result["created"], result["updated"], result["unchanged"]) == (2, 1, 1), result
+    assert [item["id"] for item in result["items"][2:]] == [args.items + 3, args.items + 4], result["items"]
+    assert import_calls.get("values.batchUpdate") == 1 and "values.append" not in import_calls, import_calls
+    assert catalog.get("services", 6)["price"] == 700
+    last_row = sheet("Services").last_row()
+    assert sheet("Services").read(f"A{last_row}:C{last_row}") == [[str(args.items + 4), "Night Nursing Visit", "1500"]]
+    print(f"   OK: {import_calls}")
+
+    print("6) typeahead: prefix matches first, then word prefixes, then substrings")
+    names = [item["name"] for item in catalog_service.search_catalog_items("nurs")]
+    assert names == ["Home Nursing Visit", "Night Nursing Visit"], names
+    names = [item["name"] for item in catalog_service.search_catalog_items("physio")]
+    assert names == ["Physiotherapy Package"], names
+    assert catalog_service.search_catalog_items("service 1", "services", limit=3)[0]["name"] == "Service 1"
+    _, search_calls = calls(lambda: catalog_service.search_catalog_items("visit"))
+    assert search_calls == {}, search_calls
+    print("   OK")
+
+    print("7) another worker's catalog event forces a reload; the store's own does not")
+    loads = catalog.stats()["loads"]
+    catalog.publish("item_updated", "services", {})
+    catalog_service.get_catalog_items("services")
+    assert catalog.stats()["loads"] == loads
+    live_updates.publish("catalog", "sheet_updated", "Services", {})
+    catalog_service.get_catalog_items("services")
+    assert catalog.stats()["loads"] == loads + 1
+    print("   OK")
+
+    print("\nStatus:", catalog.stats())
@@ -0,0 +1,150 @@
+"""
+Exercise the change feed against the in-memory fake Sheets backend (fake_sheets.py).
+Checks the Sheets calls per poll, append detection with tail rows, edit/delete/header detection,
+exact full-hash tabs, namespace invalidation, replay of events in another worker, and that the
+app's own writes are told apart from edits made in Sheets.
+
+Usage: python check_change_feed.py [--rows 2000]
+"""
+
+import argparse
+import time
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=2000)
+args = parser.parse_args()
+
+fake_sheets.check_environment("crm-change-feed-")
+
+import change_feed  # noqa: E402
+import shared_cache  # noqa: E402
+import sheets_scheduler  # noqa: E402
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+BOOK = "check-leads"
+HEADERS = ["Date", "Member ID key", "Patient Name", "Follow_1 Date"]
+
+backend = fake_sheets.FakeSheetsBackend()
+backend.add_spreadsheet(BOOK, "CRM Leads")
+backend.add_sheet(BOOK, "Sheet1", [HEADERS] + [["01-01-2025", f"M{i}", f"Patient {i}", ""] for i in range(args.rows)])
+backend.add_sheet(BOOK, "Login Details", [["User_Name", "Password"], ["admin", "secret"]])
+backend.add_sheet(BOOK, "Complaints", [["Date", "Complaint"]])
+fake_sheets.install(backend)
+client = sheets_scheduler.authorize(AnonymousCredentials())
+
+change_feed.APP_WRITE_SLACK_SECONDS = 0.05  # Fake Drive and this process share a clock
+change_feed.watch_worksheet(BOOK, "Sheet1")
+change_feed.watch_worksheet(BOOK, "Login Details", namespaces=["login"], full_hash=True)
+seen = []
+change_feed.subscribe(seen.append)
+
+
+def poll():
+    before = backend.snapshot()
+    events = change_feed.poll_once(client)
+    calls = backend.snapshot() - before
+    return [(e["worksheet"], e["type"]) for e in events], events, dict(calls)
+
+
+def sheet1():
+    return backend.spreadsheets[BOOK].sheet("Sheet1")
+
+
+def settle():
+    """Let the last app write fall outside the slack, so the next edit in Sheets is foreign."""
+    time.sleep(change_feed.APP_WRITE_SLACK_SECONDS * 2)
+
+
+if __name__ == "__main__":
+    print("1) first poll records the baseline")
+    summary, _, calls = poll()
+    assert summary == [], summary
+    print(f"   OK: no events, calls {calls}")
+
+    print("2) nothing changed: one Drive call")
+    summary, _, calls = poll()
+    assert summary == [] and calls == {"drive": 1}, (summary, calls)
+    print(f"   OK: calls {calls}")
+
+    print("3) rows appended by the app: appended event carries only the new rows")
+    last = sheet1().last_row()
+    client.open_by_key(BOOK).worksheet("Sheet1").append_rows([["02-01-2025", "N1", "New One", ""], ["02-01-2025", "N2", "New Two", ""]])
+    summary, events, calls = poll()
+    settle()
+    assert summary == [("Sheet1", "appended")], summary
+    assert events[0]["first_row"] == last + 1 and [r[1] for r in events[0]["rows"]] == ["N1", "N2"]
+    assert calls.get("values.batchGet") == 2 and "values.get" not in calls, calls
+    print(f"   OK: rows {events[0]['first_row']}..{events[0]['row_count']}, calls {calls}")
+
+    print("4) last row edited: updated")
+    backend.edit_sheet(BOOK, "Sheet1", sheet1().last_row(), [["02-01-2025", "N2", "Renamed", ""]])
+    summary, _, _ = poll()
+    assert summary == [("Sheet1", "updated")], summary
+    print("   OK")
+
+    print("5) a cell in the middle edited: updated (Drive revision moved, no fingerprint explains it)")
+    backend.edit_sheet(BOOK, "Sheet1", 10, [["01-01-2025", "M8", "Edited", "05-01-2025"]])
+    summary, events, _ = poll()
+    assert summary == [("Sheet1", "updated")] and events[0].get("reason") == "revision", events
+    print("   OK")
+
+    print("6) a row deleted: updated")
+    with backend._lock:
+        del sheet1().values[5]
+        backend.spreadsheets[BOOK].touch()
+    summary, _, _ = poll()
+    assert summary == [("Sheet1", "updated")], summary
+    print("   OK")
+
+    print("7) login tab edited: exact full-hash event invalidates the login namespace")
+    shared_cache.set("login", "users", {"admin": "digest"}, 300)
+    backend.edit_sheet(BOOK, "Login Details", 3, [["nurse", "pw"]])
+    summary, events, _ = poll()
+    # Drive cannot say which tab moved, so the large tab is treated as revised too
+    assert summary == [("Login Details", "updated"), ("Sheet1", "updated")], summary
+    assert events[1].get("reason") == "revision", events
+    assert shared_cache.get("login", "users") is None
+    print("   OK")
+
+    print("8) another worker replays the events for its every-worker listeners")
+    replayed = []
+    change_feed.subscribe(replayed.append, every_worker=True)
+    change_feed._last_seq -= 2  # As if this process had not seen the last two events
+    change_feed._replay()
+    assert [e["type"] for e in replayed] == ["updated", "updated"], replayed
+    print(f"   OK: replayed seq {[e['seq'] for e in replayed]}")
+
+    print("9) rows appended in Sheets and another tab edited: both updated (the append cannot rule out an edit above it)")
+    change_feed.watch_worksheet(BOOK, "Complaints")
+    backend.edit_sheet(BOOK, "Complaints", 2, [[f"0{d}-01-2025", f"Complaint {d}"] for d in range(1, 6)])
+    poll()  # Baseline for the new tab
+    assert poll()[0] == []
+    backend.edit_sheet(BOOK, "Sheet1", sheet1().last_row() + 1, [["03-01-2025", "N3", "New Three", ""]])
+    backend.edit_sheet(BOOK, "Complaints", 3, [["02-01-2025", "Reworded by staff"]])
+    summary, events, _ = poll()
+    assert summary == [("Sheet1", "updated"), ("Complaints", "updated")], summary
+    assert all(e.get("reason") == "revision" for e in events), events
+    print("   OK")
+
+    print("10) rows appended in Sheets and a row above edited in the same tab: updated, not appended")
+    backend.edit_sheet(BOOK, "Sheet1", sheet1().last_row() + 1, [["04-01-2025", "N4", "New Four", ""]])
+    backend.edit_sheet(BOOK, "Sheet1", 20, [["01-01-2025", "M18", "Edited with the append", ""]])
+    summary, _, _ = poll()
+    assert ("Sheet1", "updated") in summary and ("Sheet1", "appended") not in summary, summary
+    print("   OK")
+
+    print("11) app writes only: appends stay tail-only, an in-place update reports just its tab")
+    book = client.open_by_key(BOOK)
+    book.worksheet("Sheet1").append_rows([["05-01-2025", "N5", "New Five", ""]])
+    book.worksheet("Complaints").update(values=[["Reworded by the app"]], range_name="B4")
+    summary, events, _ = poll()
+    assert summary == [("Sheet1", "appended"), ("Complaints", "updated")], summary
+    assert [r[1] for r in events[0]["rows"]] == ["N5"] and events[1].get("reason") == "app_write", events
+    book.worksheet("Complaints").append_rows([["06-01-2025", "Logged by the app"]])
+    summary, events, _ = poll()
+    assert summary == [("Complaints", "appended")], (summary, events)  # Sheet1 is not re-read as revised
+    print("   OK")
+
+    print("\nStatus:", {k: v for k, v in change_feed.status().items() if k != "watched"})
@@ -0,0 +1,106 @@
+"""
+Exercise the home-care client repository against the in-memory fake Sheets backend (fake_sheets.py).
+Checks the Sheets calls per lookup and update, dirty-column writes, stable client IDs, row tracking
+across inserts and deletes, and reloads when another worker or a direct sheet edit changes the tab.
+
+Usage: python check_client_repository.py [--rows 500]
+"""
+
+import argparse
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=500)
+args = parser.parse_args()
+
+fake_sheets.check_environment("crm-client-repository-")
+
+import homecare_service  # noqa: E402
+import live_updates  # noqa: E402
+
+BOOK = "check-homecare"
+HEADERS = ["Date", "Member ID Key", "PATIENT NAME", "GENDER", "AGE", "PAIN POINT", "LOCATION",
+           "SERVICE STARTED ON", "ACTIVE / INACTIVE", "SERVICE STOPPED ON", "SHIFT"]
+
+backend = fake_sheets.FakeSheetsBackend()
+backend.add_spreadsheet(BOOK, "CRM HomeCare")
+backend.add_sheet(BOOK, "CRM_HomeCare", [HEADERS] + [
+    ["01/01/2025", f"M{i}", f"Patient {i}", "F", "70", "Knee", "Chennai", "01/01/2025", "ACTIVE", "", "Day"]
+    for i in range(args.rows)
+])
+fake_sheets.install(backend)
+clients = homecare_service.homecare_clients
+
+
+def calls(action):
+    before = backend.snapshot()
+    result = action()
+    return result, dict(backend.snapshot() - before)
+
+
+def sheet_row(row_number):
+    return backend.spreadsheets[BOOK].sheet("CRM_HomeCare").read(f"A{row_number}:Z{row_number}")[0]
+
+
+if __name__ == "__main__":
+    print("1) first access loads the tab once; lookups after that make no Sheets calls")
+    _, first = calls(homecare_service.get_all_homecare_clients)
+    client, later = calls(lambda: homecare_service.get_homecare_client_by_id("  patient   42 "))
+    assert client["PATIENT NAME"] == "Patient 42" and client["_row_number"] == 44, client
+    assert later == {}, later
+    assert homecare_service.get_homecare_client_by_id(client["_client_id"])["_row_number"] == 44
+    print(f"   OK: load {first}, lookup by name or ID {later or 'no calls'}, id {client['_client_id']}")
+
+    print("2) update writes only the changed columns, in one request")
+    _, update_calls = calls(lambda: homecare_service.update_homecare_client("patient 42", {
+        "gender": "F", "age": "71", "pain_point": "Knee", "location": "Madurai", "service_started_on": "2025-01-01",
+        "active_inactive": "ACTIVE", "shift": "Night",
+    }))
+    row = sheet_row(44)
+    assert row[4] == "71" and row[6] == "Madurai" and row[10] == "Night" and row[5] == "Knee", row
+    assert clients.stats()["cells_written"] == 3, clients.stats()
+    assert clients.stats()["loads"] == 1, "own update does not force a reload"
+    print(f"   OK: calls {update_calls}, {clients.stats()['cells_written']} cells written")
+
+    print("3) missing columns can be added in the same write (LAST BILLED DATE)")
+    clients.update(client["_client_id"], {"LAST BILLED DATE": "15/03/2025"}, add_missing=True)
+    assert backend.spreadsheets[BOOK].sheet("CRM_HomeCare").read("L1")[0][0] == "LAST BILLED DATE"
+    assert sheet_row(44)[11] == "15/03/2025"
+    assert homecare_service.get_homecare_client_by_id("Patient 42")["LAST BILLED DATE"] == "15/03/2025"
+    print("   OK")
+
+    print("4) appends, inserts and deletes keep row numbers and client IDs right")
+    homecare_service.create_homecare_client({"patient_name": "New Patient", "service_started_on": "2025-03-01",
+                                             "home_care_revenue": 1000})
+    added = homecare_service.get_homecare_client_by_id("new patient")
+    assert added["_row_number"] == args.rows + 2 and sheet_row(args.rows + 2)[2] == "New Patient", added
+    clients.record_deleted([2, 3])
+    clients.record_inserted(2, ["01/01/2025", "M-X", "Inserted Patient"])
+    moved = clients.get(client["_client_id"])
+    assert moved["_row_number"] == 43 and moved["PATIENT NAME"] == "Patient 42", moved
+    assert clients.find_by_name("patient 0") is None and clients.find_by_name("inserted patient")["_row_number"] == 2
+    print(f"   OK: Patient 42 now tracked at row {moved['_row_number']}, same ID")
+
+    print("5) rows shifted in the sheet before the change feed noticed: the write re-finds the row")
+    clients.invalidate()
+    clients.all()
+    sheet = backend.spreadsheets[BOOK].sheet("CRM_HomeCare")
+    values = sheet.read("A1:Z5000")
+    sheet.clear("A1:Z5000")
+    sheet.write(1, 1, [values[0], ["02/02/2025", "M-Y", "Walk-in Patient"]] + values[1:])
+    clients.update(client["_client_id"], {"SHIFT": "Day"})
+    assert sheet_row(45)[2] == "Patient 42" and sheet_row(45)[10] == "Day" and clients.stats()["relocated"] == 1
+    print("   OK: row 44 -> 45")
+
+    print("6) another worker's event on the topic forces a reload; the repository's own does not")
+    loads = clients.stats()["loads"]
+    clients.publish("client_updated", "Patient 42", {})
+    clients.all()
+    assert clients.stats()["loads"] == loads
+    live_updates.publish("homecare_clients", "sheet_changed", None, {})
+    clients.all()
+    assert clients.stats()["loads"] == loads + 1
+    print("   OK")
+
+    print("\nStatus:", clients.stats())
@@ -0,0 +1,151 @@
+"""
+Measure compact row storage (compact_table.py) against the structures it replaces, on a
+synthetic lead sheet: get_all_records() dicts, a DataFrame of object strings and the
+CompactTable. Checks that row views read exactly like get_all_records() dicts, the memory
+and pickled size (what shared_cache stores) of each, and that /api/patients/search and the
+change-feed append path work on the compact tables.
+
+Usage: python check_compact_table.py [--rows 10000] [--columns 60]
+(--rows 100000 measures a full-size sheet; tracemalloc makes that run take many minutes)
+"""
+
+import argparse
+import asyncio
+import gc
+import pickle
+import random
+import time
+import tracemalloc
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=10000)
+parser.add_argument("--columns", type=int, default=60)
+args = parser.parse_args()
+
+fake_sheets.check_environment("crm-compact-table-")
+
+import gspread  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import compact_table  # noqa: E402
+
+FIXED = ["Date", "Member ID Key", "Patient Name", "Gender", "Age", "Patient Location", "Mobile Number",
+         "Email Id", "Status", "Care Center", "Provider", "Lead Source", "Follow Up Date", "BillGrandTotal"]
+AREAS = ["Adyar", "T Nagar", "Velachery", "Anna Nagar", "Tambaram", "Porur", "Mylapore", "Guindy"]
+
+
+def generate(rows: int, seed: int = 11):
+    """Sheet values shaped like Sheet1: unique IDs and contacts, repeated categories, sparse extras."""
+    rng = random.Random(seed)
+    headers = FIXED + [f"Field {i}" for i in range(args.columns - len(FIXED))]
+    values = [headers]
+    for i in range(rows):
+        row = [
+            f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}", f"MID-2025-01-01-{1000000 + i}", f"Patient {i} {rng.choice(AREAS)}",
+            rng.choice(["Male", "Female"]), str(rng.randint(40, 95)), rng.choice(AREAS), f"9{i:09d}",
+            f"patient{i}@example.com", rng.choice(["Active", "Inactive", "Discharged", "Follow Up"]),
+            rng.choice(["Center A", "Center B", "Center C"]), rng.choice(["Dr. Rao", "Dr. Iyer", "Dr. Menon", ""]),
+            rng.choice(["Walk-in", "Referral", "Website", "Call"]), f"2025-{1 + i % 12:02d}-15",
+            str(rng.randint(0, 50000)) if i % 4 == 0 else "",
+        ]
+        # The rest: mostly blank, some yes/no flags and short notes
+        row += [rng.choice(["", "", "", "Yes", "No", f"note {rng.randint(0, 500)}"]) for _ in range(len(headers) - len(FIXED))]
+        values.append(row)
+    return values
+
+
+def retained(build):
+    """Bytes still allocated once the sheet values are gone and only the built structure is left."""
+    gc.collect()
+    tracemalloc.start()
+    values = generate(args.rows)
+    started = time.perf_counter()
+    structure = build(values)
+    elapsed = time.perf_counter() - started
+    del values
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return structure, current, elapsed
+
+
+def as_records(values):
+    """What get_all_records() returns."""
+    headers = values[0]
+    return [dict(zip(headers, gspread.utils.numericise_all(row))) for row in values[1:]]
+
+
+def as_dataframe(values):
+    """What get_sheet_data_as_df() returns."""
+    return pd.DataFrame(values[1:], columns=values[0])
+
+
+def as_table(values):
+    return compact_table.CompactTable.from_values(values, numericise=True)
+
+
+if __name__ == "__main__":
+    print(f"1) row views read exactly like get_all_records() dicts ({args.rows} x {args.columns})")
+    values = generate(args.rows)
+    records, table = as_records(values), as_table(values)
+    assert len(table) == len(records) and table.records() == records
+    assert table[7] == records[7] and table[-1].get("Age") == records[-1]["Age"] and "Status" in table[0]
+    assert [dict(v) for v in table[10:13]] == records[10:13]
+    assert table.column("Status")[:100] == [r["Status"] for r in records[:100]]
+    extra = generate(3, seed=5)[1:]
+    grown = table.extended(extra)
+    assert len(grown) == len(table) + 3 and len(table) == args.rows
+    assert grown.records(range(len(table), len(grown))) == as_records([values[0]] + extra)
+    restored = pickle.loads(pickle.dumps(grown))
+    assert restored.records(range(len(grown) - 5, len(grown))) == grown.records(range(len(grown) - 5, len(grown)))
+    del values, records, table, grown, restored
+    print("   OK")
+
+    print("2) memory held by each structure once the sheet values are dropped")
+    results = {}
+    for label, build in (("get_all_records() dicts", as_records), ("DataFrame (object)", as_dataframe),
+                         ("CompactTable", as_table)):
+        structure, current, elapsed = retained(build)
+        blob = pickle.dumps(structure, protocol=pickle.HIGHEST_PROTOCOL)
+        started = time.perf_counter()
+        pickle.loads(blob)
+        results[label] = current
+        print(f"   {label:<24} {current / 1e6:8.1f} MB held, build {elapsed:5.2f}s, "
+              f"pickled {len(blob) / 1e6:6.1f} MB, unpickle {time.perf_counter() - started:5.2f}s")
+        del structure, blob
+    assert results["CompactTable"] * 4 < results["get_all_records() dicts"], results
+    assert results["CompactTable"] * 2 < results["DataFrame (object)"], results
+    print(f"   OK: {results['get_all_records() dicts'] / results['CompactTable']:.0f}x smaller than the dicts")
+
+    print("3) patient search (route and shared cache) and change-feed appends on compact tables")
+    from fastapi.testclient import TestClient  # noqa: E402
+
+    sheet_values = generate(2000)
+    backend = fake_sheets.FakeSheetsBackend()
+    backend.add_sheet("check-leads", "Sheet1", sheet_values)
+    fake_sheets.install(backend)
+    import main  # noqa: E402
+
+    http = TestClient(main.app)
+    # The route is served by invoice_routes (invoice_service.search_patients, read per request)
+    response = http.get("/api/patients/search", params={"q": "patient 1234 "})
+    assert response.status_code == 200, response.text
+    found = response.json()["patients"]
+    assert [p["patient_id"] for p in found] == ["MID-2025-01-01-1001234"], found
+    assert found[0]["age"] == int(sheet_values[1235][4]) and found[0]["mobile"] == int(sheet_values[1235][6])
+
+    # main.search_patients reads the shared patient cache
+    found = asyncio.run(main.search_patients("patient 1234 "))["patients"]
+    assert [p["member_id"] for p in found] == ["MID-2025-01-01-1001234"], found
+    assert found[0]["age"] == sheet_values[1235][4] and found[0]["gender"] == sheet_values[1235][3]
+    assert len(asyncio.run(main.search_patients(""))["patients"]) == 100
+    appended = generate(2001)[-1:]
+    appended[0][1], appended[0][2] = "MID-2025-01-01-7777777", "Newly Typed Patient"
+    main.apply_patient_search_change({"type": "appended", "spreadsheet_id": "check-leads", "worksheet": "Sheet1",
+                                      "headers": sheet_values[0], "first_row": 2002, "rows": appended})
+    before = backend.snapshot()
+    found = asyncio.run(main.search_patients("newly typed"))["patients"]
+    assert [p["member_id"] for p in found] == ["MID-2025-01-01-7777777"] and not dict(backend.snapshot() - before)
+    print(f"   OK: {main.load_patient_records().memory_bytes() / 1e3:.0f} KB cached for 2001 rows")
@@ -0,0 +1,118 @@
+"""
+Exercise the dropdown engine against the in-memory fake Sheets backend (fake_sheets.py).
+Checks single-cell adds and deletes, versions and deltas, edits made directly in the sheet,
+a second worker catching up from the change log, and the one-pass Excel "List box" reader.
+
+Usage: python check_dropdown_engine.py [--options 200]
+"""
+
+import argparse
+import datetime
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--options", type=int, default=200)
+args = parser.parse_args()
+
+fake_sheets.check_environment("crm-dropdown-engine-")
+
+import openpyxl  # noqa: E402
+
+import dropdown_engine  # noqa: E402
+import dropdown_service  # noqa: E402
+
+BOOK = "check-admission"
+HEADERS = ["Visit ID", "Care Center", "Provider", "Sold BY", "External Provider", "Discount", "Status"]
+
+backend = fake_sheets.FakeSheetsBackend()
+backend.add_spreadsheet(BOOK, "CRM Admission")
+backend.add_sheet(BOOK, "Dropdown Options", [HEADERS] + [
+    [str(6276000 + i), f"Center {i}", f"Provider {i}" if i < 20 else "", "Company", "", str(i * 100), "Paid"]
+    for i in range(args.options)
+])
+fake_sheets.install(backend)
+store = dropdown_service.admission_options
+
+
+def calls(action):
+    before = backend.snapshot()
+    result = action()
+    return result, dict(backend.snapshot() - before)
+
+
+def cell(a1):
+    values = backend.spreadsheets[BOOK].sheet("Dropdown Options").read(a1)
+    return values[0][0] if values and values[0] else ""
+
+
+if __name__ == "__main__":
+    print("1) first use reads the sheet once; reads after that make no Sheets calls")
+    _, first = calls(dropdown_service.load_cached_options)
+    options, later = calls(lambda: dropdown_service.get_dropdown_options("provider"))
+    assert later == {} and len(options) == 20 and options[0] == {"id": "2", "value": "Provider 0", "category": "Provider"}
+    assert store.options()["Status"] == ["Paid"], "repeated options are kept once"
+    start = store.version()
+    print(f"   OK: load {first}, lookup {later or 'no calls'}, version {start}")
+
+    print("2) add writes one cell below the column's last option; a repeat add writes nothing")
+    added, add_calls = calls(lambda: dropdown_service.add_dropdown_option("provider", "Provider X"))
+    assert added["id"] == "22" and cell("C22") == "Provider X", added
+    assert list(add_calls) == ["values.batchUpdate"], add_calls
+    _, repeat_calls = calls(lambda: dropdown_service.add_dropdown_option("Provider", "Provider X"))
+    assert repeat_calls == {}, repeat_calls
+    print(f"   OK: {add_calls}")
+
+    print("3) delete clears one cell by row (the ID returned by the list endpoint)")
+    _, delete_calls = calls(lambda: dropdown_service.delete_dropdown_option("Provider", "3"))
+    assert cell("C3") == "" and cell("C4") == "Provider 2" and sum(delete_calls.values()) == 1, delete_calls
+    assert "Provider 1" not in store.options()["Provider"]
+    print(f"   OK: {delete_calls}")
+
+    print("4) clients pass ?since=<version> and get only the changes")
+    version, changes = store.changes_since(start)
+    assert [(c["op"], c["value"]) for c in changes] == [("add", "Provider X"), ("remove", "Provider 1")], changes
+    assert store.changes_since(version) == (version, [])
+    assert store.changes_since(version + 100)[1] is None, "unknown version: reload in full"
+    print(f"   OK: {start} -> {version}, {len(changes)} changes")
+
+    print("5) an edit made in the sheet is diffed against the mirror and logged as changes")
+    sheet = backend.spreadsheets[BOOK].sheet("Dropdown Options")
+    sheet.write(5, 7, [["Cancelled"]])
+    sheet.write(args.options + 2, 7, [["Paid"]])  # Still present elsewhere: clients keep it
+    assert store.sync() == 3
+    version, changes = store.changes_since(version)
+    assert [(c["op"], c["value"]) for c in changes] == [("add", "Cancelled"), ("add", "Paid")], changes
+    assert store.options()["Status"] == ["Paid", "Cancelled"]
+    print(f"   OK: {changes}")
+
+    print("6) another worker catches up from the change log without reading the sheet")
+    other = dropdown_engine.DropdownStore("admission_options", BOOK, "Dropdown Options", dropdown_service.get_dropdown_worksheet)
+    _, other_calls = calls(other.options)
+    assert other_calls == {} and other.options() == store.options() and other.version() == store.version()
+    other.add("Status", "Refunded")
+    _, catch_up_calls = calls(store.options)
+    assert catch_up_calls == {} and store.options()["Status"][-1] == "Refunded" and store.version() == other.version()
+    print("   OK")
+
+    print("7) a renamed category forces a full reload for clients")
+    before = store.version()
+    sheet.write(1, 7, [["Invoice Status"]])
+    store.sync()
+    assert store.changes_since(before)[1] is None and "Invoice Status" in store.options()
+    assert "Status" not in store.options()
+    print("   OK")
+
+    print("8) Excel List box options are read in one pass (date column and date cells skipped)")
+    workbook = openpyxl.Workbook()
+    ws = workbook.active
+    ws.title = "List box"
+    ws.append(["Date", "Gender", "Room Type"])
+    ws.append(["2025-01-01", "Male", "Single"])
+    ws.append([None, "Female", datetime.datetime(2025, 1, 2)])
+    ws.append([None, "Male", "Twin"])
+    assert dropdown_engine.options_from_workbook(workbook, "List box") == {"Gender": ["Female", "Male"], "Room Type": ["Single", "Twin"]}
+    assert dropdown_engine.options_from_workbook(workbook, "Missing") == {}
+    print("   OK")
+
+    print("\nStatus:", dropdown_engine.status())
@@ -0,0 +1,104 @@
+"""
+Exercise the duplicate-lead index on a synthetic lead sheet, without Google Sheets.
+Checks phone/email/name normalization, fuzzy matches across blocks, incremental row
+updates, oversized blocks, the cluster report and per-check latency at 200k leads.
+
+Usage: python check_duplicate_index.py [--leads 200000]
+"""
+
+import argparse
+import random
+import time
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--leads", type=int, default=200000)
+args = parser.parse_args()
+
+fake_sheets.check_environment("crm-duplicate-index-")
+
+import duplicate_index  # noqa: E402
+
+HEADERS = ["Date", "Member ID key", "Attender Name", "Patient Name", "Patient Location", "Email Id", "Mobile Number"]
+SYLLABLES = ["ra", "vi", "ku", "ma", "pri", "ya", "a", "run", "la", "kshmi", "su", "re", "sh", "mee", "na", "kar",
+             "thi", "div", "ga", "nesh", "ni", "tha", "vi", "jay", "sun", "da", "ram", "kri", "shna", "pil", "lai", "me", "non"]
+AREAS = ["Adyar", "T Nagar", "Velachery", "Anna Nagar", "Tambaram", "Porur", "Mylapore", "Guindy", "Chromepet", "Perambur"]
+
+random.seed(7)
+rows = [HEADERS]
+
+
+def random_name() -> str:
+    return " ".join("".join(random.choice(SYLLABLES) for _ in range(random.randint(2, 4))).title() for _ in range(2))
+
+
+for i in range(args.leads):
+    rows.append(["2025-01-01", f"MID-{i}", "", random_name(), random.choice(AREAS),
+                 f"lead{i}@example.com", f"9{i:09d}"])
+
+# Known duplicates of the first leads, written the way staff actually type them
+rows.append(["2025-02-01", "MID-D1", "", f"Mr. {rows[1][3].upper()}", rows[1][4], "", f"+91 {rows[1][6][:5]} {rows[1][6][5:]}"])
+rows.append(["2025-02-01", "MID-D2", "", "", "", "Lead1+enquiry@Example.com", ""])
+rows[3][5] = "meena.s@gmail.com"
+rows.append(["2025-02-01", "MID-D3", "", rows[3][3], rows[3][4], "meenas@googlemail.com", ""])
+rows.append(["2025-02-01", "MID-D4", "", " ".join(reversed(rows[4][3].split())), rows[4][4], "", ""])
+# A clinic number on 60 leads: too common to mean anything
+for j in range(60):
+    rows.append(["2025-03-01", f"MID-C{j}", "", random_name(), "Guindy", "", "044-2222 3333"])
+
+
+if __name__ == "__main__":
+    index = duplicate_index.DuplicateIndex("Sheet1")
+
+    print(f"1) build over {len(rows) - 1} leads")
+    started = time.perf_counter()
+    index.rebuild(rows)
+    print(f"   OK: {time.perf_counter() - started:.2f}s, {index.stats()}")
+
+    print("2) phone, email and name+location variants find the original lead")
+    found = {m["member_id"]: m for m in index.duplicates_of_member("MID-D1")}
+    assert "MID-0" in found and "phone" in found["MID-0"]["matched_on"], found
+    assert [m["member_id"] for m in index.duplicates_of_member("MID-D2")] == ["MID-1"]
+    assert [m["member_id"] for m in index.duplicates_of_member("MID-D3")][0] == "MID-2"
+    assert [m["member_id"] for m in index.duplicates_of_member("MID-D4")][0] == "MID-3"
+    assert index.duplicates_of_member("MID-NOPE") is None
+    print(f"   OK: D1 -> {found['MID-0']}")
+
+    print("3) a shared clinic number is an oversized block and proves nothing")
+    assert index.duplicates_of_member("MID-C1") == [], index.duplicates_of_member("MID-C1")
+    print(f"   OK: {index.stats()['oversized_blocks']} oversized block(s)")
+
+    print("4) rows written through the API are indexed incrementally")
+    new_row = ["2025-04-01", "MID-NEW", "", "Priyaqu Zaman", "Adyar", "", "98765 00042"]
+    index.upsert_row(len(rows) + 1, HEADERS, new_row)
+    payload = {"Patient Name": "priyaqu  zaman", "Patient Location": "adyar", "Mobile Number": "09876500042"}
+    assert [m["member_id"] for m in index.duplicates_of_record(payload)] == ["MID-NEW"]
+    index.upsert_row(len(rows) + 1, HEADERS, new_row[:6] + ["9000000999"])  # Phone corrected
+    assert index.duplicates_of_record(payload) == [], "the old phone block still points at the row"
+    print("   OK")
+
+    print("5) per-submit checks stay under a millisecond")
+    samples = [{"Patient Name": rows[i][3], "Patient Location": rows[i][4], "Mobile Number": rows[i][6],
+                "Email Id": rows[i][5]} for i in random.sample(range(1, args.leads), 2000)]
+    started = time.perf_counter()
+    for payload in samples:
+        index.duplicates_of_record(payload)
+    per_check = (time.perf_counter() - started) / len(samples) * 1000
+    started = time.perf_counter()
+    for i in range(2000):
+        index.duplicates_of_member(f"MID-{i}")
+    per_member = (time.perf_counter() - started) / 2000 * 1000
+    assert per_check < 1.0 and per_member < 1.0, (per_check, per_member)
+    print(f"   OK: {per_check:.3f} ms per payload check, {per_member:.3f} ms per member check")
+
+    print("6) the cluster job groups every duplicate and stores the report for all workers")
+    summary = duplicate_index.clusters_job(lambda: index)
+    report = duplicate_index.cluster_report()
+    groups = [set(c["member_ids"]) for c in report["clusters"]]
+    for pair in ({"MID-0", "MID-D1"}, {"MID-1", "MID-D2"}, {"MID-2", "MID-D3"}, {"MID-3", "MID-D4"}):
+        assert any(pair <= group for group in groups), (pair, groups)
+    assert summary["cluster_count"] == len(report["clusters"]) and "clusters" not in summary
+    print(f"   OK: {summary}")
+
+    print("\nStatus:", duplicate_index.status())
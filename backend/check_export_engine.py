@@ -0,0 +1,131 @@
+"""
+Exercise the export engine against the in-memory fake Sheets backend (fake_sheets.py).
+Checks chunked Sheets reads and bounded memory while streaming, the /search and invoice
+filters reused by the exports, XLSX output and column projection, and a background job
+whose artifact matches the streamed download.
+
+Usage: python check_export_engine.py [--rows 20000]
+"""
+
+import argparse
+import csv
+import io
+import math
+import time
+import tracemalloc
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=20000)
+args = parser.parse_args()
+
+fake_sheets.check_environment("crm-export-engine-", EXPORT_CHUNK_ROWS="1000")
+
+import openpyxl  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import export_engine  # noqa: E402
+import export_routes  # noqa: E402
+
+LEAD_HEADERS = ["Date", "Member ID Key", "Patient Name", "Mobile", "Date", "BillGrandTotal"]
+INVOICE_HEADERS = ["Invoice Ref", "Invoice Date", "Patient ID", "Patient Name", "Care Center", "Provider", "Status", "Total Amount"]
+
+backend = fake_sheets.FakeSheetsBackend()
+backend.add_sheet("check-leads", "Sheet1", [LEAD_HEADERS] + [
+    [f"2025-{1 + i % 12:02d}-01", f"M{i:06d}", f"Patient {i}", f"98{i:08d}", "", str(1000 + i) if i % 10 == 0 else ""]
+    for i in range(args.rows)
+])
+backend.add_sheet("check-admission", "Invoice Table", [INVOICE_HEADERS] + [
+    [f"INV{i:06d}", f"{1 + i % 28:02d}-0{1 + i % 5}-2025", f"M{i:06d}", f"Patient {i}", "Center A" if i % 2 else "Center B",
+     "Provider X", "Paid" if i % 3 == 0 else "Invoiced", str(500 + i)]
+    for i in range(3000)
+])
+backend.add_sheet("check-homecare", "CRM_HomeCare", [["Patient ID", "Patient Name"], ["H1", "Home Client"]])
+fake_sheets.install(backend)
+
+app = FastAPI()
+app.include_router(export_routes.router)
+http = TestClient(app)
+
+
+def calls(action):
+    before = backend.snapshot()
+    result = action()
+    return result, dict(backend.snapshot() - before)
+
+
+def rows_of(body: bytes):
+    return list(csv.reader(io.StringIO(body.decode("utf-8"))))
+
+
+if __name__ == "__main__":
+    print("1) a worksheet is read in CHUNK_ROWS ranges and the CSV is sent as it arrives")
+    response, stream_calls = calls(lambda: http.get("/api/exports/leads"))
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/csv"), response.text[:200]
+    assert "content-length" not in response.headers, "streamed responses use chunked transfer encoding"
+    rows = rows_of(response.content)
+    assert rows[0] == LEAD_HEADERS and len(rows) == args.rows + 1 and rows[-1][1] == f"M{args.rows - 1:06d}"
+    expected_reads = 1 + math.ceil(args.rows / export_engine.CHUNK_ROWS)  # Header row + one read per chunk
+    assert stream_calls.get("values.get", 0) <= expected_reads + 1, stream_calls
+    print(f"   OK: {len(rows) - 1} rows, {stream_calls}")
+
+    print("2) memory while streaming stays bounded by the chunk, not the sheet")
+    export = export_engine.Export(export_engine.get_source("leads"), {})
+    tracemalloc.start()
+    pieces = sizes = 0
+    for piece in export_engine.stream(export, "csv"):
+        pieces += 1
+        sizes += len(piece)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    whole = export.worksheet.get_all_values()  # What a one-shot export holds in memory
+    _, whole_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del whole
+    assert pieces >= args.rows // export_engine.CHUNK_ROWS and peak * 4 < whole_peak, (pieces, peak, whole_peak)
+    print(f"   OK: {pieces} pieces, {sizes / 1e6:.1f} MB sent, peak {peak / 1e6:.1f} MB "
+          f"(reading the whole sheet: {whole_peak / 1e6:.1f} MB)")
+
+    print("3) the /search and invoice filters are the ones the list endpoints use")
+    rows = rows_of(http.get("/api/exports/leads", params={"member_id": "m00012"}).content)
+    assert [r[1] for r in rows[1:]] == [f"M{i:06d}" for i in range(args.rows) if "m00012" in f"m{i:06d}"], rows[:3]
+    rows = rows_of(http.get("/api/exports/invoices", params={"status": "paid", "care_center": "Center B",
+                                                             "date_from": "2025-02-01"}).content)
+    assert rows[1:] and all(r[6] == "Paid" and r[4] == "Center B" and not r[1].endswith("-01-2025") for r in rows[1:])
+    rows = rows_of(http.get("/api/exports/sheets/admission/Invoice Table",
+                            params=[("where", "status:Invoiced"), ("where", "Provider:provider x"), ("q", "INV0001")]).content)
+    assert len(rows) > 1 and all(r[6] == "Invoiced" and r[0].startswith("INV0001") for r in rows[1:]), rows[:3]
+    bad = http.get("/api/exports/invoices", params={"where": "Colour:red"})
+    assert bad.status_code == 400, bad.text
+    missing = http.get("/api/exports/sheets/leads/Nope")
+    assert missing.status_code == 404 and http.get("/api/exports/unknown").status_code == 404
+    print("   OK")
+
+    print("4) XLSX via write-only mode; billing summaries keep only the billing columns")
+    response = http.get("/api/exports/billing_summaries", params={"format": "xlsx"})
+    sheet = openpyxl.load_workbook(io.BytesIO(response.content)).active
+    values = list(sheet.values)
+    assert values[0] == ("Member ID Key", "Patient Name", "BillGrandTotal"), values[0]
+    assert len(values) - 1 == math.ceil(args.rows / 10) and values[1] == ("M000000", "Patient 0", "1000"), values[:2]
+    parquet = http.get("/api/exports/leads", params={"format": "parquet"})
+    assert parquet.status_code == (200 if export_engine.pyarrow is not None else 501), parquet.text[:200]
+    print(f"   OK: {len(values) - 1} billing rows, parquet {parquet.status_code}")
+
+    print("5) a background export writes an artifact any worker can serve")
+    job = http.post("/api/exports/leads/jobs", params={"name": "patient 1"}).json()
+    assert job["status"] in ("queued", "running", "done"), job
+    deadline = time.time() + 30
+    while job["status"] not in ("done", "failed") and time.time() < deadline:
+        time.sleep(0.05)
+        job = http.get(f"/api/exports/jobs/{job['export_id']}").json()
+    assert job["status"] == "done", job
+    download = http.get(f"/api/exports/jobs/{job['export_id']}/download")
+    streamed = http.get("/api/exports/leads", params={"name": "patient 1"})
+    assert download.content == streamed.content and job["rows"] == len(rows_of(download.content)) - 1, job
+    assert job["file_name"].startswith("leads-") and "attachment" in download.headers["content-disposition"]
+    assert http.post("/api/exports/invoices/jobs", params={"where": "Colour:red"}).status_code == 400
+    print(f"   OK: {job['rows']} rows, {job['bytes']} bytes")
+
+    print("\nStatus:", export_engine.status())
@@ -0,0 +1,97 @@
+"""
+Exercise conditional GET and response compression on a small app, without Google Sheets.
+Checks version ETags and 304s, the body-hash fallback, Accept-Encoding negotiation and that streams are not compressed.
+
+Usage: python check_http_cache.py
+"""
+
+import gzip
+
+import fake_sheets
+
+fake_sheets.check_environment("crm-http-cache-")
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import http_cache  # noqa: E402
+import live_updates  # noqa: E402
+import shared_cache  # noqa: E402
+
+ROWS = [{"member_id": f"MID-{i}", "patient_name": f"Patient {i}", "location": "Chennai"} for i in range(2000)]
+builds = {"count": 0}
+
+app = FastAPI()
+app.add_middleware(http_cache.CompressionMiddleware)
+
+
+@app.get("/rows")
+async def rows(request: Request, limit: int = 100):
+    version = http_cache.dataset_version(topics=["enquiries"], namespaces=["check_rows"])
+    cached = http_cache.not_modified(request, version)
+    if cached is not None:
+        return cached
+    builds["count"] += 1
+    return http_cache.json_response(request, {"rows": ROWS[:limit]}, version)
+
+
+@app.get("/unversioned")
+async def unversioned(request: Request):
+    return http_cache.json_response(request, {"rows": ROWS[:50]})
+
+
+@app.get("/stream")
+async def stream():
+    async def frames():
+        for i in range(3):
+            yield f"data: {'x' * 2000} {i}\n\n"
+    return StreamingResponse(frames(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    client = TestClient(app)
+
+    print("1) version ETag: second request is a 304 without rebuilding the body")
+    first = client.get("/rows?limit=500", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    second = client.get("/rows?limit=500", headers={"If-None-Match": etag})
+    assert second.status_code == 304 and second.headers["etag"] == etag and builds["count"] == 1
+    other_query = client.get("/rows?limit=10", headers={"If-None-Match": etag})
+    assert other_query.status_code == 200, "query string is part of the ETag"
+    print(f"   OK: {etag}, {len(first.content)} bytes saved")
+
+    print("2) app writes and cache invalidations change the version")
+    live_updates.publish("enquiries", "enquiry_submitted", "MID-1", {})
+    assert client.get("/rows?limit=500", headers={"If-None-Match": etag}).status_code == 200
+    etag = client.get("/rows?limit=500").headers["etag"]
+    shared_cache.invalidate("check_rows")
+    assert client.get("/rows?limit=500", headers={"If-None-Match": etag}).status_code == 200
+    print("   OK")
+
+    print("3) without a version the body hash is the ETag")
+    etag = client.get("/unversioned").headers["etag"]
+    assert client.get("/unversioned", headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+    print("   OK")
+
+    print("4) Accept-Encoding negotiation")
+    plain = client.get("/rows?limit=2000", headers={"Accept-Encoding": "identity"})
+    zipped = client.get("/rows?limit=2000", headers={"Accept-Encoding": "gzip;q=1.0, deflate"})
+    assert "content-encoding" not in plain.headers
+    assert zipped.headers["content-encoding"] == "gzip" and "Accept-Encoding" in zipped.headers["vary"]
+    assert zipped.json() == plain.json()
+    compressed_size = int(zipped.headers["content-length"])
+    assert compressed_size == len(gzip.compress(plain.content, compresslevel=http_cache.GZIP_LEVEL, mtime=0))
+    small = client.get("/rows?limit=1", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers, "bodies under the threshold stay uncompressed"
+    refused = client.get("/rows?limit=2000", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in refused.headers
+    brotli_state = "available" if http_cache.brotli is not None else "not installed, gzip used"
+    print(f"   OK: {len(plain.content)} -> {compressed_size} bytes (brotli {brotli_state})")
+
+    print("5) streaming responses pass through uncompressed")
+    streamed = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in streamed.headers and streamed.text.count("data:") == 3
+    print("   OK")
+
+    print("\nStatus:", http_cache.status())
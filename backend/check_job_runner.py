@@ -0,0 +1,136 @@
+"""
+Exercise the single-leader job runner with several processes, the way `uvicorn --workers N` runs the app.
+Checks that one worker leads, each daily slot runs exactly once, missed slots are caught up (or recorded
+as missed past the catch-up window), the concurrency limit holds and leadership fails over on stop.
+
+Usage: python check_job_runner.py [--workers 4] [--job-seconds 1.0]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--workers", type=int, default=4)
+parser.add_argument("--job-seconds", type=float, default=1.0, help="Simulated billing scan time")
+args = parser.parse_args()
+
+# Spawned workers re-import this file; they inherit the parent's work directory through the environment
+workdir = fake_sheets.check_environment("crm-job-runner-", JOB_CATCH_UP_HOURS="2.5")
+RUNS_FILE = os.path.join(workdir, "runs.txt")
+
+import job_runner  # noqa: E402
+
+NOW = datetime.now()
+# on_time: due two minutes ago; late: due two hours ago (within catch-up); stale: due three hours ago (past it)
+JOBS = {
+    "on_time": (NOW - timedelta(minutes=2)).strftime("%H:%M"),
+    "late": (NOW - timedelta(hours=2)).strftime("%H:%M"),
+    "stale": (NOW - timedelta(hours=3)).strftime("%H:%M"),
+}
+
+
+def billing(job_id):
+    with open(RUNS_FILE, "a", encoding="utf-8") as f:
+        f.write(f"{job_id} {os.getpid()}\n")
+    time.sleep(args.job_seconds)
+    return {"billed_count": 1}
+
+
+def register():
+    for job_id, at in JOBS.items():
+        job_runner.register_daily_job(job_id, job_id, at, billing, args=[job_id])
+
+
+def worker(start, results):
+    register()
+    start.wait()
+    led = False
+    for _ in range(5):
+        job_runner.tick()
+        led = led or job_runner._is_leader
+        time.sleep(0.2)
+    time.sleep(args.job_seconds + 0.5)  # Let a started run finish before the process exits
+    results.put((os.getpid(), led))
+
+
+def runs_by_job():
+    counts = {}
+    if os.path.exists(RUNS_FILE):
+        with open(RUNS_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                job_id = line.split()[0]
+                counts[job_id] = counts.get(job_id, 0) + 1
+    return counts
+
+
+if __name__ == "__main__":
+    ctx = multiprocessing.get_context("spawn")
+
+    # Simulate an existing deployment: the jobs were registered days ago, so today's slots are owed
+    job_runner.init_db()
+    conn = sqlite3.connect(job_runner.JOB_DB_PATH)
+    for job_id, at in JOBS.items():
+        conn.execute(
+            "INSERT INTO job_state (job_id, name, schedule, registered_at) VALUES (?, ?, ?, ?)",
+            (job_id, job_id, f"daily {at}", time.time() - 3 * 86400),
+        )
+    conn.commit()
+    conn.close()
+
+    print(f"1) {args.workers} workers tick at once")
+    start, results = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(start, results)) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    time.sleep(1.5)  # Let every process import and register
+    start.set()
+    for p in procs:
+        p.join()
+    seen = [results.get() for _ in procs]
+    leaders = [pid for pid, led in seen if led]
+    print(f"   leaders: {leaders}")
+    assert len(leaders) == 1, f"expected one leader, got {leaders}"
+    print("   OK: one leader")
+
+    print("2) each owed slot ran once; the stale slot is recorded as missed")
+    counts = runs_by_job()
+    print(f"   runs: {counts}")
+    assert counts.get("on_time") == 1 and counts.get("late") == 1 and "stale" not in counts
+    history = {job_id: job_runner.run_history(job_id) for job_id in JOBS}
+    assert history["on_time"][0]["trigger"] == "schedule" and history["on_time"][0]["status"] == "succeeded"
+    assert history["late"][0]["trigger"] == "catch_up" and history["late"][0]["status"] == "succeeded"
+    assert history["stale"][0]["status"] == "missed"
+    assert history["on_time"][0]["summary"] == {"billed_count": 1}
+    print("   OK: schedule, catch_up and missed recorded")
+
+    print("3) a dead leader's lease expires and its running run is abandoned")
+    register()
+    conn = sqlite3.connect(job_runner.JOB_DB_PATH)
+    conn.execute("UPDATE leases SET lease_until = ?", (time.time() - 1,))
+    conn.execute(
+        "INSERT INTO runs (job_id, slot, trigger, status, owner, lease_until, started_at) "
+        "VALUES ('on_time', NULL, 'manual', 'running', 'dead-host:1:x', ?, ?)",
+        (time.time() - 1, time.time() - 60),
+    )
+    conn.commit()
+    conn.close()
+    job_runner.tick()
+    assert job_runner._is_leader
+    assert job_runner.run_history("on_time")[0]["status"] == "abandoned"
+    print(f"   OK: {job_runner.OWNER} took over")
+
+    print("4) concurrency limit: a second manual run is refused while one is in progress")
+    first = job_runner.run_now("on_time")
+    second = job_runner.run_now("on_time")
+    assert first["started"] and not second["started"], (first, second)
+    time.sleep(args.job_seconds + 0.5)
+    assert job_runner.run_history("on_time")[0]["status"] == "succeeded"
+    print(f"   OK: {second['message']}")
+
+    print("\nStatus:", job_runner.job_status("on_time"))
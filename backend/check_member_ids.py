@@ -0,0 +1,170 @@
+"""
+Exercise the Member ID service, without Google Sheets for the ID checks and against the
+in-memory fake Sheets backend (fake_sheets.py) for the writes. Checks uniqueness under
+1,000 parallel submits across threads and processes (next to the old timestamp + random
+scheme), per-process monotonicity, the persisted high-water mark across restarts, bulk
+reservation, that upsert_to_sheet appends a fresh ID after reading only the header row, that
+/submit ignores a client-sent ID, that a new database is seeded from the IDs already in the
+sheet, and how an unset or malformed MEMBER_ID_NODE is handled.
+
+Usage: python check_member_ids.py [--submits 1000] [--processes 4]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--submits", type=int, default=1000)
+parser.add_argument("--processes", type=int, default=4)
+parser.add_argument("--worker", type=int, default=0, help=argparse.SUPPRESS)  # Child mode: print N IDs
+args = parser.parse_args()
+
+workdir = fake_sheets.check_environment("crm-member-ids-")  # --worker children reuse the same work dir
+
+import member_ids  # noqa: E402
+
+if args.worker:
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        print("\n".join(pool.map(lambda _: member_ids.next_member_id(), range(args.worker))))
+    sys.exit(0)
+
+
+def legacy_member_id() -> str:
+    """The ID submit_form used to build."""
+    now = datetime.now()
+    numerical_id = int(now.timestamp() * 1000) % 100000 + random.randint(1000, 9999)
+    return f"MID-{now.strftime('%Y-%m-%d')}-{numerical_id}"
+
+
+def parallel(make, count: int):
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        return list(pool.map(lambda _: make(), range(count)))
+
+
+if __name__ == "__main__":
+    print(f"1) {args.submits} parallel submits across {args.processes} processes")
+    per_process = args.submits // args.processes
+    started = time.perf_counter()
+    children = [subprocess.Popen([sys.executable, __file__, "--worker", str(per_process)],
+                                 stdout=subprocess.PIPE, text=True, env=os.environ.copy())
+                for _ in range(args.processes - 1)]
+    issued = parallel(member_ids.next_member_id, args.submits - per_process * (args.processes - 1))
+    for child in children:
+        out, _ = child.communicate(timeout=120)
+        assert child.returncode == 0, child.returncode
+        issued += out.split()
+    elapsed = time.perf_counter() - started
+    assert len(issued) == args.submits and len(set(issued)) == args.submits, len(set(issued))
+    assert all(member_ids.ISSUED_ID.match(m) for m in issued), issued[:3]
+    legacy = parallel(legacy_member_id, args.submits)
+    legacy_collisions = len(legacy) - len(set(legacy))
+    print(f"   OK: {len(set(issued))} unique IDs in {elapsed:.2f}s "
+          f"(old scheme: {legacy_collisions} collisions in {args.submits})")
+
+    print("2) one process issues increasing IDs; a restart continues above the high-water mark")
+    mine = [member_ids.next_member_id() for _ in range(50)]
+    assert mine == sorted(mine) and len(set(mine)) == 50
+    high_water = member_ids.status()["high_water"]
+    member_ids._block.clear()  # What a restart loses: the rest of this process's block
+    after_restart = member_ids.next_member_id()
+    assert int(after_restart[-6:]) == high_water + 1 and after_restart not in issued, (after_restart, high_water)
+    print(f"   OK: {mine[0]} .. {mine[-1]}, after restart {after_restart}")
+
+    print("3) bulk reservation hands out a contiguous run and claims it for the import's sheet")
+    reserved = member_ids.reserve(500, sheet="Sheet1")
+    sequences = [int(m[-6:]) for m in reserved]
+    assert sequences == list(range(sequences[0], sequences[0] + 500)) and not set(reserved) & set(issued)
+    assert not member_ids.claim_append("Sheet1", reserved[0]), "imported rows are already in the sheet"
+    assert member_ids.claim_append("Enquiries", reserved[0])
+    assert not member_ids.claim_append("Sheet1", "MID-2025-11-07-51494"), "legacy IDs always scan"
+    assert not member_ids.claim_append("Sheet1", "MID-2025-11-07-2000001"), "another node's IDs always scan"
+    print(f"   OK: {reserved[0]} .. {reserved[-1]}")
+
+    print("4) upsert_to_sheet appends a fresh ID after reading only the header row")
+
+    backend = fake_sheets.FakeSheetsBackend()
+    sheet = backend.add_sheet("check-leads", "Sheet1", [["Date", "Member ID key", "Patient Name"]] + [
+        ["2025-01-01", f"MID-2025-01-01-{1000 + i}", f"Patient {i}"] for i in range(5000)
+    ])
+    fake_sheets.install(backend)
+    import main  # noqa: E402
+
+    member_id = member_ids.next_member_id()
+    before, started = backend.snapshot(), time.perf_counter()
+    main.upsert_to_sheet("Sheet1", {"Member ID key": member_id, "Patient Name": "New Patient"}, strict_mode=True)
+    first_write, first_ms = dict(backend.snapshot() - before), (time.perf_counter() - started) * 1000
+    assert sheet.read("A5002:C5002") == [["", member_id, "New Patient"]], sheet.read("A5002:C5002")
+    assert sheet.read("A1:C1") == [["Date", "Member ID key", "Patient Name"]]
+    before, started = backend.snapshot(), time.perf_counter()
+    main.upsert_to_sheet("Sheet1", {"Member ID key": member_id, "Patient Name": "Renamed"}, strict_mode=True)
+    second_write, second_ms = dict(backend.snapshot() - before), (time.perf_counter() - started) * 1000
+    assert sheet.last_row() == 5002 and sheet.read("C5002") == [["Renamed"]], "the retry updated in place"
+    print(f"   OK: first write {first_write} in {first_ms:.0f} ms (header row), "
+          f"retry/edit {second_write} in {second_ms:.0f} ms (whole sheet)")
+
+    print("5) /submit issues the ID on the server and ignores the one the client sent")
+    from fastapi.testclient import TestClient  # noqa: E402
+
+    main.fields_cache["enquiry"] = [{"name": "Member ID key", "data_type": "text"},
+                                    {"name": "Patient Name", "data_type": "text"}]
+    http = TestClient(main.app)
+    client_id = "MID-2025-01-01-1004"  # Already in the sheet (row 6)
+    response = http.post("/submit", json={"data": {"Member ID key": client_id, "Patient Name": "Client Pick"}})
+    assert response.status_code == 200, response.text
+    server_id = response.json()["member_id"]
+    assert server_id != client_id and member_ids.is_issued(server_id), server_id
+    assert main.write_outbox.pending_payloads("enquiry_submit")[-1]["Member ID key"] == server_id
+    assert sheet.read("B6:C6") == [[client_id, "Patient 4"]], "the existing row is untouched"
+    print(f"   OK: client sent {client_id}, server issued {server_id}")
+
+    print("6) a new database starts above the IDs already in the sheet")
+    today = datetime.now().strftime('%Y-%m-%d')
+    in_sheet = [f"MID-{today}-1{n:06d}" for n in (7, 4242, 31)] + [f"MID-{today}-2999999", "MID-2025-01-02-1000900"]
+    sheet.write(5003, 1, [["", member_id, ""] for member_id in in_sheet])
+    member_ids.MEMBER_ID_DB_PATH = os.path.join(workdir, "member_ids_lost.db")  # The database was lost
+    member_ids._initialized = False
+    member_ids._block.clear()
+    fresh = member_ids.next_member_id()
+    assert int(fresh[-6:]) == 4243, fresh
+    assert member_ids.reserve(1, now=datetime(2025, 1, 2)) == ["MID-2025-01-02-1000901"]
+    for seeded in (in_sheet[1], "MID-2025-01-02-1000900"):
+        assert not member_ids.is_issued(seeded) and not member_ids.claim_append("Sheet1", seeded), seeded
+    assert member_ids.claim_append("Sheet1", fresh), "IDs issued after seeding still skip the scan"
+    print(f"   OK: sheet max {in_sheet[1]}, next {fresh}; seeded IDs always scan the sheet")
+
+    print("7) a new database refuses to issue when the sheet cannot be read")
+    member_ids.MEMBER_ID_DB_PATH = os.path.join(workdir, "member_ids_unreadable.db")
+    member_ids._initialized = False
+    member_ids._block.clear()
+    member_ids.set_seed_loader(lambda: (_ for _ in ()).throw(ConnectionError("quota exceeded")))
+    try:
+        member_ids.next_member_id()
+        raise AssertionError("issued an ID without seeding")
+    except RuntimeError as e:
+        assert "quota exceeded" in str(e), e
+    member_ids.set_seed_loader(main.lead_sheet_member_ids)
+    assert int(member_ids.next_member_id()[-6:]) == 4243, "seeded once the sheet is readable"
+    print("   OK: RuntimeError until the sheet is readable")
+
+    print("8) an unset MEMBER_ID_NODE falls back to node 1 with a warning; a malformed one refuses")
+    here = os.path.dirname(os.path.abspath(__file__))
+    probe_db = os.path.join(workdir, "member_ids_probe.db")
+    code = "import member_ids; print(member_ids.next_member_id())"
+    probe = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=here,
+                           env={**os.environ, "MEMBER_ID_NODE": "", "MEMBER_ID_DB_PATH": probe_db})
+    assert probe.returncode == 0 and "MEMBER_ID_NODE is not set" in probe.stdout, probe.stderr[-500:]
+    assert member_ids.ISSUED_ID.match(probe.stdout.split()[-1]).group(2) == "1", probe.stdout
+    probe = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=here,
+                           env={**os.environ, "MEMBER_ID_NODE": "12", "MEMBER_ID_DB_PATH": probe_db})
+    assert probe.returncode != 0 and "MEMBER_ID_NODE must be a single digit" in probe.stderr, probe.stderr[-500:]
+    print("   OK: unset issued on node 1; '12' raised ValueError")
+
+    print("\nStatus:", member_ids.status())
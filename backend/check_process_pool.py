@@ -0,0 +1,282 @@
+"""
+Exercise the process pool (process_pool.py) with the task types the routes use: delete-filter
+date parsing, Excel inspection and reads, discharge summary and invoice PDFs. Checks results
+match the inline code, that shared-memory byte results match the bytes returned in-process,
+that the event loop keeps ticking while a PDF renders (and how long it stalls when rendered
+inline), queue limits, timeouts and result size limits, the HTTP routes, and that workers
+started from the frozen (PyInstaller) entry point do not start another server.
+
+Usage: python check_process_pool.py [--rows 20000] [--services 400]
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import subprocess
+import sys
+import time
+import zlib
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=20000)
+parser.add_argument("--services", type=int, default=400)
+args = parser.parse_args()
+
+# Worker processes are spawned and import this module again; they reuse the parent's work dir
+workdir = fake_sheets.check_environment("crm-process-pool-", PROCESS_POOL_WORKERS="2")
+
+import process_pool  # noqa: E402
+
+AREAS = ["Adyar", "T Nagar", "Velachery", "Anna Nagar", "Tambaram", "Porur"]
+
+
+def delete_values(rows: int):
+    """A Date column as typed into Sheet1: ISO and day-first dates, blanks and the odd typo."""
+    rng = random.Random(3)
+    values = []
+    for i in range(rows):
+        day, month = 1 + i % 28, 1 + i % 12
+        values.append(rng.choice([f"2025-{month:02d}-{day:02d}", f"2025-{month:02d}-{day:02d} 10:30:00",
+                                  f" 2025-{month:02d}-{day:02d}", "", "n/a"]))
+    return values
+
+
+def write_workbook(path: str, rows: int):
+    import pandas as pd
+
+    rng = random.Random(5)
+    pd.DataFrame({
+        "Patient Name": [f"Patient {i}" for i in range(rows)],
+        "Mobile Number": [f"9{i:09d}" for i in range(rows)],
+        "Patient Location": [rng.choice(AREAS) for _ in range(rows)],
+        "Age": [rng.randint(40, 95) if i % 7 else None for i in range(rows)],
+        "Follow Up Date": [f"2025-{1 + i % 12:02d}-15" for i in range(rows)],
+    }).to_excel(path, index=False)
+
+
+def invoice(services: int):
+    return {
+        "invoice_id": "INV-2025-0001", "invoice_date": "2025-06-01", "patient_id": "MID-2025-01-01-1000001",
+        "patient_name": "Patient One", "gender": "Female", "age": 72, "mobile": "9000000001",
+        "care_center": "Center A", "status": "Invoiced", "payment_mode": "Cash",
+        "services": [{"service_name": f"Service {i}", "provider": "Dr. Rao", "price": 1000 + i, "quantity": 1,
+                      "discount": 0, "tax_amount": 0, "amount": 1000 + i} for i in range(services)],
+        "subtotal": 0, "discount": 0, "tax": 0, "total_amount": 0,
+    }
+
+
+def discharge_payload():
+    return {
+        "patient_data": {"memberidkey": "MID-2025-01-01-1000001", "patientname": "Patient One", "gender": "Female",
+                         "age": "72", "mobilenumber": "9000000001", "city": "Adyar"},
+        "billing_data": {"room_type": "Single", "room_rent": 3000},
+        "totals": {"grand_total": 45000, "room_total": 30000},
+        "calculated_days": 10,
+    }
+
+
+async def ticker_stall(work) -> float:
+    """Longest gap between 10 ms event-loop ticks while `work` runs."""
+    worst = [0.0]
+    running = [True]
+
+    async def tick():
+        last = time.perf_counter()
+        while running[0]:
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            worst[0] = max(worst[0], now - last - 0.01)
+            last = now
+
+    ticking = asyncio.ensure_future(tick())
+    await asyncio.sleep(0.05)
+    await work()
+    running[0] = False
+    await ticking
+    return worst[0]
+
+
+# Stands in for the PyInstaller build of main.py (crm_backend.spec): workers are started by
+# running the executable again, i.e. main.py as __main__ with --multiprocessing-fork
+FROZEN_LAUNCHER = """
+import multiprocessing, multiprocessing.spawn, os, runpy, sys
+from multiprocessing.util import _args_from_interpreter_flags
+sys.frozen = True
+spawn_freeze_support = multiprocessing.spawn.freeze_support
+
+# What PyInstaller's multiprocessing runtime hook installs: helper processes (the resource
+# tracker) and pool workers are both started by running the executable again
+def freeze_support():
+    if (len(sys.argv) >= 2 and sys.argv[-2] == "-c"
+            and sys.argv[-1].startswith("from multiprocessing.resource_tracker import main")
+            and set(sys.argv[1:-2]) == set(_args_from_interpreter_flags())):
+        exec(sys.argv[-1])
+        sys.exit()
+    if multiprocessing.spawn.is_forking(sys.argv):
+        spawn_freeze_support()
+        sys.exit()
+
+multiprocessing.freeze_support = multiprocessing.spawn.freeze_support = freeze_support
+import uvicorn
+
+def serve(*args, **kwargs):
+    if len(sys.argv) > 1:
+        print("a helper or worker process started the server", file=sys.stderr)
+        sys.exit(3)
+    import process_pool
+    process_pool.register_task("check_compress", "zlib:compress", timeout=20)
+    print(len(process_pool.as_bytes(process_pool.run_sync("check_compress", b"frozen" * 1000))))
+    process_pool.shutdown()
+
+uvicorn.run = serve
+sys.executable = os.environ["CRM_CHECK_FROZEN_EXE"]
+multiprocessing.set_executable(sys.executable)
+sys.argv[0] = os.path.join({backend!r}, "main.py")
+sys.path.insert(0, {backend!r})
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def run_frozen_entry_point() -> subprocess.CompletedProcess:
+    """Start main.py the way the frozen executable does and run one pool task from it."""
+    backend = os.path.dirname(os.path.abspath(__file__))
+    launcher = os.path.join(workdir, "frozen_launcher.py")
+    with open(launcher, "w", encoding="utf-8") as f:
+        f.write(FROZEN_LAUNCHER.format(backend=backend))
+    executable = os.path.join(workdir, "crm_backend")
+    with open(executable, "w", encoding="utf-8") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{launcher}" "$@"\n')
+    os.chmod(executable, 0o755)
+    env = dict(os.environ, CRM_CHECK_FROZEN_EXE=executable, PROCESS_POOL_WORKERS="1")
+    return subprocess.run([executable], cwd=backend, env=env, capture_output=True, text=True, timeout=180)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    import delete_routes
+    import discharge_routes
+    import file_manager
+    from pdf_generator import generate_invoice_pdf
+
+    # The route modules register their task types on import
+    for module in ("invoice_routes", "upload_routes"):
+        importlib.import_module(module)
+
+    process_pool.register_task("check_compress", "zlib:compress")
+    process_pool.register_task("check_sleep", "time:sleep", timeout=0.5, max_queue=2)
+    process_pool.register_task("check_large", "os:urandom", max_result_bytes=4096)
+
+    started = time.perf_counter()
+    process_pool.start()
+    assert process_pool.run_sync("check_compress", b"warm") is not None
+    print(f"   pool started in {time.perf_counter() - started:.2f}s")
+
+    print(f"1) delete filter dates ({args.rows} cells) match parse_delete_dates")
+    values = delete_values(args.rows)
+    started = time.perf_counter()
+    parsed = process_pool.run_sync("delete_dates", values)
+    pooled = time.perf_counter() - started
+    assert parsed.equals(delete_routes.parse_delete_dates(pd.Series(values)))
+    print(f"   OK: {parsed.notna().sum()} dates parsed in {pooled * 1000:.0f} ms")
+
+    print(f"2) Excel inspect and read ({args.rows} rows) match pandas in-process")
+    path = os.path.join(workdir, "leads.xlsx")
+    write_workbook(path, args.rows)
+    inspected = asyncio.run(process_pool.run("upload_inspect", path, []))
+    assert inspected == file_manager.process_data_file(path, []), inspected
+    table = asyncio.run(process_pool.run("upload_read", path))
+    assert table == file_manager.read_data_file(path)
+    assert len(table["rows"]) == args.rows and table["columns"][0] == "Patient Name"
+    print(f"   OK: {inspected.get('row_count', len(table['rows']))} rows, {len(table['columns'])} columns")
+
+    print("3) byte results through shared memory match the in-process bytes")
+    data = random.Random(9).randbytes(2 * 1024 * 1024)
+    result = process_pool.run_sync("check_compress", data)
+    if process_pool.USE_SHARED_MEMORY:
+        assert isinstance(result, process_pool.SharedBytes), type(result)
+        name = result.name
+        assert bytes(result.view[:16]) == zlib.compress(data)[:16]
+    assert process_pool.as_bytes(result) == zlib.compress(data)
+    if process_pool.USE_SHARED_MEMORY:
+        assert not os.path.exists(f"/dev/shm/{name}"), "segment not released"
+    small = process_pool.run_sync("check_compress", b"x" * 100)
+    assert isinstance(small, bytes)
+    print(f"   OK: {len(result)} bytes via {'shared memory' if process_pool.USE_SHARED_MEMORY else 'the result pipe'}")
+
+    print(f"4) PDFs ({args.services}-line invoice, discharge summary) and event-loop stalls")
+    document = invoice(args.services)
+    pdf = process_pool.as_bytes(asyncio.run(process_pool.run("invoice_pdf", document)))
+    assert pdf.startswith(b"%PDF") and abs(len(pdf) - len(generate_invoice_pdf(document))) < 1024
+    summary = process_pool.as_bytes(asyncio.run(process_pool.run("discharge_summary", discharge_payload())))
+    assert summary.startswith(b"%PDF") and abs(len(summary) - len(discharge_routes.render_discharge_summary(discharge_payload()))) < 1024
+
+    async def pooled_render():
+        process_pool.as_bytes(await process_pool.run("invoice_pdf", document))
+
+    async def inline_render():
+        generate_invoice_pdf(document)
+
+    pooled_stall = asyncio.run(ticker_stall(pooled_render))
+    inline_stall = asyncio.run(ticker_stall(inline_render))
+    print(f"   worst tick delay: {pooled_stall * 1000:.1f} ms in the pool, {inline_stall * 1000:.0f} ms inline")
+    assert pooled_stall * 5 < inline_stall, (pooled_stall, inline_stall)
+    print(f"   OK: invoice {len(pdf) / 1e3:.0f} KB, discharge summary {len(summary) / 1e3:.0f} KB")
+
+    print("5) queue limit, timeout and result size limit")
+    first, second = process_pool.submit("check_sleep", 0.3), process_pool.submit("check_sleep", 0.3)
+    try:
+        process_pool.submit("check_sleep", 0.3)
+        raise AssertionError("third task accepted")
+    except process_pool.ProcessPoolBusy:
+        pass
+    first.result(5), second.result(5)
+    started = time.perf_counter()
+    try:
+        process_pool.run_sync("check_sleep", 30)
+        raise AssertionError("no timeout")
+    except process_pool.TaskTimeout:
+        elapsed = time.perf_counter() - started
+    assert elapsed < 3, elapsed
+    try:
+        process_pool.run_sync("check_large", 8192)
+        raise AssertionError("large result accepted")
+    except process_pool.ResultTooLarge:
+        pass
+    assert len(process_pool.run_sync("check_large", 1024)) == 1024
+    assert process_pool.http_error(process_pool.ProcessPoolBusy("busy")).status_code == 503
+    print(f"   OK: busy refused, 30s sleep stopped after {elapsed:.2f}s, 8 KB result refused")
+
+    print("6) routes: discharge summary download, its error path and pool status")
+    from fastapi.testclient import TestClient  # noqa: E402
+
+    fake_sheets.install(fake_sheets.FakeSheetsBackend())
+    import main  # noqa: E402
+
+    http = TestClient(main.app)
+    response = http.post("/generate-discharge-summary", json=discharge_payload())
+    assert response.status_code == 200, response.text
+    assert response.content.startswith(b"%PDF") and int(response.headers["content-length"]) == len(response.content)
+    response = http.post("/generate-discharge-summary", json={"patient_data": {}})
+    assert response.status_code == 500 and "Missing patient" in response.text, response.text
+    status = http.get("/process-pool/status").json()
+    for name in ("delete_dates", "upload_read", "invoice_pdf", "discharge_summary"):
+        task = status["tasks"][name]
+        print(f"   {name:<18} completed {task['completed']:>2}, failed {task['failed']}, "
+              f"mean wait {task['mean_wait_ms']:6.1f} ms, mean run {task['mean_run_ms']:7.1f} ms")
+    assert status["tasks"]["check_sleep"]["timeouts"] == 1 and status["tasks"]["check_sleep"]["rejected"] == 1
+    process_pool.shutdown()
+    print("   OK")
+
+    print("7) frozen entry point: pool workers run the task, not another server")
+    if os.name == "posix":
+        frozen = run_frozen_entry_point()
+        assert frozen.returncode == 0 and frozen.stdout.strip().splitlines()[-1].isdigit(), frozen.stderr[-2000:]
+        assert "started the server" not in frozen.stderr, frozen.stderr[-2000:]
+        print("   OK")
+    else:
+        print("   skipped (the stand-in executable is a POSIX shell script)")
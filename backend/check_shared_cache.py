@@ -0,0 +1,116 @@
+"""
+Exercise the cross-worker shared cache with several processes, the way `uvicorn --workers N` runs the app.
+Checks single-flight (one loader run for N concurrent misses), invalidation broadcast, watch callbacks
+and that a caller on the event loop never waits for another thread's fill.
+
+Usage: python check_shared_cache.py [--workers 4] [--load-seconds 0.5]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import threading
+import os
+import time
+
+import fake_sheets
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--workers", type=int, default=4)
+parser.add_argument("--load-seconds", type=float, default=0.5, help="Simulated Sheets fetch time")
+args = parser.parse_args()
+
+# Spawned workers re-import this file; they inherit the parent's work directory through the environment
+workdir = fake_sheets.check_environment("crm-shared-cache-", SHARED_CACHE_WATCH_SECONDS="0.1")
+LOADS_FILE = os.path.join(workdir, "loads.txt")
+
+import shared_cache  # noqa: E402
+
+
+def slow_loader():
+    with open(LOADS_FILE, "a", encoding="utf-8") as f:
+        f.write(f"{os.getpid()}\n")
+    time.sleep(args.load_seconds)
+    return {"rows": list(range(1000)), "loaded_by": os.getpid()}
+
+
+def worker(start, results):
+    start.wait()
+    started = time.perf_counter()
+    value = shared_cache.get_or_load("patients", "sheet1", slow_loader, ttl_seconds=60)
+    results.put((os.getpid(), value["loaded_by"], round(time.perf_counter() - started, 3)))
+
+
+def watcher(ready, fired):
+    shared_cache.watch("schema", lambda generation: fired.put(generation))
+    ready.set()
+    time.sleep(3)
+
+
+def loads():
+    if not os.path.exists(LOADS_FILE):
+        return 0
+    with open(LOADS_FILE, "r", encoding="utf-8") as f:
+        return len(f.read().split())
+
+
+if __name__ == "__main__":
+    ctx = multiprocessing.get_context("spawn")
+
+    print(f"1) {args.workers} workers miss the same key at once")
+    start, results = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(start, results)) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    time.sleep(1.0)  # Let every process import and reach the barrier
+    start.set()
+    for p in procs:
+        p.join()
+    seen = [results.get() for _ in procs]
+    for pid, loaded_by, seconds in seen:
+        print(f"   worker {pid}: value from {loaded_by} in {seconds}s")
+    assert loads() == 1, f"expected one Sheets fetch, got {loads()}"
+    assert len({loaded_by for _, loaded_by, _ in seen}) == 1
+    print("   OK: one fetch, every worker served the same value")
+
+    print("2) invalidation is visible to other processes")
+    assert shared_cache.get("patients", "sheet1") is not None
+    generation = shared_cache.invalidate("patients")
+    assert shared_cache.get("patients", "sheet1") is None
+    value = shared_cache.get_or_load("patients", "sheet1", slow_loader, ttl_seconds=60)
+    assert loads() == 2 and value["loaded_by"] == os.getpid()
+    print(f"   OK: generation {generation}, refetched once")
+
+    print("3) stale fill after an invalidation is discarded")
+    loaded_under = shared_cache.generation("patients")
+    shared_cache.invalidate("patients")
+    shared_cache.set("patients", "sheet1", {"stale": True}, 60, generation=loaded_under)
+    assert shared_cache.get("patients", "sheet1") is None
+    print("   OK")
+
+    print("4) watch callback fires in another process")
+    ready, fired = ctx.Event(), ctx.Queue()
+    proc = ctx.Process(target=watcher, args=(ready, fired))
+    proc.start()
+    ready.wait(10)
+    new_generation = shared_cache.invalidate("schema")
+    assert fired.get(timeout=5) == new_generation
+    proc.join()
+    print(f"   OK: watcher saw generation {new_generation}")
+
+    print("5) on the event loop a fill in progress elsewhere is not waited for")
+    filling = threading.Thread(target=shared_cache.get_or_load, args=("patients", "loop", slow_loader, 60))
+    filling.start()
+    time.sleep(0.1)  # The thread holds the fill for args.load_seconds
+
+    async def on_loop():
+        started = time.perf_counter()
+        value = shared_cache.get_or_load("patients", "loop", lambda: {"loaded_by": "loop"}, ttl_seconds=60)
+        return value, time.perf_counter() - started
+
+    value, elapsed = asyncio.run(on_loop())
+    filling.join()
+    assert value == {"loaded_by": "loop"} and elapsed < args.load_seconds / 2, (value, elapsed)
+    print(f"   OK: loaded locally in {elapsed * 1000:.1f} ms instead of waiting {args.load_seconds}s")
+
+    print("\nStatus:", shared_cache.status())
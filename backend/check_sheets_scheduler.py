@@ -0,0 +1,160 @@
+"""
+Exercise the Sheets request scheduler against a local fake Sheets server.
+The fake server answers spreadsheet metadata / values reads and injects 429s,
+so lanes, token buckets and backoff can be checked without touching Google.
+Finally checks that a call made on the event loop fails fast instead of waiting for quota.
+
+Usage: python check_sheets_scheduler.py [--rpm 600] [--fail-every 25]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rpm", type=int, default=600, help="Requests per minute per bucket")
+parser.add_argument("--fail-every", type=int, default=25, help="Answer every Nth request with 429")
+parser.add_argument("--batch-workers", type=int, default=4)
+parser.add_argument("--batch-requests", type=int, default=10)
+parser.add_argument("--interactive-requests", type=int, default=10)
+args = parser.parse_args()
+
+# Configure before import; the scheduler reads its limits at import time
+os.environ["SHEETS_USER_REQUESTS_PER_MINUTE"] = str(args.rpm)
+os.environ["SHEETS_SPREADSHEET_REQUESTS_PER_MINUTE"] = str(args.rpm)
+os.environ["SHEETS_BACKOFF_BASE_SECONDS"] = "0.2"
+os.environ["SHEETS_BACKOFF_MAX_SECONDS"] = "2"
+
+import sheets_scheduler  # noqa: E402
+from sheets_scheduler import ScheduledClient  # noqa: E402
+
+SHEET_ID = "fake-sheet-id"
+ROWS = [["Member ID", "Name"]] + [[f"M{i:04d}", f"Patient {i}"] for i in range(50)]
+
+request_count = 0
+count_lock = threading.Lock()
+
+
+class FakeSheetsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *a):
+        pass
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        global request_count
+        with count_lock:
+            request_count += 1
+            n = request_count
+        if args.fail_every and n % args.fail_every == 0:
+            return self._send(429, {"error": {"code": 429, "message": "Quota exceeded (injected)", "status": "RESOURCE_EXHAUSTED"}})
+
+        path = self.path.split("?")[0]
+        if re.fullmatch(r"/v4/spreadsheets/[^/]+", path):
+            return self._send(200, {
+                "spreadsheetId": SHEET_ID,
+                "properties": {"title": "Fake CRM"},
+                "sheets": [{"properties": {"sheetId": 0, "title": "Sheet1", "index": 0,
+                                           "gridProperties": {"rowCount": len(ROWS), "columnCount": 2}}}],
+            })
+        if "/values/" in path:
+            return self._send(200, {"range": "Sheet1!A1:B51", "majorDimension": "ROWS", "values": ROWS})
+        return self._send(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+
+class LocalSession(requests.Session):
+    """Sends gspread's googleapis.com URLs to the fake server instead."""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, method, url, *a, **kw):
+        url = re.sub(r"^https://sheets\.googleapis\.com", self.base_url, url)
+        return super().request(method, url, *a, **kw)
+
+
+def run_reads(lane, count, latencies, errors):
+    client = ScheduledClient(None, session=LocalSession(base_url))
+    with sheets_scheduler.lane(lane):
+        for _ in range(count):
+            started = time.time()
+            try:
+                client.open_by_key(SHEET_ID).sheet1.get_all_values()
+                latencies.append(time.time() - started)
+            except Exception as e:
+                errors.append(str(e))
+
+
+def summarize(name, latencies, errors):
+    if not latencies:
+        print(f"  {name:<12} no successful requests, {len(errors)} errors")
+        return
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) > 1 else ordered[0]
+    print(f"  {name:<12} n={len(latencies):<4} p50={statistics.median(ordered):.3f}s "
+          f"p95={p95:.3f}s max={ordered[-1]:.3f}s errors={len(errors)}")
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSheetsHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Fake Sheets server on {base_url}, 429 every {args.fail_every} requests, {args.rpm} req/min buckets")
+
+    results = {"batch": ([], []), "interactive": ([], [])}
+    threads = [
+        threading.Thread(target=run_reads, args=("batch", args.batch_requests, *results["batch"]))
+        for _ in range(args.batch_workers)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)  # Let the batch lane saturate the buckets first
+    interactive = threading.Thread(target=run_reads, args=("interactive", args.interactive_requests, *results["interactive"]))
+    interactive.start()
+    for t in threads + [interactive]:
+        t.join()
+    server.shutdown()
+
+    print("\nLatency per open+read (2 Sheets calls each):")
+    for name, (latencies, errors) in results.items():
+        summarize(name, latencies, errors)
+
+    m = sheets_scheduler.metrics()
+    print(f"\nServer saw {request_count} requests; error statuses: {m['error_statuses']}")
+    for name, stats in m["lanes"].items():
+        print(f"  {name:<12} requests={stats['requests']} retries={stats['retries']} failed={stats['failed']} "
+              f"max_queued={stats['max_queued']} avg_wait={stats['avg_wait_seconds']}s")
+
+    print("\nEvent loop: a sync Sheets call inside an async route must not wait for quota")
+    keys = sheets_scheduler.bucket_keys("loop-check", f"/spreadsheets/{SHEET_ID}", "get")
+    sheets_scheduler.penalize(keys)  # As after a 429: no token for ~60/rpm seconds
+
+    async def call_on_loop():
+        started = time.monotonic()
+        try:
+            sheets_scheduler.acquire(keys, "interactive")
+            raise AssertionError("took a token from a drained bucket")
+        except sheets_scheduler.SheetsQuotaExceeded as e:
+            return time.monotonic() - started, e.retry_after
+
+    elapsed, retry_after = asyncio.run(call_on_loop())
+    assert elapsed < 0.1 and retry_after > 0, (elapsed, retry_after)
+    waited = sheets_scheduler.acquire(keys, "interactive")  # Off the loop the same call waits for a token
+    assert waited > 0.01, waited
+    print(f"  on loop: SheetsQuotaExceeded after {elapsed * 1000:.1f} ms (retry after {retry_after:.2f}s); "
+          f"off loop: waited {waited:.2f}s")
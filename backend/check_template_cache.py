@@ -0,0 +1,73 @@
+"""
+Exercise the upload template cache without Google Sheets.
+Checks that artifacts are built once per header row + dropdown version, reused by other
+workers from disk, rebuilt in the background on a dropdown change, and that the XLSX
+carries list validations for dropdown columns.
+
+Usage: python check_template_cache.py
+"""
+
+import io
+import os
+import time
+
+import fake_sheets
+
+fake_sheets.check_environment("crm-template-cache-")
+
+import openpyxl  # noqa: E402
+
+import template_cache  # noqa: E402
+
+HEADERS = ["Date", "Member ID key", "Patient Name", "Gender", "Service", "Room Type"]
+dropdowns = {"version": 7, "options": {"gender": ["Male", "Female"], "Room Type": [f"Room {i}" for i in range(80)]}}
+
+
+def current_dropdowns():
+    return dropdowns["version"], dict(dropdowns["options"])
+
+
+def wait_for(template, key, seconds=10):
+    deadline = time.time() + seconds
+    while template.stats()["key"] != key and time.time() < deadline:
+        time.sleep(0.05)
+    return template.stats()["key"] == key
+
+
+if __name__ == "__main__":
+    template = template_cache.TemplateCache("contact_template", lambda: HEADERS, current_dropdowns)
+
+    print("1) the first download builds both artifacts; later downloads are served from memory")
+    csv_body, key = template.get("csv")
+    xlsx_body, same_key = template.get("xlsx")
+    assert key == same_key and template_cache._stats["builds"] == 1, template_cache._stats
+    assert csv_body.decode("utf-8").strip() == ",".join(HEADERS)
+    print(f"   OK: key {key}, csv {len(csv_body)} bytes, xlsx {len(xlsx_body)} bytes")
+
+    print("2) dropdown columns get list validations backed by a hidden sheet")
+    wb = openpyxl.load_workbook(io.BytesIO(xlsx_body))
+    assert wb.sheetnames == ["Template", "Lists"] and wb["Lists"].sheet_state == "hidden"
+    validations = {str(dv.sqref): dv.formula1 for dv in wb["Template"].data_validations.dataValidation}
+    assert validations == {"D2:D1001": "=Lists!$A$2:$A$3", "F2:F1001": "=Lists!$B$2:$B$81"}, validations
+    print(f"   OK: {validations}")
+
+    print("3) another worker reuses the artifacts from disk instead of building them")
+    other = template_cache.TemplateCache("contact_template", lambda: HEADERS, current_dropdowns)
+    body, other_key = other.get("xlsx")
+    assert other_key == key and body == xlsx_body and template_cache._stats["builds"] == 1
+    print("   OK")
+
+    print("4) a dropdown change serves the previous template while the new one builds in the background")
+    dropdowns["version"] = 8
+    dropdowns["options"]["Service"] = ["Physiotherapy", "Nursing"]
+    body, served_key = template.get("xlsx")
+    assert served_key == key and body == xlsx_body, "stale artifact served without waiting"
+    new_key = template.key()
+    assert wait_for(template, new_key), template.stats()
+    body, served_key = template.get("xlsx")
+    assert served_key == new_key and len(openpyxl.load_workbook(io.BytesIO(body))["Template"].data_validations.dataValidation) == 3
+    files = sorted(os.listdir(os.environ["TEMPLATE_CACHE_DIR"]))
+    assert files == [f"contact_template-{new_key}.csv", f"contact_template-{new_key}.xlsx"], files
+    print(f"   OK: {key} -> {new_key}")
+
+    print("\nStatus:", template_cache.status(), template.stats())
@@ -0,0 +1,394 @@
+"""
+Client Repository Module
+Keeps a client worksheet (CRM_HomeCare, SNF) in memory with a normalized-name index, stable client IDs, tracked row numbers and dirty-column row writes
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import gspread
+
+import change_feed
+import compact_table
+import instrumentation
+import live_updates
+
+# Reload the worksheet at most this often. Writes made through the repository keep it
+# current in between; direct sheet edits reach every worker through the change feed
+# (the worksheet's live-update topic moves), so this is only a backstop
+CLIENT_REPOSITORY_TTL_SECONDS = int(os.getenv("CLIENT_REPOSITORY_TTL_SECONDS", "300"))
+
+_WHITESPACE = re.compile(r"\s+")
+_UPDATED_ROW = re.compile(r"![A-Z]+(\d+)")
+
+
+def normalize_name(name: Any) -> str:
+    """Case- and whitespace-insensitive form of a patient name, used as the index key."""
+    return _WHITESPACE.sub(" ", str(name or "")).strip().casefold()
+
+
+class ClientRepository:
+    def __init__(self, name: str, open_worksheet: Callable[[], gspread.Worksheet], topic: str,
+                 name_headers: Sequence[str], id_prefix: str):
+        """
+        In-memory view of one client worksheet.
+
+        Args:
+            name: Label for logs and status
+            open_worksheet: Opens the worksheet (called on load only)
+            topic: live_updates topic the worksheet's changes are published on
+            name_headers: Patient name column(s), first one present wins
+            id_prefix: Prefix of the client IDs, e.g. "HC"
+        """
+        self.name = name
+        self.topic = topic
+        self.name_headers = tuple(name_headers)
+        self.id_prefix = id_prefix
+        self.headers: List[str] = []
+        self.built_at: Optional[float] = None
+        self._open = open_worksheet
+        self._worksheet: Optional[gspread.Worksheet] = None
+        self._columns: Dict[str, int] = {}
+        self._name_col: Optional[int] = None
+        self._rows: List[List[str]] = []  # _rows[i] is sheet row i + 2
+        self._ids: List[Optional[str]] = []  # Parallel to _rows; None for rows without a name
+        self._positions: Dict[str, int] = {}
+        self._by_name: Dict[str, List[str]] = {}
+        self._seen_seq = 0
+        self._lock = threading.RLock()
+        self._stats = {"loads": 0, "hits": 0, "writes": 0, "cells_written": 0, "relocated": 0}
+
+    # --- Loading ---
+
+    def _is_stale(self) -> bool:
+        if self.built_at is None:
+            return True
+        if time.monotonic() - self.built_at > change_feed.cache_ttl(CLIENT_REPOSITORY_TTL_SECONDS):
+            return True
+        return live_updates.topic_seq(self.topic) != self._seen_seq
+
+    def _ensure_fresh(self) -> None:
+        with self._lock:
+            stale = self._is_stale()
+            instrumentation.record_cache(f"client_repository_{self.name}", not stale)
+            if stale:
+                self.reload()
+            else:
+                self._stats["hits"] += 1
+
+    def reload(self) -> None:
+        """Read the whole worksheet once and rebuild every index."""
+        with self._lock:
+            seq = live_updates.topic_seq(self.topic)  # Read first: a change during the load triggers another one
+            worksheet = self._open()
+            self.load(worksheet.get_all_values())
+            self._worksheet = worksheet
+            self._seen_seq = seq
+            self._stats["loads"] += 1
+            print(f"[Client Repository] Loaded '{self.name}': {len(self._positions)} clients in {len(self._rows)} rows")
+
+    def load(self, values: List[List[Any]]) -> None:
+        """
+        Rebuild the indexes from a full `get_all_values()` result (header row first).
+
+        Args:
+            values: Sheet values including the header row
+        """
+        headers = [str(h) for h in values[0]] if values else []
+        columns: Dict[str, int] = {}
+        for idx, header in enumerate(headers):
+            if header.strip():
+                columns.setdefault(header.strip(), idx)
+        with self._lock:
+            self.headers = headers
+            self._columns = columns
+            self._name_col = next((columns[h] for h in self.name_headers if h in columns), None)
+            # Equal cells of a column (status, care center, gender...) share one string
+            self._rows = compact_table.share_values([[str(v) for v in row] for row in values[1:]])
+            self._reindex()
+            self.built_at = time.monotonic()
+
+    def _sheet(self) -> gspread.Worksheet:
+        if self._worksheet is None:
+            self._worksheet = self._open()
+        return self._worksheet
+
+    def invalidate(self) -> None:
+        """Force a reload on next access."""
+        with self._lock:
+            self.built_at = None
+
+    def _reindex(self) -> None:
+        # Client IDs hash the normalized name, so they survive reloads, inserts and deletes;
+        # repeated names are told apart by their order in the sheet
+        ids: List[Optional[str]] = []
+        by_name: Dict[str, List[str]] = {}
+        for row in self._rows:
+            key = normalize_name(self._cell(row, self._name_col)) if any(row) else ""
+            if not key:
+                ids.append(None)
+                continue
+            same_name = by_name.setdefault(key, [])
+            client_id = f"{self.id_prefix}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]}"
+            if same_name:
+                client_id = f"{client_id}-{len(same_name) + 1}"
+            same_name.append(client_id)
+            ids.append(client_id)
+        self._ids = ids
+        self._by_name = by_name
+        self._positions = {client_id: pos for pos, client_id in enumerate(ids) if client_id}
+
+    @staticmethod
+    def _cell(row: List[str], col: Optional[int]) -> str:
+        return row[col] if col is not None and col < len(row) else ""
+
+    def _record(self, pos: int) -> Dict[str, Any]:
+        row = self._rows[pos]
+        record: Dict[str, Any] = {header: self._cell(row, idx) for header, idx in self._columns.items()}
+        record["_row_number"] = pos + 2
+        record["_client_id"] = self._ids[pos]
+        return record
+
+    # --- Reads ---
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Every client (rows with a patient name) in sheet order."""
+        self._ensure_fresh()
+        with self._lock:
+            return [self._record(pos) for pos, client_id in enumerate(self._ids) if client_id]
+
+    def get(self, client_id: str) -> Optional[Dict[str, Any]]:
+        """Client by its stable ID."""
+        self._ensure_fresh()
+        with self._lock:
+            pos = self._positions.get(client_id)
+            return self._record(pos) if pos is not None else None
+
+    def find_by_name(self, patient_name: str) -> Optional[Dict[str, Any]]:
+        """First client (in sheet order) whose normalized name matches."""
+        self._ensure_fresh()
+        with self._lock:
+            ids = self._by_name.get(normalize_name(patient_name))
+            return self._record(self._positions[ids[0]]) if ids else None
+
+    def find(self, key: str) -> Optional[Dict[str, Any]]:
+        """Client by ID or, failing that, by name."""
+        return self.get(key) or self.find_by_name(key)
+
+    @property
+    def row_count(self) -> int:
+        """Number of data rows below the header, blank ones included."""
+        self._ensure_fresh()
+        return len(self._rows)
+
+    # --- Writes ---
+
+    def append(self, row_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Append a client row, mapping `row_data` keys onto the header row.
+
+        Returns:
+            The new record, or None when the row landed where the cache cannot place it
+            (the repository then reloads on next access)
+        """
+        self._ensure_fresh()
+        with self._lock:
+            row_values = [str(row_data.get(header, "")) for header in self.headers]
+            response = self._sheet().append_row(row_values)
+            self._stats["writes"] += 1
+            match = _UPDATED_ROW.search(str((response or {}).get("updates", {}).get("updatedRange", "")))
+            row_number = int(match.group(1)) if match else None
+            if row_number is None or not 2 <= row_number <= len(self._rows) + 2:
+                self.invalidate()
+                return None
+            if row_number == len(self._rows) + 2:
+                self._rows.append(row_values)
+                self._reindex()
+            else:
+                # Sheets filled a blank row inside the table
+                self._rows[row_number - 2] = row_values
+                self._reindex()
+            return self._record(row_number - 2)
+
+    def update(self, client_id: str, changes: Dict[str, Any], add_missing: bool = False) -> Dict[str, Any]:
+        """
+        Write the changed cells of one client row in a single batch update.
+
+        Only columns whose value differs from the cached row are sent, grouped into
+        contiguous ranges of that row. The row's name cell is re-read first so a row
+        shifted by an edit the change feed has not reported yet is found again.
+
+        Args:
+            client_id: Stable client ID
+            changes: Header -> new value; headers not in the sheet are skipped
+            add_missing: Append missing headers as new columns instead of skipping them
+
+        Returns:
+            The updated record
+
+        Raises:
+            KeyError: When the client no longer exists
+        """
+        self._ensure_fresh()
+        with self._lock:
+            pos = self._locate(client_id)
+            row = self._rows[pos]
+            row_number = pos + 2
+
+            header_cells: List[Tuple[int, str]] = []
+            dirty: Dict[int, str] = {}
+            for header, value in changes.items():
+                col = self._columns.get(header.strip())
+                if col is None:
+                    if not add_missing:
+                        continue
+                    col = len(self.headers) + len(header_cells)
+                    header_cells.append((col, header))
+                value = str(value)
+                if self._cell(row, col) != value:
+                    dirty[col] = value
+
+            if dirty or header_cells:
+                data = [{"range": gspread.utils.rowcol_to_a1(1, col + 1), "values": [[header]]} for col, header in header_cells]
+                data += [{"range": cells, "values": [values]} for cells, values in _row_ranges(row_number, dirty)]
+                self._sheet().batch_update(data, value_input_option="USER_ENTERED")
+                self._stats["writes"] += 1
+                self._stats["cells_written"] += len(dirty)
+
+                for col, header in header_cells:
+                    self.headers.append(header)
+                    self._columns.setdefault(header.strip(), col)
+                for col, value in dirty.items():
+                    if col >= len(row):
+                        row.extend([""] * (col + 1 - len(row)))
+                    row[col] = value
+                if self._name_col in dirty:
+                    self._reindex()
+            return self._record(pos)
+
+    def _locate(self, client_id: str) -> int:
+        pos = self._positions.get(client_id)
+        if pos is None:
+            raise KeyError(client_id)
+        if self._name_col is None:
+            return pos
+        expected = normalize_name(self._cell(self._rows[pos], self._name_col))
+        current = self._sheet().cell(pos + 2, self._name_col + 1).value
+        if normalize_name(current) == expected:
+            return pos
+        # Rows moved under us (inserted or deleted in the sheet): reload and look again
+        self._stats["relocated"] += 1
+        self.reload()
+        pos = self._positions.get(client_id)
+        if pos is None:
+            raise KeyError(client_id)
+        return pos
+
+    def record_inserted(self, row_number: int, values: List[Any]) -> None:
+        """Shift tracked rows after a row was inserted at `row_number` outside the repository."""
+        with self._lock:
+            if self.built_at is None:
+                return
+            if not 2 <= row_number <= len(self._rows) + 2:
+                self.invalidate()
+                return
+            self._rows.insert(row_number - 2, [str(v) for v in values])
+            self._reindex()
+
+    def record_deleted(self, row_numbers: Iterable[int]) -> None:
+        """Shift tracked rows after rows were deleted outside the repository."""
+        with self._lock:
+            if self.built_at is None:
+                return
+            for row_number in sorted(set(row_numbers), reverse=True):
+                if 2 <= row_number <= len(self._rows) + 1:
+                    del self._rows[row_number - 2]
+            self._reindex()
+
+    def publish(self, event_type: str, key: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """
+        Publish a change to this worksheet's live-update topic.
+
+        The repository already holds the change, so its own event does not force a
+        reload here; any other event published on the topic in between still does.
+        """
+        seq = live_updates.publish(self.topic, event_type, key, data)
+        with self._lock:
+            if seq and self.built_at is not None and live_updates.topic_seq(self.topic, below=seq) == self._seen_seq:
+                self._seen_seq = seq
+        return seq
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": self.built_at is not None,
+                "age_seconds": round(time.monotonic() - self.built_at, 1) if self.built_at is not None else None,
+                "rows": len(self._rows),
+                "clients": len(self._positions),
+                "topic_seq": self._seen_seq,
+                **self._stats,
+            }
+
+
+def _row_ranges(row_number: int, dirty: Dict[int, str]) -> List[Tuple[str, List[str]]]:
+    """Group dirty columns of one row into contiguous A1 ranges."""
+    ranges: List[Tuple[str, List[str]]] = []
+    run: List[int] = []
+    for col in sorted(dirty):
+        if run and col != run[-1] + 1:
+            ranges.append(_range_for(row_number, run, dirty))
+            run = []
+        run.append(col)
+    if run:
+        ranges.append(_range_for(row_number, run, dirty))
+    return ranges
+
+
+def _range_for(row_number: int, run: List[int], dirty: Dict[int, str]) -> Tuple[str, List[str]]:
+    start = gspread.utils.rowcol_to_a1(row_number, run[0] + 1)
+    end = gspread.utils.rowcol_to_a1(row_number, run[-1] + 1)
+    return (start if start == end else f"{start}:{end}"), [dirty[col] for col in run]
+
+
+# Global repository registry keyed by name
+_repositories: Dict[str, ClientRepository] = {}
+_registry_lock = threading.Lock()
+
+
+def register(name: str, open_worksheet: Callable[[], gspread.Worksheet], topic: str,
+             name_headers: Sequence[str], id_prefix: str) -> ClientRepository:
+    """Create (or return the existing) repository for a client worksheet."""
+    with _registry_lock:
+        repository = _repositories.get(name)
+        if repository is None:
+            repository = ClientRepository(name, open_worksheet, topic, name_headers, id_prefix)
+            _repositories[name] = repository
+        return repository
+
+
+def status() -> Dict[str, Any]:
+    """Per-repository row counts, load/hit counters and write counters for this worker."""
+    with _registry_lock:
+        repositories = list(_repositories.values())
+    return {repository.name: repository.stats() for repository in repositories}
+
+
+def _prometheus_lines() -> List[str]:
+    stats = status()
+    return (
+        instrumentation.gauge_lines(
+            "crm_client_repository_clients", "Clients held in memory by this worker",
+            [({"repository": name}, s["clients"]) for name, s in stats.items()],
+        )
+        + instrumentation.gauge_lines(
+            "crm_client_repository_loads", "Full worksheet loads by this worker",
+            [({"repository": name}, s["loads"]) for name, s in stats.items()],
+        )
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -0,0 +1,228 @@
+"""
+Compact Table Module
+Column-oriented storage for worksheet rows: one shared header tuple, a value pool per column with small integer codes for the rows, and read-only row views that only become dicts for the rows actually returned
+"""
+
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import gspread
+
+# Array typecodes by pool size: 1, 2 or 4 bytes per cell
+_TYPECODES = (("B", 1 << 8), ("H", 1 << 16), ("I", 1 << 32))
+
+
+def _typecode(distinct: int) -> str:
+    return next(code for code, limit in _TYPECODES if distinct <= limit)
+
+
+class _Column:
+    """One column: distinct values in first-seen order and a code per row ("" is always code 0)."""
+
+    __slots__ = ("pool", "codes", "_lookup")
+
+    def __init__(self, pool: List[Any], codes: array):
+        self.pool = pool
+        self.codes = codes
+        self._lookup: Optional[Dict[str, int]] = None
+
+    def __getstate__(self):
+        return self.pool, self.codes  # The lookup is rebuilt on the first append
+
+    def __setstate__(self, state):
+        self.pool, self.codes = state
+        self._lookup = None
+
+    @classmethod
+    def build(cls, raw: Iterable[str], numericise: bool) -> "_Column":
+        lookup: Dict[str, int] = {"": 0}
+        codes = [lookup.setdefault(value, len(lookup)) for value in raw]
+        # The lookup is dropped: for a column of unique values it would double the memory
+        return cls(_pool(lookup, numericise), array(_typecode(len(lookup)), codes))
+
+    def append(self, value: str, numericise: bool) -> None:
+        if self._lookup is None:
+            # Pool values may be numericised; their text is what the sheet holds
+            self._lookup = {_sheet_text(v): code for code, v in enumerate(self.pool)}
+            self._lookup[""] = 0
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.pool)
+            self.pool.append(_numericise(value) if numericise else value)
+            if _typecode(len(self.pool)) != self.codes.typecode:
+                self.codes = array(_typecode(len(self.pool)), self.codes)
+        self.codes.append(code)
+
+
+def _numericise(value: str) -> Any:
+    """The value get_all_records() would return (ints and floats parsed, blanks kept as "")."""
+    return gspread.utils.numericise(value, empty2zero=False, default_blank="")
+
+
+def _sheet_text(value: Any) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+def _pool(lookup: Dict[str, int], numericise: bool) -> List[Any]:
+    # Dicts keep insertion order, which is the code order
+    return [_numericise(value) for value in lookup] if numericise else list(lookup)
+
+
+class RowView(Mapping):
+    """
+    Read-only header -> value view of one row. Works wherever a get_all_records() dict is
+    read (get, [], in, keys, items); dict(view) materializes it for responses or mutation.
+    """
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: "CompactTable", row: int):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, header: str) -> Any:
+        column = self._table._columns[self._table._positions[header]]
+        return column.pool[column.codes[self._row]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table._keys)
+
+    def __len__(self) -> int:
+        return len(self._table._keys)
+
+    def __contains__(self, header: object) -> bool:
+        return header in self._table._positions
+
+    @property
+    def row_number(self) -> int:
+        """1-based sheet row (the header is row 1)."""
+        return self._row + 2
+
+    def __repr__(self) -> str:
+        return f"RowView({dict(self)!r})"
+
+
+class CompactTable:
+    def __init__(self, headers: Sequence[Any], rows: Iterable[Sequence[Any]], numericise: bool = False):
+        """
+        Column-oriented copy of worksheet rows.
+
+        Args:
+            headers: Header row
+            rows: Data rows (ragged rows are padded with "")
+            numericise: Return numbers the way get_all_records() does (each distinct value
+                        is converted once, not once per cell)
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        width = max([len(headers)] + [len(row) for row in rows])
+        # A column beyond the header row is keyed "", as get_all_records() does
+        self.headers = tuple(str(h) for h in headers) + ("",) * (width - len(headers))
+        self.numericise = numericise
+        self._length = len(rows)
+        self._columns = [
+            _Column.build((str(row[col]) if col < len(row) else "" for row in rows), numericise)
+            for col in range(width)
+        ]
+        self._index()
+
+    @classmethod
+    def from_values(cls, values: List[List[Any]], numericise: bool = False) -> "CompactTable":
+        """Table from a `get_all_values()` result (header row first)."""
+        return cls(values[0] if values else [], values[1:], numericise)
+
+    def _index(self) -> None:
+        # Duplicate headers: the last column wins, like dict(zip(headers, row))
+        self._positions = {header: col for col, header in enumerate(self.headers)}
+        self._keys = tuple(self._positions)
+
+    def __getstate__(self):
+        return self.headers, self.numericise, self._length, self._columns
+
+    def __setstate__(self, state):
+        self.headers, self.numericise, self._length, self._columns = state
+        self._index()
+
+    # --- Row access ---
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[RowView, List[RowView]]:
+        if isinstance(item, slice):
+            return [RowView(self, row) for row in range(*item.indices(self._length))]
+        if item < 0:
+            item += self._length
+        if not 0 <= item < self._length:
+            raise IndexError("row index out of range")
+        return RowView(self, item)
+
+    def __iter__(self) -> Iterator[RowView]:
+        return (RowView(self, row) for row in range(self._length))
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Row `row` (0-based) as a dict."""
+        return dict(self[row])
+
+    def records(self, rows: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """Dicts for the given rows (all rows by default), as get_all_records() returns them."""
+        return [dict(RowView(self, row)) for row in (range(self._length) if rows is None else rows)]
+
+    # --- Column access ---
+
+    def keys(self) -> tuple:
+        """The keys every row view (and record) has, in column order."""
+        return self._keys
+
+    def has_column(self, header: str) -> bool:
+        return header in self._positions
+
+    def column(self, header: str) -> List[Any]:
+        """Every value of one column, for scans that touch one or two columns of each row."""
+        column = self._columns[self._positions[header]]
+        pool = column.pool
+        return [pool[code] for code in column.codes]
+
+    def distinct(self, header: str) -> List[Any]:
+        """Distinct values of one column in first-seen order ("" first)."""
+        return list(self._columns[self._positions[header]].pool)
+
+    # --- Updates ---
+
+    def extend(self, rows: Iterable[Sequence[Any]]) -> None:
+        """Append rows (e.g. the change feed's appended rows); cells beyond the headers are dropped."""
+        for row in rows:
+            for col, column in enumerate(self._columns):
+                column.append(str(row[col]) if col < len(row) else "", self.numericise)
+            self._length += 1
+
+    def extended(self, rows: Iterable[Sequence[Any]]) -> "CompactTable":
+        """A copy with rows appended; the table itself is left alone (other readers may hold it)."""
+        table = CompactTable.__new__(CompactTable)
+        table.__setstate__((self.headers, self.numericise, self._length,
+                            [_Column(list(c.pool), array(c.codes.typecode, c.codes)) for c in self._columns]))
+        table.extend(rows)
+        return table
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the table: code arrays, pools and the pooled values."""
+        total = sys.getsizeof(self.headers)
+        for column in self._columns:
+            total += sys.getsizeof(column.codes) + sys.getsizeof(column.pool)
+            total += sum(sys.getsizeof(value) for value in column.pool)
+        return total
+
+
+def share_values(rows: List[List[str]]) -> List[List[str]]:
+    """
+    Make equal cells of a column share one string object (status, care center, gender,
+    location...), for row stores that must stay mutable lists. Rows are changed in place.
+    """
+    pools: List[Dict[str, str]] = []
+    for row in rows:
+        while len(pools) < len(row):
+            pools.append({})
+        for col, value in enumerate(row):
+            row[col] = pools[col].setdefault(value, value)
+    return rows
@@ -1,12 +1,14 @@
 """
 Create test data for all dashboard cards
-This will add records with TODAY's date so we can verify the dashboard works
+Adds records with TODAY's date to the live sheets (run as a script), and generates
+deterministic synthetic leads, admissions, home care clients and invoices for offline benchmarks
 """
-import gspread
-from google.oauth2.service_account import Credentials
 import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
 from dotenv import load_dotenv
-from datetime import datetime
 
 load_dotenv()
 
@@ -14,7 +16,228 @@ CREDENTIALS_FILE = os.getenv("CREDENTIALS_FILE", "google_credentials.json")
 GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
 PATIENT_ADMISSION_SHEET_ID = os.getenv("PATIENT_ADMISSION_SHEET_ID")
 
+# Header rows of the production sheets the generators fill
+LEAD_HEADERS = [
+    "Date", "Member ID key", "Attender Name", "Patient Name", "Gender", "Age", "Patient Location", "Area",
+    "Email Id", "Mobile Number", "Pain Point", "Enquiry made for", "Service", "Hospital Location", "Source",
+    "Crm Agent Name", "Currently Assigned", "Lead Status", "Active/Inactive", "Reason For Rejection",
+    "Follow_1 Date", "Reminder Date_1", "Follow_2 Date", "Reminder Date_2", "Follow_3 Date", "Reminder Date_3",
+    "Follow_4 Date", "Ed Comments", "Complaint", "Complaint Status", "Complaint Resolve Date", "Timestamp",
+]
+ADMISSION_HEADERS = [
+    "Member ID Key", "Patient Name", "Patient Last Name", "Gender", "Date of Birth", "Age", "Blood Group",
+    "Mobile Number", "Email Id", "City", "District", "State", "Pin Code", "Attender Name", "Room Type",
+    "Check In Date", "Check Out Date", "Hospital Location", "Care Center", "Pain Point",
+    "Patient Current Status", "Providing Services", "Timestamp",
+]
+HOMECARE_HEADERS = [
+    "Date", "Member ID Key", "PATIENT NAME", "GENDER", "AGE", "PAIN POINT", "LOCATION", "SERVICE STARTED ON",
+    "ACTIVE / INACTIVE", "SERVICE STOPPED ON", "SERVICE TYPE", "Home Care Revenue", "Additional Nursing Charges",
+    "Discount", "REVENUE", "SHIFT", "LAST BILLED DATE", "Type of complaint", "Resolved",
+]
+INVOICE_HEADERS = [
+    "Date", "Invoice Date", "Invoice Ref", "Member ID Key", "Patient Name", "Gender", "Age", "Location",
+    "Pain Point", "Service Type", "Service Name", "Home Care Revenue", "Additional Nursing Charges", "Discount",
+    "Total Amount", "Status", "Created At", "Updated At", "Notes",
+]
+
+FIRST_NAMES = ["Arun", "Priya", "Karthik", "Lakshmi", "Suresh", "Meena", "Vignesh", "Divya", "Ramesh", "Anitha",
+               "Sameer", "Kavya", "Mohan", "Revathi", "Ganesh", "Deepa", "Prakash", "Sangeetha", "Hari", "Nithya"]
+LAST_NAMES = ["Kumar", "Raman", "Iyer", "Nair", "Reddy", "Pillai", "Menon", "Rao", "Sharma", "Krishnan"]
+AREAS = ["Anna Nagar", "T Nagar", "Adyar", "Velachery", "Tambaram", "Porur", "Guindy", "Mylapore"]
+PAIN_POINTS = ["Stroke", "Post Surgery", "Dementia", "Fracture", "Cancer Care", "Palliative", "Parkinson's"]
+SERVICES = ["Home Care", "Assisted Living", "Rehabilitation", "Nursing", "Physiotherapy"]
+SOURCES = ["Website", "Referral", "Hospital", "Walk-in", "Google Ads", "Instagram"]
+LEAD_STATUSES = ["New", "Follow Up", "Converted", "Rejected", "Hot", "Cold"]
+CARE_CENTERS = ["RS Puram", "Ram Nagar", "Chennai"]
+SHIFTS = ["Day", "Night", "24 Hours", "Regular"]
+
+DATASETS = ("leads", "admissions", "homecare", "invoices")
+
+
+def _date(base: datetime, rng: random.Random, days_back: int, fmt: str = "%d-%m-%Y") -> str:
+    return (base - timedelta(days=rng.randint(0, days_back))).strftime(fmt)
+
+
+def generate_leads(count: int, seed: int = 1, today: datetime = None) -> List[List[str]]:
+    """
+    Synthetic CRM lead rows (header first), shaped like CRM Leads → Sheet1 / Enquiries.
+
+    Args:
+        count: Number of data rows
+        seed: RNG seed; the same seed always yields the same rows
+        today: Reference date (defaults to now) so roughly 1% of rows land on today/yesterday
+
+    Returns:
+        Rows of string values, LEAD_HEADERS first
+    """
+    rng = random.Random(seed)
+    today = today or datetime.now()
+    rows = [list(LEAD_HEADERS)]
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        status = rng.choice(LEAD_STATUSES)
+        enquiry_date = _date(today, rng, 365)
+        follow_up = (today + timedelta(days=rng.randint(-3, 14))).strftime("%d-%m-%Y") if status in ("Follow Up", "Hot") else ""
+        complaint = rng.random() < 0.02
+        row = {
+            "Date": enquiry_date,
+            "Member ID key": f"MID-{enquiry_date[6:]}-{enquiry_date[3:5]}-{enquiry_date[:2]}-{i + 10000}",
+            "Attender Name": f"{rng.choice(FIRST_NAMES)} {last}",
+            "Patient Name": f"{first} {last}",
+            "Gender": rng.choice(["Male", "Female"]),
+            "Age": str(rng.randint(55, 95)),
+            "Patient Location": "Chennai",
+            "Area": rng.choice(AREAS),
+            "Email Id": f"{first.lower()}.{last.lower()}{i}@example.com",
+            "Mobile Number": str(9000000000 + rng.randint(0, 999999999)),
+            "Pain Point": rng.choice(PAIN_POINTS),
+            "Enquiry made for": rng.choice(["Self", "Parent", "Relative"]),
+            "Service": rng.choice(SERVICES),
+            "Hospital Location": rng.choice(CARE_CENTERS),
+            "Source": rng.choice(SOURCES),
+            "Crm Agent Name": rng.choice(FIRST_NAMES),
+            "Currently Assigned": rng.choice(FIRST_NAMES),
+            "Lead Status": status,
+            "Active/Inactive": "Inactive" if status == "Rejected" else "Active",
+            "Reason For Rejection": "Budget" if status == "Rejected" else "",
+            "Follow_1 Date": follow_up,
+            "Reminder Date_1": follow_up,
+            "Complaint": "Delay in service" if complaint else "",
+            "Complaint Status": rng.choice(["Yes", "No"]) if complaint else "",
+            "Complaint Resolve Date": _date(today, rng, 3) if complaint else "",
+            "Timestamp": f"{enquiry_date} 10:{i % 60:02d}:00",
+        }
+        rows.append([row.get(h, "") for h in LEAD_HEADERS])
+    return rows
+
+
+def generate_admissions(count: int, seed: int = 2, today: datetime = None) -> List[List[str]]:
+    """Synthetic CRM Admission → Sheet1 rows (header first); check-in/out dates spread over a year."""
+    rng = random.Random(seed)
+    today = today or datetime.now()
+    rows = [list(ADMISSION_HEADERS)]
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        check_in = today - timedelta(days=rng.randint(0, 365))
+        discharged = rng.random() < 0.6
+        check_out = check_in + timedelta(days=rng.randint(1, 60)) if discharged else None
+        row = {
+            "Member ID Key": f"MID-{check_in.strftime('%Y-%m-%d')}-{i + 50000}",
+            "Patient Name": first,
+            "Patient Last Name": last,
+            "Gender": rng.choice(["Male", "Female"]),
+            "Age": str(rng.randint(55, 95)),
+            "Mobile Number": str(8000000000 + rng.randint(0, 999999999)),
+            "Email Id": f"{first.lower()}{i}@example.com",
+            "City": "Chennai",
+            "District": "Chennai",
+            "State": "Tamil Nadu",
+            "Pin Code": str(600001 + rng.randint(0, 120)),
+            "Attender Name": f"{rng.choice(FIRST_NAMES)} {last}",
+            "Room Type": rng.choice(["Single", "Twin Sharing", "Suite"]),
+            "Check In Date": check_in.strftime("%d-%m-%Y"),
+            "Check Out Date": check_out.strftime("%d-%m-%Y") if check_out and check_out <= today else "",
+            "Hospital Location": rng.choice(CARE_CENTERS),
+            "Care Center": rng.choice(CARE_CENTERS),
+            "Pain Point": rng.choice(PAIN_POINTS),
+            "Patient Current Status": "Discharged" if check_out and check_out <= today else "Admitted",
+            "Providing Services": rng.choice(SERVICES),
+            "Timestamp": check_in.strftime("%Y-%m-%d 09:00:00"),
+        }
+        rows.append([row.get(h, "") for h in ADMISSION_HEADERS])
+    return rows
+
+
+def generate_homecare_clients(count: int, seed: int = 3, today: datetime = None) -> List[List[str]]:
+    """Synthetic CRM_HomeCare rows (header first); ~80% ACTIVE, service start days spread over the month."""
+    rng = random.Random(seed)
+    today = today or datetime.now()
+    rows = [list(HOMECARE_HEADERS)]
+    for i in range(count):
+        started = today - timedelta(days=rng.randint(1, 400))
+        active = rng.random() < 0.8
+        revenue, nursing, discount = rng.choice([30000, 45000, 60000]), rng.choice([0, 5000]), rng.choice([0, 0, 2000])
+        row = {
+            "Date": started.strftime("%d/%m/%Y"),
+            "Member ID Key": f"HC-{i + 1:06d}",
+            # Unique names: billing looks clients up by name
+            "PATIENT NAME": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i + 1}",
+            "GENDER": rng.choice(["Male", "Female"]),
+            "AGE": str(rng.randint(55, 95)),
+            "PAIN POINT": rng.choice(PAIN_POINTS),
+            "LOCATION": rng.choice(AREAS),
+            "SERVICE STARTED ON": started.strftime("%d/%m/%Y"),
+            "ACTIVE / INACTIVE": "ACTIVE" if active else "INACTIVE",
+            "SERVICE STOPPED ON": "" if active else _date(today, rng, 30, "%d/%m/%Y"),
+            "SERVICE TYPE": "Home Care",
+            "Home Care Revenue": str(revenue),
+            "Additional Nursing Charges": str(nursing),
+            "Discount": str(discount),
+            "REVENUE": str(revenue + nursing - discount),
+            "SHIFT": rng.choice(SHIFTS),
+            "Resolved": "No",
+        }
+        rows.append([row.get(h, "") for h in HOMECARE_HEADERS])
+    return rows
+
+
+def generate_invoices(count: int, seed: int = 4, today: datetime = None, patients: List[str] = None) -> List[List[str]]:
+    """
+    Synthetic Invoice Table rows (header first).
+
+    Args:
+        count: Number of invoices
+        seed: RNG seed
+        today: Reference date
+        patients: Patient names to bill (e.g. from generate_homecare_clients); random names otherwise
+    """
+    rng = random.Random(seed)
+    today = today or datetime.now()
+    rows = [list(INVOICE_HEADERS)]
+    for i in range(count):
+        invoiced = today - timedelta(days=rng.randint(1, 365))
+        patient = rng.choice(patients) if patients else f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        revenue, nursing, discount = rng.choice([30000, 45000, 60000]), rng.choice([0, 5000]), rng.choice([0, 0, 2000])
+        row = {
+            "Date": invoiced.strftime("%Y-%m-%d"),
+            "Invoice Date": invoiced.strftime("%d-%m-%Y 10:00"),
+            "Invoice Ref": f"INV{i + 1:06d}",
+            "Patient Name": patient,
+            "Location": rng.choice(AREAS),
+            "Pain Point": rng.choice(PAIN_POINTS),
+            "Service Type": "Home Care",
+            "Service Name": f"Home Care - {rng.choice(SHIFTS)}",
+            "Home Care Revenue": str(revenue),
+            "Additional Nursing Charges": str(nursing),
+            "Discount": str(discount),
+            "Total Amount": str(revenue + nursing - discount),
+            "Status": rng.choice(["Invoiced", "Paid"]),
+            "Created At": invoiced.isoformat(),
+            "Updated At": invoiced.isoformat(),
+        }
+        rows.append([row.get(h, "") for h in INVOICE_HEADERS])
+    return rows
+
+
+def generate_dataset(leads: int = 10000, admissions: int = 10000, homecare: int = 1000,
+                     invoices: int = 10000, seed: int = 1) -> Dict[str, List[List[str]]]:
+    """All four synthetic tables keyed by DATASETS name; invoices bill the generated home care clients."""
+    today = datetime.now()
+    homecare_rows = generate_homecare_clients(homecare, seed + 2, today)
+    patients = [row[HOMECARE_HEADERS.index("PATIENT NAME")] for row in homecare_rows[1:]]
+    return {
+        "leads": generate_leads(leads, seed, today),
+        "admissions": generate_admissions(admissions, seed + 1, today),
+        "homecare": homecare_rows,
+        "invoices": generate_invoices(invoices, seed + 3, today, patients),
+    }
+
+
 def get_client():
+    import gspread
+    from google.oauth2.service_account import Credentials
+
     scope = [
         'https://spreadsheets.google.com/feeds',
         'https://www.googleapis.com/auth/drive'
@@ -25,144 +248,150 @@ def get_client():
 def get_today():
     return datetime.now().strftime("%d-%m-%Y")
 
-today = get_today()
-print("="*80)
-print(f"CREATING TEST DATA FOR TODAY: {today}")
-print("="*80)
-
-client = get_client()
-
-# 1. Add test data to Sheet1 for "Leads Converted Yesterday"
-print("\n1. Adding test lead conversion to CRM LEADS - Sheet1...")
-try:
-    spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
-    worksheet = spreadsheet.worksheet("Sheet1")
-    
-    # Get headers to find the right columns
-    headers = worksheet.row_values(1)
-    
-    # Create a test row with today's date and "Converted" status
-    test_row = [""] * len(headers)
-    
-    # Set key fields
-    if "Date" in headers:
-        test_row[headers.index("Date")] = today
-    if "Member ID Key" in headers or "Member ID key" in headers:
-        idx = headers.index("Member ID Key") if "Member ID Key" in headers else headers.index("Member ID key")
-        test_row[idx] = f"TEST-CONV-{datetime.now().strftime('%H%M%S')}"
-    if "Patient Name" in headers:
-        test_row[headers.index("Patient Name")] = "Test Patient - Converted"
-    if "Lead Status" in headers:
-        test_row[headers.index("Lead Status")] = "Converted"
-    if "Mobile Number" in headers:
-        test_row[headers.index("Mobile Number")] = "9999999999"
-    if "Email Id" in headers:
-        test_row[headers.index("Email Id")] = "test@example.com"
-    
-    worksheet.append_row(test_row)
-    print("   ✓ Added test conversion record")
-except Exception as e:
-    print(f"   ✗ Error: {e}")
-
-# 2. Add test data to CRM ADMISSION Sheet1 for "Patients Admitted"
-print("\n2. Adding test patient admission to CRM ADMISSION - Sheet1...")
-try:
-    spreadsheet = client.open_by_key(PATIENT_ADMISSION_SHEET_ID)
-    worksheet = spreadsheet.worksheet("Sheet1")
-    
-    # Get headers
-    headers = worksheet.row_values(1)
-    
-    # Create a test row
-    test_row = [""] * len(headers)
-    
-    # Set key fields
-    for i, header in enumerate(headers):
-        h_lower = header.lower()
-        if "check in" in h_lower or "checkin" in h_lower:
-            test_row[i] = today
-        elif "member id" in h_lower:
-            test_row[i] = f"TEST-ADM-{datetime.now().strftime('%H%M%S')}"
-        elif "patient name" in h_lower and "check" not in h_lower:
-            test_row[i] = "Test Patient - Admitted"
-        elif "mobile" in h_lower:
-            test_row[i] = "8888888888"
-    
-    worksheet.append_row(test_row)
-    print("   ✓ Added test admission record")
-except Exception as e:
-    print(f"   ✗ Error: {e}")
-
-# 3. Add test data for "Patients Discharged"
-print("\n3. Adding test patient discharge to CRM ADMISSION - Sheet1...")
-try:
-    spreadsheet = client.open_by_key(PATIENT_ADMISSION_SHEET_ID)
-    worksheet = spreadsheet.worksheet("Sheet1")
-    
-    # Get headers
-    headers = worksheet.row_values(1)
-    
-    # Create a test row
-    test_row = [""] * len(headers)
-    
-    # Set key fields
-    for i, header in enumerate(headers):
-        h_lower = header.lower()
-        if "check out" in h_lower or "checkout" in h_lower:
-            test_row[i] = today
-        elif "member id" in h_lower:
-            test_row[i] = f"TEST-DIS-{datetime.now().strftime('%H%M%S')}"
-        elif "patient name" in h_lower and "check" not in h_lower:
-            test_row[i] = "Test Patient - Discharged"
-        elif "mobile" in h_lower:
-            test_row[i] = "7777777777"
-    
-    worksheet.append_row(test_row)
-    print("   ✓ Added test discharge record")
-except Exception as e:
-    print(f"   ✗ Error: {e}")
-
-# 4. Add test data to Enquiries for "Follow-ups Today"
-print("\n4. Adding test follow-up to CRM LEADS - Enquiries...")
-try:
-    spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
-    worksheet = spreadsheet.worksheet("Enquiries")
-    
-    # Get headers
-    headers = worksheet.row_values(1)
-    
-    # Create a test row
-    test_row = [""] * len(headers)
-    
-    # Set key fields
-    for i, header in enumerate(headers):
-        h_lower = header.lower()
-        if "follow" in h_lower and "1" in header and "date" in h_lower:
-            test_row[i] = today
-        elif "date" in h_lower and "follow" not in h_lower and "reminder" not in h_lower:
-            # Set enquiry date to a few days ago
-            test_row[i] = "20-12-2025"
-        elif "member id" in h_lower:
-            test_row[i] = f"TEST-FOL-{datetime.now().strftime('%H%M%S')}"
-        elif "patient name" in h_lower:
-            test_row[i] = "Test Patient - Follow-up"
-        elif "mobile" in h_lower:
-            test_row[i] = "6666666666"
-    
-    worksheet.append_row(test_row)
-    print("   ✓ Added test follow-up record")
-except Exception as e:
-    print(f"   ✗ Error: {e}")
-
-print("\n" + "="*80)
-print("TEST DATA CREATION COMPLETE!")
-print("="*80)
-print(f"\nNOTE: All test records were created with TODAY's date: {today}")
-print("To see them in the dashboard, you need to:")
-print("  1. Change the date filter to 'today' for Patients Admitted")
-print("  2. The other cards filter by 'yesterday', so they won't show today's data")
-print("\nAlternatively, wait until tomorrow and these records will appear in:")
-print("  - Leads Converted Yesterday")
-print("  - Patients Admitted (yesterday)")
-print("  - Patients Discharged")
-print("  - Follow-ups will only show if the follow-up date matches")
+def seed_live_sheets():
+    """Append one record per dashboard card, dated today, to the live sheets."""
+    today = get_today()
+    print("="*80)
+    print(f"CREATING TEST DATA FOR TODAY: {today}")
+    print("="*80)
+
+    client = get_client()
+
+    # 1. Add test data to Sheet1 for "Leads Converted Yesterday"
+    print("\n1. Adding test lead conversion to CRM LEADS - Sheet1...")
+    try:
+        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
+        worksheet = spreadsheet.worksheet("Sheet1")
+
+        # Get headers to find the right columns
+        headers = worksheet.row_values(1)
+
+        # Create a test row with today's date and "Converted" status
+        test_row = [""] * len(headers)
+
+        # Set key fields
+        if "Date" in headers:
+            test_row[headers.index("Date")] = today
+        if "Member ID Key" in headers or "Member ID key" in headers:
+            idx = headers.index("Member ID Key") if "Member ID Key" in headers else headers.index("Member ID key")
+            test_row[idx] = f"TEST-CONV-{datetime.now().strftime('%H%M%S')}"
+        if "Patient Name" in headers:
+            test_row[headers.index("Patient Name")] = "Test Patient - Converted"
+        if "Lead Status" in headers:
+            test_row[headers.index("Lead Status")] = "Converted"
+        if "Mobile Number" in headers:
+            test_row[headers.index("Mobile Number")] = "9999999999"
+        if "Email Id" in headers:
+            test_row[headers.index("Email Id")] = "test@example.com"
+
+        worksheet.append_row(test_row)
+        print("   ✓ Added test conversion record")
+    except Exception as e:
+        print(f"   ✗ Error: {e}")
+
+    # 2. Add test data to CRM ADMISSION Sheet1 for "Patients Admitted"
+    print("\n2. Adding test patient admission to CRM ADMISSION - Sheet1...")
+    try:
+        spreadsheet = client.open_by_key(PATIENT_ADMISSION_SHEET_ID)
+        worksheet = spreadsheet.worksheet("Sheet1")
+
+        # Get headers
+        headers = worksheet.row_values(1)
+
+        # Create a test row
+        test_row = [""] * len(headers)
+
+        # Set key fields
+        for i, header in enumerate(headers):
+            h_lower = header.lower()
+            if "check in" in h_lower or "checkin" in h_lower:
+                test_row[i] = today
+            elif "member id" in h_lower:
+                test_row[i] = f"TEST-ADM-{datetime.now().strftime('%H%M%S')}"
+            elif "patient name" in h_lower and "check" not in h_lower:
+                test_row[i] = "Test Patient - Admitted"
+            elif "mobile" in h_lower:
+                test_row[i] = "8888888888"
+
+        worksheet.append_row(test_row)
+        print("   ✓ Added test admission record")
+    except Exception as e:
+        print(f"   ✗ Error: {e}")
+
+    # 3. Add test data for "Patients Discharged"
+    print("\n3. Adding test patient discharge to CRM ADMISSION - Sheet1...")
+    try:
+        spreadsheet = client.open_by_key(PATIENT_ADMISSION_SHEET_ID)
+        worksheet = spreadsheet.worksheet("Sheet1")
+
+        # Get headers
+        headers = worksheet.row_values(1)
+
+        # Create a test row
+        test_row = [""] * len(headers)
+
+        # Set key fields
+        for i, header in enumerate(headers):
+            h_lower = header.lower()
+            if "check out" in h_lower or "checkout" in h_lower:
+                test_row[i] = today
+            elif "member id" in h_lower:
+                test_row[i] = f"TEST-DIS-{datetime.now().strftime('%H%M%S')}"
+            elif "patient name" in h_lower and "check" not in h_lower:
+                test_row[i] = "Test Patient - Discharged"
+            elif "mobile" in h_lower:
+                test_row[i] = "7777777777"
+
+        worksheet.append_row(test_row)
+        print("   ✓ Added test discharge record")
+    except Exception as e:
+        print(f"   ✗ Error: {e}")
+
+    # 4. Add test data to Enquiries for "Follow-ups Today"
+    print("\n4. Adding test follow-up to CRM LEADS - Enquiries...")
+    try:
+        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
+        worksheet = spreadsheet.worksheet("Enquiries")
+
+        # Get headers
+        headers = worksheet.row_values(1)
+
+        # Create a test row
+        test_row = [""] * len(headers)
+
+        # Set key fields
+        for i, header in enumerate(headers):
+            h_lower = header.lower()
+            if "follow" in h_lower and "1" in header and "date" in h_lower:
+                test_row[i] = today
+            elif "date" in h_lower and "follow" not in h_lower and "reminder" not in h_lower:
+                # Set enquiry date to a few days ago
+                test_row[i] = "20-12-2025"
+            elif "member id" in h_lower:
+                test_row[i] = f"TEST-FOL-{datetime.now().strftime('%H%M%S')}"
+            elif "patient name" in h_lower:
+                test_row[i] = "Test Patient - Follow-up"
+            elif "mobile" in h_lower:
+                test_row[i] = "6666666666"
+
+        worksheet.append_row(test_row)
+        print("   ✓ Added test follow-up record")
+    except Exception as e:
+        print(f"   ✗ Error: {e}")
+
+    print("\n" + "="*80)
+    print("TEST DATA CREATION COMPLETE!")
+    print("="*80)
+    print(f"\nNOTE: All test records were created with TODAY's date: {today}")
+    print("To see them in the dashboard, you need to:")
+    print("  1. Change the date filter to 'today' for Patients Admitted")
+    print("  2. The other cards filter by 'yesterday', so they won't show today's data")
+    print("\nAlternatively, wait until tomorrow and these records will appear in:")
+    print("  - Leads Converted Yesterday")
+    print("  - Patients Admitted (yesterday)")
+    print("  - Patients Discharged")
+    print("  - Follow-ups will only show if the follow-up date matches")
+
+
+if __name__ == "__main__":
+    seed_live_sheets()
@@ -1,12 +1,12 @@
 # -*- mode: python ; coding: utf-8 -*-
 
 
-a = Analytics(
+a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['uvicorn.logging', 'uvicorn.loops', 'uvicorn.loops.auto', 'uvicorn.protocols', 'uvicorn.protocols.http', 'uvicorn.protocols.http.auto', 'uvicorn.protocols.websockets', 'uvicorn.protocols.websockets.auto', 'uvicorn.lifespan', 'uvicorn.lifespan.on'],
+    hiddenimports=['uvicorn.logging', 'uvicorn.loops', 'uvicorn.loops.auto', 'uvicorn.protocols', 'uvicorn.protocols.http', 'uvicorn.protocols.http.auto', 'uvicorn.protocols.websockets', 'uvicorn.protocols.websockets.auto', 'uvicorn.lifespan', 'uvicorn.lifespan.on', 'delete_routes', 'upload_routes', 'discharge_routes', 'chat_routes', 'job_routes', 'live_routes', 'file_manager', 'pdf_generator', 'gmail_api_sender'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,21 +1,24 @@
 """
-Simple in-memory cache for dashboard data
+Simple cache for dashboard data, shared by all workers (see shared_cache.py)
 Reduces Google Sheets API calls to avoid quota limits
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Optional
+
+import instrumentation
+import shared_cache
 
 class DashboardCache:
-    def __init__(self, ttl_minutes: int = 5):
+    def __init__(self, ttl_minutes: int = 5, name: str = "dashboard"):
         """
         Initialize cache with time-to-live in minutes
         
         Args:
             ttl_minutes: How long to keep cached data (default: 5 minutes)
+            name: Cache label for hit/miss metrics and the shared cache namespace
         """
-        self.cache: Dict[str, Dict[str, Any]] = {}
         self.ttl_minutes = ttl_minutes
+        self.name = name
     
     def get(self, key: str) -> Optional[Dict[str, Any]]:
         """
@@ -27,18 +30,9 @@ class DashboardCache:
         Returns:
             Cached data or None if expired/not found
         """
-        if key not in self.cache:
-            return None
-        
-        cached_item = self.cache[key]
-        expiry_time = cached_item['expiry']
-        
-        # Check if cache is expired
-        if datetime.now() > expiry_time:
-            del self.cache[key]
-            return None
-        
-        return cached_item['data']
+        data = shared_cache.get(self.name, key)
+        instrumentation.record_cache(self.name, data is not None)
+        return data
     
     def set(self, key: str, data: Dict[str, Any]) -> None:
         """
@@ -48,25 +42,29 @@ class DashboardCache:
             key: Cache key
             data: Data to cache
         """
-        expiry_time = datetime.now() + timedelta(minutes=self.ttl_minutes)
-        self.cache[key] = {
-            'data': data,
-            'expiry': expiry_time
-        }
+        shared_cache.set(self.name, key, data, self.ttl_minutes * 60)
+    
+    def get_or_load(self, key: str, loader: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Get cached data, or run `loader` once across all workers and cache its result
+        
+        Args:
+            key: Cache key
+            loader: Fetches the data on a miss
+        """
+        data = shared_cache.get(self.name, key)
+        instrumentation.record_cache(self.name, data is not None)
+        if data is not None:
+            return data
+        return shared_cache.get_or_load(self.name, key, loader, self.ttl_minutes * 60)
     
     def clear(self) -> None:
-        """Clear all cached data"""
-        self.cache.clear()
+        """Clear all cached data (in every worker)"""
+        shared_cache.invalidate(self.name)
     
     def clear_expired(self) -> None:
         """Remove expired cache entries"""
-        now = datetime.now()
-        expired_keys = [
-            key for key, value in self.cache.items()
-            if now > value['expiry']
-        ]
-        for key in expired_keys:
-            del self.cache[key]
+        shared_cache.purge_expired()
 
 
 # Global cache instance (5-minute TTL)
@@ -4,13 +4,14 @@ Handles data fetching and processing for the CRM Home Page Dashboard
 """
 
 from typing import List, Dict, Any, Optional
-import gspread
+import sheets_scheduler
 from google.oauth2.service_account import Credentials
 import os
 from datetime import datetime, timedelta
 from fastapi import HTTPException
 from dotenv import load_dotenv
 from dashboard_cache import dashboard_cache
+from followup_index import get_followup_index
 
 # Load environment variables
 load_dotenv()
@@ -31,7 +32,7 @@ def get_google_sheet_client(credentials_file: str = CREDENTIALS_FILE):
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(credentials_file, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds, lane="dashboard")
     return client
 
 
@@ -376,45 +377,32 @@ def get_patients_discharged() -> Dict[str, Any]:
 
 
 def get_follow_ups_today() -> Dict[str, Any]:
-    """Get enquiries with follow-up due today"""
+    """
+    Get enquiries with follow-up due today
+
+    Served from the follow-up index, not a fresh read: writes through the API show up at
+    once, direct sheet edits within one change-feed poll, or within FOLLOWUP_INDEX_TTL_SECONDS
+    (300 s by default) when the change feed is not running.
+    """
     try:
-        client = get_google_sheet_client()
         if not GOOGLE_SHEET_ID:
             raise HTTPException(status_code=500, detail="Google Sheet ID not configured")
         
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
-        worksheet = spreadsheet.worksheet("Enquiries")
+        def load_enquiries():
+            client = get_google_sheet_client()
+            spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
+            return spreadsheet.worksheet("Enquiries").get_all_values()
         
-        all_values = worksheet.get_all_values()
-        if not all_values or len(all_values) < 2:
-            return {"data": [], "count": 0, "date_filter": get_today()}
-        
-        headers = all_values[0]
+        # The sheet is only read when the follow-up index needs a rebuild
+        index = get_followup_index("Enquiries", load_enquiries)
         today = get_today()
         
         results = []
-        for row in all_values[1:]:
-            if not any(row):
+        for row_number in index.row_numbers(index.due_on(parse_date(today).date())):
+            row_dict = index.row_dict(row_number)
+            if not any(row_dict.values()):
                 continue
-            
-            row_dict = {}
-            for idx, header in enumerate(headers):
-                if idx < len(row):
-                    row_dict[header] = row[idx]
-            
-            # Check all follow-up date columns
-            follow_up_dates = [
-                row_dict.get("Follow_1 Date", ""),
-                row_dict.get("Follow_2 Date", ""),
-                row_dict.get("Follow_3 Date", ""),
-                row_dict.get("Follow_4 Date", "")
-            ]
-            
-            # If any follow-up date matches today
-            for follow_date in follow_up_dates:
-                if compare_dates(follow_date, today):
-                    results.append(transform_to_table_format(row_dict, "enquiry"))
-                    break  # Only add once per row
+            results.append(transform_to_table_format(row_dict, "enquiry"))
         
         return {
             "data": results,
@@ -0,0 +1,174 @@
+"""
+Sheet Row Deletion Engine
+Turns matched rows into contiguous spans and deletes them with a single batch_update, caching previews between preview and confirm
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import gspread
+
+import instrumentation
+
+# How long a preview token stays valid for /delete/confirm
+DELETE_PREVIEW_TTL_SECONDS = int(os.getenv("DELETE_PREVIEW_TTL_SECONDS", "900"))
+
+# (first_row, last_row), 1-based sheet rows, inclusive
+Span = Tuple[int, int]
+
+_previews: Dict[str, Dict[str, Any]] = {}
+_parsed_columns: Dict[Tuple[int, int], Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def unique_headers(headers: List[str]) -> List[str]:
+    """Suffix duplicate headers (`Date`, `Date_1`, ...) the same way get_sheet_data_as_df does."""
+    result = []
+    seen = set()
+    for h in headers:
+        c = h
+        i = 1
+        while c in seen:
+            c = f"{h}_{i}"
+            i += 1
+        seen.add(c)
+        result.append(c)
+    return result
+
+
+def read_date_column(sheet: gspread.Worksheet, date_column: str) -> Dict[str, Any]:
+    """
+    Read only the header row and the filter column instead of the whole sheet.
+
+    Args:
+        sheet: Worksheet to read
+        date_column: Header name of the date column
+
+    Returns:
+        {"headers", "col", "values", "fingerprint"}; "col" is 1-based and None if the header is missing
+    """
+    headers = unique_headers(sheet.row_values(1))
+    if date_column not in headers:
+        return {"headers": headers, "col": None, "values": [], "fingerprint": None}
+    col = headers.index(date_column) + 1
+    values = sheet.col_values(col)[1:]
+    return {
+        "headers": headers,
+        "col": col,
+        "values": values,
+        "fingerprint": column_fingerprint(headers, values),
+    }
+
+
+def column_fingerprint(headers: List[str], values: List[str]) -> str:
+    """Hash of the header row plus the date column; changes whenever rows are added, removed or re-dated."""
+    digest = hashlib.sha1()
+    digest.update("\x1f".join(headers).encode("utf-8"))
+    digest.update(b"\x1e")
+    digest.update("\x1f".join(values).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_parsed_column(sheet_id: int, col: int, fingerprint: str) -> Optional[Any]:
+    """Parsed date series cached for this exact column content, if any."""
+    with _lock:
+        cached = _parsed_columns.get((sheet_id, col))
+    hit = bool(cached and cached["fingerprint"] == fingerprint)
+    instrumentation.record_cache("delete_parsed_column", hit)
+    return cached["dates"] if hit else None
+
+
+def store_parsed_column(sheet_id: int, col: int, fingerprint: str, dates: Any) -> None:
+    with _lock:
+        _parsed_columns[(sheet_id, col)] = {"fingerprint": fingerprint, "dates": dates}
+
+
+def rows_to_spans(row_numbers: List[int]) -> List[Span]:
+    """
+    Coalesce sheet row numbers into contiguous inclusive spans.
+
+    Example: [2, 3, 4, 9, 11, 12] -> [(2, 4), (9, 9), (11, 12)]
+    """
+    spans: List[Span] = []
+    for row in sorted(set(row_numbers)):
+        if spans and row == spans[-1][1] + 1:
+            spans[-1] = (spans[-1][0], row)
+        else:
+            spans.append((row, row))
+    return spans
+
+
+def build_delete_requests(sheet_id: int, spans: List[Span]) -> List[Dict[str, Any]]:
+    """
+    deleteDimension requests for the spans, bottom-most first so earlier
+    deletions never shift the indexes of later ones.
+    """
+    requests = []
+    for first, last in sorted(spans, reverse=True):
+        requests.append({
+            "deleteDimension": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "dimension": "ROWS",
+                    "startIndex": first - 1,
+                    "endIndex": last,
+                }
+            }
+        })
+    return requests
+
+
+def delete_row_spans(sheet: gspread.Worksheet, spans: List[Span]) -> Dict[str, Any]:
+    """
+    Delete all spans in one atomic batch_update call.
+
+    Returns:
+        {"deleted": row count, "spans": span count}
+    """
+    if not spans:
+        return {"deleted": 0, "spans": 0}
+    body = {"requests": build_delete_requests(sheet.id, spans)}
+    sheet.spreadsheet.batch_update(body)
+    with _lock:
+        for key in [k for k in _parsed_columns if k[0] == sheet.id]:
+            del _parsed_columns[key]
+    deleted = sum(last - first + 1 for first, last in spans)
+    print(f"[Delete Engine] Deleted {deleted} rows in {len(spans)} spans from '{sheet.title}'")
+    return {"deleted": deleted, "spans": len(spans)}
+
+
+def save_preview(sheet_id: int, date_column: str, filters: Dict[str, Any],
+                 fingerprint: str, row_numbers: List[int]) -> str:
+    """
+    Remember a preview's matched rows and return a token for /delete/confirm.
+    """
+    token = uuid.uuid4().hex
+    now = datetime.now()
+    with _lock:
+        for key in [k for k, v in _previews.items()
+                    if (now - v["created"]).total_seconds() > DELETE_PREVIEW_TTL_SECONDS]:
+            del _previews[key]
+        _previews[token] = {
+            "sheet_id": sheet_id,
+            "date_column": date_column,
+            "filters": filters,
+            "fingerprint": fingerprint,
+            "row_numbers": list(row_numbers),
+            "created": now,
+        }
+    return token
+
+
+def pop_preview(token: str) -> Optional[Dict[str, Any]]:
+    """Take a preview out of the cache (tokens are single use). None if unknown or expired."""
+    with _lock:
+        preview = _previews.pop(token, None)
+    if preview is None:
+        return None
+    if (datetime.now() - preview["created"]).total_seconds() > DELETE_PREVIEW_TTL_SECONDS:
+        return None
+    return preview
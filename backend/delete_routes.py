@@ -0,0 +1,337 @@
+"""
+Delete API Routes
+Bulk delete of CRM Sheet1 rows by date filters (preview, then confirm)
+"""
+
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+import gspread
+import analytics_views
+import delete_engine
+import duplicate_index
+import followup_index
+import process_pool
+from leads_sheet import get_primary_sheet
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+router = APIRouter(tags=["delete"])
+
+# Parsing a whole date column runs in the process pool, off the event loop
+process_pool.register_task("delete_dates", "delete_routes:parse_delete_values", timeout=60)
+
+
+class FilterCriteria(BaseModel):
+    year: Optional[str] = None
+    month: Optional[str] = None
+    specificDate: Optional[str] = None
+    startDate: Optional[str] = None
+    endDate: Optional[str] = None
+
+class DeletePreviewPayload(BaseModel):
+    filters: FilterCriteria
+    date_column: str
+    preview_columns: Optional[List[str]] = None
+
+class DeleteConfirmPayload(BaseModel):
+    filters: FilterCriteria
+    date_column: str
+    preview_token: Optional[str] = None
+
+
+def parse_delete_dates(column: "pd.Series") -> "pd.Series":
+    """
+    Parse the delete filter's date column into datetimes (NaT when unparseable).
+    """
+    import pandas as pd
+
+    # Convert date column to datetime
+    # Robust parsing:
+    # 1. Clean whitespace
+    # 2. Try dayfirst=False (ISO/US)
+    # 3. If mostly NaT, try dayfirst=True (EU/India)
+    try:
+        clean_col = column.astype(str).str.strip()
+        
+        # Try 1: Standard/ISO
+        temp_dates = pd.to_datetime(clean_col, errors='coerce', dayfirst=False)
+        
+        # Check success rate
+        valid_count = temp_dates.notna().sum()
+        total_count = len(column)
+        
+        # If very few valid dates found (less than 20%), try dayfirst=True
+        if total_count > 0 and (valid_count / total_count) < 0.2:
+             # Try 2: DayFirst
+             print(f"Initial date parsing yield low success ({valid_count}/{total_count}). Retrying with dayfirst=True")
+             temp_dates_alt = pd.to_datetime(clean_col, errors='coerce', dayfirst=True)
+             if temp_dates_alt.notna().sum() > valid_count:
+                 temp_dates = temp_dates_alt
+                 
+    except Exception as e:
+        print(f"Date parsing critical error: {e}")
+        raise HTTPException(status_code=400, detail=f"Date parsing failed: {str(e)}")
+
+    return temp_dates
+
+
+def parse_delete_values(values: List[str]) -> "pd.Series":
+    """
+    Process-pool entry point: parse_delete_dates for a plain list of cells (a failure
+    comes back as ValueError, which survives the trip from the worker).
+    """
+    import pandas as pd
+
+    try:
+        return parse_delete_dates(pd.Series(values))
+    except HTTPException as e:
+        raise ValueError(e.detail)
+
+
+def apply_delete_filters(df: "pd.DataFrame", filters: FilterCriteria, date_col: str, temp_dates: Optional["pd.Series"] = None):
+    """
+    Returns a boolean mask where True means 'to be deleted'.
+    Pass `temp_dates` to reuse an already parsed date column.
+    """
+    import pandas as pd
+
+    if date_col not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Column '{date_col}' not found in sheet")
+
+    if temp_dates is None:
+        temp_dates = parse_delete_dates(df[date_col])
+
+    # Create mask (initially all False)
+    mask = pd.Series([False] * len(df), index=df.index)
+    
+    # Priority 1: Date Range (Start/End)
+    if filters.startDate or filters.endDate:
+        print(f"[DEBUG] Using date range filter: startDate={filters.startDate}, endDate={filters.endDate}")
+        range_mask = pd.Series([True] * len(df), index=df.index)
+        
+        if filters.startDate:
+            try:
+                start = pd.to_datetime(filters.startDate)
+                range_mask = range_mask & (temp_dates >= start)
+                print(f"[DEBUG] After start date filter: {range_mask.sum()} matches")
+            except Exception as e:
+                print(f"[ERROR] Failed to parse startDate: {e}")
+        
+        if filters.endDate:
+            try:
+                end = pd.to_datetime(filters.endDate)
+                # Include the entire end date (up to 23:59:59)
+                end_inclusive = end + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+                range_mask = range_mask & (temp_dates <= end_inclusive)
+                print(f"[DEBUG] After end date filter: {range_mask.sum()} matches")
+            except Exception as e:
+                print(f"[ERROR] Failed to parse endDate: {e}")
+        
+        mask = range_mask
+    
+    # Priority 2: Specific Date
+    elif filters.specificDate:
+        print(f"[DEBUG] Using specific date filter: {filters.specificDate}")
+        try:
+            target_date = pd.to_datetime(filters.specificDate)
+            mask = (temp_dates.dt.normalize() == target_date.normalize())
+            print(f"[DEBUG] Specific date matches: {mask.sum()}")
+        except Exception as e:
+            print(f"[ERROR] Failed to parse specificDate: {e}")
+    
+    # Priority 3: Year/Month Logic
+    elif filters.year or filters.month:
+        print(f"[DEBUG] Using year/month filter: year={filters.year}, month={filters.month}")
+        year_mask = pd.Series([True] * len(df), index=df.index)
+        month_mask = pd.Series([True] * len(df), index=df.index)
+        
+        if filters.year:
+            try:
+                y = int(filters.year)
+                year_mask = (temp_dates.dt.year == y)
+                print(f"[DEBUG] Year {y} matches: {year_mask.sum()}")
+            except Exception as e:
+                print(f"[ERROR] Failed to parse year: {e}")
+        
+        if filters.month:
+            try:
+                m = int(filters.month)
+                month_mask = (temp_dates.dt.month == m)
+                print(f"[DEBUG] Month {m} matches: {month_mask.sum()}")
+            except Exception as e:
+                print(f"[ERROR] Failed to parse month: {e}")
+
+        mask = year_mask & month_mask
+        print(f"[DEBUG] Combined year/month matches: {mask.sum()}")
+    else:
+        # No filters provided -> delete nothing
+        print("[DEBUG] No filters provided, returning empty mask")
+        return pd.Series([False] * len(df), index=df.index), temp_dates
+        
+    # Remove NaT from mask (don't delete rows with invalid dates even if they match 'None' logic?)
+    mask = mask & temp_dates.notna()
+    
+    return mask, temp_dates
+
+
+def match_delete_rows(sheet: gspread.Worksheet, filters: FilterCriteria, date_column: str) -> Dict[str, Any]:
+    """
+    Find the sheet rows matched by the delete filters reading only the header
+    row and the date column. The parsed date column is cached per column
+    content, so preview and confirm parse it once.
+
+    Returns:
+        {"headers", "fingerprint", "row_numbers", "dates"} with 1-based sheet row numbers
+    """
+    import pandas as pd
+
+    column = delete_engine.read_date_column(sheet, date_column)
+    if column["col"] is None:
+        raise HTTPException(status_code=400, detail=f"Column '{date_column}' not found in sheet")
+
+    df = pd.DataFrame({date_column: column["values"]})
+    temp_dates = delete_engine.get_parsed_column(sheet.id, column["col"], column["fingerprint"])
+    if temp_dates is None:
+        try:
+            temp_dates = process_pool.run_sync("delete_dates", column["values"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        delete_engine.store_parsed_column(sheet.id, column["col"], column["fingerprint"], temp_dates)
+
+    mask, date_series = apply_delete_filters(df, filters, date_column, temp_dates)
+    row_numbers = [int(i) + 2 for i in df.index[mask.to_numpy()]]
+    return {
+        "headers": column["headers"],
+        "fingerprint": column["fingerprint"],
+        "row_numbers": row_numbers,
+        "dates": date_series[mask],
+    }
+
+
+@router.post("/delete/preview")
+async def preview_delete(payload: DeletePreviewPayload):
+    try:
+        print(f"\n[DELETE PREVIEW] Starting preview with filters: {payload.filters}")
+        print(f"[DELETE PREVIEW] Date column: {payload.date_column}")
+        
+        sheet = get_primary_sheet()
+        if not sheet.row_values(1):
+            print("[DELETE PREVIEW] Sheet is empty")
+            return {"count": 0, "rows": [], "earliest": None, "latest": None, "headers": []}
+            
+        matched = await run_in_threadpool(match_delete_rows, sheet, payload.filters, payload.date_column)
+        row_numbers = matched["row_numbers"]
+        count = len(row_numbers)
+        
+        print(f"[DELETE PREVIEW] Final match count: {count}")
+        
+        if count == 0:
+            return {"count": 0, "rows": [], "earliest": None, "latest": None}
+            
+        # Get Earliest/Latest from the matched dates
+        matched_dates = matched["dates"]
+        earliest = matched_dates.min().strftime('%Y-%m-%d') if not matched_dates.empty else None
+        latest = matched_dates.max().strftime('%Y-%m-%d') if not matched_dates.empty else None
+        
+        # Prepare Preview Rows
+        # Limit to 50, fetching only those rows
+        headers = matched["headers"]
+        preview_spans = delete_engine.rows_to_spans(row_numbers[:50])
+        fetched = sheet.batch_get([f"{first}:{last}" for first, last in preview_spans])
+        preview_rows = []
+        for (first, last), block in zip(preview_spans, fetched):
+            block = list(block)
+            for offset in range(last - first + 1):
+                values = block[offset] if offset < len(block) else []
+                preview_rows.append({h: (values[i] if i < len(values) else "") for i, h in enumerate(headers)})
+        
+        # Select columns if requested
+        valid_cols = headers
+        if payload.preview_columns:
+            # Only keep columns that exist
+            valid_cols = [c for c in payload.preview_columns if c in headers]
+            if not valid_cols:
+                # Fallback to all if none match (shouldn't happen with correct inputs)
+                valid_cols = headers
+            preview_rows = [{c: r.get(c, "") for c in valid_cols} for r in preview_rows]
+        
+        token = delete_engine.save_preview(
+            sheet.id, payload.date_column, payload.filters.dict(), matched["fingerprint"], row_numbers
+        )
+            
+        return {
+            "count": count,
+            "headers": valid_cols,
+            "rows": preview_rows,
+            "earliest": earliest,
+            "latest": latest,
+            "preview_token": token,
+            "spans": len(delete_engine.rows_to_spans(row_numbers))
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        error = process_pool.http_error(e)
+        if error is not None:
+            raise error
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/delete/confirm")
+async def confirm_delete(payload: DeleteConfirmPayload):
+    """
+    Delete the matched rows in place with one batch_update of deleteDimension
+    requests. With a preview_token the rows matched at preview time are
+    deleted, provided the date column has not changed since.
+    """
+    try:
+        sheet = get_primary_sheet()
+        if not sheet.row_values(1):
+            return {"status": "error", "message": "Sheet is empty"}
+
+        preview = delete_engine.pop_preview(payload.preview_token) if payload.preview_token else None
+        if payload.preview_token and preview is None:
+            raise HTTPException(status_code=409, detail="Preview expired. Please preview the deletion again.")
+
+        if preview is not None:
+            if preview["sheet_id"] != sheet.id or preview["date_column"] != payload.date_column \
+                    or preview["filters"] != payload.filters.dict():
+                raise HTTPException(status_code=409, detail="Filters changed since preview. Please preview again.")
+            column = delete_engine.read_date_column(sheet, payload.date_column)
+            if column["fingerprint"] != preview["fingerprint"]:
+                raise HTTPException(status_code=409, detail="Sheet changed since preview. Please preview again.")
+            row_numbers = preview["row_numbers"]
+        else:
+            matched = await run_in_threadpool(match_delete_rows, sheet, payload.filters, payload.date_column)
+            row_numbers = matched["row_numbers"]
+
+        matches_count = len(row_numbers)
+        if matches_count == 0:
+             return {"status": "success", "message": "No rows matched the criteria (0 deleted)."}
+             
+        result = delete_engine.delete_row_spans(sheet, delete_engine.rows_to_spans(row_numbers))
+        followup_index.invalidate(sheet.title)
+        duplicate_index.invalidate(sheet.title)
+        analytics_views.invalidate(sheet.spreadsheet.id, sheet.title)
+        
+        return {
+            "status": "success", 
+            "message": f"Successfully deleted {matches_count} rows.",
+            "spans": result["spans"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        error = process_pool.http_error(e)
+        if error is not None:
+            raise error
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,626 @@
+"""
+Dropdown Engine Module
+Column-per-category dropdown sheets held as in-memory ordered option sets with a version: single-cell adds and deletes, and deltas since a version
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import gspread
+
+import change_feed
+import instrumentation
+
+# Configuration
+DROPDOWN_DB_PATH = os.getenv("DROPDOWN_DB_PATH", "dropdown_engine.db")
+# Re-read the sheet at most this often to pick up edits the change feed missed (stretched while it is healthy)
+DROPDOWN_SYNC_SECONDS = int(os.getenv("DROPDOWN_SYNC_SECONDS", "300"))
+CHANGE_RETENTION = int(os.getenv("DROPDOWN_CHANGE_RETENTION", "500"))  # Changes kept per store for deltas
+
+# cells mirrors every non-empty cell of each sheet (row 1 holds the category headers) so any
+# worker can load a store and diff a fresh read without touching Sheets. changes is the
+# version log: its AUTOINCREMENT key is the version clients pass back as ?since=
+# Ops: add / remove (one option), add_field (new column), reset (anything else; reload in full)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    store TEXT NOT NULL,
+    col INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (store, col, row)
+);
+CREATE TABLE IF NOT EXISTS stores (
+    store TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL DEFAULT 0,
+    pruned_through INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    store TEXT NOT NULL,
+    op TEXT NOT NULL,
+    category TEXT,
+    value TEXT,
+    col INTEGER,
+    row INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_changes_store ON changes (store, version);
+"""
+
+_initialized = False
+_init_lock = threading.Lock()
+
+# Global store registry keyed by name, and by watched worksheet for the change feed
+_stores: Dict[str, "DropdownStore"] = {}
+_by_worksheet: Dict[Tuple[str, str], "DropdownStore"] = {}
+_registry_lock = threading.Lock()
+
+_stats: Dict[str, int] = {"loads": 0, "syncs": 0, "sheet_reads": 0, "cell_writes": 0, "deltas": 0, "full": 0}
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DROPDOWN_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_db() -> None:
+    """Create the mirror and change log tables (idempotent)."""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _initialized = True
+
+
+def _clean(value: Any) -> str:
+    return str(value if value is not None else "").strip()
+
+
+def _cells_from_values(values: List[List[Any]]) -> Dict[Tuple[int, int], str]:
+    """Non-empty cells of a `get_all_values()` result keyed by 1-based (col, row)."""
+    cells = {}
+    for row_number, row in enumerate(values, start=1):
+        for col_number, value in enumerate(row, start=1):
+            value = _clean(value)
+            if value:
+                cells[(col_number, row_number)] = value
+    return cells
+
+
+def options_from_columns(values: List[List[Any]], skip_headers: Tuple[str, ...] = ()) -> Dict[str, List[str]]:
+    """
+    Category -> options of column-per-category values (header row first), blanks skipped
+    and repeated options kept once, in row order.
+
+    Args:
+        values: Rows including the header row
+        skip_headers: Lower-case headers that are not dropdowns (e.g. "date")
+    """
+    headers = [_clean(h) for h in values[0]] if values else []
+    result: Dict[str, Dict[str, None]] = {}
+    for col, header in enumerate(headers):
+        if header and header.lower() not in skip_headers:
+            result.setdefault(header, {})
+    for row in values[1:]:
+        for col, value in enumerate(row[:len(headers)]):
+            header = headers[col]
+            value = _clean(value)
+            if value and header in result:
+                result[header][value] = None
+    return {header: list(options) for header, options in result.items()}
+
+
+class DropdownStore:
+    def __init__(self, name: str, spreadsheet_id: Optional[str], worksheet: str,
+                 open_worksheet: Callable[[], gspread.Worksheet]):
+        """
+        One dropdown sheet: each column is a category, its header in row 1 and options below.
+
+        Args:
+            name: Store key in the mirror database
+            spreadsheet_id: Spreadsheet key (for the change feed)
+            worksheet: Worksheet title
+            open_worksheet: Opens (or creates) the worksheet
+        """
+        self.name = name
+        self.spreadsheet_id = spreadsheet_id
+        self.worksheet = worksheet
+        self._open = open_worksheet
+        self._worksheet: Optional[gspread.Worksheet] = None
+        self._version = -1  # Not loaded
+        self._headers: Dict[int, str] = {}
+        self._columns: Dict[int, Dict[int, str]] = {}
+        self._lock = threading.RLock()
+
+    # --- Loading and sync ---
+
+    def _sheet(self) -> gspread.Worksheet:
+        if self._worksheet is None:
+            self._worksheet = self._open()
+        return self._worksheet
+
+    def _store_row(self, conn: sqlite3.Connection) -> Tuple[float, int, int]:
+        row = conn.execute(
+            "SELECT s.synced_at, s.pruned_through, (SELECT COALESCE(MAX(version), 0) FROM changes WHERE store = ?) "
+            "FROM stores s WHERE s.store = ?",
+            (self.name, self.name),
+        ).fetchone()
+        return row if row else (0.0, 0, 0)
+
+    def _load_mirror(self, conn: sqlite3.Connection, version: int) -> None:
+        headers: Dict[int, str] = {}
+        columns: Dict[int, Dict[int, str]] = {}
+        for col, row, value in conn.execute(
+            "SELECT col, row, value FROM cells WHERE store = ? ORDER BY col, row", (self.name,)
+        ):
+            if row == 1:
+                headers[col] = value
+            else:
+                columns.setdefault(col, {})[row] = value
+        self._headers, self._columns, self._version = headers, columns, version
+        _stats["loads"] += 1
+
+    def _apply(self, op: str, category: Optional[str], value: Optional[str], col: Optional[int], row: Optional[int]) -> None:
+        if op == "add":
+            self._columns.setdefault(col, {})[row] = value
+        elif op == "remove":
+            self._columns.get(col, {}).pop(row, None)
+        elif op == "add_field":
+            self._headers[col] = category
+
+    def _catch_up(self, conn: sqlite3.Connection) -> None:
+        """Bring this worker's copy to the newest version, from the change log or the mirror."""
+        synced_at, pruned_through, version = self._store_row(conn)
+        if synced_at == 0:
+            self._sync(conn)  # First use anywhere: read the sheet into the mirror
+            return
+        if version == self._version:
+            return
+        if self._version < pruned_through or self._version > version:
+            self._load_mirror(conn, version)
+            return
+        changes = conn.execute(
+            "SELECT version, op, category, value, col, row FROM changes WHERE store = ? AND version > ? ORDER BY version",
+            (self.name, self._version),
+        ).fetchall()
+        if any(op == "reset" for _, op, *_ in changes):
+            self._load_mirror(conn, version)
+            return
+        for _, op, category, value, col, row in changes:
+            self._apply(op, category, value, col, row)
+        self._version = version
+
+    def _record(self, conn: sqlite3.Connection, op: str, category: Optional[str] = None, value: Optional[str] = None,
+                col: Optional[int] = None, row: Optional[int] = None) -> int:
+        """Log a change and mirror the cell it touched (inside the caller's transaction)."""
+        if op in ("add", "add_field"):
+            conn.execute(
+                "INSERT OR REPLACE INTO cells (store, col, row, value) VALUES (?, ?, ?, ?)",
+                (self.name, col, 1 if op == "add_field" else row, category if op == "add_field" else value),
+            )
+        elif op == "remove":
+            conn.execute("DELETE FROM cells WHERE store = ? AND col = ? AND row = ?", (self.name, col, row))
+        version = conn.execute(
+            "INSERT INTO changes (store, op, category, value, col, row, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.name, op, category, value, col, row, time.time()),
+        ).lastrowid
+        self._apply(op, category, value, col, row)
+        self._version = version
+        return version
+
+    def _sync(self, conn: sqlite3.Connection) -> int:
+        """
+        Read the sheet and log how it differs from the mirror (edits made outside the app).
+        Runs inside the caller's write transaction.
+
+        Returns:
+            Number of changes logged
+        """
+        values = self._sheet().get_all_values()
+        _stats["sheet_reads"] += 1
+        _stats["syncs"] += 1
+        fresh = _cells_from_values(values)
+        old = {(col, row): value for col, row, value in conn.execute(
+            "SELECT col, row, value FROM cells WHERE store = ?", (self.name,)
+        )}
+        first = conn.execute("SELECT 1 FROM stores WHERE store = ?", (self.name,)).fetchone() is None
+        conn.execute(
+            "INSERT INTO stores (store, synced_at) VALUES (?, ?) ON CONFLICT(store) DO UPDATE SET synced_at = excluded.synced_at",
+            (self.name, time.time()),
+        )
+        _, _, version = self._store_row(conn)
+        if version != self._version:
+            self._load_mirror(conn, version)  # Log on top of the newest state
+
+        diff = sorted(key for key in set(old) | set(fresh) if old.get(key) != fresh.get(key))
+        if not diff and not first:
+            return 0
+        headers = {col: value for (col, row), value in fresh.items() if row == 1}
+        if first or any(row == 1 for _, row in diff) or len(diff) > CHANGE_RETENTION // 2:
+            # New, renamed or removed categories (or a bulk edit): everyone reloads in full
+            conn.execute("DELETE FROM cells WHERE store = ?", (self.name,))
+            conn.executemany(
+                "INSERT INTO cells (store, col, row, value) VALUES (?, ?, ?, ?)",
+                [(self.name, col, row, value) for (col, row), value in fresh.items()],
+            )
+            version = self._record(conn, "reset")
+            self._load_mirror(conn, version)
+            self._prune(conn)
+            print(f"[Dropdown Engine] '{self.name}' reloaded from the sheet (version {version})")
+            return 1
+
+        logged = 0
+        for col, row in diff:
+            if col not in headers:
+                # Cells under a blank header are not options: mirror them without logging
+                if (col, row) in fresh:
+                    conn.execute("INSERT OR REPLACE INTO cells (store, col, row, value) VALUES (?, ?, ?, ?)",
+                                 (self.name, col, row, fresh[(col, row)]))
+                    self._columns.setdefault(col, {})[row] = fresh[(col, row)]
+                else:
+                    conn.execute("DELETE FROM cells WHERE store = ? AND col = ? AND row = ?", (self.name, col, row))
+                    self._columns.get(col, {}).pop(row, None)
+                continue
+            if (col, row) in old:
+                self._record(conn, "remove", headers[col], old[(col, row)], col, row)
+                logged += 1
+            if (col, row) in fresh:
+                self._record(conn, "add", headers[col], fresh[(col, row)], col, row)
+                logged += 1
+        self._prune(conn)
+        print(f"[Dropdown Engine] '{self.name}': {logged} sheet edits logged (version {self._version})")
+        return logged
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        cutoff = conn.execute(
+            "SELECT version FROM changes WHERE store = ? ORDER BY version DESC LIMIT 1 OFFSET ?",
+            (self.name, CHANGE_RETENTION),
+        ).fetchone()
+        if cutoff:
+            conn.execute("DELETE FROM changes WHERE store = ? AND version <= ?", (self.name, cutoff[0]))
+            conn.execute("UPDATE stores SET pruned_through = MAX(pruned_through, ?) WHERE store = ?", (cutoff[0], self.name))
+
+    def _transaction(self):
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")  # One writer across workers: rows are picked on current state
+        return conn
+
+    def _ensure_fresh(self) -> None:
+        init_db()
+        with self._lock:
+            conn = _connect()
+            try:
+                synced_at, _, version = self._store_row(conn)
+                due = time.time() - synced_at > change_feed.cache_ttl(DROPDOWN_SYNC_SECONDS)
+                instrumentation.record_cache(f"dropdown_{self.name}", not due and version == self._version)
+                if not due:
+                    self._catch_up(conn)
+                    return
+            finally:
+                conn.close()
+            self.sync(only_if_due=True)
+
+    def sync(self, only_if_due: bool = False) -> int:
+        """
+        Re-read the sheet and log edits made outside the app.
+
+        Args:
+            only_if_due: Skip the read when another worker synced within the sync interval
+
+        Returns:
+            Number of changes logged
+        """
+        init_db()
+        with self._lock:
+            conn = self._transaction()
+            try:
+                synced_at, _, _ = self._store_row(conn)
+                if only_if_due and time.time() - synced_at <= change_feed.cache_ttl(DROPDOWN_SYNC_SECONDS):
+                    self._catch_up(conn)
+                    count = 0
+                else:
+                    count = self._sync(conn)
+                conn.execute("COMMIT")
+                return count
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+    # --- Reads ---
+
+    def version(self) -> int:
+        """Current version (changes whenever any option or category changes)."""
+        self._ensure_fresh()
+        return self._version
+
+    def options(self) -> Dict[str, List[str]]:
+        """Category -> options in row order (repeats kept once), categories in column order."""
+        self._ensure_fresh()
+        with self._lock:
+            result: Dict[str, List[str]] = {}
+            for col in sorted(self._headers):
+                header = self._headers[col]
+                column = self._columns.get(col, {})
+                values = result.setdefault(header, [])
+                for row in sorted(column):
+                    if column[row] not in values:
+                        values.append(column[row])
+            return result
+
+    def cells(self) -> Dict[str, List[Tuple[int, str]]]:
+        """Category -> (row, value) for every filled cell, repeats included, for row-addressed callers."""
+        self._ensure_fresh()
+        with self._lock:
+            return {
+                self._headers[col]: [(row, self._columns.get(col, {})[row]) for row in sorted(self._columns.get(col, {}))]
+                for col in sorted(self._headers)
+            }
+
+    def changes_since(self, since: int) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """
+        Option changes after version `since`.
+
+        Returns:
+            (current version, changes); changes is None when the caller must reload in
+            full (unknown or pruned version, or a change that is not a single option)
+        """
+        self._ensure_fresh()
+        conn = _connect()
+        try:
+            _, pruned_through, version = self._store_row(conn)
+            if since == version:
+                return version, []
+            if since > version or since < pruned_through:
+                _stats["full"] += 1
+                return version, None
+            rows = conn.execute(
+                "SELECT version, op, category, value FROM changes WHERE store = ? AND version > ? AND version <= ? ORDER BY version",
+                (self.name, since, version),
+            ).fetchall()
+        finally:
+            conn.close()
+        if any(op == "reset" for _, op, _, _ in rows):
+            _stats["full"] += 1
+            return version, None
+        with self._lock:
+            present = {(self._headers.get(col), value) for col, column in self._columns.items() for value in column.values()}
+        # Clients hold option sets, not cells: clearing one of two cells with the same option removes nothing
+        changes = [
+            {"version": v, "op": op, "field": category, "value": value}
+            for v, op, category, value in rows
+            if not (op == "remove" and (category, value) in present)
+        ]
+        _stats["deltas"] += 1
+        return version, changes
+
+    # --- Writes ---
+
+    def _column(self, category: str) -> Optional[int]:
+        for col, header in self._headers.items():
+            if header == category:
+                return col
+        wanted = category.strip().lower()
+        return next((col for col, header in self._headers.items() if header.strip().lower() == wanted), None)
+
+    def add(self, category: str, value: str, create: bool = False) -> Dict[str, Any]:
+        """
+        Append one option below the last filled cell of its column (one cell write).
+
+        Args:
+            category: Column header (exact, else case-insensitive)
+            value: Option to add; an option already present is not written twice
+            create: Add the category as a new column when it does not exist
+
+        Returns:
+            {"category", "value", "row", "version", "added"}
+
+        Raises:
+            KeyError: Unknown category and create is False
+        """
+        value = _clean(value)
+        init_db()
+        with self._lock:
+            conn = self._transaction()
+            try:
+                self._catch_up(conn)
+                col = self._column(category)
+                data = []
+                if col is None:
+                    if not create:
+                        raise KeyError(category)
+                    col = max(list(self._headers) + list(self._columns) + [0]) + 1
+                    data.append({"range": gspread.utils.rowcol_to_a1(1, col), "values": [[category]]})
+                column = self._columns.get(col, {})
+                existing = next((row for row in sorted(column) if column[row] == value), None)
+                if existing is not None:
+                    conn.execute("ROLLBACK")
+                    return {"category": self._headers.get(col, category), "value": value, "row": existing,
+                            "version": self._version, "added": False}
+                row = max(list(column) + [1]) + 1
+                data.append({"range": gspread.utils.rowcol_to_a1(row, col), "values": [[value]]})
+                self._sheet().batch_update(data, value_input_option="USER_ENTERED")
+                _stats["cell_writes"] += len(data)
+                if col not in self._headers:
+                    self._record(conn, "add_field", category, None, col, 1)
+                version = self._record(conn, "add", self._headers[col], value, col, row)
+                self._prune(conn)
+                conn.execute("COMMIT")
+                return {"category": self._headers[col], "value": value, "row": row, "version": version, "added": True}
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+    def remove(self, category: str, value: Optional[str] = None, row: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Clear one option cell, found by value (first occurrence) or by row.
+
+        Returns:
+            {"category", "value", "row", "version"}
+
+        Raises:
+            KeyError: Unknown category, or no such option / row
+        """
+        init_db()
+        with self._lock:
+            conn = self._transaction()
+            try:
+                self._catch_up(conn)
+                col = self._column(category)
+                if col is None:
+                    raise KeyError(category)
+                column = self._columns.get(col, {})
+                if row is None:
+                    row = next((r for r in sorted(column) if column[r] == _clean(value)), None)
+                if row is None or row not in column:
+                    raise KeyError(value if value is not None else row)
+                removed = column[row]
+                self._sheet().update(gspread.utils.rowcol_to_a1(row, col), [[""]])
+                _stats["cell_writes"] += 1
+                version = self._record(conn, "remove", self._headers[col], removed, col, row)
+                self._prune(conn)
+                conn.execute("COMMIT")
+                return {"category": self._headers[col], "value": removed, "row": row, "version": version}
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+    def add_fields(self, fields: Dict[str, List[str]]) -> int:
+        """
+        Add missing categories with their options as new columns, in one batch write.
+
+        Returns:
+            Number of categories added
+        """
+        init_db()
+        with self._lock:
+            conn = self._transaction()
+            try:
+                self._catch_up(conn)
+                known = {header for header in self._headers.values()}
+                new_fields = [(name, [_clean(o) for o in options if _clean(o)]) for name, options in fields.items() if name not in known]
+                if not new_fields:
+                    conn.execute("ROLLBACK")
+                    return 0
+                next_col = max(list(self._headers) + list(self._columns) + [0]) + 1
+                data, planned = [], []
+                for offset, (name, options) in enumerate(new_fields):
+                    col = next_col + offset
+                    options = list(dict.fromkeys(options))
+                    data.append({"range": gspread.utils.rowcol_to_a1(1, col), "values": [[name]]})
+                    if options:
+                        data.append({
+                            "range": f"{gspread.utils.rowcol_to_a1(2, col)}:{gspread.utils.rowcol_to_a1(len(options) + 1, col)}",
+                            "values": [[option] for option in options],
+                        })
+                    planned.append((name, col, options))
+                self._sheet().batch_update(data, value_input_option="USER_ENTERED")
+                _stats["cell_writes"] += sum(len(options) + 1 for _, _, options in planned)
+                for name, col, options in planned:
+                    self._record(conn, "add_field", name, None, col, 1)
+                    for row, option in enumerate(options, start=2):
+                        self._record(conn, "add", name, option, col, row)
+                self._prune(conn)
+                conn.execute("COMMIT")
+                return len(planned)
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "worksheet": self.worksheet,
+                "version": self._version if self._version >= 0 else None,
+                "categories": len(self._headers),
+                "options": sum(len(column) for column in self._columns.values()),
+            }
+
+
+def register(name: str, spreadsheet_id: Optional[str], worksheet: str,
+             open_worksheet: Callable[[], gspread.Worksheet]) -> DropdownStore:
+    """
+    Create (or return the existing) store for a dropdown sheet and watch it for
+    edits made directly in Google Sheets.
+    """
+    with _registry_lock:
+        store = _stores.get(name)
+        if store is None:
+            store = DropdownStore(name, spreadsheet_id, worksheet, open_worksheet)
+            _stores[name] = store
+            if spreadsheet_id:
+                _by_worksheet[(spreadsheet_id, worksheet)] = store
+    change_feed.watch_worksheet(spreadsheet_id, worksheet, full_hash=True)
+    return store
+
+
+def _on_sheet_change(event: Dict[str, Any]) -> None:
+    # Polling worker only: diff the sheet against the mirror once and log the edits for everyone
+    store = _by_worksheet.get((event.get("spreadsheet_id"), event.get("worksheet")))
+    if store is not None:
+        store.sync()
+
+
+change_feed.subscribe(_on_sheet_change)
+
+
+def options_from_workbook(workbook, sheet_name: str, max_rows: int = 1000) -> Dict[str, List[str]]:
+    """
+    Dropdown options from a column-per-category Excel sheet in one pass over its rows
+    (the "List box" tab of the upload workbook). Date columns and date cells are skipped.
+
+    Returns:
+        Category -> sorted options (categories without options are left out)
+    """
+    if sheet_name not in workbook.sheetnames:
+        return {}
+    ws = workbook[sheet_name]
+    rows = []
+    for row in ws.iter_rows(min_row=1, max_row=min(ws.max_row, max_rows - 1), values_only=True):
+        # Skip date/time cells (type check as in the original per-cell reader)
+        rows.append(["" if value is None or type(value).__module__ == "datetime" else value for value in row])
+    options = options_from_columns(rows, skip_headers=("date",))
+    return {header: sorted(values) for header, values in options.items() if values}
+
+
+def status() -> Dict[str, Any]:
+    """Loaded stores with their version and size, plus counters for this worker."""
+    with _registry_lock:
+        stores = list(_stores.values())
+    return {"stores": {store.name: store.stats() for store in stores}, "stats": dict(_stats)}
+
+
+def _prometheus_lines() -> List[str]:
+    with _registry_lock:
+        stores = list(_stores.values())
+    stats = [store.stats() for store in stores]
+    return instrumentation.gauge_lines(
+        "crm_dropdown_version", "Dropdown store version loaded by this worker",
+        [({"store": store.name}, s["version"] or 0) for store, s in zip(stores, stats)],
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
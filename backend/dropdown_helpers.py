@@ -1,9 +1,11 @@
 # Required imports for dropdown management
 import os
-import json
 import gspread
+import sheets_scheduler
 from google.oauth2.service_account import Credentials
 from fastapi import HTTPException
+import dropdown_engine
+import schema_registry
 
 # Import constants from main module (will be accessed via main.py)
 # These are defined in main.py and passed through function calls
@@ -13,9 +15,6 @@ GOOGLE_SHEET_NAME = "Sheet1"
 DROPDOWN_OPTION_SHEET = "DropdownOption"
 SCHEMA_CACHE_FILE = "schema_cache.json"
 
-# Global reference to fields cache (updated via main.py)
-fields_cache = []
-
 # Dropdown Management Helper Functions
 
 def get_dropdown_option_sheet():
@@ -25,7 +24,7 @@ def get_dropdown_option_sheet():
     
     scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
     creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
     
     spreadsheet = client.open_by_key(GOOGLE_SHEET_ID) if GOOGLE_SHEET_ID else client.open(GOOGLE_SHEET_NAME)
     
@@ -45,13 +44,10 @@ def initialize_dropdown_sheet(sheet):
     """Initialize DropdownOption sheet with existing dropdown fields from schema."""
     try:
         # Load current schema
-        if not fields_cache:
-            # load_schema() call removed to avoid NameError/Circular Import
-            pass
-
+        schema_fields = schema_registry.get_fields("enquiry") or []
         
         # Find all dropdown fields
-        dropdown_fields = [f for f in fields_cache if f.get('data_type') == 'dropdown' and f.get('options')]
+        dropdown_fields = [f for f in schema_fields if f.get('data_type') == 'dropdown' and f.get('options')]
         
         if not dropdown_fields:
             # Add some default headers
@@ -86,130 +82,48 @@ def initialize_dropdown_sheet(sheet):
         sheet.update('1:1', [['Service Location']], value_input_option='USER_ENTERED')
 
 
+# DropdownOption sheet held in memory with a version (see dropdown_engine.py)
+field_options = dropdown_engine.register(
+    "field_options", GOOGLE_SHEET_ID, DROPDOWN_OPTION_SHEET, lambda: get_dropdown_option_sheet()[0]
+)
+
+
 def get_all_dropdown_options():
     """Get all dropdown options from DropdownOption sheet."""
-    sheet, _ = get_dropdown_option_sheet()
-    data = sheet.get_all_values()
-    
-    if not data or len(data) < 1:
-        return {}
-    
-    headers = data[0]
-    result = {}
-    
-    for col_idx, field_name in enumerate(headers):
-        if not field_name.strip():
-            continue
-        
-        options = []
-        for row in data[1:]:
-            if col_idx < len(row) and row[col_idx].strip():
-                options.append(row[col_idx].strip())
-        
-        result[field_name] = options
-    
-    return result
+    return field_options.options()
 
 
 def get_dropdown_options_for_field(field_name: str):
     """Get dropdown options for a specific field."""
-    sheet, _ = get_dropdown_option_sheet()
-    data = sheet.get_all_values()
-    
-    if not data or len(data) < 1:
-        return []
-    
-    headers = data[0]
-    
-    # Find column index for field
-    try:
-        col_idx = headers.index(field_name)
-    except ValueError:
-        # Field not found - return empty
-        return []
-    
-    options = []
-    for row in data[1:]:
-        if col_idx < len(row) and row[col_idx].strip():
-            options.append(row[col_idx].strip())
-    
-    return options
+    return field_options.options().get(field_name, [])
 
 
 def add_dropdown_option(field_name: str, option: str):
     """Add a new option to a dropdown field."""
-    sheet, _ = get_dropdown_option_sheet()
-    data = sheet.get_all_values()
-    
-    if not data or len(data) < 1:
-        # Initialize with this field
-        sheet.update('1:1', [[field_name]], value_input_option='USER_ENTERED')
-        sheet.update('A2', [[option]], value_input_option='USER_ENTERED')
-        return {"status": "success", "message": f"Added {option} to new field {field_name}"}
-    
-    headers = data[0]
-    
-    # Find or create column
-    try:
-        col_idx = headers.index(field_name)
-    except ValueError:
-        # Add new column
-        col_idx = len(headers)
-        headers.append(field_name)
-        sheet.update('1:1', [headers], value_input_option='USER_ENTERED')
-    
-    # Find next empty row in column
-    next_row = 2  # Start at row 2 (row 1 is headers)
-    for row in data[1:]:
-        if col_idx < len(row) and row[col_idx].strip():
-            next_row += 1
-        else:
-            break
-    
-    # Add option
-    col_letter = chr(65 + col_idx)  # A, B, C, etc.
-    cell = f"{col_letter}{next_row}"
-    sheet.update(cell, [[option]], value_input_option='USER_ENTERED')
+    # Appends one cell below the field's last option (and the header cell for a new field)
+    result = field_options.add(field_name, option, create=True)
     
     # Update schema cache
     sync_dropdown_options_to_schema()
     
-    return {"status": "success", "message": f"Added {option} to {field_name}"}
+    return {"status": "success", "message": f"Added {option} to {field_name}", "version": result["version"]}
 
 
 def delete_dropdown_option(field_name: str, option: str):
     """Remove an option from a dropdown field."""
-    sheet, _ = get_dropdown_option_sheet()
-    data = sheet.get_all_values()
-    
-    if not data or len(data) < 1:
-        raise HTTPException(status_code=404, detail="DropdownOption sheet is empty")
-    
-    headers = data[0]
-    
-    # Find column
-    try:
-        col_idx = headers.index(field_name)
-    except ValueError:
+    if field_name not in field_options.options():
         raise HTTPException(status_code=404, detail=f"Field {field_name} not found")
     
-    # Find and remove option
-    found = False
-    for row_idx, row in enumerate(data[1:], start=2):
-        if col_idx < len(row) and row[col_idx].strip() == option:
-            col_letter = chr(65 + col_idx)
-            cell = f"{col_letter}{row_idx}"
-            sheet.update(cell, [['']], value_input_option='USER_ENTERED')
-            found = True
-            break
-    
-    if not found:
+    # Clears the single cell holding the option
+    try:
+        result = field_options.remove(field_name, value=option)
+    except KeyError:
         raise HTTPException(status_code=404, detail=f"Option {option} not found in {field_name}")
     
     # Update schema cache
     sync_dropdown_options_to_schema()
     
-    return {"status": "success", "message": f"Removed {option} from {field_name}"}
+    return {"status": "success", "message": f"Removed {option} from {field_name}", "version": result["version"]}
 
 
 def sync_dropdown_options_to_schema():
@@ -219,12 +133,10 @@ def sync_dropdown_options_to_schema():
         dropdown_options = get_all_dropdown_options()
         
         # Load current schema
-        if not os.path.exists(SCHEMA_CACHE_FILE):
+        schema = schema_registry.get_fields("enquiry")
+        if not schema:
             return
         
-        with open(SCHEMA_CACHE_FILE, 'r', encoding='utf-8') as f:
-            schema = json.load(f)
-        
         # Update dropdown options in schema
         updated = False
         for field in schema:
@@ -233,15 +145,8 @@ def sync_dropdown_options_to_schema():
                 field['options'] = dropdown_options[field_name]
                 updated = True
         
-        # Save updated schema
-        if updated:
-            with open(SCHEMA_CACHE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(schema, f, indent=2, ensure_ascii=False)
-            
-            # Reload fields cache
-            global fields_cache
-            fields_cache = schema
-            
+        # Publish updated schema (persists schema_cache.json and hot-reloads caches)
+        if updated and schema_registry.publish("enquiry", schema, "dropdown_sheet")["changed"]:
             print(f"[DropdownSync] Updated schema with dropdown options from sheet")
         
     except Exception as e:
@@ -252,45 +157,17 @@ def sync_schema_to_dropdown_sheet():
     """Create columns in DropdownOption sheet for new schema dropdown fields."""
     try:
         # Load schema
-        if not fields_cache:
-            load_schema()
+        schema_fields = schema_registry.get_fields("enquiry") or []
         
         # Get dropdown fields from schema
         schema_dropdowns = {f['name']: f.get('options', []) 
-                           for f in fields_cache 
+                           for f in schema_fields 
                            if f.get('data_type') == 'dropdown'}
         
-        # Get existing columns from sheet
-        sheet, _ = get_dropdown_option_sheet()
-        data = sheet.get_all_values()
-        
-        if not data:
-            data = [[]]
-        
-        headers = data[0] if data else []
-        
-        # Find new columns
-        new_fields = [name for name in schema_dropdowns.keys() if name not in headers]
-        
-        if new_fields:
-            # Add new columns
-            for field_name in new_fields:
-                headers.append(field_name)
-            
-            # Update headers
-            sheet.update('1:1', [headers], value_input_option='USER_ENTERED')
-            
-            # Add options for new fields
-            for col_idx, field_name in enumerate(headers):
-                if field_name in schema_dropdowns:
-                    options = schema_dropdowns[field_name]
-                    col_letter = chr(65 + col_idx)
-                    
-                    for row_idx, option in enumerate(options, start=2):
-                        cell = f"{col_letter}{row_idx}"
-                        sheet.update(cell, [[option]], value_input_option='USER_ENTERED')
-            
-            print(f"[DropdownSync] Added {len(new_fields)} new columns to DropdownOption sheet")
+        # New fields and their options are written as new columns in one batch
+        added = field_options.add_fields(schema_dropdowns)
+        if added:
+            print(f"[DropdownSync] Added {added} new columns to DropdownOption sheet")
         
         # Also sync back to ensure consistency
         sync_dropdown_options_to_schema()
@@ -0,0 +1,511 @@
+"""
+Duplicate-Lead Index
+Blocking index over normalized phone, email and name-plus-location keys with fuzzy scoring, for per-submit duplicate checks and a batch cluster report
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import change_feed
+import instrumentation
+import job_runner
+import sheets_scheduler
+import shared_cache
+
+# Rebuild from the sheet at most this often; API writes and change-feed appends keep
+# the index current in between (see record_row / invalidate)
+DUPLICATE_INDEX_TTL_SECONDS = int(os.getenv("DUPLICATE_INDEX_TTL_SECONDS", "900"))
+DUPLICATE_MIN_SCORE = float(os.getenv("DUPLICATE_MIN_SCORE", "0.8"))
+MAX_BLOCK_SIZE = int(os.getenv("DUPLICATE_MAX_BLOCK_SIZE", "50"))  # Bigger blocks (a clinic's phone) prove nothing
+CLUSTERS_TIME = os.getenv("DUPLICATE_CLUSTERS_TIME", "02:30")
+CLUSTERS_ENABLED = os.getenv("DUPLICATE_CLUSTERS_ENABLED", "1").strip() == "1"
+
+CLUSTERS_JOB_ID = "lead_duplicate_clusters"
+REPORT_CACHE = "lead_duplicates"  # shared_cache namespace holding the last cluster report
+
+# Field weights; a pair is scored over the fields both leads have
+WEIGHTS = {"phone": 0.4, "email": 0.3, "name": 0.2, "location": 0.1}
+
+# Header candidates per field, in order of preference (matched case-insensitively)
+FIELD_HEADERS = {
+    "phone": ["mobile number", "mobile", "phone number", "phone", "contact number", "contact no"],
+    "email": ["email id", "email", "email address"],
+    "name": ["patient name", "name", "full name"],
+    "location": ["patient location", "location", "area", "city"],
+}
+
+TITLES = {"mr", "mrs", "ms", "miss", "dr", "shri", "sri", "smt", "master", "baby", "late"}
+
+# (member ID, phone, email, name, location) - all normalized
+Lead = Tuple[str, str, str, str, str]
+
+
+def normalize_phone(value: Any) -> str:
+    """Last 10 digits (drops +91 / leading 0); blank for short numbers and 0000000000-style fillers."""
+    digits = re.sub(r"\D", "", str(value or ""))
+    if len(digits) > 10:
+        digits = digits[-10:]
+    if len(digits) < 7 or len(set(digits)) == 1:
+        return ""
+    return digits
+
+
+def normalize_email(value: Any) -> str:
+    """Lowercased address without +tags; Gmail dots are ignored like Gmail does."""
+    text = str(value or "").strip().lower()
+    local, at, domain = text.partition("@")
+    if not at or not local or "." not in domain:
+        return ""
+    local = local.split("+", 1)[0]
+    if domain in ("gmail.com", "googlemail.com"):
+        local, domain = local.replace(".", ""), "gmail.com"
+    return f"{local}@{domain}"
+
+
+def normalize_text(value: Any) -> str:
+    text = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def normalize_name(value: Any) -> str:
+    """Lowercase words without punctuation or titles (Mr, Dr, Smt, ...)."""
+    return " ".join(w for w in normalize_text(value).split() if w not in TITLES)
+
+
+def blocking_keys(lead: Lead) -> Set[str]:
+    """
+    Keys a lead is filed under; only leads sharing a key are ever compared.
+    Name keys are the first three letters of one name word plus the initial of the other,
+    in both orders, so "Ravi Kumar" / "Kumar Ravi" / "Ravi Kumaar" meet in the same block.
+    """
+    _, phone, email, name, location = lead
+    keys = set()
+    if phone:
+        keys.add(f"p:{phone}")
+    if email:
+        keys.add(f"e:{email}")
+    words = name.split()
+    if words and location:
+        first, last = words[0], words[-1]
+        keys.add(f"n:{first[:3]}{last[:1]}|{location}")
+        keys.add(f"n:{last[:3]}{first[:1]}|{location}")
+    return keys
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Best of the plain and word-sorted edit similarity (0..1)."""
+    if a == b:
+        return 1.0
+    plain = SequenceMatcher(None, a, b).ratio()
+    sorted_a, sorted_b = " ".join(sorted(a.split())), " ".join(sorted(b.split()))
+    return max(plain, SequenceMatcher(None, sorted_a, sorted_b).ratio())
+
+
+def score(a: Lead, b: Lead, min_score: float = 0.0) -> Tuple[float, List[str]]:
+    """
+    Weighted similarity of two leads over the fields both have, and the fields that matched.
+    Phone and email count only when equal; names and locations are compared fuzzily, and
+    skipped when even a perfect name and location could not reach `min_score`.
+    """
+    total = weight = fuzzy = 0.0
+    reasons = []
+    for field, i in (("phone", 1), ("email", 2)):
+        if a[i] and b[i]:
+            weight += WEIGHTS[field]
+            if a[i] == b[i]:
+                total += WEIGHTS[field]
+                reasons.append(field)
+    for field, i in (("name", 3), ("location", 4)):
+        if a[i] and b[i]:
+            fuzzy += WEIGHTS[field]
+    weight += fuzzy
+    if weight < WEIGHTS["name"]:  # A shared location alone is no evidence
+        return 0.0, []
+    if (total + fuzzy) / weight < min_score:
+        return 0.0, []
+    for field, i in (("name", 3), ("location", 4)):
+        if a[i] and b[i]:
+            similarity = name_similarity(a[i], b[i])
+            total += WEIGHTS[field] * similarity
+            if similarity >= 0.85:
+                reasons.append(field)
+    return round(total / weight, 3), reasons
+
+
+def field_columns(headers: List[str]) -> Dict[str, Optional[int]]:
+    """Column index per field (phone, email, name, location, member_id) for a header row."""
+    lowered = [" ".join(str(h).split()).lower() for h in headers]
+    columns: Dict[str, Optional[int]] = {}
+    for field, candidates in FIELD_HEADERS.items():
+        columns[field] = next((lowered.index(c) for c in candidates if c in lowered), None)
+    columns["member_id"] = next((i for i, h in enumerate(lowered) if "member" in h and ("id" in h or "key" in h)), None)
+    return columns
+
+
+def lead_from_values(values: Dict[str, Any]) -> Lead:
+    """Normalized lead from header -> value (a form payload or a row dict)."""
+    by_header = {" ".join(str(k).split()).lower(): v for k, v in values.items()}
+
+    def pick(candidates: List[str]) -> Any:
+        return next((by_header[c] for c in candidates if str(by_header.get(c) or "").strip()), "")
+
+    member_id = next((str(v).strip() for k, v in by_header.items()
+                      if "member" in k and ("id" in k or "key" in k) and str(v or "").strip()), "")
+    return (
+        member_id,
+        normalize_phone(pick(FIELD_HEADERS["phone"])),
+        normalize_email(pick(FIELD_HEADERS["email"])),
+        normalize_name(pick(FIELD_HEADERS["name"])),
+        normalize_text(pick(FIELD_HEADERS["location"])),
+    )
+
+
+class DuplicateIndex:
+    def __init__(self, name: str):
+        """
+        Blocking index of one lead worksheet.
+
+        Args:
+            name: Worksheet title the index was built from
+        """
+        self.name = name
+        self.headers: List[str] = []
+        self.built_at: Optional[datetime] = None
+        self._columns: Dict[str, Optional[int]] = {}
+        self._leads: Dict[int, Lead] = {}  # Sheet row number -> lead
+        self._blocks: Dict[str, Set[int]] = {}
+        self._by_member: Dict[str, int] = {}
+        self._refreshing = False
+        self._lock = threading.RLock()
+
+    # --- Maintenance ---
+
+    def _lead_from_row(self, row: List[Any]) -> Lead:
+        def cell(field: str) -> str:
+            col = self._columns.get(field)
+            return str(row[col]) if col is not None and col < len(row) else ""
+
+        return (cell("member_id").strip(), normalize_phone(cell("phone")), normalize_email(cell("email")),
+                normalize_name(cell("name")), normalize_text(cell("location")))
+
+    def _add(self, row_number: int, lead: Lead) -> None:
+        self._leads[row_number] = lead
+        if lead[0]:
+            self._by_member[lead[0]] = row_number
+        for key in blocking_keys(lead):
+            self._blocks.setdefault(key, set()).add(row_number)
+
+    def _remove(self, row_number: int) -> None:
+        lead = self._leads.pop(row_number, None)
+        if lead is None:
+            return
+        if lead[0] and self._by_member.get(lead[0]) == row_number:
+            del self._by_member[lead[0]]
+        for key in blocking_keys(lead):
+            block = self._blocks.get(key)
+            if block is not None:
+                block.discard(row_number)
+                if not block:
+                    del self._blocks[key]
+
+    def rebuild(self, values: List[List[Any]]) -> None:
+        """
+        Rebuild the index from a full `get_all_values()` result (header row first).
+
+        Args:
+            values: Sheet values including the header row
+        """
+        started = time.perf_counter()
+        # Build aside and swap, so duplicate checks keep answering during a rebuild
+        fresh = DuplicateIndex(self.name)
+        fresh.headers = [str(h).strip() for h in values[0]] if values else []
+        fresh._columns = field_columns(fresh.headers)
+        for offset, row in enumerate(values[1:]):
+            if any(str(v).strip() for v in row):
+                fresh._add(offset + 2, fresh._lead_from_row(row))
+        with self._lock:
+            self.headers, self._columns = fresh.headers, fresh._columns
+            self._leads, self._blocks, self._by_member = fresh._leads, fresh._blocks, fresh._by_member
+            self.built_at = datetime.now()
+        print(f"[Duplicate Index] Built '{self.name}': {len(self._leads)} leads, {len(self._blocks)} blocks "
+              f"in {time.perf_counter() - started:.2f}s")
+
+    def upsert_row(self, row_number: int, headers: List[str], row: List[Any]) -> None:
+        """
+        Re-index a single row after it was written (update or append).
+
+        Args:
+            row_number: 1-based sheet row number
+            headers: Header row the values were written against
+            row: Row values as written
+        """
+        with self._lock:
+            if self.built_at is None:
+                return
+            if [str(h).strip() for h in headers] != self.headers:
+                # Header layout changed under us - let the next read rebuild
+                self.built_at = None
+                return
+            self._remove(row_number)
+            self._add(row_number, self._lead_from_row(list(row)))
+
+    def invalidate(self) -> None:
+        """Force a rebuild on next access (e.g. after rows were deleted and shifted)."""
+        with self._lock:
+            self.built_at = None
+
+    def refresh_in_background(self, loader: Callable[[], List[List[Any]]]) -> None:
+        """Rebuild off the request path when stale (at most one rebuild at a time)."""
+        with self._lock:
+            if self._refreshing or not self.is_stale():
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.rebuild(loader())
+            except Exception as e:
+                print(f"[Duplicate Index] Background rebuild of '{self.name}' failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name=f"duplicate-index-{self.name}", daemon=True).start()
+
+    def is_stale(self) -> bool:
+        if self.built_at is None:
+            return True
+        return (datetime.now() - self.built_at).total_seconds() > change_feed.cache_ttl(DUPLICATE_INDEX_TTL_SECONDS)
+
+    # --- Queries ---
+
+    def _candidates(self, lead: Lead, exclude: Optional[int] = None) -> Set[int]:
+        found: Set[int] = set()
+        for key in blocking_keys(lead):
+            block = self._blocks.get(key)
+            if block and len(block) <= MAX_BLOCK_SIZE:
+                found |= block
+        found.discard(exclude)
+        return found
+
+    def _matches(self, lead: Lead, exclude: Optional[int], min_score: float, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            candidates = [(row, self._leads[row]) for row in self._candidates(lead, exclude)]
+        matches = []
+        for row_number, other in candidates:
+            value, reasons = score(lead, other, min_score)
+            if value >= min_score:
+                matches.append({"member_id": other[0], "row": row_number, "score": value, "matched_on": reasons})
+        matches.sort(key=lambda m: (-m["score"], m["row"]))
+        return matches[:limit]
+
+    def duplicates_of_member(self, member_id: str, min_score: float = DUPLICATE_MIN_SCORE,
+                             limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+        """
+        Leads that look like the same person as an existing lead.
+
+        Returns:
+            Matches (best first), or None when the member ID is not in the sheet
+        """
+        with self._lock:
+            row_number = self._by_member.get(str(member_id).strip())
+            lead = self._leads.get(row_number) if row_number else None
+        if lead is None:
+            return None
+        return self._matches(lead, row_number, min_score, limit)
+
+    def duplicates_of_record(self, values: Dict[str, Any], min_score: float = DUPLICATE_MIN_SCORE,
+                             limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Existing leads that look like the same person as a form payload (header -> value).
+        A lead with the payload's own member ID is not reported.
+        """
+        lead = lead_from_values(values)
+        with self._lock:
+            exclude = self._by_member.get(lead[0]) if lead[0] else None
+        return self._matches(lead, exclude, min_score, limit)
+
+    def lead(self, row_number: int) -> Optional[Lead]:
+        with self._lock:
+            return self._leads.get(row_number)
+
+    def clusters(self, min_score: float = DUPLICATE_MIN_SCORE) -> List[Dict[str, Any]]:
+        """
+        Groups of leads connected by duplicate pairs (union-find over every block),
+        largest first. Each pair is scored once even when it shares several blocks.
+        """
+        with self._lock:
+            blocks = [sorted(b) for b in self._blocks.values() if 1 < len(b) <= MAX_BLOCK_SIZE]
+            leads = dict(self._leads)
+
+        parent: Dict[int, int] = {}
+
+        def find(x: int) -> int:
+            while parent.get(x, x) != x:
+                parent[x] = parent.get(parent[x], parent[x])
+                x = parent[x]
+            return x
+
+        compared: Set[Tuple[int, int]] = set()
+        best: Dict[int, float] = {}
+        for block in blocks:
+            for i, a in enumerate(block):
+                for b in block[i + 1:]:
+                    if (a, b) in compared:
+                        continue
+                    compared.add((a, b))
+                    value, _ = score(leads[a], leads[b], min_score)
+                    if value >= min_score:
+                        ra, rb = find(a), find(b)
+                        if ra != rb:
+                            parent[max(ra, rb)] = min(ra, rb)
+                        best[a] = max(best.get(a, 0.0), value)
+                        best[b] = max(best.get(b, 0.0), value)
+
+        groups: Dict[int, List[int]] = {}
+        for row_number in best:
+            groups.setdefault(find(row_number), []).append(row_number)
+        clusters = [
+            {
+                "size": len(rows),
+                "rows": sorted(rows),
+                "member_ids": [leads[r][0] for r in sorted(rows)],
+                "min_score": min(best[r] for r in rows),
+            }
+            for rows in groups.values()
+        ]
+        clusters.sort(key=lambda c: (-c["size"], c["rows"][0]))
+        return clusters
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sheet": self.name,
+                "leads": len(self._leads),
+                "blocks": len(self._blocks),
+                "oversized_blocks": sum(1 for b in self._blocks.values() if len(b) > MAX_BLOCK_SIZE),
+                "columns": {field: (self.headers[col] if col is not None else None) for field, col in self._columns.items()},
+                "built_at": self.built_at.isoformat() if self.built_at else None,
+            }
+
+
+# Global index registry keyed by worksheet title
+_indexes: Dict[str, DuplicateIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def get_index(sheet_name: str) -> DuplicateIndex:
+    """Get (or create an empty) index for a worksheet."""
+    with _registry_lock:
+        index = _indexes.get(sheet_name)
+        if index is None:
+            index = DuplicateIndex(sheet_name)
+            _indexes[sheet_name] = index
+        return index
+
+
+def get_duplicate_index(sheet_name: str, loader: Callable[[], List[List[Any]]]) -> DuplicateIndex:
+    """
+    Get a fresh index for a worksheet, calling `loader` only when a rebuild is needed.
+
+    Args:
+        sheet_name: Worksheet title
+        loader: Returns the sheet's `get_all_values()`
+    """
+    index = get_index(sheet_name)
+    stale = index.is_stale()
+    instrumentation.record_cache("duplicate_index", not stale)
+    if stale:
+        index.rebuild(loader())
+    return index
+
+
+def record_row(sheet_name: str, row_number: int, headers: List[str], row: List[Any]) -> None:
+    """Keep an already built index current after a row write."""
+    index = _indexes.get(sheet_name)
+    if index is not None:
+        index.upsert_row(row_number, headers, row)
+
+
+def invalidate(sheet_name: Optional[str] = None) -> None:
+    """Drop one worksheet's index (or all) so the next access rebuilds it."""
+    with _registry_lock:
+        targets = [_indexes[sheet_name]] if sheet_name in _indexes else ([] if sheet_name else list(_indexes.values()))
+    for index in targets:
+        index.invalidate()
+
+
+# --- Batch cluster report ---
+
+@instrumentation.timed_job("lead_duplicate_clusters")
+def clusters_job(load_index: Callable[[], DuplicateIndex]) -> Dict[str, Any]:
+    """
+    Find every duplicate cluster and store the report for /api/leads/duplicates/clusters
+    (shared by all workers). Runs in the job-runner leader only.
+
+    Args:
+        load_index: Returns a fresh index of the lead sheet
+
+    Returns:
+        Run summary (cluster and lead counts) for the job history
+    """
+    started = time.perf_counter()
+    with sheets_scheduler.lane("batch"):
+        index = load_index()
+    clusters = index.clusters()
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "sheet": index.name,
+        "leads": index.stats()["leads"],
+        "cluster_count": len(clusters),
+        "duplicate_leads": sum(c["size"] for c in clusters),
+        "min_score": DUPLICATE_MIN_SCORE,
+        "clusters": clusters,
+    }
+    shared_cache.set(REPORT_CACHE, "clusters", report, ttl_seconds=3 * 86400)
+    print(f"[Duplicate Index] {len(clusters)} clusters covering {report['duplicate_leads']} leads "
+          f"in {time.perf_counter() - started:.2f}s")
+    return {k: v for k, v in report.items() if k != "clusters"}
+
+
+def cluster_report() -> Optional[Dict[str, Any]]:
+    """Last stored cluster report, or None when the job has not run yet."""
+    return shared_cache.get(REPORT_CACHE, "clusters")
+
+
+def start_clusters_job(load_index: Callable[[], DuplicateIndex]) -> None:
+    """Register the nightly cluster report with the job runner (manual runs: POST /jobs/lead_duplicate_clusters/run)."""
+    if not CLUSTERS_ENABLED:
+        print("[Duplicate Index] Cluster job disabled via DUPLICATE_CLUSTERS_ENABLED")
+        return
+    job_runner.register_daily_job(CLUSTERS_JOB_ID, "Lead Duplicate Clusters", CLUSTERS_TIME, clusters_job,
+                                  args=[load_index], catch_up=False)
+    job_runner.start()
+    print(f"[Duplicate Index] Cluster job daily at {CLUSTERS_TIME}, next run: {job_runner.next_run_time(CLUSTERS_TIME)}")
+
+
+def stop_clusters_job() -> None:
+    job_runner.unregister_job(CLUSTERS_JOB_ID)
+
+
+def status() -> Dict[str, Any]:
+    with _registry_lock:
+        indexes = list(_indexes.values())
+    return {"indexes": [i.stats() for i in indexes], "min_score": DUPLICATE_MIN_SCORE, "max_block_size": MAX_BLOCK_SIZE}
+
+
+def _prometheus_lines() -> List[str]:
+    with _registry_lock:
+        indexes = list(_indexes.values())
+    return instrumentation.gauge_lines(
+        "crm_duplicate_index_leads", "Leads in this worker's duplicate index",
+        [({"sheet": i.name}, i.stats()["leads"]) for i in indexes],
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -0,0 +1,519 @@
+"""
+Export Engine Module
+Streams worksheets and filtered queries as CSV, XLSX or Parquet in fixed-size row chunks, with background jobs and downloadable artifacts for very large exports
+"""
+
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import gspread
+from fastapi import HTTPException
+
+import instrumentation
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:  # In requirements.txt; without it (slim installs) Parquet answers 501 and is not listed
+    pyarrow = None
+    parquet = None
+
+# Configuration
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")  # Background export artifacts, shared by all workers on the host
+EXPORT_DB_PATH = os.getenv("EXPORT_DB_PATH", "exports.db")
+CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "2000"))  # Rows per Sheets read; bounds memory per export
+MAX_JOBS = int(os.getenv("EXPORT_MAX_JOBS", "2"))  # Background exports running at once in one worker
+RETENTION_HOURS = float(os.getenv("EXPORT_RETENTION_HOURS", "24"))
+HEARTBEAT_SECONDS = 120  # A running job whose worker stopped updating it for this long is reported failed
+STREAM_BYTES = 64 * 1024
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Job states: queued -> running -> done | failed
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exports (
+    id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    format TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    rows INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER,
+    file_name TEXT,
+    path TEXT,
+    error TEXT,
+    owner TEXT,
+    heartbeat_at REAL,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_exports_created ON exports (created_at);
+"""
+
+_init_lock = threading.Lock()
+_initialized = False
+_job_slots = threading.BoundedSemaphore(MAX_JOBS)
+
+_stats: Dict[str, int] = {"streamed": 0, "rows_streamed": 0, "rows_written": 0, "jobs_started": 0, "jobs_done": 0,
+                          "jobs_failed": 0, "chunks_read": 0, "artifacts_removed": 0}
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(EXPORT_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def init_db() -> None:
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _initialized = True
+
+
+def formats() -> List[str]:
+    """Export formats available in this install (Parquet needs pyarrow)."""
+    return [fmt for fmt in MEDIA_TYPES if fmt != "parquet" or pyarrow is not None]
+
+
+def check_format(fmt: str) -> str:
+    fmt = (fmt or "csv").lower()
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown export format '{fmt}' (use {', '.join(MEDIA_TYPES)})")
+    if fmt not in formats():
+        raise HTTPException(status_code=501, detail="Parquet export needs the pyarrow package on the server")
+    return fmt
+
+
+class Source:
+    def __init__(self, name: str, open_worksheet: Callable[[], gspread.Worksheet],
+                 headers: Optional[Callable[[List[Any]], List[str]]] = None,
+                 matcher: Optional[Callable[[Dict[str, str]], Optional[Callable[[Dict[str, str]], bool]]]] = None,
+                 columns: Optional[List[str]] = None):
+        """
+        One exportable worksheet or query.
+
+        Args:
+            name: Export name, used in file names and job records, e.g. "invoices"
+            open_worksheet: Opens the worksheet (use the "batch" Sheets lane)
+            headers: Turns the raw header row into unique record keys (default: "Date", "Date_1", ...)
+            matcher: Builds a row predicate from the request's filter parameters, or returns
+                     None when no filter applies; the predicate gets header -> value
+            columns: Keep only these columns (case-insensitive), in this order
+        """
+        self.name = name
+        self.open_worksheet = open_worksheet
+        self.headers = headers
+        self.matcher = matcher
+        self.columns = columns
+
+
+def _unique_headers(raw_headers: List[Any]) -> List[str]:
+    import delete_engine
+    return delete_engine.unique_headers([str(h).strip() for h in raw_headers])
+
+
+def _generic_matcher(params: Dict[str, Any], keys: List[str]) -> Optional[Callable[[Dict[str, str]], bool]]:
+    """
+    Filters every export understands:
+        q=text              any cell contains the text (case-insensitive)
+        where=Header:value  the column equals the value (case-insensitive, repeatable)
+    """
+    q = str(params.get("q") or "").strip().lower()
+    positions = {}
+    for key in keys:
+        positions.setdefault(" ".join(key.split()).casefold(), key)
+    wheres = []
+    for clause in params.get("where") or []:
+        header, sep, value = str(clause).partition(":")
+        key = positions.get(" ".join(header.split()).casefold())
+        if not sep:
+            raise HTTPException(status_code=400, detail=f"Filter '{clause}' must look like Header:value")
+        if key is None:
+            raise HTTPException(status_code=400, detail=f"Unknown filter column '{header.strip()}'")
+        wheres.append((key, value.strip().lower()))
+    if not q and not wheres:
+        return None
+
+    def match(record: Dict[str, str]) -> bool:
+        if q and not any(q in str(v).lower() for v in record.values()):
+            return False
+        return all(str(record.get(key, "")).strip().lower() == value for key, value in wheres)
+
+    return match
+
+
+def _column_letter(n: int) -> str:
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class Export:
+    def __init__(self, source: Source, params: Dict[str, Any]):
+        """
+        Open the worksheet and read its header row. Raising here (unknown sheet, bad filter)
+        still reaches the client as an HTTP error, unlike failures once streaming started.
+
+        Args:
+            source: What to export
+            params: Filter parameters from the request (query string or job body)
+        """
+        self.source = source
+        self.params = params
+        self.worksheet = source.open_worksheet()
+        raw_headers = self.worksheet.row_values(1)
+        if not raw_headers:
+            raise HTTPException(status_code=404, detail=f"'{source.name}' has no header row")
+        self.width = len(raw_headers)
+        self.keys = (source.headers or _unique_headers)(raw_headers)
+        self.predicates = [p for p in (_generic_matcher(params, self.keys), source.matcher(params) if source.matcher else None) if p]
+
+        if source.columns:
+            by_name = {" ".join(str(k).split()).casefold(): i for i, k in reversed(list(enumerate(self.keys)))}
+            self.indexes = [by_name[c.casefold()] for c in source.columns if c.casefold() in by_name]
+        else:
+            self.indexes = list(range(self.width))
+        self.header_row = [str(raw_headers[i]).strip() for i in self.indexes]
+        self.rows = 0
+
+    def chunks(self) -> Iterator[List[List[str]]]:
+        """
+        Matching rows, CHUNK_ROWS Sheets rows per read. Ends at the sheet's last row or at
+        the first read that comes back empty (a block of CHUNK_ROWS blank rows).
+        """
+        last_col = _column_letter(self.width)
+        start = 2
+        while start <= max(self.worksheet.row_count, 2):
+            end = start + CHUNK_ROWS - 1
+            values = self.worksheet.get(f"A{start}:{last_col}{end}")
+            _stats["chunks_read"] += 1
+            if not values:
+                break
+            out = []
+            for row in values:
+                if not any(row):
+                    continue
+                row = list(row) + [""] * (self.width - len(row))
+                if self.predicates:
+                    record = dict(zip(self.keys, row))
+                    if not all(p(record) for p in self.predicates):
+                        continue
+                out.append([row[i] for i in self.indexes])
+            if out:
+                self.rows += len(out)
+                yield out
+            start = end + 1
+
+    def file_name(self, fmt: str) -> str:
+        return f"{self.source.name}-{datetime.now().strftime('%Y%m%d-%H%M')}.{fmt}"
+
+
+def write_csv(export: Export, out) -> None:
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(export.header_row)
+    for chunk in export.chunks():
+        writer.writerows(chunk)
+    text.detach()
+
+
+def write_xlsx(export: Export, out) -> None:
+    """openpyxl write-only mode: rows go straight to a temporary XML part, not into memory."""
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(export.source.name[:31])
+    ws.append(export.header_row)
+    for chunk in export.chunks():
+        for row in chunk:
+            ws.append(row)
+    wb.save(out)
+
+
+def write_parquet(export: Export, out) -> None:
+    """One Parquet row group per chunk; every column is a string, as in the sheet."""
+    names = [export.keys[i] or f"column_{i + 1}" for i in export.indexes]  # Parquet column names must be unique
+    schema = pyarrow.schema([(name, pyarrow.string()) for name in names])
+    with parquet.ParquetWriter(out, schema) as writer:
+        for chunk in export.chunks():
+            columns = [pyarrow.array([row[i] for row in chunk], pyarrow.string()) for i in range(len(schema))]
+            writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "parquet": write_parquet}
+
+
+def stream(export: Export, fmt: str) -> Iterator[bytes]:
+    """
+    Response body for a streamed export. CSV is encoded chunk by chunk as rows arrive;
+    XLSX and Parquet are only valid once complete, so they are written to a temporary
+    file first and then sent in STREAM_BYTES pieces.
+    """
+    started = time.perf_counter()
+    try:
+        if fmt == "csv":
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(export.header_row)
+            for chunk in export.chunks():
+                writer.writerows(chunk)
+                yield output.getvalue().encode("utf-8")
+                output.seek(0)
+                output.truncate()
+            if output.getvalue():
+                yield output.getvalue().encode("utf-8")
+        else:
+            with tempfile.TemporaryFile() as f:
+                WRITERS[fmt](export, f)
+                f.seek(0)
+                while True:
+                    block = f.read(STREAM_BYTES)
+                    if not block:
+                        break
+                    yield block
+    except Exception as e:
+        # Headers are already sent: the client sees a truncated download
+        print(f"[Export] Streaming {export.source.name} as {fmt} failed after {export.rows} rows: {e}")
+        raise
+    _stats["streamed"] += 1
+    _stats["rows_streamed"] += export.rows
+    print(f"[Export] Streamed {export.source.name} as {fmt}: {export.rows} rows in {time.perf_counter() - started:.2f}s")
+
+
+# Global export source registry keyed by name
+_sources: Dict[str, Source] = {}
+_registry_lock = threading.Lock()
+
+
+def register(source: Source) -> Source:
+    """Make a source exportable by name (the first registration wins)."""
+    with _registry_lock:
+        return _sources.setdefault(source.name, source)
+
+
+def get_source(name: str) -> Source:
+    with _registry_lock:
+        source = _sources.get(name)
+    if source is None:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{name}'")
+    return source
+
+
+def sources() -> List[str]:
+    with _registry_lock:
+        return sorted(_sources)
+
+
+def _job(row: sqlite3.Row) -> Dict[str, Any]:
+    status = row["status"]
+    error = row["error"]
+    if status in ("queued", "running") and row["heartbeat_at"] and time.time() - row["heartbeat_at"] > HEARTBEAT_SECONDS:
+        status, error = "failed", f"Worker {row['owner']} stopped before the export finished"
+    return {
+        "export_id": row["id"],
+        "source": row["source"],
+        "format": row["format"],
+        "params": json.loads(row["params"]),
+        "status": status,
+        "rows": row["rows"],
+        "bytes": row["bytes"],
+        "file_name": row["file_name"],
+        "error": error,
+        "created_at": datetime.fromtimestamp(row["created_at"]).isoformat(),
+        "finished_at": datetime.fromtimestamp(row["finished_at"]).isoformat() if row["finished_at"] else None,
+    }
+
+
+def _update(export_id: str, **fields: Any) -> None:
+    fields["heartbeat_at"] = time.time()
+    conn = _connect()
+    try:
+        conn.execute(f"UPDATE exports SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                     (*fields.values(), export_id))
+    finally:
+        conn.close()
+
+
+def remove_expired() -> int:
+    """Delete job records and artifacts older than RETENTION_HOURS."""
+    init_db()
+    cutoff = time.time() - RETENTION_HOURS * 3600
+    conn = _connect()
+    try:
+        expired = conn.execute("SELECT id, path FROM exports WHERE created_at < ? AND status IN ('done', 'failed')",
+                               (cutoff,)).fetchall()
+        for row in expired:
+            if row["path"]:
+                try:
+                    os.remove(row["path"])
+                except OSError:
+                    pass
+            conn.execute("DELETE FROM exports WHERE id = ?", (row["id"],))
+    finally:
+        conn.close()
+    _stats["artifacts_removed"] += len(expired)
+    return len(expired)
+
+
+def start_job(source: Source, fmt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Queue a background export in this worker and return its record. The artifact lands in
+    EXPORT_DIR; any worker can report the job's progress and serve the download.
+
+    Args:
+        source: Registered source, or an ad-hoc one for a single worksheet
+        fmt: csv, xlsx or parquet
+        params: Filter parameters, as for a streamed export
+    """
+    fmt = check_format(fmt)
+    export = Export(source, params)  # Unknown sheets and bad filters fail the request, not the job
+    init_db()
+    remove_expired()
+    export_id = uuid.uuid4().hex
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO exports (id, source, format, params, owner, heartbeat_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (export_id, source.name, fmt, json.dumps(params, default=str), f"pid-{os.getpid()}", now, now),
+        )
+    finally:
+        conn.close()
+    _stats["jobs_started"] += 1
+
+    def run():
+        with _job_slots:
+            _run_job(export_id, export, fmt)
+
+    threading.Thread(target=run, name=f"export-{export_id[:8]}", daemon=True).start()
+    return get_job(export_id)
+
+
+def _run_job(export_id: str, export: Export, fmt: str) -> None:
+    source = export.source
+    started = time.perf_counter()
+    tmp = None
+    try:
+        _update(export_id, status="running")
+        file_name = export.file_name(fmt)
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, f"{export_id}.{fmt}")
+        tmp = f"{path}.tmp"
+
+        chunks = export.chunks
+
+        def chunks_with_progress():
+            for chunk in chunks():
+                yield chunk
+                _update(export_id, rows=export.rows)
+
+        export.chunks = chunks_with_progress
+        with open(tmp, "wb") as f:
+            WRITERS[fmt](export, f)
+        os.replace(tmp, path)
+        _update(export_id, status="done", rows=export.rows, bytes=os.path.getsize(path), path=path,
+                file_name=file_name, finished_at=time.time())
+        _stats["jobs_done"] += 1
+        _stats["rows_written"] += export.rows
+        print(f"[Export] Job {export_id} ({source.name} as {fmt}) wrote {export.rows} rows "
+              f"in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        _update(export_id, status="failed", error=str(error), finished_at=time.time())
+        _stats["jobs_failed"] += 1
+        print(f"[Export] Job {export_id} ({source.name} as {fmt}) failed: {error}")
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def get_job(export_id: str) -> Optional[Dict[str, Any]]:
+    init_db()
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM exports WHERE id = ?", (export_id,)).fetchone()
+    finally:
+        conn.close()
+    return _job(row) if row else None
+
+
+def list_jobs(limit: int = 50) -> List[Dict[str, Any]]:
+    init_db()
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM exports ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [_job(row) for row in rows]
+
+
+def artifact(export_id: str) -> Optional[Dict[str, Any]]:
+    """Path, download name and media type of a finished job, or None."""
+    init_db()
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM exports WHERE id = ? AND status = 'done'", (export_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None or not row["path"] or not os.path.exists(row["path"]):
+        return None
+    return {"path": row["path"], "file_name": row["file_name"], "media_type": MEDIA_TYPES[row["format"]]}
+
+
+def status() -> Dict[str, Any]:
+    """Sources, formats, recent job counts and counters for this worker."""
+    init_db()
+    conn = _connect()
+    try:
+        counts = {row["status"]: row["n"] for row in
+                  conn.execute("SELECT status, COUNT(*) AS n FROM exports GROUP BY status")}
+    finally:
+        conn.close()
+    disk = 0
+    if os.path.isdir(EXPORT_DIR):
+        disk = sum(os.path.getsize(os.path.join(EXPORT_DIR, f)) for f in os.listdir(EXPORT_DIR))
+    return {
+        "sources": sources(),
+        "formats": formats(),
+        "chunk_rows": CHUNK_ROWS,
+        "jobs": counts,
+        "artifact_bytes": disk,
+        "stats": dict(_stats),
+    }
+
+
+def _prometheus_lines() -> List[str]:
+    return instrumentation.gauge_lines(
+        "crm_export_rows", "Rows exported by this worker",
+        [({"mode": "stream"}, _stats["rows_streamed"]), ({"mode": "job"}, _stats["rows_written"])],
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -0,0 +1,190 @@
+"""
+Export API Routes
+Streamed CSV/XLSX/Parquet downloads of leads, billing summaries, invoices, client lists or any worksheet, and background export jobs
+"""
+
+import os
+import re
+from typing import Any, Callable, Dict
+
+import gspread
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from google.oauth2.service_account import Credentials
+
+import export_engine
+import invoice_service
+import leads_sheet
+import sheets_scheduler
+
+router = APIRouter(prefix="/api/exports", tags=["exports"])
+
+# Spreadsheets whose worksheets can be exported by title: name -> (spreadsheet ID, credentials file)
+BOOKS: Dict[str, Callable[[], Any]] = {
+    "leads": lambda: (leads_sheet.GOOGLE_SHEET_ID, leads_sheet.CREDENTIALS_FILE),
+    "admission": lambda: (invoice_service.CRM_ADMISSION_SHEET_ID, _admission_credentials()),
+    "homecare": lambda: (os.getenv("HOMECARE_SHEET_ID"), leads_sheet.CREDENTIALS_FILE),
+}
+
+
+def _admission_credentials() -> str:
+    if os.path.exists(invoice_service.ADMISSION_CREDENTIALS_FILE):
+        return invoice_service.ADMISSION_CREDENTIALS_FILE
+    return invoice_service.CREDENTIALS_FILE
+
+
+def _open(book: str, title: str) -> gspread.Worksheet:
+    """Open a worksheet on the batch Sheets lane, so exports queue behind interactive requests."""
+    spreadsheet_id, credentials_file = BOOKS[book]()
+    if not spreadsheet_id:
+        raise HTTPException(status_code=500, detail=f"Spreadsheet '{book}' is not configured")
+    if not os.path.exists(credentials_file):
+        raise HTTPException(status_code=404, detail="Google credentials file not found")
+    creds = Credentials.from_service_account_file(credentials_file, scopes=leads_sheet.SCOPE)
+    try:
+        return sheets_scheduler.authorize(creds, lane="batch").open_by_key(spreadsheet_id).worksheet(title)
+    except gspread.WorksheetNotFound:
+        raise HTTPException(status_code=404, detail=f"Worksheet '{title}' not found in '{book}'")
+
+
+def _lead_matcher(params: Dict[str, Any]):
+    """The /search filters: ?date=&name=&member_id="""
+    date, name = params.get("date"), params.get("name")
+    member_id = params.get("member_id") or params.get("memberId")
+    if not (date or name or member_id):
+        return None
+    return lambda row: leads_sheet.lead_matches(row, date, name, member_id)
+
+
+def _billing_matcher(params: Dict[str, Any]):
+    """Sheet1 rows with a saved billing summary, plus the /search filters."""
+    leads = _lead_matcher(params)
+    return lambda row: bool(str(row.get("BillGrandTotal", "")).strip()) and (leads is None or leads(row))
+
+
+def _invoice_matcher(params: Dict[str, Any]):
+    """The GET /api/invoices filters"""
+    filters = {key: params.get(key) for key in
+               ("patient_id", "status", "care_center", "provider", "invoice_ref", "date_from", "date_to")}
+    if not any(filters.values()):
+        return None
+    return lambda record: invoice_service.invoice_matches(record, **filters)
+
+
+export_engine.register(export_engine.Source(
+    "leads", lambda: _open("leads", "Sheet1"), headers=leads_sheet.search_headers, matcher=_lead_matcher))
+export_engine.register(export_engine.Source(
+    "billing_summaries", lambda: _open("leads", "Sheet1"), headers=leads_sheet.search_headers,
+    matcher=_billing_matcher, columns=["Member ID Key", "Patient Name"] + leads_sheet.BILLING_COLUMNS))
+export_engine.register(export_engine.Source(
+    "invoices", lambda: _open("admission", "Invoice Table"), matcher=_invoice_matcher))
+export_engine.register(export_engine.Source("homecare_clients", lambda: _open("homecare", "CRM_HomeCare")))
+export_engine.register(export_engine.Source("snf_clients", lambda: _open("admission", "SNF")))
+
+
+def _params(request: Request) -> Dict[str, Any]:
+    """Filter parameters from the query string (where= may repeat)."""
+    params: Dict[str, Any] = {key: value for key, value in request.query_params.items() if key not in ("format", "where")}
+    params["where"] = request.query_params.getlist("where")
+    return params
+
+
+def _sheet_source(book: str, worksheet: str) -> export_engine.Source:
+    if book not in BOOKS:
+        raise HTTPException(status_code=404, detail=f"Unknown spreadsheet '{book}' (use {', '.join(BOOKS)})")
+    name = f"{book}-{re.sub(r'[^A-Za-z0-9_-]+', '_', worksheet).strip('_')}"
+    return export_engine.Source(name, lambda: _open(book, worksheet))
+
+
+async def _stream(source: export_engine.Source, fmt: str, params: Dict[str, Any]) -> StreamingResponse:
+    fmt = export_engine.check_format(fmt)
+    try:
+        export = await run_in_threadpool(export_engine.Export, source, params)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        export_engine.stream(export, fmt),
+        media_type=export_engine.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{export.file_name(fmt)}"'},
+    )
+
+
+@router.get("")
+async def export_status():
+    """Exportable sources, available formats and recent background jobs."""
+    try:
+        return await run_in_threadpool(export_engine.status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs")
+async def list_export_jobs(limit: int = Query(50, ge=1, le=500)):
+    """Background exports, newest first."""
+    try:
+        jobs = await run_in_threadpool(export_engine.list_jobs, limit)
+        return {"count": len(jobs), "jobs": jobs}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{export_id}")
+async def get_export_job(export_id: str):
+    """Status and progress (rows written so far) of one background export."""
+    job = await run_in_threadpool(export_engine.get_job, export_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Export '{export_id}' not found")
+    return job
+
+
+@router.get("/jobs/{export_id}/download")
+async def download_export_job(export_id: str):
+    """The finished artifact of a background export."""
+    found = await run_in_threadpool(export_engine.artifact, export_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"Export '{export_id}' is not ready or has expired")
+    return FileResponse(found["path"], media_type=found["media_type"], filename=found["file_name"])
+
+
+@router.get("/sheets/{book}/{worksheet}")
+async def export_worksheet(book: str, worksheet: str, request: Request, format: str = "csv"):
+    """
+    Stream any worksheet of the leads, admission or home-care spreadsheet.
+    Filters: ?q=text (any cell) and ?where=Header:value (repeatable).
+    """
+    return await _stream(_sheet_source(book, worksheet), format, _params(request))
+
+
+@router.post("/sheets/{book}/{worksheet}/jobs")
+async def start_worksheet_export(book: str, worksheet: str, request: Request, format: str = "csv"):
+    """Export a worksheet in the background; poll /api/exports/jobs/{export_id}."""
+    try:
+        return await run_in_threadpool(export_engine.start_job, _sheet_source(book, worksheet), format, _params(request))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{name}")
+async def export_source(name: str, request: Request, format: str = "csv"):
+    """
+    Stream a registered export: leads and billing_summaries (?date=&name=&member_id=),
+    invoices (the /api/invoices filters), homecare_clients and snf_clients.
+    Every export also takes ?q= and ?where=Header:value.
+    """
+    return await _stream(export_engine.get_source(name), format, _params(request))
+
+
+@router.post("/{name}/jobs")
+async def start_source_export(name: str, request: Request, format: str = "csv"):
+    """Run a registered export in the background; poll /api/exports/jobs/{export_id}."""
+    try:
+        return await run_in_threadpool(export_engine.start_job, export_engine.get_source(name), format, _params(request))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
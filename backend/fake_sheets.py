@@ -0,0 +1,605 @@
+"""
+Fake Google Sheets Module
+In-memory Sheets/Drive API backend for offline benchmarks: real gspread Client/Spreadsheet/Worksheet
+objects talk to it through a fake HTTP session, so call counts, payload sizes, latency and quotas match production code paths.
+Also sets up the isolated environment the check_*.py scripts run in (check_environment).
+App modules are imported lazily: they read their settings from the environment at import.
+"""
+
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+if TYPE_CHECKING:
+    import sheets_scheduler
+
+SHEETS_PREFIX = "https://sheets.googleapis.com/v4/spreadsheets/"
+DRIVE_PREFIX = "https://www.googleapis.com/drive/v3/files"
+
+DEFAULT_ROWS = 1000
+DEFAULT_COLS = 26
+
+_CELL_RE = re.compile(r"^([A-Za-z]*)(\d*)$")
+
+# Local stores a check must never share with a real install: env var -> file or directory in the work dir
+CHECK_STORES = {
+    "LIVE_DB_PATH": "live_updates.db",
+    "SHARED_CACHE_PATH": "shared_cache.db",
+    "OUTBOX_DB_PATH": "write_outbox.db",
+    "MEMBER_ID_DB_PATH": "member_ids.db",
+    "JOB_DB_PATH": "job_runner.db",
+    "CATALOG_DB_PATH": "catalog_store.db",
+    "DROPDOWN_DB_PATH": "dropdown_engine.db",
+    "EXPORT_DB_PATH": "exports.db",
+    "EXPORT_DIR": "exports",
+    "TEMPLATE_CACHE_DIR": "template_cache",
+    "CREDENTIALS_FILE": "credentials.json",
+}
+CHECK_DEFAULTS = {
+    "MEMBER_ID_NODE": "1",
+    "SHEETS_USER_REQUESTS_PER_MINUTE": "6000",  # Quota pacing is check_sheets_scheduler.py's subject
+    "SHEETS_SPREADSHEET_REQUESTS_PER_MINUTE": "6000",
+    "GOOGLE_SHEET_ID": "check-leads",
+    "PATIENT_ADMISSION_SHEET_ID": "check-admission",
+    "HOMECARE_SHEET_ID": "check-homecare",
+}
+CHECK_WORKDIR_ENV = "CRM_CHECK_WORKDIR"  # Inherited by worker processes a check spawns
+
+
+def check_environment(prefix: str, **env: str) -> str:
+    """
+    Point every local store of the app at a fresh temp dir, lift Sheets quota pacing and stub the
+    credentials file, so a check script never touches a real install. Call it before importing
+    any app module. Processes spawned by the check reuse the parent's work dir.
+
+    Args:
+        prefix: Temp dir prefix, e.g. "crm-change-feed-"
+        **env: Extra environment variables, or overrides of the defaults
+
+    Returns:
+        The work dir
+    """
+    workdir = os.environ.get(CHECK_WORKDIR_ENV)
+    if not workdir:
+        workdir = os.environ[CHECK_WORKDIR_ENV] = tempfile.mkdtemp(prefix=prefix)
+    for name, filename in CHECK_STORES.items():
+        os.environ[name] = os.path.join(workdir, filename)
+    os.environ.update(CHECK_DEFAULTS)
+    os.environ.update(env)
+    if not os.path.exists(os.environ["CREDENTIALS_FILE"]):
+        with open(os.environ["CREDENTIALS_FILE"], "w", encoding="utf-8") as f:
+            f.write("{}")
+    return workdir
+
+
+def col_to_index(letters: str) -> int:
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def index_to_col(n: int) -> str:
+    letters = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def cell_value(value: Any) -> str:
+    """How a written value reads back as FORMATTED_VALUE."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class FakeSheet:
+    def __init__(self, sheet_id: int, title: str, index: int, rows: int = DEFAULT_ROWS, cols: int = DEFAULT_COLS):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.index = index
+        self.values: List[List[str]] = []
+        self.row_count = rows
+        self.col_count = cols
+
+    def properties(self) -> Dict[str, Any]:
+        return {
+            "sheetId": self.sheet_id,
+            "title": self.title,
+            "index": self.index,
+            "sheetType": "GRID",
+            "gridProperties": {"rowCount": self.row_count, "columnCount": self.col_count},
+        }
+
+    def last_row(self) -> int:
+        for i in range(len(self.values) - 1, -1, -1):
+            if any(self.values[i]):
+                return i + 1
+        return 0
+
+    def parse_range(self, cells: str) -> Tuple[int, int, int, int]:
+        """A1 cells ("A1:C5", "1:1", "A:A", "B2", "") -> 1-based (row1, col1, row2, col2)."""
+        if not cells:
+            return 1, 1, max(self.row_count, len(self.values)), max(self.col_count, 1)
+        start, _, end = cells.partition(":")
+        m1, m2 = _CELL_RE.match(start), _CELL_RE.match(end or start)
+        if not m1 or not m2:
+            raise ValueError(f"Unable to parse range: {cells}")
+        row1 = int(m1.group(2)) if m1.group(2) else 1
+        col1 = col_to_index(m1.group(1)) if m1.group(1) else 1
+        if end:
+            row2 = int(m2.group(2)) if m2.group(2) else max(self.row_count, len(self.values))
+            col2 = col_to_index(m2.group(1)) if m2.group(1) else max(self.col_count, 1)
+        else:
+            row2, col2 = row1, col1
+        return row1, col1, max(row1, row2), max(col1, col2)
+
+    def read(self, cells: str, major: str = "ROWS") -> List[List[str]]:
+        """Values in a range, trimmed of trailing empty rows/cells like the real API."""
+        row1, col1, row2, col2 = self.parse_range(cells)
+        out = []
+        for row in self.values[row1 - 1:row2]:
+            part = row[col1 - 1:col2]
+            while part and part[-1] == "":
+                part.pop()
+            out.append(part)
+        while out and not out[-1]:
+            out.pop()
+        if major == "COLUMNS":
+            width = max((len(r) for r in out), default=0)
+            out = [[r[c] if c < len(r) else "" for r in out] for c in range(width)]
+            for col in out:
+                while col and col[-1] == "":
+                    col.pop()
+        return out
+
+    def write(self, row1: int, col1: int, values: List[List[Any]]) -> Tuple[int, int]:
+        for r, row in enumerate(values):
+            target_row = row1 - 1 + r
+            while len(self.values) <= target_row:
+                self.values.append([])
+            target = self.values[target_row]
+            needed = col1 - 1 + len(row)
+            if len(target) < needed:
+                target.extend([""] * (needed - len(target)))
+            for c, value in enumerate(row):
+                target[col1 - 1 + c] = cell_value(value)
+        width = max((len(r) for r in values), default=0)
+        self.row_count = max(self.row_count, row1 - 1 + len(values))
+        self.col_count = max(self.col_count, col1 - 1 + width)
+        return len(values), width
+
+    def clear(self, cells: str) -> None:
+        row1, col1, row2, col2 = self.parse_range(cells)
+        for row in self.values[row1 - 1:row2]:
+            for c in range(col1 - 1, min(col2, len(row))):
+                row[c] = ""
+
+    def a1(self, row1: int, col1: int, rows: int, cols: int) -> str:
+        return f"'{self.title}'!{index_to_col(col1)}{row1}:{index_to_col(col1 + max(cols, 1) - 1)}{row1 + max(rows, 1) - 1}"
+
+
+class FakeSpreadsheet:
+    def __init__(self, spreadsheet_id: str, title: str):
+        self.id = spreadsheet_id
+        self.title = title
+        self.sheets: List[FakeSheet] = []
+        self._next_sheet_id = 0
+        self.modified_at = time.time()
+
+    def touch(self) -> None:
+        """Advance the Drive modifiedTime (every write moves it, like a new revision)."""
+        self.modified_at = max(time.time(), self.modified_at + 0.001)
+
+    def modified_time(self) -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(self.modified_at)) + f".{int(self.modified_at * 1000) % 1000:03d}Z"
+
+    def add_sheet(self, title: str, rows: int = DEFAULT_ROWS, cols: int = DEFAULT_COLS) -> FakeSheet:
+        sheet = FakeSheet(self._next_sheet_id, title, len(self.sheets), rows, cols)
+        self._next_sheet_id += 1
+        self.sheets.append(sheet)
+        return sheet
+
+    def sheet(self, title: Optional[str] = None) -> FakeSheet:
+        if not title:
+            return self.sheets[0]
+        for sheet in self.sheets:
+            if sheet.title == title:
+                return sheet
+        raise KeyError(title)
+
+    def sheet_by_id(self, sheet_id: int) -> FakeSheet:
+        for sheet in self.sheets:
+            if sheet.sheet_id == sheet_id:
+                return sheet
+        raise KeyError(sheet_id)
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "spreadsheetId": self.id,
+            "properties": {"title": self.title, "locale": "en_US", "timeZone": "Asia/Kolkata"},
+            "sheets": [{"properties": s.properties()} for s in self.sheets],
+        }
+
+
+class FakeRequest:
+    def __init__(self, body: bytes):
+        self.body = body
+
+
+class FakeResponse:
+    """Just enough of requests.Response for gspread and the scheduler."""
+
+    def __init__(self, status_code: int, body: Dict[str, Any], request_body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.content = json.dumps(body).encode("utf-8")
+        self.headers = headers or {}
+        self.request = FakeRequest(request_body)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+def _error(code: int, message: str, status: str) -> Dict[str, Any]:
+    return {"error": {"code": code, "message": message, "status": status}}
+
+
+class FakeSheetsBackend:
+    """
+    In-memory store of spreadsheets answering the Sheets v4 / Drive v3 calls gspread makes.
+
+    Args:
+        latency_ms: Fixed round-trip time added to every call
+        jitter_ms: Random extra latency (uniform 0..jitter_ms)
+        per_mb_ms: Transfer time per MB of request + response payload
+        reads_per_minute: Server-side read quota per spreadsheet (0 disables); excess calls get a 429
+        writes_per_minute: Server-side write quota per spreadsheet (0 disables)
+        fail_every: Answer every Nth call with a 429 regardless of quota (0 disables)
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, per_mb_ms: float = 0,
+                 reads_per_minute: int = 0, writes_per_minute: int = 0, fail_every: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_mb_ms = per_mb_ms
+        self.quota = {"read": reads_per_minute, "write": writes_per_minute}
+        self.fail_every = fail_every
+        self.spreadsheets: Dict[str, FakeSpreadsheet] = {}
+        self.calls: Counter = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.throttled = 0
+        self._windows: Dict[Tuple[str, str], deque] = {}
+        self._lock = threading.RLock()
+
+    # ---- Seeding -----------------------------------------------------------
+
+    def add_spreadsheet(self, spreadsheet_id: str, title: Optional[str] = None) -> FakeSpreadsheet:
+        with self._lock:
+            book = self.spreadsheets.get(spreadsheet_id)
+            if book is None:
+                book = self.spreadsheets[spreadsheet_id] = FakeSpreadsheet(spreadsheet_id, title or spreadsheet_id)
+            return book
+
+    def add_sheet(self, spreadsheet_id: str, title: str, values: Optional[List[List[Any]]] = None) -> FakeSheet:
+        """Create (or replace the contents of) a worksheet, seeding it with rows of values."""
+        with self._lock:
+            book = self.add_spreadsheet(spreadsheet_id)
+            try:
+                sheet = book.sheet(title)
+                sheet.values = []
+            except KeyError:
+                sheet = book.add_sheet(title)
+            if values:
+                sheet.write(1, 1, values)
+            book.touch()
+            return sheet
+
+    def edit_sheet(self, spreadsheet_id: str, title: str, row: int, values: List[List[Any]]) -> None:
+        """Write rows starting at `row` without an API call, like a staff member editing in the Sheets UI."""
+        with self._lock:
+            book = self.spreadsheets[spreadsheet_id]
+            book.sheet(title).write(row, 1, values)
+            book.touch()
+
+    # ---- Counters ----------------------------------------------------------
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def snapshot(self) -> Counter:
+        with self._lock:
+            return Counter(self.calls)
+
+    # ---- Transport ---------------------------------------------------------
+
+    def _throttled(self, spreadsheet_id: str, kind: str) -> bool:
+        limit = self.quota.get(kind) or 0
+        if limit <= 0:
+            return False
+        now = time.monotonic()
+        window = self._windows.setdefault((spreadsheet_id, kind), deque())
+        while window and now - window[0] >= 60:
+            window.popleft()
+        if len(window) >= limit:
+            return True
+        window.append(now)
+        return False
+
+    def handle(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+               body: Optional[Dict[str, Any]] = None) -> FakeResponse:
+        import instrumentation
+        import sheets_scheduler
+
+        method = method.lower()
+        request_body = json.dumps(body).encode("utf-8") if body is not None else b""
+        call, _ = instrumentation.sheets_call_type(method, url)
+        kind = "read" if method == "get" else "write"
+        match = sheets_scheduler._SPREADSHEET_ID_RE.search(url)
+        spreadsheet_id = match.group(1) if match else "drive"
+
+        with self._lock:
+            self.calls[call] += 1
+            count = self.total_calls
+            limited = (self.fail_every and count % self.fail_every == 0) or self._throttled(spreadsheet_id, kind)
+            if limited:
+                self.throttled += 1
+            else:
+                try:
+                    status, payload = self._dispatch(method, url, params or {}, body or {})
+                except KeyError as e:
+                    status, payload = 404, _error(404, f"Not found: {e}", "NOT_FOUND")
+                except ValueError as e:
+                    status, payload = 400, _error(400, str(e), "INVALID_ARGUMENT")
+
+        # Serialize outside the lock; payloads hold copies of the stored rows
+        if limited:
+            response = FakeResponse(429, _error(429, "Quota exceeded (fake backend)", "RESOURCE_EXHAUSTED"),
+                                    request_body, {"Retry-After": "1"})
+        else:
+            response = FakeResponse(status, payload, request_body)
+        with self._lock:
+            self.bytes_in += len(request_body)
+            self.bytes_out += len(response.content)
+
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        delay += self.per_mb_ms * (len(request_body) + len(response.content)) / 1_000_000
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return response
+
+    def _dispatch(self, method: str, url: str, params: Dict[str, Any], body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if url.startswith(DRIVE_PREFIX):
+            return self._drive(method, url[len(DRIVE_PREFIX):], params, body)
+        if not url.startswith(SHEETS_PREFIX):
+            raise KeyError(url)
+
+        path = url[len(SHEETS_PREFIX):].split("?")[0]
+        spreadsheet_id, sep, rest = path.partition("/")
+        if not sep and ":" in spreadsheet_id:
+            spreadsheet_id, rest = spreadsheet_id.split(":", 1)
+            rest = ":" + rest
+        book = self.spreadsheets[spreadsheet_id]
+        if method != "get":
+            book.touch()
+
+        if rest == "" and method == "get":
+            return 200, book.metadata()
+        if rest == ":batchUpdate":
+            return 200, self._batch_update(book, body.get("requests", []))
+        if rest == "values:batchGet":
+            ranges = params.get("ranges") or []
+            if isinstance(ranges, str):
+                ranges = [ranges]
+            major = params.get("majorDimension", "ROWS")
+            return 200, {"spreadsheetId": book.id, "valueRanges": [self._get(book, r, major) for r in ranges]}
+        if rest == "values:batchUpdate":
+            replies = [self._update(book, item["range"], item.get("values", [])) for item in body.get("data", [])]
+            return 200, {
+                "spreadsheetId": book.id,
+                "totalUpdatedRows": sum(r["updatedRows"] for r in replies),
+                "totalUpdatedCells": sum(r["updatedCells"] for r in replies),
+                "responses": replies,
+            }
+        if rest == "values:batchClear":
+            for a1 in body.get("ranges", []):
+                sheet, cells = self._resolve(book, a1)
+                sheet.clear(cells)
+            return 200, {"spreadsheetId": book.id, "clearedRanges": body.get("ranges", [])}
+        if rest.startswith("values/"):
+            a1 = unquote(rest[len("values/"):])
+            if a1.endswith(":append"):
+                return 200, self._append(book, a1[:-len(":append")], body.get("values", []))
+            if a1.endswith(":clear"):
+                sheet, cells = self._resolve(book, a1[:-len(":clear")])
+                sheet.clear(cells)
+                return 200, {"spreadsheetId": book.id, "clearedRange": a1[:-len(":clear")]}
+            if method == "get":
+                return 200, self._get(book, a1, params.get("majorDimension", "ROWS"))
+            return 200, self._update(book, a1, body.get("values", []), body.get("majorDimension", "ROWS"))
+        raise KeyError(rest)
+
+    def _resolve(self, book: FakeSpreadsheet, a1: str) -> Tuple[FakeSheet, str]:
+        if "!" in a1:
+            title, cells = a1.rsplit("!", 1)
+        elif _CELL_RE.match(a1.split(":")[0]) and a1 and not any(s.title == a1.strip("'") for s in book.sheets):
+            title, cells = "", a1
+        else:
+            title, cells = a1, ""
+        if title.startswith("'") and title.endswith("'"):
+            title = title[1:-1].replace("''", "'")
+        return book.sheet(title), cells
+
+    def _get(self, book: FakeSpreadsheet, a1: str, major: str = "ROWS") -> Dict[str, Any]:
+        sheet, cells = self._resolve(book, a1)
+        result = {"range": a1, "majorDimension": major}
+        values = sheet.read(cells, major)
+        if values:
+            result["values"] = values
+        return result
+
+    def _update(self, book: FakeSpreadsheet, a1: str, values: List[List[Any]], major: str = "ROWS") -> Dict[str, Any]:
+        sheet, cells = self._resolve(book, a1)
+        if major == "COLUMNS":
+            width = max((len(c) for c in values), default=0)
+            values = [[c[r] if r < len(c) else "" for c in values] for r in range(width)]
+        row1, col1, _, _ = sheet.parse_range(cells)
+        rows, cols = sheet.write(row1, col1, values)
+        return {
+            "spreadsheetId": book.id,
+            "updatedRange": sheet.a1(row1, col1, rows, cols),
+            "updatedRows": rows,
+            "updatedColumns": cols,
+            "updatedCells": sum(len(r) for r in values),
+        }
+
+    def _append(self, book: FakeSpreadsheet, a1: str, values: List[List[Any]]) -> Dict[str, Any]:
+        sheet, cells = self._resolve(book, a1)
+        _, col1, _, _ = sheet.parse_range(cells)
+        row1 = sheet.last_row() + 1
+        rows, cols = sheet.write(row1, col1, values)
+        return {
+            "spreadsheetId": book.id,
+            "tableRange": sheet.a1(1, col1, row1 - 1, cols),
+            "updates": {
+                "spreadsheetId": book.id,
+                "updatedRange": sheet.a1(row1, col1, rows, cols),
+                "updatedRows": rows,
+                "updatedColumns": cols,
+                "updatedCells": sum(len(r) for r in values),
+            },
+        }
+
+    def _batch_update(self, book: FakeSpreadsheet, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        replies = []
+        for request in requests:
+            if "addSheet" in request:
+                props = request["addSheet"].get("properties", {})
+                grid = props.get("gridProperties", {})
+                if any(s.title == props.get("title") for s in book.sheets):
+                    raise ValueError(f"A sheet with the name \"{props.get('title')}\" already exists.")
+                sheet = book.add_sheet(props.get("title", f"Sheet{len(book.sheets) + 1}"),
+                                       grid.get("rowCount", DEFAULT_ROWS), grid.get("columnCount", DEFAULT_COLS))
+                replies.append({"addSheet": {"properties": sheet.properties()}})
+                continue
+            if "deleteDimension" in request:
+                rng = request["deleteDimension"]["range"]
+                sheet = book.sheet_by_id(rng.get("sheetId", 0))
+                start, end = rng.get("startIndex", 0), rng.get("endIndex")
+                if rng.get("dimension", "ROWS") == "ROWS":
+                    del sheet.values[start:end]
+                    sheet.row_count = max(sheet.row_count - ((end or sheet.row_count) - start), len(sheet.values))
+                else:
+                    for row in sheet.values:
+                        del row[start:end]
+                    sheet.col_count = max(1, sheet.col_count - ((end or sheet.col_count) - start))
+            elif "updateSheetProperties" in request:
+                props = request["updateSheetProperties"].get("properties", {})
+                sheet = book.sheet_by_id(props.get("sheetId", 0))
+                grid = props.get("gridProperties", {})
+                sheet.row_count = grid.get("rowCount", sheet.row_count)
+                sheet.col_count = grid.get("columnCount", sheet.col_count)
+                sheet.title = props.get("title", sheet.title)
+            elif "appendDimension" in request:
+                req = request["appendDimension"]
+                sheet = book.sheet_by_id(req.get("sheetId", 0))
+                if req.get("dimension") == "COLUMNS":
+                    sheet.col_count += req.get("length", 0)
+                else:
+                    sheet.row_count += req.get("length", 0)
+            # Formatting, validation and other presentation requests are accepted as no-ops
+            replies.append({})
+        return {"spreadsheetId": book.id, "replies": replies}
+
+    def _drive(self, method: str, rest: str, params: Dict[str, Any], body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        if method == "post" and rest in ("", "/"):
+            new_id = f"fake-{len(self.spreadsheets) + 1}"
+            book = self.add_spreadsheet(new_id, body.get("name", new_id))
+            book.add_sheet("Sheet1")
+            return 200, {"id": new_id, "name": book.title}
+        if rest.startswith("/"):
+            book = self.spreadsheets[rest[1:].split("/")[0]]
+            return 200, {"id": book.id, "name": book.title, "createdTime": "", "modifiedTime": book.modified_time()}
+        title_match = re.search(r'name = "([^"]*)"', params.get("q", ""))
+        files = [
+            {"id": book.id, "name": book.title, "createdTime": "", "modifiedTime": book.modified_time()}
+            for book in self.spreadsheets.values()
+            if not title_match or book.title == title_match.group(1)
+        ]
+        return 200, {"kind": "drive#fileList", "files": files}
+
+
+class FakeSession:
+    """requests.Session stand-in handed to gspread; every verb goes to the backend."""
+
+    def __init__(self, backend: FakeSheetsBackend):
+        self.backend = backend
+        self.headers: Dict[str, str] = {}
+
+    def request(self, method, url, params=None, data=None, json=None, files=None, headers=None, timeout=None):
+        return self.backend.handle(method, url, params, json)
+
+    def get(self, url, **kw):
+        return self.request("get", url, **kw)
+
+    def post(self, url, **kw):
+        return self.request("post", url, **kw)
+
+    def put(self, url, **kw):
+        return self.request("put", url, **kw)
+
+    def delete(self, url, **kw):
+        return self.request("delete", url, **kw)
+
+    def close(self):
+        pass
+
+
+def client(backend: FakeSheetsBackend, lane: Optional[str] = None, user: str = "benchmark@fake") -> "sheets_scheduler.ScheduledClient":
+    """A scheduled gspread client whose requests never leave the process."""
+    import sheets_scheduler
+
+    return sheets_scheduler.ScheduledClient(None, session=FakeSession(backend), lane=lane, user=user)
+
+
+def install(backend: FakeSheetsBackend, user: str = "benchmark@fake") -> None:
+    """
+    Route every sheets_scheduler.authorize() call in the app to the fake backend and make
+    service-account credential loading a no-op, so main.py and the services run unmodified.
+    """
+    from google.auth.credentials import AnonymousCredentials
+    from google.oauth2.service_account import Credentials
+
+    import sheets_scheduler
+
+    def fake_authorize(credentials, lane: Optional[str] = None):
+        if lane is not None and lane not in sheets_scheduler.LANE_PRIORITY:
+            raise ValueError(f"Unknown Sheets lane '{lane}'")
+        return client(backend, lane=lane, user=user)
+
+    sheets_scheduler.authorize = fake_authorize
+    Credentials.from_service_account_file = classmethod(lambda cls, *a, **kw: AnonymousCredentials())
+    Credentials.from_service_account_info = classmethod(lambda cls, *a, **kw: AnonymousCredentials())
+    try:
+        from oauth2client.service_account import ServiceAccountCredentials
+        ServiceAccountCredentials.from_json_keyfile_name = classmethod(lambda cls, *a, **kw: AnonymousCredentials())
+    except ImportError:
+        pass
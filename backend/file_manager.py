@@ -55,6 +55,25 @@ def detect_schema_changes(new_headers: List[str], existing_schema: List[Dict[str
         "has_changes": bool(new_columns or missing_columns)
     }
 
+def read_data_file(file_path: str) -> Dict[str, Any]:
+    """
+    Read a whole Excel or CSV file for a bulk append.
+    Returns {"columns": [...], "rows": [[...], ...]} with blanks as "".
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.csv':
+        df = pd.read_csv(file_path)
+    elif ext in ['.xlsx', '.xls', '.xlsm']:
+        df = pd.read_excel(file_path)
+    else:
+        raise ValueError("Unsupported file format")
+
+    df = df.fillna("")
+    return {
+        "columns": [str(c) for c in df.columns],
+        "rows": [list(row) for row in df.itertuples(index=False, name=None)],
+    }
+
 def process_data_file(file_path: str, existing_schema: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Process Excel or CSV file.
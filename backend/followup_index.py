@@ -0,0 +1,369 @@
+"""
+Follow-up Due-Date Index
+Keeps follow-up / reminder dates of a worksheet in a sorted in-memory index for O(log n) due-date lookups
+"""
+
+import os
+import threading
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import change_feed
+import instrumentation
+
+# Rebuild the index from the sheet at most this often; writes made through the
+# API keep it current in between (see record_row / invalidate), and so does the
+# change feed for direct sheet edits, which stretches this to its backstop TTL.
+# So a direct sheet edit shows up within one change-feed poll (CHANGE_FEED_POLL_SECONDS)
+# while the feed runs, and within this TTL when it does not.
+FOLLOWUP_INDEX_TTL_SECONDS = int(os.getenv("FOLLOWUP_INDEX_TTL_SECONDS", "300"))
+
+DATE_FORMATS = [
+    "%d-%m-%Y",
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+    "%Y/%m/%d",
+    "%d.%m.%Y",
+    "%Y.%m.%d",
+    "%Y-%m-%d %H:%M:%S",
+]
+
+# (due_date, member_id, slot header, sheet row number)
+Entry = Tuple[date, str, str, int]
+
+
+def parse_due_date(value: Any) -> Optional[date]:
+    """Parse a follow-up cell into a date, returning None for blanks or unknown formats."""
+    text = str(value or "").strip()
+    if not text:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def is_slot_header(header: str) -> bool:
+    """Follow-up slots are the `Follow_N Date` / `Reminder Date_N` style columns."""
+    h = str(header).strip().lower()
+    return "date" in h and ("follow" in h or "reminder" in h)
+
+
+def is_reminder_slot(slot: str) -> bool:
+    return "reminder" in slot.lower()
+
+
+def filter_range(filter_type: str, today: Optional[date] = None) -> Optional[Tuple[date, date]]:
+    """
+    Due-date range [start, end] for the chat/dashboard filter names (today, this_week, overdue).
+
+    Returns:
+        The range, or None when the filter is not a due-date filter
+    """
+    filter_type = (filter_type or "").strip().lower().replace(" ", "_")
+    today = today or date.today()
+    if filter_type == "today":
+        return today, today
+    if filter_type == "this_week":
+        return today - timedelta(days=7), today
+    if filter_type == "overdue":
+        return date.min, today - timedelta(days=1)
+    return None
+
+
+class FollowUpIndex:
+    def __init__(self, name: str):
+        """
+        Sorted index of follow-up due dates for one worksheet.
+
+        Args:
+            name: Worksheet title the index was built from
+        """
+        self.name = name
+        self.headers: List[str] = []
+        self.built_at: Optional[datetime] = None
+        self._member_col: Optional[int] = None
+        self._slot_cols: List[Tuple[int, str]] = []
+        self._entries: List[Entry] = []
+        self._row_entries: Dict[int, List[Entry]] = {}
+        self._rows: Dict[int, List[str]] = {}
+        self._lock = threading.RLock()
+
+    # --- Maintenance ---
+
+    def rebuild(self, values: List[List[Any]]) -> None:
+        """
+        Rebuild the index from a full `get_all_values()` result (header row first).
+
+        Args:
+            values: Sheet values including the header row
+        """
+        headers = [str(h).strip() for h in values[0]] if values else []
+        member_col = next(
+            (i for i, h in enumerate(headers) if "member" in h.lower() and "id" in h.lower()),
+            None
+        )
+        slot_cols = [(i, h) for i, h in enumerate(headers) if is_slot_header(h)]
+
+        entries: List[Entry] = []
+        row_entries: Dict[int, List[Entry]] = {}
+        rows: Dict[int, List[str]] = {}
+        for offset, row in enumerate(values[1:]):
+            row_number = offset + 2
+            row = [str(v) for v in row]
+            rows[row_number] = row
+            row_items = self._entries_for_row(row_number, row, member_col, slot_cols)
+            if row_items:
+                row_entries[row_number] = row_items
+                entries.extend(row_items)
+        entries.sort()
+
+        with self._lock:
+            self.headers = headers
+            self._member_col = member_col
+            self._slot_cols = slot_cols
+            self._entries = entries
+            self._row_entries = row_entries
+            self._rows = rows
+            self.built_at = datetime.now()
+        print(f"[Follow-up Index] Built '{self.name}': {len(entries)} due dates across {len(row_entries)} rows")
+
+    def upsert_row(self, row_number: int, headers: List[str], row: List[Any]) -> None:
+        """
+        Re-index a single row after it was written (update or append).
+
+        Args:
+            row_number: 1-based sheet row number
+            headers: Header row the values were written against
+            row: Row values as written
+        """
+        with self._lock:
+            if self.built_at is None:
+                return
+            if [str(h).strip() for h in headers] != self.headers:
+                # Header layout changed under us - let the next read rebuild
+                self.built_at = None
+                return
+            self._remove_row_entries(row_number)
+            row = [str(v) for v in row]
+            self._rows[row_number] = row
+            row_items = self._entries_for_row(row_number, row, self._member_col, self._slot_cols)
+            if row_items:
+                self._row_entries[row_number] = row_items
+                for entry in row_items:
+                    insort(self._entries, entry)
+
+    def invalidate(self) -> None:
+        """Force a rebuild on next access (e.g. after rows were deleted and shifted)."""
+        with self._lock:
+            self.built_at = None
+
+    def is_stale(self, row_count: Optional[int] = None) -> bool:
+        """
+        Check whether the index needs rebuilding.
+
+        Args:
+            row_count: Current number of data rows, when the caller already knows it
+        """
+        if self.built_at is None:
+            return True
+        if (datetime.now() - self.built_at).total_seconds() > change_feed.cache_ttl(FOLLOWUP_INDEX_TTL_SECONDS):
+            return True
+        return row_count is not None and row_count != len(self._rows)
+
+    # --- Queries ---
+
+    def due_between(self, start: date, end: date, include_reminders: bool = False) -> List[Entry]:
+        """
+        Entries due in [start, end], ordered by due date.
+
+        Args:
+            start: First due date (inclusive)
+            end: Last due date (inclusive)
+            include_reminders: Also return `Reminder Date_N` slots
+        """
+        with self._lock:
+            lo = bisect_left(self._entries, (start,))
+            hi = bisect_left(self._entries, (end + timedelta(days=1),))
+            found = self._entries[lo:hi]
+        if include_reminders:
+            return found
+        return [e for e in found if not is_reminder_slot(e[2])]
+
+    def due_on(self, day: date, include_reminders: bool = False) -> List[Entry]:
+        return self.due_between(day, day, include_reminders)
+
+    def this_week(self, today: Optional[date] = None, include_reminders: bool = False) -> List[Entry]:
+        """Entries due in the last 7 days up to and including today."""
+        today = today or date.today()
+        return self.due_between(today - timedelta(days=7), today, include_reminders)
+
+    def overdue(self, today: Optional[date] = None, include_reminders: bool = False) -> List[Entry]:
+        """Entries whose due date is before today."""
+        today = today or date.today()
+        return self.due_between(date.min, today - timedelta(days=1), include_reminders)
+
+    def next_due(self, limit: int, from_day: Optional[date] = None, include_reminders: bool = False) -> List[Entry]:
+        """
+        The next `limit` entries due on or after `from_day`.
+
+        Args:
+            limit: Maximum number of entries
+            from_day: Starting date (default today)
+            include_reminders: Also return `Reminder Date_N` slots
+        """
+        from_day = from_day or date.today()
+        results: List[Entry] = []
+        with self._lock:
+            pos = bisect_left(self._entries, (from_day,))
+            while pos < len(self._entries) and len(results) < limit:
+                entry = self._entries[pos]
+                if include_reminders or not is_reminder_slot(entry[2]):
+                    results.append(entry)
+                pos += 1
+        return results
+
+    def entries_for_filter(self, filter_type: str, today: Optional[date] = None,
+                           include_reminders: bool = False) -> Optional[List[Entry]]:
+        """
+        Entries for the chat/dashboard filter names (today, this_week, overdue).
+
+        Returns:
+            Matching entries, or None when the filter is not a due-date filter
+        """
+        bounds = filter_range(filter_type, today)
+        if bounds is None:
+            return None
+        return self.due_between(bounds[0], bounds[1], include_reminders)
+
+    def row_numbers(self, entries: List[Entry]) -> List[int]:
+        """Distinct sheet row numbers for entries, in sheet order."""
+        return sorted({e[3] for e in entries})
+
+    def row_values(self, row_number: int) -> List[str]:
+        with self._lock:
+            return list(self._rows.get(row_number, []))
+
+    def row_dict(self, row_number: int) -> Dict[str, str]:
+        """Header -> value mapping for an indexed row."""
+        row = self.row_values(row_number)
+        return {h: (row[i] if i < len(row) else "") for i, h in enumerate(self.headers)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sheet": self.name,
+                "entries": len(self._entries),
+                "rows": len(self._rows),
+                "slots": [h for _, h in self._slot_cols],
+                "built_at": self.built_at.isoformat() if self.built_at else None,
+            }
+
+    # --- Internals ---
+
+    @staticmethod
+    def _entries_for_row(row_number: int, row: List[str], member_col: Optional[int],
+                         slot_cols: List[Tuple[int, str]]) -> List[Entry]:
+        member_id = ""
+        if member_col is not None and member_col < len(row):
+            member_id = row[member_col].strip()
+        items: List[Entry] = []
+        for col, slot in slot_cols:
+            if col < len(row):
+                due = parse_due_date(row[col])
+                if due:
+                    items.append((due, member_id, slot, row_number))
+        return items
+
+    def _remove_row_entries(self, row_number: int) -> None:
+        for entry in self._row_entries.pop(row_number, []):
+            pos = bisect_left(self._entries, entry)
+            if pos < len(self._entries) and self._entries[pos] == entry:
+                del self._entries[pos]
+
+
+# Global index registry keyed by worksheet title
+_indexes: Dict[str, FollowUpIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def get_index(sheet_name: str) -> FollowUpIndex:
+    """Get (or create an empty) index for a worksheet."""
+    with _registry_lock:
+        index = _indexes.get(sheet_name)
+        if index is None:
+            index = FollowUpIndex(sheet_name)
+            _indexes[sheet_name] = index
+        return index
+
+
+def get_followup_index(sheet_name: str, loader: Callable[[], List[List[Any]]]) -> FollowUpIndex:
+    """
+    Get a fresh index for a worksheet, calling `loader` only when a rebuild is needed.
+
+    Args:
+        sheet_name: Worksheet title
+        loader: Returns the sheet's `get_all_values()`
+    """
+    index = get_index(sheet_name)
+    stale = index.is_stale()
+    instrumentation.record_cache("followup_index", not stale)
+    if stale:
+        index.rebuild(loader())
+    return index
+
+
+def record_row(sheet_name: str, row_number: int, headers: List[str], row: List[Any]) -> None:
+    """Keep an already built index current after a row write."""
+    index = _indexes.get(sheet_name)
+    if index is not None:
+        index.upsert_row(row_number, headers, row)
+
+
+def invalidate(sheet_name: Optional[str] = None) -> None:
+    """Drop one worksheet's index (or all) so the next access rebuilds it."""
+    with _registry_lock:
+        targets = [_indexes[sheet_name]] if sheet_name in _indexes else ([] if sheet_name else list(_indexes.values()))
+    for index in targets:
+        index.invalidate()
+
+
+def rows_due(values: List[List[Any]], filter_type: str, include_reminders: bool = False,
+             today: Optional[date] = None) -> Optional[Set[int]]:
+    """
+    Row numbers of `values` with a follow-up due in the filter's range, in one pass and
+    without the index: for callers that have read the whole sheet anyway, where keeping
+    the index in step with their copy would cost more than the scan.
+
+    Returns:
+        Row numbers (2 = first data row), or None when the filter is not a due-date filter
+    """
+    bounds = filter_range(filter_type, today)
+    if bounds is None:
+        return None
+    start, end = bounds
+    headers = [str(h).strip() for h in values[0]] if values else []
+    slot_cols = [i for i, h in enumerate(headers)
+                 if is_slot_header(h) and (include_reminders or not is_reminder_slot(h))]
+    rows: Set[int] = set()
+    for row_number, row in enumerate(values[1:], start=2):
+        for col in slot_cols:
+            due = parse_due_date(row[col]) if col < len(row) else None
+            if due and start <= due <= end:
+                rows.add(row_number)
+                break
+    return rows
+
+
+def member_rows_for_filter(index: FollowUpIndex, filter_type: str,
+                           include_reminders: bool = False) -> Optional[Set[int]]:
+    """
+    Row numbers matching a due-date filter, or None when no due-date filter applies.
+    """
+    entries = index.entries_for_filter(filter_type, include_reminders=include_reminders)
+    if entries is None:
+        return None
+    return {e[3] for e in entries}
@@ -0,0 +1,118 @@
+"""
+Follow-up Digest Scheduler Module
+Sends one daily batch of follow-up reminder emails from the follow-up due-date index
+"""
+
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+import os
+from dotenv import load_dotenv
+import job_runner
+import sheets_scheduler
+import instrumentation
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+DIGEST_TIME = os.getenv("FOLLOWUP_DIGEST_TIME", "08:00")  # Default: 8:00 AM
+DIGEST_ENABLED = os.getenv("FOLLOWUP_DIGEST_ENABLED", "1").strip() == "1"
+
+JOB_ID = 'followup_daily_digest'
+
+last_summary: Optional[Dict[str, Any]] = None
+
+
+@instrumentation.timed_job("followup_digest")
+def digest_job(run_digest: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Job function that runs daily to send the follow-up digest.
+    This is called by the job runner in the leader process only, so each email goes out once.
+
+    Args:
+        run_digest: Builds and sends the digest, returning a summary dict
+
+    Returns:
+        The digest summary (stored in the run history); errors are re-raised so the run is marked failed
+    """
+    global last_summary
+
+    try:
+        print(f"[Follow-up Digest] Job triggered at {datetime.now()}")
+        with sheets_scheduler.lane("batch"):
+            summary = run_digest()
+        summary["ran_at"] = datetime.now().isoformat()
+        last_summary = summary
+        print(
+            f"[Follow-up Digest] Completed: {summary.get('due_count', 0)} due, "
+            f"{summary.get('sent_count', 0)} emails queued, {summary.get('skipped_count', 0)} without email"
+        )
+        return summary
+    except Exception as e:
+        last_summary = {"error": str(e), "ran_at": datetime.now().isoformat()}
+        print(f"[Follow-up Digest] Critical error in digest job: {e}")
+        raise
+
+
+def start_followup_digest_scheduler(run_digest: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Register the daily follow-up digest with the job runner and start it.
+
+    Args:
+        run_digest: Builds and sends the digest, returning a summary dict
+    """
+    if not DIGEST_ENABLED:
+        print("[Follow-up Digest] Disabled via FOLLOWUP_DIGEST_ENABLED")
+        return
+
+    try:
+        # A digest is only useful on its day: a slot missed while the server was down is not resent late
+        job_runner.register_daily_job(
+            JOB_ID, 'Follow-up Daily Digest', DIGEST_TIME, digest_job, args=[run_digest], catch_up=False
+        )
+        job_runner.start()
+        print(f"[Follow-up Digest] Started - daily at {DIGEST_TIME}, next run: {job_runner.next_run_time(DIGEST_TIME)}")
+
+    except Exception as e:
+        print(f"[Follow-up Digest] Failed to start: {e}")
+
+
+def stop_followup_digest_scheduler() -> None:
+    """
+    Unregister the digest job from the job runner.
+    """
+    try:
+        job_runner.unregister_job(JOB_ID)
+        print("[Follow-up Digest] Stopped successfully")
+    except Exception as e:
+        print(f"[Follow-up Digest] Error stopping scheduler: {e}")
+
+
+def get_digest_status() -> Dict[str, Any]:
+    """
+    Get current digest scheduler status.
+
+    Returns:
+        Dictionary with scheduler status and the last run (from the shared run history)
+    """
+    status = job_runner.job_status(JOB_ID)
+    last_run = status["last_run"] if status else None
+    if last_run is None and last_summary is not None:
+        last_run = {"summary": last_summary}
+
+    if status is None or not status["scheduled"]:
+        return {
+            "running": False,
+            "digest_time": DIGEST_TIME,
+            "last_run": last_run,
+            "message": "Scheduler not started"
+        }
+
+    return {
+        "running": True,
+        "digest_time": DIGEST_TIME,
+        "next_run": status["next_run"],
+        "last_run": last_run,
+        "leader": job_runner.leader(),
+        "message": "Scheduler running normally"
+    }
@@ -0,0 +1,229 @@
+"""
+Header Resolution Module
+Compiles sheet header rows into memoized canonical-key / column-index maps so header discovery happens once per schema change
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import instrumentation
+
+# Number of compiled header rows kept in memory (one per worksheet schema)
+HEADER_MAP_CACHE_SIZE = 64
+
+# --- CANONICAL MAPPING FOR ADMISSION SHEET ---
+ADMISSION_CANONICAL_MAP = {
+    # Member ID variations
+    "memberid": "memberidkey",
+    "memberidkey": "memberidkey",
+    "memberkey": "memberidkey",
+    "id": "memberidkey",
+    "memberidkry": "memberidkey", # User specified
+    "memberit": "memberidkey",   # User specified "MEMBER IT"
+    "memberitkey": "memberidkey",
+    "member_id": "memberidkey",
+    "member_key": "memberidkey",
+    "mid": "memberidkey",
+
+    # Names
+    "attendername": "attendername",
+    "attender_name": "attendername",
+    "patientname": "patientname",
+    "patient_name": "patientname",
+    "name": "patientname",
+    "fullname": "patientname",
+
+    # Contact
+    "mobile": "mobilenumber",
+    "phone": "mobilenumber",
+    "phonenumber": "mobilenumber",
+    "mobilenumber": "mobilenumber",
+    "relationalmobile": "relationalmobile",
+    "relational_mobile": "relationalmobile",
+
+    # Location
+    "hospital_location": "hospitallocation",
+    "hospitallocation": "hospitallocation",
+    "location": "hospitallocation",
+
+    # Care Center
+    "care_center": "carecenter",
+    "carecenter": "carecenter",
+    "center": "carecenter",
+
+    # Dates
+    "date": "date",
+    "admissiondate": "date",
+}
+
+
+@lru_cache(maxsize=4096)
+def normalize_field_name(name: str) -> str:
+    """
+    Normalize field name: lowercase, remove spaces, hyphens, underscores.
+    Example: "First Name" -> "firstname"
+    """
+    if not name:
+        return ""
+    # Remove strict alphanumeric characters except common safe ones if needed,
+    # but requirement says: lowercase, remove spaces, hyphens, underscores.
+    return str(name).strip().lower().replace(" ", "").replace("_", "").replace("-", "")
+
+
+@lru_cache(maxsize=4096)
+def get_canonical_key(key: str) -> str:
+    """
+    Normalize key to a canonical representation.
+    1. Lowercase, strip, remove special chars ( - _).
+    2. Check ADMISSION_CANONICAL_MAP.
+    3. Return canonical or normalized string.
+    """
+    if not key:
+        return ""
+    # Normalize: lowercase, remove spaces, hyphens, underscores
+    norm = str(key).strip().lower().replace(" ", "").replace("-", "").replace("_", "")
+
+    # Check map
+    return ADMISSION_CANONICAL_MAP.get(norm, norm)
+
+
+class HeaderMap:
+    def __init__(self, headers: List[str]):
+        """
+        Compiled lookups for one header row.
+
+        Args:
+            headers: Header row exactly as read from the sheet
+        """
+        self.headers: Tuple[str, ...] = tuple(str(h) for h in headers)
+        self.fingerprint = header_fingerprint(self.headers)
+        self.lower: Tuple[str, ...] = tuple(h.strip().lower() for h in self.headers)
+        self.canonical: Tuple[str, ...] = tuple(get_canonical_key(h) for h in self.headers)
+
+        self.by_exact: Dict[str, int] = {}
+        self.by_lower: Dict[str, int] = {}
+        # Same keys, last duplicate wins: what `{h.strip().lower(): i for i, h in enumerate(headers)}` built
+        self.last_by_lower: Dict[str, int] = {h: i for i, h in enumerate(self.lower)}
+        self.by_simple: Dict[str, int] = {}
+        self.by_canonical: Dict[str, int] = {}
+        self.columns_by_canonical: Dict[str, List[int]] = {}
+        for i, h in enumerate(self.headers):
+            self.by_exact.setdefault(h, i)
+            self.by_lower.setdefault(self.lower[i], i)
+            self.by_simple.setdefault(normalize_field_name(h), i)
+            self.by_canonical.setdefault(self.canonical[i], i)
+            self.columns_by_canonical.setdefault(self.canonical[i], []).append(i)
+
+        self._find_memo: Dict[Tuple, Optional[int]] = {}
+        self._lock = threading.Lock()
+
+    def index(self, header: str) -> Optional[int]:
+        """Column of a header by exact, then case-insensitive name."""
+        idx = self.by_exact.get(header)
+        if idx is None:
+            idx = self.by_lower.get(str(header).strip().lower())
+        return idx
+
+    def column_for(self, key: str) -> Optional[int]:
+        """First column whose canonical key matches the canonical form of `key`."""
+        return self.by_canonical.get(get_canonical_key(key))
+
+    def find(self, *terms: str, exclude: Tuple[str, ...] = ()) -> Optional[int]:
+        """
+        First column whose lowercase header contains every term and none of `exclude`
+        (replaces inline `'member' in h and 'id' in h` scans). Memoized per header row.
+        """
+        memo_key = ("all", terms, exclude)
+        if memo_key not in self._find_memo:
+            found = next(
+                (i for i, h in enumerate(self.lower)
+                 if all(t in h for t in terms) and not any(x in h for x in exclude)),
+                None
+            )
+            with self._lock:
+                self._find_memo[memo_key] = found
+        return self._find_memo[memo_key]
+
+    def find_any(self, *terms: str) -> Optional[int]:
+        """First column whose lowercase header contains any of the terms. Memoized."""
+        memo_key = ("any", terms)
+        if memo_key not in self._find_memo:
+            found = next((i for i, h in enumerate(self.lower) if any(t in h for t in terms)), None)
+            with self._lock:
+                self._find_memo[memo_key] = found
+        return self._find_memo[memo_key]
+
+    def payload_columns(self, data: Dict[str, Any]) -> Dict[int, Any]:
+        """
+        Resolve payload keys to column indexes (the reverse map).
+        Every column receives, in order of preference: the payload value with
+        the same canonical key, the value under the exact header name, or the
+        value whose simple-normalized key matches.
+
+        Returns:
+            {column index: value} for every column that has a payload value
+        """
+        canonical_data: Dict[str, Any] = {}
+        simple_data: Dict[str, Any] = {}
+        for k, v in data.items():
+            c_k = get_canonical_key(k)
+            if c_k:
+                canonical_data[c_k] = v
+            simple_data[normalize_field_name(k)] = v
+
+        values: Dict[int, Any] = {}
+        for i, h in enumerate(self.headers):
+            c_h = self.canonical[i]
+            if c_h in canonical_data:
+                values[i] = canonical_data[c_h]
+            elif h in data:
+                values[i] = data[h]
+            else:
+                s_h = normalize_field_name(h)
+                if s_h in simple_data:
+                    values[i] = simple_data[s_h]
+        return values
+
+    def row_dict(self, row: List[Any]) -> Dict[str, Any]:
+        """Header -> value mapping for a row, padding short rows with ""."""
+        return {h: (row[i] if i < len(row) else "") for i, h in enumerate(self.headers)}
+
+
+def header_fingerprint(headers: Tuple[str, ...]) -> str:
+    return hashlib.sha1("\x1f".join(headers).encode("utf-8")).hexdigest()
+
+
+_compiled: "OrderedDict[Tuple[str, str], HeaderMap]" = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_headers(headers: List[str], worksheet: str = "") -> HeaderMap:
+    """
+    Get the compiled HeaderMap for a header row, building it only when the
+    (worksheet, header-row hash) pair has not been seen before.
+
+    Args:
+        headers: Header row as read from the sheet
+        worksheet: Worksheet title (or any namespace) the headers belong to
+
+    Returns:
+        Memoized HeaderMap
+    """
+    key = (worksheet, header_fingerprint(tuple(str(h) for h in headers)))
+    with _compiled_lock:
+        hmap = _compiled.get(key)
+        if hmap is not None:
+            _compiled.move_to_end(key)
+    instrumentation.record_cache("header_map", hmap is not None)
+    if hmap is not None:
+        return hmap
+
+    hmap = HeaderMap(headers)
+    with _compiled_lock:
+        _compiled[key] = hmap
+        while len(_compiled) > HEADER_MAP_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return hmap
@@ -3,10 +3,12 @@ Home Care Routes Module
 FastAPI routes for home care billing management
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from header_resolver import compile_headers
+import http_cache
 
 from homecare_service import (
     get_all_homecare_clients,
@@ -17,6 +19,8 @@ from homecare_service import (
     parse_date,
     format_date,
     process_daily_billing,
+    HOMECARE_SHEET_ID,
+    CRM_ADMISSION_SHEET_ID,
 )
 
 router = APIRouter()
@@ -76,6 +80,7 @@ class HomeCareClientUpdate(BaseModel):
 
 @router.get("/homecare/clients")
 async def list_homecare_clients(
+    request: Request,
     status: Optional[str] = Query(None, description="Filter by ACTIVE or INACTIVE")
 ):
     """
@@ -85,9 +90,17 @@ async def list_homecare_clients(
         status: Filter by ACTIVE or INACTIVE (optional)
     
     Returns:
-        List of home care clients with billing information
+        List of home care clients with billing information (304 when the client's ETag is current)
     """
     try:
+        # Next billing dates are relative to today, so the version also changes daily
+        version = http_cache.daily(http_cache.dataset_version(
+            spreadsheets=[HOMECARE_SHEET_ID, CRM_ADMISSION_SHEET_ID], topics=["homecare_clients", "invoices"]
+        ))
+        cached = http_cache.not_modified(request, version)
+        if cached is not None:
+            return cached
+
         clients = get_all_homecare_clients()
         
         # OPTIMIZATION: Fetch ALL billing history in ONE API call instead of 67 separate calls
@@ -101,7 +114,7 @@ async def list_homecare_clients(
             billing_history_map = {}
             if len(all_invoices) > 1:
                 headers = all_invoices[0]
-                header_map = {h.strip().lower(): i for i, h in enumerate(headers)}
+                header_map = compile_headers(headers, "Accounts Receivable").last_by_lower
                 
                 patient_col = header_map.get('patient name')
                 invoice_date_col = header_map.get('invoice date')
@@ -150,6 +163,7 @@ async def list_homecare_clients(
                 next_billing = format_date(next_billing_dt)
             
             enriched_clients.append({
+                "client_id": client.get("_client_id"),
                 "patient_name": patient_name,
                 "gender": client.get("GENDER", ""),
                 "age": client.get("AGE", ""),
@@ -172,11 +186,11 @@ async def list_homecare_clients(
             status_upper = status.upper()
             enriched_clients = [c for c in enriched_clients if c["status"] == status_upper]
         
-        return {
+        return http_cache.json_response(request, {
             "status": "success",
             "count": len(enriched_clients),
             "clients": enriched_clients
-        }
+        }, version)
         
     except Exception as e:
         print(f"Error listing home care clients: {e}")
@@ -224,6 +238,7 @@ async def get_homecare_client(patient_name: str):
         return {
             "status": "success",
             "client": {
+                "client_id": client.get("_client_id"),
                 "patient_name": client.get("PATIENT NAME", ""),
                 "gender": client.get("GENDER", ""),
                 "age": client.get("AGE", ""),
@@ -345,7 +360,7 @@ async def get_billing_preview(
             billing_history_map = {}
             if len(all_invoices) > 1:
                 headers = all_invoices[0]
-                header_map = {h.strip().lower(): i for i, h in enumerate(headers)}
+                header_map = compile_headers(headers, "Accounts Receivable").last_by_lower
                 
                 patient_col = header_map.get('patient name')
                 invoice_date_col = header_map.get('invoice date')
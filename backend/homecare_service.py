@@ -7,10 +7,13 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import calendar
-import gspread
+import sheets_scheduler
+import live_updates
+import client_repository
 from google.oauth2.service_account import Credentials
 import os
 from fastapi import HTTPException
+from header_resolver import compile_headers
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -22,6 +25,9 @@ HOMECARE_SHEET_ID = os.getenv("HOMECARE_SHEET_ID")
 CRM_ADMISSION_SHEET_ID = os.getenv("PATIENT_ADMISSION_SHEET_ID")
 ADMISSION_CREDENTIALS_FILE = "CRM-admission.json"
 
+# Client edits made directly in the sheet reach open client lists (see live_updates.py)
+live_updates.follow_worksheet(HOMECARE_SHEET_ID, "CRM_HomeCare", "homecare_clients")
+
 
 def get_google_sheet_client(credentials_file: str = CREDENTIALS_FILE):
     """Get authenticated gspread client"""
@@ -33,7 +39,7 @@ def get_google_sheet_client(credentials_file: str = CREDENTIALS_FILE):
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(credentials_file, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
     return client
 
 
@@ -47,6 +53,12 @@ def get_homecare_sheet():
     return worksheet
 
 
+# CRM_HomeCare held in memory, indexed by normalized patient name and client ID
+homecare_clients = client_repository.register(
+    "homecare", get_homecare_sheet, topic="homecare_clients", name_headers=["PATIENT NAME"], id_prefix="HC"
+)
+
+
 def get_accounts_receivable_sheet():
     """Get CRM_Admission → Invoice Table for invoice storage"""
     # Try to use separate credentials for admission sheet if available
@@ -228,39 +240,7 @@ def get_all_homecare_clients() -> List[Dict[str, Any]]:
         List of client records
     """
     try:
-        worksheet = get_homecare_sheet()
-        all_values = worksheet.get_all_values()
-        
-        if not all_values or len(all_values) < 2:
-            print("[Home Care] No clients found in CRM_HomeCare sheet")
-            return []
-        
-        headers = all_values[0]
-        rows = all_values[1:]
-        
-        # Create header map for case-insensitive lookup
-        header_map = {header.strip(): idx for idx, header in enumerate(headers)}
-        
-        clients = []
-        for row_idx, row in enumerate(rows, start=2):  # Start from row 2 for _row_number
-            if not any(row):  # Skip empty rows
-                continue
-            
-            # Build client record
-            client = {}
-            for header, idx in header_map.items():
-                if idx < len(row):
-                    client[header] = row[idx]
-                else:
-                    client[header] = ""
-            
-            # Add row number for updates
-            client['_row_number'] = row_idx
-            
-            # Only include clients with a patient name
-            if client.get("PATIENT NAME", "").strip():
-                clients.append(client)
-        
+        clients = homecare_clients.all()
         print(f"[Home Care] Retrieved {len(clients)} total clients from sheet")
         return clients
         
@@ -272,46 +252,18 @@ def get_all_homecare_clients() -> List[Dict[str, Any]]:
         raise
 
 
-
-
 def get_homecare_client_by_id(patient_name: str) -> Optional[Dict[str, Any]]:
     """
-    Get specific home care client by patient name.
+    Get specific home care client by patient name or client ID.
     
     Args:
-        patient_name: Patient name to search for
+        patient_name: Patient name (case- and whitespace-insensitive) or client ID
     
     Returns:
         Client record or None if not found
     """
     try:
-        worksheet = get_homecare_sheet()
-        all_values = worksheet.get_all_values()
-        
-        if not all_values or len(all_values) < 2:
-            return None
-        
-        headers = all_values[0]
-        header_map = {}
-        for idx, header in enumerate(headers):
-            if header and header not in header_map:
-                header_map[header] = idx
-        
-        for row_idx, row in enumerate(all_values[1:], start=2):
-            if not any(row):
-                continue
-            
-            record = {}
-            for header, idx in header_map.items():
-                record[header] = row[idx] if idx < len(row) else ""
-            
-            record['_row_number'] = row_idx
-            
-            # Check if patient name matches
-            if str(record.get("PATIENT NAME", "")).strip().lower() == patient_name.lower():
-                return record
-        
-        return None
+        return homecare_clients.find(patient_name)
         
     except Exception as e:
         print(f"Error fetching home care client: {e}")
@@ -383,7 +335,7 @@ def generate_invoice_ref() -> str:
         
         # Get headers
         headers = all_values[0]
-        inv_ref_idx = next((i for i, h in enumerate(headers) if h == "Invoice Ref"), None)
+        inv_ref_idx = compile_headers(headers, "Accounts Receivable").by_exact.get("Invoice Ref")
         
         if inv_ref_idx is None:
             return "INV000001"
@@ -496,41 +448,28 @@ def generate_homecare_invoice(client_record: Dict[str, Any]) -> Dict[str, Any]:
         
         # UPDATE LAST BILLED DATE: Update the existing client row with billing date
         try:
-            homecare_sheet = get_homecare_sheet()
-            
             # Get current date in DD/MM/YYYY format
             billing_date = datetime.now().strftime("%d/%m/%Y")
             
-            # Get headers from CRM_HomeCare sheet
-            headers = homecare_sheet.row_values(1)
-            
-            # Check if "LAST BILLED DATE" column exists, if not add it
-            last_billed_col_index = None
-            for idx, header in enumerate(headers):
-                if header == "LAST BILLED DATE":
-                    last_billed_col_index = idx + 1  # gspread uses 1-indexed columns
-                    break
-            
-            if last_billed_col_index is None:
-                # Add the column if it doesn't exist
-                col_index = len(headers) + 1
-                homecare_sheet.update_cell(1, col_index, "LAST BILLED DATE")
-                last_billed_col_index = col_index
-                print(f"[Home Care Billing] Added LAST BILLED DATE column at position {col_index}")
-            
-            # Get the client's row number
-            client_row_number = client_record.get('_row_number')
-            
-            if client_row_number:
-                # Update the LAST BILLED DATE cell for this client
-                homecare_sheet.update_cell(client_row_number, last_billed_col_index, billing_date)
-                print(f"[Home Care Billing] Updated LAST BILLED DATE for {patient_name} to {billing_date} (row {client_row_number})")
+            client_id = client_record.get('_client_id')
+            if client_id:
+                # One write; the LAST BILLED DATE column is added if it doesn't exist yet
+                homecare_clients.update(client_id, {"LAST BILLED DATE": billing_date}, add_missing=True)
+                print(f"[Home Care Billing] Updated LAST BILLED DATE for {patient_name} to {billing_date} (row {client_record.get('_row_number')})")
             else:
                 print(f"[Home Care Billing] Warning: Could not find row number for {patient_name}")
                 
         except Exception as e:
             print(f"[Home Care Billing] Warning: Could not update LAST BILLED DATE in CRM_HomeCare: {e}")
         
+        live_updates.publish("invoices", "invoice_posted", invoice_ref, {
+            "invoice_ref": invoice_ref, "invoice_date": invoice_date, "patient_name": patient_name,
+            "amount": total_amount, "source": "homecare",
+        })
+        homecare_clients.publish("client_billed", patient_name, {
+            "patient_name": patient_name, "invoice_ref": invoice_ref,
+        })
+        
         return {
             "invoice_ref": invoice_ref,
             "invoice_date": invoice_date,
@@ -651,11 +590,6 @@ def create_homecare_client(client_data: Dict[str, Any]) -> Dict[str, Any]:
         Result dictionary with status and message
     """
     try:
-        worksheet = get_homecare_sheet()
-        
-        # Get headers
-        headers = worksheet.row_values(1)
-        
         # Convert date from YYYY-MM-DD to DD/MM/YYYY
         service_date = client_data.get('service_started_on', '')
         if service_date and '-' in service_date:
@@ -692,15 +626,13 @@ def create_homecare_client(client_data: Dict[str, Any]) -> Dict[str, Any]:
             "Resolved": client_data.get('resolved', 'No'),
         }
         
-        # Build row values in the same order as headers
-        row_values = []
-        for header in headers:
-            row_values.append(str(row_data.get(header, "")))
-        
-        # Append the row
-        worksheet.append_row(row_values)
+        # Append the row (values are laid out in the sheet's header order)
+        homecare_clients.append(row_data)
         
         print(f"[Home Care] Created new client: {client_data.get('patient_name')}")
+        homecare_clients.publish("client_created", client_data.get('patient_name'), {
+            "patient_name": client_data.get('patient_name'), "status": row_data.get("ACTIVE / INACTIVE", ""),
+        })
         
         return {
             "status": "success",
@@ -725,27 +657,8 @@ def update_homecare_client(patient_name: str, client_data: Dict[str, Any]) -> Di
         Result dictionary with status and message
     """
     try:
-        worksheet = get_homecare_sheet()
-        all_values = worksheet.get_all_values()
-        
-        if not all_values or len(all_values) < 2:
-            raise HTTPException(status_code=404, detail="Client not found")
-        
-        headers = all_values[0]
-        header_map = {header: idx for idx, header in enumerate(headers)}
-        
-        # Find the client row
-        client_row_number = None
-        for row_idx, row in enumerate(all_values[1:], start=2):
-            if not any(row):
-                continue
-            
-            current_name = row[header_map.get("PATIENT NAME", 0)] if "PATIENT NAME" in header_map else ""
-            if current_name.strip().lower() == patient_name.lower():
-                client_row_number = row_idx
-                break
-        
-        if not client_row_number:
+        client = homecare_clients.find(patient_name)
+        if not client:
             raise HTTPException(status_code=404, detail=f"Client '{patient_name}' not found")
         
         # Convert date from YYYY-MM-DD to DD/MM/YYYY
@@ -794,13 +707,16 @@ def update_homecare_client(patient_name: str, client_data: Dict[str, Any]) -> Di
             "Date_1": date_1,
         }
         
-        # Update each cell
-        for field, value in updated_data.items():
-            if field in header_map:
-                col_idx = header_map[field] + 1  # gspread uses 1-indexed columns
-                worksheet.update_cell(client_row_number, col_idx, str(value))
+        # Write the changed columns of the client's row in one request
+        try:
+            homecare_clients.update(client["_client_id"], updated_data)
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Client '{patient_name}' not found")
         
         print(f"[Home Care] Updated client: {patient_name}")
+        homecare_clients.publish("client_updated", patient_name, {
+            "patient_name": patient_name, "status": updated_data["ACTIVE / INACTIVE"],
+        })
         
         return {
             "status": "success",
@@ -0,0 +1,275 @@
+"""
+HTTP Caching Module
+ETags derived from dataset versions with If-None-Match -> 304 handling, a fast JSON serializer and negotiated gzip/brotli compression for large responses
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+import change_feed
+import instrumentation
+import live_updates
+import shared_cache
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is negotiated instead
+    brotli = None
+
+# Configuration
+COMPRESS_MIN_BYTES = int(os.getenv("HTTP_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("HTTP_BROTLI_QUALITY", "5"))  # 5 compresses better than gzip -9 at a fraction of brotli -11's cost
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+_stats: Dict[str, int] = {
+    "not_modified": 0,
+    "version_etags": 0,
+    "content_etags": 0,
+    "compressed_gzip": 0,
+    "compressed_br": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+}
+
+
+def dataset_version(spreadsheets: Iterable[Optional[str]] = (), topics: Iterable[str] = (),
+                    namespaces: Iterable[str] = (), extra: Iterable[Any] = ()) -> Optional[str]:
+    """
+    Version stamp of the data behind a response, computed without reading Sheets.
+
+    Args:
+        spreadsheets: Spreadsheet keys; their Drive revision comes from the change feed
+        topics: live_updates topics; the app's own writes publish there immediately,
+                before the next change-feed poll sees the new revision
+        namespaces: shared_cache namespaces whose generation bumps on invalidation
+        extra: Anything else the response depends on (filters are added by etag_for)
+
+    Returns:
+        Opaque version string, or None when a spreadsheet's revision is unknown (change
+        feed disabled or unhealthy); callers then fall back to hashing the body
+    """
+    parts: List[str] = []
+    for spreadsheet_id in spreadsheets:
+        revision = change_feed.revision(spreadsheet_id)
+        if revision is None:
+            return None
+        parts.append(f"{spreadsheet_id}@{revision}")
+    for topic in topics:
+        parts.append(f"{topic}:{live_updates.topic_seq(topic)}")
+    for namespace in namespaces:
+        parts.append(f"{namespace}#{shared_cache.generation(namespace)}")
+    parts.extend(str(item) for item in extra)
+    return "|".join(parts)
+
+
+def daily(version: Optional[str]) -> Optional[str]:
+    """Add today's date to a version, for responses that compute dates relative to today."""
+    return None if version is None else f"{version}|{date.today().isoformat()}"
+
+
+def etag_for(request: Request, version: str) -> str:
+    """Weak ETag for one route + query string at a dataset version (weak: it is shared by every encoding)."""
+    key = f"{request.url.path}?{request.url.query}|{version}"
+    return f'W/"{hashlib.sha1(key.encode("utf-8")).hexdigest()[:24]}"'
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def _not_modified_response(etag: str) -> Response:
+    _stats["not_modified"] += 1
+    instrumentation.record_cache("http_etag", True)
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def not_modified(request: Request, version: Optional[str]) -> Optional[Response]:
+    """
+    304 response when the client already has this version, checked before any Sheets read.
+
+    Returns:
+        A 304 Response, or None when the body has to be built
+    """
+    if version is None:
+        return None
+    etag = etag_for(request, version)
+    if _matches(request, etag):
+        return _not_modified_response(etag)
+    return None
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(request: Request, content: Any, version: Optional[str] = None) -> Response:
+    """
+    JSON response with an ETag.
+
+    Args:
+        request: Incoming request (for If-None-Match and the route key)
+        content: JSON-serializable payload
+        version: dataset_version() of the payload; None hashes the body instead,
+                 which still saves the transfer but not the Sheets read
+
+    Returns:
+        200 with the body, or 304 when If-None-Match matches
+    """
+    body = dumps(content)
+    if version is not None:
+        _stats["version_etags"] += 1
+        etag = etag_for(request, version)
+    else:
+        _stats["content_etags"] += 1
+        etag = f'W/"{hashlib.sha1(body).hexdigest()[:24]}"'
+    if _matches(request, etag):
+        return _not_modified_response(etag)
+    instrumentation.record_cache("http_etag", False)
+    # no-cache: browsers keep the body but revalidate every time, so edits show up at once
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _accepted_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete (non-streaming) responses above COMPRESS_MIN_BYTES with brotli or
+    gzip, as negotiated by Accept-Encoding. Streaming responses (SSE, downloads) pass through
+    untouched so their frames are never held back in a compressor buffer.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict((k.lower(), v) for k, v in scope.get("headers", []))
+        encoding = _accepted_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Dict[str, Any] = {}
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message  # Held until the first body chunk shows whether the response streams
+                return
+            if message["type"] != "http.response.body" or not start_message:
+                await send(message)
+                return
+
+            start, start_message = start_message, {}
+            body = message.get("body", b"")
+            response_headers = [(k, v) for k, v in start.get("headers", [])]
+            names = {k.lower(): v for k, v in response_headers}
+            content_type = names.get(b"content-type", b"").decode("latin-1")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or b"content-encoding" in names
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            if encoding == "br":
+                compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+                _stats["compressed_br"] += 1
+            else:
+                compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+                _stats["compressed_gzip"] += 1
+            _stats["bytes_in"] += len(body)
+            _stats["bytes_out"] += len(compressed)
+
+            response_headers = [(k, v) for k, v in response_headers if k.lower() not in (b"content-length", b"vary")]
+            vary = names.get(b"vary", b"").decode("latin-1")
+            if "accept-encoding" not in vary.lower():
+                vary = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+            response_headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(compressed)).encode("latin-1")),
+                (b"vary", vary.encode("latin-1")),
+            ]
+            await send({**start, "headers": response_headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+        if start_message:
+            await send(start_message)  # Response without a body message (not expected from Starlette)
+
+
+def status() -> Dict[str, Any]:
+    """Serializer and encodings in use, 304 counts and compression ratio for this worker."""
+    ratio = round(_stats["bytes_out"] / _stats["bytes_in"], 3) if _stats["bytes_in"] else None
+    return {
+        "serializer": "orjson" if orjson is not None else "json",
+        "encodings": (["br"] if brotli is not None else []) + ["gzip"],
+        "compress_min_bytes": COMPRESS_MIN_BYTES,
+        "compression_ratio": ratio,
+        "stats": dict(_stats),
+    }
+
+
+def _prometheus_lines() -> List[str]:
+    return (
+        instrumentation.gauge_lines("crm_http_not_modified", "Conditional GETs answered with 304 by this worker", [({}, _stats["not_modified"])])
+        + instrumentation.gauge_lines(
+            "crm_http_compressed_bytes", "Response bytes before and after compression on this worker",
+            [({"stage": "in"}, _stats["bytes_in"]), ({"stage": "out"}, _stats["bytes_out"])],
+        )
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -0,0 +1,353 @@
+"""
+Instrumentation Module
+Prometheus-format metrics (endpoint latency, Sheets calls, cache hits, job timings), sampled request traces and sampled structured logs
+"""
+
+import bisect
+import contextvars
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+# Configuration
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))  # Fraction of requests logged as JSON traces
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))  # Fraction of hot-path debug events printed
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[Any, ...], float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels: Any, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: Any) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items(), key=lambda kv: tuple(map(str, kv[0]))):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *labels: Any, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[Any, ...], List[float]] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, *labels: Any, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *labels: Any) -> float:
+        series = self._values.get(labels)
+        return series[-1] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._values.items(), key=lambda kv: tuple(map(str, kv[0]))):
+                cumulative = 0.0
+                for bound, n in zip(self.buckets, series):
+                    cumulative += n
+                    le = 'le="%s"' % _number(bound)
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {_number(cumulative)}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {_number(series[-1])}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {_number(series[-1])}")
+        return lines
+
+
+_registry: List[Any] = []
+_collectors: List[Callable[[], List[str]]] = []
+
+HTTP_LATENCY = Histogram(
+    "crm_http_request_duration_seconds", "Endpoint latency by route template",
+    ("method", "route", "status"),
+)
+SHEETS_CALL_DURATION = Histogram(
+    "crm_sheets_call_duration_seconds", "Google Sheets API call latency",
+    ("call", "worksheet", "status"),
+)
+SHEETS_REQUEST_BYTES = Counter(
+    "crm_sheets_request_bytes_total", "Bytes sent to the Sheets API", ("call", "worksheet"),
+)
+SHEETS_RESPONSE_BYTES = Counter(
+    "crm_sheets_response_bytes_total", "Bytes received from the Sheets API", ("call", "worksheet"),
+)
+CACHE_REQUESTS = Counter(
+    "crm_cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result"),
+)
+JOB_DURATION = Histogram(
+    "crm_job_duration_seconds", "Scheduled job run time", ("job", "status"), buckets=JOB_BUCKETS,
+)
+JOB_LAST_RUN = Gauge(
+    "crm_job_last_run_timestamp_seconds", "Unix time a scheduled job last finished", ("job",),
+)
+
+
+def register_collector(collector: Callable[[], List[str]]) -> None:
+    """Add a callable returning extra exposition lines (gauges read from other modules at scrape time)."""
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            lines.append(f"# collector error: {_escape(e)}")
+    return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, documentation: str, samples: List[Tuple[Dict[str, Any], float]]) -> List[str]:
+    """Exposition lines for a gauge computed at scrape time."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        names = tuple(labels.keys())
+        lines.append(f"{name}{_labels(names, tuple(labels.values()))} {_number(value)}")
+    return lines
+
+
+# ---------- caches ----------
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+# ---------- scheduled jobs ----------
+
+def timed_job(job: str) -> Callable:
+    """Decorator recording a scheduled job's run time, outcome and last-run timestamp."""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                JOB_DURATION.observe(job, status, value=time.perf_counter() - started)
+                JOB_LAST_RUN.set(job, value=time.time())
+        return wrapper
+    return decorator
+
+
+# ---------- Sheets calls ----------
+
+_SHEETS_URL_RE = re.compile(r"/v4/spreadsheets/[^/:]+(?P<rest>.*)$")
+
+
+def sheets_call_type(method: str, url: str) -> Tuple[str, str]:
+    """
+    Classify a Sheets/Drive API URL.
+
+    Returns:
+        (call, worksheet), e.g. ("values.get", "Sheet1") or ("batchUpdate", "-")
+    """
+    match = _SHEETS_URL_RE.search(url or "")
+    if not match:
+        return ("drive" if "googleapis.com/drive" in (url or "") else "other", "-")
+    rest = match.group("rest").split("?")[0]
+    if rest in ("", "/"):
+        return "metadata", "-"
+    if rest.startswith(":"):
+        return rest[1:], "-"
+    if rest.startswith("/values:"):
+        return "values." + rest[len("/values:"):], "-"
+    if rest.startswith("/values/"):
+        range_part = unquote(rest[len("/values/"):])
+        op = "get" if method.lower() == "get" else "update"
+        if ":" in range_part.rsplit("!", 1)[-1] and range_part.endswith((":append", ":clear")):
+            range_part, op = range_part.rsplit(":", 1)
+        worksheet = range_part.split("!", 1)[0].strip("'") if "!" in range_part else range_part.strip("'")
+        return f"values.{op}", worksheet or "-"
+    return rest.strip("/").split("/")[0] or "other", "-"
+
+
+def observe_sheets_call(method: str, url: str, status: Any, duration: float,
+                        request_bytes: int = 0, response_bytes: int = 0) -> None:
+    call, worksheet = sheets_call_type(method, url)
+    SHEETS_CALL_DURATION.observe(call, worksheet, status, value=duration)
+    if request_bytes:
+        SHEETS_REQUEST_BYTES.inc(call, worksheet, amount=request_bytes)
+    if response_bytes:
+        SHEETS_RESPONSE_BYTES.inc(call, worksheet, amount=response_bytes)
+    add_span(f"sheets.{call}", duration, worksheet=worksheet, status=status, bytes=response_bytes)
+
+
+# ---------- traces ----------
+
+_trace: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("crm_trace", default=None)
+
+
+def add_span(name: str, duration: float, **attrs: Any) -> None:
+    """Attach a finished span to the current request trace (no-op when the request is not sampled)."""
+    trace = _trace.get()
+    if trace is None:
+        return
+    trace["spans"].append({
+        "name": name,
+        "start_ms": round((time.perf_counter() - duration - trace["_t0"]) * 1000, 2),
+        "duration_ms": round(duration * 1000, 2),
+        **attrs,
+    })
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """Time a block as a span of the current request trace."""
+    if _trace.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, time.perf_counter() - started, **attrs)
+
+
+# ---------- sampled structured logging ----------
+
+def log_sampled(event: str, rate: Optional[float] = None, **fields: Any) -> None:
+    """
+    Print a JSON log line for a fraction of calls (LOG_SAMPLE_RATE by default).
+    Traced requests always log, so a sampled trace carries its debug events.
+    """
+    trace = _trace.get()
+    if trace is None and random.random() >= (LOG_SAMPLE_RATE if rate is None else rate):
+        return
+    record = {"ts": round(time.time(), 3), "event": event, **fields}
+    if trace is not None:
+        record["trace_id"] = trace["trace_id"]
+    print(json.dumps(record, default=str))
+
+
+# ---------- ASGI middleware ----------
+
+class MetricsMiddleware:
+    """
+    Records per-route latency histograms (labelled with the route template, not the raw
+    path) and, for sampled requests, prints a JSON trace with its spans.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Optional[Dict[Any, str]] = None
+
+    def _route_for(self, scope: Dict[str, Any]) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_paths is None or endpoint not in self._route_paths:
+            app = scope.get("app")
+            routes = getattr(app, "routes", []) if app is not None else []
+            self._route_paths = {}
+            for route in routes:
+                self._route_paths.setdefault(getattr(route, "endpoint", None), getattr(route, "path", "unknown"))
+        return self._route_paths.get(endpoint, "unknown")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_holder = {"status": 500}
+        token = None
+        trace = None
+        if TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE:
+            trace = {"trace_id": uuid.uuid4().hex[:16], "spans": [], "_t0": started}
+            token = _trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            route = self._route_for(scope)
+            HTTP_LATENCY.observe(scope.get("method", "GET"), route, status_holder["status"], value=duration)
+            if token is not None:
+                _trace.reset(token)
+                print(json.dumps({
+                    "trace_id": trace["trace_id"],
+                    "method": scope.get("method"),
+                    "route": route,
+                    "path": scope.get("path"),
+                    "status": status_holder["status"],
+                    "duration_ms": round(duration * 1000, 2),
+                    "spans": trace["spans"],
+                }, default=str))
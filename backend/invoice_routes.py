@@ -3,21 +3,21 @@ Invoice API Routes
 FastAPI router for all invoice-related endpoints
 """
 
-from fastapi import APIRouter, HTTPException, Query, Body
-from fastapi.responses import StreamingResponse, Response
+from fastapi import APIRouter, HTTPException, Query, Body, Request
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import io
 
 from invoice_service import (
     search_patients,
     get_invoices,
     create_invoice,
     get_invoice_details,
-    calculate_invoice_totals
+    calculate_invoice_totals,
+    CRM_ADMISSION_SHEET_ID,
 )
-from pdf_generator import generate_invoice_pdf, generate_invoice_filename
+import http_cache
+import process_pool
 
 # Import email sending function from main
 import sys
@@ -26,6 +26,9 @@ sys.path.append(os.path.dirname(__file__))
 
 router = APIRouter()
 
+# Invoice PDFs are rendered in the process pool, off the event loop
+process_pool.register_task("invoice_pdf", "pdf_generator:generate_invoice_pdf", timeout=60)
+
 
 # Pydantic Models
 class ServiceItem(BaseModel):
@@ -81,6 +84,7 @@ async def api_search_patients(q: str = Query(..., min_length=1, description="Sea
 
 @router.get("/invoices")
 async def api_get_invoices(
+    request: Request,
     patient_id: Optional[str] = Query(None, description="Filter by patient ID"),
     status: Optional[str] = Query(None, description="Filter by status"),
     care_center: Optional[str] = Query(None, description="Filter by care center"),
@@ -95,6 +99,11 @@ async def api_get_invoices(
     Returns empty array if no results found
     """
     try:
+        version = http_cache.dataset_version(spreadsheets=[CRM_ADMISSION_SHEET_ID], topics=["invoices"])
+        cached = http_cache.not_modified(request, version)
+        if cached is not None:
+            return cached
+
         invoices = get_invoices(
             patient_id=patient_id,
             status=status,
@@ -104,11 +113,11 @@ async def api_get_invoices(
             date_from=date_from,
             date_to=date_to
         )
-        return {
+        return http_cache.json_response(request, {
             "success": True,
             "count": len(invoices),
             "invoices": invoices
-        }
+        }, version)
     except Exception as e:
         print(f"Error fetching invoices: {e}")
         # Return empty result instead of error for better UX
@@ -184,6 +193,8 @@ async def api_generate_invoice_pdf(invoice_id: str):
     """
     Generate and download invoice PDF
     """
+    from pdf_generator import generate_invoice_filename
+
     try:
         # Get invoice details
         invoice = get_invoice_details(invoice_id)
@@ -192,28 +203,19 @@ async def api_generate_invoice_pdf(invoice_id: str):
         totals = calculate_invoice_totals(invoice.get("services", []))
         invoice.update(totals)
         
-        # Generate PDF
-        pdf_bytes = generate_invoice_pdf(invoice)
+        # Render the PDF in the process pool (reportlab is only loaded there)
+        pdf = await process_pool.run("invoice_pdf", invoice)
         
-        # Return as downloadable file using StreamingResponse
         filename = generate_invoice_filename(invoice_id)
-        
-        # Wrap bytes in BytesIO for streaming
-        pdf_buffer = io.BytesIO(pdf_bytes)
-        
-        return StreamingResponse(
-            pdf_buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        return process_pool.bytes_response(pdf, "application/pdf", {
+            "Content-Disposition": f"attachment; filename={filename}"
+        })
         
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error generating PDF: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise process_pool.http_error(e) or HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/invoices/{invoice_id}/email")
@@ -230,8 +232,9 @@ async def api_email_invoice(invoice_id: str, email_request: EmailInvoiceRequest)
         totals = calculate_invoice_totals(invoice.get("services", []))
         invoice.update(totals)
         
-        # Generate PDF
-        pdf_bytes = generate_invoice_pdf(invoice)
+        # Render the PDF so a bad invoice fails here; the result is released until
+        # sending with an attachment is implemented
+        process_pool.as_bytes(await process_pool.run("invoice_pdf", invoice))
         
         # TODO: Implement email sending with PDF attachment
         # For now, return success message
@@ -247,7 +250,7 @@ async def api_email_invoice(invoice_id: str, email_request: EmailInvoiceRequest)
         raise
     except Exception as e:
         print(f"Error emailing invoice: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise process_pool.http_error(e) or HTTPException(status_code=500, detail=str(e))
 
 
 # Health check endpoint
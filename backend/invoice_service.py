@@ -6,9 +6,14 @@ Handles all invoice-related business logic and Google Sheets operations
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import gspread
+import analytics_views
+import compact_table
+import sheets_scheduler
+import live_updates
 from google.oauth2.service_account import Credentials
 import os
 from fastapi import HTTPException
+from header_resolver import compile_headers
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -20,6 +25,8 @@ ADMISSION_CREDENTIALS_FILE = "CRM-admission.json"
 CRM_LEAD_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
 CRM_ADMISSION_SHEET_ID = os.getenv("PATIENT_ADMISSION_SHEET_ID")
 
+# Invoices entered directly in the sheet reach open invoice lists (see live_updates.py)
+live_updates.follow_worksheet(CRM_ADMISSION_SHEET_ID, "Invoice Table", "invoices")
 
 
 def get_google_sheet_client(credentials_file: str = CREDENTIALS_FILE):
@@ -32,7 +39,7 @@ def get_google_sheet_client(credentials_file: str = CREDENTIALS_FILE):
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(credentials_file, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
     return client
 
 
@@ -59,18 +66,26 @@ def get_crm_admission_sheet():
     return worksheet
 
 
+def read_records(worksheet: gspread.Worksheet) -> compact_table.CompactTable:
+    """
+    The worksheet's get_all_records() values, stored column-wise: scans read row views
+    and only the rows returned become dicts.
+    """
+    return compact_table.CompactTable.from_values(worksheet.get_all_values(), numericise=True)
+
+
 def search_patients(query: str) -> List[Dict[str, Any]]:
     """
     Search patients in CRM_Lead → Sheet1
     Searches by Patient Name, Patient ID, or Mobile Number
     """
     try:
-        worksheet = get_crm_lead_sheet()
-        all_records = worksheet.get_all_records()
-        
         if not query or not query.strip():
             return []
         
+        worksheet = get_crm_lead_sheet()
+        all_records = read_records(worksheet)
+        
         query_lower = query.strip().lower()
         results = []
         
@@ -101,6 +116,77 @@ def search_patients(query: str) -> List[Dict[str, Any]]:
         raise HTTPException(status_code=500, detail=f"Failed to search patients: {str(e)}")
 
 
+def invoice_matches(record: Dict[str, Any],
+                    patient_id: Optional[str] = None,
+                    status: Optional[str] = None,
+                    care_center: Optional[str] = None,
+                    provider: Optional[str] = None,
+                    invoice_ref: Optional[str] = None,
+                    date_from: Optional[str] = None,
+                    date_to: Optional[str] = None) -> bool:
+    """
+    Whether one Invoice Table row (header -> value) passes the invoice list filters.
+    Shared by get_invoices and the invoice export (export_engine.py).
+    """
+    # Apply filters (AND logic)
+    # Patient ID filter
+    if patient_id:
+        record_patient_id = str(record.get("Patient ID", "")) or str(record.get("Member ID Key", ""))
+        if record_patient_id != patient_id:
+            return False
+    
+    # Status filter
+    if status and status.lower() != 'all':
+        if str(record.get("Status", "")).lower() != status.lower():
+            return False
+    
+    # Care Center filter
+    if care_center and care_center.lower() != 'all':
+        if str(record.get("Care Center", "")).lower() != care_center.lower():
+            return False
+    
+    # Provider filter
+    if provider and provider.lower() not in ['all', 'all providers']:
+        if str(record.get("Provider", "")).lower() != provider.lower():
+            return False
+    
+    # Invoice Ref filter (contains search)
+    if invoice_ref:
+        record_invoice_ref = str(record.get("Invoice Ref", "")).lower()
+        if invoice_ref.lower() not in record_invoice_ref:
+            return False
+    
+    # Date range filtering
+    if date_from or date_to:
+        invoice_date_str = record.get("Invoice Date", "")
+        if invoice_date_str:
+            try:
+                # Try to parse the date (assuming format: DD-MM-YYYY or YYYY-MM-DD)
+                if '-' in invoice_date_str:
+                    parts = invoice_date_str.split('-')
+                    if len(parts) == 3:
+                        # Check if it's DD-MM-YYYY or YYYY-MM-DD
+                        if len(parts[0]) == 4:  # YYYY-MM-DD
+                            invoice_date = datetime.strptime(invoice_date_str, "%Y-%m-%d")
+                        else:  # DD-MM-YYYY
+                            invoice_date = datetime.strptime(invoice_date_str, "%d-%m-%Y")
+                        
+                        if date_from:
+                            from_date = datetime.strptime(date_from, "%Y-%m-%d")
+                            if invoice_date < from_date:
+                                return False
+                        
+                        if date_to:
+                            to_date = datetime.strptime(date_to, "%Y-%m-%d")
+                            if invoice_date > to_date:
+                                return False
+            except ValueError:
+                # If date parsing fails, skip date filtering for this record
+                pass
+    
+    return True
+
+
 def get_invoices(patient_id: Optional[str] = None, 
                 status: Optional[str] = None,
                 care_center: Optional[str] = None,
@@ -138,61 +224,9 @@ def get_invoices(patient_id: Optional[str] = None,
             for header, idx in header_map.items():
                 record[header] = row[idx] if idx < len(row) else ""
             
-            # Apply filters (AND logic)
-            # Patient ID filter
-            if patient_id:
-                record_patient_id = str(record.get("Patient ID", "")) or str(record.get("Member ID Key", ""))
-                if record_patient_id != patient_id:
-                    continue
-            
-            # Status filter
-            if status and status.lower() != 'all':
-                if str(record.get("Status", "")).lower() != status.lower():
-                    continue
-            
-            # Care Center filter
-            if care_center and care_center.lower() != 'all':
-                if str(record.get("Care Center", "")).lower() != care_center.lower():
-                    continue
-            
-            # Provider filter
-            if provider and provider.lower() not in ['all', 'all providers']:
-                if str(record.get("Provider", "")).lower() != provider.lower():
-                    continue
-            
-            # Invoice Ref filter (contains search)
-            if invoice_ref:
-                record_invoice_ref = str(record.get("Invoice Ref", "")).lower()
-                if invoice_ref.lower() not in record_invoice_ref:
-                    continue
-            
-            # Date range filtering
-            if date_from or date_to:
-                invoice_date_str = record.get("Invoice Date", "")
-                if invoice_date_str:
-                    try:
-                        # Try to parse the date (assuming format: DD-MM-YYYY or YYYY-MM-DD)
-                        if '-' in invoice_date_str:
-                            parts = invoice_date_str.split('-')
-                            if len(parts) == 3:
-                                # Check if it's DD-MM-YYYY or YYYY-MM-DD
-                                if len(parts[0]) == 4:  # YYYY-MM-DD
-                                    invoice_date = datetime.strptime(invoice_date_str, "%Y-%m-%d")
-                                else:  # DD-MM-YYYY
-                                    invoice_date = datetime.strptime(invoice_date_str, "%d-%m-%Y")
-                                
-                                if date_from:
-                                    from_date = datetime.strptime(date_from, "%Y-%m-%d")
-                                    if invoice_date < from_date:
-                                        continue
-                                
-                                if date_to:
-                                    to_date = datetime.strptime(date_to, "%Y-%m-%d")
-                                    if invoice_date > to_date:
-                                        continue
-                    except ValueError:
-                        # If date parsing fails, skip date filtering for this record
-                        pass
+            if not invoice_matches(record, patient_id, status, care_center, provider,
+                                   invoice_ref, date_from, date_to):
+                continue
             
             results.append({
                 "invoice_id": record.get("Invoice Ref", ""),
@@ -227,7 +261,7 @@ def generate_invoice_ref() -> str:
         
         # Get headers
         headers = all_values[0]
-        inv_ref_idx = next((i for i, h in enumerate(headers) if h == "Invoice Ref"), None)
+        inv_ref_idx = compile_headers(headers, "Accounts Receivable").by_exact.get("Invoice Ref")
         
         if inv_ref_idx is None:
             return "INV000001"
@@ -255,6 +289,15 @@ def generate_invoice_ref() -> str:
 
 
 
+def record_appended(worksheet: gspread.Worksheet, headers: List[str], row: List[Any], response: Any) -> None:
+    """Add an appended invoice line to the revenue view (or drop the view when the row is unknown)."""
+    row_number = analytics_views.appended_row_number(response)
+    if row_number:
+        analytics_views.record_row(worksheet.spreadsheet.id, worksheet.title, row_number, headers, row)
+    else:
+        analytics_views.invalidate(worksheet.spreadsheet.id, worksheet.title)
+
+
 def create_invoice(invoice_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Create new invoice in CRM_Admission → Invoice Table sheet
@@ -274,7 +317,7 @@ def create_invoice(invoice_data: Dict[str, Any]) -> Dict[str, Any]:
         
         try:
             lead_sheet = get_crm_lead_sheet()
-            all_patients = lead_sheet.get_all_records()
+            all_patients = read_records(lead_sheet)
             
             for patient in all_patients:
                 member_id = str(patient.get("Member ID Key", "") or patient.get("Member ID key", "")).strip()
@@ -351,7 +394,7 @@ def create_invoice(invoice_data: Dict[str, Any]) -> Dict[str, Any]:
         for header in headers:
             row_values.append(row_data.get(header, ""))
         
-        worksheet.append_row(row_values)
+        record_appended(worksheet, headers, row_values, worksheet.append_row(row_values))
         
         # If multiple services, append additional rows with same invoice_ref
         if len(services) > 1:
@@ -376,7 +419,12 @@ def create_invoice(invoice_data: Dict[str, Any]) -> Dict[str, Any]:
                 for header in headers:
                     service_row_values.append(service_row_data.get(header, ""))
                 
-                worksheet.append_row(service_row_values)
+                record_appended(worksheet, headers, service_row_values, worksheet.append_row(service_row_values))
+        
+        live_updates.publish("invoices", "invoice_posted", invoice_ref, {
+            "invoice_ref": invoice_ref, "invoice_date": invoice_date, "patient_name": invoice_data.get("patient_name", ""),
+            "amount": invoice_data.get("total_amount", 0), "source": "invoice",
+        })
         
         return {
             "invoice_id": invoice_ref,
@@ -396,7 +444,7 @@ def get_invoice_details(invoice_id: str) -> Dict[str, Any]:
     """
     try:
         worksheet = get_crm_admission_sheet()
-        all_records = worksheet.get_all_records()
+        all_records = read_records(worksheet)
         
         # Find invoice
         invoice_rows = []
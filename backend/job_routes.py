@@ -0,0 +1,59 @@
+"""
+Job Runner API Routes
+Status, run history and manual triggers for the scheduled jobs (billing, follow-up digest)
+"""
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+import job_runner
+
+router = APIRouter(tags=["jobs"])
+
+
+@router.get("/jobs")
+async def list_jobs():
+    """Current leader, this worker's role and the status of every scheduled job."""
+    try:
+        return await run_in_threadpool(job_runner.status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Schedule, next run, runs in progress and last run of one job."""
+    try:
+        status = await run_in_threadpool(job_runner.job_status, job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return status
+
+
+@router.get("/jobs/{job_id}/runs")
+async def get_job_runs(job_id: str, limit: int = Query(20, ge=1, le=500)):
+    """Run history of one job, newest first (trigger, status, duration, error, summary)."""
+    try:
+        runs = await run_in_threadpool(job_runner.run_history, job_id, limit)
+        return {"job_id": job_id, "count": len(runs), "runs": runs}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/jobs/{job_id}/run")
+async def run_job(job_id: str):
+    """
+    Start a job now in this worker. Returns 409 when the job is already running
+    at its concurrency limit (for billing: one run at a time across all workers).
+    """
+    try:
+        result = await run_in_threadpool(job_runner.run_now, job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' is not registered")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not result["started"]:
+        raise HTTPException(status_code=409, detail=result["message"])
+    return result
@@ -0,0 +1,510 @@
+"""
+Job Runner Module
+Single-leader daily job runner: one process per host (SQLite lease) runs scheduled jobs, with persisted run history, catch-up of missed runs and per-job concurrency limits
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+import instrumentation
+
+# Configuration
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "job_runner.db")
+JOB_RUNNER_ENABLED = os.getenv("JOB_RUNNER_ENABLED", "1").strip() == "1"  # Set to 0 on nodes that must never run jobs
+TICK_SECONDS = float(os.getenv("JOB_TICK_SECONDS", "15"))
+LEADER_LEASE_SECONDS = float(os.getenv("JOB_LEADER_LEASE_SECONDS", "60"))
+RUN_LEASE_SECONDS = float(os.getenv("JOB_RUN_LEASE_SECONDS", "120"))  # A run whose process died is abandoned after this
+CATCH_UP_HOURS = float(os.getenv("JOB_CATCH_UP_HOURS", "24"))
+HISTORY_DAYS = int(os.getenv("JOB_HISTORY_DAYS", "90"))
+ON_TIME_SECONDS = 5 * 60  # A slot picked up later than this is recorded as a catch-up run
+
+LEADER_LEASE = "scheduler"
+
+# Run states: running -> succeeded | failed | abandoned; missed slots are recorded as 'missed'
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    lease_until REAL NOT NULL,
+    acquired_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_state (
+    job_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    schedule TEXT NOT NULL,
+    registered_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    slot TEXT,
+    trigger TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    lease_until REAL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    error TEXT,
+    summary TEXT,
+    UNIQUE (job_id, slot)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_job ON runs (job_id, run_id);
+CREATE INDEX IF NOT EXISTS idx_runs_status ON runs (status, job_id);
+"""
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# job_id -> {"name", "time", "func", "args", "max_concurrency", "catch_up"}
+_jobs: Dict[str, Dict[str, Any]] = {}
+_own_runs: Dict[int, str] = {}  # run_id -> job_id for runs executing in this process
+_lock = threading.RLock()
+_executor: Optional[ThreadPoolExecutor] = None
+_initialized = False
+_is_leader = False
+
+# Global scheduler instance for the tick
+scheduler = None
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def init_db() -> None:
+    global _initialized
+    if _initialized:
+        return
+    with _lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _initialized = True
+
+
+def _parse_time(time_str: str):
+    hour, minute = time_str.split(":")
+    return int(hour), int(minute)
+
+
+def due_slot(time_str: str, now: Optional[datetime] = None) -> datetime:
+    """Most recent scheduled time at or before `now` for a daily HH:MM job."""
+    now = now or datetime.now()
+    hour, minute = _parse_time(time_str)
+    slot = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return slot if slot <= now else slot - timedelta(days=1)
+
+
+def next_run_time(time_str: str, now: Optional[datetime] = None) -> datetime:
+    return due_slot(time_str, now) + timedelta(days=1)
+
+
+def register_daily_job(job_id: str, name: str, time_str: str, func: Callable[..., Any], args: Optional[list] = None,
+                       max_concurrency: int = 1, catch_up: bool = True) -> None:
+    """
+    Register a daily job. Every process may register it; only the leader runs it.
+
+    Args:
+        job_id: Stable job identifier (used in run history and endpoints)
+        name: Display name
+        time_str: Daily run time, "HH:MM" local time
+        func: Job function; its return value (a dict) is stored as the run summary,
+              an exception marks the run failed
+        args: Positional arguments for func
+        max_concurrency: Runs of this job allowed at once across all processes
+        catch_up: Run a slot missed while no process was up (within JOB_CATCH_UP_HOURS)
+    """
+    _parse_time(time_str)  # Validate early
+    init_db()
+    with _lock:
+        _jobs[job_id] = {
+            "name": name,
+            "time": time_str,
+            "func": func,
+            "args": list(args or []),
+            "max_concurrency": max(1, max_concurrency),
+            "catch_up": catch_up,
+        }
+    conn = _connect()
+    try:
+        # registered_at is kept from the first registration: slots before it are never "missed"
+        conn.execute(
+            "INSERT INTO job_state (job_id, name, schedule, registered_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(job_id) DO UPDATE SET name = excluded.name, schedule = excluded.schedule",
+            (job_id, name, f"daily {time_str}", time.time()),
+        )
+    finally:
+        conn.close()
+
+
+def unregister_job(job_id: str) -> None:
+    with _lock:
+        _jobs.pop(job_id, None)
+        empty = not _jobs
+    if empty:
+        stop()
+
+
+def acquire_lease(name: str, seconds: float) -> bool:
+    """
+    Acquire or renew a named lease for this process (expired leases are taken over).
+    Also used by other single-process loops, e.g. the change feed poller.
+
+    Returns:
+        True when this process holds the lease
+    """
+    init_db()
+    now = time.time()
+    conn = _connect()
+    try:
+        cursor = conn.execute(
+            "INSERT INTO leases (name, owner, lease_until, acquired_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, lease_until = excluded.lease_until, "
+            "acquired_at = CASE WHEN leases.owner = excluded.owner THEN leases.acquired_at ELSE excluded.acquired_at END "
+            "WHERE leases.owner = excluded.owner OR leases.lease_until < ?",
+            (name, OWNER, now + seconds, now, now),
+        )
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def release_lease(name: str) -> None:
+    """Give up a lease held by this process so another one can take over at once."""
+    init_db()
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, OWNER))
+    finally:
+        conn.close()
+
+
+def _claim_run(conn: sqlite3.Connection, job_id: str, slot: Optional[str], trigger: str) -> Optional[int]:
+    """
+    Insert a running row if the job is under its concurrency limit and the slot is unclaimed.
+    Returns the run id, or None.
+    """
+    job = _jobs[job_id]
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        running = conn.execute(
+            "SELECT COUNT(*) FROM runs WHERE job_id = ? AND status = 'running' AND lease_until >= ?", (job_id, now)
+        ).fetchone()[0]
+        if running >= job["max_concurrency"]:
+            conn.execute("COMMIT")
+            return None
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO runs (job_id, slot, trigger, status, owner, lease_until, started_at) "
+            "VALUES (?, ?, ?, 'running', ?, ?, ?)",
+            (job_id, slot, trigger, OWNER, now + RUN_LEASE_SECONDS, now),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return cursor.lastrowid if cursor.rowcount == 1 else None
+
+
+def _summary(result: Any) -> Optional[str]:
+    """Scalar fields of a job's result dict (counts, timestamps) for the run history."""
+    if not isinstance(result, dict):
+        return None
+    compact = {k: v for k, v in result.items() if v is None or isinstance(v, (str, int, float, bool))}
+    return json.dumps(compact, default=str)
+
+
+def _execute(run_id: int, job_id: str) -> None:
+    job = _jobs.get(job_id)
+    status, error, summary = "succeeded", None, None
+    try:
+        if job is None:
+            raise RuntimeError(f"Job '{job_id}' is not registered in this process")
+        result = job["func"](*job["args"])
+        summary = _summary(result)
+        # Billing services report their own failures in the summary instead of raising
+        if isinstance(result, dict) and result.get("status") == "failed":
+            status, error = "failed", str(result.get("error") or "job reported failure")
+    except Exception as e:
+        status, error = "failed", str(e)
+        print(f"[Job Runner] {job_id} run {run_id} failed: {e}")
+    finally:
+        with _lock:
+            _own_runs.pop(run_id, None)
+        conn = _connect()
+        try:
+            conn.execute(
+                "UPDATE runs SET status = ?, finished_at = ?, error = ?, summary = ?, lease_until = NULL WHERE run_id = ?",
+                (status, time.time(), error, summary, run_id),
+            )
+        finally:
+            conn.close()
+
+
+def _start_run(run_id: int, job_id: str) -> None:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="job-runner")
+        _own_runs[run_id] = job_id
+    _executor.submit(_execute, run_id, job_id)
+
+
+def _schedule_due(conn: sqlite3.Connection, job_id: str, now: datetime) -> None:
+    job = _jobs[job_id]
+    slot = due_slot(job["time"], now)
+    state = conn.execute("SELECT registered_at FROM job_state WHERE job_id = ?", (job_id,)).fetchone()
+    if state is None or slot.timestamp() < state["registered_at"]:
+        return  # Slot predates the job
+    slot_key = slot.isoformat(timespec="minutes")
+    if conn.execute("SELECT 1 FROM runs WHERE job_id = ? AND slot = ?", (job_id, slot_key)).fetchone():
+        return
+
+    late_seconds = (now - slot).total_seconds()
+    if late_seconds > ON_TIME_SECONDS and (not job["catch_up"] or late_seconds > CATCH_UP_HOURS * 3600):
+        conn.execute(
+            "INSERT OR IGNORE INTO runs (job_id, slot, trigger, status, owner, started_at, finished_at) "
+            "VALUES (?, ?, 'schedule', 'missed', ?, ?, ?)",
+            (job_id, slot_key, OWNER, time.time(), time.time()),
+        )
+        print(f"[Job Runner] {job_id} slot {slot_key} missed (no process was running)")
+        return
+
+    trigger = "schedule" if late_seconds <= ON_TIME_SECONDS else "catch_up"
+    run_id = _claim_run(conn, job_id, slot_key, trigger)
+    if run_id is not None:
+        print(f"[Job Runner] {job_id} run {run_id} started ({trigger}, slot {slot_key})")
+        _start_run(run_id, job_id)
+
+
+def tick() -> None:
+    """
+    Renew leases of this process's running jobs; if this process holds (or wins) the
+    leader lease, start due jobs and expire runs whose process died.
+    """
+    global _is_leader
+    init_db()
+    now = time.time()
+    conn = _connect()
+    try:
+        with _lock:
+            own = list(_own_runs)
+        if own:
+            conn.execute(
+                f"UPDATE runs SET lease_until = ? WHERE run_id IN ({','.join('?' * len(own))})",
+                [now + RUN_LEASE_SECONDS, *own],
+            )
+
+        leader = acquire_lease(LEADER_LEASE, LEADER_LEASE_SECONDS)
+        if leader != _is_leader:
+            print(f"[Job Runner] {OWNER} {'is now' if leader else 'is no longer'} the leader")
+        _is_leader = leader
+        if not leader:
+            return
+
+        abandoned = conn.execute(
+            "UPDATE runs SET status = 'abandoned', finished_at = ?, error = 'process stopped while running' "
+            "WHERE status = 'running' AND lease_until < ?",
+            (now, now),
+        ).rowcount
+        if abandoned:
+            print(f"[Job Runner] Marked {abandoned} run(s) abandoned")
+        conn.execute("DELETE FROM runs WHERE started_at < ?", (now - HISTORY_DAYS * 86400,))
+
+        with _lock:
+            job_ids = list(_jobs)
+        current = datetime.now()
+        for job_id in job_ids:
+            try:
+                _schedule_due(conn, job_id, current)
+            except Exception as e:
+                print(f"[Job Runner] Could not schedule {job_id}: {e}")
+    finally:
+        conn.close()
+
+
+def run_now(job_id: str) -> Dict[str, Any]:
+    """
+    Start a manual run in this process, subject to the job's concurrency limit.
+
+    Returns:
+        {"started": bool, "run_id", "message"}
+    """
+    if job_id not in _jobs:
+        raise KeyError(job_id)
+    init_db()
+    conn = _connect()
+    try:
+        run_id = _claim_run(conn, job_id, None, "manual")
+    finally:
+        conn.close()
+    if run_id is None:
+        return {"started": False, "run_id": None, "message": "Job is already running at its concurrency limit"}
+    _start_run(run_id, job_id)
+    return {"started": True, "run_id": run_id, "message": "Run started"}
+
+
+def start() -> None:
+    """Start the tick in this process (first tick immediately, so missed runs catch up at boot)."""
+    global scheduler
+
+    if not JOB_RUNNER_ENABLED:
+        print("[Job Runner] Disabled via JOB_RUNNER_ENABLED; scheduled jobs run on another node")
+        return
+    if scheduler is not None:
+        return
+    try:
+        init_db()
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(
+            tick,
+            trigger=IntervalTrigger(seconds=TICK_SECONDS),
+            id='job_runner_tick',
+            name='Job Runner Tick',
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        scheduler.start()
+        print(f"[Job Runner] Started ({OWNER}, {JOB_DB_PATH}, tick {TICK_SECONDS:g}s)")
+    except Exception as e:
+        print(f"[Job Runner] Failed to start: {e}")
+        scheduler = None
+
+
+def stop() -> None:
+    """Stop ticking and hand the leader lease to another process."""
+    global scheduler, _is_leader
+
+    if scheduler is None:
+        return
+    try:
+        scheduler.shutdown(wait=True)
+    finally:
+        scheduler = None
+    release_lease(LEADER_LEASE)
+    _is_leader = False
+    print("[Job Runner] Stopped")
+
+
+def _run_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "run_id": row["run_id"],
+        "job_id": row["job_id"],
+        "slot": row["slot"],
+        "trigger": row["trigger"],
+        "status": row["status"],
+        "owner": row["owner"],
+        "started_at": datetime.fromtimestamp(row["started_at"]).isoformat(),
+        "finished_at": datetime.fromtimestamp(row["finished_at"]).isoformat() if row["finished_at"] else None,
+        "duration_seconds": round(row["finished_at"] - row["started_at"], 3) if row["finished_at"] else None,
+        "error": row["error"],
+        "summary": json.loads(row["summary"]) if row["summary"] else None,
+    }
+
+
+def run_history(job_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Most recent runs of a job, newest first."""
+    init_db()
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT * FROM runs WHERE job_id = ? ORDER BY run_id DESC LIMIT ?", (job_id, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_run_dict(r) for r in rows]
+
+
+def leader() -> Optional[Dict[str, Any]]:
+    init_db()
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM leases WHERE name = ?", (LEADER_LEASE,)).fetchone()
+    finally:
+        conn.close()
+    if row is None or row["lease_until"] < time.time():
+        return None
+    return {
+        "owner": row["owner"],
+        "since": datetime.fromtimestamp(row["acquired_at"]).isoformat(),
+        "lease_until": datetime.fromtimestamp(row["lease_until"]).isoformat(),
+    }
+
+
+def job_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """Schedule, next run, running count and last run of one job (None if unknown)."""
+    init_db()
+    conn = _connect()
+    try:
+        state = conn.execute("SELECT * FROM job_state WHERE job_id = ?", (job_id,)).fetchone()
+        if state is None:
+            return None
+        running = conn.execute(
+            "SELECT COUNT(*) FROM runs WHERE job_id = ? AND status = 'running' AND lease_until >= ?",
+            (job_id, time.time()),
+        ).fetchone()[0]
+        last = conn.execute(
+            "SELECT * FROM runs WHERE job_id = ? AND status != 'running' ORDER BY run_id DESC LIMIT 1", (job_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    job = _jobs.get(job_id)
+    scheduled = job is not None and scheduler is not None
+    return {
+        "job_id": job_id,
+        "name": state["name"],
+        "schedule": state["schedule"],
+        "registered": job is not None,
+        "scheduled": scheduled,
+        "max_concurrency": job["max_concurrency"] if job else None,
+        "catch_up": job["catch_up"] if job else None,
+        "next_run": str(next_run_time(job["time"])) if job else None,
+        "running": running,
+        "last_run": _run_dict(last) if last else None,
+    }
+
+
+def status() -> Dict[str, Any]:
+    """Leader, this process's role and every known job's status."""
+    init_db()
+    conn = _connect()
+    try:
+        job_ids = [r["job_id"] for r in conn.execute("SELECT job_id FROM job_state ORDER BY job_id")]
+    finally:
+        conn.close()
+    return {
+        "enabled": JOB_RUNNER_ENABLED,
+        "owner": OWNER,
+        "is_leader": _is_leader,
+        "leader": leader(),
+        "jobs": [job_status(job_id) for job_id in job_ids],
+    }
+
+
+def _prometheus_lines() -> List[str]:
+    return instrumentation.gauge_lines(
+        "crm_job_runner_leader", "1 when this process holds the scheduled-job leader lease", [({}, 1 if _is_leader else 0)]
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -0,0 +1,150 @@
+"""
+Leads Sheet Module
+Shared access to the CRM Leads spreadsheet for main.py and the feature routers
+"""
+
+import os
+from typing import Any, Dict, List, Tuple
+
+import gspread
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from google.oauth2.service_account import Credentials
+
+import delete_engine
+import sheets_scheduler
+
+# Load environment variables
+load_dotenv()
+
+CREDENTIALS_FILE = os.getenv("CREDENTIALS_FILE", "google_credentials.json")
+GOOGLE_SHEET_NAME = "Sheet1"  # Keep as default variable but irrelevant for data storage now
+# Columns /billing-summary/save adds to Sheet1 (the billing summary export reads them back)
+BILLING_COLUMNS = [
+    "TotalDaysStayed",
+    "RoomChargeTotal",
+    "BedChargeTotal",
+    "NursePaymentTotal",
+    "AdditionalNursePaymentTotal",
+    "OtherChargesTotal",
+    "HospitalPaymentTotal",
+    "DoctorFee",
+    "ServiceCharge",
+    "Discount",
+    "BillGrandTotal",
+    "BillGeneratedDate"
+]
+SCOPE = [
+    'https://spreadsheets.google.com/feeds',
+    'https://www.googleapis.com/auth/drive'
+]
+
+# Optional: lock to a specific Google Sheet (recommended)
+# - Set env var GOOGLE_SHEET_ID, or
+# - Put the Sheet ID in a local file named "google_sheet_id.txt" in backend/
+GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
+if not GOOGLE_SHEET_ID:
+    try:
+        with open("google_sheet_id.txt", "r", encoding="utf-8") as f:
+            GOOGLE_SHEET_ID = f.read().strip() or None
+    except FileNotFoundError:
+        GOOGLE_SHEET_ID = None
+
+
+def authorize(lane: str = None) -> gspread.Client:
+    """Scheduled gspread client for the service account in CREDENTIALS_FILE."""
+    creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=SCOPE)
+    return sheets_scheduler.authorize(creds, lane=lane)
+
+
+def ensure_google_sheet(client: gspread.Client) -> gspread.Spreadsheet:
+    if GOOGLE_SHEET_ID:
+        return client.open_by_key(GOOGLE_SHEET_ID)
+    try:
+        return client.open(GOOGLE_SHEET_NAME)
+    except gspread.SpreadsheetNotFound:
+        return client.create(GOOGLE_SHEET_NAME)
+
+
+def get_google_sheet_client() -> Tuple[gspread.Client, gspread.Spreadsheet]:
+    """Helper to get authenticated gspread client and spreadsheet."""
+    if not os.path.exists(CREDENTIALS_FILE):
+        raise HTTPException(status_code=404, detail="Google credentials file not found")
+
+    client = authorize()
+    spreadsheet = ensure_google_sheet(client)
+    return client, spreadsheet
+
+
+def get_primary_sheet() -> gspread.Worksheet:
+    """Helper to open the first worksheet of the CRM spreadsheet."""
+    if not os.path.exists(CREDENTIALS_FILE):
+        raise HTTPException(status_code=500, detail="Google credentials not found")
+
+    client = authorize()
+    spreadsheet = client.open_by_key(GOOGLE_SHEET_ID) if GOOGLE_SHEET_ID else client.open(GOOGLE_SHEET_NAME)
+    return spreadsheet.sheet1
+
+
+def get_sheet_data_as_df():
+    """Helper to fetch all data from Google Sheet into a Pandas DataFrame."""
+    import pandas as pd
+
+    sheet = get_primary_sheet()
+
+    data = sheet.get_all_values()
+    if not data:
+        return pd.DataFrame(), sheet
+
+    headers = data[0]
+    rows = data[1:]
+
+    # Handle duplicate headers if any
+    df = pd.DataFrame(rows, columns=delete_engine.unique_headers(headers))
+    return df, sheet
+
+
+def search_headers(raw_headers: List[Any]) -> List[str]:
+    """Unique Sheet1 headers as /search keys rows: repeats become "Pain Point_2", "Pain Point_3"."""
+    headers = []
+    counts = {}
+    for h in raw_headers:
+        h_str = str(h).strip()
+        if h_str in counts:
+            counts[h_str] += 1
+            headers.append(f"{h_str}_{counts[h_str]}")
+        else:
+            counts[h_str] = 1
+            headers.append(h_str)
+    return headers
+
+
+def _first_value(row: Dict[str, Any], *keys: str) -> Any:
+    for k in keys:
+        val = row.get(k)
+        if val is not None and str(val).strip():
+            return val
+    return ""
+
+
+def lead_matches(row: Dict[str, Any], date_filter: str = "", name_filter: str = "", member_filter: str = "") -> bool:
+    """
+    The /search filters over one Sheet1 row keyed by search_headers(): case-insensitive
+    "contains" on the date, the patient name and the member ID (empty filters match all).
+    Shared by /search and the lead exports (export_engine.py).
+    """
+    date_filter = (date_filter or "").strip().lower()
+    name_filter = (name_filter or "").strip().lower()
+    member_filter = (member_filter or "").strip().lower()
+
+    d = str(_first_value(row, "Date", "Date_2") or "").lower()
+    n = str(
+        _first_value(row, "Patient Name", "Name", "Full Name", "Patient Name_2", "Name_2", "Full Name_2")
+    ).lower()
+    mid = str(_first_value(row, "Member ID Key", "Member ID", "MemberID", "Member ID Key_2") or "").lower()
+
+    return (
+        (date_filter in d if date_filter else True)
+        and (name_filter in n if name_filter else True)
+        and (member_filter in mid if member_filter else True)
+    )
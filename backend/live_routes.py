@@ -0,0 +1,47 @@
+"""
+Live Updates API Routes
+Server-Sent Events stream of bed, enquiry, admission, invoice and home care changes, so screens update without polling
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+
+import live_updates
+from sse_stream import sse_response
+
+router = APIRouter(tags=["live"])
+
+
+@router.get("/api/live")
+async def live_stream(
+    request: Request,
+    topics: Optional[str] = Query(None, description="Comma-separated topics or groups, e.g. beds,dashboard (default: all)"),
+    since: Optional[int] = Query(None, ge=0, description="Resume token: id of the last frame received"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Stream "changes" frames for the requested topics.
+
+    Each frame carries {"events": [...]} with seq, topic, type, key and data per event;
+    its id is the resume token. Browsers send it back as Last-Event-ID when EventSource
+    reconnects; other clients pass ?since=. A "resync" event means the client missed
+    too much and should refetch that topic.
+    """
+    try:
+        wanted = live_updates.resolve_topics(topics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    return sse_response(request, live_updates.stream(wanted, since))
+
+
+@router.get("/api/live/status")
+async def live_status():
+    """Event log bounds, connected subscribers per topic and publish/delivery counters."""
+    try:
+        return await run_in_threadpool(live_updates.status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
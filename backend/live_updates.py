@@ -0,0 +1,496 @@
+"""
+Live Updates Module
+Topic event log shared by every worker (SQLite) that fans new events out to Server-Sent Events subscribers, with resume tokens and per-connection coalescing
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+import change_feed
+import instrumentation
+from sse_stream import format_sse, format_sse_comment
+
+# Configuration
+LIVE_DB_PATH = os.getenv("LIVE_DB_PATH", "live_updates.db")
+POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", "0.5"))  # How often a worker looks for events published by other workers
+COALESCE_SECONDS = float(os.getenv("LIVE_COALESCE_SECONDS", "1"))  # Events arriving within this window go out as one frame
+MAX_EVENTS_PER_TOPIC = int(os.getenv("LIVE_MAX_EVENTS_PER_TOPIC", "50"))  # Bigger bursts are sent as one "resync"
+RETENTION_SECONDS = int(os.getenv("LIVE_RETENTION_SECONDS", str(6 * 3600)))  # Resume tokens older than this get a "resync"
+KEEPALIVE_SECONDS = 15
+REPLAY_LIMIT = 1000
+
+TOPICS = ("beds", "enquiries", "admissions", "complaints", "homecare_clients", "patientadmission_clients", "invoices", "catalog")
+# Screens can subscribe to a group instead of listing every topic they depend on
+TOPIC_GROUPS = {"dashboard": ("enquiries", "admissions", "beds", "complaints")}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    type TEXT NOT NULL,
+    key TEXT,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_created ON events (created_at);
+CREATE INDEX IF NOT EXISTS idx_events_topic ON events (topic, seq);
+"""
+
+_write_lock = threading.Lock()
+_subscribers_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_hub: Optional[threading.Thread] = None
+_hub_seq = 0  # Highest seq this worker has fanned out
+_initialized = False
+_last_prune = 0.0
+
+# (spreadsheet_id, worksheet) -> topic for edits made directly in the sheet
+_sheet_topics: Dict[Tuple[str, str], str] = {}
+
+_stats: Dict[str, Any] = {
+    "published": 0,
+    "delivered": 0,
+    "frames": 0,
+    "coalesced": 0,
+    "resyncs": 0,
+    "errors": 0,
+}
+
+
+class _Subscriber:
+    """One SSE connection: the topics it wants and the event loop its queue lives on."""
+
+    def __init__(self, topics: Set[str], loop: asyncio.AbstractEventLoop):
+        self.topics = topics
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def offer(self, events: List[Dict[str, Any]]) -> None:
+        wanted = [e for e in events if e["topic"] in self.topics]
+        if wanted:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, wanted)
+
+
+_subscribers: List[_Subscriber] = []
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(LIVE_DB_PATH, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # A lost event only costs clients a refetch
+    return conn
+
+
+def init_db() -> None:
+    global _initialized
+    if _initialized:
+        return
+    with _write_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _initialized = True
+
+
+def resolve_topics(requested: Optional[str]) -> Set[str]:
+    """
+    Expand a comma-separated topic list (groups allowed) into topic names.
+
+    Args:
+        requested: e.g. "beds,dashboard"; empty means every topic
+
+    Returns:
+        Set of topic names
+
+    Raises:
+        ValueError: for an unknown topic or group
+    """
+    if not requested or not requested.strip():
+        return set(TOPICS)
+    topics: Set[str] = set()
+    for name in (part.strip() for part in requested.split(",")):
+        if not name:
+            continue
+        if name in TOPIC_GROUPS:
+            topics.update(TOPIC_GROUPS[name])
+        elif name in TOPICS:
+            topics.add(name)
+        else:
+            raise ValueError(f"Unknown topic '{name}'. Topics: {', '.join(TOPICS + tuple(TOPIC_GROUPS))}")
+    return topics
+
+
+def _row_to_event(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "seq": row["seq"],
+        "topic": row["topic"],
+        "type": row["type"],
+        "key": row["key"],
+        "data": json.loads(row["data"]),
+        "at": datetime.fromtimestamp(row["created_at"]).isoformat(),
+    }
+
+
+def _prune(conn: sqlite3.Connection) -> None:
+    global _last_prune
+    now = time.time()
+    if now - _last_prune < 60:
+        return
+    _last_prune = now
+    conn.execute("DELETE FROM events WHERE created_at < ?", (now - RETENTION_SECONDS,))
+
+
+def publish(topic: str, event_type: str, key: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """
+    Record a change for live subscribers in every worker.
+
+    Publishing never fails the caller: the write to Sheets already happened
+    and clients fall back to refetching on reconnect.
+
+    Args:
+        topic: One of TOPICS
+        event_type: What happened, e.g. "bed_allocated", "invoice_posted"
+        key: Entity the event is about (bed, member ID, invoice ref); later events
+             for the same key replace earlier ones inside a coalescing window
+        data: JSON-serializable details for clients that patch instead of refetching
+
+    Returns:
+        Sequence number of the event, or None if it could not be recorded
+    """
+    if topic not in TOPICS:
+        print(f"[Live Updates] Unknown topic '{topic}', event {event_type} dropped")
+        return None
+    try:
+        init_db()
+        payload = json.dumps(data or {}, ensure_ascii=False, default=str)
+        with _write_lock:
+            conn = _connect()
+            try:
+                seq = conn.execute(
+                    "INSERT INTO events (topic, type, key, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (topic, event_type, None if key is None else str(key), payload, time.time()),
+                ).lastrowid
+                _prune(conn)
+            finally:
+                conn.close()
+        _stats["published"] += 1
+        _wake.set()  # Subscribers on this worker get it without waiting for the next poll
+        return seq
+    except Exception as e:
+        _stats["errors"] += 1
+        print(f"[Live Updates] Could not publish {topic}/{event_type}: {e}")
+        return None
+
+
+def _bounds(conn: sqlite3.Connection) -> Tuple[int, int]:
+    row = conn.execute("SELECT COALESCE(MIN(seq), 0) AS low, COALESCE(MAX(seq), 0) AS high FROM events").fetchone()
+    # AUTOINCREMENT keeps counting after a prune; sqlite_sequence has the true high-water mark
+    seq_row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+    high = max(row["high"], seq_row["seq"] if seq_row else 0)
+    return row["low"], high
+
+
+def head_seq() -> int:
+    """Sequence number of the newest event (the resume token for "from now on")."""
+    init_db()
+    conn = _connect()
+    try:
+        return _bounds(conn)[1]
+    finally:
+        conn.close()
+
+
+def topic_seq(topic: str, below: Optional[int] = None) -> int:
+    """
+    Sequence number of the newest event on one topic (0 if none); a cheap dataset version.
+
+    Args:
+        topic: One of TOPICS
+        below: Only consider events older than this sequence number (to tell whether
+               anything else was published on the topic before one's own event)
+    """
+    init_db()
+    conn = _connect()
+    try:
+        if below is not None:
+            return conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM events WHERE topic = ? AND seq < ?", (topic, below)
+            ).fetchone()[0]
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events WHERE topic = ?", (topic,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def events_after(since: int, topics: Set[str], limit: int = REPLAY_LIMIT) -> Dict[str, Any]:
+    """
+    Events after resume token `since` for the given topics.
+
+    Returns:
+        {"events": [...], "last_seq": int, "resync": bool}; resync is True when
+        the token is older than the retained log (or from a reset log) and the
+        client must refetch instead of replaying
+    """
+    init_db()
+    conn = _connect()
+    try:
+        low, high = _bounds(conn)
+        if since > high or (low and since < low - 1) or (not low and since < high):
+            return {"events": [], "last_seq": high, "resync": True}
+        placeholders = ",".join("?" for _ in topics)
+        rows = conn.execute(
+            f"SELECT * FROM events WHERE seq > ? AND topic IN ({placeholders}) ORDER BY seq LIMIT ?",
+            (since, *sorted(topics), limit + 1),
+        ).fetchall()
+    finally:
+        conn.close()
+    if len(rows) > limit:
+        return {"events": [], "last_seq": high, "resync": True}
+    if rows:
+        high = max(high, rows[-1]["seq"])  # Published between the two queries
+    return {"events": [_row_to_event(r) for r in rows], "last_seq": high, "resync": False}
+
+
+def coalesce(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Collapse a burst of events into what a screen needs to render the latest state.
+
+    The last event per (topic, key) wins (per (topic, type) for events without a
+    key); a topic with more than MAX_EVENTS_PER_TOPIC survivors becomes a single
+    "resync" event telling the client to refetch that topic.
+    """
+    latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for event in events:
+        identity = event["key"] if event["key"] is not None else f"type:{event['type']}"
+        latest.pop((event["topic"], identity), None)  # Re-insert so order follows the newest seq
+        latest[(event["topic"], identity)] = event
+
+    per_topic: Dict[str, List[Dict[str, Any]]] = {}
+    for event in latest.values():
+        per_topic.setdefault(event["topic"], []).append(event)
+
+    result: List[Dict[str, Any]] = []
+    for topic, topic_events in per_topic.items():
+        if len(topic_events) > MAX_EVENTS_PER_TOPIC:
+            _stats["resyncs"] += 1
+            result.append(_resync_event(topic, topic_events[-1]["seq"]))
+        else:
+            result.extend(topic_events)
+    _stats["coalesced"] += len(events) - len(result)
+    return sorted(result, key=lambda e: e["seq"])
+
+
+def _resync_event(topic: str, seq: int) -> Dict[str, Any]:
+    return {"seq": seq, "topic": topic, "type": "resync", "key": None, "data": {}, "at": datetime.now().isoformat()}
+
+
+def _frame(events: List[Dict[str, Any]], last_seq: int) -> str:
+    _stats["frames"] += 1
+    _stats["delivered"] += len(events)
+    # One frame per batch with the batch's highest seq as id, so a reconnect never skips part of a batch
+    return format_sse("changes", {"events": events}, event_id=str(last_seq))
+
+
+def _fan_out() -> None:
+    global _hub_seq
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    if not subscribers:
+        return
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM events WHERE seq > ? ORDER BY seq LIMIT ?", (_hub_seq, REPLAY_LIMIT)).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return
+    events = [_row_to_event(r) for r in rows]
+    _hub_seq = events[-1]["seq"]
+    for subscriber in subscribers:
+        subscriber.offer(events)
+
+
+def _run_hub() -> None:
+    print(f"[Live Updates] Hub started (poll every {POLL_SECONDS}s)")
+    while not _stop.is_set():
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+        try:
+            _fan_out()
+        except Exception as e:
+            _stats["errors"] += 1
+            print(f"[Live Updates] Hub error: {e}")
+    print("[Live Updates] Hub stopped")
+
+
+def _register(subscriber: _Subscriber) -> None:
+    global _hub, _hub_seq
+    init_db()
+    with _subscribers_lock:
+        if not _subscribers:
+            # Start the cursor at the head of the log: earlier events come from replay, not the hub
+            conn = _connect()
+            try:
+                _hub_seq = max(_hub_seq, _bounds(conn)[1])
+            finally:
+                conn.close()
+        _subscribers.append(subscriber)
+        if _hub is None or not _hub.is_alive():
+            _stop.clear()
+            _hub = threading.Thread(target=_run_hub, name="live-updates-hub", daemon=True)
+            _hub.start()
+
+
+def _unregister(subscriber: _Subscriber) -> None:
+    with _subscribers_lock:
+        if subscriber in _subscribers:
+            _subscribers.remove(subscriber)
+
+
+async def stream(topics: Set[str], since: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    SSE frames for one connection.
+
+    Args:
+        topics: Topics to deliver (see resolve_topics)
+        since: Resume token (last frame id the client saw); None starts from now
+
+    Yields:
+        "changes" frames whose id is the resume token for the next connection,
+        plus keep-alive comments while idle
+    """
+    subscriber = _Subscriber(topics, asyncio.get_running_loop())
+    await run_in_threadpool(_register, subscriber)
+    try:
+        yield format_sse_comment("connected")
+
+        if since is None:
+            last_seq = await run_in_threadpool(head_seq)
+            yield format_sse("ready", {"last_seq": last_seq, "topics": sorted(topics)}, event_id=str(last_seq))
+        else:
+            replay = await run_in_threadpool(events_after, since, topics)
+            last_seq = replay["last_seq"]
+            if replay["resync"]:
+                _stats["resyncs"] += 1
+                yield _frame([_resync_event(topic, last_seq) for topic in sorted(topics)], last_seq)
+            elif replay["events"]:
+                yield _frame(coalesce(replay["events"]), last_seq)
+            else:
+                yield format_sse("ready", {"last_seq": last_seq, "topics": sorted(topics)}, event_id=str(last_seq))
+
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                batch = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield format_sse_comment("keep-alive")
+                continue
+            # Hold the first event briefly so a burst (e.g. daily billing) goes out as one frame
+            deadline = loop.time() + COALESCE_SECONDS
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.extend(await asyncio.wait_for(subscriber.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            fresh = [e for e in batch if e["seq"] > last_seq]  # Already sent by the replay
+            if not fresh:
+                continue
+            last_seq = fresh[-1]["seq"]
+            yield _frame(coalesce(fresh), last_seq)
+    finally:
+        _unregister(subscriber)
+
+
+def follow_worksheet(spreadsheet_id: Optional[str], worksheet: str, topic: str,
+                     namespaces: Optional[List[str]] = None) -> None:
+    """
+    Publish an event on `topic` when the change feed sees an edit made directly in the sheet.
+
+    Args:
+        spreadsheet_id: Spreadsheet key (ignored when not configured)
+        worksheet: Worksheet title
+        topic: One of TOPICS
+        namespaces: shared_cache namespaces to invalidate first, so clients refetch fresh data
+    """
+    if not spreadsheet_id:
+        return
+    change_feed.watch_worksheet(spreadsheet_id, worksheet, namespaces=namespaces)
+    _sheet_topics[(spreadsheet_id, worksheet)] = topic
+    change_feed.subscribe(_publish_sheet_change)
+
+
+def _publish_sheet_change(event: Dict[str, Any]) -> None:
+    # Runs only in the polling worker; the event log carries it to the others
+    topic = _sheet_topics.get((event["spreadsheet_id"], event["worksheet"]))
+    if topic is None:
+        return
+    data = {"worksheet": event["worksheet"], "row_count": event.get("row_count")}
+    if event["type"] == "appended":
+        data.update({"first_row": event["first_row"], "rows_added": len(event["rows"])})
+    publish(topic, f"sheet_{event['type']}", key=event["worksheet"], data=data)
+
+
+def stop() -> None:
+    global _hub
+    _stop.set()
+    _wake.set()
+    if _hub is not None:
+        _hub.join(timeout=5)
+    _hub = None
+
+
+def status() -> Dict[str, Any]:
+    """Log size and bounds, connected subscribers per topic and this worker's counters."""
+    init_db()
+    conn = _connect()
+    try:
+        low, high = _bounds(conn)
+        counts = {r["topic"]: r["n"] for r in conn.execute("SELECT topic, COUNT(*) AS n FROM events GROUP BY topic")}
+    finally:
+        conn.close()
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    return {
+        "path": LIVE_DB_PATH,
+        "pid": os.getpid(),
+        "first_seq": low,
+        "last_seq": high,
+        "events_by_topic": counts,
+        "subscribers": len(subscribers),
+        "subscribers_by_topic": {t: sum(1 for s in subscribers if t in s.topics) for t in TOPICS},
+        "hub_running": _hub is not None and _hub.is_alive(),
+        "hub_seq": _hub_seq,
+        "sheet_topics": {f"{sid}/{ws}": topic for (sid, ws), topic in _sheet_topics.items()},
+        "stats": dict(_stats),
+    }
+
+
+def _prometheus_lines() -> List[str]:
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    return (
+        instrumentation.gauge_lines(
+            "crm_live_subscribers", "Live update (SSE) connections on this worker by topic",
+            [({"topic": t}, sum(1 for s in subscribers if t in s.topics)) for t in TOPICS],
+        )
+        + instrumentation.gauge_lines("crm_live_events_published", "Live update events published by this worker", [({}, _stats["published"])])
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -1,32 +1,61 @@
-from fastapi import FastAPI, HTTPException, Body, BackgroundTasks, UploadFile, File, Query
-from fastapi.responses import StreamingResponse, FileResponse, Response
-from reportlab.platypus import SimpleDocTemplate, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
+from fastapi import FastAPI, HTTPException, Body, BackgroundTasks, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from fastapi.exception_handlers import http_exception_handler
+from starlette.exceptions import HTTPException as StarletteHTTPException
 import io
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
-import openpyxl
-from openpyxl.utils import range_boundaries
+from typing import List, Dict, Any, Optional, AsyncIterator, TYPE_CHECKING
 import gspread
 from google.oauth2.service_account import Credentials
 import os # Trigger Reload Fix
+import hashlib
 from datetime import datetime
 import re
+import threading
+import time
 import uuid
-import random
 import csv
 import json
 import smtplib
 from email.message import EmailMessage
 from dotenv import load_dotenv
-import requests
-import httpx
-from file_manager import save_upload, process_data_file
-import pandas as pd
+from sse_stream import format_sse, format_sse_comment, sse_response
+import change_feed
+import compact_table
+import followup_index
+import duplicate_index
+import analytics_views
+import http_cache
+import live_updates
+import member_ids as member_id_service  # Aliased: the chat helpers use `member_ids` for lists of IDs
+import process_pool
+import dropdown_engine
+import schema_registry
+import sheets_scheduler
+import shared_cache
+import template_cache
+import write_outbox
+import instrumentation
+from dashboard_cache import dashboard_cache
+from header_resolver import normalize_field_name, get_canonical_key, compile_headers
+from leads_sheet import (
+    BILLING_COLUMNS,
+    CREDENTIALS_FILE,
+    GOOGLE_SHEET_ID,
+    GOOGLE_SHEET_NAME,
+    ensure_google_sheet,
+    get_google_sheet_client,
+    get_sheet_data_as_df,
+    lead_matches,
+    search_headers
+)
+
+if TYPE_CHECKING:
+    import openpyxl
 from dropdown_helpers import (
-    get_dropdown_option_sheet,
-    initialize_dropdown_sheet,
+    field_options,
     get_all_dropdown_options,
     get_dropdown_options_for_field,
     add_dropdown_option,
@@ -99,6 +128,78 @@ except ImportError as e:
     print(f"Warning: Patient Admission scheduler not available: {e}")
     PATIENTADMISSION_SCHEDULER_AVAILABLE = False
 
+# Import follow-up digest scheduler
+try:
+    from followup_scheduler import start_followup_digest_scheduler, stop_followup_digest_scheduler, get_digest_status
+    FOLLOWUP_SCHEDULER_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Follow-up digest scheduler not available: {e}")
+    FOLLOWUP_SCHEDULER_AVAILABLE = False
+
+# Import delete routes
+try:
+    from delete_routes import router as delete_router
+    DELETE_MODULE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Delete module not available: {e}")
+    DELETE_MODULE_AVAILABLE = False
+
+# Import upload routes
+try:
+    from upload_routes import router as upload_router
+    UPLOAD_MODULE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Upload module not available: {e}")
+    UPLOAD_MODULE_AVAILABLE = False
+
+# Import discharge summary routes
+try:
+    from discharge_routes import router as discharge_router
+    DISCHARGE_MODULE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Discharge Summary module not available: {e}")
+    DISCHARGE_MODULE_AVAILABLE = False
+
+# Import chat query routes
+try:
+    from chat_routes import router as chat_router
+    CHAT_MODULE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Chat Query module not available: {e}")
+    CHAT_MODULE_AVAILABLE = False
+
+# Import job runner routes
+try:
+    from job_routes import router as job_router
+    JOB_MODULE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Job Runner module not available: {e}")
+    JOB_MODULE_AVAILABLE = False
+
+# Import live update (SSE) routes
+try:
+    from live_routes import router as live_router
+    LIVE_MODULE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Live Updates module not available: {e}")
+    LIVE_MODULE_AVAILABLE = False
+
+# Import export routes
+try:
+    from export_routes import router as export_router
+    EXPORT_MODULE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Export module not available: {e}")
+    EXPORT_MODULE_AVAILABLE = False
+
+# Import analytics (materialized view) routes
+try:
+    from analytics_routes import router as analytics_router
+    ANALYTICS_MODULE_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: Analytics module not available: {e}")
+    ANALYTICS_MODULE_AVAILABLE = False
+
 
 # Load environment variables from .env file
 # Trigger reload for schema update
@@ -148,6 +249,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for complete responses over HTTP_COMPRESS_MIN_BYTES; streams (SSE, downloads) pass through
+app.add_middleware(http_cache.CompressionMiddleware)
+
+# Per-route latency histograms and sampled request traces (outermost, so CORS is included)
+app.add_middleware(instrumentation.MetricsMiddleware)
+
+
+def sheets_quota_response(error: BaseException) -> JSONResponse:
+    retry_after = getattr(error, "retry_after", None) or sheets_scheduler.BACKOFF_MAX_SECONDS
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Google Sheets is rate limiting requests, please retry shortly"},
+        headers={"Retry-After": str(int(max(retry_after, 1)))},
+    )
+
+
+@app.exception_handler(StarletteHTTPException)
+async def sheets_quota_http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """Endpoints wrap errors as HTTPException(500, str(e)); report Sheets quota errors as 503 + Retry-After instead."""
+    if exc.status_code == 500 and sheets_scheduler.is_quota_error(exc.__context__):
+        return sheets_quota_response(exc.__context__)
+    return await http_exception_handler(request, exc)
+
+
+@app.exception_handler(sheets_scheduler.SheetsQuotaExceeded)
+async def sheets_quota_exceeded_handler(request: Request, exc: sheets_scheduler.SheetsQuotaExceeded):
+    return sheets_quota_response(exc)
+
+
+@app.exception_handler(gspread.exceptions.APIError)
+async def sheets_api_error_handler(request: Request, exc: gspread.exceptions.APIError):
+    if sheets_scheduler.is_quota_error(exc):
+        return sheets_quota_response(exc)
+    return JSONResponse(status_code=500, content={"detail": str(exc)})
+
 # Include invoice router
 if INVOICE_MODULE_AVAILABLE:
     app.include_router(invoice_router, prefix="/api", tags=["invoices"])
@@ -190,6 +326,61 @@ if PATIENTADMISSION_MODULE_AVAILABLE:
 else:
     print("[Patient Admission Module] Not loaded - module unavailable")
 
+# Include delete router
+if DELETE_MODULE_AVAILABLE:
+    app.include_router(delete_router)
+    print("[Delete Module] Loaded successfully")
+else:
+    print("[Delete Module] Not loaded - module unavailable")
+
+# Include upload router
+if UPLOAD_MODULE_AVAILABLE:
+    app.include_router(upload_router)
+    print("[Upload Module] Loaded successfully")
+else:
+    print("[Upload Module] Not loaded - module unavailable")
+
+# Include discharge summary router
+if DISCHARGE_MODULE_AVAILABLE:
+    app.include_router(discharge_router)
+    print("[Discharge Summary Module] Loaded successfully")
+else:
+    print("[Discharge Summary Module] Not loaded - module unavailable")
+
+# Include chat query router
+if CHAT_MODULE_AVAILABLE:
+    app.include_router(chat_router)
+    print("[Chat Query Module] Loaded successfully")
+else:
+    print("[Chat Query Module] Not loaded - module unavailable")
+
+# Include job runner router
+if JOB_MODULE_AVAILABLE:
+    app.include_router(job_router)
+    print("[Job Runner Module] Loaded successfully")
+else:
+    print("[Job Runner Module] Not loaded - module unavailable")
+
+if LIVE_MODULE_AVAILABLE:
+    app.include_router(live_router)
+    print("[Live Updates Module] Loaded successfully")
+else:
+    print("[Live Updates Module] Not loaded - module unavailable")
+
+# Include export router
+if EXPORT_MODULE_AVAILABLE:
+    app.include_router(export_router)
+    print("[Export Module] Loaded successfully")
+else:
+    print("[Export Module] Not loaded - module unavailable")
+
+# Include analytics router
+if ANALYTICS_MODULE_AVAILABLE:
+    app.include_router(analytics_router)
+    print("[Analytics Module] Loaded successfully")
+else:
+    print("[Analytics Module] Not loaded - module unavailable")
+
 
 # Configuration  
 EXCEL_FILE_PATH = os.getenv("EXCEL_FILE_PATH", "Lead CRM ApplicationData.xlsx")
@@ -199,10 +390,13 @@ ADMISSION_SHEET_NAME = "Patient Admission"
 CHARGE_SHEET_NAME = "Charge Summary"
 COMPLAINT_SHEET_NAME = "Complaints"
 FEEDBACK_SHEET_NAME = "Feedback"
+# Complaint and feedback rows carry the request id they were logged under (column G), so an
+# outbox replay after a crash can tell that its append already landed
+REQUEST_ID_HEADER = "Request ID"
+REQUEST_ID_COLUMN = 7
+_request_id_header_checked: set = set()
 LIST_BOX_SHEET = "List box"  # Sheet containing dropdown options (legacy)
 DROPDOWN_OPTION_SHEET = "DropdownOption"  # New centralized dropdown management sheet
-GOOGLE_SHEET_NAME = "Sheet1"  # Keep as default variable but irrelevant for data storage now
-CREDENTIALS_FILE = os.getenv("CREDENTIALS_FILE", "google_credentials.json")
 CSV_FILE_PATH = "CRM Leads - Sheet1.csv"
 FIELD_SCHEMA_FILE = "field_schema.json"
 ADMISSION_SCHEMA_FILE = "admission_schema.json"
@@ -243,26 +437,23 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 EMAIL_SUBJECT = os.getenv("EMAIL_SUBJECT", "New CRM Lead Submission")
 EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", "smtp").strip().lower()
 
-USE_GMAIL_API = False
-if EMAIL_TRANSPORT == "gmail_api":
-    try:
-        from gmail_api_sender import send_email_via_gmail_api  # type: ignore
-        USE_GMAIL_API = True
-        print("[Email CONFIG] Gmail API transport enabled")
-    except Exception as gmail_import_exc:  # pragma: no cover - import guard only
-        print(f"[Email CONFIG] Gmail API not available ({gmail_import_exc}); falling back to SMTP")
-        USE_GMAIL_API = False
-
-# Optional: lock to a specific Google Sheet (recommended)
-# - Set env var GOOGLE_SHEET_ID, or
-# - Put the Sheet ID in a local file named "google_sheet_id.txt" in backend/
-GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
-if not GOOGLE_SHEET_ID:
-    try:
-        with open("google_sheet_id.txt", "r", encoding="utf-8") as f:
-            GOOGLE_SHEET_ID = f.read().strip() or None
-    except FileNotFoundError:
-        GOOGLE_SHEET_ID = None
+# gmail_api_sender pulls in googleapiclient, so it is imported on first send (see resolve_email_transport)
+USE_GMAIL_API = EMAIL_TRANSPORT == "gmail_api"
+send_email_via_gmail_api = None
+if USE_GMAIL_API:
+    print("[Email CONFIG] Gmail API transport enabled")
+
+
+def resolve_email_transport() -> bool:
+    """Import the Gmail API sender on first use; falls back to SMTP when it is unavailable."""
+    global USE_GMAIL_API, send_email_via_gmail_api
+    if USE_GMAIL_API and send_email_via_gmail_api is None:
+        try:
+            from gmail_api_sender import send_email_via_gmail_api  # type: ignore
+        except Exception as gmail_import_exc:  # pragma: no cover - import guard only
+            print(f"[Email CONFIG] Gmail API not available ({gmail_import_exc}); falling back to SMTP")
+            USE_GMAIL_API = False
+    return USE_GMAIL_API
 
 ENQUIRIES_SHEET_NAME = "Enquiries"
 PATIENT_ADMISSION_SHEET_NAME = "patient admission"
@@ -281,19 +472,6 @@ if not PATIENT_ADMISSION_SHEET_ID:
 # -----------------------------------------------------
 
 
-def normalize_field_name(name: str) -> str:
-    """
-    Normalize field name: lowercase, remove spaces, hyphens, underscores.
-    Example: "First Name" -> "firstname"
-    """
-    if not name:
-        return ""
-    # Remove strict alphanumeric characters except common safe ones if needed, 
-    # but requirement says: lowercase, remove spaces, hyphens, underscores.
-    return str(name).strip().lower().replace(" ", "").replace("_", "").replace("-", "")
-
-
-
 # Fields to exclude from the dynamic form (case-insensitive)
 EXCLUDED_FIELD_NAMES = {
     "reason for rejection",
@@ -398,22 +576,6 @@ class LoginRequest(BaseModel):
     Password: str
 
 
-class FilterCriteria(BaseModel):
-    year: Optional[str] = None
-    month: Optional[str] = None
-    specificDate: Optional[str] = None
-    startDate: Optional[str] = None
-    endDate: Optional[str] = None
-
-class DeletePreviewPayload(BaseModel):
-    filters: FilterCriteria
-    date_column: str
-    preview_columns: Optional[List[str]] = None
-
-class DeleteConfirmPayload(BaseModel):
-    filters: FilterCriteria
-    date_column: str
-
 
 
 def ensure_notification_defaults() -> Dict[str, Any]:
@@ -498,6 +660,7 @@ def send_notification_email(recipient: str, payload: Dict[str, Any], subject_ove
     settings = ensure_notification_defaults()
     sender = settings.get("sender_email", DEFAULT_SENDER_EMAIL)
     cc_list: List[str] = settings.get("cc_emails", [])
+    resolve_email_transport()
     print(f"[Email DEBUG] Sender={sender}, CC={cc_list}, transport={'GMAIL_API' if USE_GMAIL_API else 'SMTP'}")
 
     if not USE_GMAIL_API and (not SMTP_USERNAME or not SMTP_PASSWORD):
@@ -789,6 +952,8 @@ def read_excel_headers() -> List[str]:
         print(f"[read_excel_headers] Excel file not found: {EXCEL_FILE_PATH} - returning empty list")
         return []
     try:
+        import openpyxl
+
         workbook = openpyxl.load_workbook(EXCEL_FILE_PATH, keep_vba=True)
         sheet = workbook[EXCEL_SHEET_NAME] if EXCEL_SHEET_NAME else workbook.active
         headers: List[str] = []
@@ -820,46 +985,14 @@ def read_csv_headers(csv_path: str) -> List[str]:
     return []
 
 
-def read_excel_dropdown_options(workbook: openpyxl.Workbook) -> Dict[str, List[str]]:
+def read_excel_dropdown_options(workbook: "openpyxl.Workbook") -> Dict[str, List[str]]:
     """Read dropdown options from the List box sheet"""
-    dropdowns: Dict[str, List[str]] = {}
-    
     try:
-        if LIST_BOX_SHEET not in workbook.sheetnames:
-            return dropdowns
-        
-        listbox_ws = workbook[LIST_BOX_SHEET]
-        
-        # Get headers from List box sheet (first row)
-        headers = []
-        for cell in listbox_ws[1]:
-            if cell.value:
-                headers.append(str(cell.value).strip())
-            else:
-                headers.append(None)
-        
-        # Read values for each column (exclude Date column as it's not a dropdown)
-        for col_idx, header in enumerate(headers, start=1):
-            if not header or header.lower() == 'date':
-                continue
-            
-            values = set()
-            # Read up to 1000 rows to get all unique values
-            for row_idx in range(2, min(listbox_ws.max_row + 1, 1000)):
-                val = listbox_ws.cell(row=row_idx, column=col_idx).value
-                if val is not None and str(val).strip():
-                    clean_val = str(val).strip()
-                    # Skip datetime objects from Date column
-                    if 'datetime' not in str(type(val)):
-                        values.add(clean_val)
-            
-            if values:
-                dropdowns[header] = sorted(list(values))
-    
+        # One pass over the rows (exclude Date column as it's not a dropdown)
+        return dropdown_engine.options_from_workbook(workbook, LIST_BOX_SHEET)
     except Exception as e:
         print(f"Warning: Could not read List box sheet: {e}")
-    
-    return dropdowns
+        return {}
 
 
 def infer_field_type(field_name: str) -> str:
@@ -931,36 +1064,75 @@ def save_field_schema_to_disk(schema: List[Dict[str, Any]], schema_type: str = "
 
 
 def load_schema(schema_type: str = "enquiry") -> List[Dict[str, Any]]:
-    """Load schema: local JSON -> CSV -> Excel."""
+    """
+    Load schema from the schema registry.
+    An empty registry is seeded once from local JSON -> CSV; the Excel
+    template is only parsed in a background thread, never on the request path.
+    """
     global fields_cache
     
-    # 1. Try Disk
+    # 1. Registry (versioned, already in memory after the first read)
+    schema = schema_registry.get_fields(schema_type)
+    if schema is not None:
+        fields_cache[schema_type] = schema
+        return schema
+    
+    # 2. Seed from Disk
     disk_schema = load_field_schema_from_disk(schema_type)
     if disk_schema:
+        schema_registry.publish(schema_type, disk_schema, "disk")
         fields_cache[schema_type] = disk_schema
         return disk_schema
         
-    # 2. Derive from Files (Only for Enquiry currently)
+    # 3. Derive from Files (Only for Enquiry currently)
     if schema_type == "enquiry":
         if os.path.exists(CSV_FILE_PATH):
             headers = read_csv_headers(CSV_FILE_PATH)
             schema = canonicalize_schema(headers)
+            schema_registry.publish("enquiry", schema, "csv")
             fields_cache["enquiry"] = schema
             return schema
-        headers = read_excel_headers()
-        schema = canonicalize_schema(headers)
-        fields_cache["enquiry"] = schema
-        return schema
+        schema_registry.build_in_background("enquiry", lambda: canonicalize_schema(read_excel_headers()), "excel")
         
     return []
 
 
+def on_schema_event(event: Dict[str, Any]) -> None:
+    """Hot-reload caches and indexes when the schema registry publishes a change."""
+    form_type = event.get("form_type")
+    if event["type"] == "schema_published":
+        schema = schema_registry.get_fields(form_type) or []
+        fields_cache[form_type] = schema
+        if event.get("source") != "disk":
+            save_field_schema_to_disk(schema, form_type)
+    elif event["type"] == "headers_changed":
+        followup_index.invalidate(event.get("sheet"))
+        duplicate_index.invalidate(event.get("sheet"))
+        analytics_views.invalidate(worksheet=event.get("sheet"))
+        dashboard_cache.clear()
+        shared_cache.invalidate(PATIENT_SEARCH_CACHE)
+
+
+schema_registry.subscribe(on_schema_event)
+
+
+# (mtime, size) of the Excel template -> schema built from it
+_excel_schema_memo: Dict[str, Any] = {"stamp": None, "schema": []}
+
+
 def build_schema_from_excel() -> List[Dict[str, Any]]:
-    """Build schema from Excel file. Returns empty list if file not found."""
+    """Build schema from Excel file. Returns empty list if file not found.
+    The parsed result is reused until the file's mtime/size change."""
     if not os.path.exists(EXCEL_FILE_PATH):
         print(f"[build_schema_from_excel] Excel file not found: {EXCEL_FILE_PATH} - returning empty schema")
         return []
+    stat = os.stat(EXCEL_FILE_PATH)
+    stamp = (stat.st_mtime, stat.st_size)
+    if _excel_schema_memo["stamp"] == stamp:
+        return [dict(f) for f in _excel_schema_memo["schema"]]
     try:
+        import openpyxl
+
         wb = openpyxl.load_workbook(EXCEL_FILE_PATH, keep_vba=True, data_only=True)
         ws = wb[EXCEL_SHEET_NAME] if EXCEL_SHEET_NAME else wb.active
         headers: List[str] = []
@@ -982,7 +1154,9 @@ def build_schema_from_excel() -> List[Dict[str, Any]]:
                 "options": dropdown_map_ci.get(h_lower, [])
             })
         wb.close()
-        return schema
+        _excel_schema_memo["stamp"] = stamp
+        _excel_schema_memo["schema"] = schema
+        return [dict(f) for f in schema]
     except Exception as e:
         print(f"[build_schema_from_excel] Error reading Excel: {e}")
         return []
@@ -1005,7 +1179,7 @@ def upsert_to_sheet(sheet_name: str, data: Dict[str, Any], schema_type: str = "e
 
     scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
     creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
 
     # Open Sheet
     spreadsheet = None
@@ -1030,8 +1204,19 @@ def upsert_to_sheet(sheet_name: str, data: Dict[str, Any], schema_type: str = "e
         if not sheet:
             sheet = spreadsheet.add_worksheet(title=sheet_name, rows=1000, cols=20)
 
+    # Find Member ID Value in Data
+    member_id_val = None
+    for k, v in data.items():
+        if get_canonical_key(k) == "memberidkey":
+            member_id_val = v
+    if member_id_val:
+        member_id_val = str(member_id_val).strip()
+
+    # A freshly issued Member ID is in no row yet: read just the header row and append
+    fresh_member_id = bool(member_id_val) and member_id_service.claim_append(sheet.title, member_id_val)
+
     # Get All Data
-    all_values = sheet.get_all_values()
+    all_values = [sheet.row_values(1)] if fresh_member_id else sheet.get_all_values()
     
     if not all_values:
         headers = []
@@ -1041,47 +1226,16 @@ def upsert_to_sheet(sheet_name: str, data: Dict[str, Any], schema_type: str = "e
         rows = all_values[1:]
 
     # --- PREPARE CANONICAL DATA LOOKUP ---
-    # Map get_canonical_key(k) -> v
+    # Header -> canonical key / column maps are compiled once per header row;
+    # payload keys are resolved to column indexes in one pass.
     # This ensures "Member ID", "memberid", "member_id" in payload all map to "memberidkey" bucket
-    canonical_data_map = {}
-    for k, v in data.items():
-        c_k = get_canonical_key(k)
-        if c_k:
-            canonical_data_map[c_k] = v
-
-    # Also keep original normalized map for fallback
-    data_norm_simple = {normalize_field_name(k): v for k, v in data.items()}
-
-    # Helper to find data value for a Sheet Header
-    def get_data_value(header):
-        # 1. Canonical Match (Robust)
-        c_h = get_canonical_key(header)
-        if c_h in canonical_data_map:
-             return canonical_data_map[c_h]
-        
-        # 2. Exact/Simple Normalized Match (Fallback)
-        if header in data:
-            return data[header]
-        h_norm_simple = normalize_field_name(header)
-        if h_norm_simple in data_norm_simple:
-            return data_norm_simple[h_norm_simple]
-            
-        return None
+    hmap = compile_headers(headers, sheet.title)
+    column_values = hmap.payload_columns(data)
 
     # Find Member ID Column Index in Sheet
     # matches canonical keys for Member ID
-    member_id_col_idx = -1
     canonical_member_id_key = "memberidkey" 
-
-    for idx, h in enumerate(headers):
-        if get_canonical_key(h) == canonical_member_id_key:
-            member_id_col_idx = idx
-            break
-            
-    # Find Member ID Value in Data
-    member_id_val = canonical_data_map.get(canonical_member_id_key)
-    if member_id_val:
-        member_id_val = str(member_id_val).strip()
+    member_id_col_idx = hmap.by_canonical.get(canonical_member_id_key, -1)
             
     # Find Existing Row
     row_index_to_update = -1
@@ -1104,8 +1258,7 @@ def upsert_to_sheet(sheet_name: str, data: Dict[str, Any], schema_type: str = "e
     if row_index_to_update != -1:
         # --- UPDATE MODE ---
         final_row = list(existing_row_data)
-        for idx, h in enumerate(headers):
-            new_val = get_data_value(h)
+        for idx, new_val in column_values.items():
             if new_val is not None:
                 final_row[idx] = str(new_val)
                 
@@ -1113,6 +1266,9 @@ def upsert_to_sheet(sheet_name: str, data: Dict[str, Any], schema_type: str = "e
         range_to_write = f'A{row_index_to_update}'
         val_opt = 'RAW' if strict_mode else 'USER_ENTERED'
         sheet.update(range_name=range_to_write, values=[final_row], value_input_option=val_opt)
+        followup_index.record_row(sheet.title, row_index_to_update, headers, final_row)
+        duplicate_index.record_row(sheet.title, row_index_to_update, headers, final_row)
+        analytics_views.record_row(spreadsheet.id, sheet.title, row_index_to_update, headers, final_row)
         
     else:
         # --- APPEND MODE ---
@@ -1121,20 +1277,33 @@ def upsert_to_sheet(sheet_name: str, data: Dict[str, Any], schema_type: str = "e
              # Initialize headers from keys
              headers = [k for k in data.keys()]
              sheet.update(range_name='1:1', values=[headers])
+             hmap = compile_headers(headers, sheet.title)
+             column_values = hmap.payload_columns(data)
 
         final_row = [""] * len(headers)
-        for idx, h in enumerate(headers):
-             h_canon = get_canonical_key(h)
+        for idx, h_canon in enumerate(hmap.canonical):
              if h_canon == 'timestamp':
                  final_row[idx] = current_time
              else:
-                 val = get_data_value(h)
+                 val = column_values.get(idx)
                  if val is not None:
                      final_row[idx] = str(val)
                      
         action = "appended"
         val_opt = 'RAW' if strict_mode else 'USER_ENTERED'
-        sheet.append_row(final_row, value_input_option=val_opt)
+        response = sheet.append_row(final_row, value_input_option=val_opt)
+        if fresh_member_id:
+            appended_row = analytics_views.appended_row_number(response)
+        else:
+            appended_row = max(len(all_values), 1) + 1
+        if appended_row:
+            followup_index.record_row(sheet.title, appended_row, headers, final_row)
+            duplicate_index.record_row(sheet.title, appended_row, headers, final_row)
+            analytics_views.record_row(spreadsheet.id, sheet.title, appended_row, headers, final_row)
+        else:
+            followup_index.invalidate(sheet.title)
+            duplicate_index.invalidate(sheet.title)
+            analytics_views.invalidate(spreadsheet.id, sheet.title)
 
     return {
         "status": "success",
@@ -1165,7 +1334,7 @@ def get_patient_admission_sheet_client():
     
     scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
     creds = Credentials.from_service_account_file(credentials_file, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
     
     # Determine which sheet to open
     spreadsheet = None
@@ -1191,51 +1360,6 @@ def get_patient_admission_sheet_client():
             
     return client, spreadsheet
 
-# --- CANONICAL MAPPING FOR ADMISSION SHEET ---
-ADMISSION_CANONICAL_MAP = {
-    # Member ID variations
-    "memberid": "memberidkey",
-    "memberidkey": "memberidkey", 
-    "memberkey": "memberidkey",
-    "id": "memberidkey",
-    "memberidkry": "memberidkey", # User specified
-    "memberit": "memberidkey",   # User specified "MEMBER IT"
-    "memberitkey": "memberidkey",
-    "member_id": "memberidkey",
-    "member_key": "memberidkey",
-    "mid": "memberidkey",
-
-    # Names
-    "attendername": "attendername",
-    "attender_name": "attendername",
-    "patientname": "patientname",
-    "patient_name": "patientname",
-    "name": "patientname",
-    "fullname": "patientname",
-
-    # Contact
-    "mobile": "mobilenumber",
-    "phone": "mobilenumber",
-    "phonenumber": "mobilenumber",
-    "mobilenumber": "mobilenumber",
-    "relationalmobile": "relationalmobile",
-    "relational_mobile": "relationalmobile",
-
-    # Location
-    "hospital_location": "hospitallocation",
-    "hospitallocation": "hospitallocation",
-    "location": "hospitallocation",
-    
-    # Care Center
-    "care_center": "carecenter",
-    "carecenter": "carecenter",
-    "center": "carecenter",
-    
-    # Dates
-    "date": "date",
-    "admissiondate": "date",
-}
-
 # Display names for Google Sheets columns (canonical_key -> Display Name)
 ADMISSION_DISPLAY_NAMES = {
     "carecenter": "Care Center",
@@ -1248,21 +1372,6 @@ ADMISSION_DISPLAY_NAMES = {
 }
 
 
-def get_canonical_key(key: str) -> str:
-    """
-    Normalize key to a canonical representation.
-    1. Lowercase, strip, remove special chars ( - _).
-    2. Check ADMISSION_CANONICAL_MAP.
-    3. Return canonical or normalized string.
-    """
-    if not key:
-        return ""
-    # Normalize: lowercase, remove spaces, hyphens, underscores
-    norm = str(key).strip().lower().replace(" ", "").replace("-", "").replace("_", "")
-    
-    # Check map
-    return ADMISSION_CANONICAL_MAP.get(norm, norm)
-
 def save_patient_admission_to_sheet(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Save mapped data to the Patient Admission sheet/worksheet.
@@ -1320,9 +1429,7 @@ def save_patient_admission_to_sheet(data: Dict[str, Any]) -> Dict[str, Any]:
     # --- DYNAMIC HEADER SYNC START ---
     # Check if we have data for a canonical key that has NO column in the sheet.
     # We need to map existing headers to canonical keys to see what's covered.
-    covered_canonical_keys = set()
-    for h in headers:
-        covered_canonical_keys.add(get_canonical_key(h))
+    covered_canonical_keys = set(compile_headers(headers, sheet.title).canonical)
     
     new_headers = []
     # Find data keys not covered
@@ -1366,8 +1473,7 @@ def save_patient_admission_to_sheet(data: Dict[str, Any]) -> Dict[str, Any]:
     row = []
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    for h in headers:
-        c_key = get_canonical_key(h)
+    for c_key in compile_headers(headers, sheet.title).canonical:
         val = ""
         
         # Auto-fill Timestamp
@@ -1379,7 +1485,12 @@ def save_patient_admission_to_sheet(data: Dict[str, Any]) -> Dict[str, Any]:
         row.append(str(val) if val is not None else "")
 
     # 4. Append
-    sheet.append_row(row, value_input_option="RAW")
+    response = sheet.append_row(row, value_input_option="RAW")
+    appended_row = analytics_views.appended_row_number(response)
+    if appended_row:
+        analytics_views.record_row(spreadsheet.id, sheet.title, appended_row, headers, row)
+    else:
+        analytics_views.invalidate(spreadsheet.id, sheet.title)
     
     return {
         "status": "success",
@@ -1403,7 +1514,7 @@ async def init_headers():
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
 
     # Ensure fields loaded
     if not fields_cache:
@@ -1426,263 +1537,15 @@ async def init_headers():
     }
 
 
-def get_sheet_data_as_df():
-    """Helper to fetch all data from Google Sheet into a Pandas DataFrame."""
-    if not os.path.exists(CREDENTIALS_FILE):
-        raise HTTPException(status_code=500, detail="Google credentials not found")
-    
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
-    
-    spreadsheet = client.open_by_key(GOOGLE_SHEET_ID) if GOOGLE_SHEET_ID else client.open(GOOGLE_SHEET_NAME)
-    sheet = spreadsheet.sheet1
-    
-    data = sheet.get_all_values()
-    if not data:
-        return pd.DataFrame(), sheet
-        
-    headers = data[0]
-    rows = data[1:]
-    
-    # Handle duplicate headers if any
-    unique_headers = []
-    seen = set()
-    for h in headers:
-        c = h
-        i = 1
-        while c in seen:
-            c = f"{h}_{i}"
-            i += 1
-        seen.add(c)
-        unique_headers.append(c)
-            
-    df = pd.DataFrame(rows, columns=unique_headers)
-    
-    # Store sheet object for deletion reference? No, stateless.
-    return df, sheet
-
-
-def apply_delete_filters(df: pd.DataFrame, filters: FilterCriteria, date_col: str):
-    """
-    Returns a boolean mask where True means 'to be deleted'.
-    """
-    if date_col not in df.columns:
-        raise HTTPException(status_code=400, detail=f"Column '{date_col}' not found in sheet")
-
-    # Convert date column to datetime
-    # Robust parsing:
-    # 1. Clean whitespace
-    # 2. Try dayfirst=False (ISO/US)
-    # 3. If mostly NaT, try dayfirst=True (EU/India)
-    try:
-        clean_col = df[date_col].astype(str).str.strip()
-        
-        # Try 1: Standard/ISO
-        temp_dates = pd.to_datetime(clean_col, errors='coerce', dayfirst=False)
-        
-        # Check success rate
-        valid_count = temp_dates.notna().sum()
-        total_count = len(df)
-        
-        # If very few valid dates found (less than 20%), try dayfirst=True
-        if total_count > 0 and (valid_count / total_count) < 0.2:
-             # Try 2: DayFirst
-             print(f"Initial date parsing yield low success ({valid_count}/{total_count}). Retrying with dayfirst=True")
-             temp_dates_alt = pd.to_datetime(clean_col, errors='coerce', dayfirst=True)
-             if temp_dates_alt.notna().sum() > valid_count:
-                 temp_dates = temp_dates_alt
-                 
-    except Exception as e:
-        print(f"Date parsing critical error: {e}")
-        raise HTTPException(status_code=400, detail=f"Date parsing failed: {str(e)}")
-
-    # Create mask (initially all False)
-    mask = pd.Series([False] * len(df), index=df.index)
-    
-    # Priority 1: Date Range (Start/End)
-    if filters.startDate or filters.endDate:
-        print(f"[DEBUG] Using date range filter: startDate={filters.startDate}, endDate={filters.endDate}")
-        range_mask = pd.Series([True] * len(df), index=df.index)
-        
-        if filters.startDate:
-            try:
-                start = pd.to_datetime(filters.startDate)
-                range_mask = range_mask & (temp_dates >= start)
-                print(f"[DEBUG] After start date filter: {range_mask.sum()} matches")
-            except Exception as e:
-                print(f"[ERROR] Failed to parse startDate: {e}")
-        
-        if filters.endDate:
-            try:
-                end = pd.to_datetime(filters.endDate)
-                # Include the entire end date (up to 23:59:59)
-                end_inclusive = end + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-                range_mask = range_mask & (temp_dates <= end_inclusive)
-                print(f"[DEBUG] After end date filter: {range_mask.sum()} matches")
-            except Exception as e:
-                print(f"[ERROR] Failed to parse endDate: {e}")
-        
-        mask = range_mask
-    
-    # Priority 2: Specific Date
-    elif filters.specificDate:
-        print(f"[DEBUG] Using specific date filter: {filters.specificDate}")
-        try:
-            target_date = pd.to_datetime(filters.specificDate)
-            mask = (temp_dates.dt.normalize() == target_date.normalize())
-            print(f"[DEBUG] Specific date matches: {mask.sum()}")
-        except Exception as e:
-            print(f"[ERROR] Failed to parse specificDate: {e}")
-    
-    # Priority 3: Year/Month Logic
-    elif filters.year or filters.month:
-        print(f"[DEBUG] Using year/month filter: year={filters.year}, month={filters.month}")
-        year_mask = pd.Series([True] * len(df), index=df.index)
-        month_mask = pd.Series([True] * len(df), index=df.index)
-        
-        if filters.year:
-            try:
-                y = int(filters.year)
-                year_mask = (temp_dates.dt.year == y)
-                print(f"[DEBUG] Year {y} matches: {year_mask.sum()}")
-            except Exception as e:
-                print(f"[ERROR] Failed to parse year: {e}")
-        
-        if filters.month:
-            try:
-                m = int(filters.month)
-                month_mask = (temp_dates.dt.month == m)
-                print(f"[DEBUG] Month {m} matches: {month_mask.sum()}")
-            except Exception as e:
-                print(f"[ERROR] Failed to parse month: {e}")
-
-        mask = year_mask & month_mask
-        print(f"[DEBUG] Combined year/month matches: {mask.sum()}")
-    else:
-        # No filters provided -> delete nothing
-        print(f"[DEBUG] No filters provided, returning empty mask")
-        return pd.Series([False] * len(df), index=df.index), temp_dates
-        
-    # Remove NaT from mask (don't delete rows with invalid dates even if they match 'None' logic?)
-    mask = mask & temp_dates.notna()
-    
-    return mask, temp_dates
-
-
-@app.post("/delete/preview")
-async def preview_delete(payload: DeletePreviewPayload):
-    try:
-        print(f"\n[DELETE PREVIEW] Starting preview with filters: {payload.filters}")
-        print(f"[DELETE PREVIEW] Date column: {payload.date_column}")
-        
-        df, _ = get_sheet_data_as_df()
-        print(f"[DELETE PREVIEW] Loaded {len(df)} rows from sheet")
-        
-        if df.empty:
-            print(f"[DELETE PREVIEW] Sheet is empty")
-            return {"count": 0, "rows": [], "earliest": None, "latest": None, "headers": []}
-            
-        mask, date_series = apply_delete_filters(df, payload.filters, payload.date_column)
-        
-        print(f"[DELETE PREVIEW] Filter mask created, {mask.sum()} rows match filters")
-        print(f"[DELETE PREVIEW] Sample parsed dates (first 5): {date_series.head().tolist()}")
-        print(f"[DELETE PREVIEW] Date column raw values (first 5): {df[payload.date_column].head().tolist()}")
-        
-        # Filter the DF
-        matches = df[mask]
-        count = len(matches)
-        
-        print(f"[DELETE PREVIEW] Final match count: {count}")
-        
-        if count == 0:
-            return {"count": 0, "rows": [], "earliest": None, "latest": None}
-            
-        # Get Earliest/Latest from the matched dates
-        matched_dates = date_series[mask]
-        earliest = matched_dates.min().strftime('%Y-%m-%d') if not matched_dates.empty else None
-        latest = matched_dates.max().strftime('%Y-%m-%d') if not matched_dates.empty else None
-        
-        # Prepare Preview Rows
-        # Limit to 50
-        preview_page = matches.head(50)
-        
-        # Select columns if requested
-        if payload.preview_columns:
-            # Only keep columns that exist
-            valid_cols = [c for c in payload.preview_columns if c in preview_page.columns]
-            if not valid_cols:
-                # Fallback to all if none match (shouldn't happen with correct inputs)
-                valid_cols = preview_page.columns.tolist()
-            preview_page = preview_page[valid_cols]
-            
-        return {
-            "count": count,
-            "headers": preview_page.columns.tolist(),
-            "rows": preview_page.to_dict(orient='records'),
-            "earliest": earliest,
-            "latest": latest
-        }
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.post("/delete/confirm")
-async def confirm_delete(payload: DeleteConfirmPayload):
-    try:
-        df, sheet = get_sheet_data_as_df()
-        if df.empty:
-            return {"status": "error", "message": "Sheet is empty"}
-            
-        mask, _ = apply_delete_filters(df, payload.filters, payload.date_column)
-        matches_count = mask.sum()
-        
-        if matches_count == 0:
-             return {"status": "success", "message": "No rows matched the criteria (0 deleted)."}
-             
-        # Invert mask to get rows to KEEP
-        # We need to preserve the dataframe structure perfectly
-        df_keep = df[~mask]
-        
-        # Rewrite Sheet
-        # 1. Clear
-        sheet.clear()
-        
-        # 2. Write Headers
-        headers = df_keep.columns.tolist()
-        
-        # 3. Write Rows
-        # Gspread append_rows or update. allow massive update.
-        # convert df_keep to list of lists
-        # Handle NaN/None -> empty string for sheets
-        df_keep = df_keep.fillna("")
-        values = [headers] + df_keep.values.tolist()
-        
-        sheet.update(range_name='A1', values=values)
-        
-        return {
-            "status": "success", 
-            "message": f"Successfully deleted {matches_count} rows.",
-            "remaining_count": len(df_keep)
-        }
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-
 @app.on_event("startup")
 async def startup_event():
     """Load schema on startup"""
     try:
+        started = time.time()
         load_schema("enquiry")
         load_schema("admission")
-        print(f"Loaded schema. Enquiry fields: {len(fields_cache['enquiry'])}, Admission fields: {len(fields_cache['admission'])}")
+        print(f"Loaded schema in {time.time() - started:.3f}s. Enquiry fields: {len(fields_cache['enquiry'])} (v{schema_registry.get_version('enquiry')}), Admission fields: {len(fields_cache['admission'])} (v{schema_registry.get_version('admission')})")
+        schema_registry.start_header_watch(scheduled_schema_header_check)
         ensure_notification_defaults()
         # Debug: Check SMTP configuration
         smtp_user_set = "YES" if SMTP_USERNAME else "NO"
@@ -1705,18 +1568,101 @@ async def startup_event():
             except Exception as e:
                 print(f"[Patient Admission Scheduler] Failed to start: {e}")
         
+        # Member ID sequence (reports a malformed MEMBER_ID_NODE here rather than on the first submit);
+        # forget old append claims
+        try:
+            member_id_service.init_db()
+            member_id_service.prune_claims()
+        except Exception as e:
+            print(f"[Member IDs] Startup failed: {e}")
+
+        # Spawn the pandas/PDF worker processes before the first upload or download
+        try:
+            process_pool.start()
+        except Exception as e:
+            print(f"[Process Pool] Failed to start: {e}")
+
+        # Replay journaled form writes to Sheets
+        write_outbox.start_outbox_worker()
+        
+        # Poll watched worksheets for direct edits
+        change_feed.start()
+        
+        # Have the upload templates ready before the first download
+        contact_template.build_in_background()
+        
+        # Nightly duplicate-lead cluster report
+        try:
+            duplicate_index.start_clusters_job(load_crm_duplicate_index)
+        except Exception as e:
+            print(f"[Duplicate Index] Failed to start cluster job: {e}")
+        
+        # Start daily follow-up digest
+        if FOLLOWUP_SCHEDULER_AVAILABLE:
+            try:
+                start_followup_digest_scheduler(run_followup_digest)
+            except Exception as e:
+                print(f"[Follow-up Digest] Failed to start: {e}")
+        
     except Exception as e:
         print(f"Warning: Could not load fields on startup: {str(e)}")
         print("Ensure CSV or Excel file is present in backend directory")
 
 
+def check_schema_headers() -> Dict[str, bool]:
+    """
+    Ranged read of the header row (1:1) of each sheet backing a form.
+    The registry compares header hashes and fires hot-reload events on change.
+    """
+    changed: Dict[str, bool] = {}
+    try:
+        _, spreadsheet = get_google_sheet_client()
+        sheet = spreadsheet.sheet1
+        headers = (sheet.get("1:1") or [[]])[0]
+        changed[f"enquiry:{sheet.title}"] = schema_registry.check_sheet_headers("enquiry", sheet.title, headers)
+    except Exception as e:
+        print(f"[Schema Registry] Enquiry header check failed: {e}")
+    try:
+        _, admission_spreadsheet = get_patient_admission_sheet_client()
+        sheet_name = "Sheet1" if PATIENT_ADMISSION_SHEET_ID else "Patient Admission"
+        sheet = admission_spreadsheet.worksheet(sheet_name)
+        headers = (sheet.get("1:1") or [[]])[0]
+        changed[f"admission:{sheet_name}"] = schema_registry.check_sheet_headers("admission", sheet_name, headers)
+    except Exception as e:
+        print(f"[Schema Registry] Admission header check failed: {e}")
+    return changed
+
+
+@instrumentation.timed_job("schema_header_watch")
+def scheduled_schema_header_check() -> Dict[str, bool]:
+    """Header watch job; runs in the batch Sheets lane."""
+    with sheets_scheduler.lane("batch"):
+        return check_schema_headers()
+
+
+@app.get("/schema/registry")
+async def get_schema_registry():
+    """Schema versions, sources and watched sheet header hashes per form type."""
+    return schema_registry.status()
+
+
+@app.post("/schema/check")
+async def trigger_schema_check():
+    """Check the backing sheets' header rows now instead of waiting for the watch interval."""
+    try:
+        changed = await run_in_threadpool(check_schema_headers)
+        return {"changed": changed, "registry": schema_registry.status()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/")
 async def root():
     return {"message": "CRM Lead Form API", "status": "running"}
 
 
 @app.get("/get_fields")
-async def get_fields(type: str = "enquiry"):
+async def get_fields(request: Request, type: str = "enquiry"):
     """Return the current field schema. type = 'enquiry' | 'admission'"""
     if type not in ["enquiry", "admission"]:
         type = "enquiry"
@@ -1728,7 +1674,9 @@ async def get_fields(type: str = "enquiry"):
             current = fields_cache.get(type)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
-    return {"fields": current or []}
+    # The registry version moves with every published schema; 0 means unversioned, so hash the body
+    version = schema_registry.get_version(type)
+    return http_cache.json_response(request, {"fields": current or []}, f"schema:{type}:{version}" if version else None)
 
 
 @app.get("/test_email")
@@ -1792,264 +1740,16 @@ async def update_notification_settings(payload: NotificationSettings):
     return {"status": "success", "sender_email": sender, "cc_emails": cc_emails}
 
 
-@app.post("/upload_file")
-async def upload_file(file: UploadFile = File(...)):
+@app.get("/get_sheet_headers")
+async def get_sheet_headers():
     """
-    Handle file uploads.
-    - Stores non-data files safely.
-    - Processes data files (Excel/CSV) for schema changes.
+    Fetch headers directly from the CRM Sheet (Sheet1) to populate column options for File Manager.
     """
     try:
-        # 1. Save the file
-        file_path = save_upload(file, file.filename)
-        
-        # 2. Determine if it's a data file
-        filename = file.filename.lower()
-        is_data_file = filename.endswith(('.csv', '.xlsx', '.xls', '.xlsm'))
-        
-        if is_data_file:
-            # Load current schema to compare (Enquiry default)
-            existing_schema = fields_cache.get("enquiry")
-            if not existing_schema:
-                try:
-                    load_schema("enquiry")
-                    existing_schema = fields_cache.get("enquiry")
-                except:
-                    existing_schema = []
-            
-            result = process_data_file(file_path, existing_schema)
-            # Add file path to result
-            result['file_path'] = file_path
-            return result
-        else:
-            # Non-data file
-            return {
-                "status": "success",
-                "message": f"File '{file.filename}' stored successfully.",
-                "file_path": file_path,
-                "type": "non-data"
-            }
-            
-    except Exception as e:
-        print(f"Upload failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-class ConfirmUploadRequest(BaseModel):
-    file_path: str
-
-
-@app.post("/confirm_upload")
-async def confirm_upload(payload: ConfirmUploadRequest):
-    """
-    Reads the previously uploaded file and APPENDS data to 'Sheet1' in Google Sheets.
-    It maps columns by name to match the existing sheet headers.
-    """
-    file_path = payload.file_path
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-
-    if not os.path.exists(CREDENTIALS_FILE):
-        raise HTTPException(status_code=404, detail="Google credentials not found")
-
-    try:
-        # 1. Read Data
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext == '.csv':
-            df = pd.read_csv(file_path)
-        elif ext in ['.xlsx', '.xls', '.xlsm']:
-            df = pd.read_excel(file_path)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file format")
-
-        df = df.fillna("")
-
-        # 2. Connect to Sheets
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
-        
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID) if GOOGLE_SHEET_ID else client.open(GOOGLE_SHEET_NAME)
-        try:
-            sheet = spreadsheet.worksheet("Sheet1")
-        except gspread.WorksheetNotFound:
-            sheet = spreadsheet.sheet1
-
-        # 3. Get Existing Headers
-        existing_values = sheet.get_all_values()
-        if not existing_values:
-            # Sheet is empty, write headers from file
-            sheet_headers = df.columns.tolist() + ['Timestamp']
-            sheet.append_row(sheet_headers, value_input_option='USER_ENTERED')
-        else:
-            sheet_headers = existing_values[0]
-
-        # 3b. Detect and Add New Columns
-        # Compare df columns to sheet_headers (case-insensitive check)
-        sheet_headers_lower = {h.strip().lower() for h in sheet_headers}
-        new_columns = []
-        for col in df.columns:
-            if col.strip().lower() not in sheet_headers_lower:
-                new_columns.append(col)
-        
-        if new_columns:
-            # Append new columns to header row in Sheet
-            # We need to find the next available column index
-            # But gspread's append_row doesn't work for partial row updates easily on existing rows
-            # simplest way: update the first row with the extended list
-            sheet_headers.extend(new_columns)
-            sheet.update(range_name='1:1', values=[sheet_headers], value_input_option='USER_ENTERED')
-
-        # 4. Map Data to Headers (now including new ones)
-        # Create a map for case-insensitive matching of file columns
-        file_cols_map = {c.strip().lower(): c for c in df.columns}
-        
-        data_to_append = []
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        for _, row in df.iterrows():
-            ordered_row = []
-            for h in sheet_headers:
-                h_lower = h.strip().lower()
-                
-                # Special handling for Timestamp
-                if h_lower == 'timestamp':
-                    ordered_row.append(current_time)
-                    continue
-
-                # Find matching column in file
-                if h_lower in file_cols_map:
-                    original_col_name = file_cols_map[h_lower]
-                    # Handle NaN values to ensure empty string
-                    val = row[original_col_name]
-                    ordered_row.append(val if pd.notna(val) else "")
-                else:
-                    # Column exists in Sheet but not in File -> Empty
-                    ordered_row.append("")
-            
-            data_to_append.append(ordered_row)
-
-        if data_to_append:
-            sheet.append_rows(data_to_append, value_input_option='USER_ENTERED')
-            
-        message = f"Successfully appended {len(data_to_append)} rows."
-        if new_columns:
-            message += f" Added {len(new_columns)} new columns: {', '.join(new_columns)}."
-
-        return {
-            "status": "success",
-            "message": message,
-            "sheet_url": spreadsheet.url
-        }
-
-    except Exception as e:
-        print(f"Bulk update failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-class ConfirmUploadRequest(BaseModel):
-    file_path: str
-
-
-@app.post("/confirm_upload")
-async def confirm_upload(payload: ConfirmUploadRequest):
-    """
-    Reads the previously uploaded file and APPENDS data to 'Sheet1' in Google Sheets.
-    It maps columns by name to match the existing sheet headers.
-    """
-    file_path = payload.file_path
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-
-    if not os.path.exists(CREDENTIALS_FILE):
-        raise HTTPException(status_code=404, detail="Google credentials not found")
-
-    try:
-        # 1. Read Data
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext == '.csv':
-            df = pd.read_csv(file_path)
-        elif ext in ['.xlsx', '.xls', '.xlsm']:
-            df = pd.read_excel(file_path)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file format")
-
-        df = df.fillna("")
-
-        # 2. Connect to Sheets
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
-        
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID) if GOOGLE_SHEET_ID else client.open(GOOGLE_SHEET_NAME)
-        try:
-            sheet = spreadsheet.worksheet("Sheet1")
-        except gspread.WorksheetNotFound:
-            # Create if not exists? Or append to first sheet?
-            sheet = spreadsheet.get_worksheet(0)
-            
-        # 3. Append to Sheet
-        # Get existing headers
-        existing_data = sheet.get_all_values()
-        if not existing_data:
-            # Sheet is empty, write fresh with headers
-            sheet.update([df.columns.values.tolist()] + df.values.tolist())
-        else:
-            existing_headers = existing_data[0]
-            
-            # Helper for normalization
-            def normalize_header(h):
-                return str(h).lower().replace(" ", "").replace("_", "").strip()
-
-            # Map normalized -> actual column name in DF
-            df_norm_map = {normalize_header(c): c for c in df.columns}
-            
-            # Align new DF to existing headers
-            # Add missing columns to DF using Fuzzy Match
-            for h in existing_headers:
-                h_norm = normalize_header(h)
-                if h not in df.columns:
-                    # Check fuzzy match
-                    if h_norm in df_norm_map:
-                        actual_col = df_norm_map[h_norm]
-                        # Rename column to match existing header
-                        df.rename(columns={actual_col: h}, inplace=True)
-                        # Update map to reflect rename? No need, we found it.
-                    else:
-                        df[h] = ""
-            
-            # Reorder DF to match existing headers (discard extra new columns to follow strict schema if desired, 
-            # OR logic to append new columns? For now, stick to existing schema as primary)
-            df_to_append = df[existing_headers]
-            
-            sheet.append_rows(df_to_append.values.tolist())
-
-        return {
-            "status": "success",
-            "message": f"Successfully appended {len(df)} rows to Google Sheet."
-        }
-
-    except Exception as e:
-        print(f"Confirm update failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.get("/get_sheet_headers")
-async def get_sheet_headers():
-    """
-    Fetch headers directly from the CRM Sheet (Sheet1) to populate column options for File Manager.
-    """
-    try:
-        # Connect to Google Sheets
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
+        # Connect to Google Sheets
+        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
+        client = sheets_scheduler.authorize(creds)
         
         spreadsheet = client.open_by_key(GOOGLE_SHEET_ID) if GOOGLE_SHEET_ID else client.open(GOOGLE_SHEET_NAME)
         try:
@@ -2070,41 +1770,35 @@ async def get_sheet_headers():
         return {"fields": []}
 
 
+# Built once per header row + dropdown version, shared with other workers via TEMPLATE_CACHE_DIR
+contact_template = template_cache.register(
+    "contact_template",
+    lambda: OFFICIAL_COLUMNS,
+    lambda: (field_options.version(), get_all_dropdown_options()),
+)
+# Schema pushes (dropdown syncs, uploads) rebuild the artifacts before the next download asks
+schema_registry.subscribe(lambda event: contact_template.build_in_background())
+
+
 @app.get("/download_template")
-async def download_template(format: str = "xlsx"):
+async def download_template(request: Request, format: str = "xlsx"):
     """
-    Generate a dynamic template (CSV or Excel) based on the OFFICIAL_COLUMNS constant.
+    Download the upload template (CSV or Excel) based on the OFFICIAL_COLUMNS constant.
     This ensures exact format matching regardless of current sheet state.
+    The Excel template carries dropdown lists from the DropdownOption sheet.
     """
     try:
-        # Use Fixed Schema
-        headers = OFFICIAL_COLUMNS
-        
-        if format.lower() == 'csv':
-            # Create CSV
-            output = io.StringIO()
-            writer = csv.writer(output)
-            writer.writerow(headers)
-            output.seek(0)
-            
-            response = StreamingResponse(iter([output.getvalue()]), media_type="text/csv")
-            response.headers["Content-Disposition"] = "attachment; filename=contact_template.csv"
-            return response
-            
-        else:
-            # Create Excel
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Template"
-            ws.append(headers)
-            
-            output = io.BytesIO()
-            wb.save(output)
-            output.seek(0)
-            
-            response = StreamingResponse(output, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-            response.headers["Content-Disposition"] = "attachment; filename=contact_template.xlsx"
-            return response
+        fmt = "csv" if format.lower() == "csv" else "xlsx"
+        body, key = await run_in_threadpool(contact_template.get, fmt)
+        
+        cached = http_cache.not_modified(request, key)
+        if cached is not None:
+            return cached
+        return Response(content=body, media_type=template_cache.MEDIA_TYPES[fmt], headers={
+            "Content-Disposition": f"attachment; filename=contact_template.{fmt}",
+            "ETag": http_cache.etag_for(request, key),
+            "Cache-Control": "no-cache",
+        })
 
     except Exception as e:
             print(f"Download template failed: {e}")
@@ -2112,39 +1806,44 @@ async def download_template(format: str = "xlsx"):
             return Response(content=f"Error generating template: {str(e)}", status_code=500)
 
 
-# Patient search cache to prevent API rate limits
-from datetime import datetime, timedelta
-patient_search_cache = {
-    "data": None,
-    "timestamp": None,
-    "ttl_minutes": 5  # Cache for 5 minutes
-}
+# Patient search cache to prevent API rate limits (shared by all workers)
+PATIENT_SEARCH_CACHE = "patient_search"
+PATIENT_SEARCH_KEY = "sheet1_table"  # A CompactTable; entries under the old "sheet1" key were lists of dicts
+PATIENT_SEARCH_TTL_MINUTES = 5  # Cache for 5 minutes (longer while the change feed is healthy)
 
 def get_cached_patients():
     """Get patients from cache if available and not expired"""
-    global patient_search_cache
-    
-    if patient_search_cache["data"] is None:
-        return None
-    
-    if patient_search_cache["timestamp"] is None:
-        return None
-    
-    # Check if cache is expired
-    cache_age = datetime.now() - patient_search_cache["timestamp"]
-    if cache_age > timedelta(minutes=patient_search_cache["ttl_minutes"]):
-        print("[Patient Search] Cache expired, will refresh")
-        return None
-    
-    print(f"[Patient Search] Using cached data (age: {cache_age.seconds}s)")
-    return patient_search_cache["data"]
+    data = shared_cache.get(PATIENT_SEARCH_CACHE, PATIENT_SEARCH_KEY)
+    instrumentation.record_cache(PATIENT_SEARCH_CACHE, data is not None)
+    return data
 
-def update_patient_cache(data):
-    """Update the patient search cache"""
-    global patient_search_cache
-    patient_search_cache["data"] = data
-    patient_search_cache["timestamp"] = datetime.now()
-    print(f"[Patient Search] Cache updated with {len(data)} records")
+
+def load_patient_records() -> compact_table.CompactTable:
+    """
+    All Sheet1 records for patient search (get_all_records() values, stored column-wise);
+    one worker fetches, the others wait for its result.
+    """
+    def fetch():
+        print("[Patient Search] Cache miss, fetching from Google Sheets")
+        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
+        client = sheets_scheduler.authorize(creds)
+        
+        if not GOOGLE_SHEET_ID:
+            raise HTTPException(status_code=500, detail="Google Sheet ID not configured")
+        
+        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
+        sheet = spreadsheet.worksheet("Sheet1")
+        records = compact_table.CompactTable.from_values(sheet.get_all_values(), numericise=True)
+        print(f"[Patient Search] Cache updated with {len(records)} records")
+        return records
+
+    all_records = get_cached_patients()
+    if all_records is None:
+        all_records = shared_cache.get_or_load(
+            PATIENT_SEARCH_CACHE, PATIENT_SEARCH_KEY, fetch, change_feed.cache_ttl(PATIENT_SEARCH_TTL_MINUTES * 60)
+        )
+    return all_records
 
 
 @app.get("/api/patients/search")
@@ -2156,60 +1855,33 @@ async def search_patients(q: str = ""):
     """
     try:
         # Force reload - Updated to return all patients when query is empty
-        # Try to get from cache first
-        all_records = get_cached_patients()
-        
-        # If cache miss, fetch from Google Sheets
-        if all_records is None:
-            print("[Patient Search] Cache miss, fetching from Google Sheets")
-            # Connect to Google Sheets
-            scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-            creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-            client = gspread.authorize(creds)
-            
-            if not GOOGLE_SHEET_ID:
-                raise HTTPException(status_code=500, detail="Google Sheet ID not configured")
-            
-            spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
-            sheet = spreadsheet.worksheet("Sheet1")
-            
-            # Get all records
-            all_records = sheet.get_all_records()
-            
-            # Update cache
-            update_patient_cache(all_records)
+        # Cached for all workers; on a miss a single worker fetches from Google Sheets.
+        # In the threadpool: waiting for another worker's fill must not block the event loop
+        all_records = await run_in_threadpool(load_patient_records)
         
-        # Debug: Print available columns from first record
         if all_records:
-            print(f"[Patient Search DEBUG] Total records: {len(all_records)}")
-            print(f"[Patient Search DEBUG] Available columns: {list(all_records[0].keys())}")
-            
-            # Print first record completely to see the data structure
-            if len(all_records) > 0:
-                first_record = all_records[0]
-                print(f"[Patient Search DEBUG] First record data:")
-                for key, value in first_record.items():
-                    if 'member' in key.lower() or 'patient' in key.lower() or 'name' in key.lower():
-                        print(f"  - {key}: '{value}'")
+            instrumentation.log_sampled(
+                "patient_search.records", total=len(all_records), columns=list(all_records.keys())
+            )
+        # Member ID columns are found once per request, not once per row
+        member_headers = [key for key in all_records.keys()
+                          if "member" in str(key).lower().strip() and "id" in str(key).lower().strip()]
         
         results = []
         
         # If query is empty, return all patients (limit to 100 for performance)
         if not q or len(q.strip()) < 1:
-            print("[Patient Search] Empty query - returning all patients")
             for record in all_records[:100]:  # Limit to first 100 patients
                 # Get patient name
                 patient_name = str(record.get("Patient Name", "") or record.get("patient name", "")).strip()
                 
                 # Get Member ID Key
                 member_id = ""
-                for key in record.keys():
-                    key_lower = str(key).lower().strip()
-                    if "member" in key_lower and "id" in key_lower:
-                        value = record.get(key, "")
-                        if value and value is not None and str(value).strip() and str(value).strip().lower() != 'none':
-                            member_id = str(value).strip()
-                            break
+                for key in member_headers:
+                    value = record.get(key, "")
+                    if value and value is not None and str(value).strip() and str(value).strip().lower() != 'none':
+                        member_id = str(value).strip()
+                        break
                 
                 # Skip if both are empty
                 if not patient_name and not member_id:
@@ -2229,7 +1901,7 @@ async def search_patients(q: str = ""):
                     "display": f"{member_id} | {patient_name}" if member_id and patient_name else (member_id or patient_name)
                 })
             
-            print(f"[Patient Search DEBUG] Returning {len(results)} total patients")
+            instrumentation.log_sampled("patient_search.results", query="", count=len(results))
             return {
                 "status": "success",
                 "patients": results
@@ -2238,12 +1910,6 @@ async def search_patients(q: str = ""):
         # If query is provided, search for matches
         query_lower = q.strip().lower()
         
-        # Debug: Show what column names we're actually seeing
-        if all_records:
-            actual_columns = list(all_records[0].keys())
-            member_id_columns = [col for col in actual_columns if 'member' in col.lower() and 'id' in col.lower()]
-            print(f"[Patient Search DEBUG] Columns with 'member' and 'id': {member_id_columns}")
-        
         for record in all_records:
             # Get patient name with various possible column name variations
             patient_name = str(record.get("Patient Name", "") or record.get("patient name", "")).strip()
@@ -2251,18 +1917,13 @@ async def search_patients(q: str = ""):
             # Get Member ID Key - FIRST check the exact column names from the sheet
             member_id = ""
             
-            # Strategy 1: Check all actual column names in the record
-            for key in record.keys():
-                key_lower = str(key).lower().strip()
-                # Check if this column name contains both "member" and "id"
-                if "member" in key_lower and "id" in key_lower:
-                    value = record.get(key, "")
-                    # Handle None, empty strings, and the string "None"
-                    if value and value is not None and str(value).strip() and str(value).strip().lower() != 'none':
-                        member_id = str(value).strip()
-                        if len(results) < 3:  # Debug first few
-                            print(f"[Patient Search DEBUG] Found Member ID in column '{key}' = '{member_id}'")
-                        break
+            # Strategy 1: Check the column names containing both "member" and "id"
+            for key in member_headers:
+                value = record.get(key, "")
+                # Handle None, empty strings, and the string "None"
+                if value and value is not None and str(value).strip() and str(value).strip().lower() != 'none':
+                    member_id = str(value).strip()
+                    break
             
             # Strategy 2: Fallback to exact string matches if Strategy 1 didn't work
             if not member_id:
@@ -2277,10 +1938,6 @@ async def search_patients(q: str = ""):
                         member_id = str(record[key_variant]).strip()
                         break
             
-            # Debug: Print what we found for first few matches
-            if len(results) < 3 and (query_lower in patient_name.lower() or query_lower in member_id.lower()):
-                print(f"[Patient Search DEBUG] Found match - Name: '{patient_name}', ID: '{member_id}'")
-            
             # Skip if both are empty
             if not patient_name and not member_id:
                 continue
@@ -2306,7 +1963,7 @@ async def search_patients(q: str = ""):
         # Limit to 50 results
         results = results[:50]
         
-        print(f"[Patient Search DEBUG] Returning {len(results)} results")
+        instrumentation.log_sampled("patient_search.results", query=query_lower, count=len(results))
         
         return {
             "status": "success",
@@ -2320,221 +1977,13 @@ async def search_patients(q: str = ""):
         raise HTTPException(status_code=500, detail=f"Failed to search patients: {str(e)}")
 
 
-class DeletePreviewRequest(BaseModel):
-    filters: Dict[str, Any]
-    date_column: str
-    preview_columns: List[str] = []
-
-@app.post("/delete/preview")
-async def delete_preview(payload: DeletePreviewRequest):
-    """
-    Preview rows that would be deleted based on filters.
-    """
-    try:
-        # Connect & Read Sheet
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID) if GOOGLE_SHEET_ID else client.open(GOOGLE_SHEET_NAME)
-        try:
-            sheet = spreadsheet.worksheet("Sheet1")
-        except:
-            sheet = spreadsheet.get_worksheet(0)
-            
-        all_values = sheet.get_all_values()
-        if not all_values:
-            return {"count": 0, "rows": [], "headers": []}
-            
-        headers = all_values[0]
-        rows = all_values[1:]
-        
-        df = pd.DataFrame(rows, columns=headers)
-        
-        # Apply Filters
-        date_col = payload.date_column
-        filters = payload.filters
-        
-        # Case-insensitive check
-        cols_lower = {c.lower(): c for c in df.columns}
-        if date_col.lower() not in cols_lower:
-             raise HTTPException(status_code=400, detail=f"Column '{date_col}' not found in sheet. Available: {list(df.columns)}")
-             
-        actual_date_col = cols_lower[date_col.lower()]
-             
-        # Convert date column to datetime for filtering
-        # Handle various formats?
-        # Flexible date parsing to handle mixed formats (DD/MM/YYYY and YYYY-MM-DD)
-        # First pass: try dayfirst=True (handles 11/12/2025 correctly)
-        df['temp_date'] = pd.to_datetime(df[actual_date_col], dayfirst=True, errors='coerce')
-        
-        # Second pass: for any NaT (failed parse), try default ISO parsing (handles 2025-12-11)
-        mask_nat = df['temp_date'].isna()
-        if mask_nat.any():
-            df.loc[mask_nat, 'temp_date'] = pd.to_datetime(df.loc[mask_nat, actual_date_col], errors='coerce')
-        # Fallback for YYYY-MM-DD if dayfirst failed? Pandas usually handles mixed well but let's assume standard.
-        
-        mask = pd.Series([True] * len(df))
-        
-        if filters.get('specificDate'):
-            target = pd.to_datetime(filters['specificDate']).date()
-            mask = mask & (df['temp_date'].dt.date == target)
-            
-        if filters.get('startDate'):
-            start = pd.to_datetime(filters['startDate']).date()
-            mask = mask & (df['temp_date'].dt.date >= start)
-            
-        if filters.get('endDate'):
-            end = pd.to_datetime(filters['endDate']).date()
-            mask = mask & (df['temp_date'].dt.date <= end)
-            
-        if filters.get('month'):
-            m = int(filters['month'])
-            mask = mask & (df['temp_date'].dt.month == m)
-            
-        if filters.get('year'):
-            y = int(filters['year'])
-            mask = mask & (df['temp_date'].dt.year == y)
-            
-        filtered_df = df[mask]
-        
-        # Prepare result
-        result_headers = payload.preview_columns if payload.preview_columns else headers[:5]
-        # Validate result headers exist
-        result_headers = [h for h in result_headers if h in df.columns]
-        
-        result_rows = filtered_df[result_headers].head(10).to_dict('records')
-        
-        # Get date range of matching rows for metadata
-        earliest = filtered_df['temp_date'].min()
-        latest = filtered_df['temp_date'].max()
-        
-        return {
-            "count": len(filtered_df),
-            "rows": result_rows,
-            "headers": result_headers,
-            "earliest": earliest.strftime('%Y-%m-%d') if pd.notnull(earliest) else None,
-            "latest": latest.strftime('%Y-%m-%d') if pd.notnull(latest) else None,
-            "debug_info": {
-                "active_sheet_id": GOOGLE_SHEET_ID,
-                "date_col_used": actual_date_col,
-                "raw_sample": df[actual_date_col].head(5).tolist(),
-                "parsed_sample": df['temp_date'].head(5).astype(str).tolist(),
-                "nat_count": int(df['temp_date'].isna().sum()),
-                "total_rows": len(df),
-                "filter_start": str(filters.get('startDate')),
-                "filter_end": str(filters.get('endDate'))
-            }
-        }
-        
-    except Exception as e:
-        print(f"Delete preview failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.post("/delete/confirm")
-async def delete_confirm(payload: DeletePreviewRequest):
-    """
-    Execute deletion. Matches logic of preview but writes back the INVERSE set.
-    """
-    try:
-        # Connect & Read Sheet
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID) if GOOGLE_SHEET_ID else client.open(GOOGLE_SHEET_NAME)
-        try:
-            sheet = spreadsheet.worksheet("Sheet1")
-        except:
-            sheet = spreadsheet.get_worksheet(0)
-            
-        all_values = sheet.get_all_values()
-        if not all_values:
-            return {"message": "Sheet is empty."}
-            
-        headers = all_values[0]
-        rows = all_values[1:]
-        
-        df = pd.DataFrame(rows, columns=headers)
-        
-        # Apply Filters to find rows to DELETE
-        date_col = payload.date_column
-        filters = payload.filters
-        
-        # Case-insensitive check
-        cols_lower = {c.lower(): c for c in df.columns}
-        if date_col.lower() not in cols_lower:
-             raise HTTPException(status_code=400, detail=f"Column '{date_col}' not found. Available: {list(df.columns)}")
-             
-        actual_date_col = cols_lower[date_col.lower()]
-             
-        # Flexible date parsing to handle mixed formats (DD/MM/YYYY and YYYY-MM-DD)
-        # First pass: try dayfirst=True (handles 11/12/2025 correctly)
-        df['temp_date'] = pd.to_datetime(df[actual_date_col], dayfirst=True, errors='coerce')
-        
-        # Second pass: for any NaT (failed parse), try default ISO parsing (handles 2025-12-11)
-        mask_nat = df['temp_date'].isna()
-        if mask_nat.any():
-            df.loc[mask_nat, 'temp_date'] = pd.to_datetime(df.loc[mask_nat, actual_date_col], errors='coerce')
-        
-        mask = pd.Series([True] * len(df))
-        
-        if filters.get('specificDate'):
-            target = pd.to_datetime(filters['specificDate']).date()
-            mask = mask & (df['temp_date'].dt.date == target)
-        if filters.get('startDate'):
-            start = pd.to_datetime(filters['startDate']).date()
-            mask = mask & (df['temp_date'].dt.date >= start)
-        if filters.get('endDate'):
-            end = pd.to_datetime(filters['endDate']).date()
-            mask = mask & (df['temp_date'].dt.date <= end)
-        if filters.get('month'):
-            m = int(filters['month'])
-            mask = mask & (df['temp_date'].dt.month == m)
-        if filters.get('year'):
-            y = int(filters['year'])
-            mask = mask & (df['temp_date'].dt.year == y)
-            
-        # Rows to KEEP are those where mask is False (or we select ~mask, but beware of NAs in date conversion?)
-        # Logic: mask selects rows to DELETE.
-        # So we keep rows where mask IS FALSE.
-        
-        rows_to_delete_count = mask.sum()
-        
-        if rows_to_delete_count == 0:
-            return {"message": "No rows matched the criteria. Nothing deleted."}
-            
-        df_keep = df[~mask]
-        
-        # Remove temp col
-        if 'temp_date' in df_keep.columns:
-            df_keep = df_keep.drop(columns=['temp_date'])
-            
-        # Write back
-        # Clear sheet
-        sheet.clear()
-        
-        # Update with headers + kept rows
-        # Replace NaN with ""
-        df_keep = df_keep.fillna("")
-        
-        updated_data = [df_keep.columns.values.tolist()] + df_keep.values.tolist()
-        sheet.update(updated_data)
-        
-        return {"message": f"Deleted {rows_to_delete_count} rows successfully."}
-        
-    except Exception as e:
-        print(f"Delete confirm failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
 @app.get("/sync_fields")
 async def sync_fields():
     """Read Excel, rebuild schema, persist locally, update CSV and Google Sheet (headers + dropdowns)."""
     global fields_cache
     try:
-        schema = build_schema_from_excel()
-        save_field_schema_to_disk(schema)
-        fields_cache["enquiry"] = schema
+        schema = await run_in_threadpool(build_schema_from_excel)
+        schema_registry.publish("enquiry", schema, "excel")
         # Update local CSV header row
         try:
             header_row = [f["name"] for f in schema]
@@ -2558,7 +2007,7 @@ async def sync_fields():
             'https://www.googleapis.com/auth/drive'
         ]
         creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
+        client = sheets_scheduler.authorize(creds)
         spreadsheet = ensure_google_sheet(client)
         headers = [f["name"] for f in schema] + ["Timestamp"]
         
@@ -2636,7 +2085,7 @@ async def save_billing_summary(payload: BillingSaveRequest):
 
         scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
         creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
+        client = sheets_scheduler.authorize(creds)
         
         spreadsheet = ensure_google_sheet(client)
         try:
@@ -2645,20 +2094,7 @@ async def save_billing_summary(payload: BillingSaveRequest):
             sheet = spreadsheet.sheet1
             
         # 1. Define Billing Columns
-        billing_columns = [
-            "TotalDaysStayed",
-            "RoomChargeTotal",
-            "BedChargeTotal", 
-            "NursePaymentTotal",
-            "AdditionalNursePaymentTotal",
-            "OtherChargesTotal",
-            "HospitalPaymentTotal", 
-            "DoctorFee", 
-            "ServiceCharge",
-            "Discount",
-            "BillGrandTotal", 
-            "BillGeneratedDate"
-        ]
+        billing_columns = BILLING_COLUMNS
         
         # 2. Check & Update Headers
         existing_values = sheet.get_all_values()
@@ -2687,11 +2123,10 @@ async def save_billing_summary(payload: BillingSaveRequest):
         
         # Find ID column index
         id_keys = ["memberidkey", "memberid", "member_id", "mid", "patientid", "id"]
-        for idx, h in enumerate(headers):
-            h_norm = normalize_field_name(h)
-            if h_norm in id_keys:
-                member_id_col_idx = idx
-                break
+        hmap = compile_headers(headers, sheet.title)
+        id_cols = [hmap.by_simple[k] for k in id_keys if k in hmap.by_simple]
+        if id_cols:
+            member_id_col_idx = min(id_cols)
                 
         if member_id_col_idx == -1:
             raise HTTPException(status_code=400, detail="Member ID column not found in Sheet1")
@@ -2789,6 +2224,8 @@ async def get_admission_details(member_id: str = Query(..., alias="member_id")):
     """
     Fetch patient admission details from the Patient Admission Google Sheet or Sheet1 as fallback.
     """
+    import pandas as pd
+
     print(f"[Admission Search] Searching for Member ID: {member_id}")
     
     # helper to normalize keys for comparison
@@ -2853,6 +2290,9 @@ async def export_billing_summary(payload: BillingExportRequest):
     """
     Generate an Excel file with Patient Details and Billing Summary.
     """
+    import pandas as pd
+    import openpyxl
+
     print(f"[Billing Export] Generating summary for {payload.member_id}")
     
     try:
@@ -2938,12 +2378,9 @@ async def update_fields(payload: UpdateFieldsPayload, type: str = "enquiry"):
     # Convert Pydantic models to dicts
     new_schema = [field.dict() for field in payload.fields]
     
-    # Update Cache
-    fields_cache[type] = new_schema
-    
-    # Save to Disk
+    # Publish (updates cache and saves to disk)
     try:
-        save_field_schema_to_disk(new_schema, type)
+        schema_registry.publish(type, new_schema, "update_fields")
         print(f"Schema saved for {type}: {len(new_schema)} fields")
         return {"status": "success", "message": "Schema saved successfully", "count": len(new_schema)}
     except Exception as e:
@@ -2986,8 +2423,7 @@ async def update_field(payload: UpdateSingleFieldPayload):
         updated['options'] = [str(o).strip() for o in payload.options]
         
     current_schema[idx] = updated
-    fields_cache[schema_type] = current_schema
-    save_field_schema_to_disk(current_schema, schema_type)
+    schema_registry.publish(schema_type, current_schema, "update_field")
     
     # Sync to Sheet Headers? 
     # For now, we only update local definition. 
@@ -3008,7 +2444,7 @@ def search_data(payload: dict = Body(...)):
             'https://www.googleapis.com/auth/drive'
         ]
         creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
+        client = sheets_scheduler.authorize(creds)
         
         sheet = None
         error_log = []
@@ -3042,18 +2478,8 @@ def search_data(payload: dict = Body(...)):
         if not all_values:
             return {"status": "success", "data": []}
             
-        raw_headers = all_values[0]
         # Create unique headers to handle duplicates (e.g. "Pain Point", "Pain Point")
-        headers = []
-        counts = {}
-        for h in raw_headers:
-            h_str = str(h).strip()
-            if h_str in counts:
-                counts[h_str] += 1
-                headers.append(f"{h_str}_{counts[h_str]}")
-            else:
-                counts[h_str] = 1
-                headers.append(h_str)
+        headers = search_headers(all_values[0])
         
         # Parse rows
         rows = []
@@ -3067,25 +2493,7 @@ def search_data(payload: dict = Body(...)):
             row_dict = dict(zip(headers, r_vals))
             rows.append(row_dict)
 
-        def match(row):
-            # Safe read using get_value for potential duplicates (backward compatibility)
-            d = str(get_value(row, "Date", "Date_2") or "").lower()
-            
-            # Check various name fields
-            n = str(
-                get_value(row, "Patient Name", "Name", "Full Name", "Patient Name_2", "Name_2", "Full Name_2")
-            ).lower()
-            
-            # Check Member ID
-            mid = str(get_value(row, "Member ID Key", "Member ID", "MemberID", "Member ID Key_2") or "").lower()
-
-            return (
-                (date_filter in d if date_filter else True)
-                and (name_filter in n if name_filter else True)
-                and (member_filter in mid if member_filter else True)
-            )
-
-        filtered = [r for r in rows if match(r)]
+        filtered = [r for r in rows if lead_matches(r, date_filter, name_filter, member_filter)]
 
         # Limit results if too large? The user requested "ALL rows" for empty filters.
         # But for huge sheets this might be slow. The previous logic was "limit=50" for the old GET API,
@@ -3100,159 +2508,19 @@ def search_data(payload: dict = Body(...)):
         print("SEARCH ERROR DETAILED:", str(e))
         return {"status": "error", "message": f"Search failed: {str(e)}"}
 
-@app.get("/download_template")
-async def download_template(format: str = Query(default="xlsx", regex="^(csv|xlsx)$")):
-    """Generate and return a sample template (CSV or Excel) based on active Sheet1 headers."""
-    headers = []
+@app.post("/admission/register")
+async def register_admission(payload: Dict[str, Any] = Body(...)):
+    """
+    Handle Admission Registration.
+    1. Normalize fields to specific user-defined schema keys (patientblood, etc).
+    2. Merge 'First Name'/'Patient Name' -> 'patient_name'.
+    3. Save to Sheet1 (Master) and Patient Admission sheet.
+    """
+    print(f"[Admission Debug] Received payload keys: {list(payload.keys())}")
     
-    # Priority 1: Fetch Live Headers from Google Sheet
-    try:
-        if GOOGLE_SHEET_ID or os.path.exists(CREDENTIALS_FILE):
-             client, spreadsheet = get_google_sheet_client()
-             sheet = spreadsheet.sheet1
-             # Get first row as headers
-             live_headers = sheet.row_values(1)
-             if live_headers:
-                 headers = live_headers
-    except Exception as e:
-        print(f"Template generation: Failed to fetch live headers ({e}). Using fallback schema.")
-
-    # Priority 2: Fallback to Local Schema
-    if not headers:
-        current_schema = fields_cache.get("enquiry", [])
-        if not current_schema:
-            load_schema("enquiry")
-            current_schema = fields_cache.get("enquiry", [])
-        headers = [f['name'] for f in current_schema]
-    
-    # Prepare sample data
-    sample_data = [
-        {
-            'date': '03/12/2025',
-            'memberidkey': 'MID-2025-12-03-001',
-            'attender name': 'John Smith',
-            'patient name': 'John Patient',
-            'gender': 'Male',
-            'age': '45',
-            'patient location': 'New York',
-            'area': 'Manhattan',
-            'email id': 'john@example.com',
-            'mobile number': '1234567890'
-        },
-        {
-            'date': '04/12/2025',
-            'memberidkey': 'MID-2025-12-04-002',
-            'attender name': 'Jane Doe',
-            'patient name': 'Jane Patient',
-            'gender': 'Female',
-            'age': '32',
-            'patient location': 'London',
-            'area': 'Westminster',
-            'email id': 'jane@example.com',
-            'mobile number': '0987654321'
-        },
-        {
-            'date': '05/12/2025',
-            'memberidkey': 'MID-2025-12-05-003',
-            'attender name': 'Robert Johnson',
-            'patient name': 'Robert Patient',
-            'gender': 'Male',
-            'age': '58',
-            'patient location': 'Paris',
-            'area': 'Marais',
-            'email id': 'robert@example.com',
-            'mobile number': '1122334455'
-        }
-    ]
-    
-    # Build rows
-    rows_data = []
-    current_schema = fields_cache.get("enquiry", [])
-    schema_map = {f['name'].lower().strip(): f for f in current_schema} if current_schema else {}
-    
-    for sample in sample_data:
-        example_row = []
-        
-        for h in headers:
-            h_lower = str(h).lower().strip()
-            
-            # Check if we have sample data for this field
-            if h_lower in sample:
-                example_row.append(sample[h_lower])
-            else:
-                # Fallback to smart defaults
-                field_def = schema_map.get(h_lower)
-                dtype = field_def.get('data_type', 'text') if field_def else 'text'
-                
-                if 'date' in h_lower or dtype == 'date':
-                    example_row.append(datetime.now().strftime('%d/%m/%Y'))
-                elif 'email' in h_lower or dtype == 'email':
-                    example_row.append('example@domain.com')
-                elif 'phone' in h_lower or 'mobile' in h_lower or dtype == 'phone':
-                    example_row.append('9876543210')
-                elif dtype == 'number' or 'price' in h_lower or 'rent' in h_lower or 'age' in h_lower:
-                    example_row.append('100')
-                elif dtype == 'dropdown' and field_def and field_def.get('options'):
-                    example_row.append(field_def['options'][0] if field_def['options'] else '')
-                else:
-                    example_row.append('')
-                    
-        rows_data.append(example_row)
-    
-    # Generate file based on format
-    if format == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(headers)
-        for row in rows_data:
-            writer.writerow(row)
-        output.seek(0)
-        
-        response = StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv"
-        )
-        response.headers["Content-Disposition"] = "attachment; filename=patient_data_template.csv"
-        return response
-    else:  # xlsx
-        # Create Excel file
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Patient Data"
-        
-        # Write headers
-        ws.append(headers)
-        
-        # Write data rows
-        for row in rows_data:
-            ws.append(row)
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        response = StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        response.headers["Content-Disposition"] = "attachment; filename=patient_data_template.xlsx"
-        return response
-
-
-@app.post("/admission/register")
-async def register_admission(payload: Dict[str, Any] = Body(...)):
-    """
-    Handle Admission Registration.
-    1. Normalize fields to specific user-defined schema keys (patientblood, etc).
-    2. Merge 'First Name'/'Patient Name' -> 'patient_name'.
-    3. Save to Sheet1 (Master) and Patient Admission sheet.
-    """
-    print(f"[Admission Debug] Received payload keys: {list(payload.keys())}")
-    
-    # NORMALIZE RAW DATA
-    raw_input = payload.get('data', {})
-    raw_data = normalize_payload(raw_input)
+    # NORMALIZE RAW DATA
+    raw_input = payload.get('data', {})
+    raw_data = normalize_payload(raw_input)
     
     print(f"[Admission Debug] Raw data size: {len(raw_data)}")
     
@@ -3361,50 +2629,17 @@ async def register_admission(payload: Dict[str, Any] = Body(...)):
     print(f"[Admission Debug] Normalized data to save: {normalized_data}")
 
     try:
-        # --- 2. Dual Write ---
-        
-        # 1. Upsert to Master Sheet (Sheet1)
-        print(f"[Admission Debug] Upserting to {GOOGLE_SHEET_NAME}...")
-        res1 = upsert_to_sheet(GOOGLE_SHEET_NAME, normalized_data, "admission", strict_mode=True) 
-        print(f"[Admission Debug] Master sheet result: {res1.get('status')}")
-        
-        # 2. Upsert to Patient Admission Sheet
-        print(f"[Admission Debug] Upserting to Secondary Sheet...")
-        res2 = save_patient_admission_to_sheet(normalized_data)
-        print(f"[Admission Debug] Admission sheet result: {res2.get('status')}")
-        
-        # 3. Notification Logic
-        p_name = normalized_data.get("patient_name", "Patient")
-        m_id = normalized_data.get("MemberidKey", "Unknown")
-        adm_date = normalized_data.get("admissiondate", datetime.now().strftime('%Y-%m-%d'))
-        p_email = normalized_data.get("emailid") # Mapped key
-        
-        if p_email and '@' in p_email:
-            subject = "Admission Confirmation"
-            message_body = f"""Dear {p_name},
-
-Your admission on {adm_date} has been successfully recorded.
-Your Patient ID is {m_id}.
-
-If you need assistance, please contact us.
-"""
-            try:
-                msg = EmailMessage()
-                msg.set_content(message_body)
-                msg["Subject"] = subject
-                msg["From"] = ensure_notification_defaults().get('sender_email', 'noreply@crm.com')
-                msg["To"] = p_email
-                with smtplib.SMTP(os.getenv("SMTP_SERVER", "smtp.gmail.com"), int(os.getenv("SMTP_PORT", 587))) as server:
-                    server.starttls()
-                    server.login(os.getenv("SMTP_USERNAME"), os.getenv("SMTP_PASSWORD"))
-                    server.send_message(msg)
-            except:
-                pass
+        # --- 2. Journal the dual write; the outbox replays it to Sheets ---
+        receipt = await run_in_threadpool(
+            write_outbox.submit, "admission_register", normalized_data, normalized_data.get("MemberidKey", "")
+        )
+        print(f"[Admission Debug] Outbox receipt #{receipt['receipt_id']} ({receipt['status']})")
 
         return {
             "status": "success",
             "message": "Admission registered successfully",
-            "sheet_url": res2.get('sheet_url')
+            "sheet_url": (receipt.get("result") or {}).get("sheet_url"),
+            "receipt": receipt
         }
 
     except Exception as e:
@@ -3414,6 +2649,51 @@ If you need assistance, please contact us.
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def apply_admission_register(normalized_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Outbox handler for /admission/register: dual write to Sheet1 and the Patient Admission sheet, then email."""
+    # 1. Upsert to Master Sheet (Sheet1)
+    print(f"[Admission Debug] Upserting to {GOOGLE_SHEET_NAME}...")
+    res1 = upsert_to_sheet(GOOGLE_SHEET_NAME, normalized_data, "admission", strict_mode=True)
+    print(f"[Admission Debug] Master sheet result: {res1.get('status')}")
+
+    # 2. Upsert to Patient Admission Sheet
+    print(f"[Admission Debug] Upserting to Secondary Sheet...")
+    res2 = save_patient_admission_to_sheet(normalized_data)
+    print(f"[Admission Debug] Admission sheet result: {res2.get('status')}")
+
+    # 3. Notification Logic
+    p_name = normalized_data.get("patient_name", "Patient")
+    m_id = normalized_data.get("MemberidKey", "Unknown")
+    adm_date = normalized_data.get("admissiondate", datetime.now().strftime('%Y-%m-%d'))
+    p_email = normalized_data.get("emailid") # Mapped key
+
+    if p_email and '@' in p_email:
+        subject = "Admission Confirmation"
+        message_body = f"""Dear {p_name},
+
+Your admission on {adm_date} has been successfully recorded.
+Your Patient ID is {m_id}.
+
+If you need assistance, please contact us.
+"""
+        try:
+            msg = EmailMessage()
+            msg.set_content(message_body)
+            msg["Subject"] = subject
+            msg["From"] = ensure_notification_defaults().get('sender_email', 'noreply@crm.com')
+            msg["To"] = p_email
+            with smtplib.SMTP(os.getenv("SMTP_SERVER", "smtp.gmail.com"), int(os.getenv("SMTP_PORT", 587))) as server:
+                server.starttls()
+                server.login(os.getenv("SMTP_USERNAME"), os.getenv("SMTP_PASSWORD"))
+                server.send_message(msg)
+        except:
+            pass
+
+    dashboard_cache.clear()
+    live_updates.publish("admissions", "admission_registered", m_id, {"member_id": m_id, "patient_name": p_name, "admission_date": adm_date})
+    return {"master_status": res1.get("status"), "admission_status": res2.get("status"), "sheet_url": res2.get("sheet_url")}
+
+
 # Cleanup orphan block
 
 # --- NEW: Secondary Google Sheet Endpoint ---
@@ -3443,22 +2723,11 @@ async def save_patient_admission(payload: Dict[str, Any] = Body(...)):
         results = []
         for i, row in enumerate(rows_to_process):
             # Basic validation/cleaning could happen here if needed
-            print(f"[Patient Admission Save] Saving Row {i+1}/{len(rows_to_process)}")
+            print(f"[Patient Admission Save] Queueing Row {i+1}/{len(rows_to_process)}")
             try:
-                # 1. Save to Secondary (Admission) Sheet
-                res = save_patient_admission_to_sheet(row)
-                
-                # 2. Sync to Primary (Lead) Sheet1 (Update details using Member ID Key)
-                try:
-                    res_lead = upsert_to_sheet("Sheet1", row, "enquiry", strict_mode=True)
-                    print(f"[Patient Admission Save] Synced to Lead Sheet1: {res_lead.get('status')}")
-                    # Merge lead result info? mostly just need to know it worked.
-                    res['lead_sync'] = "success"
-                except Exception as lead_err:
-                    print(f"[Patient Admission Save] Failed to sync to Lead Sheet1: {lead_err}")
-                    res['lead_sync'] = f"failed: {str(lead_err)}"
-
-                results.append({"status": "success", "row_index": i, "details": res})
+                member_id = next((str(v).strip() for k, v in row.items() if get_canonical_key(k) == "memberidkey" and str(v).strip()), "")
+                receipt = await run_in_threadpool(write_outbox.submit, "patient_admission_row", row, member_id)
+                results.append({"status": "success", "row_index": i, "details": receipt.get("result"), "receipt": receipt})
             except Exception as e:
                 print(f"[Patient Admission Save] Error on Row {i}: {e}")
                 results.append({"status": "error", "row_index": i, "error": str(e)})
@@ -3481,13 +2750,40 @@ async def save_patient_admission(payload: Dict[str, Any] = Body(...)):
         # Return error as JSON, don't crash with 500
         return {"status": "error", "message": str(e)}
 
+def apply_patient_admission_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Outbox handler for /patient-admission/save (one row)."""
+    # 1. Save to Secondary (Admission) Sheet
+    res = save_patient_admission_to_sheet(row)
+
+    # 2. Sync to Primary (Lead) Sheet1 (Update details using Member ID Key)
+    try:
+        res_lead = upsert_to_sheet("Sheet1", row, "enquiry", strict_mode=True)
+        print(f"[Patient Admission Save] Synced to Lead Sheet1: {res_lead.get('status')}")
+        res['lead_sync'] = "success"
+    except Exception as lead_err:
+        print(f"[Patient Admission Save] Failed to sync to Lead Sheet1: {lead_err}")
+        res['lead_sync'] = f"failed: {str(lead_err)}"
+
+    dashboard_cache.clear()
+    member_id = next((str(v).strip() for k, v in row.items() if get_canonical_key(k) == "memberidkey" and str(v).strip()), None)
+    live_updates.publish("admissions", "admission_saved", member_id, {"member_id": member_id})
+    return res
+
+
 @app.get("/patient-admission/view")
-async def view_patient_admissions():
+async def view_patient_admissions(request: Request):
     """
     Retrieve all rows from the Patient Admission sheet/worksheet.
-    Returns JSON structure with status, total count, and data list.
+    Returns JSON structure with status, total count, and data list (304 when the client's ETag is current).
     """
     try:
+        version = http_cache.dataset_version(
+            spreadsheets=[PATIENT_ADMISSION_SHEET_ID or GOOGLE_SHEET_ID], topics=["admissions"]
+        )
+        cached = http_cache.not_modified(request, version)
+        if cached is not None:
+            return cached
+
         client, spreadsheet = get_patient_admission_sheet_client()
         
         # Use same logic as save function to determine worksheet name
@@ -3508,11 +2804,11 @@ async def view_patient_admissions():
         records = sheet.get_all_records()
         print(f"[View Admissions] Found {len(records)} records")
         
-        return {
+        return http_cache.json_response(request, {
             "status": "success", 
             "total": len(records), 
             "data": records
-        }
+        }, version)
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
@@ -3529,7 +2825,7 @@ async def submit_form(form_data: FormData, background_tasks: BackgroundTasks):
         # Ensure defaults: auto Member ID and today's date for empty date fields
         enriched = dict(form_data.data)
 
-        # Auto Member ID if a matching field exists and is empty
+        # Auto Member ID if a matching field exists
         member_id_field = None
         # Use enquiry schema for this check
         current_schema = fields_cache.get("enquiry", [])
@@ -3539,15 +2835,10 @@ async def submit_form(form_data: FormData, background_tasks: BackgroundTasks):
                 member_id_field = field['name']
                 break
         
-        if member_id_field and not enriched.get(member_id_field):
-            # Always set server-side to keep it immutable from client edits
-            # Format: MID-yyyy-mm-dd-numericalid
-            now = datetime.now()
-            date_part = now.strftime('%Y-%m-%d')
-            # Generate unique numerical ID using timestamp + random number
-            numerical_id = int(now.timestamp() * 1000) % 100000 + random.randint(1000, 9999)
-            generated = f"MID-{date_part}-{numerical_id}"
-            enriched[member_id_field] = generated
+        if member_id_field:
+            # Always issued server-side; whatever the client sent is ignored
+            # Format: MID-yyyy-mm-dd-<node><sequence>, unique across workers and restarts
+            enriched[member_id_field] = await run_in_threadpool(member_id_service.next_member_id)
 
         # Fill empty date fields with today's date (YYYY-MM-DD)
         today = datetime.now().strftime('%Y-%m-%d')
@@ -3560,21 +2851,34 @@ async def submit_form(form_data: FormData, background_tasks: BackgroundTasks):
                 if not str(enriched.get(name, "")).strip():
                     enriched[name] = today
 
-        # 1. Upsert to Master (Sheet1)
-        res1 = upsert_to_sheet("Sheet1", enriched, "enquiry", strict_mode=True)
-        
-        # 2. Upsert to Enquiry Sheet
-        res2 = upsert_to_sheet(ENQUIRIES_SHEET_NAME, enriched, "enquiry")
+        # Journal the Sheet1 + Enquiries upserts. The key is built from the client's data so a
+        # double-submitted form maps to the first receipt (and its generated Member ID).
+        client_member_id = str(form_data.data.get(member_id_field, "")).strip() if member_id_field else ""
+        member_id = str(enriched.get(member_id_field, "")) if member_id_field else ""
+        receipt = await run_in_threadpool(
+            write_outbox.submit, "enquiry_submit", enriched, member_id,
+            write_outbox.idempotency_key("enquiry_submit", client_member_id, form_data.data)
+        )
+
+        possible_duplicates = find_possible_duplicates(enriched)
+        if possible_duplicates:
+            print(f"[Submit] {member_id} looks like {[d['member_id'] for d in possible_duplicates]}")
 
         recipient_email = extract_recipient_email(enriched)
         print(f"[Email] Recipient detected from payload: {recipient_email}")
-        if recipient_email:
+        if recipient_email and not receipt.get("duplicate"):
             background_tasks.add_task(send_notification_email, recipient_email, dict(enriched))
 
+        sheet_url = (receipt.get("result") or {}).get("sheet_url")
+        if not sheet_url and GOOGLE_SHEET_ID:
+            sheet_url = f"https://docs.google.com/spreadsheets/d/{GOOGLE_SHEET_ID}"
         return {
             "status": "success", 
             "message": "Enquiry submitted successfully", 
-            "sheet_url": res1.get("sheet_url")
+            "sheet_url": sheet_url,
+            "member_id": receipt.get("member_id"),
+            "receipt": receipt,
+            "possible_duplicates": possible_duplicates
         }
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -3584,13 +2888,42 @@ async def submit_form(form_data: FormData, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def apply_enquiry_submit(enriched: Dict[str, Any]) -> Dict[str, Any]:
+    """Outbox handler for /submit."""
+    # 1. Upsert to Master (Sheet1)
+    res1 = upsert_to_sheet("Sheet1", enriched, "enquiry", strict_mode=True)
+
+    # 2. Upsert to Enquiry Sheet
+    res2 = upsert_to_sheet(ENQUIRIES_SHEET_NAME, enriched, "enquiry")
+
+    # Applied to Sheets: dashboards can now refetch real counts
+    dashboard_cache.clear()
+    member_id = next((str(v) for k, v in enriched.items() if get_canonical_key(k) == "memberidkey" and str(v).strip()), None)
+    live_updates.publish("enquiries", "enquiry_submitted", member_id, {"member_id": member_id, "master_status": res1.get("status")})
+    return {"sheet_url": res1.get("sheet_url"), "master_status": res1.get("status"), "enquiry_status": res2.get("status")}
+
+
+def lead_sheet_member_ids() -> List[str]:
+    """Member IDs in Sheet1 and the Enquiries sheet (seeds a new Member ID database)."""
+    _, spreadsheet = get_google_sheet_client()
+    found: List[str] = []
+    for sheet_name in ("Sheet1", ENQUIRIES_SHEET_NAME):
+        try:
+            sheet = spreadsheet.worksheet(sheet_name)
+        except gspread.WorksheetNotFound:
+            continue
+        col_idx = compile_headers(sheet.row_values(1), sheet.title).by_canonical.get("memberidkey", -1)
+        if col_idx >= 0:
+            found.extend(sheet.col_values(col_idx + 1)[1:])
+    return found
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     excel_exists = os.path.exists(EXCEL_FILE_PATH)
     creds_exist = os.path.exists(CREDENTIALS_FILE)
     
-    print(f"[Health] fields_cache type: {type(fields_cache)}, len: {len(fields_cache)}")
     return {
         "status": "healthy",
         "excel_file": excel_exists,
@@ -3610,7 +2943,7 @@ async def debug_latest_rows():
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
 
     spreadsheet = None
     if GOOGLE_SHEET_ID:
@@ -3634,28 +2967,6 @@ async def debug_latest_rows():
     }
 
 
-def ensure_google_sheet(client: gspread.Client) -> gspread.Spreadsheet:
-    if GOOGLE_SHEET_ID:
-        return client.open_by_key(GOOGLE_SHEET_ID)
-    try:
-        return client.open(GOOGLE_SHEET_NAME)
-    except gspread.SpreadsheetNotFound:
-        return client.create(GOOGLE_SHEET_NAME)
-
-
-def get_google_sheet_client():
-    """Helper to get authenticated gspread client and spreadsheet."""
-    if not os.path.exists(CREDENTIALS_FILE):
-        raise HTTPException(status_code=404, detail="Google credentials file not found")
-    
-    scope = [
-        'https://spreadsheets.google.com/feeds',
-        'https://www.googleapis.com/auth/drive'
-    ]
-    creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
-    spreadsheet = ensure_google_sheet(client)
-    return client, spreadsheet
 
 
 
@@ -3676,90 +2987,6 @@ def sync_dropdown_options_to_sheet(client: gspread.Client, spreadsheet: gspread.
         print(f"Warning: failed syncing dropdown options: {e}")
 
 
-class FieldItem(BaseModel):
-    name: str
-    label: Optional[str] = None
-    data_type: str
-    options: Optional[List[str]] = None
-
-
-class UpdateFieldsPayload(BaseModel):
-    fields: List[FieldItem]
-
-
-@app.post("/update_fields")
-async def update_fields(payload: UpdateFieldsPayload):
-    global fields_cache
-    allowed_types = {"text","number","date","email","phone","boolean","dropdown"}
-    schema: List[Dict[str, Any]] = []
-    for f in payload.fields:
-        if f.data_type not in allowed_types:
-            raise HTTPException(status_code=400, detail=f"Invalid data_type for field '{f.name}': {f.data_type}")
-        schema.append({
-            "name": f.name.strip(),
-            "label": (f.label or f.name).strip(),
-            "data_type": f.data_type,
-            "options": [str(o).strip() for o in (f.options or [])]
-        })
-
-    # Persist schema JSON
-    with open(FIELD_SCHEMA_FILE, "w", encoding="utf-8") as f:
-        json.dump(schema, f, ensure_ascii=False, indent=2)
-    fields_cache["enquiry"] = schema
-
-    # Update local CSV header row
-    try:
-        header_row = [f["name"] for f in schema]
-        rows: List[List[str]] = []
-        if os.path.exists(CSV_FILE_PATH):
-            with open(CSV_FILE_PATH, "r", encoding="utf-8-sig", newline="") as rf:
-                reader = csv.reader(rf)
-                existing = list(reader)
-            rows = existing[1:] if len(existing) > 0 else []
-        with open(CSV_FILE_PATH, "w", encoding="utf-8", newline="") as wf:
-            writer = csv.writer(wf)
-            writer.writerow(header_row)
-            for r in rows:
-                writer.writerow(r)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to update local CSV: {e}")
-
-    # Update Google Sheet header row + dropdowns
-    try:
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
-        spreadsheet = ensure_google_sheet(client)
-        headers = [f["name"] for f in schema] + ["Timestamp"]
-        
-        # 1. Update Sheet1
-        try:
-            sheet1 = spreadsheet.sheet1
-            sheet1.update('1:1', [headers], value_input_option='USER_ENTERED')
-        except Exception as e:
-            print(f"Warning: failed updating Sheet1 headers: {e}")
-
-        # 2. Update Enquiries Sheet
-        try:
-            try:
-                sheet_enq = spreadsheet.worksheet(ENQUIRIES_SHEET_NAME)
-            except gspread.WorksheetNotFound:
-                sheet_enq = spreadsheet.add_worksheet(title=ENQUIRIES_SHEET_NAME, rows=1000, cols=20)
-            sheet_enq.update('1:1', [headers], value_input_option='USER_ENTERED')
-        except Exception as e:
-            print(f"Warning: failed updating Enquiries headers: {e}")
-
-        sync_dropdown_options_to_sheet(client, spreadsheet, schema)
-        return {"status": "success", "message": "Fields updated", "sheet_url": spreadsheet.url}
-    except FileNotFoundError:
-        return {"status": "success", "message": "Fields updated (local). Google credentials not found to sync."}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to sync Google Sheet: {e}")
-
-
 @app.get("/preview_data")
 async def preview_data():
     if not os.path.exists(CREDENTIALS_FILE):
@@ -3769,7 +2996,7 @@ async def preview_data():
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
     spreadsheet = ensure_google_sheet(client)
     sheet = spreadsheet.sheet1
     values = sheet.get_all_values()
@@ -3795,7 +3022,7 @@ async def update_record(member_id: Optional[str] = None, payload: Optional[Dict[
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
     spreadsheet = ensure_google_sheet(client)
     sheet = spreadsheet.sheet1
     values = sheet.get_all_values()
@@ -3807,12 +3034,8 @@ async def update_record(member_id: Optional[str] = None, payload: Optional[Dict[
     data_rows = values[1:]
 
     # Find member ID column
-    member_id_col = None
-    for i, header in enumerate(headers):
-        header_lower = header.lower()
-        if any(keyword in header_lower for keyword in ['member', 'id', 'key']) and ('member' in header_lower or 'id' in header_lower):
-            member_id_col = i
-            break
+    hmap = compile_headers(headers, sheet.title)
+    member_id_col = hmap.find_any('member', 'id')
 
     if member_id_col is None:
         raise HTTPException(status_code=400, detail="Member ID column not found")
@@ -3890,21 +3113,16 @@ async def update_record(member_id: Optional[str] = None, payload: Optional[Dict[
 
     # Update the specific row
     sheet.update(f'{target_row_idx}:{target_row_idx}', [updated_row], value_input_option='USER_ENTERED')
+    followup_index.record_row(sheet.title, target_row_idx, headers, updated_row)
+    duplicate_index.record_row(sheet.title, target_row_idx, headers, updated_row)
+    analytics_views.record_row(sheet.spreadsheet.id, sheet.title, target_row_idx, headers, updated_row)
 
     # Determine if lead status changed and get email to notify
     try:
-        headers_lower = [h.strip().lower() for h in headers]
-        status_idx = headers_lower.index('lead status') if 'lead status' in headers_lower else None
-        email_idx = None
-        for i, h in enumerate(headers_lower):
-            if 'email' in h:
-                email_idx = i
-                break
-        member_id_idx = None
-        for i, h in enumerate(headers_lower):
-            if ('member' in h) and ('id' in h or 'key' in h):
-                member_id_idx = i
-                break
+        status_idx = hmap.by_lower.get('lead status')
+        email_idx = hmap.find('email')
+        member_id_candidates = [i for i in (hmap.find('member', 'id'), hmap.find('member', 'key')) if i is not None]
+        member_id_idx = min(member_id_candidates) if member_id_candidates else None
 
         status_changed = False
         recipient_email = None
@@ -3919,7 +3137,7 @@ async def update_record(member_id: Optional[str] = None, payload: Optional[Dict[
             member_id_value = str(updated_row[member_id_idx]).strip()
 
         if status_changed and recipient_email:
-            payload_map = {h: (updated_row[i] if i < len(updated_row) else '') for i, h in enumerate(headers)}
+            payload_map = hmap.row_dict(updated_row)
             send_notification_email(recipient_email, payload_map, subject_override='LEAD STATUS CHANGED')
     except Exception as _e:
         print(f"[UpdateRecord] Notification check failed: {_e}")
@@ -3930,10 +3148,14 @@ async def update_record(member_id: Optional[str] = None, payload: Optional[Dict[
     }
 
 
-# Helper global for login cache
-login_cache: Dict[str, Any] = {"users": {}, "last_fetched": 0}
+# Login cache (shared by all workers); stores password digests, never the passwords
+LOGIN_CACHE = "login"
 LOGIN_CACHE_DURATION = 300  # 5 minutes
 
+
+def login_digest(user: str, password: str) -> str:
+    return hashlib.sha256(f"{user}\x1f{password}".encode("utf-8")).hexdigest()
+
 @app.post("/login")
 async def login(payload: LoginRequest):
     """Validate credentials against Google Sheet worksheet 'login details'.
@@ -3942,7 +3164,6 @@ async def login(payload: LoginRequest):
     """
     import time
     start_time = time.time()
-    print(f"[Login] Request received for user: {payload.User_name}")
 
     in_user = str(payload.User_name or '').strip()
     in_pass = str(payload.Password or '').strip()
@@ -3959,16 +3180,18 @@ async def login(payload: LoginRequest):
     
     # Check dev credentials first for quick access
     if in_user in DEV_CREDENTIALS and DEV_CREDENTIALS[in_user] == in_pass:
-        print(f"[Login] Dev credentials accepted. Time: {time.time() - start_time:.2f}s")
+        instrumentation.log_sampled("login.accepted", source="dev", seconds=round(time.time() - start_time, 3))
         return {"status": "ok"}
 
     # Check cache first
-    current_time = time.time()
-    if login_cache["users"] and (current_time - login_cache["last_fetched"] < LOGIN_CACHE_DURATION):
-        cached_pass = login_cache["users"].get(in_user)
-        if cached_pass and cached_pass == in_pass:
-            print(f"[Login] Cached credentials accepted. Time: {time.time() - start_time:.2f}s")
+    cached_users = shared_cache.get(LOGIN_CACHE, "users")
+    if cached_users:
+        cached_digest = cached_users.get(in_user)
+        if cached_digest and cached_digest == login_digest(in_user, in_pass):
+            instrumentation.record_cache("login", True)
+            instrumentation.log_sampled("login.accepted", source="cache", seconds=round(time.time() - start_time, 3))
             return {"status": "ok"}
+    instrumentation.record_cache("login", False)
     
     # Try Google Sheet authentication
     if not os.path.exists(CREDENTIALS_FILE):
@@ -3976,17 +3199,15 @@ async def login(payload: LoginRequest):
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
     try:
-        print(f"[Login] Connecting to Google Sheets... Time: {time.time() - start_time:.2f}s")
         scope = [
             'https://spreadsheets.google.com/feeds',
             'https://www.googleapis.com/auth/drive'
         ]
         creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
+        client = sheets_scheduler.authorize(creds)
         spreadsheet = ensure_google_sheet(client)
 
         # Case-insensitive lookup for worksheet named 'Login Details'
-        print(f"[Login] Finding worksheet... Time: {time.time() - start_time:.2f}s")
         try:
             ws = None
             # Fast check first
@@ -4008,7 +3229,6 @@ async def login(payload: LoginRequest):
             print(f"[Login] Error accessing worksheets: {e}")
             raise HTTPException(status_code=401, detail="Invalid username or password")
 
-        print(f"[Login] Fetching values... Time: {time.time() - start_time:.2f}s")
         values = ws.get_all_values() or []
         if len(values) < 2:
             print("[Login] No user data in Login Details worksheet")
@@ -4036,16 +3256,15 @@ async def login(payload: LoginRequest):
             u = str(r[user_col]).strip() if user_col < len(r) else ''
             p = str(r[pass_col]).strip() if pass_col < len(r) else ''
             if u:
-                new_cache[u] = p
+                new_cache[u] = login_digest(u, p)
             if u == in_user and p == in_pass:
                 found = True
 
-        # Update global cache
-        login_cache["users"] = new_cache
-        login_cache["last_fetched"] = current_time
+        # Update shared cache
+        shared_cache.set(LOGIN_CACHE, "users", new_cache, change_feed.cache_ttl(LOGIN_CACHE_DURATION))
         
         if found:
-            print(f"[Login] Google Sheet credentials accepted and cached. Time: {time.time() - start_time:.2f}s")
+            instrumentation.log_sampled("login.accepted", source="sheet", seconds=round(time.time() - start_time, 3))
             return {"status": "ok"}
 
         print(f"[Login] Credential mismatch for user '{in_user}'. Time: {time.time() - start_time:.2f}s")
@@ -4070,7 +3289,7 @@ async def list_sheets():
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
     spreadsheet = ensure_google_sheet(client)
     names = [ws.title for ws in spreadsheet.worksheets()]
     return {
@@ -4098,6 +3317,7 @@ class ComplaintRequest(BaseModel):
     room_no: str
     complaint_type: str
     description: Optional[str] = None
+    request_id: Optional[str] = None  # Generated once per form fill; a resent request keeps it
 
 class FeedbackRequest(BaseModel):
     patient_name: str
@@ -4105,6 +3325,7 @@ class FeedbackRequest(BaseModel):
     rating_cleanliness: int
     rating_staff: int
     comments: Optional[str] = None
+    request_id: Optional[str] = None  # Generated once per form fill; a resent request keeps it
 
 def ensure_bed_sheets_google(spreadsheet: gspread.Spreadsheet):
     """Ensure Admission Details, Complaints, and Feedback sheets exist in Google Sheet."""
@@ -4153,14 +3374,14 @@ def ensure_bed_sheets_google(spreadsheet: gspread.Spreadsheet):
         spreadsheet.worksheet(COMPLAINT_SHEET_NAME)
     except gspread.WorksheetNotFound:
         ws_complaints = spreadsheet.add_worksheet(title=COMPLAINT_SHEET_NAME, rows=100, cols=10)
-        ws_complaints.append_row(["Date", "Room No", "Patient Name", "Type", "Description", "Resolved"])
+        ws_complaints.append_row(["Date", "Room No", "Patient Name", "Type", "Description", "Resolved", REQUEST_ID_HEADER])
 
     # --- Feedback ---
     try:
         spreadsheet.worksheet(FEEDBACK_SHEET_NAME)
     except gspread.WorksheetNotFound:
         ws_feedback = spreadsheet.add_worksheet(title=FEEDBACK_SHEET_NAME, rows=100, cols=10)
-        ws_feedback.append_row(["Date", "Patient Name", "Comfort", "Cleanliness", "Staff", "Comments"])
+        ws_feedback.append_row(["Date", "Patient Name", "Comfort", "Cleanliness", "Staff", "Comments", REQUEST_ID_HEADER])
 
 
 @app.get("/api/beds")
@@ -4201,85 +3422,90 @@ async def get_beds():
             # Only add valid rows (skip empty ones if any)
             if clean_bed["room_no"]:
                 beds.append(clean_bed)
+
+        # Show allocations still waiting in the outbox as occupied (read-your-writes)
+        pending = {
+            (str(p.get("room_no")), str(p.get("bed_index"))): p
+            for p in write_outbox.pending_payloads("bed_allocation")
+        }
+        for bed in beds:
+            p = pending.get((str(bed["room_no"]), str(bed["bed_index"])))
+            if p:
+                bed.update({
+                    "patient_name": p.get("patient_name"),
+                    "member_id": p.get("member_id"),
+                    "gender": p.get("gender"),
+                    "status": "Occupied",
+                    "admission_date": p.get("admission_date"),
+                    "discharge_date": p.get("discharge_date"),
+                    "pain_point": p.get("pain_point"),
+                    "pending_sync": True,
+                })
                 
         return {"beds": beds}
     except Exception as e:
         print(f"Error fetching beds: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/beds/allocate")
-async def allocate_bed(payload: BedAllocationRequest):
-    """Allocate a bed in Google Sheets."""
+BED_COLUMNS = ["room no", "bed index", "status", "patient name", "member id", "gender",
+               "admission date", "discharge date", "pain point"]
+
+# Serializes check-then-journal of allocations in this worker; replay re-checks the sheet
+_bed_allocation_lock = threading.Lock()
+
+
+def find_bed(rows: List[List[str]], room_no: Any, bed_index: Any) -> Dict[str, Any]:
+    """
+    Locate a bed on the bed board and report who holds it.
+
+    Args:
+        rows: get_all_values() of the bed sheet (header row first)
+        room_no: Room number
+        bed_index: Bed index within the room
+
+    Returns:
+        {"columns": {header: index}, "row_number": int or None, "occupied_by": patient name or None}
+    """
+    headers = [str(h).strip().lower() for h in rows[0]] if rows else []
     try:
-        client, spreadsheet = get_google_sheet_client()
-        ws = spreadsheet.worksheet(ADMISSION_SHEET_NAME)
-        
-        # Get all rows to find the target bed
-        rows = ws.get_all_values()
-        headers = [str(h).strip().lower() for h in rows[0]]
-        
-        # Find indices
-        try:
-            room_no_idx = headers.index("room no")
-            bed_index_idx = headers.index("bed index")
-            status_idx = headers.index("status")
-            patient_idx = headers.index("patient name")
-            mid_idx = headers.index("member id")
-            gender_idx = headers.index("gender")
-            adm_idx = headers.index("admission date")
-            dis_idx = headers.index("discharge date")
-            pain_idx = headers.index("pain point")
-        except ValueError as e:
-            raise HTTPException(status_code=500, detail=f"Sheet headers missing: {e}")
+        columns = {name: headers.index(name) for name in BED_COLUMNS}
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"Sheet headers missing: {e}")
 
-        target_row_num = -1
-        
-        # Search for the bed row (skip header)
-        for i, row in enumerate(rows[1:], start=2):
-            # Check range to avoid index errors
-            if len(row) <= max(room_no_idx, bed_index_idx):
-                continue
-                
-            r_no = str(row[room_no_idx]).strip()
-            b_idx = str(row[bed_index_idx]).strip()
-            
-            if r_no == str(payload.room_no) and b_idx == str(payload.bed_index):
-                target_row_num = i
-                # Check status
-                if len(row) > status_idx and row[status_idx] == "Occupied":
-                    raise HTTPException(status_code=400, detail="Bed already occupied")
-                break
-        
-        if target_row_num == -1:
-             raise HTTPException(status_code=404, detail="Bed not found in system")
+    for i, row in enumerate(rows[1:], start=2):
+        if len(row) <= max(columns["room no"], columns["bed index"]):
+            continue
+        if str(row[columns["room no"]]).strip() == str(room_no) and str(row[columns["bed index"]]).strip() == str(bed_index):
+            occupied = len(row) > columns["status"] and row[columns["status"]] == "Occupied"
+            patient = row[columns["patient name"]] if len(row) > columns["patient name"] else ""
+            return {"columns": columns, "row_number": i, "occupied_by": patient if occupied else None}
+    return {"columns": columns, "row_number": None, "occupied_by": None}
+
+
+def journal_bed_allocation(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Check the bed exists and is free (sheet and pending allocations), then journal the allocation."""
+    client, spreadsheet = get_google_sheet_client()
+    bed = find_bed(spreadsheet.worksheet(ADMISSION_SHEET_NAME).get_all_values(), payload["room_no"], payload["bed_index"])
+    if bed["row_number"] is None:
+        raise HTTPException(status_code=404, detail="Bed not found in system")
+    # The same patient again is a retry: the outbox dedupes it and replay treats it as applied
+    if bed["occupied_by"] is not None and bed["occupied_by"] != payload["patient_name"]:
+        raise HTTPException(status_code=400, detail="Bed already occupied")
+
+    with _bed_allocation_lock:
+        for pending in write_outbox.pending_payloads("bed_allocation"):
+            if (str(pending.get("room_no")) == str(payload["room_no"]) and str(pending.get("bed_index")) == str(payload["bed_index"])
+                    and pending.get("patient_name") != payload["patient_name"]):
+                raise HTTPException(status_code=400, detail="Bed already occupied")
+        return write_outbox.submit("bed_allocation", payload, payload.get("member_id") or "")
 
-        # Update the row
-        # gspread uses 1-based indexing for columns
-        updates = [
-            {"range": f"{chr(65+patient_idx)}{target_row_num}", "values": [[payload.patient_name]]},
-            {"range": f"{chr(65+mid_idx)}{target_row_num}", "values": [[payload.member_id or ""]]},
-            {"range": f"{chr(65+gender_idx)}{target_row_num}", "values": [[payload.gender]]},
-            {"range": f"{chr(65+adm_idx)}{target_row_num}", "values": [[payload.admission_date]]},
-            {"range": f"{chr(65+dis_idx)}{target_row_num}", "values": [[payload.discharge_date or ""]]},
-            {"range": f"{chr(65+status_idx)}{target_row_num}", "values": [["Occupied"]]},
-            {"range": f"{chr(65+pain_idx)}{target_row_num}", "values": [[payload.pain_point or ""]]}
-        ]
-        
-        # Batch update is more efficient (or multiple update_cells)
-        # For simplicity with gspread, we can just update the row range 
-        # But constructing the full row might be tricky if we don't have it all.
-        # Let's use update_acell or update matching the column index.
-        # Note: headers.index returns 0-based. gspread col is i+1.
-        
-        ws.update_cell(target_row_num, patient_idx + 1, payload.patient_name)
-        ws.update_cell(target_row_num, mid_idx + 1, payload.member_id or "")
-        ws.update_cell(target_row_num, gender_idx + 1, payload.gender)
-        ws.update_cell(target_row_num, adm_idx + 1, payload.admission_date)
-        ws.update_cell(target_row_num, dis_idx + 1, payload.discharge_date or "")
-        ws.update_cell(target_row_num, status_idx + 1, "Occupied")
-        ws.update_cell(target_row_num, pain_idx + 1, payload.pain_point or "")
-        
-        return {"status": "success", "message": "Bed allocated successfully"}
+
+@app.post("/api/beds/allocate")
+async def allocate_bed(payload: BedAllocationRequest):
+    """Allocate a bed in Google Sheets (checked now, journaled in the outbox, applied in the background)."""
+    try:
+        receipt = await run_in_threadpool(journal_bed_allocation, payload.dict())
+        return {"status": "success", "message": "Bed allocated successfully", "receipt": receipt}
         
     except HTTPException:
         raise
@@ -4288,56 +3514,140 @@ async def allocate_bed(payload: BedAllocationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def apply_bed_allocation(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Outbox handler for /api/beds/allocate. 400/404 rejections fail the entry without retries."""
+    client, spreadsheet = get_google_sheet_client()
+    ws = spreadsheet.worksheet(ADMISSION_SHEET_NAME)
+    
+    # Re-check against the sheet: it may have changed since the allocation was journaled
+    bed = find_bed(ws.get_all_values(), payload['room_no'], payload['bed_index'])
+    target_row_num = bed["row_number"]
+    if target_row_num is None:
+        raise HTTPException(status_code=404, detail="Bed not found in system")
+    if bed["occupied_by"] is not None:
+        # A replay of an allocation that already reached the sheet is not a conflict
+        if bed["occupied_by"] == payload['patient_name']:
+            return {"row": target_row_num, "already_applied": True}
+        raise HTTPException(status_code=400, detail="Bed already occupied")
+
+    # Update the row
+    # gspread uses 1-based indexing for columns
+    columns = bed["columns"]
+    updates = [
+        {"range": f"{chr(65+columns['patient name'])}{target_row_num}", "values": [[payload['patient_name']]]},
+        {"range": f"{chr(65+columns['member id'])}{target_row_num}", "values": [[payload.get('member_id') or ""]]},
+        {"range": f"{chr(65+columns['gender'])}{target_row_num}", "values": [[payload['gender']]]},
+        {"range": f"{chr(65+columns['admission date'])}{target_row_num}", "values": [[payload['admission_date']]]},
+        {"range": f"{chr(65+columns['discharge date'])}{target_row_num}", "values": [[payload.get('discharge_date') or ""]]},
+        {"range": f"{chr(65+columns['status'])}{target_row_num}", "values": [["Occupied"]]},
+        {"range": f"{chr(65+columns['pain point'])}{target_row_num}", "values": [[payload.get('pain_point') or ""]]}
+    ]
+    
+    # One values batchUpdate: the allocation lands all-or-nothing, so an outbox retry never sees a half-written row
+    ws.batch_update(updates, value_input_option='USER_ENTERED')
+
+    # Only now is the bed really taken: tell open bed boards
+    live_updates.publish(
+        "beds", "bed_allocated", f"{payload['room_no']}/{payload['bed_index']}",
+        {**payload, "status": "Occupied", "row": target_row_num},
+    )
+    return {"row": target_row_num}
+
+
 @app.post("/api/complaints")
 async def log_complaint(payload: ComplaintRequest):
     """Log a complaint to Google Sheets."""
     try:
-        client, spreadsheet = get_google_sheet_client()
-        try:
-            ws = spreadsheet.worksheet(COMPLAINT_SHEET_NAME)
-        except gspread.WorksheetNotFound:
-            # Fallback if ensure wasn't called (though get_beds calls it)
-            ensure_bed_sheets_google(spreadsheet)
-            ws = spreadsheet.worksheet(COMPLAINT_SHEET_NAME)
-            
-        ws.append_row([
-            datetime.now().strftime('%Y-%m-%d'),
-            payload.room_no,
-            payload.patient_name,
-            payload.complaint_type,
-            payload.description,
-            "No"
-        ])
-        
-        return {"status": "success", "message": "Complaint logged"}
+        entry = payload.dict()
+        entry["date"] = datetime.now().strftime('%Y-%m-%d')
+        # Part of the idempotency key: only a resend of the same form fill is deduplicated
+        entry["request_id"] = (entry.get("request_id") or "").strip() or uuid.uuid4().hex
+        receipt = await run_in_threadpool(write_outbox.submit, "complaint", entry)
+        return {"status": "success", "message": "Complaint logged", "receipt": receipt}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def bed_side_worksheet(title: str) -> gspread.Worksheet:
+    """Complaints or Feedback worksheet, created if missing."""
+    client, spreadsheet = get_google_sheet_client()
+    try:
+        return spreadsheet.worksheet(title)
+    except gspread.WorksheetNotFound:
+        # Fallback if ensure wasn't called (though get_beds calls it)
+        ensure_bed_sheets_google(spreadsheet)
+        return spreadsheet.worksheet(title)
+
+
+def request_id_logged(title: str, entry: Dict[str, Any]) -> bool:
+    """True if a row logged under the entry's request id is already in the sheet."""
+    request_id = entry.get("request_id")
+    if not request_id:
+        return False
+    return request_id in bed_side_worksheet(title).col_values(REQUEST_ID_COLUMN)[1:]
+
+
+def append_with_request_id(ws: gspread.Worksheet, values: List[Any], request_id: Optional[str]) -> None:
+    """Append a row with its request id in column G (naming the column on sheets created before it existed)."""
+    if ws.title not in _request_id_header_checked:
+        if ws.acell(f"{chr(64 + REQUEST_ID_COLUMN)}1").value != REQUEST_ID_HEADER:
+            ws.update_cell(1, REQUEST_ID_COLUMN, REQUEST_ID_HEADER)
+        _request_id_header_checked.add(ws.title)
+    ws.append_row(values + [""] * (REQUEST_ID_COLUMN - 1 - len(values)) + [request_id or ""])
+
+
+def complaint_already_logged(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Outbox lookup before a complaint is replayed: the earlier attempt may have appended it."""
+    return {"sheet": COMPLAINT_SHEET_NAME} if request_id_logged(COMPLAINT_SHEET_NAME, entry) else None
+
+
+def apply_complaint(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Outbox handler for /api/complaints."""
+    ws = bed_side_worksheet(COMPLAINT_SHEET_NAME)
+    append_with_request_id(ws, [
+        entry["date"],
+        entry["room_no"],
+        entry["patient_name"],
+        entry["complaint_type"],
+        entry.get("description"),
+        "No"
+    ], entry.get("request_id"))
+    dashboard_cache.clear()
+    live_updates.publish("complaints", "complaint_logged", None, entry)
+    return {"sheet": COMPLAINT_SHEET_NAME}
+
 @app.post("/api/feedback")
 async def submit_feedback(payload: FeedbackRequest):
     """Submit feedback to Google Sheets."""
     try:
-        client, spreadsheet = get_google_sheet_client()
-        try:
-            ws = spreadsheet.worksheet(FEEDBACK_SHEET_NAME)
-        except gspread.WorksheetNotFound:
-            ensure_bed_sheets_google(spreadsheet)
-            ws = spreadsheet.worksheet(FEEDBACK_SHEET_NAME)
-            
-        ws.append_row([
-            datetime.now().strftime('%Y-%m-%d'),
-            payload.patient_name,
-            payload.rating_comfort,
-            payload.rating_cleanliness,
-            payload.rating_staff,
-            payload.comments
-        ])
-        
-        return {"status": "success", "message": "Feedback submitted"}
+        entry = payload.dict()
+        entry["date"] = datetime.now().strftime('%Y-%m-%d')
+        entry["request_id"] = (entry.get("request_id") or "").strip() or uuid.uuid4().hex
+        receipt = await run_in_threadpool(write_outbox.submit, "feedback", entry)
+        return {"status": "success", "message": "Feedback submitted", "receipt": receipt}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def feedback_already_logged(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Outbox lookup before feedback is replayed."""
+    return {"sheet": FEEDBACK_SHEET_NAME} if request_id_logged(FEEDBACK_SHEET_NAME, entry) else None
+
+
+def apply_feedback(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Outbox handler for /api/feedback."""
+    ws = bed_side_worksheet(FEEDBACK_SHEET_NAME)
+    append_with_request_id(ws, [
+        entry["date"],
+        entry["patient_name"],
+        entry["rating_comfort"],
+        entry["rating_cleanliness"],
+        entry["rating_staff"],
+        entry.get("comments")
+    ], entry.get("request_id"))
+    return {"sheet": FEEDBACK_SHEET_NAME}
+
+
 @app.post("/api/beds/discharge")
 async def discharge_bed(room_no: str, bed_index: int):
     """Discharge a patient and release the bed. Patient data remains in main sheet."""
@@ -4428,6 +3738,10 @@ async def discharge_bed(room_no: str, bed_index: int):
         ]
         
         ws.batch_update(updates)
+        live_updates.publish(
+            "beds", "bed_discharged", f"{room_no}/{bed_index}",
+            {"room_no": room_no, "bed_index": bed_index, "status": "Available"},
+        )
         
         return {"status": "success", "message": "Patient discharged successfully"}
         
@@ -4480,6 +3794,10 @@ async def update_discharge_date(room_no: str, bed_index: int, discharge_date: st
 
         # ONLY update discharge date - do NOT change status or clear patient data
         ws.update_cell(target_row_num, dis_idx + 1, discharge_date or "")
+        live_updates.publish(
+            "beds", "discharge_date_updated", f"{room_no}/{bed_index}",
+            {"room_no": room_no, "bed_index": bed_index, "discharge_date": discharge_date or ""},
+        )
         
         return {"status": "success", "message": "Discharge date updated successfully"}
         
@@ -4493,6 +3811,7 @@ async def update_discharge_date(room_no: str, bed_index: int, discharge_date: st
 class AIChatRequest(BaseModel):
     query: str
     filter: Optional[str] = None
+    stream: bool = False
 
 
 # AI Configuration
@@ -4510,27 +3829,9 @@ HF_MODEL = os.getenv('HF_MODEL', 'mistralai/Mistral-7B-Instruct-v0.2')
 HF_API_BASE_URL = os.getenv('HF_API_BASE_URL', 'https://router.huggingface.co/v1')
 HF_ENABLED = os.getenv('HF_ENABLED', 'False').lower() == 'true'
 
-
-async def query_groq_ai(user_query: str, crm_data_summary: str, member_ids: List[str]) -> Optional[str]:
-    """
-    Query Groq API with CRM context.
-    
-    Args:
-        user_query: The user's question
-        crm_data_summary: Summary of relevant CRM data
-        member_ids: List of relevant member IDs
-        
-    Returns:
-        AI-generated response or None if API fails
-    """
-    if not GROQ_API_KEY:
-        return None
-    
-    try:
-        # Build the prompt with CRM context
-        system_prompt = """You are an AI CRM assistant for an elderly care service. 
-You help staff quickly understand customer data and follow-up requirements.
-Be concise, professional, and helpful.
+AI_SYSTEM_PROMPT = """You are an AI CRM assistant for an elderly care service. 
+You help staff quickly understand customer data and follow-up requirements.
+Be concise, professional, and helpful.
 
 IMPORTANT: Member names are shown as "AttenderName/PatientName" when both exist. Search BOTH names when looking for a person.
 
@@ -4539,8 +3840,11 @@ When users ask for "member IDs" or "IDs", provide the member IDs.
 When users ask about locations (e.g., city, area, where), provide the location for each relevant member.
 When users ask for phone numbers (e.g., phone, mobile, contact number), provide the phone number for each relevant member.
 Otherwise, provide both name and ID in format: "Name (ID)" and include location and phone if it adds clarity."""
-        
-        user_prompt = f"""CRM Data Context:
+
+
+def build_ai_user_prompt(user_query: str, crm_data_summary: str) -> str:
+    """Build the user message sent to the LLM (shared by Groq / Hugging Face)."""
+    return f"""CRM Data Context:
 {crm_data_summary}
 
 User Question: {user_query}
@@ -4551,6 +3855,27 @@ If the user asks for IDs, list the member IDs.
 If the user asks about location, provide the member locations alongside their names or IDs.
 If the user asks for phone numbers, provide the phone/mobile number alongside the name or ID.
 Otherwise, provide both name and ID, including location and phone if helpful."""
+
+
+async def query_groq_ai(user_query: str, crm_data_summary: str, member_ids: List[str]) -> Optional[str]:
+    """
+    Query Groq API with CRM context.
+    
+    Args:
+        user_query: The user's question
+        crm_data_summary: Summary of relevant CRM data
+        member_ids: List of relevant member IDs
+        
+    Returns:
+        AI-generated response or None if API fails
+    """
+    if not GROQ_API_KEY:
+        return None
+    
+    try:
+        # Build the prompt with CRM context
+        system_prompt = AI_SYSTEM_PROMPT
+        user_prompt = build_ai_user_prompt(user_query, crm_data_summary)
         
         # Prepare the API request
         headers = {
@@ -4570,6 +3895,8 @@ Otherwise, provide both name and ID, including location and phone if helpful."""
         }
         
         # Make async request to Groq
+        import httpx
+
         async with httpx.AsyncClient(timeout=30.0) as client:
             response = await client.post(
                 f"{GROQ_API_BASE_URL}/chat/completions",
@@ -4612,29 +3939,8 @@ async def query_huggingface_ai(user_query: str, crm_data_summary: str, member_id
     
     try:
         # Build the prompt with CRM context
-        system_prompt = """You are an AI CRM assistant for an elderly care service. 
-You help staff quickly understand customer data and follow-up requirements.
-Be concise, professional, and helpful.
-
-IMPORTANT: Member names are shown as "AttenderName/PatientName" when both exist. Search BOTH names when looking for a person.
-
-When users ask for "names", provide the patient/customer names.
-When users ask for "member IDs" or "IDs", provide the member IDs.
-When users ask about locations (e.g., city, area, where), provide the location for each relevant member.
-When users ask for phone numbers (e.g., phone, mobile, contact number), provide the phone number for each relevant member.
-Otherwise, provide both name and ID in format: "Name (ID)" and include location and phone if it adds clarity."""
-        
-        user_prompt = f"""CRM Data Context:
-{crm_data_summary}
-
-User Question: {user_query}
-
-Provide a clear, concise answer based on the CRM data above.
-If the user asks for names, list the names from the member details.
-If the user asks for IDs, list the member IDs.
-If the user asks about location, provide the member locations alongside their names or IDs.
-If the user asks for phone numbers, provide the phone/mobile number alongside the name or ID.
-Otherwise, provide both name and ID, including location and phone if helpful."""
+        system_prompt = AI_SYSTEM_PROMPT
+        user_prompt = build_ai_user_prompt(user_query, crm_data_summary)
         
         # Prepare the API request
         headers = {
@@ -4654,6 +3960,8 @@ Otherwise, provide both name and ID, including location and phone if helpful."""
         }
         
         # Make async request to Hugging Face (OpenAI-compatible format)
+        import httpx
+
         async with httpx.AsyncClient(timeout=30.0) as client:
             response = await client.post(
                 f"{HF_API_BASE_URL}/chat/completions",
@@ -4684,6 +3992,66 @@ Otherwise, provide both name and ID, including location and phone if helpful."""
         return None
 
 
+async def stream_ai_completion(user_query: str, crm_data_summary: str) -> AsyncIterator[str]:
+    """
+    Stream an AI answer token-by-token using the provider's `stream: true` mode.
+
+    Picks the provider the same way as the blocking endpoint (Groq first,
+    Hugging Face as backup) and yields content deltas as they arrive.
+    Yields nothing if no provider is configured or the request fails, so the
+    caller can fall back to generate_fallback_response.
+    """
+    if AI_PROVIDER == 'groq' and GROQ_API_KEY:
+        base_url, api_key, model = GROQ_API_BASE_URL, GROQ_API_KEY, GROQ_MODEL
+    elif HF_ENABLED and HF_TOKEN:
+        base_url, api_key, model = HF_API_BASE_URL, HF_TOKEN, HF_MODEL
+    else:
+        return
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": AI_SYSTEM_PROMPT},
+            {"role": "user", "content": build_ai_user_prompt(user_query, crm_data_summary)}
+        ],
+        "max_tokens": 500,
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "stream": True
+    }
+
+    import httpx
+
+    try:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=60.0)) as client:
+            # Leaving this block (including on generator close after a client
+            # disconnect) closes the upstream connection and stops generation.
+            async with client.stream("POST", f"{base_url}/chat/completions", headers=headers, json=payload) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    print(f"❌ AI stream error: {response.status_code} - {body[:200]!r}")
+                    return
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    delta = (chunk.get('choices') or [{}])[0].get('delta', {}).get('content')
+                    if delta:
+                        yield delta
+    except Exception as e:
+        print(f"Error streaming AI response: {e}")
+
+
 def generate_fallback_response(query_lower: str, filter_type: str, filtered_rows: List, 
                               member_ids: List[str], status_counts: Dict = None, 
                               member_data: List[Dict] = None) -> str:
@@ -4807,11 +4175,6 @@ def generate_fallback_response(query_lower: str, filter_type: str, filtered_rows
             return response
 
 
-# AI CRM Chat Models
-class AIChatRequest(BaseModel):
-    query: str
-    filter: Optional[str] = None
-
 def get_all_google_sheets_data():
     """Get ALL data from Google Sheets for AI Analytics - no field filtering"""
     if not os.path.exists(CREDENTIALS_FILE):
@@ -4822,7 +4185,7 @@ def get_all_google_sheets_data():
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
     spreadsheet = ensure_google_sheet(client)
     sheet = spreadsheet.sheet1
     
@@ -4864,415 +4227,444 @@ def get_all_google_sheets_data():
     
     return "\n".join(lines)
 
-@app.post("/api/ai-crm/chat")
-async def ai_crm_chat(request: AIChatRequest, background_tasks: BackgroundTasks):
+
+def build_ai_crm_context(request: AIChatRequest, background_tasks: BackgroundTasks) -> Dict[str, Any]:
     """
-    AI CRM Chat endpoint - queries Google Sheets data based on user input.
-    Supports filters: today, this_week, overdue
+    Read the CRM sheet and build everything needed to answer an AI chat query:
+    filtered rows, member IDs/details, status counts and the LLM context summary.
+    A "send mail ... follow" command is handled here and sets `response_text`.
+    Returns {"early_response": {...}} when there is no data to answer from.
     """
+    if not os.path.exists(CREDENTIALS_FILE):
+        return {"early_response": {
+            "response": "Google Sheets is not connected. Please configure credentials.",
+            "member_ids": [],
+            "connected": False
+        }}
+    
+    # Connect to Google Sheets
+    scope = [
+        'https://spreadsheets.google.com/feeds',
+        'https://www.googleapis.com/auth/drive'
+    ]
+    creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
+    client = sheets_scheduler.authorize(creds)
+    spreadsheet = ensure_google_sheet(client)
+    
+    # Try to find the correct worksheet
     try:
-        if not os.path.exists(CREDENTIALS_FILE):
-            return {
-                "response": "Google Sheets is not connected. Please configure credentials.",
-                "member_ids": [],
-                "connected": False
-            }
-        
-        # Connect to Google Sheets
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
-        spreadsheet = ensure_google_sheet(client)
+        worksheet = spreadsheet.worksheet(GOOGLE_SHEET_NAME)
+    except gspread.exceptions.WorksheetNotFound:
+        # Try alternative names
+        worksheets = spreadsheet.worksheets()
+        worksheet_names = [ws.title for ws in worksheets]
+        
+        # Try to find a worksheet with "CRM" or "Lead" in the name
+        crm_sheet = None
+        for ws in worksheets:
+            ws_name_lower = ws.title.lower()
+            if 'crm' in ws_name_lower or 'lead' in ws_name_lower:
+                crm_sheet = ws
+                break
         
-        # Try to find the correct worksheet
-        try:
-            worksheet = spreadsheet.worksheet(GOOGLE_SHEET_NAME)
-        except gspread.exceptions.WorksheetNotFound:
-            # Try alternative names
-            worksheets = spreadsheet.worksheets()
-            worksheet_names = [ws.title for ws in worksheets]
-            
-            # Try to find a worksheet with "CRM" or "Lead" in the name
-            crm_sheet = None
-            for ws in worksheets:
-                ws_name_lower = ws.title.lower()
-                if 'crm' in ws_name_lower or 'lead' in ws_name_lower:
-                    crm_sheet = ws
-                    break
+        if crm_sheet:
+            worksheet = crm_sheet
+        else:
+            # Use the first worksheet if no CRM sheet found
+            worksheet = worksheets[0] if worksheets else None
             
-            if crm_sheet:
-                worksheet = crm_sheet
-            else:
-                # Use the first worksheet if no CRM sheet found
-                worksheet = worksheets[0] if worksheets else None
-                
-            if not worksheet:
-                return {
-                    "response": f"Could not find CRM worksheet. Available sheets: {', '.join(worksheet_names)}",
-                    "member_ids": [],
-                    "connected": True
-                }
-        
-        # Get all data
-        all_rows = worksheet.get_all_values()
-        if len(all_rows) < 2:
-            return {
-                "response": "No data found in the CRM sheet.",
+        if not worksheet:
+            return {"early_response": {
+                "response": f"Could not find CRM worksheet. Available sheets: {', '.join(worksheet_names)}",
                 "member_ids": [],
                 "connected": True
-            }
-        
-        original_headers = [str(h).strip() for h in all_rows[0]]
-        headers = [h.lower() for h in original_headers]
-        data_rows = all_rows[1:]
-        
-        # Find relevant column indices
-        member_id_col = next((i for i, h in enumerate(headers) if 'member' in h and 'id' in h), None)
-        date_col = next((i for i, h in enumerate(headers) if h == 'date'), None)
-        follow1_col = next((i for i, h in enumerate(headers) if 'follow1 date' in h or 'follow_1 date' in h), None)
-        follow2_col = next((i for i, h in enumerate(headers) if 'follow_2 date' in h or 'follow2 date' in h), None)
-        follow3_col = next((i for i, h in enumerate(headers) if 'follow_3 date' in h or 'follow3 date' in h), None)
-        lead_status_col = next((i for i, h in enumerate(headers) if 'lead status' in h), None)
-        patient_name_col = next((i for i, h in enumerate(headers) if 'patient name' in h), None)
-        attender_name_col = next((i for i, h in enumerate(headers) if 'attender name' in h), None)
-        patient_location_col = next((i for i, h in enumerate(headers) if 'patient location' in h), None)
-        location_col = next((i for i, h in enumerate(headers) if h == 'location'), None)
-        area_col = next((i for i, h in enumerate(headers) if 'area' in h), None)
-        # Phone/Mobile/Contact number column
-        email_col = next((i for i, h in enumerate(headers) if 'email' in h), None)
-        mobile_col = next((i for i, h in enumerate(headers) if any(k in h for k in ['mobile', 'phone', 'contact'])), None)
-        
-        # Get today's date
-        from datetime import datetime, timedelta
-        today = datetime.now().date()
-        week_ago = today - timedelta(days=7)
-        
-        def parse_date(date_str):
-            """Parse date string in various formats"""
-            if not date_str or str(date_str).strip() == '':
-                return None
-            try:
-                # Try DD/MM/YYYY format
-                if '/' in str(date_str):
-                    parts = str(date_str).split('/')
-                    if len(parts) == 3:
-                        return datetime.strptime(date_str, '%d/%m/%Y').date()
-                # Try YYYY-MM-DD format
-                elif '-' in str(date_str):
-                    return datetime.strptime(date_str, '%Y-%m-%d').date()
-            except:
-                pass
-            return None
-        
-        def smart_filter_rows(all_rows, query_text, headers_list):
-            """
-            Smart retrieval: Scan ALL rows and filter based on query keywords.
-            For field-specific queries (age, gender, email, etc.), return ALL rows.
-            """
-            query_lower = query_text.lower()
-            
-            # Field-specific query keywords - return ALL rows for these
-            field_keywords = ['age', 'gender', 'email', 'phone', 'mobile', 'service', 'status', 
-                            'location', 'area', 'source', 'pain', 'date', 'assigned', 'agent']
-            
-            # If query is asking about a field value, return ALL rows
-            if any(keyword in query_lower for keyword in field_keywords):
-                return all_rows
-            
-            relevant_rows = []
-            
-            # Extract potential search terms from query
-            search_terms = []
-            # Remove common words
-            stop_words = {'the', 'a', 'an', 'is', 'are', 'was', 'were', 'of', 'for', 'in', 'on', 'at', 'to', 'from', 'by', 'with', 'what', 'who', 'where', 'when', 'how', 'show', 'give', 'get', 'find', 'tell', 'me', 'my', 'i', 'you', 'your', 'member', 'members', 'patient', 'patients'}
-            words = query_lower.split()
-            search_terms = [w for w in words if w not in stop_words and len(w) > 2]
+            }}
+    
+    # Get all data
+    all_rows = worksheet.get_all_values()
+    if len(all_rows) < 2:
+        return {"early_response": {
+            "response": "No data found in the CRM sheet.",
+            "member_ids": [],
+            "connected": True
+        }}
+    
+    original_headers = [str(h).strip() for h in all_rows[0]]
+    headers = [h.lower() for h in original_headers]
+    data_rows = all_rows[1:]
+    
+    # Find relevant column indices (memoized per header row)
+    hmap = compile_headers(original_headers, worksheet.title)
+    member_id_col = hmap.find('member', 'id')
+    date_col = hmap.by_lower.get('date')
+    lead_status_col = hmap.find('lead status')
+    patient_name_col = hmap.find('patient name')
+    attender_name_col = hmap.find('attender name')
+    patient_location_col = hmap.find('patient location')
+    location_col = hmap.by_lower.get('location')
+    area_col = hmap.find('area')
+    # Phone/Mobile/Contact number column
+    email_col = hmap.find('email')
+    mobile_col = hmap.find_any('mobile', 'phone', 'contact')
+    
+    def smart_filter_rows(all_rows, query_text, headers_list):
+        """
+        Smart retrieval: Scan ALL rows and filter based on query keywords.
+        For field-specific queries (age, gender, email, etc.), return ALL rows.
+        """
+        query_lower = query_text.lower()
+        
+        # Field-specific query keywords - return ALL rows for these
+        field_keywords = ['age', 'gender', 'email', 'phone', 'mobile', 'service', 'status', 
+                        'location', 'area', 'source', 'pain', 'date', 'assigned', 'agent']
+        
+        # If query is asking about a field value, return ALL rows
+        if any(keyword in query_lower for keyword in field_keywords):
+            return all_rows
+        
+        relevant_rows = []
+        
+        # Extract potential search terms from query
+        search_terms = []
+        # Remove common words
+        stop_words = {'the', 'a', 'an', 'is', 'are', 'was', 'were', 'of', 'for', 'in', 'on', 'at', 'to', 'from', 'by', 'with', 'what', 'who', 'where', 'when', 'how', 'show', 'give', 'get', 'find', 'tell', 'me', 'my', 'i', 'you', 'your', 'member', 'members', 'patient', 'patients'}
+        words = query_lower.split()
+        search_terms = [w for w in words if w not in stop_words and len(w) > 2]
+        
+        # Scan ALL rows
+        for row in all_rows:
+            if len(row) == 0:
+                continue
             
-            # Scan ALL rows
-            for row in all_rows:
-                if len(row) == 0:
-                    continue
-                
-                # If no specific search terms, include all rows
-                if not search_terms:
-                    relevant_rows.append(row)
-                    continue
-                
-                # Check if any search term matches any cell in the row
-                row_text = ' '.join([str(cell).lower() for cell in row])
-                if any(term in row_text for term in search_terms):
-                    relevant_rows.append(row)
+            # If no specific search terms, include all rows
+            if not search_terms:
+                relevant_rows.append(row)
+                continue
             
-            return relevant_rows if relevant_rows else all_rows  # Return all if no matches
-        
-        # Smart filtering: Scan ALL rows first, then apply query-based filtering
-        query_lower = request.query.lower()
-        filter_type = (request.filter or '').lower()
+            # Check if any search term matches any cell in the row
+            row_text = ' '.join([str(cell).lower() for cell in row])
+            if any(term in row_text for term in search_terms):
+                relevant_rows.append(row)
         
-        # Step 1: Smart filter based on query (scans ALL rows)
-        query_filtered_rows = smart_filter_rows(data_rows, request.query, headers)
-        
-        # Step 2: Apply date-based filter to query-filtered rows
+        return relevant_rows if relevant_rows else all_rows  # Return all if no matches
+    
+    # Smart filtering: Scan ALL rows first, then apply query-based filtering
+    query_lower = request.query.lower()
+    filter_type = (request.filter or '').lower()
+    
+    # Step 1: Smart filter based on query (scans ALL rows)
+    query_filtered_rows = smart_filter_rows(data_rows, request.query, headers)
+    
+    # Step 2: Apply date-based filter to query-filtered rows (one pass over the rows already read)
+    due_rows = followup_index.rows_due(all_rows, filter_type)
+    if due_rows is None:
+        filtered_rows = [row for row in query_filtered_rows if len(row) > 0]
+    else:
+        query_row_ids = {id(row) for row in query_filtered_rows}
         filtered_rows = []
-        for row in query_filtered_rows:
-            if len(row) == 0:
-                continue
-            
-            # Apply filter
-            if filter_type == 'today':
-                # Check if any follow-up date is today
-                follow_dates = []
-                if follow1_col is not None and follow1_col < len(row):
-                    follow_dates.append(parse_date(row[follow1_col]))
-                if follow2_col is not None and follow2_col < len(row):
-                    follow_dates.append(parse_date(row[follow2_col]))
-                if follow3_col is not None and follow3_col < len(row):
-                    follow_dates.append(parse_date(row[follow3_col]))
+        for row_number in sorted(due_rows):
+            row = data_rows[row_number - 2] if row_number - 2 < len(data_rows) else None
+            if row and id(row) in query_row_ids:
+                filtered_rows.append(row)
+    
+    # Extract member IDs and names from filtered rows
+    member_ids = []
+    member_names = []
+    member_data = []  # Store {id, name, location, phone, fields} dictionaries
+
+    if member_id_col is not None:
+        for row in filtered_rows:
+            if member_id_col < len(row) and row[member_id_col]:
+                mid = str(row[member_id_col]).strip()
+                member_ids.append(mid)
                 
-                if not any(d == today for d in follow_dates if d):
-                    continue
-                    
-            elif filter_type == 'this_week' or filter_type == 'this week':
-                # Check if any follow-up date is within this week
-                follow_dates = []
-                if follow1_col is not None and follow1_col < len(row):
-                    follow_dates.append(parse_date(row[follow1_col]))
-                if follow2_col is not None and follow2_col < len(row):
-                    follow_dates.append(parse_date(row[follow2_col]))
-                if follow3_col is not None and follow3_col < len(row):
-                    follow_dates.append(parse_date(row[follow3_col]))
+                # Try to get patient/customer name (check both patient and attender)
+                name = ""
+                if patient_name_col is not None and patient_name_col < len(row):
+                    name = str(row[patient_name_col]).strip()
                 
-                if not any(week_ago <= d <= today for d in follow_dates if d):
-                    continue
-                    
-            elif filter_type == 'overdue':
-                # Check if any follow-up date is in the past
-                follow_dates = []
-                if follow1_col is not None and follow1_col < len(row):
-                    follow_dates.append(parse_date(row[follow1_col]))
-                if follow2_col is not None and follow2_col < len(row):
-                    follow_dates.append(parse_date(row[follow2_col]))
-                if follow3_col is not None and follow3_col < len(row):
-                    follow_dates.append(parse_date(row[follow3_col]))
+                # Also check attender name
+                attender_name = ""
+                if attender_name_col is not None and attender_name_col < len(row):
+                    attender_name = str(row[attender_name_col]).strip()
                 
-                if not any(d < today for d in follow_dates if d):
-                    continue
-            
-            filtered_rows.append(row)
-        
-        # Extract member IDs and names from filtered rows
-        member_ids = []
-        member_names = []
-        member_data = []  # Store {id, name, location, phone, fields} dictionaries
-
-        if member_id_col is not None:
-            for row in filtered_rows:
-                if member_id_col < len(row) and row[member_id_col]:
-                    mid = str(row[member_id_col]).strip()
-                    member_ids.append(mid)
-                    
-                    # Try to get patient/customer name (check both patient and attender)
-                    name = ""
-                    if patient_name_col is not None and patient_name_col < len(row):
-                        name = str(row[patient_name_col]).strip()
-                    
-                    # Also check attender name
-                    attender_name = ""
-                    if attender_name_col is not None and attender_name_col < len(row):
-                        attender_name = str(row[attender_name_col]).strip()
-                    
-                    # Prefer patient name, but use attender if patient is empty
-                    if not name and attender_name:
-                        name = attender_name
-                    
-                    # If still no name, try other name columns
-                    if not name:
-                        for i, h in enumerate(headers):
-                            if 'name' in h and i < len(row):
-                                potential_name = str(row[i]).strip()
-                                if potential_name and potential_name != mid:
-                                    name = potential_name
-                                    break
-                    
-                    name = name if name else "Unknown"
-
-                    # Determine best available location information
-                    location = ""
-                    if patient_location_col is not None and patient_location_col < len(row):
-                        location = str(row[patient_location_col]).strip()
-                    if (not location) and location_col is not None and location_col < len(row):
-                        location = str(row[location_col]).strip()
-                    if (not location) and area_col is not None and area_col < len(row):
-                        location = str(row[area_col]).strip()
-                    if not location:
-                        # Search for other location-related headers
-                        for i, h in enumerate(headers):
-                            if any(keyword in h for keyword in ['city', 'town', 'district']) and i < len(row):
-                                potential_loc = str(row[i]).strip()
-                                if potential_loc:
-                                    location = potential_loc
-                                    break
-                    location = location if location else "Unknown location"
-
-                    # Extract phone/mobile number if present
-                    phone = ""
-                    if mobile_col is not None and mobile_col < len(row):
-                        phone = str(row[mobile_col]).strip()
-
-                    email_value = ""
-                    if email_col is not None and email_col < len(row):
-                        email_value = str(row[email_col]).strip()
-
-                    # Build a field map for this row (header -> value)
-                    field_map = {}
-                    for ci, ch in enumerate(original_headers):
-                        if ci < len(row):
-                            val = str(row[ci]).strip()
-                            if val:
-                                field_map[ch] = val
-
-                    member_names.append(name)
-                    # Store both patient and attender names for AI search
-                    member_data.append({
-                        "id": mid, 
-                        "name": name, 
-                        "patient_name": name if patient_name_col is not None and patient_name_col < len(row) else "",
-                        "attender_name": attender_name,
-                        "location": location, 
-                        "phone": phone, 
-                        "fields": field_map,
-                        "email": email_value,
-                    })
-        
-        # Collect status counts for context
-        status_counts = {}
-        if lead_status_col is not None:
-            for row in filtered_rows:
-                if lead_status_col < len(row):
-                    status = str(row[lead_status_col]).strip() or 'Unknown'
-                    status_counts[status] = status_counts.get(status, 0) + 1
-        
-        # Detect special commands (e.g., send mail)
-        response_text = None
-        send_mail_triggered = False
-        query_lower = request.query.lower()
-
-        if "send mail" in query_lower and "follow" in query_lower:
-            send_mail_triggered = True
-            target_member: Optional[Dict[str, Any]] = None
-            target_member_id = None
-
-            id_match = re.search(r"(mid-[\w-]+)", request.query, flags=re.IGNORECASE)
-            if id_match:
-                target_member_id = id_match.group(1).upper()
-
-            if target_member_id:
-                target_member = next((m for m in member_data if m.get("id", "").upper() == target_member_id), None)
-            else:
-                for item in member_data:
-                    name_candidates = [item.get('name'), item.get('patient_name'), item.get('attender_name')]
-                    for candidate in name_candidates:
-                        if candidate and candidate.lower() in query_lower:
-                            target_member = item
-                            break
-                    if target_member:
+                # Prefer patient name, but use attender if patient is empty
+                if not name and attender_name:
+                    name = attender_name
+                
+                # If still no name, try other name columns
+                if not name:
+                    for i, h in enumerate(headers):
+                        if 'name' in h and i < len(row):
+                            potential_name = str(row[i]).strip()
+                            if potential_name and potential_name != mid:
+                                name = potential_name
+                                break
+                
+                name = name if name else "Unknown"
+
+                # Determine best available location information
+                location = ""
+                if patient_location_col is not None and patient_location_col < len(row):
+                    location = str(row[patient_location_col]).strip()
+                if (not location) and location_col is not None and location_col < len(row):
+                    location = str(row[location_col]).strip()
+                if (not location) and area_col is not None and area_col < len(row):
+                    location = str(row[area_col]).strip()
+                if not location:
+                    # Search for other location-related headers
+                    for i, h in enumerate(headers):
+                        if any(keyword in h for keyword in ['city', 'town', 'district']) and i < len(row):
+                            potential_loc = str(row[i]).strip()
+                            if potential_loc:
+                                location = potential_loc
+                                break
+                location = location if location else "Unknown location"
+
+                # Extract phone/mobile number if present
+                phone = ""
+                if mobile_col is not None and mobile_col < len(row):
+                    phone = str(row[mobile_col]).strip()
+
+                email_value = ""
+                if email_col is not None and email_col < len(row):
+                    email_value = str(row[email_col]).strip()
+
+                # Build a field map for this row (header -> value)
+                field_map = {}
+                for ci, ch in enumerate(original_headers):
+                    if ci < len(row):
+                        val = str(row[ci]).strip()
+                        if val:
+                            field_map[ch] = val
+
+                member_names.append(name)
+                # Store both patient and attender names for AI search
+                member_data.append({
+                    "id": mid, 
+                    "name": name, 
+                    "patient_name": name if patient_name_col is not None and patient_name_col < len(row) else "",
+                    "attender_name": attender_name,
+                    "location": location, 
+                    "phone": phone, 
+                    "fields": field_map,
+                    "email": email_value,
+                })
+    
+    # Collect status counts for context
+    status_counts = {}
+    if lead_status_col is not None:
+        for row in filtered_rows:
+            if lead_status_col < len(row):
+                status = str(row[lead_status_col]).strip() or 'Unknown'
+                status_counts[status] = status_counts.get(status, 0) + 1
+    
+    # Detect special commands (e.g., send mail)
+    response_text = None
+    send_mail_triggered = False
+    query_lower = request.query.lower()
+
+    if "send mail" in query_lower and "follow" in query_lower:
+        send_mail_triggered = True
+        target_member: Optional[Dict[str, Any]] = None
+        target_member_id = None
+
+        id_match = re.search(r"(mid-[\w-]+)", request.query, flags=re.IGNORECASE)
+        if id_match:
+            target_member_id = id_match.group(1).upper()
+
+        if target_member_id:
+            target_member = next((m for m in member_data if m.get("id", "").upper() == target_member_id), None)
+        else:
+            for item in member_data:
+                name_candidates = [item.get('name'), item.get('patient_name'), item.get('attender_name')]
+                for candidate in name_candidates:
+                    if candidate and candidate.lower() in query_lower:
+                        target_member = item
                         break
+                if target_member:
+                    break
 
-            if target_member:
-                recipient_email = target_member.get("email")
-                if not recipient_email and target_member.get("fields"):
-                    for k, v in target_member["fields"].items():
-                        if 'email' in k.lower() and str(v).strip():
-                            recipient_email = str(v).strip()
-                            break
-
-                if recipient_email:
-                    background_tasks.add_task(send_follow_email, recipient_email, target_member, request.query)
-                    response_text = (
-                        f"Scheduled follow-up email to {recipient_email} for "
-                        f"{target_member.get('name', 'the member')} ({target_member.get('id')})."
-                    )
-                else:
-                    response_text = (
-                        f"I found {target_member.get('id')} but there is no email address on file."
-                    )
+        if target_member:
+            recipient_email = target_member.get("email")
+            if not recipient_email and target_member.get("fields"):
+                for k, v in target_member["fields"].items():
+                    if 'email' in k.lower() and str(v).strip():
+                        recipient_email = str(v).strip()
+                        break
+
+            if recipient_email:
+                background_tasks.add_task(send_follow_email, recipient_email, target_member, request.query)
+                response_text = (
+                    f"Scheduled follow-up email to {recipient_email} for "
+                    f"{target_member.get('name', 'the member')} ({target_member.get('id')})."
+                )
             else:
-                response_text = "I could not identify which member to email. Please include the member name or ID."
+                response_text = (
+                    f"I found {target_member.get('id')} but there is no email address on file."
+                )
+        else:
+            response_text = "I could not identify which member to email. Please include the member name or ID."
 
-        # Build CRM data summary for AI with names
-        crm_summary_parts = [
-            f"Total records: {len(filtered_rows)}",
-            f"Filter applied: {filter_type or 'none'}",
-            f"Members found: {len(member_ids)}"
-        ]
-        # Include ALL available fields (schema) to allow AI to use any column dynamically
-        if original_headers:
-            hdr_text = ", ".join(original_headers)
-            crm_summary_parts.append(f"Available fields: {hdr_text}")
-        
-        # Add member details (ID + Name) for AI context - ALL members for real-time accuracy
-        if member_data:
-            member_details = []
-            for item in member_data:  # Include ALL members, no limit
-                # Show both patient and attender names if different - COMPACT format
-                att = item.get('attender_name', '')
-                pat = item.get('patient_name', '')
-                
-                if att and pat and att != pat:
-                    # Both names present and different
-                    name_part = f"{att}/{pat}"
-                elif att:
-                    name_part = att
-                elif pat:
-                    name_part = pat
-                else:
-                    name_part = item['name']
-                
-                # Compact format: ID(Name-Location-Phone)
-                parts = [item['id'], f"({name_part}"]
-                if item.get('location') and item['location'] != 'Unknown location':
-                    parts[-1] += f"-{item['location']}"
-                if item.get('phone'):
-                    parts[-1] += f"-{item['phone']}"
-                parts[-1] += ")"
-                member_details.append("".join(parts))
-            crm_summary_parts.append(f"Members: {', '.join(member_details)}")
+    # Build CRM data summary for AI with names
+    crm_summary_parts = [
+        f"Total records: {len(filtered_rows)}",
+        f"Filter applied: {filter_type or 'none'}",
+        f"Members found: {len(member_ids)}"
+    ]
+    # Include ALL available fields (schema) to allow AI to use any column dynamically
+    if original_headers:
+        hdr_text = ", ".join(original_headers)
+        crm_summary_parts.append(f"Available fields: {hdr_text}")
+    
+    # Add member details (ID + Name) for AI context - ALL members for real-time accuracy
+    if member_data:
+        member_details = []
+        for item in member_data:  # Include ALL members, no limit
+            # Show both patient and attender names if different - COMPACT format
+            att = item.get('attender_name', '')
+            pat = item.get('patient_name', '')
             
-            # Add field details for queries asking about specific fields
-            query_lower_check = request.query.lower()
-            field_query_keywords = ['age', 'gender', 'email', 'service', 'pain', 'source', 'agent', 'assigned']
-            if any(kw in query_lower_check for kw in field_query_keywords):
-                # Include relevant field data for ALL members
-                field_lines = []
-                for item in member_data[:50]:  # Limit to 50 for token efficiency
-                    fm = item.get('fields') or {}
-                    # Extract fields mentioned in query
-                    relevant_fields = {}
-                    for field_name, field_value in fm.items():
-                        field_lower = field_name.lower()
-                        if any(kw in field_lower for kw in field_query_keywords):
-                            relevant_fields[field_name] = field_value
-                    if relevant_fields:
-                        field_str = "; ".join([f"{k}={v}" for k, v in relevant_fields.items()])
-                        field_lines.append(f"{item['id']}: {field_str}")
-                if field_lines:
-                    crm_summary_parts.append(f"Field details: {' | '.join(field_lines)}")
-        
-        if status_counts:
-            status_summary = ', '.join([f"{k}: {v}" for k, v in status_counts.items()])
-            crm_summary_parts.append(f"Lead statuses: {status_summary}")
-        
-        if filter_type == 'today':
-            crm_summary_parts.append("These members need follow-up TODAY")
-        elif filter_type == 'this_week' or filter_type == 'this week':
-            crm_summary_parts.append("These members need follow-up THIS WEEK")
-        elif filter_type == 'overdue':
-            crm_summary_parts.append("These follow-ups are OVERDUE")
-        
-        crm_data_summary = "\n".join(crm_summary_parts)
+            if att and pat and att != pat:
+                # Both names present and different
+                name_part = f"{att}/{pat}"
+            elif att:
+                name_part = att
+            elif pat:
+                name_part = pat
+            else:
+                name_part = item['name']
+            
+            # Compact format: ID(Name-Location-Phone)
+            parts = [item['id'], f"({name_part}"]
+            if item.get('location') and item['location'] != 'Unknown location':
+                parts[-1] += f"-{item['location']}"
+            if item.get('phone'):
+                parts[-1] += f"-{item['phone']}"
+            parts[-1] += ")"
+            member_details.append("".join(parts))
+        crm_summary_parts.append(f"Members: {', '.join(member_details)}")
+        
+        # Add field details for queries asking about specific fields
+        query_lower_check = request.query.lower()
+        field_query_keywords = ['age', 'gender', 'email', 'service', 'pain', 'source', 'agent', 'assigned']
+        if any(kw in query_lower_check for kw in field_query_keywords):
+            # Include relevant field data for ALL members
+            field_lines = []
+            for item in member_data[:50]:  # Limit to 50 for token efficiency
+                fm = item.get('fields') or {}
+                # Extract fields mentioned in query
+                relevant_fields = {}
+                for field_name, field_value in fm.items():
+                    field_lower = field_name.lower()
+                    if any(kw in field_lower for kw in field_query_keywords):
+                        relevant_fields[field_name] = field_value
+                if relevant_fields:
+                    field_str = "; ".join([f"{k}={v}" for k, v in relevant_fields.items()])
+                    field_lines.append(f"{item['id']}: {field_str}")
+            if field_lines:
+                crm_summary_parts.append(f"Field details: {' | '.join(field_lines)}")
+    
+    if status_counts:
+        status_summary = ', '.join([f"{k}: {v}" for k, v in status_counts.items()])
+        crm_summary_parts.append(f"Lead statuses: {status_summary}")
+    
+    if filter_type == 'today':
+        crm_summary_parts.append("These members need follow-up TODAY")
+    elif filter_type == 'this_week' or filter_type == 'this week':
+        crm_summary_parts.append("These members need follow-up THIS WEEK")
+    elif filter_type == 'overdue':
+        crm_summary_parts.append("These follow-ups are OVERDUE")
+    
+    crm_data_summary = "\n".join(crm_summary_parts)
+
+    return {
+        "query_lower": query_lower,
+        "filter_type": filter_type,
+        "filtered_rows": filtered_rows,
+        "member_ids": member_ids,
+        "member_data": member_data,
+        "status_counts": status_counts,
+        "response_text": response_text,
+        "crm_data_summary": crm_data_summary,
+    }
+
+
+async def ai_crm_chat_events(request: AIChatRequest, background_tasks: BackgroundTasks) -> AsyncIterator[str]:
+    """
+    SSE event stream for the AI CRM chat.
+
+    Order of events: `member_ids` (as soon as the sheet has been filtered),
+    `token` (one per LLM delta), `summary` (special-command reply or the
+    rule-based generate_fallback_response text), then `done`.
+    """
+    # Flush the first byte before the (slow) Sheets read
+    yield format_sse_comment("connected")
+
+    try:
+        ctx = await run_in_threadpool(build_ai_crm_context, request, background_tasks)
+    except Exception as e:
+        print(f"AI Chat stream error: {e}")
+        yield format_sse("error", {"response": f"Sorry, I encountered an error: {str(e)}.", "connected": False})
+        return
+
+    if "early_response" in ctx:
+        early = ctx["early_response"]
+        yield format_sse("member_ids", {"member_ids": [], "count": 0, "connected": early.get("connected", False)})
+        yield format_sse("summary", {"response": early.get("response", ""), "ai": False})
+        yield format_sse("done", {"count": 0})
+        return
+
+    member_ids = ctx["member_ids"]
+    filtered_rows = ctx["filtered_rows"]
+    yield format_sse("member_ids", {"member_ids": member_ids, "count": len(filtered_rows), "connected": True})
+
+    streamed_tokens = 0
+    if ctx["response_text"] is None and AI_ENABLED:
+        print(f"🤖 Streaming {AI_PROVIDER.upper()} AI for query: {request.query}")
+        async for delta in stream_ai_completion(request.query, ctx["crm_data_summary"]):
+            streamed_tokens += 1
+            yield format_sse("token", {"text": delta})
+        if not streamed_tokens:
+            print("⚠️ AI stream returned nothing, using fallback")
+
+    summary = ctx["response_text"]
+    if summary is None:
+        summary = generate_fallback_response(
+            query_lower=ctx["query_lower"],
+            filter_type=ctx["filter_type"],
+            filtered_rows=filtered_rows,
+            member_ids=member_ids,
+            status_counts=ctx["status_counts"],
+            member_data=ctx["member_data"]
+        )
+    yield format_sse("summary", {"response": summary, "ai": streamed_tokens > 0})
+    yield format_sse("done", {"count": len(filtered_rows)})
+
+
+@app.post("/api/ai-crm/chat")
+async def ai_crm_chat(request: AIChatRequest, background_tasks: BackgroundTasks, http_request: Request):
+    """
+    AI CRM Chat endpoint - queries Google Sheets data based on user input.
+    Supports filters: today, this_week, overdue
+    Set "stream": true to receive Server-Sent Events (see ai_crm_chat_events).
+    """
+    if request.stream:
+        return sse_response(http_request, ai_crm_chat_events(request, background_tasks))
+
+    try:
+        ctx = build_ai_crm_context(request, background_tasks)
+        if "early_response" in ctx:
+            return ctx["early_response"]
+
+        query_lower = ctx["query_lower"]
+        filter_type = ctx["filter_type"]
+        filtered_rows = ctx["filtered_rows"]
+        member_ids = ctx["member_ids"]
+        member_data = ctx["member_data"]
+        status_counts = ctx["status_counts"]
+        response_text = ctx["response_text"]
+        crm_data_summary = ctx["crm_data_summary"]
         
         # Try to get AI-powered response first (only if no special command handled it)
         ai_response_text = None
@@ -5344,11 +4736,29 @@ async def update_charge_settings(settings: Settings):
 # ============ Dropdown Management API Endpoints ============
 
 @app.get("/api/dropdown-options")
-async def api_get_all_dropdown_options():
-    """Get all dropdown fields and their options from DropdownOption sheet."""
+async def api_get_all_dropdown_options(request: Request, since: Optional[int] = None):
+    """
+    Get all dropdown fields and their options from DropdownOption sheet.
+    With ?since=<version> only the changes after that version are returned, unless the
+    client has to reload in full (then "full" is true and all options are sent).
+    """
     try:
+        # The store version moves on every option change, made here or in the sheet
+        version = http_cache.dataset_version(extra=[f"dropdown_options@{field_options.version()}"])
+        cached = http_cache.not_modified(request, version)
+        if cached is not None:
+            return cached
+        if since is not None:
+            current, changes = field_options.changes_since(since)
+            if changes is not None:
+                return http_cache.json_response(
+                    request, {"status": "success", "version": current, "since": since, "changes": changes}, version
+                )
+        current = field_options.version()
         options = get_all_dropdown_options()
-        return {"status": "success", "dropdown_options": options}
+        return http_cache.json_response(
+            request, {"status": "success", "version": current, "full": True, "dropdown_options": options}, version
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching dropdown options: {str(e)}")
 
@@ -5370,8 +4780,7 @@ async def api_add_dropdown_option(field_name: str, option: str = Body(..., embed
         if not option or not option.strip():
             raise HTTPException(status_code=400, detail="Option cannot be empty")
         
-        result = add_dropdown_option(field_name, option.strip())
-        return result
+        return add_dropdown_option(field_name, option.strip())
     except HTTPException:
         raise
     except Exception as e:
@@ -5382,8 +4791,7 @@ async def api_add_dropdown_option(field_name: str, option: str = Body(..., embed
 async def api_delete_dropdown_option(field_name: str, option: str):
     """Remove an option from a dropdown field."""
     try:
-        result = delete_dropdown_option(field_name, option)
-        return result
+        return delete_dropdown_option(field_name, option)
     except HTTPException:
         raise
     except Exception as e:
@@ -5408,15 +4816,6 @@ async def api_sync_schema_sheet():
         raise HTTPException(status_code=500, detail=f"Error syncing: {str(e)}")
 
 
-@app.get("/api/settings/charges")
-async def get_charge_settings():
-    return load_settings()
-
-@app.post("/api/settings/charges")
-async def update_charge_settings(settings: Settings):
-    save_settings(settings)
-    return {"status": "success", "settings": settings}
-
 @app.get("/admission-details")
 async def get_admission_details(member_id: str = Query(...)):
     """Fetch details for a specific patient by Member ID from Patient Admission sheet."""
@@ -5455,492 +4854,16 @@ async def get_admission_details(member_id: str = Query(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-class DischargePayload(BaseModel):
-    patient_data: Dict[str, Any]
-    billing_data: Dict[str, Any]
-    totals: Dict[str, Any]
-    calculated_days: int
-
-@app.post("/generate-discharge-summary")
-async def generate_discharge_summary(payload: dict):
-    try:
-        patient = payload.get("patient_data", {})
-        totals = payload.get("totals", {})
-        billing_data = payload.get("billing_data", {})
-        days = payload.get("calculated_days", 1)
-
-        if not patient or not totals:
-            raise Exception("Missing patient or billing data")
-
-        buffer = io.BytesIO()
-
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.colors import HexColor, black, white, lightgrey
-        from reportlab.lib.units import mm
-        from reportlab.lib.utils import ImageReader
-
-        c = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-        
-        # Colors
-        primary_green = HexColor("#2E7D32")
-        dark_gray = HexColor("#333333")
-        light_gray = HexColor("#666666")
-        border_gray = HexColor("#E0E0E0")
-        bg_light = HexColor("#F5F5F5")
-        section_bg = HexColor("#F8F9FA")
-        
-        # Logo path
-        logo_path = os.path.join(os.path.dirname(__file__), "Gw- Logo new (2) (1).png")
-        
-        # Page settings
-        header_height = 100
-        footer_height = 50
-        margin_left = 40
-        margin_right = 40
-        content_width = width - margin_left - margin_right
-        
-        # Track current page
-        page_num = [1]
-        
-        # Helper function to get patient value with multiple key attempts
-        def get_patient_val(keys):
-            if isinstance(keys, str):
-                keys = [keys]
-            for key in keys:
-                if key in patient and patient[key]:
-                    return str(patient[key])
-                lower_key = key.lower()
-                for pk in patient:
-                    if pk.lower() == lower_key and patient[pk]:
-                        return str(patient[pk])
-                    if pk.lower().replace(" ", "").replace("_", "") == lower_key.replace(" ", "").replace("_", "") and patient[pk]:
-                        return str(patient[pk])
-            return "-"
-        
-        def draw_header():
-            """Draw header on each page"""
-            # Header background
-            c.setFillColor(white)
-            c.rect(0, height - header_height, width, header_height, fill=1, stroke=0)
-            
-            # Logo
-            if os.path.exists(logo_path):
-                try:
-                    logo = ImageReader(logo_path)
-                    c.drawImage(logo, 30, height - 85, width=70, height=70, preserveAspectRatio=True, mask='auto')
-                except Exception as logo_err:
-                    print(f"Logo error: {logo_err}")
-            
-            # Hospital name and details
-            c.setFillColor(dark_gray)
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(110, height - 35, "GRAND WORLD ELDER CARE")
-            
-            c.setFont("Helvetica", 8)
-            c.setFillColor(light_gray)
-            c.drawString(110, height - 48, "Assisted Living  |  Clinics  |  Home Nursing")
-            c.drawString(110, height - 60, "Contact: +91-XXXXXXXXXX  |  Email: info@grandworld.com")
-            c.drawString(110, height - 72, "Address: Chennai, Tamil Nadu, India")
-            
-            # Document title - right aligned
-            c.setFillColor(primary_green)
-            c.setFont("Helvetica-Bold", 14)
-            c.drawRightString(width - 40, height - 35, "DISCHARGE SUMMARY")
-            
-            # Date - right aligned below title
-            c.setFont("Helvetica", 9)
-            c.setFillColor(light_gray)
-            current_date = datetime.now().strftime("%d %B %Y")
-            c.drawRightString(width - 40, height - 50, f"Date: {current_date}")
-            
-            # Header bottom border
-            c.setStrokeColor(primary_green)
-            c.setLineWidth(2)
-            c.line(30, height - header_height, width - 30, height - header_height)
-        
-        def draw_footer():
-            """Draw footer on each page"""
-            c.setStrokeColor(primary_green)
-            c.setLineWidth(1)
-            c.line(30, footer_height, width - 30, footer_height)
-            
-            c.setFont("Helvetica", 7)
-            c.setFillColor(light_gray)
-            c.drawCentredString(width / 2, footer_height - 15, "This is a computer-generated document. For any queries, please contact the hospital administration.")
-            c.drawCentredString(width / 2, footer_height - 27, "Thank you for choosing Grand World Elder Care. Wishing you good health!")
-            
-            # Page number
-            c.drawRightString(width - 40, footer_height - 15, f"Page {page_num[0]}")
-        
-        def check_page_break(y_pos, needed_space=100):
-            """Check if we need a new page and create one if necessary"""
-            if y_pos < footer_height + needed_space:
-                draw_footer()
-                c.showPage()
-                page_num[0] += 1
-                draw_header()
-                return height - header_height - 25
-            return y_pos
-        
-        def draw_section_header(y_pos, title):
-            """Draw a section header with consistent styling"""
-            y_pos = check_page_break(y_pos, 80)
-            c.setFillColor(primary_green)
-            c.setFont("Helvetica-Bold", 11)
-            c.drawString(margin_left, y_pos, title)
-            y_pos -= 5
-            c.setStrokeColor(primary_green)
-            c.setLineWidth(1)
-            c.line(margin_left, y_pos, margin_left + 180, y_pos)
-            return y_pos - 18
-        
-        def draw_field(x, y_pos, label, value, label_width=95):
-            """Draw a field with label and value"""
-            c.setFont("Helvetica-Bold", 8)
-            c.setFillColor(dark_gray)
-            c.drawString(x, y_pos, f"{label}:")
-            c.setFont("Helvetica", 8)
-            c.setFillColor(light_gray)
-            # Truncate long values
-            val_str = str(value) if value and value != "-" else "-"
-            if len(val_str) > 30:
-                val_str = val_str[:27] + "..."
-            c.drawString(x + label_width, y_pos, val_str)
-        
-        def draw_field_full_width(y_pos, label, value):
-            """Draw a field that spans full width for long text"""
-            y_pos = check_page_break(y_pos, 30)
-            c.setFont("Helvetica-Bold", 8)
-            c.setFillColor(dark_gray)
-            c.drawString(margin_left, y_pos, f"{label}:")
-            c.setFont("Helvetica", 8)
-            c.setFillColor(light_gray)
-            val_str = str(value) if value and value != "-" else "-"
-            # Word wrap for long text
-            if len(val_str) > 80:
-                words = val_str.split()
-                lines = []
-                current_line = ""
-                for word in words:
-                    if len(current_line + " " + word) < 80:
-                        current_line = current_line + " " + word if current_line else word
-                    else:
-                        lines.append(current_line)
-                        current_line = word
-                if current_line:
-                    lines.append(current_line)
-                y_pos -= 12
-                for line in lines[:3]:  # Max 3 lines
-                    c.drawString(margin_left + 10, y_pos, line.strip())
-                    y_pos -= 12
-            else:
-                c.drawString(margin_left + 100, y_pos, val_str)
-                y_pos -= 15
-            return y_pos
-        
-        # ==================== START DRAWING ====================
-        draw_header()
-        y = height - header_height - 25
-        
-        left_col = margin_left
-        right_col = margin_left + 270
-        
-        # ==================== 1. PATIENT INFORMATION ====================
-        y = draw_section_header(y, "PATIENT INFORMATION")
-        
-        # Row 1
-        draw_field(left_col, y, "Member ID", get_patient_val(["memberidkey", "member_id_key", "memberid", "id"]))
-        draw_field(right_col, y, "Registration Date", get_patient_val(["date", "registration_date", "reg_date"]))
-        y -= 15
-        
-        # Row 2
-        draw_field(left_col, y, "Patient Name", get_patient_val(["patientname", "patient_name", "name", "firstname"]))
-        draw_field(right_col, y, "Last Name", get_patient_val(["patientlastname", "patient_last_name", "lastname"]))
-        y -= 15
-        
-        # Row 3
-        draw_field(left_col, y, "Gender", get_patient_val(["gender", "sex"]))
-        draw_field(right_col, y, "Date of Birth", get_patient_val(["dateofbirth", "date_of_birth", "dob"]))
-        y -= 15
-        
-        # Row 4
-        draw_field(left_col, y, "Age", get_patient_val(["age"]))
-        draw_field(right_col, y, "Blood Group", get_patient_val(["patientblood", "patient_blood", "bloodgroup", "blood_group", "blood"]))
-        y -= 15
-        
-        # Row 5
-        draw_field(left_col, y, "Marital Status", get_patient_val(["patientmaritalstatus", "patient_marital_status", "maritalstatus"]))
-        draw_field(right_col, y, "Nationality", get_patient_val(["nationality"]))
-        y -= 15
-        
-        # Row 6
-        draw_field(left_col, y, "Religion", get_patient_val(["religion"]))
-        draw_field(right_col, y, "Aadhaar No", get_patient_val(["aadhaar", "aadhar", "aadhaar_no"]))
-        y -= 15
-        
-        # Row 7
-        draw_field(left_col, y, "ID Proof Type", get_patient_val(["idprooftype", "id_proof_type"]))
-        draw_field(right_col, y, "ID Proof Number", get_patient_val(["idproofnumber", "id_proof_number"]))
-        y -= 25
-        
-        # ==================== 2. CONTACT INFORMATION ====================
-        y = draw_section_header(y, "CONTACT INFORMATION")
-        
-        # Row 1
-        draw_field(left_col, y, "Mobile Number", get_patient_val(["mobilenumber", "mobile_number", "mobile", "phone", "contact"]))
-        draw_field(right_col, y, "Email ID", get_patient_val(["emailid", "email_id", "email"]))
-        y -= 15
-        
-        # Row 2
-        draw_field(left_col, y, "Door Number", get_patient_val(["doornumber", "door_number"]))
-        draw_field(right_col, y, "Street", get_patient_val(["street"]))
-        y -= 15
-        
-        # Row 3
-        draw_field(left_col, y, "City", get_patient_val(["city", "area"]))
-        draw_field(right_col, y, "District", get_patient_val(["district", "patientlocation", "patient_location"]))
-        y -= 15
-        
-        # Row 4
-        draw_field(left_col, y, "State", get_patient_val(["state"]))
-        draw_field(right_col, y, "Pin Code", get_patient_val(["pincode", "pin_code"]))
-        y -= 25
-        
-        # ==================== 3. EMERGENCY CONTACT ====================
-        y = draw_section_header(y, "EMERGENCY CONTACT DETAILS")
-        
-        # Row 1
-        draw_field(left_col, y, "Contact Name", get_patient_val(["relationalname", "relational_name", "attendername", "attender_name", "emergencyname"]))
-        draw_field(right_col, y, "Relationship", get_patient_val(["relationalrelationship", "relational_relationship", "relationship"]))
-        y -= 15
-        
-        # Row 2
-        draw_field(left_col, y, "Contact Mobile", get_patient_val(["relationalmobile", "relational_mobile", "emergencymobile"]))
-        draw_field(right_col, y, "Alt. Mobile", get_patient_val(["relationalmobilealternative", "relational_mobile_alternative", "altmobile"]))
-        y -= 15
-        
-        # Emergency Address
-        y = draw_field_full_width(y, "Emergency Address", get_patient_val(["emergencyaddress", "emergency_address"]))
-        y -= 10
-        
-        # ==================== 4. MEDICAL HISTORY ====================
-        y = draw_section_header(y, "MEDICAL HISTORY")
-        
-        # Row 1
-        draw_field(left_col, y, "Current Status", get_patient_val(["patientcurrentstatus", "patient_current_status", "currentstatus"]))
-        draw_field(right_col, y, "Sugar Level", get_patient_val(["patientsugarlevel", "patient_sugar_level", "sugarlevel"]))
-        y -= 15
-        
-        # Row 2
-        draw_field(left_col, y, "Pain Point", get_patient_val(["painpoint", "pain_point"]))
-        draw_field(right_col, y, "Allergies", get_patient_val(["patientallergy", "patient_allergy", "allergy", "allergies"]))
-        y -= 15
-        
-        # Medical History (full width)
-        y = draw_field_full_width(y, "Medical History", get_patient_val(["patientmedicalhistory", "patient_medical_history", "medicalhistory"]))
-        y -= 10
-        
-        # ==================== 5. SERVICE DETAILS ====================
-        y = draw_section_header(y, "SERVICE DETAILS")
-        
-        # Row 1
-        draw_field(left_col, y, "Service Type", get_patient_val(["service", "servicetype", "service_type"]))
-        draw_field(right_col, y, "Enquiry For", get_patient_val(["enquirymadefor", "enquiry_made_for", "enquiry"]))
-        y -= 15
-        
-        # Row 2
-        draw_field(left_col, y, "Services Provided", get_patient_val(["providingservices", "providing_services", "serviceprovided"]))
-        draw_field(right_col, y, "Hospital Location", get_patient_val(["hospitallocation", "hospital_location"]))
-        y -= 15
-        
-        # Row 3
-        draw_field(left_col, y, "Caretaker Name", get_patient_val(["caretakername", "caretaker_name"]))
-        draw_field(right_col, y, "Source", get_patient_val(["source"]))
-        y -= 25
-        
-        # ==================== 6. ADMISSION DETAILS ====================
-        y = draw_section_header(y, "ADMISSION DETAILS")
-        
-        # Row 1
-        draw_field(left_col, y, "Check-In Date", get_patient_val(["checkindate", "check_in_date", "admissiondate", "admission_date"]))
-        draw_field(right_col, y, "Check-Out Date", get_patient_val(["checkoutdate", "check_out_date", "dischargedate", "discharge_date"]))
-        y -= 15
-        
-        # Row 2
-        draw_field(left_col, y, "Room Type", get_patient_val(["roomtype", "room_type", "room"]))
-        draw_field(right_col, y, "Room Rent", get_patient_val(["roomrent", "room_rent"]))
-        y -= 15
-        
-        # Row 3
-        draw_field(left_col, y, "Bed No", get_patient_val(["bedno", "bed_no", "bed"]))
-        draw_field(right_col, y, "Total Stay", f"{days} Day(s)")
-        y -= 15
-        
-        # Row 4
-        draw_field(left_col, y, "Attender Name", get_patient_val(["attendername", "attender_name"]))
-        draw_field(right_col, y, "Lead Status", get_patient_val(["leadstatus", "lead_status", "status"]))
-        y -= 25
-
-        # ==================== 7. BILLING SUMMARY ====================
-        y = check_page_break(y, 220)  # Need space for billing table
-        y = draw_section_header(y, "BILLING SUMMARY")
-
-        # Table settings
-        table_left = margin_left
-        table_right = width - margin_right
-        table_width = table_right - table_left
-        row_height = 20
-
-        # Table header
-        c.setFillColor(primary_green)
-        c.rect(table_left, y - row_height + 5, table_width, row_height, fill=1, stroke=0)
-
-        c.setFillColor(white)
-        c.setFont("Helvetica-Bold", 8)
-        c.drawString(table_left + 10, y - 10, "Description")
-        c.drawString(table_left + 220, y - 10, "Rate/Day (₹)")
-        c.drawString(table_left + 320, y - 10, "Days")
-        c.drawRightString(table_right - 10, y - 10, "Amount (₹)")
-        y -= row_height
-
-        def draw_table_row(y_pos, desc, rate, days_count, amount, is_fixed=False, alt_bg=False):
-            if alt_bg:
-                c.setFillColor(bg_light)
-            else:
-                c.setFillColor(white)
-            c.rect(table_left, y_pos - row_height + 5, table_width, row_height, fill=1, stroke=0)
-
-            c.setFillColor(dark_gray)
-            c.setFont("Helvetica", 8)
-            c.drawString(table_left + 10, y_pos - 10, desc)
-
-            if is_fixed:
-                c.drawString(table_left + 220, y_pos - 10, "-")
-                c.drawString(table_left + 320, y_pos - 10, "-")
-            else:
-                c.drawString(table_left + 220, y_pos - 10, f"{rate:,.0f}" if rate else "0")
-                c.drawString(table_left + 320, y_pos - 10, str(days_count))
-
-            c.drawRightString(table_right - 10, y_pos - 10, f"{amount:,.0f}" if amount else "0")
-            return y_pos - row_height
-
-        # Daily charges
-        room_rate = billing_data.get("room_charge", 0)
-        bed_rate = billing_data.get("bed_charge", 0)
-        nurse_rate = billing_data.get("nurse_payment", 0)
-        additional_nurse_rate = billing_data.get("additional_nurse_payment", 0)
-        other_charges_rate = billing_data.get("other_charges_amenities", 0)
-        hospital_rate = billing_data.get("hospital_payment", 0)
-
-        y = draw_table_row(y, "Room Charge", room_rate, days, totals.get("room", 0), alt_bg=True)
-        y = draw_table_row(y, "Bed Charge", bed_rate, days, totals.get("bed", 0), alt_bg=False)
-        y = draw_table_row(y, "Nursing Fee", nurse_rate, days, totals.get("nurse", 0), alt_bg=True)
-        y = draw_table_row(y, "Additional Nursing Fee", additional_nurse_rate, days, totals.get("additional_nurse", 0), alt_bg=False)
-        y = draw_table_row(y, "Other Charges (Amenities)", other_charges_rate, days, totals.get("other_charges", 0), alt_bg=True)
-        y = draw_table_row(y, "Hospital Fee", hospital_rate, days, totals.get("hospital", 0), alt_bg=False)
-
-        # Fixed charges
-        y = draw_table_row(y, "Doctor Fee", 0, 0, totals.get("doctor", 0), is_fixed=True, alt_bg=True)
-        y = draw_table_row(y, "Service Charge", 0, 0, totals.get("service", 0), is_fixed=True, alt_bg=False)
-        
-        # Discount (subtract from total)
-        discount_amount = totals.get("discount", 0)
-        if discount_amount > 0:
-            y = draw_table_row(y, "Discount", 0, 0, -discount_amount, is_fixed=True, alt_bg=True)
-
-        # Grand total row with extra spacing below
-        y -= 3
-        c.setFillColor(primary_green)
-        c.rect(table_left, y - row_height + 5, table_width, row_height, fill=1, stroke=0)
-
-        c.setFillColor(white)
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(table_left + 10, y - 11, "GRAND TOTAL")
-        grand_total = totals.get("grand", 0)
-        c.drawRightString(table_right - 10, y - 11, f"₹ {grand_total:,.0f}")
-        y -= row_height + 90  # extra gap after grand total
-
-        # Amount in words
-        y = check_page_break(y, 160)
-
-        def number_to_words(num):
-            ones = ['', 'One', 'Two', 'Three', 'Four', 'Five', 'Six', 'Seven', 'Eight', 'Nine',
-                    'Ten', 'Eleven', 'Twelve', 'Thirteen', 'Fourteen', 'Fifteen', 'Sixteen',
-                    'Seventeen', 'Eighteen', 'Nineteen']
-            tens = ['', '', 'Twenty', 'Thirty', 'Forty', 'Fifty', 'Sixty', 'Seventy', 'Eighty', 'Ninety']
-
-            if num == 0:
-                return 'Zero'
-            num = int(num)
-            if num < 20:
-                return ones[num]
-            elif num < 100:
-                return tens[num // 10] + ('' if num % 10 == 0 else ' ' + ones[num % 10])
-            elif num < 1000:
-                return ones[num // 100] + ' Hundred' + ('' if num % 100 == 0 else ' and ' + number_to_words(num % 100))
-            elif num < 100000:
-                return number_to_words(num // 1000) + ' Thousand' + ('' if num % 1000 == 0 else ' ' + number_to_words(num % 1000))
-            elif num < 10000000:
-                return number_to_words(num // 100000) + ' Lakh' + ('' if num % 100000 == 0 else ' ' + number_to_words(num % 100000))
-            else:
-                return number_to_words(num // 10000000) + ' Crore' + ('' if num % 10000000 == 0 else ' ' + number_to_words(num % 10000000))
-
-        amount_words = number_to_words(grand_total) + " Rupees Only"
-        c.setFillColor(dark_gray)
-        c.setFont("Helvetica-Bold", 8)
-        c.drawString(margin_left, y, "Amount in Words:")
-        c.setFont("Helvetica-Oblique", 8)
-        c.drawString(margin_left + 90, y, amount_words)
-        y -= 70  # extra gap before signatures
-
-        # Signatures section
-        y = check_page_break(y, 120)
-        c.setStrokeColor(border_gray)
-        c.setLineWidth(0.5)
-        c.line(margin_left, y + 10, width - margin_right, y + 10)
-
-        sig_y = y - 25
-        c.setFont("Helvetica", 8)
-        c.setFillColor(light_gray)
-        c.drawString(60, sig_y + 35, "Patient/Attender Signature")
-        c.setStrokeColor(dark_gray)
-        c.setLineWidth(0.5)
-        c.line(60, sig_y + 30, 180, sig_y + 30)
-
-        c.drawString(380, sig_y + 35, "Authorized Signature")
-        c.line(380, sig_y + 30, 500, sig_y + 30)
-
-        c.setFont("Helvetica", 7)
-        c.setFillColor(light_gray)
-        c.drawCentredString(440, sig_y, "(Hospital Stamp)")
-
-        # Draw footer on last page
-        draw_footer()
-
-        c.showPage()
-        c.save()
-
-        buffer.seek(0)
-
-        return StreamingResponse(
-            buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": "attachment; filename=Discharge_Summary.pdf"
-            }
-        )
-
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
-
 @app.get("/search_data")
-async def search_data(query: Optional[str] = Query(None, min_length=2), limit: int = 50):
+async def search_data(request: Request, query: Optional[str] = Query(None, min_length=2), limit: int = 50):
     """Search for patient data for auto-fill. If query is empty, returns all data up to limit."""
     try:
+        # Sheet1 also takes admission upserts, hence both topics
+        version = http_cache.dataset_version(spreadsheets=[GOOGLE_SHEET_ID], topics=["enquiries", "admissions"])
+        cached = http_cache.not_modified(request, version)
+        if cached is not None:
+            return cached
+
         # Use gspread directly to get raw data
         if not os.path.exists(CREDENTIALS_FILE):
              # Try to start without creds (maybe public?) No, strict requirement here.
@@ -5951,7 +4874,7 @@ async def search_data(query: Optional[str] = Query(None, min_length=2), limit: i
             'https://www.googleapis.com/auth/drive'
         ]
         creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
+        client = sheets_scheduler.authorize(creds)
         spreadsheet = ensure_google_sheet(client)
         sheet = spreadsheet.sheet1
         values = sheet.get_all_values()
@@ -5972,7 +4895,7 @@ async def search_data(query: Optional[str] = Query(None, min_length=2), limit: i
                 r_len = len(row)
                 row_dict = {h: (row[i] if i < r_len else "") for i, h in enumerate(headers)}
                 results.append(row_dict)
-            return {"results": results, "headers": headers, "rows": rows[:limit]} # Return raw rows to ensure frontend compatibility
+            return http_cache.json_response(request, {"results": results, "headers": headers, "rows": rows[:limit]}, version) # Return raw rows to ensure frontend compatibility
 
         q_lower = query.lower()
         
@@ -6002,156 +4925,424 @@ async def search_data(query: Optional[str] = Query(None, min_length=2), limit: i
                 if len(results) >= limit: # Limit results
                     break
                     
-        return {"results": results, "headers": headers, "rows": [list(r.values()) for r in results]} # Maintain compatibility
+        return http_cache.json_response(request, {"results": results, "headers": headers, "rows": [list(r.values()) for r in results]}, version) # Maintain compatibility
         
     except Exception as e:
         print(f"Search failed: {e}")
         return {"results": [], "headers": [], "rows": []}
 
 
-# ============== AI Chat Query Endpoint ==============
-class ChatQueryRequest(BaseModel):
-    query: str
-    filter: Optional[str] = "today"
+# ============== Follow-up Due-Date Index & Daily Digest ==============
+
+def load_crm_followup_index() -> "followup_index.FollowUpIndex":
+    """Follow-up index for the CRM lead sheet, reading the sheet only when a rebuild is due."""
+    client, spreadsheet = get_google_sheet_client()
+    try:
+        sheet = spreadsheet.worksheet(GOOGLE_SHEET_NAME)
+    except gspread.WorksheetNotFound:
+        sheet = spreadsheet.sheet1
+    return followup_index.get_followup_index(sheet.title, sheet.get_all_values)
 
-@app.post("/chat_query")
-async def chat_query(request: ChatQueryRequest):
+
+def followup_entry_to_dict(index: "followup_index.FollowUpIndex", entry) -> Dict[str, Any]:
+    due_date, member_id, slot, row_number = entry
+    row = index.row_dict(row_number)
+    name = next((v for k, v in row.items() if "patient name" in k.lower() and v), "") or \
+        next((v for k, v in row.items() if "attender name" in k.lower() and v), "")
+    return {
+        "member_id": member_id,
+        "name": name or "Unknown",
+        "slot": slot,
+        "due_date": due_date.strftime("%d-%m-%Y"),
+        "row": row_number,
+    }
+
+
+def run_followup_digest() -> Dict[str, Any]:
     """
-    AI Chat endpoint for the CRM assistant.
-    Processes natural language queries about patient data, follow-ups, etc.
+    Send one follow-up reminder email per member with a follow-up due today.
+    Used by the daily digest job and the manual trigger endpoint.
     """
+    index = load_crm_followup_index()
+    due = index.due_on(datetime.now().date())
+
+    # One email per member even when several slots fall on the same day
+    by_member: Dict[str, List[Any]] = {}
+    for entry in due:
+        key = entry[1] or f"row-{entry[3]}"
+        by_member.setdefault(key, []).append(entry)
+
+    sent, skipped = [], []
+    for key, entries in by_member.items():
+        row_number = entries[0][3]
+        fields = {k: v for k, v in index.row_dict(row_number).items() if str(v).strip()}
+        recipient = extract_recipient_email(fields)
+        info = followup_entry_to_dict(index, entries[0])
+        if not recipient:
+            skipped.append(info)
+            continue
+        member_entry = {"id": entries[0][1], "name": info["name"], "fields": fields}
+        slots = ", ".join(e[2] for e in entries)
+        send_follow_email(recipient, member_entry, f"Daily follow-up digest: {slots} due {info['due_date']}")
+        sent.append(info)
+
+    return {
+        "due_count": len(by_member),
+        "sent_count": len(sent),
+        "skipped_count": len(skipped),
+        "sent": sent,
+        "skipped": skipped,
+    }
+
+
+# ============== Duplicate-Lead Detection ==============
+
+def open_crm_lead_sheet() -> gspread.Worksheet:
+    client, spreadsheet = get_google_sheet_client()
     try:
-        query_lower = request.query.lower().strip()
-        filter_type = request.filter or "today"
-        
-        # Get data from Google Sheets for context
-        if not os.path.exists(CREDENTIALS_FILE):
-            return {"answer": "I'm having trouble accessing the database. Please check the credentials configuration."}
-        
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        client = gspread.authorize(creds)
-        spreadsheet = ensure_google_sheet(client)
-        sheet = spreadsheet.sheet1
-        values = sheet.get_all_values()
-        
-        if not values or len(values) < 2:
-            return {"answer": "No patient data found in the system yet."}
-        
-        headers = values[0]
-        rows = values[1:]
-        
-        # Convert to list of dicts
-        records = []
-        for row in rows:
-            record = {headers[i]: (row[i] if i < len(row) else "") for i in range(len(headers))}
-            records.append(record)
-        
-        today = datetime.now().date()
-        
-        # Filter records based on filter_type
-        def parse_date(date_str):
-            if not date_str:
-                return None
-            for fmt in ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y"]:
-                try:
-                    return datetime.strptime(date_str.strip(), fmt).date()
-                except:
-                    continue
-            return None
-        
-        # Find date column
-        date_col = None
-        for h in headers:
-            if "date" in h.lower() and "reminder" not in h.lower() and "follow" not in h.lower():
-                date_col = h
-                break
-        if not date_col and headers:
-            date_col = headers[0]  # fallback to first column
-        
-        filtered_records = []
-        for rec in records:
-            rec_date = parse_date(rec.get(date_col, ""))
-            if filter_type == "today":
-                if rec_date == today:
-                    filtered_records.append(rec)
-            elif filter_type == "this_week":
-                if rec_date and (today - rec_date).days <= 7 and rec_date <= today:
-                    filtered_records.append(rec)
-            elif filter_type == "overdue":
-                # Check follow-up dates
-                for h in headers:
-                    if "follow" in h.lower() or "reminder" in h.lower():
-                        follow_date = parse_date(rec.get(h, ""))
-                        if follow_date and follow_date < today:
-                            filtered_records.append(rec)
-                            break
-            else:  # "all" or empty
-                filtered_records.append(rec)
-        
-        # Process common queries
-        if "follow" in query_lower or "today" in query_lower:
-            count = len(filtered_records)
-            if count == 0:
-                return {"answer": f"No follow-ups scheduled for {filter_type.replace('_', ' ')}."}
-            
-            # Get patient names if available
-            name_col = None
-            for h in headers:
-                if "patient" in h.lower() and "name" in h.lower():
-                    name_col = h
-                    break
-            
-            if name_col and count <= 5:
-                names = [rec.get(name_col, "Unknown") for rec in filtered_records[:5]]
-                return {"answer": f"You have {count} follow-up(s) for {filter_type.replace('_', ' ')}:\n" + "\n".join(f"• {n}" for n in names)}
-            else:
-                return {"answer": f"You have {count} follow-up(s) scheduled for {filter_type.replace('_', ' ')}."}
-        
-        elif "count" in query_lower or "how many" in query_lower:
-            return {"answer": f"There are {len(filtered_records)} records for {filter_type.replace('_', ' ')}."}
-        
-        elif "patient" in query_lower:
-            count = len(filtered_records)
-            return {"answer": f"Found {count} patient record(s) matching your criteria."}
-        
-        elif "status" in query_lower:
-            # Try to find status column
-            status_col = None
-            for h in headers:
-                if "status" in h.lower():
-                    status_col = h
-                    break
-            
-            if status_col:
-                statuses = {}
-                for rec in filtered_records:
-                    s = rec.get(status_col, "Unknown") or "Unknown"
-                    statuses[s] = statuses.get(s, 0) + 1
-                
-                status_summary = "\n".join(f"• {k}: {v}" for k, v in statuses.items())
-                return {"answer": f"Status breakdown:\n{status_summary}"}
-            else:
-                return {"answer": "No status information available."}
-        
-        elif "help" in query_lower:
-            return {"answer": "I can help you with:\n• Follow-ups today/this week\n• Patient counts\n• Status summaries\n• Overdue reminders\n\nTry asking: 'Follow ups today?' or 'How many patients this week?'"}
-        
+        return spreadsheet.worksheet(GOOGLE_SHEET_NAME)
+    except gspread.WorksheetNotFound:
+        return spreadsheet.sheet1
+
+
+def load_crm_duplicate_index() -> "duplicate_index.DuplicateIndex":
+    """Duplicate-lead index for the CRM lead sheet, reading the sheet only when a rebuild is due."""
+    sheet = open_crm_lead_sheet()
+    return duplicate_index.get_duplicate_index(sheet.title, sheet.get_all_values)
+
+
+def find_possible_duplicates(enriched: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Existing leads that look like the submitted one, from this worker's index without a
+    Sheets read. Returns None while the index is not built yet (it is then built in the
+    background for later submits).
+    """
+    index = duplicate_index.get_index(GOOGLE_SHEET_NAME)
+    index.refresh_in_background(lambda: open_crm_lead_sheet().get_all_values())
+    if index.built_at is None:
+        return None
+    return index.duplicates_of_record(enriched)
+
+
+def duplicate_to_dict(index: "duplicate_index.DuplicateIndex", match: Dict[str, Any]) -> Dict[str, Any]:
+    lead = index.lead(match["row"]) or ("", "", "", "", "")
+    return {**match, "phone": lead[1], "email": lead[2], "name": lead[3], "location": lead[4]}
+
+
+@app.get("/api/leads/duplicates")
+async def get_lead_duplicates(
+    member_id: Optional[str] = None,
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    name: Optional[str] = None,
+    location: Optional[str] = None,
+    min_score: float = Query(duplicate_index.DUPLICATE_MIN_SCORE, ge=0, le=1),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """
+    Likely duplicates of a lead: an existing one (?member_id=) or one being entered
+    (?phone=&email=&name=&location=, e.g. before submitting the enquiry form).
+    """
+    try:
+        index = await run_in_threadpool(load_crm_duplicate_index)
+        if member_id:
+            matches = index.duplicates_of_member(member_id, min_score, limit)
+            if matches is None:
+                raise HTTPException(status_code=404, detail=f"Member ID '{member_id}' not found")
+        elif phone or email or name:
+            matches = index.duplicates_of_record(
+                {"Mobile Number": phone, "Email Id": email, "Patient Name": name, "Patient Location": location},
+                min_score, limit,
+            )
         else:
-            # Generic response
-            count = len(filtered_records)
-            return {"answer": f"I found {count} records for {filter_type.replace('_', ' ')}. Try asking about follow-ups, patient counts, or status summaries."}
-        
+            raise HTTPException(status_code=400, detail="Pass member_id, or phone / email / name")
+        return {
+            "member_id": member_id,
+            "count": len(matches),
+            "duplicates": [duplicate_to_dict(index, m) for m in matches],
+        }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Chat query error: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"answer": "I encountered an error processing your request. Please try again."}
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/leads/duplicates/clusters")
+async def get_lead_duplicate_clusters(limit: int = Query(100, ge=1, le=5000)):
+    """
+    Last report of the nightly duplicate-cluster job (run it now with
+    POST /jobs/lead_duplicate_clusters/run).
+    """
+    report = await run_in_threadpool(duplicate_index.cluster_report)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No duplicate report yet - run the lead_duplicate_clusters job")
+    return {**report, "clusters": report["clusters"][:limit]}
+
+
+@app.get("/api/leads/duplicates/status")
+async def duplicate_index_status():
+    """Leads, blocks and detected columns of this worker's duplicate index."""
+    return duplicate_index.status()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Endpoint latency, Sheets calls, cache hits, job timings and queue gauges in Prometheus text format."""
+    body = await run_in_threadpool(instrumentation.render)
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/cache/status")
+async def shared_cache_status():
+    """Cross-worker cache: generations and live entries per namespace, plus this worker's hit/fill counters."""
+    try:
+        return await run_in_threadpool(shared_cache.status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/cache/invalidate/{namespace}")
+async def invalidate_shared_cache(namespace: str):
+    """Invalidate one cache namespace (e.g. patient_search, login) in every worker."""
+    try:
+        generation = await run_in_threadpool(shared_cache.invalidate, namespace)
+        return {"namespace": namespace, "generation": generation}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/changes")
+async def list_changes(since: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=500)):
+    """Change-feed events after sequence number `since` (worksheet, appended/updated, row counts)."""
+    try:
+        return await run_in_threadpool(change_feed.events_since, since, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/changes/status")
+async def change_feed_status():
+    """Watched worksheets, poll health and which worker polls."""
+    try:
+        return await run_in_threadpool(change_feed.status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/templates/status")
+async def template_cache_status():
+    """Upload template artifacts: current key, sizes and build counters."""
+    return template_cache.status()
+
+
+@app.get("/dropdowns/status")
+async def dropdown_engine_status():
+    """Dropdown stores with the version and option count this worker holds."""
+    try:
+        return await run_in_threadpool(dropdown_engine.status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/sheets/scheduler/metrics")
+async def sheets_scheduler_metrics():
+    """Queue depth, waits and retries per Sheets priority lane, plus token bucket levels."""
+    return sheets_scheduler.metrics()
+
+
+@app.get("/followups/due")
+async def get_followups_due(window: str = "today", limit: int = Query(20, ge=1, le=500), include_reminders: bool = False):
+    """
+    Follow-ups from the due-date index.
+    window = 'today' | 'this_week' | 'overdue' | 'upcoming' (next `limit` due from today)
+    """
+    try:
+        index = await run_in_threadpool(load_crm_followup_index)
+        if window == "upcoming":
+            entries = index.next_due(limit, include_reminders=include_reminders)
+        else:
+            entries = index.entries_for_filter(window, include_reminders=include_reminders)
+            if entries is None:
+                raise HTTPException(status_code=400, detail="window must be today, this_week, overdue or upcoming")
+            entries = entries[:limit]
+        return {
+            "window": window,
+            "count": len(entries),
+            "data": [followup_entry_to_dict(index, e) for e in entries],
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/followups/digest/run")
+async def trigger_followup_digest():
+    """Manually send today's follow-up digest (same as the scheduled job)."""
+    try:
+        return await run_in_threadpool(run_followup_digest)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/followups/digest/status")
+async def followup_digest_status():
+    """Status of the daily follow-up digest scheduler and its last run."""
+    if not FOLLOWUP_SCHEDULER_AVAILABLE:
+        return {"running": False, "message": "Follow-up digest scheduler not available"}
+    return get_digest_status()
+
+
+# Outbox handlers: each replays one journaled write to Google Sheets
+write_outbox.register_handler("enquiry_submit", apply_enquiry_submit)
+write_outbox.register_handler("admission_register", apply_admission_register)
+write_outbox.register_handler("patient_admission_row", apply_patient_admission_row)
+write_outbox.register_handler("bed_allocation", apply_bed_allocation)
+# Plain appends: a replay first looks for the row an interrupted attempt may have written
+write_outbox.register_handler("complaint", apply_complaint, already_applied=complaint_already_logged)
+write_outbox.register_handler("feedback", apply_feedback, already_applied=feedback_already_logged)
+
+# A new Member ID database starts above the highest ID already in the lead sheets
+member_id_service.set_seed_loader(lead_sheet_member_ids)
+
+
+def apply_patient_search_change(event: Dict[str, Any]) -> None:
+    """
+    Keep the shared patient search records current from change-feed events on Sheet1:
+    appended rows are added to the cached records, any other change drops them.
+    """
+    if event["spreadsheet_id"] != GOOGLE_SHEET_ID or event["worksheet"] != "Sheet1":
+        return
+    if event["type"] == "appended":
+        generation = shared_cache.generation(PATIENT_SEARCH_CACHE)
+        records = shared_cache.get(PATIENT_SEARCH_CACHE, PATIENT_SEARCH_KEY)
+        if records is None:
+            return  # The next search loads the whole sheet anyway
+        if len(records) == event["first_row"] - 2 and tuple(event["headers"]) == records.headers[:len(event["headers"])]:
+            shared_cache.set(
+                PATIENT_SEARCH_CACHE, PATIENT_SEARCH_KEY, records.extended(event["rows"]),
+                change_feed.cache_ttl(PATIENT_SEARCH_TTL_MINUTES * 60), generation=generation,
+            )
+            return
+    shared_cache.invalidate(PATIENT_SEARCH_CACHE)
+
+
+def apply_followup_index_change(event: Dict[str, Any]) -> None:
+    """Keep this worker's follow-up indexes (Sheet1, Enquiries) current from change-feed events."""
+    if event["spreadsheet_id"] != GOOGLE_SHEET_ID:
+        return
+    if event["type"] == "appended":
+        for offset, row in enumerate(event["rows"]):
+            followup_index.record_row(event["worksheet"], event["first_row"] + offset, event["headers"], row)
+    else:
+        followup_index.invalidate(event["worksheet"])
+
+
+def apply_duplicate_index_change(event: Dict[str, Any]) -> None:
+    """Keep this worker's duplicate-lead index (Sheet1) current from change-feed events."""
+    if event["spreadsheet_id"] != GOOGLE_SHEET_ID:
+        return
+    if event["type"] == "appended":
+        for offset, row in enumerate(event["rows"]):
+            duplicate_index.record_row(event["worksheet"], event["first_row"] + offset, event["headers"], row)
+    else:
+        duplicate_index.invalidate(event["worksheet"])
+
+
+# Change feed: worksheets staff edit directly, and what each change invalidates
+change_feed.watch_worksheet(GOOGLE_SHEET_ID, "Sheet1")
+change_feed.watch_worksheet(GOOGLE_SHEET_ID, "Enquiries")
+change_feed.watch_worksheet(GOOGLE_SHEET_ID, "Login Details", namespaces=[LOGIN_CACHE], full_hash=True)
+change_feed.subscribe(apply_patient_search_change)
+change_feed.subscribe(apply_followup_index_change, every_worker=True)
+change_feed.subscribe(apply_duplicate_index_change, every_worker=True)
+
+# Live updates: direct sheet edits reach open screens too
+live_updates.follow_worksheet(GOOGLE_SHEET_ID, "Sheet1", "enquiries", namespaces=[dashboard_cache.name])
+live_updates.follow_worksheet(GOOGLE_SHEET_ID, "Enquiries", "enquiries", namespaces=[dashboard_cache.name])
+live_updates.follow_worksheet(GOOGLE_SHEET_ID, ADMISSION_SHEET_NAME, "beds")
+live_updates.follow_worksheet(GOOGLE_SHEET_ID, COMPLAINT_SHEET_NAME, "complaints", namespaces=[dashboard_cache.name])
+live_updates.follow_worksheet(PATIENT_ADMISSION_SHEET_ID, "Sheet1", "admissions", namespaces=[dashboard_cache.name])
+
+
+@app.on_event("shutdown")
+async def shutdown_outbox():
+    write_outbox.stop_outbox_worker()
+    change_feed.stop()
+    live_updates.stop()
+    process_pool.shutdown()
+
+
+@app.on_event("shutdown")
+async def shutdown_schedulers():
+    # Unregistering the last job stops the runner and releases the leader lease to another worker
+    if HOMECARE_SCHEDULER_AVAILABLE:
+        stop_billing_scheduler()
+    if PATIENTADMISSION_SCHEDULER_AVAILABLE:
+        stop_pa_billing_scheduler()
+    if FOLLOWUP_SCHEDULER_AVAILABLE:
+        stop_followup_digest_scheduler()
+    duplicate_index.stop_clusters_job()
+
+
+@app.get("/outbox/metrics")
+async def outbox_metrics():
+    """Backlog size, replay lag (age of the oldest unapplied write) and failure counts."""
+    try:
+        return await run_in_threadpool(write_outbox.metrics)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/process-pool/status")
+async def process_pool_status():
+    """Pool workers and, per task type, tasks in flight, outcomes and mean queue wait vs run time."""
+    return process_pool.status()
+
+
+@app.post("/outbox/flush")
+async def flush_outbox(timeout: float = Query(30.0, ge=1, le=300)):
+    """Replay the journal to Sheets now (ignoring retry backoff) and report what is left."""
+    try:
+        return await run_in_threadpool(write_outbox.flush, timeout)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/outbox/receipts/{receipt_id}")
+async def get_outbox_receipt(receipt_id: int):
+    """Status of a journaled write (pending, applying, done or failed)."""
+    receipt = await run_in_threadpool(write_outbox.get_receipt, receipt_id)
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return receipt
+
+
+@app.get("/outbox/failed")
+async def get_failed_outbox_entries(limit: int = Query(50, ge=1, le=500)):
+    """Writes that were rejected or gave up retrying."""
+    try:
+        return {"data": await run_in_threadpool(write_outbox.failed_entries, limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/outbox/receipts/{receipt_id}/retry")
+async def retry_outbox_entry(receipt_id: int):
+    """Requeue a failed write at its original position."""
+    receipt = await run_in_threadpool(write_outbox.requeue, receipt_id)
+    if receipt is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return receipt
 
 
 if __name__ == "__main__":
+    # In the PyInstaller build, process-pool workers start by running this executable again:
+    # hand them to multiprocessing before a second server starts
+    import multiprocessing
+    multiprocessing.freeze_support()
+
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
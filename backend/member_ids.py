@@ -0,0 +1,345 @@
+"""
+Member ID Module
+Issues collision-free Member IDs (MID-yyyy-mm-dd-<node><sequence>) from a persisted per-day high-water mark, in per-process blocks and bulk reservations, and tells writers when an ID cannot be in the sheet yet.
+A new database seeds its high-water marks from the IDs already in the sheet, so losing the database never reissues an ID.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+import instrumentation
+
+load_dotenv()
+
+# Configuration
+MEMBER_ID_DB_PATH = os.getenv("MEMBER_ID_DB_PATH", "member_ids.db")
+# One digit per host sharing the lead sheet; every host needs its own node and its own database.
+# Unset means node 1 (a single-host install), with a warning: a second host left on the default
+# would hand out the same IDs.
+MEMBER_ID_NODE = os.getenv("MEMBER_ID_NODE", "").strip()
+if not MEMBER_ID_NODE:
+    print("[Member IDs] WARNING: MEMBER_ID_NODE is not set; using node 1. "
+          "Set a different digit 1-9 on every host that writes to the same lead sheet.")
+    MEMBER_ID_NODE = "1"
+# IDs a process takes from the high-water mark at once; the rest of a block is skipped on restart
+MEMBER_ID_BLOCK_SIZE = int(os.getenv("MEMBER_ID_BLOCK_SIZE", "20"))
+# Append claims are kept (and fresh IDs skip the sheet scan) for IDs issued within this many days
+MEMBER_ID_CLAIM_DAYS = int(os.getenv("MEMBER_ID_CLAIM_DAYS", "3"))
+
+SEQUENCE_DIGITS = 6
+MAX_SEQUENCE = 10 ** SEQUENCE_DIGITS - 1
+
+# Legacy IDs end in a number below 110000 (ms % 100000 + 1000..9999); issued IDs end in a
+# non-zero node digit plus six sequence digits, so the two can never collide
+ISSUED_ID = re.compile(r"^MID-(\d{4}-\d{2}-\d{2})-([1-9])(\d{%d})$" % SEQUENCE_DIGITS)
+
+# high_water only moves forward: a sequence number is handed out at most once per day,
+# even across restarts. claims records the first write of a fresh ID to a worksheet.
+# seeds holds the highest sequence found in the sheet when the database was created:
+# those IDs predate the database, so nothing is known about where they were written.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sequences (
+    day TEXT PRIMARY KEY,
+    high_water INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS claims (
+    sheet TEXT NOT NULL,
+    member_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (sheet, member_id)
+);
+CREATE INDEX IF NOT EXISTS idx_claims_day ON claims (day);
+CREATE TABLE IF NOT EXISTS seeds (
+    day TEXT PRIMARY KEY,
+    sequence INTEGER NOT NULL
+);
+"""
+
+_initialized = False
+_init_lock = threading.Lock()
+
+# Returns the Member IDs currently in the sheet; consulted once, when the database is new
+_seed_loader: Optional[Callable[[], Iterable[Any]]] = None
+
+# Per-process block: day -> [next sequence, last sequence of the block]
+_block: Dict[str, List[int]] = {}
+_block_lock = threading.Lock()
+
+_stats: Dict[str, int] = {
+    "issued": 0,
+    "reserved": 0,
+    "blocks": 0,
+    "claims": 0,
+    "claims_refused": 0,
+    "seeded_days": 0,
+}
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(MEMBER_ID_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_db() -> None:
+    """Create the sequence and claim tables (idempotent)."""
+    global _initialized
+    if _initialized:
+        return
+    if not re.fullmatch(r"[1-9]", MEMBER_ID_NODE):
+        raise ValueError(
+            f"MEMBER_ID_NODE must be a single digit 1-9, one per host sharing the lead sheet "
+            f"(got '{MEMBER_ID_NODE}')"
+        )
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _initialized = True
+
+
+def set_seed_loader(loader: Optional[Callable[[], Iterable[Any]]]) -> None:
+    """Register the function that lists the Member IDs already in the sheet (used to seed a new database)."""
+    global _seed_loader
+    _seed_loader = loader
+
+
+def format_member_id(day: str, sequence: int) -> str:
+    return f"MID-{day}-{MEMBER_ID_NODE}{sequence:0{SEQUENCE_DIGITS}d}"
+
+
+def _is_new(conn: sqlite3.Connection) -> bool:
+    return (conn.execute("SELECT 1 FROM sequences LIMIT 1").fetchone() is None
+            and conn.execute("SELECT 1 FROM seeds LIMIT 1").fetchone() is None)
+
+
+def _sheet_high_water() -> Dict[str, int]:
+    """Highest sequence per day among this node's IDs in the sheet."""
+    try:
+        member_ids = list(_seed_loader())
+    except Exception as e:
+        # Issuing blind could repeat an ID that is already in the sheet
+        raise RuntimeError(f"Cannot seed the Member ID database from the sheet: {e}") from e
+    seeds: Dict[str, int] = {}
+    for member_id in member_ids:
+        match = ISSUED_ID.match(str(member_id or "").strip())
+        if match and match.group(2) == MEMBER_ID_NODE:
+            day, sequence = match.group(1), int(match.group(3))
+            seeds[day] = max(seeds.get(day, 0), sequence)
+    return seeds
+
+
+def _seed(conn: sqlite3.Connection, seeds: Dict[str, int]) -> None:
+    """Raise the high-water marks to the sheet's and record the seeded floors (inside a transaction)."""
+    for day, sequence in seeds.items():
+        conn.execute(
+            "INSERT INTO sequences (day, high_water) VALUES (?, ?) "
+            "ON CONFLICT(day) DO UPDATE SET high_water = MAX(high_water, excluded.high_water)",
+            (day, sequence),
+        )
+        conn.execute("INSERT OR IGNORE INTO seeds (day, sequence) VALUES (?, ?)", (day, sequence))
+    _stats["seeded_days"] += len(seeds)
+
+
+def _advance(day: str, count: int) -> int:
+    """
+    Move the day's high-water mark forward by `count`; returns the first sequence number.
+    On a new database the marks are first seeded from the sheet, if a loader is registered.
+    """
+    init_db()
+    conn = _connect()
+    try:
+        seeds = None
+        if _seed_loader is not None and _is_new(conn):
+            seeds = _sheet_high_water()  # Read the sheet outside the write lock
+        conn.execute("BEGIN IMMEDIATE")
+        if seeds is not None and _is_new(conn):
+            _seed(conn, seeds)
+        row = conn.execute("SELECT high_water FROM sequences WHERE day = ?", (day,)).fetchone()
+        high_water = row[0] if row else 0
+        if high_water + count > MAX_SEQUENCE:
+            raise RuntimeError(f"Member ID sequence for {day} exhausted on node {MEMBER_ID_NODE}")
+        conn.execute(
+            "INSERT INTO sequences (day, high_water) VALUES (?, ?) "
+            "ON CONFLICT(day) DO UPDATE SET high_water = excluded.high_water",
+            (day, high_water + count),
+        )
+        conn.execute("COMMIT")
+        return high_water + 1
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def next_member_id(now: Optional[datetime] = None) -> str:
+    """
+    Issue one Member ID. IDs from one process increase monotonically within a day;
+    IDs from different processes interleave but never repeat.
+
+    Args:
+        now: Issue time (defaults to now); its date is the ID's date
+
+    Returns:
+        A new Member ID, e.g. MID-2025-11-07-1000042
+    """
+    day = (now or datetime.now()).strftime('%Y-%m-%d')
+    with _block_lock:
+        block = _block.get(day)
+        if block is None or block[0] > block[1]:
+            first = _advance(day, MEMBER_ID_BLOCK_SIZE)
+            block = [first, first + MEMBER_ID_BLOCK_SIZE - 1]
+            _block.clear()  # Earlier days' leftovers are never used again
+            _block[day] = block
+            _stats["blocks"] += 1
+        sequence = block[0]
+        block[0] += 1
+        _stats["issued"] += 1
+    return format_member_id(day, sequence)
+
+
+def reserve(count: int, now: Optional[datetime] = None, sheet: Optional[str] = None) -> List[str]:
+    """
+    Reserve a contiguous run of Member IDs in one step (e.g. for a bulk import).
+
+    Args:
+        count: Number of IDs
+        now: Issue time (defaults to now)
+        sheet: Worksheet the caller appends the rows to itself; the IDs are claimed there,
+               so a later upsert of one of them scans the sheet instead of appending again
+
+    Returns:
+        The IDs in ascending order
+    """
+    if count <= 0:
+        return []
+    day = (now or datetime.now()).strftime('%Y-%m-%d')
+    first = _advance(day, count)
+    ids = [format_member_id(day, first + i) for i in range(count)]
+    if sheet:
+        conn = _connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR IGNORE INTO claims (sheet, member_id, day) VALUES (?, ?, ?)",
+                             [(sheet, member_id, day) for member_id in ids])
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+    with _block_lock:
+        _stats["reserved"] += count
+    return ids
+
+
+def is_issued(member_id: Any) -> bool:
+    """
+    True if the ID was issued by this node's database (not a legacy or another host's ID,
+    and not one found in the sheet when the database was seeded).
+    """
+    match = ISSUED_ID.match(str(member_id or "").strip())
+    if not match or match.group(2) != MEMBER_ID_NODE:
+        return False
+    init_db()
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT s.high_water, COALESCE(f.sequence, 0) FROM sequences s "
+            "LEFT JOIN seeds f ON f.day = s.day WHERE s.day = ?",
+            (match.group(1),),
+        ).fetchone()
+    finally:
+        conn.close()
+    return row is not None and row[1] < int(match.group(3)) <= row[0]
+
+
+def claim_append(sheet: str, member_id: Any) -> bool:
+    """
+    Claim the first write of a freshly issued ID to a worksheet. True means no row can
+    hold this ID yet, so the caller may append without reading the sheet. The claim
+    is kept even if the append then fails: a retry scans the sheet and finds the row
+    if the append went through after all.
+
+    Args:
+        sheet: Worksheet title
+        member_id: Member ID about to be written
+
+    Returns:
+        True for the first claim of a recently issued ID, False otherwise
+    """
+    member_id = str(member_id or "").strip()
+    match = ISSUED_ID.match(member_id)
+    if not match or not is_issued(member_id):
+        return False
+    day = match.group(1)
+    if day < (datetime.now() - timedelta(days=MEMBER_ID_CLAIM_DAYS)).strftime('%Y-%m-%d'):
+        return False  # Older claims are pruned, so their absence proves nothing
+    conn = _connect()
+    try:
+        cursor = conn.execute("INSERT OR IGNORE INTO claims (sheet, member_id, day) VALUES (?, ?, ?)",
+                              (sheet, member_id, day))
+        claimed = cursor.rowcount == 1
+    finally:
+        conn.close()
+    with _block_lock:
+        _stats["claims" if claimed else "claims_refused"] += 1
+    return claimed
+
+
+def prune_claims() -> int:
+    """Drop claims older than MEMBER_ID_CLAIM_DAYS; returns how many were removed."""
+    init_db()
+    cutoff = (datetime.now() - timedelta(days=MEMBER_ID_CLAIM_DAYS + 1)).strftime('%Y-%m-%d')
+    conn = _connect()
+    try:
+        return conn.execute("DELETE FROM claims WHERE day < ?", (cutoff,)).rowcount
+    finally:
+        conn.close()
+
+
+def status() -> Dict[str, Any]:
+    """Node, today's high-water mark and this process's issue counters."""
+    init_db()
+    today = datetime.now().strftime('%Y-%m-%d')
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT high_water FROM sequences WHERE day = ?", (today,)).fetchone()
+    finally:
+        conn.close()
+    with _block_lock:
+        block = _block.get(today)
+        return {
+            "node": MEMBER_ID_NODE,
+            "day": today,
+            "high_water": row[0] if row else 0,
+            "block": {"next": block[0], "last": block[1]} if block else None,
+            "block_size": MEMBER_ID_BLOCK_SIZE,
+            **_stats,
+        }
+
+
+def _prometheus_lines() -> List[str]:
+    with _block_lock:
+        stats = dict(_stats)
+    return instrumentation.gauge_lines(
+        "crm_member_ids_handed_out", "Member IDs handed out by this worker since start",
+        [({"kind": "issued"}, stats["issued"]), ({"kind": "reserved"}, stats["reserved"])],
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
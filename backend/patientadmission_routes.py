@@ -3,10 +3,12 @@ Patient Admission Routes Module
 FastAPI routes for patient admission billing management
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from header_resolver import compile_headers
+import http_cache
 
 from patientadmission_service import (
     get_all_patientadmission_clients,
@@ -17,6 +19,8 @@ from patientadmission_service import (
     parse_date,
     format_date,
     process_daily_billing,
+    PATIENTADMISSION_SHEET_ID,
+    CRM_ADMISSION_SHEET_ID,
 )
 
 router = APIRouter()
@@ -53,6 +57,7 @@ class PatientAdmissionClientUpdate(BaseModel):
 
 @router.get("/patientadmission/clients")
 async def list_homecare_clients(
+    request: Request,
     status: Optional[str] = Query(None, description="Filter by Twin or Single room type")
 ):
     """
@@ -62,9 +67,17 @@ async def list_homecare_clients(
         status: Filter by ACTIVE or INACTIVE (optional)
     
     Returns:
-        List of patient admission clients with billing information
+        List of patient admission clients with billing information (304 when the client's ETag is current)
     """
     try:
+        # Occupied bed days and next billing dates are relative to today
+        version = http_cache.daily(http_cache.dataset_version(
+            spreadsheets=[PATIENTADMISSION_SHEET_ID, CRM_ADMISSION_SHEET_ID], topics=["patientadmission_clients", "invoices"]
+        ))
+        cached = http_cache.not_modified(request, version)
+        if cached is not None:
+            return cached
+
         clients = get_all_patientadmission_clients()
         
         # OPTIMIZATION: Fetch ALL billing history in ONE API call instead of 67 separate calls
@@ -78,7 +91,7 @@ async def list_homecare_clients(
             billing_history_map = {}
             if len(all_invoices) > 1:
                 headers = all_invoices[0]
-                header_map = {h.strip().lower(): i for i, h in enumerate(headers)}
+                header_map = compile_headers(headers, "Accounts Receivable").last_by_lower
                 
                 patient_col = header_map.get('patient name')
                 invoice_date_col = header_map.get('invoice date')
@@ -153,6 +166,7 @@ async def list_homecare_clients(
                     next_billing = format_date(next_billing_dt)
             
             enriched_clients.append({
+                "client_id": client.get("_client_id"),
                 "patient_name": patient_name,
                 "gender": client.get("Gender", "") or client.get("GENDER", ""),
                 "age": client.get("AGE", ""),
@@ -175,11 +189,11 @@ async def list_homecare_clients(
         if status and status not in ["ALL", "ACTIVE", "INACTIVE"]:
             enriched_clients = [c for c in enriched_clients if c.get("room_type", "") == status]
         
-        return {
+        return http_cache.json_response(request, {
             "status": "success",
             "count": len(enriched_clients),
             "clients": enriched_clients
-        }
+        }, version)
         
     except Exception as e:
         print(f"Error listing patient admission clients: {e}")
@@ -227,6 +241,7 @@ async def get_homecare_client(patient_name: str):
         return {
             "status": "success",
             "client": {
+                "client_id": client.get("_client_id"),
                 "patient_name": client.get("Patient Name", "") or client.get("PATIENT NAME", ""),
                 "gender": client.get("Gender", "") or client.get("GENDER", ""),
                 "age": client.get("AGE", ""),
@@ -423,10 +438,6 @@ async def update_client(patient_name: str, client_data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# Import timedelta for billing preview
-from datetime import timedelta
-
-
 @router.post("/patientadmission/generate-invoice/{patient_name}")
 async def generate_invoice_manual(patient_name: str, billing_date: Optional[str] = None):
     """
@@ -451,34 +462,12 @@ async def generate_invoice_manual(patient_name: str, billing_date: Optional[str]
         # Generate invoice
         invoice = generate_patientadmission_invoice(client)
         
-        # Update LAST BILLED DATE in SNF sheet
-        from patientadmission_service import get_patientadmission_sheet
-        worksheet = get_patientadmission_sheet()
-        all_values = worksheet.get_all_values()
-        
-        if all_values and len(all_values) >= 2:
-            headers = all_values[0]
-            header_map = {header: idx for idx, header in enumerate(headers)}
-            
-            # Find client row
-            for row_idx, row in enumerate(all_values[1:], start=2):
-                if not any(row):
-                    continue
-                
-                current_name = ""
-                if "Patient Name" in header_map:
-                    current_name = row[header_map["Patient Name"]]
-                elif "PATIENT NAME" in header_map:
-                    current_name = row[header_map["PATIENT NAME"]]
-                
-                if current_name.strip().lower() == patient_name.lower():
-                    # Update LAST BILLED DATE
-                    if "LAST BILLED DATE" in header_map:
-                        col_idx = header_map["LAST BILLED DATE"] + 1
-                        billed_date = datetime.now().strftime("%d/%m/%Y")
-                        worksheet.update_cell(row_idx, col_idx, billed_date)
-                        print(f"[Patient Admission] Updated LAST BILLED DATE for {patient_name}")
-                    break
+        # Update LAST BILLED DATE in SNF sheet (skipped when the sheet has no such column)
+        from patientadmission_service import patientadmission_clients
+        if "LAST BILLED DATE" in client:
+            billed_date = datetime.now().strftime("%d/%m/%Y")
+            patientadmission_clients.update(client["_client_id"], {"LAST BILLED DATE": billed_date})
+            print(f"[Patient Admission] Updated LAST BILLED DATE for {patient_name}")
         
         return {
             "status": "success",
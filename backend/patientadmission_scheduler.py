@@ -3,11 +3,12 @@ Patient Admission Scheduler Module
 Handles automatic daily billing for patient admission clients
 """
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+import job_runner
+import sheets_scheduler
+import instrumentation
 
 # Load environment variables
 load_dotenv()
@@ -15,14 +16,17 @@ load_dotenv()
 # Configuration
 BILLING_TIME = os.getenv("PATIENTADMISSION_BILLING_TIME", "09:00")  # Default: 9:00 AM
 
-# Global scheduler instance
-scheduler = None
+JOB_ID = 'patientadmission_daily_billing'
 
 
+@instrumentation.timed_job("patientadmission_billing")
 def billing_job():
     """
     Job function that runs daily to process patient admission billing.
-    This is called by the scheduler.
+    This is called by the job runner in the leader process only.
+
+    Returns:
+        Billing summary (stored in the run history); errors are re-raised so the run is marked failed
     """
     try:
         print(f"\n{'='*60}")
@@ -32,8 +36,9 @@ def billing_job():
         # Import here to avoid circular imports
         from patientadmission_service import process_daily_billing
         
-        # Run the billing process
-        summary = process_daily_billing()
+        # Run the billing process in the batch lane so it yields Sheets quota to interactive requests
+        with sheets_scheduler.lane("batch"):
+            summary = process_daily_billing()
         
         # Log summary
         print(f"\n{'='*60}")
@@ -79,6 +84,8 @@ def billing_job():
             
             f.write(f"\n")
         
+        return summary
+        
     except Exception as e:
         error_msg = f"[Patient Admission Scheduler] Critical error in billing job: {e}"
         print(error_msg)
@@ -91,87 +98,47 @@ def billing_job():
             f.write(f"{'='*60}\n")
             f.write(f"{error_msg}\n")
             f.write(f"\n")
+        raise
 
 
 def start_billing_scheduler():
     """
-    Start the background scheduler for patient admission billing.
-    Runs daily at the configured time.
+    Register the daily billing job with the job runner and start it.
+    Every worker may call this; only the leader process runs the billing scan,
+    and a slot missed while the server was down is caught up at the next start.
     """
-    global scheduler
-    
-    if scheduler is not None:
-        print("[Patient Admission Scheduler] Scheduler already running")
-        return
-    
     try:
-        # Parse billing time (format: HH:MM)
-        hour, minute = BILLING_TIME.split(":")
-        hour = int(hour)
-        minute = int(minute)
-        
-        # Create scheduler
-        scheduler = BackgroundScheduler()
-        
-        # Add daily job
-        trigger = CronTrigger(hour=hour, minute=minute)
-        scheduler.add_job(
-            billing_job,
-            trigger=trigger,
-            id='patientadmission_daily_billing',
-            name='Patient Admission Daily Billing',
-            replace_existing=True
-        )
-        
-        # Start scheduler
-        scheduler.start()
+        job_runner.register_daily_job(JOB_ID, 'Patient Admission Daily Billing', BILLING_TIME, billing_job)
+        job_runner.start()
         
+        next_run = job_runner.next_run_time(BILLING_TIME)
         print(f"\n{'='*60}")
         print(f"[Patient Admission Scheduler] Started successfully")
         print(f"  - Billing Time: {BILLING_TIME} (daily)")
-        print(f"  - Next Run: {scheduler.get_job('patientadmission_daily_billing').next_run_time}")
+        print(f"  - Next Run: {next_run}")
         print(f"{'='*60}\n")
         
         # Write to log
         log_file = "patientadmission_billing.log"
         with open(log_file, "a", encoding="utf-8") as f:
             f.write(f"\n{'='*60}\n")
-            f.write(f"Scheduler Started - {datetime.now()}\n")
+            f.write(f"Scheduler Started - {datetime.now()} ({job_runner.OWNER})\n")
             f.write(f"{'='*60}\n")
             f.write(f"Billing Time: {BILLING_TIME} (daily)\n")
-            f.write(f"Next Run: {scheduler.get_job('patientadmission_daily_billing').next_run_time}\n")
+            f.write(f"Next Run: {next_run}\n")
             f.write(f"\n")
         
     except Exception as e:
         print(f"[Patient Admission Scheduler] Failed to start: {e}")
-        scheduler = None
 
 
 def stop_billing_scheduler():
     """
-    Stop the background scheduler gracefully.
+    Unregister the billing job; the runner stops (and hands over leadership) once no jobs remain.
     """
-    global scheduler
-    
-    if scheduler is None:
-        print("[Patient Admission Scheduler] No scheduler to stop")
-        return
-    
     try:
-        scheduler.shutdown(wait=True)
-        scheduler = None
-        
-        print(f"\n{'='*60}")
+        job_runner.unregister_job(JOB_ID)
         print(f"[Patient Admission Scheduler] Stopped successfully")
-        print(f"{'='*60}\n")
-        
-        # Write to log
-        log_file = "patientadmission_billing.log"
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(f"\n{'='*60}\n")
-            f.write(f"Scheduler Stopped - {datetime.now()}\n")
-            f.write(f"{'='*60}\n\n")
-        
     except Exception as e:
         print(f"[Patient Admission Scheduler] Error stopping scheduler: {e}")
 
@@ -181,29 +148,26 @@ def get_scheduler_status():
     Get current scheduler status.
     
     Returns:
-        Dictionary with scheduler status information
+        Dictionary with scheduler status, the last run from the run history and the current leader
     """
-    global scheduler
-    
-    if scheduler is None:
-        return {
-            "running": False,
-            "message": "Scheduler not started"
-        }
-    
     try:
-        job = scheduler.get_job('patientadmission_daily_billing')
+        status = job_runner.job_status(JOB_ID)
         
-        if job is None:
+        if status is None or not status["scheduled"]:
             return {
                 "running": False,
-                "message": "Billing job not found"
+                "billing_time": BILLING_TIME,
+                "last_run": status["last_run"] if status else None,
+                "message": "Scheduler not started"
             }
         
         return {
             "running": True,
             "billing_time": BILLING_TIME,
-            "next_run": str(job.next_run_time),
+            "next_run": status["next_run"],
+            "last_run": status["last_run"],
+            "in_progress": status["running"],
+            "leader": job_runner.leader(),
             "message": "Scheduler running normally"
         }
         
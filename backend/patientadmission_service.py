@@ -7,10 +7,13 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import calendar
-import gspread
+import sheets_scheduler
+import live_updates
+import client_repository
 from google.oauth2.service_account import Credentials
 import os
 from fastapi import HTTPException
+from header_resolver import compile_headers
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -22,6 +25,9 @@ PATIENTADMISSION_SHEET_ID = os.getenv("PATIENT_ADMISSION_SHEET_ID")
 CRM_ADMISSION_SHEET_ID = os.getenv("PATIENT_ADMISSION_SHEET_ID")
 ADMISSION_CREDENTIALS_FILE = "CRM-admission.json"
 
+# Client edits made directly in the sheet reach open client lists (see live_updates.py)
+live_updates.follow_worksheet(PATIENTADMISSION_SHEET_ID, "SNF", "patientadmission_clients")
+
 
 def get_google_sheet_client(credentials_file: str = CREDENTIALS_FILE):
     """Get authenticated gspread client"""
@@ -33,7 +39,7 @@ def get_google_sheet_client(credentials_file: str = CREDENTIALS_FILE):
         'https://www.googleapis.com/auth/drive'
     ]
     creds = Credentials.from_service_account_file(credentials_file, scopes=scope)
-    client = gspread.authorize(creds)
+    client = sheets_scheduler.authorize(creds)
     return client
 
 
@@ -47,6 +53,13 @@ def get_patientadmission_sheet():
     return worksheet
 
 
+# SNF held in memory, indexed by normalized patient name and client ID
+patientadmission_clients = client_repository.register(
+    "patientadmission", get_patientadmission_sheet, topic="patientadmission_clients",
+    name_headers=["Patient Name", "PATIENT NAME"], id_prefix="PA"
+)
+
+
 def get_accounts_receivable_sheet():
     """Get CRM_Admission → Invoice Table for invoice storage"""
     # Try to use separate credentials for admission sheet if available
@@ -228,45 +241,7 @@ def get_all_patientadmission_clients() -> List[Dict[str, Any]]:
         List of client records
     """
     try:
-        worksheet = get_patientadmission_sheet()
-        all_values = worksheet.get_all_values()
-        
-        if not all_values or len(all_values) < 2:
-            print("[Patient Admission] No clients found in CRM_PatientAdmission sheet")
-            return []
-        
-        headers = all_values[0]
-        rows = all_values[1:]
-        
-        # DEBUG: Print headers and first row
-        print(f"[Patient Admission DEBUG] Headers: {headers}")
-        if rows:
-            print(f"[Patient Admission DEBUG] First row: {rows[0]}")
-        
-        # Create header map for case-insensitive lookup
-        header_map = {header.strip(): idx for idx, header in enumerate(headers)}
-        
-        clients = []
-        for row_idx, row in enumerate(rows, start=2):  # Start from row 2 for _row_number
-            if not any(row):  # Skip empty rows
-                continue
-            
-            # Build client record
-            client = {}
-            for header, idx in header_map.items():
-                if idx < len(row):
-                    client[header] = row[idx]
-                else:
-                    client[header] = ""
-            
-            # Add row number for updates
-            client['_row_number'] = row_idx
-            
-            # Only include clients with a patient name (check both possible column names)
-            patient_name = client.get("Patient Name", "").strip() or client.get("PATIENT NAME", "").strip()
-            if patient_name:
-                clients.append(client)
-        
+        clients = patientadmission_clients.all()
         print(f"[Patient Admission] Retrieved {len(clients)} total clients from sheet")
         return clients
         
@@ -278,47 +253,18 @@ def get_all_patientadmission_clients() -> List[Dict[str, Any]]:
         raise
 
 
-
-
 def get_patientadmission_client_by_id(patient_name: str) -> Optional[Dict[str, Any]]:
     """
-    Get specific patient admission client by patient name.
+    Get specific patient admission client by patient name or client ID.
     
     Args:
-        patient_name: Patient name to search for
+        patient_name: Patient name (case- and whitespace-insensitive) or client ID
     
     Returns:
         Client record or None if not found
     """
     try:
-        worksheet = get_patientadmission_sheet()
-        all_values = worksheet.get_all_values()
-        
-        if not all_values or len(all_values) < 2:
-            return None
-        
-        headers = all_values[0]
-        header_map = {}
-        for idx, header in enumerate(headers):
-            if header and header not in header_map:
-                header_map[header] = idx
-        
-        for row_idx, row in enumerate(all_values[1:], start=2):
-            if not any(row):
-                continue
-            
-            record = {}
-            for header, idx in header_map.items():
-                record[header] = row[idx] if idx < len(row) else ""
-            
-            record['_row_number'] = row_idx
-            
-            # Check if patient name matches (try both column name variations)
-            patient_name_value = record.get("Patient Name", "") or record.get("PATIENT NAME", "")
-            if str(patient_name_value).strip().lower() == patient_name.lower():
-                return record
-        
-        return None
+        return patientadmission_clients.find(patient_name)
         
     except Exception as e:
         print(f"Error fetching patient admission client: {e}")
@@ -390,7 +336,7 @@ def generate_invoice_ref() -> str:
         
         # Get headers
         headers = all_values[0]
-        inv_ref_idx = next((i for i, h in enumerate(headers) if h == "Invoice Ref"), None)
+        inv_ref_idx = compile_headers(headers, "Accounts Receivable").by_exact.get("Invoice Ref")
         
         if inv_ref_idx is None:
             return "INV000001"
@@ -504,6 +450,11 @@ def generate_patientadmission_invoice(client_record: Dict[str, Any]) -> Dict[str
         # NOTE: LAST BILLED DATE is updated by the calling function (generate_invoice_manual in routes)
         # This avoids duplicate rows in SNF sheet
         
+        live_updates.publish("invoices", "invoice_posted", invoice_ref, {
+            "invoice_ref": invoice_ref, "invoice_date": invoice_date, "patient_name": client_record.get("PATIENT NAME", ""),
+            "amount": total_amount, "source": "patientadmission",
+        })
+        
         return {
             "invoice_ref": invoice_ref,
             "invoice_date": invoice_date,
@@ -638,11 +589,6 @@ def create_patientadmission_client(client_data: Dict[str, Any]) -> Dict[str, Any
         Result dictionary with status and message
     """
     try:
-        worksheet = get_patientadmission_sheet()
-        
-        # Get headers
-        headers = worksheet.row_values(1)
-        
         # Convert date from YYYY-MM-DD to DD/MM/YYYY
         service_date = client_data.get('service_started_on', '')
         if service_date and '-' in service_date:
@@ -672,8 +618,7 @@ def create_patientadmission_client(client_data: Dict[str, Any]) -> Dict[str, Any
                 occupied_bed_days = 0
         
         # Get current row count for SI NO
-        all_values = worksheet.get_all_values()
-        si_no = len(all_values)  # Current row count (including header)
+        si_no = patientadmission_clients.row_count + 1  # Current row count (including header)
         
         # Prepare row data matching the SNF sheet structure
         row_data = {
@@ -702,15 +647,13 @@ def create_patientadmission_client(client_data: Dict[str, Any]) -> Dict[str, Any
             "Location": client_data.get('care_center', ''),
         }
         
-        # Build row values in the same order as headers
-        row_values = []
-        for header in headers:
-            row_values.append(str(row_data.get(header, "")))
-        
-        # Append the row
-        worksheet.append_row(row_values)
+        # Append the row (values are laid out in the sheet's header order)
+        patientadmission_clients.append(row_data)
         
         print(f"[Patient Admission] Created new client: {client_data.get('patient_name')}")
+        patientadmission_clients.publish("client_created", client_data.get('patient_name'), {
+            "patient_name": client_data.get('patient_name'),
+        })
         
         return {
             "status": "success",
@@ -735,33 +678,8 @@ def update_patientadmission_client(patient_name: str, client_data: Dict[str, Any
         Result dictionary with status and message
     """
     try:
-        worksheet = get_patientadmission_sheet()
-        all_values = worksheet.get_all_values()
-        
-        if not all_values or len(all_values) < 2:
-            raise HTTPException(status_code=404, detail="Client not found")
-        
-        headers = all_values[0]
-        header_map = {header: idx for idx, header in enumerate(headers)}
-        
-        # Find the client row
-        client_row_number = None
-        for row_idx, row in enumerate(all_values[1:], start=2):
-            if not any(row):
-                continue
-            
-            # Try both column name variations
-            current_name = ""
-            if "Patient Name" in header_map:
-                current_name = row[header_map["Patient Name"]]
-            elif "PATIENT NAME" in header_map:
-                current_name = row[header_map["PATIENT NAME"]]
-            
-            if current_name.strip().lower() == patient_name.lower():
-                client_row_number = row_idx
-                break
-        
-        if not client_row_number:
+        client = patientadmission_clients.find(patient_name)
+        if not client:
             raise HTTPException(status_code=404, detail=f"Client '{patient_name}' not found")
         
         # Convert date from YYYY-MM-DD to DD/MM/YYYY
@@ -807,13 +725,14 @@ def update_patientadmission_client(patient_name: str, client_data: Dict[str, Any
             "Date_1": datetime.now().strftime("%d/%m/%Y"),  # Auto-populate with current date
         }
         
-        # Update each cell
-        for field, value in updated_data.items():
-            if field in header_map:
-                col_idx = header_map[field] + 1  # gspread uses 1-indexed columns
-                worksheet.update_cell(client_row_number, col_idx, str(value))
+        # Write the changed columns of the client's row in one request
+        try:
+            patientadmission_clients.update(client["_client_id"], updated_data)
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Client '{patient_name}' not found")
         
         print(f"[Patient Admission] Updated client: {patient_name}")
+        patientadmission_clients.publish("client_updated", patient_name, {"patient_name": patient_name})
         
         return {
             "status": "success",
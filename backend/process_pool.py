@@ -0,0 +1,443 @@
+"""
+Process Pool Module
+Runs CPU-heavy work (pandas parsing, Excel reads, PDF rendering) in worker processes as named task types with bounded queues, per-task timeouts, result size limits and shared-memory byte results
+"""
+
+import asyncio
+import importlib
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import instrumentation
+
+# Configuration
+# 0 runs tasks on a thread in this process instead (no isolation; for development and checks)
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+# spawn is safe next to the server's threads and is what Windows uses anyway
+PROCESS_POOL_START_METHOD = os.getenv("PROCESS_POOL_START_METHOD", "spawn")
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("PROCESS_POOL_TIMEOUT_SECONDS", "60"))
+DEFAULT_MAX_QUEUE = int(os.getenv("PROCESS_POOL_MAX_QUEUE", "8"))  # Queued + running tasks of one type
+DEFAULT_MAX_RESULT_BYTES = int(os.getenv("PROCESS_POOL_MAX_RESULT_BYTES", str(64 * 1024 * 1024)))
+# Byte results at least this big come back through shared memory instead of the result pipe
+SHARED_MEMORY_MIN_BYTES = int(os.getenv("PROCESS_POOL_SHARED_MEMORY_MIN_BYTES", str(256 * 1024)))
+
+STREAM_CHUNK_BYTES = 64 * 1024
+# The caller gives up this long after the task's own deadline (a worker that cannot be
+# interrupted, e.g. on Windows, keeps its slot until the task really ends)
+TIMEOUT_GRACE_SECONDS = 5.0
+
+# Shared memory needs POSIX semantics: on Windows a segment dies with its last open handle
+USE_SHARED_MEMORY = os.name == "posix"
+
+QUEUE_WAIT = instrumentation.Histogram(
+    "crm_process_pool_queue_wait_seconds", "Time a task waited for a worker process", ("task",),
+)
+EXECUTION_TIME = instrumentation.Histogram(
+    "crm_process_pool_execution_seconds", "Task run time in the worker process", ("task", "status"),
+    buckets=instrumentation.JOB_BUCKETS,
+)
+REJECTED = instrumentation.Counter(
+    "crm_process_pool_rejected_total", "Tasks refused before running", ("task", "reason"),
+)
+
+
+class ProcessPoolBusy(RuntimeError):
+    """The task type already has max_queue tasks queued or running."""
+
+
+class TaskTimeout(TimeoutError):
+    """The task ran past its timeout."""
+
+
+class ResultTooLarge(RuntimeError):
+    """The task's result is bigger than its max_result_bytes."""
+
+
+class TaskFailed(RuntimeError):
+    """The task raised an exception that cannot be sent back from the worker as is."""
+
+
+# task name -> {"target", "timeout", "max_queue", "max_result_bytes"}
+_tasks: Dict[str, Dict[str, Any]] = {}
+_inflight: Dict[str, int] = {}
+_stats: Dict[str, Dict[str, float]] = {}
+_lock = threading.Lock()
+_executor: Optional[Union[ProcessPoolExecutor, ThreadPoolExecutor]] = None
+
+
+def register_task(name: str, target: str, timeout: float = DEFAULT_TIMEOUT_SECONDS,
+                  max_queue: int = DEFAULT_MAX_QUEUE, max_result_bytes: int = DEFAULT_MAX_RESULT_BYTES) -> None:
+    """
+    Register a named task type.
+
+    Args:
+        name: Task type name used by callers and in metrics
+        target: "module:function" run in the worker; the module is imported there, so the
+                caller's process never has to load it (e.g. reportlab)
+        timeout: Seconds a task may run
+        max_queue: Tasks of this type queued or running at once; more are refused
+        max_result_bytes: Largest result (bytes, or the pickled result) sent back
+    """
+    with _lock:
+        _tasks[name] = {"target": target, "timeout": timeout, "max_queue": max_queue,
+                        "max_result_bytes": max_result_bytes}
+        _inflight.setdefault(name, 0)
+        _stats.setdefault(name, {"completed": 0, "failed": 0, "timeouts": 0, "rejected": 0,
+                                 "wait_seconds": 0.0, "run_seconds": 0.0})
+
+
+# --- Worker side ---
+
+class SharedBytes:
+    """
+    Bytes a worker left in a shared memory segment. `view` reads them in place; close()
+    (or the end of stream()) releases the segment.
+    """
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self._shm = None
+        self._owned = False  # The worker's copy must not release what it hands over
+
+    def __getstate__(self):
+        return self.name, self.size
+
+    def __setstate__(self, state):
+        self.name, self.size = state
+        self._shm = None
+        self._owned = True
+
+    def _attach(self):
+        if self._shm is None:
+            from multiprocessing import shared_memory
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        return self._shm
+
+    @property
+    def view(self) -> memoryview:
+        return self._attach().buf[:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def tobytes(self) -> bytes:
+        return bytes(self.view)
+
+    def stream(self, chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+        """The bytes in chunks (for StreamingResponse), releasing the segment at the end."""
+        try:
+            view = self.view
+            for start in range(0, self.size, chunk_size):
+                yield bytes(view[start:start + chunk_size])
+            del view
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Release the segment (idempotent)."""
+        if not self.name:
+            return
+        try:
+            shm = self._attach()
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        finally:
+            self._shm = None
+            self.name = ""
+
+    def __enter__(self) -> "SharedBytes":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __del__(self):
+        if not self._owned:
+            return
+        try:
+            self.close()  # A caller that never read the result must not leak the segment
+        except Exception:
+            pass
+
+
+def _to_shared_memory(data: Union[bytes, bytearray, memoryview]) -> SharedBytes:
+    from multiprocessing import resource_tracker, shared_memory
+    shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    shm.buf[:len(data)] = data
+    # The caller's process owns the segment from here: it attaches, reads and unlinks it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return SharedBytes(shm.name, len(data))
+
+
+def _portable(error: BaseException) -> BaseException:
+    """The exception itself if it survives the trip back from the worker, else a TaskFailed."""
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return TaskFailed(f"{type(error).__name__}: {error}")
+
+
+def _on_alarm(signum, frame):
+    raise TaskTimeout("task timed out in the worker")
+
+
+def _execute(name: str, target: str, args: tuple, kwargs: dict, timeout: float,
+             max_result_bytes: int, shared_memory_min: Optional[int]) -> Dict[str, Any]:
+    """Run one task (in the worker) and package its result; times are wall clock for the caller."""
+    started = time.time()
+    alarm = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    try:
+        if alarm:
+            signal.signal(signal.SIGALRM, _on_alarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        module_name, func_name = target.split(":")
+        result = getattr(importlib.import_module(module_name), func_name)(*args, **kwargs)
+    except BaseException as e:
+        raise _portable(e)
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    finished = time.time()
+
+    if isinstance(result, (bytes, bytearray, memoryview)):
+        size = len(result)
+        if size > max_result_bytes:
+            raise ResultTooLarge(f"{name} returned {size} bytes (limit {max_result_bytes})")
+        if shared_memory_min is not None and size >= shared_memory_min:
+            return {"started": started, "finished": finished, "size": size, "shared": _to_shared_memory(result)}
+        return {"started": started, "finished": finished, "size": size, "value": bytes(result)}
+
+    blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(blob) > max_result_bytes:
+        raise ResultTooLarge(f"{name} returned {len(blob)} bytes pickled (limit {max_result_bytes})")
+    return {"started": started, "finished": finished, "size": len(blob), "pickled": blob}
+
+
+def _warm() -> int:
+    return os.getpid()
+
+
+# --- Caller side ---
+
+def _get_executor() -> Union[ProcessPoolExecutor, ThreadPoolExecutor]:
+    global _executor
+    with _lock:
+        if _executor is None:
+            if PROCESS_POOL_WORKERS > 0:
+                _executor = ProcessPoolExecutor(
+                    max_workers=PROCESS_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context(PROCESS_POOL_START_METHOD),
+                )
+            else:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="process-pool")
+            print(f"[Process Pool] Started with {PROCESS_POOL_WORKERS or 'no'} worker processes "
+                  f"({PROCESS_POOL_START_METHOD if PROCESS_POOL_WORKERS else 'threads'})")
+        return _executor
+
+
+def _reset_broken(executor) -> None:
+    """Drop a pool whose worker died (killed, out of memory); the next task starts a new one."""
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+    print("[Process Pool] A worker process died; the pool will be restarted")
+
+
+def submit(name: str, *args: Any, **kwargs: Any) -> Future:
+    """
+    Queue a task; the future resolves to its result (see `run`).
+
+    Raises:
+        KeyError: Unknown task type
+        ProcessPoolBusy: The task type's queue is full
+    """
+    with _lock:
+        task = _tasks[name]
+        if _inflight[name] >= task["max_queue"]:
+            _stats[name]["rejected"] += 1
+            REJECTED.inc(name, "queue_full")
+            raise ProcessPoolBusy(f"Too many '{name}' tasks in progress, try again shortly")
+        _inflight[name] += 1
+
+    submitted = time.time()
+    outer: Future = Future()
+    shared_min = SHARED_MEMORY_MIN_BYTES if USE_SHARED_MEMORY and PROCESS_POOL_WORKERS > 0 else None
+    executor = _get_executor()
+    try:
+        inner = executor.submit(_execute, name, task["target"], args, kwargs, task["timeout"],
+                                task["max_result_bytes"], shared_min)
+    except BrokenProcessPool as e:
+        _reset_broken(executor)
+        with _lock:
+            _inflight[name] -= 1
+        raise RuntimeError(f"Process pool unavailable: {e}")
+
+    def done(inner: Future) -> None:
+        # The slot is released when the worker is really done, not when a caller gives up
+        with _lock:
+            _inflight[name] -= 1
+        error = inner.exception()
+        if isinstance(error, BrokenProcessPool):
+            _reset_broken(executor)
+        status = "ok" if error is None else ("timeout" if isinstance(error, TaskTimeout) else "error")
+        with _lock:
+            stats = _stats[name]
+            stats["completed" if error is None else ("timeouts" if status == "timeout" else "failed")] += 1
+        if error is None:
+            packed = inner.result()
+            wait, run = max(packed["started"] - submitted, 0.0), packed["finished"] - packed["started"]
+            QUEUE_WAIT.observe(name, value=wait)
+            EXECUTION_TIME.observe(name, status, value=run)
+            with _lock:
+                stats["wait_seconds"] += wait
+                stats["run_seconds"] += run
+        else:
+            EXECUTION_TIME.observe(name, status, value=time.time() - submitted)
+        if outer.set_running_or_notify_cancel():
+            if error is not None:
+                outer.set_exception(error)
+            elif "pickled" in packed:
+                outer.set_result(pickle.loads(packed["pickled"]))
+            else:
+                outer.set_result(packed.get("shared") or packed.get("value"))
+        elif error is None and packed.get("shared") is not None:
+            packed["shared"].close()  # Nobody is waiting for it any more
+
+    inner.add_done_callback(done)
+    return outer
+
+
+def _deadline(name: str) -> float:
+    return _tasks[name]["timeout"] + TIMEOUT_GRACE_SECONDS
+
+
+async def run(name: str, *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a task in the pool without blocking the event loop.
+
+    Returns:
+        The task's result; a large bytes result arrives as SharedBytes (close it, or
+        return it with bytes_response, which streams and releases it)
+
+    Raises:
+        ProcessPoolBusy, TaskTimeout, ResultTooLarge, or the task's own exception
+    """
+    future = submit(name, *args, **kwargs)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), _deadline(name))
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise TaskTimeout(f"'{name}' did not finish within {_tasks[name]['timeout']:.0f}s")
+
+
+def run_sync(name: str, *args: Any, **kwargs: Any) -> Any:
+    """`run` for code already on a worker thread (e.g. inside run_in_threadpool)."""
+    future = submit(name, *args, **kwargs)
+    try:
+        return future.result(timeout=_deadline(name))
+    except TimeoutError:
+        future.cancel()
+        raise TaskTimeout(f"'{name}' did not finish within {_tasks[name]['timeout']:.0f}s")
+
+
+def as_bytes(result: Union[bytes, SharedBytes]) -> bytes:
+    """A task's bytes result as plain bytes (copies and releases shared memory)."""
+    if isinstance(result, SharedBytes):
+        with result:
+            return result.tobytes()
+    return result
+
+
+def bytes_response(result: Union[bytes, SharedBytes], media_type: str, headers: Optional[Dict[str, str]] = None):
+    """A StreamingResponse for a task's bytes result, read straight from shared memory when it came that way."""
+    from fastapi.responses import StreamingResponse
+
+    headers = dict(headers or {})
+    headers["Content-Length"] = str(len(result))
+    if isinstance(result, SharedBytes):
+        return StreamingResponse(result.stream(), media_type=media_type, headers=headers)
+    return StreamingResponse(iter([result]), media_type=media_type, headers=headers)
+
+
+def http_error(error: Exception):
+    """HTTPException for the pool's own errors (busy 503, timeout 504, too large 413), else None."""
+    from fastapi import HTTPException
+
+    if isinstance(error, ProcessPoolBusy):
+        return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "5"})
+    if isinstance(error, TaskTimeout):
+        return HTTPException(status_code=504, detail=str(error))
+    if isinstance(error, ResultTooLarge):
+        return HTTPException(status_code=413, detail=str(error))
+    return None
+
+
+def start() -> None:
+    """Start the worker processes now, so the first request does not pay for the spawn and imports."""
+    executor = _get_executor()
+    if PROCESS_POOL_WORKERS > 0:
+        for _ in range(PROCESS_POOL_WORKERS):
+            executor.submit(_warm)
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def status() -> Dict[str, Any]:
+    """Workers, and per task type: limits, tasks in flight, outcomes and mean queue wait vs run time."""
+    with _lock:
+        tasks = {}
+        for name, task in _tasks.items():
+            stats = _stats[name]
+            done = stats["completed"] or 1
+            tasks[name] = {
+                "target": task["target"],
+                "timeout_seconds": task["timeout"],
+                "max_queue": task["max_queue"],
+                "max_result_bytes": task["max_result_bytes"],
+                "in_flight": _inflight[name],
+                "completed": int(stats["completed"]),
+                "failed": int(stats["failed"]),
+                "timeouts": int(stats["timeouts"]),
+                "rejected": int(stats["rejected"]),
+                "mean_wait_ms": round(stats["wait_seconds"] / done * 1000, 1),
+                "mean_run_ms": round(stats["run_seconds"] / done * 1000, 1),
+            }
+        return {
+            "workers": PROCESS_POOL_WORKERS,
+            "start_method": PROCESS_POOL_START_METHOD if PROCESS_POOL_WORKERS else "threads",
+            "running": _executor is not None,
+            "shared_memory": USE_SHARED_MEMORY and PROCESS_POOL_WORKERS > 0,
+            "shared_memory_min_bytes": SHARED_MEMORY_MIN_BYTES,
+            "tasks": tasks,
+        }
+
+
+def _prometheus_lines() -> List[str]:
+    with _lock:
+        samples = [({"task": name}, count) for name, count in _inflight.items()]
+    return instrumentation.gauge_lines(
+        "crm_process_pool_in_flight", "Tasks queued or running in the process pool", samples,
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
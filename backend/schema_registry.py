@@ -0,0 +1,287 @@
+"""
+Schema Registry Module
+Versioned form schemas (enquiry, admission) with cheap sheet-header change detection and hot-reload events
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+import shared_cache
+
+REGISTRY_FILE = "schema_registry.json"
+SHARED_NAMESPACE = "schema_registry"  # Bumped on publish so other workers reload REGISTRY_FILE
+HISTORY_LIMIT = 20  # Versions of metadata kept per form type
+HEADER_CHECK_SECONDS = int(os.getenv("SCHEMA_HEADER_CHECK_SECONDS", "120"))
+
+FORM_TYPES = ("enquiry", "admission")
+
+# form_type -> {"version", "hash", "source", "updated_at", "fields", "sheet_headers", "history"}
+_registry: Dict[str, Dict[str, Any]] = {}
+_listeners: List[Callable[[Dict[str, Any]], None]] = []
+_lock = threading.RLock()
+_loaded = False
+
+# Global scheduler instance for the header watch
+scheduler = None
+
+
+def content_hash(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _read_file() -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(REGISTRY_FILE):
+        return {}
+    try:
+        with open(REGISTRY_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return {k: v for k, v in data.items() if isinstance(v, dict)}
+    except Exception as e:
+        print(f"[Schema Registry] Could not read {REGISTRY_FILE}: {e}")
+    return {}
+
+
+def load_registry() -> None:
+    """Load the persisted registry once (a single small JSON read)."""
+    global _loaded
+    with _lock:
+        if _loaded:
+            return
+        _loaded = True
+        _registry.update(_read_file())
+    shared_cache.watch(SHARED_NAMESPACE, reload_registry)
+
+
+def reload_registry(generation: int = 0) -> None:
+    """
+    Pick up schemas another worker published (REGISTRY_FILE was rewritten) and
+    notify listeners with source "disk" for every form type whose version moved.
+    """
+    published = []
+    with _lock:
+        for form_type, entry in _read_file().items():
+            current = _registry.get(form_type)
+            if current and entry.get("version", 0) <= current.get("version", 0):
+                continue
+            _registry[form_type] = entry
+            if entry.get("fields") is not None:
+                published.append((form_type, entry.get("version", 0)))
+
+    for form_type, version in published:
+        print(f"[Schema Registry] {form_type} schema v{version} reloaded from another worker")
+        _emit({"type": "schema_published", "form_type": form_type, "version": version, "source": "disk"})
+
+
+def _persist() -> None:
+    tmp_path = REGISTRY_FILE + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_registry, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, REGISTRY_FILE)
+    except Exception as e:
+        print(f"[Schema Registry] Could not write {REGISTRY_FILE}: {e}")
+
+
+def subscribe(listener: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    Register a hot-reload listener.
+
+    Args:
+        listener: Called with an event dict; "type" is "schema_published" or "headers_changed"
+    """
+    with _lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def _emit(event: Dict[str, Any]) -> None:
+    for listener in list(_listeners):
+        try:
+            listener(event)
+        except Exception as e:
+            print(f"[Schema Registry] Listener error for {event.get('type')}: {e}")
+
+
+def get_fields(form_type: str) -> Optional[List[Dict[str, Any]]]:
+    """Current schema fields for a form type (a copy), or None if nothing is registered yet."""
+    load_registry()
+    with _lock:
+        entry = _registry.get(form_type)
+        if not entry or entry.get("fields") is None:
+            return None
+        return copy.deepcopy(entry["fields"])
+
+
+def get_version(form_type: str) -> int:
+    load_registry()
+    with _lock:
+        entry = _registry.get(form_type)
+        return entry["version"] if entry else 0
+
+
+def publish(form_type: str, fields: List[Dict[str, Any]], source: str) -> Dict[str, Any]:
+    """
+    Store a schema for a form type. A new version is only created when the
+    content differs from the current one; listeners are notified in that case.
+
+    Args:
+        form_type: "enquiry" or "admission"
+        fields: Schema field list
+        source: Where the schema came from (excel, csv, update_fields, ...)
+
+    Returns:
+        {"version", "changed"}
+    """
+    load_registry()
+    new_hash = content_hash(fields)
+    with _lock:
+        entry = _registry.get(form_type)
+        if entry and entry.get("hash") == new_hash:
+            return {"version": entry["version"], "changed": False}
+
+        version = (entry["version"] if entry else 0) + 1
+        now = datetime.now().isoformat()
+        history = list(entry.get("history", [])) if entry else []
+        history.append({"version": version, "hash": new_hash, "source": source, "updated_at": now})
+        _registry[form_type] = {
+            "version": version,
+            "hash": new_hash,
+            "source": source,
+            "updated_at": now,
+            "fields": copy.deepcopy(fields),
+            "sheet_headers": dict(entry.get("sheet_headers", {})) if entry else {},
+            "history": history[-HISTORY_LIMIT:],
+        }
+        _persist()
+    shared_cache.invalidate(SHARED_NAMESPACE)
+
+    print(f"[Schema Registry] {form_type} schema v{version} published from {source} ({len(fields)} fields)")
+    _emit({"type": "schema_published", "form_type": form_type, "version": version, "source": source})
+    return {"version": version, "changed": True}
+
+
+def check_sheet_headers(form_type: str, sheet_name: str, headers: List[str]) -> bool:
+    """
+    Compare a sheet's header row against the last seen header hash.
+
+    Args:
+        form_type: Form type the sheet backs
+        sheet_name: Worksheet title
+        headers: Header row (from a ranged read of 1:1)
+
+    Returns:
+        True when the headers changed since the last check
+    """
+    load_registry()
+    headers = [str(h).strip() for h in headers]
+    new_hash = content_hash(headers)
+    with _lock:
+        entry = _registry.setdefault(form_type, {
+            "version": 0, "hash": None, "source": None, "updated_at": None,
+            "fields": None, "sheet_headers": {}, "history": [],
+        })
+        seen = entry.setdefault("sheet_headers", {}).get(sheet_name)
+        if seen and seen.get("hash") == new_hash:
+            return False
+        entry["sheet_headers"][sheet_name] = {
+            "hash": new_hash,
+            "headers": headers,
+            "checked_at": datetime.now().isoformat(),
+        }
+        _persist()
+
+    if seen is None:
+        return False  # First sighting only records the baseline
+
+    old_headers = seen.get("headers", [])
+    event = {
+        "type": "headers_changed",
+        "form_type": form_type,
+        "sheet": sheet_name,
+        "added": [h for h in headers if h not in old_headers],
+        "removed": [h for h in old_headers if h not in headers],
+    }
+    print(f"[Schema Registry] Header change on '{sheet_name}': +{event['added']} -{event['removed']}")
+    _emit(event)
+    return True
+
+
+def build_in_background(form_type: str, builder: Callable[[], List[Dict[str, Any]]], source: str) -> threading.Thread:
+    """
+    Build a schema off the request path (e.g. from the Excel template) and publish it.
+    """
+    def run():
+        try:
+            fields = builder()
+            if fields:
+                publish(form_type, fields, source)
+        except Exception as e:
+            print(f"[Schema Registry] Background build from {source} failed: {e}")
+
+    thread = threading.Thread(target=run, name=f"schema-build-{form_type}", daemon=True)
+    thread.start()
+    return thread
+
+
+def status() -> Dict[str, Any]:
+    """Versions, sources and watched sheet headers per form type (fields omitted)."""
+    load_registry()
+    with _lock:
+        return {
+            form_type: {
+                "version": entry.get("version", 0),
+                "source": entry.get("source"),
+                "updated_at": entry.get("updated_at"),
+                "field_count": len(entry.get("fields") or []),
+                "sheets": {
+                    name: {"hash": s.get("hash"), "checked_at": s.get("checked_at")}
+                    for name, s in entry.get("sheet_headers", {}).items()
+                },
+                "history": entry.get("history", []),
+            }
+            for form_type, entry in _registry.items()
+        }
+
+
+def start_header_watch(check: Callable[[], Any], seconds: int = HEADER_CHECK_SECONDS) -> None:
+    """
+    Periodically run `check` (which reads the header rows and calls check_sheet_headers).
+    """
+    global scheduler
+
+    if scheduler is not None or seconds <= 0:
+        return
+    try:
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(
+            check,
+            trigger=IntervalTrigger(seconds=seconds),
+            id='schema_header_watch',
+            name='Schema Header Watch',
+            replace_existing=True
+        )
+        scheduler.start()
+        print(f"[Schema Registry] Header watch started (every {seconds}s)")
+    except Exception as e:
+        print(f"[Schema Registry] Failed to start header watch: {e}")
+        scheduler = None
+
+
+def stop_header_watch() -> None:
+    global scheduler
+
+    if scheduler is None:
+        return
+    try:
+        scheduler.shutdown(wait=False)
+    finally:
+        scheduler = None
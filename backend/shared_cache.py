@@ -0,0 +1,461 @@
+"""
+Shared Cache Module
+SQLite-backed cache shared by every uvicorn worker on the host, with per-namespace version stamps, invalidation broadcast and cross-process single-flight refresh
+"""
+
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import instrumentation
+
+# Configuration
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "shared_cache.db")
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "1").strip() == "1"
+FILL_LEASE_SECONDS = float(os.getenv("SHARED_CACHE_FILL_LEASE_SECONDS", "60"))  # A filler that crashed is taken over after this
+WATCH_SECONDS = float(os.getenv("SHARED_CACHE_WATCH_SECONDS", "2"))
+WAIT_POLL_SECONDS = 0.05
+
+# Every namespace has a generation; entries written under an older generation are stale.
+# invalidate() bumps the generation, which every worker sees on its next read.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    namespace TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    stamp TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS fill_locks (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    lease_until REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+_MISS = object()
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+_keeper: Optional[sqlite3.Connection] = None  # Keeps the in-memory database alive when the cache is disabled
+
+# (namespace, key) -> (stamp, value): decoded values, reused while the shared stamp is unchanged
+_decoded: Dict[Tuple[str, str], Tuple[str, Any]] = {}
+_decoded_lock = threading.Lock()
+_flight_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_flight_guard = threading.Lock()
+
+_watchers: Dict[str, List[Callable[[int], None]]] = {}
+_seen_generations: Dict[str, int] = {}
+_watch_thread: Optional[threading.Thread] = None
+
+_stats: Dict[str, int] = {
+    "hits": 0,
+    "misses": 0,
+    "decoded_reuse": 0,
+    "fills": 0,
+    "fill_waits": 0,
+    "fill_waits_skipped": 0,  # On the event loop: loaded locally instead of waiting for another fill
+    "invalidations": 0,
+    "errors": 0,
+}
+
+
+def _database() -> Tuple[str, bool]:
+    if SHARED_CACHE_ENABLED:
+        return SHARED_CACHE_PATH, False
+    # Disabled: same code path against a process-private in-memory database
+    return f"file:crm-cache-{os.getpid()}?mode=memory&cache=shared", True
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread (and process, in case workers were forked after first use)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+    path, uri = _database()
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None, uri=uri, check_same_thread=False)
+    if not uri:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # Cache data can always be refetched from Sheets
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def init_db() -> None:
+    global _initialized, _keeper
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        path, uri = _database()
+        if uri:
+            _keeper = sqlite3.connect(path, uri=uri, check_same_thread=False)
+        _connect().executescript(SCHEMA)
+        _initialized = True
+
+
+def _generation(conn: sqlite3.Connection, namespace: str) -> int:
+    row = conn.execute("SELECT generation FROM generations WHERE namespace = ?", (namespace,)).fetchone()
+    return row[0] if row else 0
+
+
+def _lookup(namespace: str, key: str) -> Any:
+    """Current value or _MISS. Only the small stamp row is read when this process already decoded the value."""
+    init_db()
+    try:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT e.stamp, e.expires_at, e.generation, COALESCE(g.generation, 0) "
+            "FROM entries e LEFT JOIN generations g ON g.namespace = e.namespace "
+            "WHERE e.namespace = ? AND e.key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None or row[1] < time.time() or row[2] != row[3]:
+            _stats["misses"] += 1
+            return _MISS
+        stamp = row[0]
+        with _decoded_lock:
+            decoded = _decoded.get((namespace, key))
+        if decoded is not None and decoded[0] == stamp:
+            _stats["hits"] += 1
+            _stats["decoded_reuse"] += 1
+            return decoded[1]
+        blob = conn.execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ? AND stamp = ?", (namespace, key, stamp)
+        ).fetchone()
+        if blob is None:  # Replaced between the two reads
+            _stats["misses"] += 1
+            return _MISS
+        value = pickle.loads(blob[0])
+        with _decoded_lock:
+            _decoded[(namespace, key)] = (stamp, value)
+        _stats["hits"] += 1
+        return value
+    except Exception as e:
+        _stats["errors"] += 1
+        print(f"[Shared Cache] Read failed for {namespace}/{key}: {e}")
+        return _MISS
+
+
+def get(namespace: str, key: str) -> Optional[Any]:
+    """
+    Get a cached value visible to all workers.
+
+    Args:
+        namespace: Cache name (e.g. "patient_search"); invalidated as a unit
+        key: Entry key within the namespace
+
+    Returns:
+        The value, or None when missing, expired or invalidated
+    """
+    value = _lookup(namespace, key)
+    return None if value is _MISS else value
+
+
+def set(namespace: str, key: str, value: Any, ttl_seconds: float, generation: Optional[int] = None) -> None:
+    """
+    Store a value for all workers.
+
+    Args:
+        namespace: Cache name
+        key: Entry key
+        value: Any picklable value
+        ttl_seconds: Time to live
+        generation: Namespace generation the value was loaded under (defaults to the current one);
+                    an invalidate() that happened after that makes the entry stale immediately
+    """
+    init_db()
+    stamp = uuid.uuid4().hex
+    now = time.time()
+    try:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = _connect()
+        if generation is None:
+            generation = _generation(conn, namespace)
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, generation, stamp, value, expires_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (namespace, key, generation, stamp, blob, now + ttl_seconds, now),
+        )
+        with _decoded_lock:
+            _decoded[(namespace, key)] = (stamp, value)
+    except Exception as e:
+        _stats["errors"] += 1
+        print(f"[Shared Cache] Write failed for {namespace}/{key}: {e}")
+
+
+def delete(namespace: str, key: str) -> None:
+    """Drop one entry for all workers."""
+    init_db()
+    try:
+        _connect().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+    except Exception as e:
+        _stats["errors"] += 1
+        print(f"[Shared Cache] Delete failed for {namespace}/{key}: {e}")
+    with _decoded_lock:
+        _decoded.pop((namespace, key), None)
+
+
+def invalidate(namespace: str) -> int:
+    """
+    Invalidate a whole namespace in every worker (atomic generation bump).
+
+    Returns:
+        The new generation
+    """
+    init_db()
+    generation = 0
+    try:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO generations (namespace, generation, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1, updated_at = excluded.updated_at",
+                (namespace, time.time()),
+            )
+            generation = _generation(conn, namespace)
+            conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _stats["invalidations"] += 1
+    except Exception as e:
+        _stats["errors"] += 1
+        print(f"[Shared Cache] Invalidate failed for {namespace}: {e}")
+    with _decoded_lock:
+        for cache_key in [k for k in _decoded if k[0] == namespace]:
+            del _decoded[cache_key]
+    _seen_generations[namespace] = generation  # Our own bump is not a remote event
+    return generation
+
+
+def generation(namespace: str) -> int:
+    init_db()
+    try:
+        return _generation(_connect(), namespace)
+    except Exception as e:
+        _stats["errors"] += 1
+        print(f"[Shared Cache] Generation read failed for {namespace}: {e}")
+        return 0
+
+
+def _owner() -> str:
+    return f"{os.getpid()}:{threading.get_ident()}"
+
+
+def _try_acquire_fill(namespace: str, key: str) -> bool:
+    now = time.time()
+    conn = _connect()
+    cursor = conn.execute(
+        "INSERT INTO fill_locks (namespace, key, owner, lease_until) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(namespace, key) DO UPDATE SET owner = excluded.owner, lease_until = excluded.lease_until "
+        "WHERE fill_locks.lease_until < ? OR fill_locks.owner = excluded.owner",
+        (namespace, key, _owner(), now + FILL_LEASE_SECONDS, now),
+    )
+    return cursor.rowcount == 1
+
+
+def _release_fill(namespace: str, key: str) -> None:
+    try:
+        _connect().execute(
+            "DELETE FROM fill_locks WHERE namespace = ? AND key = ? AND owner = ?", (namespace, key, _owner())
+        )
+    except Exception as e:
+        print(f"[Shared Cache] Could not release fill lock {namespace}/{key}: {e}")
+
+
+def _flight_lock(namespace: str, key: str) -> threading.Lock:
+    with _flight_guard:
+        return _flight_locks.setdefault((namespace, key), threading.Lock())
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def get_or_load(namespace: str, key: str, loader: Callable[[], Any], ttl_seconds: float,
+                wait_seconds: float = FILL_LEASE_SECONDS) -> Any:
+    """
+    Return the cached value, or load it once across all workers (single-flight).
+
+    Threads of this process queue on a local lock; processes race for a short
+    SQLite lease. The winner runs `loader` and stores the result, everyone else
+    polls the shared entry until it appears. If the winner takes longer than
+    `wait_seconds` the waiter loads the value itself. Called on the event loop
+    thread it never waits: if another thread or worker is filling the entry,
+    it loads the value itself straight away (call it via run_in_threadpool to
+    share the fill instead).
+
+    Args:
+        namespace: Cache name
+        key: Entry key
+        loader: Fetches the value (typically from Google Sheets)
+        ttl_seconds: Time to live of the stored value
+        wait_seconds: How long to wait for another worker's fill
+
+    Returns:
+        The cached or freshly loaded value
+    """
+    value = _lookup(namespace, key)
+    if value is not _MISS:
+        return value
+
+    on_loop = _on_event_loop()
+    flight = _flight_lock(namespace, key)
+    if not flight.acquire(blocking=not on_loop):
+        _stats["fill_waits_skipped"] += 1
+        return loader()
+    try:
+        value = _lookup(namespace, key)
+        if value is not _MISS:
+            return value
+
+        deadline = time.time() + wait_seconds
+        waited = False
+        while True:
+            try:
+                acquired = _try_acquire_fill(namespace, key)
+            except Exception as e:
+                _stats["errors"] += 1
+                print(f"[Shared Cache] Fill lock failed for {namespace}/{key}: {e}")
+                return loader()
+
+            if acquired:
+                try:
+                    value = _lookup(namespace, key)
+                    if value is not _MISS:
+                        return value
+                    loaded_under = generation(namespace)
+                    value = loader()
+                    set(namespace, key, value, ttl_seconds, generation=loaded_under)
+                    _stats["fills"] += 1
+                    return value
+                finally:
+                    _release_fill(namespace, key)
+
+            if on_loop:
+                _stats["fill_waits_skipped"] += 1
+                return loader()
+            if not waited:
+                waited = True
+                _stats["fill_waits"] += 1
+            time.sleep(WAIT_POLL_SECONDS)
+            value = _lookup(namespace, key)
+            if value is not _MISS:
+                return value
+            if time.time() > deadline:
+                print(f"[Shared Cache] Gave up waiting for {namespace}/{key} fill; loading locally")
+                return loader()
+    finally:
+        flight.release()
+
+
+def purge_expired() -> int:
+    """Delete expired entries and stale fill locks; returns the number of entries removed."""
+    init_db()
+    now = time.time()
+    try:
+        conn = _connect()
+        removed = conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,)).rowcount
+        conn.execute("DELETE FROM fill_locks WHERE lease_until < ?", (now,))
+        return removed
+    except Exception as e:
+        _stats["errors"] += 1
+        print(f"[Shared Cache] Purge failed: {e}")
+        return 0
+
+
+def watch(namespace: str, callback: Callable[[int], None]) -> None:
+    """
+    Call `callback(generation)` when another process invalidates `namespace`.
+    Polled every WATCH_SECONDS by one daemon thread per process.
+    """
+    global _watch_thread
+    _seen_generations.setdefault(namespace, generation(namespace))
+    _watchers.setdefault(namespace, []).append(callback)
+    if _watch_thread is None or not _watch_thread.is_alive():
+        _watch_thread = threading.Thread(target=_watch_loop, name="shared-cache-watch", daemon=True)
+        _watch_thread.start()
+
+
+def _watch_loop() -> None:
+    while True:
+        time.sleep(WATCH_SECONDS)
+        try:
+            rows = _connect().execute("SELECT namespace, generation FROM generations").fetchall()
+        except Exception as e:
+            print(f"[Shared Cache] Watch poll failed: {e}")
+            continue
+        for namespace, current in rows:
+            if namespace not in _watchers or _seen_generations.get(namespace) == current:
+                continue
+            _seen_generations[namespace] = current
+            for callback in list(_watchers[namespace]):
+                try:
+                    callback(current)
+                except Exception as e:
+                    print(f"[Shared Cache] Watcher error for {namespace}: {e}")
+
+
+def status() -> Dict[str, Any]:
+    """Backing file, generations and entry counts per namespace, and this process's counters."""
+    init_db()
+    conn = _connect()
+    namespaces: Dict[str, Dict[str, Any]] = {}
+    for namespace, current in conn.execute("SELECT namespace, generation FROM generations"):
+        namespaces[namespace] = {"generation": current, "entries": 0, "bytes": 0}
+    for namespace, count, size in conn.execute(
+        "SELECT namespace, COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries WHERE expires_at >= ? GROUP BY namespace",
+        (time.time(),),
+    ):
+        entry = namespaces.setdefault(namespace, {"generation": 0, "entries": 0, "bytes": 0})
+        entry.update({"entries": count, "bytes": size})
+    return {
+        "enabled": SHARED_CACHE_ENABLED,
+        "path": SHARED_CACHE_PATH if SHARED_CACHE_ENABLED else None,
+        "pid": os.getpid(),
+        "namespaces": namespaces,
+        "stats": dict(_stats),
+    }
+
+
+def _prometheus_lines() -> List[str]:
+    current = status()
+    return (
+        instrumentation.gauge_lines(
+            "crm_shared_cache_entries", "Live entries in the cross-worker cache",
+            [({"namespace": ns}, info["entries"]) for ns, info in current["namespaces"].items()],
+        )
+        + instrumentation.gauge_lines(
+            "crm_shared_cache_generation", "Invalidation generation per cache namespace",
+            [({"namespace": ns}, info["generation"]) for ns, info in current["namespaces"].items()],
+        )
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -0,0 +1,446 @@
+"""
+Sheets Request Scheduler Module
+Quota-aware gate for every Google Sheets API call: token buckets per spreadsheet and per user, priority lanes and 429/503 backoff.
+Calls made on the event loop thread (sync Sheets calls inside `async def` routes) never wait: they fail fast with SheetsQuotaExceeded instead of freezing every other request.
+"""
+
+import asyncio
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+import gspread
+from gspread.exceptions import APIError
+
+import instrumentation
+
+# Configuration (Google's default quota is 60 read and 60 write requests per minute per user)
+USER_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_USER_REQUESTS_PER_MINUTE", "60"))
+SPREADSHEET_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_SPREADSHEET_REQUESTS_PER_MINUTE", "60"))
+MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = float(os.getenv("SHEETS_BACKOFF_BASE_SECONDS", "1.0"))
+BACKOFF_MAX_SECONDS = float(os.getenv("SHEETS_BACKOFF_MAX_SECONDS", "32.0"))
+RETRY_STATUSES = {429, 503}
+
+# Lanes in priority order. A lane may only take a token while the bucket holds
+# more than its reserve, so batch jobs always leave headroom for interactive calls.
+LANES = ("interactive", "dashboard", "batch")
+LANE_PRIORITY = {name: i for i, name in enumerate(LANES)}
+LANE_RESERVE = {"interactive": 0.0, "dashboard": 0.1, "batch": 0.3}
+LANE_MAX_WAIT_SECONDS = {
+    "interactive": float(os.getenv("SHEETS_INTERACTIVE_MAX_WAIT", "20")),
+    "dashboard": float(os.getenv("SHEETS_DASHBOARD_MAX_WAIT", "60")),
+    "batch": float(os.getenv("SHEETS_BATCH_MAX_WAIT", "900")),
+}
+
+_SPREADSHEET_ID_RE = re.compile(r"/spreadsheets/([a-zA-Z0-9_-]+)")
+_VALUES_RANGE_RE = re.compile(r"/spreadsheets/[a-zA-Z0-9_-]+/values/([^:?]+)")
+
+# Called as listener(spreadsheet_id, worksheet titles or None when unknown, is_append) after each write
+_write_listeners: List[Callable[[str, Optional[List[str]], bool], None]] = []
+
+_lane: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("sheets_lane", default=None)
+
+
+class SheetsQuotaExceeded(Exception):
+    """Raised when a request could not get quota within its lane's wait limit, or kept getting 429s."""
+
+    def __init__(self, message: str, retry_after: float = 30.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        """
+        Refilling token bucket (not thread-safe; guarded by the scheduler lock).
+
+        Args:
+            per_minute: Sustained rate; also the burst capacity
+        """
+        self.capacity = float(max(per_minute, 1))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available_for(self, lane: str) -> float:
+        """Tokens this lane may use after leaving the reserve for higher lanes."""
+        return self.tokens - self.capacity * LANE_RESERVE.get(lane, 0.0)
+
+    def seconds_until(self, lane: str) -> float:
+        missing = 1.0 - self.available_for(lane)
+        return max(missing / self.rate, 0.0)
+
+    def drain(self) -> None:
+        """
+        Empty the bucket after a 429 so every caller slows down, not just the one that was rejected.
+        Interactive calls resume as soon as a token refills; batch calls wait for their reserve.
+        """
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _Waiter:
+    __slots__ = ("lane", "rank", "keys")
+
+    def __init__(self, lane: str, seq: int, keys: List[Tuple[str, str, str]]):
+        self.lane = lane
+        self.rank = (LANE_PRIORITY[lane], seq)
+        self.keys = set(keys)
+
+
+_buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+_waiters: List[_Waiter] = []
+_cond = threading.Condition()
+_seq = 0
+
+_metrics: Dict[str, Dict[str, Any]] = {
+    name: {
+        "queued": 0,
+        "max_queued": 0,
+        "requests": 0,
+        "waited": 0,
+        "wait_seconds": 0.0,
+        "max_wait_seconds": 0.0,
+        "retries": 0,
+        "throttled": 0,
+        "failed": 0,
+        "not_waited_on_loop": 0,
+    }
+    for name in LANES
+}
+_status_counts: Dict[int, int] = {}
+
+
+def current_lane(default: Optional[str] = None) -> str:
+    """Lane of the running call: an explicit `lane()` block wins over the client's default lane."""
+    return _lane.get() or default or "interactive"
+
+
+@contextmanager
+def lane(name: str) -> Iterator[None]:
+    """
+    Run the enclosed Sheets calls in a priority lane.
+
+    Example:
+        with sheets_scheduler.lane("batch"):
+            process_daily_billing()
+    """
+    if name not in LANE_PRIORITY:
+        raise ValueError(f"Unknown Sheets lane '{name}' (expected one of {', '.join(LANES)})")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def on_event_loop() -> bool:
+    """True when called from the thread running an asyncio event loop, where sleeping would block every request."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def bucket_keys(user: str, url: str, method: str) -> List[Tuple[str, str, str]]:
+    """
+    Buckets a request draws from: its user's and (for Sheets API URLs) its spreadsheet's,
+    split into read and write quota like Google's own limits.
+    """
+    kind = "read" if method.lower() == "get" else "write"
+    keys = [("user", user, kind)]
+    match = _SPREADSHEET_ID_RE.search(url or "")
+    if match:
+        keys.append(("spreadsheet", match.group(1), kind))
+    return keys
+
+
+def _bucket(key: Tuple[str, str, str]) -> TokenBucket:
+    bucket = _buckets.get(key)
+    if bucket is None:
+        per_minute = USER_REQUESTS_PER_MINUTE if key[0] == "user" else SPREADSHEET_REQUESTS_PER_MINUTE
+        bucket = _buckets[key] = TokenBucket(per_minute)
+    return bucket
+
+
+def acquire(keys: List[Tuple[str, str, str]], lane_name: str) -> float:
+    """
+    Block until one token is available in every bucket, serving higher lanes
+    (then earlier arrivals) first among requests that share a bucket. On the
+    event loop thread nothing waits: a token is taken only if one is free now.
+
+    Returns:
+        Seconds spent waiting
+
+    Raises:
+        SheetsQuotaExceeded: If the lane's maximum wait is exceeded (immediately on the event loop)
+    """
+    global _seq
+
+    started = time.monotonic()
+    on_loop = on_event_loop()
+    deadline = started + (0.0 if on_loop else LANE_MAX_WAIT_SECONDS.get(lane_name, 60.0))
+    stats = _metrics[lane_name]
+
+    with _cond:
+        _seq += 1
+        waiter = _Waiter(lane_name, _seq, keys)
+        _waiters.append(waiter)
+        stats["queued"] += 1
+        stats["max_queued"] = max(stats["max_queued"], stats["queued"])
+        try:
+            while True:
+                now = time.monotonic()
+                buckets = [_bucket(k) for k in keys]
+                for bucket in buckets:
+                    bucket.refill(now)
+
+                ahead = any(w.rank < waiter.rank and w.keys & waiter.keys for w in _waiters)
+                if not ahead and all(b.available_for(lane_name) >= 1.0 for b in buckets):
+                    for bucket in buckets:
+                        bucket.tokens -= 1.0
+                    break
+
+                if now >= deadline:
+                    stats["throttled"] += 1
+                    if on_loop:
+                        stats["not_waited_on_loop"] += 1
+                    raise SheetsQuotaExceeded(
+                        f"Google Sheets quota busy: waited {now - started:.1f}s in the {lane_name} lane"
+                        + (" (event loop: not waiting)" if on_loop else ""),
+                        retry_after=max(b.seconds_until(lane_name) for b in buckets) or 1.0,
+                    )
+
+                wake_in = 0.05 if ahead else max(b.seconds_until(lane_name) for b in buckets)
+                _cond.wait(timeout=min(max(wake_in, 0.01), deadline - now, 1.0))
+        finally:
+            _waiters.remove(waiter)
+            stats["queued"] -= 1
+            _cond.notify_all()
+
+        waited = time.monotonic() - started
+        stats["requests"] += 1
+        stats["wait_seconds"] += waited
+        if waited > 0.01:
+            stats["waited"] += 1
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+    return waited
+
+
+def penalize(keys: List[Tuple[str, str, str]]) -> None:
+    """Drain the buckets a 429 came from."""
+    with _cond:
+        for key in keys:
+            _bucket(key).drain()
+
+
+def backoff_seconds(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than a Retry-After header."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    try:
+        if retry_after:
+            delay = max(delay, float(retry_after))
+    except ValueError:
+        pass
+    return delay
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_quota_error(error: Optional[BaseException]) -> bool:
+    """True for scheduler throttling and for 429/503 APIErrors that survived the retries."""
+    if isinstance(error, SheetsQuotaExceeded):
+        return True
+    return isinstance(error, APIError) and error_status(error) in RETRY_STATUSES
+
+
+class ScheduledClient(gspread.Client):
+    """
+    gspread client whose every HTTP request passes through the scheduler.
+    """
+
+    def __init__(self, auth, session=None, lane: Optional[str] = None, user: Optional[str] = None):
+        super().__init__(auth, session=session)
+        self.default_lane = lane
+        self.quota_user = user or getattr(auth, "service_account_email", None) or "default"
+
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        lane_name = current_lane(self.default_lane)
+        keys = bucket_keys(self.quota_user, endpoint, method)
+        stats = _metrics[lane_name]
+
+        attempt = 0
+        while True:
+            acquire(keys, lane_name)
+            started = time.perf_counter()
+            try:
+                response = super().request(
+                    method, endpoint, params=params, data=data, json=json, files=files, headers=headers
+                )
+                _observe(method, endpoint, response, time.perf_counter() - started)
+                _notify_write(method, endpoint, json)
+                return response
+            except APIError as e:
+                _observe(method, endpoint, e.response, time.perf_counter() - started)
+                status = error_status(e)
+                with _cond:
+                    _status_counts[status] = _status_counts.get(status, 0) + 1
+                if status not in RETRY_STATUSES:
+                    raise
+                if status == 429:
+                    penalize(keys)
+                if attempt >= MAX_RETRIES:
+                    with _cond:
+                        stats["failed"] += 1
+                    print(f"[Sheets Scheduler] {method.upper()} gave up after {attempt + 1} attempts ({status}, {lane_name} lane)")
+                    raise
+                delay = backoff_seconds(attempt, e.response.headers.get("Retry-After"))
+                if on_event_loop():
+                    # Sleeping here would stall the whole server; let the client retry instead
+                    with _cond:
+                        stats["not_waited_on_loop"] += 1
+                    raise SheetsQuotaExceeded(
+                        f"Google Sheets answered {status} ({lane_name} lane, event loop: not retrying)",
+                        retry_after=max(delay, 1.0),
+                    ) from e
+                with _cond:
+                    stats["retries"] += 1
+                print(f"[Sheets Scheduler] {status} on {method.upper()} ({lane_name} lane), retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+
+def on_write(listener: Callable[[str, Optional[List[str]], bool], None]) -> None:
+    """
+    Register a listener for the app's own successful Sheets writes.
+
+    Args:
+        listener: Called with the spreadsheet id, the worksheet titles the write touched (None for
+                  spreadsheet-level batchUpdates, which may touch any tab) and whether it was a
+                  values append
+    """
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+
+def _range_title(a1_range: str) -> str:
+    title = a1_range.rsplit("!", 1)[0] if "!" in a1_range else a1_range
+    if len(title) >= 2 and title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title
+
+
+def written_worksheets(endpoint: str, json: Any = None) -> Optional[List[str]]:
+    """Worksheet titles a Sheets write request touches, or None when the request does not say."""
+    match = _VALUES_RANGE_RE.search(endpoint or "")
+    if match:
+        return [_range_title(unquote(match.group(1)))]
+    body = json if isinstance(json, dict) else {}
+    if endpoint.endswith("values:batchUpdate"):
+        return sorted({_range_title(item.get("range", "")) for item in body.get("data", [])})
+    if endpoint.endswith("values:batchClear"):
+        return sorted({_range_title(r) for r in body.get("ranges", [])})
+    return None
+
+
+def _notify_write(method: str, endpoint: str, json: Any) -> None:
+    if method.lower() == "get" or not _write_listeners:
+        return
+    match = _SPREADSHEET_ID_RE.search(endpoint or "")
+    if not match:
+        return
+    worksheets = written_worksheets(endpoint, json)
+    for listener in list(_write_listeners):
+        try:
+            listener(match.group(1), worksheets, endpoint.endswith(":append"))
+        except Exception as e:
+            print(f"[Sheets Scheduler] Write listener error: {e}")
+
+
+def _observe(method: str, endpoint: str, response: Any, duration: float) -> None:
+    request = getattr(response, "request", None)
+    body = getattr(request, "body", None) or b""
+    instrumentation.observe_sheets_call(
+        method, endpoint, getattr(response, "status_code", "error"), duration,
+        request_bytes=len(body), response_bytes=len(getattr(response, "content", b"") or b""),
+    )
+
+
+def authorize(credentials, lane: Optional[str] = None) -> ScheduledClient:
+    """
+    Drop-in replacement for gspread.authorize that routes requests through the scheduler.
+
+    Args:
+        credentials: Service account credentials (google-auth or oauth2client)
+        lane: Default lane for this client's requests ("interactive" when omitted)
+
+    Returns:
+        ScheduledClient
+    """
+    if lane is not None and lane not in LANE_PRIORITY:
+        raise ValueError(f"Unknown Sheets lane '{lane}'")
+    return ScheduledClient(credentials, lane=lane)
+
+
+def metrics() -> Dict[str, Any]:
+    """Queue depth, waits and retries per lane plus the current fill of every bucket."""
+    with _cond:
+        now = time.monotonic()
+        buckets = {}
+        for key, bucket in _buckets.items():
+            bucket.refill(now)
+            buckets[":".join(key)] = {
+                "tokens": round(bucket.tokens, 2),
+                "capacity": bucket.capacity,
+            }
+        lanes = {}
+        for name, stats in _metrics.items():
+            lanes[name] = dict(stats)
+            lanes[name]["avg_wait_seconds"] = round(stats["wait_seconds"] / stats["requests"], 4) if stats["requests"] else 0.0
+            lanes[name]["wait_seconds"] = round(stats["wait_seconds"], 3)
+            lanes[name]["max_wait_seconds"] = round(stats["max_wait_seconds"], 3)
+        return {
+            "queue_depth": len(_waiters),
+            "lanes": lanes,
+            "error_statuses": {str(k): v for k, v in _status_counts.items()},
+            "buckets": buckets,
+            "limits": {
+                "user_requests_per_minute": USER_REQUESTS_PER_MINUTE,
+                "spreadsheet_requests_per_minute": SPREADSHEET_REQUESTS_PER_MINUTE,
+                "max_retries": MAX_RETRIES,
+                "lane_reserve": LANE_RESERVE,
+                "lane_max_wait_seconds": LANE_MAX_WAIT_SECONDS,
+            },
+        }
+
+
+def _prometheus_lines() -> List[str]:
+    with _cond:
+        depth = {name: stats["queued"] for name, stats in _metrics.items()}
+        retries = {name: stats["retries"] for name, stats in _metrics.items()}
+    lines = instrumentation.gauge_lines(
+        "crm_sheets_queue_depth", "Sheets requests waiting for quota, by lane",
+        [({"lane": name}, n) for name, n in depth.items()],
+    )
+    lines += instrumentation.gauge_lines(
+        "crm_sheets_retries", "Sheets requests retried after 429/503 since start, by lane",
+        [({"lane": name}, n) for name, n in retries.items()],
+    )
+    return lines
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -0,0 +1,77 @@
+"""
+Server-Sent Events Helpers
+Formats SSE frames and wraps async generators in a disconnect-aware StreamingResponse
+"""
+
+import json
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+# Disable proxy buffering (nginx) and caching so each frame is flushed immediately
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """
+    Build a single SSE frame.
+
+    Args:
+        event: Event name (e.g. "member_ids", "token", "summary")
+        data: JSON-serializable payload
+        event_id: Optional id used by clients for Last-Event-ID resume
+
+    Returns:
+        Encoded frame terminated by a blank line
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    for chunk in payload.split("\n"):
+        lines.append(f"data: {chunk}")
+    return "\n".join(lines) + "\n\n"
+
+
+def format_sse_comment(text: str = "") -> str:
+    """Build an SSE comment frame (used as keep-alive / first byte)."""
+    return f": {text}\n\n"
+
+
+async def stop_on_disconnect(request: Request, events: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Relay frames from `events` until the client disconnects.
+
+    Frames are pulled one at a time, so the producer only advances after
+    the previous frame has been handed to the ASGI server (backpressure).
+    When the client goes away the inner generator is closed, which in turn
+    closes any upstream HTTP stream it holds open.
+    """
+    try:
+        async for frame in events:
+            if await request.is_disconnected():
+                print("[SSE] Client disconnected, cancelling stream")
+                break
+            yield frame
+    finally:
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def sse_response(request: Request, events: AsyncIterator[str]) -> StreamingResponse:
+    """
+    Wrap an async generator of SSE frames in a StreamingResponse.
+    Background tasks injected into the endpoint still run after the stream ends.
+    """
+    return StreamingResponse(
+        stop_on_disconnect(request, events),
+        media_type="text/event-stream",
+        headers=dict(SSE_HEADERS),
+    )
@@ -0,0 +1,187 @@
+"""
+Startup benchmark for the CRM backend.
+Measures `import main` and cold start (import + startup events + first /health) in fresh interpreters,
+lists the slowest modules from `python -X importtime` and checks that heavy libraries stay unloaded at boot.
+
+Usage:
+    python startup_benchmark.py [--runs 5] [--budget 1.0] [--top 15] [--json startup.json]
+
+Exits with status 1 when the median cold start exceeds --budget seconds or a deferred library
+(pandas, openpyxl, reportlab, httpx, googleapiclient) was imported during boot.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Only imported on first use by the routes that need them
+DEFERRED_MODULES = ["pandas", "openpyxl", "reportlab", "httpx", "googleapiclient"]
+
+# Runs in a fresh interpreter; prints one JSON line with the timings and the deferred modules loaded
+CHILD_SCRIPT = """
+import io, json, sys, time, contextlib
+started = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+imported = time.perf_counter()
+result = {"import_s": imported - started}
+harness = set()
+if COLD_START:
+    import schema_registry
+    from fastapi.testclient import TestClient
+    harness = set(sys.modules)  # TestClient itself needs httpx
+    schema_registry.REGISTRY_FILE = REGISTRY_FILE
+    with contextlib.redirect_stdout(io.StringIO()):
+        entered = time.perf_counter()
+        with TestClient(main.app) as client:
+            booted = time.perf_counter()
+            status = client.get("/health").status_code
+            answered = time.perf_counter()
+    # Importing the test harness is not part of the server's cold start
+    result["startup_s"] = booted - entered
+    result["first_request_s"] = answered - booted
+    result["cold_start_s"] = result["import_s"] + (answered - entered)
+    result["health_status"] = status
+result["deferred_loaded"] = [m for m in DEFERRED_MODULES if m in sys.modules and m not in harness]
+print(json.dumps(result))
+"""
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="Median cold start budget in seconds")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list from -X importtime")
+    parser.add_argument("--json", help="Write results to this file")
+    return parser.parse_args(argv)
+
+
+def child_environment(workdir: str) -> Dict[str, str]:
+    """Offline environment: no credentials, throwaway outbox, no background header checks."""
+    env = dict(os.environ)
+    env.update({
+        "CREDENTIALS_FILE": os.path.join(workdir, "missing_credentials.json"),
+        "OUTBOX_DB_PATH": os.path.join(workdir, "outbox.db"),
+        "SHARED_CACHE_PATH": os.path.join(workdir, "shared_cache.db"),
+        "JOB_DB_PATH": os.path.join(workdir, "job_runner.db"),
+        "LIVE_DB_PATH": os.path.join(workdir, "live_updates.db"),
+        "DROPDOWN_DB_PATH": os.path.join(workdir, "dropdown_engine.db"),
+        "CATALOG_DB_PATH": os.path.join(workdir, "catalog_store.db"),
+        "EXPORT_DB_PATH": os.path.join(workdir, "exports.db"),
+        "MEMBER_ID_DB_PATH": os.path.join(workdir, "member_ids.db"),
+        "EXPORT_DIR": os.path.join(workdir, "exports"),
+        "SCHEMA_HEADER_CHECK_SECONDS": "0",
+        "TRACE_SAMPLE_RATE": "0",
+        "LOG_SAMPLE_RATE": "0",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def run_child(cold_start: bool, workdir: str) -> Dict[str, Any]:
+    script = (
+        f"COLD_START = {cold_start!r}\n"
+        f"REGISTRY_FILE = {os.path.join(workdir, 'schema_registry.json')!r}\n"
+        f"DEFERRED_MODULES = {DEFERRED_MODULES!r}\n"
+        + CHILD_SCRIPT
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND_DIR, env=child_environment(workdir),
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark child failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(workdir: str, top: int) -> List[Dict[str, Any]]:
+    """Parse `-X importtime` (stderr) and return the modules with the largest cumulative time."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR,
+        env=child_environment(workdir), capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "self_ms": round(int(self_us) / 1000, 1),
+            "cumulative_ms": round(int(cumulative_us) / 1000, 1),
+            # importtime indents nested imports by two spaces per level
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    # Direct imports of main (depth 1) show what each dependency costs as a whole
+    direct = [r for r in rows if r["depth"] == 1]
+    direct.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return direct[:top]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "median_ms": round(statistics.median(values) * 1000, 1),
+        "min_ms": round(min(values) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+    }
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="crm-startup-")
+
+    # One warm-up run so bytecode compilation is not counted
+    run_child(False, workdir)
+
+    imports = [run_child(False, workdir) for _ in range(args.runs)]
+    cold = [run_child(True, workdir) for _ in range(args.runs)]
+    deferred_loaded = sorted({m for run in imports + cold for m in run["deferred_loaded"]})
+
+    results = {
+        "runs": args.runs,
+        "import_main": summarize([r["import_s"] for r in imports]),
+        "startup_events": summarize([r["startup_s"] for r in cold]),
+        "first_request": summarize([r["first_request_s"] for r in cold]),
+        "cold_start": summarize([r["cold_start_s"] for r in cold]),
+        "health_status": sorted({r["health_status"] for r in cold}),
+        "deferred_loaded_at_boot": deferred_loaded,
+        "slowest_imports": slowest_imports(workdir, args.top),
+    }
+
+    print(f"{'phase':<16}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for phase in ("import_main", "startup_events", "first_request", "cold_start"):
+        row = results[phase]
+        print(f"{phase:<16}{row['median_ms']:>12}{row['min_ms']:>10}{row['max_ms']:>10}")
+    print(f"\nSlowest imports (cumulative, top {args.top}):")
+    for row in results["slowest_imports"]:
+        print(f"  {row['cumulative_ms']:>8.1f} ms  {row['module']}")
+    print(f"\nDeferred libraries loaded at boot: {deferred_loaded or 'none'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    failures = []
+    if results["cold_start"]["median_ms"] > args.budget * 1000:
+        failures.append(f"median cold start {results['cold_start']['median_ms']} ms exceeds {args.budget * 1000:.0f} ms")
+    if deferred_loaded:
+        failures.append(f"deferred libraries imported at boot: {deferred_loaded}")
+    if failures:
+        print("\nStartup budget failed:")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    print("\nStartup within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,264 @@
+"""
+Template Cache Module
+Pre-generated CSV/XLSX upload templates keyed by header-row hash and dropdown version, rebuilt in the background and served as static bytes
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import instrumentation
+
+# Configuration
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "template_cache")  # Shared by all workers on the host
+VALIDATION_ROWS = int(os.getenv("TEMPLATE_VALIDATION_ROWS", "1000"))  # Rows the dropdown lists apply to
+LISTS_SHEET = "Lists"
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+_stats: Dict[str, int] = {"hits": 0, "disk_loads": 0, "builds": 0, "background_builds": 0, "stale_served": 0}
+
+
+def _normalize(name: Any) -> str:
+    return " ".join(str(name or "").split()).casefold()
+
+
+def build_csv(headers: List[str]) -> bytes:
+    """Header-only CSV template."""
+    output = io.StringIO()
+    csv.writer(output).writerow(headers)
+    return output.getvalue().encode("utf-8")
+
+
+def build_xlsx(headers: List[str], dropdowns: Dict[str, List[str]]) -> bytes:
+    """
+    XLSX template with the header row and a list validation on every column that has
+    dropdown options. The options live on a hidden sheet, so lists are not bound by the
+    255-character limit of inline validation formulas.
+
+    Args:
+        headers: Template header row
+        dropdowns: Field -> options (matched to headers case- and whitespace-insensitively)
+    """
+    import openpyxl
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.datavalidation import DataValidation
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Template"
+    ws.append(headers)
+
+    options_by_field = {_normalize(field): options for field, options in dropdowns.items() if options}
+    lists = None
+    list_col = 0
+    for col, header in enumerate(headers, start=1):
+        options = options_by_field.get(_normalize(header))
+        if not options:
+            continue
+        if lists is None:
+            lists = wb.create_sheet(LISTS_SHEET)
+            lists.sheet_state = "hidden"
+        list_col += 1
+        letter = get_column_letter(list_col)
+        lists.cell(row=1, column=list_col, value=header)
+        for row, option in enumerate(options, start=2):
+            lists.cell(row=row, column=list_col, value=option)
+        validation = DataValidation(
+            type="list", formula1=f"={LISTS_SHEET}!${letter}$2:${letter}${len(options) + 1}", allow_blank=True
+        )
+        validation.add(f"{get_column_letter(col)}2:{get_column_letter(col)}{VALIDATION_ROWS + 1}")
+        ws.add_data_validation(validation)
+
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+class TemplateCache:
+    def __init__(self, name: str, headers: Callable[[], List[str]],
+                 dropdowns: Callable[[], Tuple[Any, Dict[str, List[str]]]]):
+        """
+        Upload template artifacts for one header row.
+
+        Args:
+            name: File name stem, e.g. "contact_template"
+            headers: Returns the template header row
+            dropdowns: Returns (version, field -> options) of the dropdown lists
+        """
+        self.name = name
+        self._headers = headers
+        self._dropdowns = dropdowns
+        self._key: Optional[str] = None
+        self._artifacts: Dict[str, bytes] = {}
+        self._built_at: Optional[float] = None
+        self._building: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def key(self) -> str:
+        """Cache key: hash of the header row plus the dropdown version."""
+        headers = self._headers()
+        version, _ = self._dropdowns()
+        digest = hashlib.sha1(json.dumps(headers, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+        return f"{digest}-d{version}"
+
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(TEMPLATE_CACHE_DIR, f"{self.name}-{key}.{fmt}")
+
+    def _load_from_disk(self, key: str) -> Optional[Dict[str, bytes]]:
+        artifacts = {}
+        for fmt in MEDIA_TYPES:
+            try:
+                with open(self._path(key, fmt), "rb") as f:
+                    artifacts[fmt] = f.read()
+            except OSError:
+                return None
+        return artifacts
+
+    def build(self, key: Optional[str] = None) -> str:
+        """
+        Generate both artifacts, write them to TEMPLATE_CACHE_DIR for the other workers
+        and make them current.
+
+        Returns:
+            The key they were built for
+        """
+        headers = list(self._headers())
+        version, dropdowns = self._dropdowns()
+        key = key or self.key()
+        started = time.perf_counter()
+        artifacts = {"csv": build_csv(headers), "xlsx": build_xlsx(headers, dropdowns)}
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        for fmt, body in artifacts.items():
+            tmp = f"{self._path(key, fmt)}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, self._path(key, fmt))
+        with self._lock:
+            self._key, self._artifacts, self._built_at = key, artifacts, time.time()
+        _stats["builds"] += 1
+        self._remove_old(key)
+        print(f"[Template Cache] Built {self.name} {key} in {time.perf_counter() - started:.2f}s "
+              f"({len(headers)} columns, dropdown version {version})")
+        return key
+
+    def _remove_old(self, key: str) -> None:
+        try:
+            for file_name in os.listdir(TEMPLATE_CACHE_DIR):
+                if file_name.startswith(f"{self.name}-") and not file_name.startswith(f"{self.name}-{key}."):
+                    os.remove(os.path.join(TEMPLATE_CACHE_DIR, file_name))
+        except OSError:
+            pass
+
+    def build_in_background(self) -> None:
+        """Rebuild off the request path (at most one build at a time)."""
+        try:
+            key = self.key()
+        except Exception as e:
+            print(f"[Template Cache] Could not compute {self.name} key: {e}")
+            return
+        with self._lock:
+            if self._key == key or self._building == key:
+                return
+            self._building = key
+
+        def run():
+            try:
+                artifacts = self._load_from_disk(key)
+                if artifacts is not None:
+                    with self._lock:
+                        self._key, self._artifacts, self._built_at = key, artifacts, time.time()
+                    _stats["disk_loads"] += 1
+                else:
+                    self.build(key)
+                    _stats["background_builds"] += 1
+            except Exception as e:
+                print(f"[Template Cache] Background build of {self.name} failed: {e}")
+            finally:
+                with self._lock:
+                    if self._building == key:
+                        self._building = None
+
+        threading.Thread(target=run, name=f"template-build-{self.name}", daemon=True).start()
+
+    def get(self, fmt: str) -> Tuple[bytes, str]:
+        """
+        Template bytes for a format and the key they were built for (use it as the ETag version).
+
+        When the header row or the dropdowns changed, the previous artifact is served while
+        the new one is built in the background; only the very first request builds inline.
+        """
+        key = self.key()
+        with self._lock:
+            current_key, artifacts = self._key, self._artifacts
+        if current_key == key:
+            _stats["hits"] += 1
+            instrumentation.record_cache("template", True)
+            return artifacts[fmt], key
+        instrumentation.record_cache("template", False)
+
+        disk = self._load_from_disk(key)
+        if disk is not None:
+            with self._lock:
+                self._key, self._artifacts, self._built_at = key, disk, time.time()
+            _stats["disk_loads"] += 1
+            return disk[fmt], key
+
+        if current_key is not None:
+            self.build_in_background()
+            _stats["stale_served"] += 1
+            return artifacts[fmt], current_key
+
+        key = self.build(key)
+        with self._lock:
+            return self._artifacts[fmt], key
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "key": self._key,
+                "building": self._building,
+                "built_at": self._built_at,
+                "bytes": {fmt: len(body) for fmt, body in self._artifacts.items()},
+            }
+
+
+# Global template registry keyed by name
+_templates: Dict[str, TemplateCache] = {}
+_registry_lock = threading.Lock()
+
+
+def register(name: str, headers: Callable[[], List[str]],
+             dropdowns: Callable[[], Tuple[Any, Dict[str, List[str]]]]) -> TemplateCache:
+    """Create (or return the existing) template cache."""
+    with _registry_lock:
+        template = _templates.get(name)
+        if template is None:
+            template = TemplateCache(name, headers, dropdowns)
+            _templates[name] = template
+        return template
+
+
+def status() -> Dict[str, Any]:
+    """Current key and artifact sizes per template, plus counters for this worker."""
+    with _registry_lock:
+        templates = list(_templates.values())
+    return {"templates": {t.name: t.stats() for t in templates}, "stats": dict(_stats)}
+
+
+def _prometheus_lines() -> List[str]:
+    return instrumentation.gauge_lines(
+        "crm_template_builds", "Template artifact builds by this worker",
+        [({}, _stats["builds"])],
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -0,0 +1,184 @@
+"""
+Upload API Routes
+Data file upload, schema detection and bulk append to the CRM Leads sheet
+"""
+
+import os
+from datetime import datetime
+
+import gspread
+from fastapi import APIRouter, HTTPException, UploadFile, File
+from pydantic import BaseModel
+
+import analytics_views
+import duplicate_index
+import followup_index
+import member_ids
+import process_pool
+import schema_registry
+from header_resolver import get_canonical_key
+from leads_sheet import CREDENTIALS_FILE, GOOGLE_SHEET_ID, GOOGLE_SHEET_NAME, authorize
+
+router = APIRouter(tags=["upload"])
+
+# Excel/CSV parsing runs in the process pool, off the event loop
+process_pool.register_task("upload_inspect", "file_manager:process_data_file", timeout=120, max_queue=4)
+process_pool.register_task("upload_read", "file_manager:read_data_file", timeout=180, max_queue=2,
+                           max_result_bytes=256 * 1024 * 1024)
+
+
+@router.post("/upload_file")
+async def upload_file(file: UploadFile = File(...)):
+    """
+    Handle file uploads.
+    - Stores non-data files safely.
+    - Processes data files (Excel/CSV) for schema changes.
+    """
+    try:
+        from file_manager import save_upload
+
+        # 1. Save the file
+        file_path = save_upload(file, file.filename)
+        
+        # 2. Determine if it's a data file
+        filename = file.filename.lower()
+        is_data_file = filename.endswith(('.csv', '.xlsx', '.xls', '.xlsm'))
+        
+        if is_data_file:
+            # Load current schema to compare (Enquiry default)
+            existing_schema = schema_registry.get_fields("enquiry") or []
+            
+            result = await process_pool.run("upload_inspect", file_path, existing_schema)
+            # Add file path to result
+            result['file_path'] = file_path
+            return result
+        else:
+            # Non-data file
+            return {
+                "status": "success",
+                "message": f"File '{file.filename}' stored successfully.",
+                "file_path": file_path,
+                "type": "non-data"
+            }
+            
+    except Exception as e:
+        print(f"Upload failed: {e}")
+        raise process_pool.http_error(e) or HTTPException(status_code=500, detail=str(e))
+
+
+class ConfirmUploadRequest(BaseModel):
+    file_path: str
+
+
+@router.post("/confirm_upload")
+async def confirm_upload(payload: ConfirmUploadRequest):
+    """
+    Reads the previously uploaded file and APPENDS data to 'Sheet1' in Google Sheets.
+    It maps columns by name to match the existing sheet headers.
+    """
+    file_path = payload.file_path
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    if not os.path.exists(CREDENTIALS_FILE):
+        raise HTTPException(status_code=404, detail="Google credentials not found")
+
+    try:
+        # 1. Read Data (in a worker process)
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in ['.csv', '.xlsx', '.xls', '.xlsm']:
+            raise HTTPException(status_code=400, detail="Unsupported file format")
+
+        table = await process_pool.run("upload_read", file_path)
+        file_columns = table["columns"]
+
+        # 2. Connect to Sheets
+        client = authorize(lane="batch")
+        
+        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID) if GOOGLE_SHEET_ID else client.open(GOOGLE_SHEET_NAME)
+        try:
+            sheet = spreadsheet.worksheet("Sheet1")
+        except gspread.WorksheetNotFound:
+            sheet = spreadsheet.sheet1
+
+        # 3. Get Existing Headers (rows are only appended, so the header row is all we read)
+        existing_headers = sheet.row_values(1)
+        if not existing_headers:
+            # Sheet is empty, write headers from file
+            sheet_headers = file_columns + ['Timestamp']
+            sheet.append_row(sheet_headers, value_input_option='USER_ENTERED')
+        else:
+            sheet_headers = existing_headers
+
+        # 3b. Detect and Add New Columns
+        # Compare file columns to sheet_headers (case-insensitive check)
+        sheet_headers_lower = {h.strip().lower() for h in sheet_headers}
+        new_columns = []
+        for col in file_columns:
+            if col.strip().lower() not in sheet_headers_lower:
+                new_columns.append(col)
+        
+        if new_columns:
+            # Append new columns to header row in Sheet
+            # We need to find the next available column index
+            # But gspread's append_row doesn't work for partial row updates easily on existing rows
+            # simplest way: update the first row with the extended list
+            sheet_headers.extend(new_columns)
+            sheet.update(range_name='1:1', values=[sheet_headers], value_input_option='USER_ENTERED')
+
+        # 4. Map Data to Headers (now including new ones)
+        # Create a map for case-insensitive matching of file columns
+        file_cols_map = {c.strip().lower(): i for i, c in enumerate(file_columns)}
+        
+        data_to_append = []
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        for row in table["rows"]:
+            ordered_row = []
+            for h in sheet_headers:
+                h_lower = h.strip().lower()
+                
+                # Special handling for Timestamp
+                if h_lower == 'timestamp':
+                    ordered_row.append(current_time)
+                    continue
+
+                # Find matching column in file
+                if h_lower in file_cols_map:
+                    # Blanks were already read as ""
+                    ordered_row.append(row[file_cols_map[h_lower]])
+                else:
+                    # Column exists in Sheet but not in File -> Empty
+                    ordered_row.append("")
+            
+            data_to_append.append(ordered_row)
+
+        # 4b. Rows without a Member ID get IDs reserved in one step
+        member_id_col = next((i for i, h in enumerate(sheet_headers) if get_canonical_key(h) == "memberidkey"), None)
+        missing_ids = [] if member_id_col is None else [
+            r for r in data_to_append if not str(r[member_id_col]).strip()
+        ]
+        for r, member_id in zip(missing_ids, member_ids.reserve(len(missing_ids), sheet=sheet.title)):
+            r[member_id_col] = member_id
+
+        if data_to_append:
+            sheet.append_rows(data_to_append, value_input_option='USER_ENTERED')
+            followup_index.invalidate(sheet.title)
+            duplicate_index.invalidate(sheet.title)
+            analytics_views.invalidate(sheet.spreadsheet.id, sheet.title)
+            
+        message = f"Successfully appended {len(data_to_append)} rows."
+        if missing_ids:
+            message += f" Assigned {len(missing_ids)} new Member IDs."
+        if new_columns:
+            message += f" Added {len(new_columns)} new columns: {', '.join(new_columns)}."
+
+        return {
+            "status": "success",
+            "message": message,
+            "sheet_url": spreadsheet.url
+        }
+
+    except Exception as e:
+        print(f"Bulk update failed: {e}")
+        raise process_pool.http_error(e) or HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,500 @@
+"""
+Write-Ahead Outbox Module
+Durable SQLite journal for form writes: requests get a receipt immediately and a background worker replays them to Google Sheets, in order for each Member ID
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+import instrumentation
+
+# Configuration
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", "write_outbox.db")
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "1").strip() == "1"
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "12"))
+RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "300"))
+DEDUPE_WINDOW_SECONDS = int(os.getenv("OUTBOX_DEDUPE_WINDOW_SECONDS", "86400"))
+RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+LEASE_SECONDS = 300  # An entry claimed by a crashed process becomes replayable after this
+
+# Entry states: pending -> applying -> done | failed
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    member_id TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    lease_until REAL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    applied_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_key ON outbox (idempotency_key, created_at);
+CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, seq);
+CREATE INDEX IF NOT EXISTS idx_outbox_member ON outbox (member_id, seq);
+"""
+
+_handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+_already_applied: Dict[str, Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = {}
+_write_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_worker: Optional[threading.Thread] = None
+_initialized = False
+
+_stats: Dict[str, Any] = {
+    "applied": 0,
+    "retried": 0,
+    "failed": 0,
+    "deduplicated": 0,
+    "recovered": 0,
+    "last_applied_seq": None,
+    "last_lag_seconds": None,
+    "max_lag_seconds": 0.0,
+}
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(OUTBOX_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")  # fsync on every commit: a receipt means the write is on disk
+    return conn
+
+
+def init_db() -> None:
+    global _initialized
+    if _initialized:
+        return
+    with _write_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        _initialized = True
+
+
+def register_handler(kind: str, handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+                     already_applied: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None) -> None:
+    """
+    Register the function that replays one entry of a kind to Google Sheets.
+
+    Args:
+        kind: Entry kind, e.g. "enquiry_submit"
+        handler: Called with the stored payload; returns a JSON-serializable result.
+                 Raising HTTPException with a 4xx status fails the entry permanently,
+                 any other exception is retried with backoff.
+        already_applied: For handlers that are not idempotent (plain appends). Called before
+                 every attempt after the first, since an earlier attempt may have reached Sheets
+                 before the process died; returning a result marks the entry done without
+                 calling the handler again.
+    """
+    _handlers[kind] = handler
+    if already_applied is not None:
+        _already_applied[kind] = already_applied
+    else:
+        _already_applied.pop(kind, None)
+
+
+def idempotency_key(kind: str, member_id: str, payload: Dict[str, Any]) -> str:
+    """Member ID + payload hash; identical re-submits within the dedupe window share a receipt."""
+    body = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(f"{kind}\x1f{member_id or ''}\x1f{body}".encode("utf-8")).hexdigest()
+
+
+def _receipt(row: sqlite3.Row, duplicate: bool = False) -> Dict[str, Any]:
+    receipt = {
+        "receipt_id": row["seq"],
+        "kind": row["kind"],
+        "member_id": row["member_id"] or None,
+        "status": row["status"],
+        "attempts": row["attempts"],
+        "queued_at": datetime.fromtimestamp(row["created_at"]).isoformat(),
+        "applied_at": datetime.fromtimestamp(row["applied_at"]).isoformat() if row["applied_at"] else None,
+        "last_error": row["last_error"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+    }
+    if duplicate:
+        receipt["duplicate"] = True
+    return receipt
+
+
+def enqueue(kind: str, payload: Dict[str, Any], member_id: str = "", key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Durably journal a write and return its receipt. The call returns once the
+    entry is committed (fsync'd) to the local SQLite file; Sheets is not touched.
+
+    Args:
+        kind: Registered handler kind
+        payload: Data the handler needs to replay the write
+        member_id: Member ID the write belongs to (part of the idempotency key)
+        key: Idempotency key (defaults to idempotency_key(kind, member_id, payload)); pass one
+             built from the client's original data when the server adds generated values
+
+    Returns:
+        Receipt dict; "duplicate" is set when an identical write was already journaled
+    """
+    if kind not in _handlers:
+        raise ValueError(f"No outbox handler registered for '{kind}'")
+    init_db()
+    key = key or idempotency_key(kind, member_id, payload)
+    now = time.time()
+
+    with _write_lock:
+        conn = _connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute(
+                "SELECT * FROM outbox WHERE idempotency_key = ? AND created_at >= ? "
+                "AND status != 'failed' ORDER BY seq DESC LIMIT 1",
+                (key, now - DEDUPE_WINDOW_SECONDS),
+            ).fetchone()
+            if existing is not None:
+                conn.execute("COMMIT")
+                _stats["deduplicated"] += 1
+                return _receipt(existing, duplicate=True)
+
+            cursor = conn.execute(
+                "INSERT INTO outbox (idempotency_key, kind, member_id, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, member_id or "", json.dumps(payload, default=str, ensure_ascii=False), now),
+            )
+            row = conn.execute("SELECT * FROM outbox WHERE seq = ?", (cursor.lastrowid,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    _wake.set()
+    return _receipt(row)
+
+
+def submit(kind: str, payload: Dict[str, Any], member_id: str = "", key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Journal a write, or apply it inline when the outbox is disabled (OUTBOX_ENABLED=0).
+    Same arguments as enqueue().
+    """
+    if OUTBOX_ENABLED:
+        return enqueue(kind, payload, member_id, key)
+    result = _handlers[kind](payload)
+    return {
+        "receipt_id": None,
+        "kind": kind,
+        "member_id": member_id or None,
+        "status": "done",
+        "applied_at": datetime.now().isoformat(),
+        "result": result,
+    }
+
+
+def get_receipt(receipt_id: int) -> Optional[Dict[str, Any]]:
+    init_db()
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM outbox WHERE seq = ?", (receipt_id,)).fetchone()
+    finally:
+        conn.close()
+    return _receipt(row) if row else None
+
+
+def pending_payloads(kind: str) -> List[Dict[str, Any]]:
+    """Payloads of a kind not yet applied to Sheets, oldest first (for read-your-writes overlays)."""
+    if not OUTBOX_ENABLED:
+        return []
+    init_db()
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT payload FROM outbox WHERE kind = ? AND status IN ('pending', 'applying') ORDER BY seq",
+            (kind,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [json.loads(r["payload"]) for r in rows]
+
+
+def _claim_head(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+    """
+    Lease the oldest ready entry. Writes for one Member ID replay strictly in order:
+    an entry waits while an earlier one for the same ID is leased or backing off.
+    Entries without a Member ID (complaints, feedback) do not wait for anything, so
+    one failing write never holds back everyone else's.
+    """
+    now = time.time()
+    with _write_lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            head = conn.execute(
+                "SELECT * FROM outbox o WHERE status IN ('pending', 'applying') AND next_attempt_at <= ? "
+                "AND (status = 'pending' OR COALESCE(lease_until, 0) <= ?) "
+                "AND NOT EXISTS (SELECT 1 FROM outbox p WHERE p.member_id = o.member_id AND o.member_id != '' "
+                "AND p.seq < o.seq AND p.status IN ('pending', 'applying')) "
+                "ORDER BY seq LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if head is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE outbox SET status = 'applying', lease_until = ?, attempts = attempts + 1 WHERE seq = ?",
+                (now + LEASE_SECONDS, head["seq"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return conn.execute("SELECT * FROM outbox WHERE seq = ?", (head["seq"],)).fetchone()
+
+
+def _finish(conn: sqlite3.Connection, seq: int, status: str, result: Any = None, error: Optional[str] = None,
+            next_attempt_at: float = 0) -> None:
+    with _write_lock:
+        conn.execute(
+            "UPDATE outbox SET status = ?, result = ?, last_error = ?, next_attempt_at = ?, lease_until = NULL, "
+            "applied_at = CASE WHEN ? = 'done' THEN ? ELSE applied_at END WHERE seq = ?",
+            (status, json.dumps(result, default=str) if result is not None else None, error,
+             next_attempt_at, status, time.time(), seq),
+        )
+
+
+def replay_next(conn: Optional[sqlite3.Connection] = None) -> Optional[Dict[str, Any]]:
+    """
+    Apply the oldest ready entry of the journal to Sheets.
+
+    Returns:
+        The entry's receipt after the attempt, or None if nothing was ready
+    """
+    init_db()
+    own_conn = conn is None
+    conn = conn or _connect()
+    try:
+        entry = _claim_head(conn)
+        if entry is None:
+            return None
+
+        seq = entry["seq"]
+        handler = _handlers.get(entry["kind"])
+        try:
+            if handler is None:
+                raise RuntimeError(f"No outbox handler registered for '{entry['kind']}'")
+            payload = json.loads(entry["payload"])
+            lookup = _already_applied.get(entry["kind"])
+            result = lookup(payload) if lookup is not None and entry["attempts"] > 1 else None
+            if result is not None:
+                _stats["recovered"] += 1
+                print(f"[Outbox] #{seq} {entry['kind']} was already in Sheets, not applying it again")
+            else:
+                result = handler(payload)
+            _finish(conn, seq, "done", result=result)
+            lag = time.time() - entry["created_at"]
+            _stats["applied"] += 1
+            _stats["last_applied_seq"] = seq
+            _stats["last_lag_seconds"] = round(lag, 3)
+            _stats["max_lag_seconds"] = round(max(_stats["max_lag_seconds"], lag), 3)
+        except HTTPException as e:
+            if e.status_code < 500:
+                # Rejected by validation (e.g. bed already occupied); replaying again cannot succeed
+                _finish(conn, seq, "failed", error=str(e.detail))
+                _stats["failed"] += 1
+                print(f"[Outbox] #{seq} {entry['kind']} rejected: {e.detail}")
+            else:
+                _retry_later(conn, entry, str(e.detail))
+        except Exception as e:
+            _retry_later(conn, entry, str(e))
+
+        return _receipt(conn.execute("SELECT * FROM outbox WHERE seq = ?", (seq,)).fetchone())
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def _retry_later(conn: sqlite3.Connection, entry: sqlite3.Row, error: str) -> None:
+    attempts = entry["attempts"]
+    if attempts >= MAX_ATTEMPTS:
+        _finish(conn, entry["seq"], "failed", error=error)
+        _stats["failed"] += 1
+        print(f"[Outbox] #{entry['seq']} {entry['kind']} failed after {attempts} attempts: {error}")
+        return
+    delay = min(RETRY_MAX_SECONDS, 2 ** attempts)
+    _finish(conn, entry["seq"], "pending", error=error, next_attempt_at=time.time() + delay)
+    _stats["retried"] += 1
+    print(f"[Outbox] #{entry['seq']} {entry['kind']} attempt {attempts} failed, retrying in {delay:.0f}s: {error}")
+
+
+def _prune(conn: sqlite3.Connection) -> None:
+    with _write_lock:
+        conn.execute(
+            "DELETE FROM outbox WHERE status = 'done' AND applied_at < ?",
+            (time.time() - RETENTION_DAYS * 86400,),
+        )
+
+
+def _run() -> None:
+    conn = _connect()
+    last_prune = 0.0
+    try:
+        while not _stop.is_set():
+            try:
+                if replay_next(conn) is not None:
+                    continue
+                if time.time() - last_prune > 3600:
+                    _prune(conn)
+                    last_prune = time.time()
+            except Exception as e:
+                print(f"[Outbox] Worker error: {e}")
+            _wake.wait(timeout=1.0)
+            _wake.clear()
+    finally:
+        conn.close()
+
+
+def start_outbox_worker() -> None:
+    """Start the background replay thread (also replays anything left from a previous run)."""
+    global _worker
+
+    if not OUTBOX_ENABLED:
+        print("[Outbox] Disabled via OUTBOX_ENABLED, writes go straight to Sheets")
+        return
+    if _worker is not None and _worker.is_alive():
+        return
+    init_db()
+    _stop.clear()
+    _worker = threading.Thread(target=_run, name="write-outbox", daemon=True)
+    _worker.start()
+    backlog = metrics()["backlog"]
+    print(f"[Outbox] Worker started ({OUTBOX_DB_PATH}), {backlog} entries waiting")
+
+
+def stop_outbox_worker(timeout: float = 10.0) -> None:
+    global _worker
+
+    if _worker is None:
+        return
+    _stop.set()
+    _wake.set()
+    _worker.join(timeout=timeout)
+    _worker = None
+
+
+def flush(timeout: float = 30.0) -> Dict[str, Any]:
+    """
+    Replay the backlog now, ignoring retry backoff, until it is empty or `timeout` passes.
+
+    Returns:
+        metrics() after the flush, plus "flushed" (entries applied or failed)
+    """
+    init_db()
+    deadline = time.time() + timeout
+    flushed = 0
+    with _write_lock:
+        conn = _connect()
+        try:
+            conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE status = 'pending'")
+        finally:
+            conn.close()
+
+    conn = _connect()
+    try:
+        while time.time() < deadline:
+            receipt = replay_next(conn)
+            if receipt is None:
+                leased = conn.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE status = 'applying' AND lease_until > ?", (time.time(),)
+                ).fetchone()[0]
+                if not leased:
+                    break  # Empty, or everything left is backing off after a failure: the worker retries it
+                time.sleep(0.2)  # Another worker is applying an entry this one may be waiting behind
+                continue
+            if receipt["status"] in ("done", "failed"):
+                flushed += 1
+    finally:
+        conn.close()
+
+    result = metrics()
+    result["flushed"] = flushed
+    return result
+
+
+def metrics() -> Dict[str, Any]:
+    """Backlog size, replay lag and failure counts."""
+    init_db()
+    conn = _connect()
+    try:
+        counts = {r["status"]: r["n"] for r in conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status")}
+        oldest = conn.execute(
+            "SELECT MIN(created_at) AS t FROM outbox WHERE status IN ('pending', 'applying')"
+        ).fetchone()["t"]
+        head = conn.execute(
+            "SELECT seq, kind, attempts, last_error FROM outbox WHERE status IN ('pending', 'applying') ORDER BY seq LIMIT 1"
+        ).fetchone()
+    finally:
+        conn.close()
+
+    return {
+        "enabled": OUTBOX_ENABLED,
+        "worker_running": _worker is not None and _worker.is_alive(),
+        "backlog": counts.get("pending", 0) + counts.get("applying", 0),
+        "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+        "failed": counts.get("failed", 0),
+        "done": counts.get("done", 0),
+        "head": dict(head) if head else None,
+        "stats": dict(_stats),
+    }
+
+
+def failed_entries(limit: int = 50) -> List[Dict[str, Any]]:
+    """Entries that gave up (validation rejects or too many attempts), newest first."""
+    init_db()
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT * FROM outbox WHERE status = 'failed' ORDER BY seq DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [_receipt(r) for r in rows]
+
+
+def requeue(receipt_id: int) -> Optional[Dict[str, Any]]:
+    """Put a failed entry back into the journal at its original position."""
+    init_db()
+    with _write_lock:
+        conn = _connect()
+        try:
+            conn.execute(
+                "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = 0 WHERE seq = ? AND status = 'failed'",
+                (receipt_id,),
+            )
+        finally:
+            conn.close()
+    _wake.set()
+    return get_receipt(receipt_id)
+
+
+def _prometheus_lines() -> List[str]:
+    if not OUTBOX_ENABLED:
+        return []
+    current = metrics()
+    return (
+        instrumentation.gauge_lines("crm_outbox_backlog", "Journaled writes not yet applied to Sheets", [({}, current["backlog"])])
+        + instrumentation.gauge_lines("crm_outbox_lag_seconds", "Age of the oldest unapplied write", [({}, current["lag_seconds"])])
+        + instrumentation.gauge_lines("crm_outbox_failed", "Journaled writes that gave up", [({}, current["failed"])])
+    )
+
+
+instrumentation.register_collector(_prometheus_lines)
@@ -1,5 +1,4 @@
 import React, { useState, useRef, useEffect } from 'react';
-import axios from 'axios';
 import { Sparkles, X, Loader2, Send } from 'lucide-react';
 
 import API_BASE_URL from './config';
@@ -31,46 +30,58 @@ const AIChat = () => {
         setAiChatInput('');
         setAiChatLoading(true);
 
+        // Placeholder message that is filled in as stream events arrive
+        const aiMsgId = Date.now();
+        setAiChatMessages(prev => [...prev, { id: aiMsgId, text: 'Looking up records...', sender: 'ai', timestamp: new Date() }]);
+        const updateAiMsg = (text) => setAiChatMessages(prev => prev.map(m => (m.id === aiMsgId ? { ...m, text } : m)));
+
         try {
-            // Simulate AI response or call actual endpoint
-            // The original code in App.jsx did not show the endpoint call implementation in the snippet I viewed, 
-            // but usually it's /ai_chat or similar. I'll assume /ai_chat based on naming.
-            // If the endpoint doesn't exist, it will fail, but the UI will remain.
-            // I'll check if I can find the endpoint in main.py, but for now I'll use a placeholder or best guess.
-            // Actually, I'll search for 'chat' in main.py if possible, but I can't in this turn easily.
-            // I'll use a generic POST to /chat/query or just assume the user updates it if it's broken.
-            // Wait, looking at App.jsx snippet (line 2003+), I don't see the helper function `sendAIChatMessage` implementation in the view I had.
-            // I only saw the render.
-            // I need to be careful.
-
-            // Re-reading App.jsx view (step 150):
-            // I DON'T have the implementation of `sendAIChatMessage`. 
-            // BUT, the user prompt is about "Billing Summary" and "Analytics". 
-            // AI Chat is secondary. I will implement a stub or try to guess.
-            // Or I can leave it out of App.jsx if it's not critical?
-            // "Fix the application by applying ALL of the following changes...". AI Chat is not mentioned. 
-            // But removing it might annoy the user.
-
-            // I'll use a safe implementation.
-            const response = await axios.post(`${API_BASE_URL}/chat_query`, {
-                query: userMsg.text,
-                filter: aiChatFilter
+            // Stream the answer as Server-Sent Events so the first result shows up immediately
+            const response = await fetch(`${API_BASE_URL}/chat_query`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+                body: JSON.stringify({ query: userMsg.text, filter: aiChatFilter, stream: true })
             });
-
-            const aiMsg = {
-                text: response.data.answer || "I'm not sure how to answer that.",
-                sender: 'ai',
-                timestamp: new Date()
-            };
-            setAiChatMessages(prev => [...prev, aiMsg]);
+            if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let answered = false;
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let sep;
+                while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, sep);
+                    buffer = buffer.slice(sep + 2);
+
+                    let event = 'message';
+                    const dataLines = [];
+                    frame.split('\n').forEach(line => {
+                        if (line.startsWith('event:')) event = line.slice(6).trim();
+                        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+                    });
+                    if (!dataLines.length) continue;
+                    const data = JSON.parse(dataLines.join('\n'));
+
+                    if (event === 'member_ids' && !answered) {
+                        updateAiMsg(`Found ${data.count} record(s), preparing answer...`);
+                    } else if (event === 'summary' || event === 'error') {
+                        answered = true;
+                        updateAiMsg(data.answer || "I'm not sure how to answer that.");
+                    }
+                }
+            }
+
+            if (!answered) updateAiMsg("I'm not sure how to answer that.");
+            setAiChatConnected(true);
         } catch (error) {
             console.error(error);
-            const errorMsg = {
-                text: "Sorry, I couldn't connect to the server.",
-                sender: 'ai',
-                timestamp: new Date()
-            };
-            setAiChatMessages(prev => [...prev, errorMsg]);
+            updateAiMsg("Sorry, I couldn't connect to the server.");
         } finally {
             setAiChatLoading(false);
         }
@@ -3,6 +3,7 @@ import axios from 'axios';
 import { LayoutGrid, Users, Calendar, CheckCircle, XCircle, AlertCircle, Bed, User, Plus, Sparkles } from 'lucide-react';
 
 import API_BASE_URL from './config';
+import { useLiveUpdates } from './utils/liveUpdates';
 
 const BedManagement = () => {
     const [beds, setBeds] = useState([]);
@@ -30,8 +31,13 @@ const BedManagement = () => {
     const [showPatientModal, setShowPatientModal] = useState(false);
     const [selectedPatient, setSelectedPatient] = useState(null);
     const [editingDischargeDate, setEditingDischargeDate] = useState('');
-    const [complaintData, setComplaintData] = useState({ complaint_type: '', description: '' });
+    // One request id per form fill: a resent request is deduplicated, a second complaint is not
+    const newRequestId = () => (window.crypto?.randomUUID
+        ? window.crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`);
+    const [complaintData, setComplaintData] = useState({ complaint_type: '', description: '', request_id: newRequestId() });
     const [feedbackData, setFeedbackData] = useState({
+        request_id: newRequestId(),
         patient_name: '',
         rating_comfort: 5,
         rating_cleanliness: 5,
@@ -42,7 +48,7 @@ const BedManagement = () => {
     const handleComplaintClick = (bed, e) => {
         e.stopPropagation(); // Prevent allocation click
         setSelectedBed(bed);
-        setComplaintData({ complaint_type: '', description: '' });
+        setComplaintData({ complaint_type: '', description: '', request_id: newRequestId() });
         setShowComplaintModal(true);
     };
 
@@ -65,6 +71,7 @@ const BedManagement = () => {
         e.preventDefault();
         try {
             await axios.post(`${API_BASE_URL}/api/feedback`, feedbackData);
+            setFeedbackData(prev => ({ ...prev, request_id: newRequestId() }));
             setShowFeedbackModal(false);
             alert("Feedback submitted.");
         } catch (error) {
@@ -88,18 +95,62 @@ const BedManagement = () => {
         });
     }, [beds]);
 
-    const fetchBeds = async () => {
+    const fetchBeds = async ({ silent = false } = {}) => {
         try {
-            setLoading(true);
+            if (!silent) setLoading(true);
             const response = await axios.get(`${API_BASE_URL}/api/beds`);
             setBeds(response.data.beds || []);
         } catch (error) {
             console.error("Error fetching beds:", error);
         } finally {
-            setLoading(false);
+            if (!silent) setLoading(false);
         }
     };
 
+    // Apply bed changes made by other users as they happen; refetch only for sheet edits or a resync
+    useLiveUpdates(['beds'], (events) => {
+        let refetch = false;
+        const patches = {};
+        events.forEach((event) => {
+            const { type, data } = event;
+            if (type === 'bed_allocated') {
+                patches[event.key] = {
+                    patient_name: data.patient_name,
+                    member_id: data.member_id,
+                    gender: data.gender,
+                    status: 'Occupied',
+                    admission_date: data.admission_date,
+                    discharge_date: data.discharge_date,
+                    pain_point: data.pain_point,
+                    pending_sync: false
+                };
+            } else if (type === 'bed_discharged') {
+                patches[event.key] = {
+                    patient_name: '',
+                    member_id: '',
+                    gender: '',
+                    status: 'Available',
+                    admission_date: '',
+                    discharge_date: '',
+                    pain_point: '',
+                    pending_sync: false
+                };
+            } else if (type === 'discharge_date_updated') {
+                patches[event.key] = { ...patches[event.key], discharge_date: data.discharge_date };
+            } else {
+                refetch = true;
+            }
+        });
+        if (refetch) {
+            fetchBeds({ silent: true });
+        } else if (Object.keys(patches).length > 0) {
+            setBeds(prev => prev.map(bed => {
+                const patch = patches[`${bed.room_no}/${bed.bed_index}`];
+                return patch ? { ...bed, ...patch } : bed;
+            }));
+        }
+    });
+
     const fetchPatients = async () => {
         try {
             const response = await axios.get(`${API_BASE_URL}/search_data?limit=1000`);
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Database, Plus, Trash2, Save, RefreshCw, AlertCircle, CheckCircle } from 'lucide-react';
 import API_BASE_URL from './config';
+import { fetchDropdownOptions as loadDropdownOptions } from './utils/dropdownOptions';
 
 const DropdownManager = () => {
     const [dropdownFields, setDropdownFields] = useState({});
@@ -17,14 +18,8 @@ const DropdownManager = () => {
     const fetchDropdownOptions = async () => {
         try {
             setLoading(true);
-            const response = await fetch(`${API_BASE_URL}/api/dropdown-options`);
-            const data = await response.json();
-
-            if (data.status === 'success') {
-                setDropdownFields(data.dropdown_options);
-            } else {
-                setError('Failed to load dropdown options');
-            }
+            // Only the changes since the cached version are downloaded
+            setDropdownFields(await loadDropdownOptions());
         } catch (err) {
             setError(`Error loading dropdown options: ${err.message}`);
         } finally {
@@ -96,17 +96,6 @@ const EnquiryPage = () => {
         return reordered;
     };
 
-    const generateMemberId = () => {
-        const now = new Date();
-        const yyyy = now.getFullYear();
-        const mm = String(now.getMonth() + 1).padStart(2, '0');
-        const dd = String(now.getDate()).padStart(2, '0');
-        const dateStr = `${yyyy}-${mm}-${dd}`;
-        const timestamp = now.getTime();
-        const numericalId = (timestamp % 100000) + Math.floor(Math.random() * 9000) + 1000;
-        return `MID-${dateStr}-${numericalId}`;
-    };
-
     const todayISODate = () => {
         const now = new Date();
         const y = now.getFullYear();
@@ -128,7 +117,8 @@ const EnquiryPage = () => {
             const dataType = String(field?.data_type || field?.type || '').toLowerCase();
             const nameLower = String(name).toLowerCase();
             if (isMemberIdName(name)) {
-                initial[name] = generateMemberId();
+                // Issued by the server on submit
+                initial[name] = '';
             } else if (dataType === 'date') {
                 if (nameLower === 'date') {
                     initial[name] = todayISODate();
@@ -386,7 +376,7 @@ const EnquiryPage = () => {
     const findMissingRequiredFields = (dataObj) => {
         const missing = [];
         schema.forEach(field => {
-            if (!isRequiredField(field?.name)) return;
+            if (!isRequiredField(field?.name) || isMemberIdName(field?.name)) return;
             if (!dataObj[field.name]) missing.push(field.name);
         });
         return missing;
@@ -425,7 +415,12 @@ const EnquiryPage = () => {
             const payloadData = convertDatesForPayload(mergedData);
             const response = await axios.post(`${API_BASE_URL}/submit`, { data: payloadData });
 
-            setMessage(response.data.message || 'Data submitted successfully!');
+            const duplicates = response.data.possible_duplicates || [];
+            const duplicateNote = duplicates.length
+                ? ` Possible duplicate of ${duplicates.slice(0, 3).map(d => d.member_id || `row ${d.row}`).join(', ')}.`
+                : '';
+            const memberIdNote = response.data.member_id ? ` Member ID: ${response.data.member_id}.` : '';
+            setMessage((response.data.message || 'Data submitted successfully!') + memberIdNote + duplicateNote);
             if (response.data.sheet_url) setSheetUrl(response.data.sheet_url);
 
             setTimeout(() => {
@@ -550,6 +545,7 @@ const EnquiryPage = () => {
                 onChange={e => handleInputChange(field.name, e.target.value)}
                 readOnly={isReadOnly}
                 disabled={isReadOnly}
+                placeholder={isMemberIdName(field.name) ? 'Assigned on submit' : undefined}
             />
         );
     };
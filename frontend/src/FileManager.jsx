@@ -249,7 +249,8 @@ const FileManager = () => {
         try {
             const payload = {
                 filters,
-                date_column: dateColumn
+                date_column: dateColumn,
+                preview_token: previewData?.preview_token
             };
             const response = await fetch(`${API_BASE_URL}/delete/confirm`, {
                 method: 'POST',
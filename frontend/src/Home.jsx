@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { Users, TrendingUp, UserPlus, UserMinus, Calendar, XCircle, CheckCircle, Building2, LogOut, AlertCircle, ChevronRight } from 'lucide-react';
+import { useLiveUpdates } from './utils/liveUpdates';
 
 const Home = () => {
     const [dashboardData, setDashboardData] = useState({
@@ -26,8 +27,13 @@ const Home = () => {
         fetchDashboardData();
     }, []);
 
-    const fetchDashboardData = async () => {
-        setLoading(true);
+    // New enquiries, admissions, discharges and complaints refresh the cards in place
+    useLiveUpdates(['dashboard'], () => {
+        fetchDashboardData({ silent: true });
+    });
+
+    const fetchDashboardData = async ({ silent = false } = {}) => {
+        if (!silent) setLoading(true);
         try {
             const [
                 enquiries, converted, rejected, complaintsRec, complaintsRes, followUps,
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Search, Plus, Calendar, IndianRupee, Filter, TrendingUp, AlertCircle, Users } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 import API_BASE_URL from '../config';
+import { useLiveUpdates } from '../utils/liveUpdates';
 
 const HomeCareList = () => {
     const navigate = useNavigate();
@@ -26,9 +27,14 @@ const HomeCareList = () => {
         filterClients();
     }, [searchTerm, clients]);
 
-    const fetchClients = async () => {
+    // Clients added, edited or billed elsewhere refresh the list
+    useLiveUpdates(['homecare_clients'], () => {
+        fetchClients({ silent: true });
+    });
+
+    const fetchClients = async ({ silent = false } = {}) => {
         try {
-            setLoading(true);
+            if (!silent) setLoading(true);
             const url = `${API_BASE_URL}/api/homecare/clients${statusFilter !== 'ALL' ? `?status=${statusFilter}` : ''}`;
             const response = await fetch(url);
             const data = await response.json();
@@ -43,7 +49,7 @@ const HomeCareList = () => {
             console.error('Error fetching clients:', err);
             setError('Failed to connect to server');
         } finally {
-            setLoading(false);
+            if (!silent) setLoading(false);
         }
     };
 
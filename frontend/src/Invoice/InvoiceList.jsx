@@ -9,6 +9,7 @@ import PatientSearch from '../components/PatientSearch';
 import InvoiceTable from '../components/InvoiceTable';
 import EditableDropdown from '../components/EditableDropdown';
 import API_BASE_URL from '../config';
+import { useLiveUpdates } from '../utils/liveUpdates';
 
 const InvoiceList = () => {
     const navigate = useNavigate();
@@ -52,8 +53,13 @@ const InvoiceList = () => {
         return () => clearTimeout(timer);
     }, [searchTerm]);
 
-    const loadInvoices = async () => {
-        setLoading(true);
+    // Invoices posted elsewhere (other users, billing jobs, sheet edits) refresh the list
+    useLiveUpdates(['invoices'], () => {
+        loadInvoices({ silent: true });
+    });
+
+    const loadInvoices = async ({ silent = false } = {}) => {
+        if (!silent) setLoading(true);
         try {
             const params = {};
 
@@ -95,9 +101,9 @@ const InvoiceList = () => {
             setInvoices(response.data.invoices || []);
         } catch (error) {
             console.error('Error loading invoices:', error);
-            setInvoices([]);
+            if (!silent) setInvoices([]);
         } finally {
-            setLoading(false);
+            if (!silent) setLoading(false);
         }
     };
 
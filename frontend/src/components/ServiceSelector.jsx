@@ -34,22 +34,50 @@ const ServiceSelector = ({ onAddService, onClose }) => {
         discount: ''
     });
 
+    // Typeahead results from the backend's catalog index (null while the search box is empty)
+    const [searchResults, setSearchResults] = useState(null);
+
     useEffect(() => {
         loadCatalogData();
         loadDropdownOptions();
     }, []);
 
+    useEffect(() => {
+        const query = searchTerm.trim();
+        if (!query) {
+            setSearchResults(null);
+            return undefined;
+        }
+        let cancelled = false;
+        const timer = setTimeout(async () => {
+            try {
+                const response = await axios.get(`${API_BASE_URL}/api/catalog/search`, {
+                    params: { q: query, category: activeTab.toLowerCase(), limit: 50 }
+                });
+                if (!cancelled) {
+                    setSearchResults(response.data.items || []);
+                }
+            } catch (error) {
+                console.error('Error searching catalog:', error);
+                if (!cancelled) {
+                    setSearchResults(null);
+                }
+            }
+        }, 200);
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
+    }, [searchTerm, activeTab]);
+
     const loadCatalogData = async () => {
         try {
-            const [servicesRes, packagesRes, productsRes] = await Promise.all([
-                axios.get(`${API_BASE_URL}/api/catalog/services`),
-                axios.get(`${API_BASE_URL}/api/catalog/packages`),
-                axios.get(`${API_BASE_URL}/api/catalog/products`)
-            ]);
+            // All three categories in one request
+            const response = await axios.get(`${API_BASE_URL}/api/catalog`);
 
-            setServices(servicesRes.data.items || []);
-            setPackages(packagesRes.data.items || []);
-            setProducts(productsRes.data.items || []);
+            setServices(response.data.services || []);
+            setPackages(response.data.packages || []);
+            setProducts(response.data.products || []);
         } catch (error) {
             console.error('Error loading catalog:', error);
         }
@@ -168,7 +196,7 @@ const ServiceSelector = ({ onAddService, onClose }) => {
         }
     };
 
-    const filteredServices = getCurrentItems().filter(service =>
+    const filteredServices = searchResults || getCurrentItems().filter(service =>
         service.name.toLowerCase().includes(searchTerm.toLowerCase())
     );
 
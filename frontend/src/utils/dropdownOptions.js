@@ -0,0 +1,58 @@
+import API_BASE_URL from '../config';
+
+// Dropdown options (GET /api/dropdown-options) cached in localStorage with the
+// server's version. Later loads send ?since=<version> and apply only the changes
+// made since then; the server answers with the full set ("full": true) when the
+// version is too old or a category was renamed or removed.
+const STORAGE_KEY = 'crm.dropdownOptions';
+
+const readCache = () => {
+    try {
+        const cached = JSON.parse(window.localStorage.getItem(STORAGE_KEY));
+        return cached && typeof cached.version === 'number' && cached.options ? cached : null;
+    } catch (error) {
+        return null;
+    }
+};
+
+const writeCache = (version, options) => {
+    try {
+        window.localStorage.setItem(STORAGE_KEY, JSON.stringify({ version, options }));
+    } catch (error) {
+        // Storage full or disabled: the next load is a full one
+    }
+};
+
+// changes: [{ version, op: 'add' | 'remove' | 'add_field', field, value }, ...]
+export const applyDropdownChanges = (options, changes) => {
+    const next = { ...options };
+    changes.forEach(({ op, field, value }) => {
+        const current = next[field] || [];
+        if (op === 'add_field') {
+            next[field] = current;
+        } else if (op === 'add' && !current.includes(value)) {
+            next[field] = [...current, value];
+        } else if (op === 'remove') {
+            next[field] = current.filter((option) => option !== value);
+        }
+    });
+    return next;
+};
+
+export const fetchDropdownOptions = async () => {
+    const cached = readCache();
+    const query = cached ? `?since=${cached.version}` : '';
+    const response = await fetch(`${API_BASE_URL}/api/dropdown-options${query}`);
+    const data = await response.json();
+
+    if (data.status !== 'success') {
+        throw new Error('Failed to load dropdown options');
+    }
+    const options = data.changes && cached
+        ? applyDropdownChanges(cached.options, data.changes)
+        : data.dropdown_options;
+    writeCache(data.version, options);
+    return options;
+};
+
+export default fetchDropdownOptions;
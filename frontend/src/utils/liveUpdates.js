@@ -0,0 +1,38 @@
+import { useEffect, useRef } from 'react';
+import API_BASE_URL from '../config';
+
+// Subscribes to the backend's live update stream (GET /api/live, Server-Sent Events).
+// EventSource reconnects on its own and sends the last frame id as Last-Event-ID,
+// so events published while the connection was down are replayed (or a "resync"
+// event arrives when too much was missed).
+//
+// topics: array of topics or groups, e.g. ['beds'] or ['dashboard']
+// onEvents: called with the coalesced events of each frame:
+//   [{ seq, topic, type, key, data, at }, ...]
+export const useLiveUpdates = (topics, onEvents) => {
+    const handlerRef = useRef(onEvents);
+    handlerRef.current = onEvents;
+    const topicList = topics.join(',');
+
+    useEffect(() => {
+        if (typeof window === 'undefined' || !window.EventSource) {
+            return undefined;
+        }
+        const source = new EventSource(`${API_BASE_URL}/api/live?topics=${encodeURIComponent(topicList)}`);
+        const handleChanges = (message) => {
+            try {
+                const payload = JSON.parse(message.data);
+                handlerRef.current(payload.events || []);
+            } catch (error) {
+                console.error('Live update error:', error);
+            }
+        };
+        source.addEventListener('changes', handleChanges);
+        return () => {
+            source.removeEventListener('changes', handleChanges);
+            source.close();
+        };
+    }, [topicList]);
+};
+
+export default useLiveUpdates;